@@ -3,11 +3,14 @@ aggregate_candles.py — 1m 캔들 → 5m/15m/1h 집계.
 
 candles (1m) 테이블의 데이터를 market_ohlcv에 5m, 15m, 1h 타임프레임으로 집계.
 ON CONFLICT DO UPDATE로 멱등성 보장.
+설정된 모든 심볼(market_symbols.get_symbols)을 타임프레임당 한 번의 INSERT ... SELECT
+(GROUP BY symbol, bucket)로 처리.
 
 Usage:
     python aggregate_candles.py                       # 전체 집계
     python aggregate_candles.py --tf 15m              # 15m만
     python aggregate_candles.py --start 2024-01-01    # 특정 시작일
+    python aggregate_candles.py --symbol ETH/USDT:USDT  # 특정 심볼만 (반복 가능)
 """
 import sys
 import argparse
@@ -17,10 +20,13 @@ from datetime import datetime, timezone
 sys.path.insert(0, '/root/trading-bot/app')
 from db_config import get_conn
 from backfill_utils import start_job, finish_job, update_progress, check_stop, check_pause
+from db_migrations import ensure_pipeline_lag
+from market_symbols import get_symbols, LagTracker
 
 LOG_PREFIX = '[aggregate_candles]'
 JOB_NAME = 'aggregate_candles'
-SYMBOL = 'BTC/USDT:USDT'
+SYMBOLS = get_symbols()
+SYMBOL = SYMBOLS[0]
 
 # Timeframe definitions: (name, interval_sql, minutes)
 TIMEFRAMES = [
@@ -34,16 +40,17 @@ def _log(msg):
     print(f'{LOG_PREFIX} {msg}', flush=True)
 
 
-def _aggregate_tf(conn, tf_name, interval_sql, minutes, start_date, end_date):
-    """Aggregate 1m candles into a specific timeframe."""
-    _log(f'Aggregating to {tf_name} ({interval_sql})...')
+def _aggregate_tf(conn, tf_name, interval_sql, minutes, start_date, end_date, symbols=None):
+    """Aggregate 1m candles of every symbol into a specific timeframe."""
+    symbols = list(symbols or SYMBOLS)
+    _log(f'Aggregating to {tf_name} ({interval_sql}) for {",".join(symbols)}...')
 
     with conn.cursor() as cur:
         # Floor timestamps to interval boundaries, preserving timestamptz
         cur.execute(f"""
             INSERT INTO market_ohlcv (symbol, tf, ts, o, h, l, c, v)
             SELECT
-                %s,
+                symbol,
                 %s,
                 to_timestamp(
                     floor(extract(epoch from ts) / (%s * 60)) * (%s * 60)
@@ -54,9 +61,9 @@ def _aggregate_tf(conn, tf_name, interval_sql, minutes, start_date, end_date):
                 (array_agg(c ORDER BY ts DESC))[1] AS c,
                 SUM(v) AS v
             FROM candles
-            WHERE symbol = %s AND tf = '1m'
+            WHERE symbol = ANY(%s) AND tf = '1m'
               AND ts >= %s AND ts <= %s
-            GROUP BY bucket_ts
+            GROUP BY symbol, bucket_ts
             HAVING COUNT(*) >= 1
             ON CONFLICT (symbol, tf, ts) DO UPDATE SET
                 o = EXCLUDED.o,
@@ -64,7 +71,7 @@ def _aggregate_tf(conn, tf_name, interval_sql, minutes, start_date, end_date):
                 l = EXCLUDED.l,
                 c = EXCLUDED.c,
                 v = EXCLUDED.v;
-        """, (SYMBOL, tf_name, minutes, minutes, SYMBOL, start_date, end_date))
+        """, (tf_name, minutes, minutes, symbols, start_date, end_date))
 
         rows = cur.rowcount
         conn.commit()
@@ -72,12 +79,36 @@ def _aggregate_tf(conn, tf_name, interval_sql, minutes, start_date, end_date):
         return rows
 
 
+def _record_lag(conn, tf_name, symbols):
+    """Newest aggregated bar per symbol → pipeline_lag (stage aggregate_<tf>)."""
+    lag = LagTracker(f'aggregate_{tf_name}', flush_sec=0)
+    try:
+        with conn.cursor() as cur:
+            cur.execute("""
+                SELECT symbol, max(ts) FROM market_ohlcv
+                WHERE symbol = ANY(%s) AND tf = %s
+                GROUP BY symbol
+            """, (list(symbols), tf_name))
+            for sym, ts in cur.fetchall():
+                lag.observe(sym, ts)
+        conn.commit()
+    except Exception as e:
+        conn.rollback()
+        _log(f'lag query failed: {e}')
+        return
+    lag.maybe_flush(conn)
+    _log(f'{tf_name} lag: {lag.lags()}')
+
+
 def main():
     parser = argparse.ArgumentParser(description='Aggregate 1m candles to higher timeframes')
     parser.add_argument('--start', default='2023-11-01', help='Start date YYYY-MM-DD')
     parser.add_argument('--end', default=None, help='End date YYYY-MM-DD (default=now)')
     parser.add_argument('--tf', default=None, help='Specific timeframe (5m/15m/1h)')
+    parser.add_argument('--symbol', action='append', default=None,
+                        help='Symbol to aggregate (repeatable, default=all configured)')
     args = parser.parse_args()
+    symbols = args.symbol or SYMBOLS
 
     start_dt = datetime.strptime(args.start, '%Y-%m-%d').replace(tzinfo=timezone.utc)
     end_dt = (
@@ -90,11 +121,12 @@ def main():
 
     with conn.cursor() as cur:
         cur.execute("SET statement_timeout = '300000';")
+        ensure_pipeline_lag(cur)
     conn.commit()
 
     job_id = start_job(conn, JOB_NAME, metadata={
         'start': str(start_dt.date()), 'end': str(end_dt.date()),
-        'tf': args.tf or 'all',
+        'tf': args.tf or 'all', 'symbols': symbols,
     })
 
     total_rows = 0
@@ -113,8 +145,10 @@ def main():
                 finish_job(conn, job_id, status='PARTIAL', error='stopped_during_pause')
                 break
 
-            rows = _aggregate_tf(conn, tf_name, interval_sql, minutes, start_dt, end_dt)
+            rows = _aggregate_tf(conn, tf_name, interval_sql, minutes, start_dt, end_dt,
+                                 symbols)
             total_rows += rows
+            _record_lag(conn, tf_name, symbols)
 
             update_progress(conn, job_id, {'last_tf': tf_name}, inserted=rows)
 
@@ -1,13 +1,19 @@
 """
 autopilot_daemon.py — Autonomous trading daemon.
 
-20-second loop:
+20-second loop, woken early by db_notify.INDICATOR_UPDATE for SYMBOL:
   1. Check autopilot_config.enabled
   2. Risk checks (trade_switch, LIVE_TRADING, once_lock, daily limit, cooldown, position)
   3. Run direction_scorer.compute_scores()
   4. If confidence >= MIN_CONFIDENCE (35), create OPEN signal (v3: +cooldown+stage1)
   5. Log to trade_process_log (source='autopilot')
   6. Telegram notification
+
+Each cycle is traced by perf_trace: stage laps (risk_checks, compute_scores,
+v3_*, mtf_gate, guard_chain, enqueue, ...) with DB / API / Telegram counts,
+flushed to perf_span_stats once a minute (/debug perf). Entry guards read
+one guard_context prefetch per cycle and run as 'guard:<name>' spans with
+pass/block counts (/debug guards).
 """
 import os
 import sys
@@ -17,6 +23,8 @@ import traceback
 import urllib.parse
 import urllib.request
 sys.path.insert(0, '/root/trading-bot/app')
+import perf_trace
+import guard_context
 
 # ── Strategy v2 feature flag ──
 # 'off': use only old logic
@@ -29,6 +37,7 @@ LOG_PREFIX = '[autopilot]'
 SYMBOL = 'BTC/USDT:USDT'
 ALLOWED_SYMBOLS = frozenset({"BTC/USDT:USDT"})
 POLL_SEC = 20
+_TRACER = perf_trace.Tracer('autopilot')
 COOLDOWN_SEC = 30  # v2.1 중간 공격형
 MAX_DAILY_TRADES = 20
 MIN_CONFIDENCE = 25  # v3: conf>=25 진입 허용 (25-49: stage1 only, >=50: 기존 로직)
@@ -56,6 +65,24 @@ _last_signal_price = {}  # (symbol, side) -> last trigger price
 _v3_result = None  # last V3 cycle result (for signal metadata)
 _v3_features = None  # last V3 feature snapshot (reused within cycle)
 
+# ── Guard prefetch (guard_context), reset every _cycle ──
+_guard_ctx = None  # GuardContext | False (prefetch failed) | None (not loaded yet)
+_guard_log = None  # GuardLog: verdict + timing of each guard this cycle
+
+
+def _cycle_guard_ctx(cur):
+    """This cycle's GuardContext, loaded on first use.
+    FAIL-OPEN: None if the prefetch failed (guards fall back to their own queries)."""
+    global _guard_ctx
+    if _guard_ctx is None:
+        try:
+            with perf_trace.span('guard_prefetch'):
+                _guard_ctx = guard_context.load(cur, SYMBOL)
+        except Exception as e:
+            _log(f'guard prefetch error (FAIL-OPEN): {e}')
+            _guard_ctx = False
+    return _guard_ctx or None
+
 
 def _is_v3_enabled():
     """Check if Strategy V3 is enabled. FAIL-OPEN: returns False."""
@@ -66,9 +93,10 @@ def _is_v3_enabled():
         return False
 
 
-def _v3_check_sl_cooldown(cur, symbol, direction):
+def _v3_check_sl_cooldown(cur, symbol, direction, ctx=None):
     """V3 SL cooldown: 1 SL → 10min same-direction ban (complementary to existing 2-SL cooldown).
 
+    ctx: cycle GuardContext (no query); None → query execution_log.
     Returns (ok, reason).
     FAIL-OPEN: returns (True, '').
     """
@@ -85,6 +113,11 @@ def _v3_check_sl_cooldown(cur, symbol, direction):
                 remaining = int(cooldown_sec - elapsed)
                 return (False, f'V3 cooldown_after_stop: {direction} blocked for {remaining}s')
         # Also check DB for recent SL events (covers bot restarts)
+        if ctx is not None:
+            db_ok, remaining = guard_context.sl_cooldown_same_dir(ctx, direction, cooldown_sec)
+            if not db_ok:
+                return (False, f'V3 cooldown_after_stop(DB): {direction} blocked for {remaining}s')
+            return (True, '')
         cur.execute("""
             SELECT direction, extract(epoch from last_fill_at) as ts
             FROM execution_log
@@ -153,6 +186,34 @@ def _v3_check_signal_debounce(cur, symbol, v3_regime, direction, features):
         return (True, '')
 
 
+def _v3_record_signal_debounce(cur, symbol, v3_regime, direction, features):
+    """Record the V3 debounce key of an emitted signal.
+
+    Shared by _cycle and decision_replay.
+    FAIL-OPEN: logs and returns.
+    """
+    try:
+        from strategy.common.dedupe import record_signal, make_v3_signal_key
+        rp = features.get('range_position') if features else None
+        rc = v3_regime.get('regime_class', 'UNKNOWN')
+        if rc == 'BREAKOUT':
+            lb = 'BREAKOUT_UP' if direction == 'LONG' else 'BREAKOUT_DOWN'
+        elif rp is not None:
+            if rp <= 0.20:
+                lb = 'VAL'
+            elif rp >= 0.80:
+                lb = 'VAH'
+            elif 0.40 <= rp <= 0.60:
+                lb = 'POC'
+            else:
+                lb = 'MID'
+        else:
+            lb = 'MID'
+        record_signal(cur, make_v3_signal_key(symbol, rc, direction, lb))
+    except Exception as e:
+        _log(f'[V3] debounce record FAIL-OPEN: {e}')
+
+
 def _is_reentry_valid(symbol, side, current_price):
     """[0-3] Price reentry dedup: block re-entry if price is still near
     the last signal price (within 0.1%). Only allow if price moved
@@ -276,15 +337,18 @@ _last_suppress_reason = ''
 _last_suppress_ts = 0
 
 
-def _compute_signal_key(cur, symbol, direction, regime_ctx=None):
+def _compute_signal_key(cur, symbol, direction, regime_ctx=None, ctx=None):
     """Compute composite signal key for dedup: symbol:regime:side:zone_anchor:time_bucket_5m."""
     regime = regime_ctx.get('regime', 'UNKNOWN') if regime_ctx else 'UNKNOWN'
     # Determine zone anchor based on current price vs VA/BB levels
     zone_anchor = 'UNKNOWN'
     try:
-        cur.execute("SELECT mark_price FROM market_data_cache WHERE symbol = %s;", (symbol,))
-        row = cur.fetchone()
-        price = float(row[0]) if row and row[0] else 0
+        if ctx is not None:
+            price = ctx.mark_price or 0
+        else:
+            cur.execute("SELECT mark_price FROM market_data_cache WHERE symbol = %s;", (symbol,))
+            row = cur.fetchone()
+            price = float(row[0]) if row and row[0] else 0
         if price > 0 and regime_ctx:
             vah = regime_ctx.get('vah')
             val = regime_ctx.get('val')
@@ -325,14 +389,25 @@ def _record_signal_emission(cur, symbol, direction, regime_ctx=None):
         """, (composite_db_key,))
 
 
-def _is_in_repeat_cooldown(cur, symbol, direction, cooldown_sec=None, regime_ctx=None):
+def _is_in_repeat_cooldown(cur, symbol, direction, cooldown_sec=None, regime_ctx=None, ctx=None):
     """Check if same symbol+direction signal was emitted within cooldown window.
     Also checks composite signal_key for 5m bucket dedup.
+    ctx: cycle GuardContext (emission stamps prefetched); None → query alert_dedup_state.
     Returns (in_cooldown: bool, remaining_sec: int)."""
     if cooldown_sec is None:
         cooldown_sec = REPEAT_SIGNAL_COOLDOWN_SEC
     # 1. Legacy direction-based check (10min)
     key = f'autopilot:signal:{symbol}:{direction}'
+    if ctx is not None:
+        elapsed = guard_context.signal_age(ctx, key)
+        if elapsed is not None and elapsed < cooldown_sec:
+            return (True, cooldown_sec - elapsed)
+        if regime_ctx:
+            sig_key = _compute_signal_key(cur, symbol, direction, regime_ctx, ctx=ctx)
+            elapsed = guard_context.signal_age(ctx, f'autopilot:signal:{sig_key}')
+            if elapsed is not None and elapsed < 300:
+                return (True, 300 - elapsed)
+        return (False, 0)
     try:
         cur.execute("""
             SELECT EXTRACT(EPOCH FROM (now() - last_sent_ts))::int
@@ -365,9 +440,14 @@ def _is_in_repeat_cooldown(cur, symbol, direction, cooldown_sec=None, regime_ctx
     return (False, 0)
 
 
-def _check_stop_loss_cooldown(cur, symbol):
+def _check_stop_loss_cooldown(cur, symbol, ctx=None):
     """Check consecutive stop-loss events. If >= TRIGGER within window, block for PAUSE duration.
+    ctx: cycle GuardContext (no query); None → query execution_log.
     Returns (ok, reason, remaining_sec)."""
+    if ctx is not None:
+        return guard_context.stop_loss_cooldown(
+            ctx, STOP_LOSS_COOLDOWN_WINDOW_SEC, STOP_LOSS_COOLDOWN_TRIGGER,
+            STOP_LOSS_COOLDOWN_PAUSE_SEC)
     try:
         cur.execute("""
             SELECT last_fill_at FROM execution_log
@@ -397,11 +477,12 @@ def _check_stop_loss_cooldown(cur, symbol):
     return (True, '', 0)
 
 
-def _check_loss_streak_cooldown(cur):
+def _check_loss_streak_cooldown(cur, ctx=None):
     """Check if loss streak cooldown blocks new entry.
 
     ff_loss_streak_cooldown=OFF → always (True, '').
-    ON → check recent consecutive losses in execution_log.
+    ON → check recent consecutive losses in execution_log (or ctx, the
+    cycle GuardContext, without querying).
 
     Returns (ok: bool, reason: str).
     """
@@ -417,6 +498,8 @@ def _check_loss_streak_cooldown(cur):
         trigger = config_v3.get('loss_streak_trigger', 3)
         cooldown_sec = config_v3.get('loss_streak_cooldown_sec', 1200)
         window_hours = config_v3.get('loss_streak_window_hours', 3)
+        if ctx is not None:
+            return guard_context.loss_streak_cooldown(ctx, trigger, cooldown_sec, window_hours)
 
         # Query recent closed trades within the window, ordered by time desc
         cur.execute("""
@@ -468,11 +551,13 @@ def _check_loss_streak_cooldown(cur):
         return (True, '')
 
 
-def _get_current_loss_streak(cur):
+def _get_current_loss_streak(cur, ctx=None):
     """Return count of consecutive recent losses (0 if none)."""
     try:
         from strategy_v3 import config_v3
         window_hours = config_v3.get('loss_streak_window_hours', 3)
+        if ctx is not None:
+            return guard_context.loss_streak(ctx, window_hours)
         cur.execute("""
             SELECT realized_pnl FROM execution_log
             WHERE order_type IN ('CLOSE', 'FULL_CLOSE', 'REDUCE', 'REVERSE_CLOSE')
@@ -495,8 +580,9 @@ def _get_current_loss_streak(cur):
 _mode_cooloff_until = {}  # {'STATIC_RANGE': ts, ...}
 
 
-def _check_mode_cooloff(cur, regime_class):
+def _check_mode_cooloff(cur, regime_class, ctx=None):
     """Block regime_class if its recent win rate is too low.
+    ctx: cycle GuardContext (no query); None → query execution_log.
     Returns (ok: bool, reason: str).
     """
     try:
@@ -514,17 +600,20 @@ def _check_mode_cooloff(cur, regime_class):
         min_winrate = config_v3.get('mode_cooloff_min_winrate', 0.30)
         cooloff_hours = config_v3.get('mode_cooloff_hours', 4)
 
-        cur.execute("""
-            SELECT COUNT(*) as total,
-                   COUNT(*) FILTER (WHERE realized_pnl > 0) as wins
-            FROM execution_log
-            WHERE order_type IN ('CLOSE', 'FULL_CLOSE', 'REDUCE', 'REVERSE_CLOSE')
-              AND status = 'FILLED'
-              AND regime_tag = %s
-              AND ts > now() - interval '24 hours'
-        """, (regime_class,))
-        row = cur.fetchone()
-        total, wins = row[0] or 0, row[1] or 0
+        if ctx is not None:
+            total, wins = guard_context.regime_results(ctx, regime_class)
+        else:
+            cur.execute("""
+                SELECT COUNT(*) as total,
+                       COUNT(*) FILTER (WHERE realized_pnl > 0) as wins
+                FROM execution_log
+                WHERE order_type IN ('CLOSE', 'FULL_CLOSE', 'REDUCE', 'REVERSE_CLOSE')
+                  AND status = 'FILLED'
+                  AND regime_tag = %s
+                  AND ts > now() - interval '24 hours'
+            """, (regime_class,))
+            row = cur.fetchone()
+            total, wins = row[0] or 0, row[1] or 0
 
         if total >= min_trades and total > 0:
             wr = wins / total
@@ -539,8 +628,9 @@ def _check_mode_cooloff(cur, regime_class):
         return (True, '')
 
 
-def should_emit_signal(cur, symbol, direction, conf, regime_ctx=None):
+def should_emit_signal(cur, symbol, direction, conf, regime_ctx=None, ctx=None):
     """Central gate: decide if a new signal should be emitted.
+    ctx: cycle GuardContext passed through to the cooldown checks.
     Returns (ok, reason).
     """
     global _last_suppress_reason, _last_suppress_ts
@@ -554,7 +644,7 @@ def should_emit_signal(cur, symbol, direction, conf, regime_ctx=None):
         return (False, reason)
 
     # 2. Repeat signal cooldown (direction + composite key)
-    (in_cd, remaining) = _is_in_repeat_cooldown(cur, symbol, direction, regime_ctx=regime_ctx)
+    (in_cd, remaining) = _is_in_repeat_cooldown(cur, symbol, direction, regime_ctx=regime_ctx, ctx=ctx)
     if in_cd:
         reason = f'REPEAT_SIGNAL_SUPPRESSED: dir={direction} cooldown_remaining={remaining}sec'
         _last_suppress_reason = reason
@@ -562,21 +652,21 @@ def should_emit_signal(cur, symbol, direction, conf, regime_ctx=None):
         return (False, reason)
 
     # 3. Stop-loss cooldown
-    (sl_ok, sl_reason, sl_remaining) = _check_stop_loss_cooldown(cur, symbol)
+    (sl_ok, sl_reason, sl_remaining) = _check_stop_loss_cooldown(cur, symbol, ctx=ctx)
     if not sl_ok:
         _last_suppress_reason = sl_reason
         _last_suppress_ts = now_ts
         return (False, sl_reason)
 
     # 4. Loss streak cooldown (ff_loss_streak_cooldown)
-    (ls_ok, ls_reason) = _check_loss_streak_cooldown(cur)
+    (ls_ok, ls_reason) = _check_loss_streak_cooldown(cur, ctx=ctx)
     if not ls_ok:
         _last_suppress_reason = ls_reason
         _last_suppress_ts = now_ts
         return (False, ls_reason)
 
     # 5. Loss streak confidence escalation
-    streak_count = _get_current_loss_streak(cur)
+    streak_count = _get_current_loss_streak(cur, ctx=ctx)
     if streak_count >= 2:
         from strategy_v3 import config_v3
         escalation = config_v3.get('loss_streak_conf_escalation', 5)
@@ -691,6 +781,9 @@ def _get_exchange():
         'secret': os.getenv('BYBIT_SECRET'),
         'enableRateLimit': True,
         'options': {'defaultType': 'swap'}})
+    perf_trace.instrument_exchange(_exchange)
+    import exchange_state
+    exchange_state.track(_exchange)
     _exchange.load_markets()
     return _exchange
 
@@ -700,8 +793,8 @@ def _log(msg):
 
 
 def _db_conn():
-    from db_config import get_conn
-    return get_conn()
+    from db_config import get_pooled_conn
+    return get_pooled_conn('rw')
 
 
 def _load_tg_env():
@@ -728,6 +821,7 @@ def _notify_telegram(text=None):
     (token, chat_id) = _load_tg_env()
     if not token or not chat_id:
         return None
+    perf_trace.count('telegram')
     try:
         url = f'https://api.telegram.org/bot{token}/sendMessage'
         data = urllib.parse.urlencode({
@@ -839,9 +933,11 @@ def _get_recent_candles(cur, tf, count):
         return []
 
 
-def _check_consec_loss_cooldown(cur, direction, regime_params):
+def _check_consec_loss_cooldown(cur, direction, regime_params, ctx=None):
     """Block entry if 2+ consecutive same-direction losses in last 2 hours."""
     cooldown_min = regime_params.get('consec_loss_cooldown_min', 45) if regime_params else 45
+    if ctx is not None:
+        return guard_context.consec_loss_cooldown(ctx, direction, cooldown_min)
     try:
         cur.execute("""
             SELECT direction, realized_pnl, last_fill_at
@@ -949,10 +1045,11 @@ _anti_chase_ban_until = 0.0
 _anti_chase_ban_reason = ''
 
 
-def _check_anti_chase(cur, regime_ctx, dry_run=False):
+def _check_anti_chase(cur, regime_ctx, dry_run=False, ctx=None):
     """Anti-chase filter for RANGE mode.
     Blocks entry for 3min after sharp 1m/5m price moves.
     dry_run=True: read-only check (no global state mutation), used by /snapshot.
+    ctx: cycle GuardContext (1m closes prefetched); None → query candles.
     Returns (ok, reason)."""
     global _anti_chase_ban_until, _anti_chase_ban_reason
 
@@ -971,6 +1068,15 @@ def _check_anti_chase(cur, regime_ctx, dry_run=False):
     ret_5m_threshold = r_params.get('anti_chase_ret_5m', 0.60)
     ban_sec = r_params.get('anti_chase_ban_sec', 180)
 
+    if ctx is not None:
+        move = guard_context.chase_move(ctx, ret_1m_threshold, ret_5m_threshold)
+        if move:
+            if not dry_run:
+                _anti_chase_ban_until = now + ban_sec
+                _anti_chase_ban_reason = move
+            return (False, f'ANTI_CHASE: {move}')
+        return (True, '')
+
     try:
         cur.execute("""
             SELECT c FROM candles
@@ -1073,9 +1179,12 @@ def _check_reversal_confirmation(cur, direction):
     return (False, 'no reversal confirmation')
 
 
-def _check_post_close_cooldown(cur, symbol):
+def _check_post_close_cooldown(cur, symbol, ctx=None):
     """Post-position-close cooldown: TP→3min, SL→10min.
+    ctx: cycle GuardContext (no query); None → query execution_log.
     Returns (ok, reason, remaining_sec)."""
+    if ctx is not None:
+        return guard_context.post_close_cooldown(ctx)
     try:
         cur.execute("""
             SELECT order_type, realized_pnl, last_fill_at
@@ -1108,32 +1217,38 @@ def _check_post_close_cooldown(cur, symbol):
     return (True, '', 0)
 
 
-def _check_zone_reentry_ban(cur, symbol, direction, regime_ctx):
+def _check_zone_reentry_ban(cur, symbol, direction, regime_ctx, ctx=None):
     """After SL at a zone, ban re-entry in same direction until price moves past POC/BB_mid.
+    ctx: cycle GuardContext (last SL + mark price prefetched); None → query.
     Returns (ok, reason)."""
     if not regime_ctx or regime_ctx.get('regime') != 'RANGE':
         return (True, '')
     try:
         # Find most recent SL in last 30 minutes
-        cur.execute("""
-            SELECT direction, realized_pnl, last_fill_at
-            FROM execution_log
-            WHERE symbol = %s AND status = 'FILLED'
-              AND order_type IN ('CLOSE', 'FULL_CLOSE')
-              AND realized_pnl < 0
-              AND last_fill_at >= now() - interval '30 minutes'
-            ORDER BY last_fill_at DESC LIMIT 1;
-        """, (symbol,))
-        row = cur.fetchone()
-        if not row:
-            return (True, '')
-        sl_direction = row[0]
-        if sl_direction != direction:
+        if ctx is not None:
+            stop = guard_context.last_stop(ctx, 1800)
+            sl_direction = stop.direction if stop else None
+        else:
+            cur.execute("""
+                SELECT direction, realized_pnl, last_fill_at
+                FROM execution_log
+                WHERE symbol = %s AND status = 'FILLED'
+                  AND order_type IN ('CLOSE', 'FULL_CLOSE')
+                  AND realized_pnl < 0
+                  AND last_fill_at >= now() - interval '30 minutes'
+                ORDER BY last_fill_at DESC LIMIT 1;
+            """, (symbol,))
+            row = cur.fetchone()
+            sl_direction = row[0] if row else None
+        if sl_direction is None or sl_direction != direction:
             return (True, '')
         # Same direction SL occurred — check if price has moved past POC/BB_mid
-        cur.execute("SELECT mark_price FROM market_data_cache WHERE symbol = %s;", (symbol,))
-        price_row = cur.fetchone()
-        price = float(price_row[0]) if price_row and price_row[0] else 0
+        if ctx is not None:
+            price = ctx.mark_price or 0
+        else:
+            cur.execute("SELECT mark_price FROM market_data_cache WHERE symbol = %s;", (symbol,))
+            price_row = cur.fetchone()
+            price = float(price_row[0]) if price_row and price_row[0] else 0
         if not price:
             return (True, 'FAIL-OPEN: no price')
         poc = regime_ctx.get('poc')
@@ -1151,9 +1266,12 @@ def _check_zone_reentry_ban(cur, symbol, direction, regime_ctx):
     return (True, '')
 
 
-def _check_post_sl_opposite_ban(cur, symbol):
+def _check_post_sl_opposite_ban(cur, symbol, ctx=None):
     """After any SL, block ALL direction entries for 10 minutes.
+    ctx: cycle GuardContext (no query); None → query execution_log.
     Returns (ok, reason)."""
+    if ctx is not None:
+        return guard_context.post_sl_ban(ctx)
     try:
         cur.execute("""
             SELECT last_fill_at FROM execution_log
@@ -1272,10 +1390,12 @@ def _check_regime_entry_filter(cur, regime_ctx, scores, price=None):
     return (True, f'unknown filter: {entry_filter}')
 
 
-def _check_add_interval(cur, regime_params):
+def _check_add_interval(cur, regime_params, ctx=None):
     """v14: Check minimum interval between ADD attempts.
     Returns (ok, remaining_sec)."""
     min_interval = regime_params.get('add_min_interval_sec', 300)
+    if ctx is not None:
+        return guard_context.add_interval(ctx, min_interval)
     try:
         cur.execute("""
             SELECT EXTRACT(EPOCH FROM (now() - MAX(ts)))::int
@@ -1294,10 +1414,12 @@ def _check_add_interval(cur, regime_params):
     return (True, 0)
 
 
-def _check_adds_per_30m(cur, regime_params):
+def _check_adds_per_30m(cur, regime_params, ctx=None):
     """v14: Check max ADD count in last 30 minutes.
     Returns (ok, count, limit)."""
     max_adds = regime_params.get('max_adds_per_30m', 3)
+    if ctx is not None:
+        return guard_context.adds_per_30m(ctx, max_adds)
     try:
         cur.execute("""
             SELECT count(*) FROM execution_queue
@@ -1431,9 +1553,10 @@ def _record_signal_spam(symbol, direction):
 # B3: Post-impulse chasing ban
 _impulse_ban_until = 0
 
-def _check_impulse_ban(cur, direction):
+def _check_impulse_ban(cur, direction, ctx=None):
     """5min abs(change) >= 1.0% → 10~20min no-entry.
     Especially: price_drop >= 1.5% AND direction==SHORT → 20min block.
+    ctx: cycle GuardContext (1m closes prefetched); None → query candles.
     Returns (ok: bool, remaining: float)
     """
     global _impulse_ban_until
@@ -1441,6 +1564,13 @@ def _check_impulse_ban(cur, direction):
     if now < _impulse_ban_until:
         return (False, _impulse_ban_until - now)
 
+    if ctx is not None:
+        ban_sec = guard_context.impulse_ban_sec(ctx, direction)
+        if ban_sec:
+            _impulse_ban_until = now + ban_sec
+            return (False, ban_sec)
+        return (True, 0)
+
     try:
         cur.execute("""
             SELECT c FROM candles WHERE symbol=%s AND tf='1m'
@@ -1465,11 +1595,13 @@ def _check_impulse_ban(cur, direction):
     return (True, 0)
 
 
-def _check_same_dir_reentry_cooldown(cur, direction, regime_params):
+def _check_same_dir_reentry_cooldown(cur, direction, regime_params, ctx=None):
     """v14.1: Check same-direction re-entry cooldown.
     After a position is closed, block same-direction re-entry for N seconds.
     Returns (ok, remaining_sec)."""
     cooldown_sec = regime_params.get('same_dir_reentry_cooldown_sec', 600)
+    if ctx is not None:
+        return guard_context.same_dir_reentry(ctx, direction, cooldown_sec)
     try:
         cur.execute("""
             SELECT EXTRACT(EPOCH FROM (now() - MAX(ts)))::int
@@ -1512,8 +1644,10 @@ def _check_breakout_structure_intact(cur, pos_side, regime_ctx):
     return (True, 'structure intact')
 
 
-def _check_position_for_add(cur=None, pos_side=None, pos_qty=None, scores=None, regime_ctx=None):
+def _check_position_for_add(cur=None, pos_side=None, pos_qty=None, scores=None, regime_ctx=None,
+                            ctx=None, glog=None):
     """Evaluate whether ADD is allowed for an existing position.
+    ctx / glog: cycle GuardContext and GuardLog (verdicts + timings).
     Returns (decision, reason) -- 'ADD', 'HOLD', 'BLOCKED'."""
     # D0-1: 전역 ADD 차단 (ff_global_add_block)
     import feature_flags as _ff_add
@@ -1530,30 +1664,34 @@ def _check_position_for_add(cur=None, pos_side=None, pos_qty=None, scores=None,
     # ── Regime params ──
     regime = regime_ctx.get('regime', 'UNKNOWN') if regime_ctx else 'UNKNOWN'
     r_params = regime_reader.get_regime_params(regime, regime_ctx.get('shock_type') if regime_ctx else None)
+    glog = glog or guard_context.GuardLog()
 
     # ── v14: ADD interval check ──
-    (interval_ok, remaining) = _check_add_interval(cur, r_params)
+    (interval_ok, remaining) = glog.check('add_interval', _check_add_interval, cur, r_params, ctx=ctx)
     if not interval_ok:
         return ('HOLD', f'ADD_COOLDOWN: {remaining}s remaining (min={r_params.get("add_min_interval_sec")}s)')
 
     # ── v14: ADD count per 30m ──
-    (count_ok, add_count, add_limit) = _check_adds_per_30m(cur, r_params)
+    (count_ok, add_count, add_limit) = glog.check('adds_per_30m', _check_adds_per_30m,
+                                                   cur, r_params, ctx=ctx)
     if not count_ok:
         return ('HOLD', f'ADD_MAX_30M: {add_count}/{add_limit} reached')
 
     # ── v14: ADD retest/pullback condition ──
-    (retest_ok, retest_reason) = _check_add_retest(cur, pos_side, r_params)
+    (retest_ok, retest_reason) = glog.check('add_retest', _check_add_retest, cur, pos_side, r_params)
     if not retest_ok:
         return ('HOLD', retest_reason)
 
     # ── BREAKOUT structure intact check ──
     if regime == 'BREAKOUT' and r_params.get('add_structure_intact_required'):
-        (struct_ok, struct_reason) = _check_breakout_structure_intact(cur, pos_side, regime_ctx)
+        (struct_ok, struct_reason) = glog.check('breakout_structure', _check_breakout_structure_intact,
+                                                cur, pos_side, regime_ctx)
         if not struct_ok:
             return ('HOLD', struct_reason)
 
     # ── v14.1: same-direction re-entry cooldown ──
-    (reentry_ok, reentry_remaining) = _check_same_dir_reentry_cooldown(cur, direction, r_params)
+    (reentry_ok, reentry_remaining) = glog.check('same_dir_reentry', _check_same_dir_reentry_cooldown,
+                                                 cur, direction, r_params, ctx=ctx)
     if not reentry_ok:
         return ('HOLD', f'SAME_DIR_COOLDOWN: {reentry_remaining}s remaining')
 
@@ -1733,9 +1871,11 @@ def _ensure_v2_migrations(cur):
         _v2_migrations_done = True  # don't retry every cycle
 
 
-def _run_strategy_v2(cur, scores, regime_ctx):
+def _run_strategy_v2(cur, scores, regime_ctx, state=None):
     """Run strategy v2 routing and decision logic.
 
+    state: the cycle's market_state.MarketState (features are not re-read).
+
     In 'shadow' mode: log decision but don't execute.
     In 'on' mode: decision will be used by caller (future integration).
     """
@@ -1755,7 +1895,7 @@ def _run_strategy_v2(cur, scores, regime_ctx):
     }
 
     # 1. Build feature snapshot
-    features = build_feature_snapshot(cur, SYMBOL)
+    features = build_feature_snapshot(cur, SYMBOL, state=state)
 
     # 2. Get gate/throttle status
     import order_throttle
@@ -2084,12 +2224,218 @@ def _run_strategy_v2(cur, scores, regime_ctx):
     return None
 
 
+def _run_v3(cur, scores, regime_ctx, mstate, glog):
+    """Strategy V3 layer of one cycle: regime switching + chase suppression.
+
+    Classifies the V3 regime from the cycle's MarketState and applies the
+    score modifier, MTF gate, mode cooloff, risk overrides and adaptive
+    layers (L1/L4/L5) to `scores`. Shared by _cycle and decision_replay.
+
+    Returns (scores, v3_result, v3_features, mtf_data, blocked): scores is a
+    new dict once V3 rescored it; blocked names the gate that ends the cycle
+    (None → continue). FAIL-OPEN: on error the scores so far are returned
+    with v3_result=None.
+    """
+    v3_features = None
+    mtf_data = None  # [1-5] MTF data placeholder
+    dominant = scores.get('dominant_side', 'LONG')
+    try:
+        from strategy.common.features import build_feature_snapshot
+        from strategy_v3.regime_v3 import classify as v3_classify
+        from strategy_v3.score_v3 import compute_modifier as v3_score_mod
+        from strategy_v3.risk_v3 import compute_risk as v3_risk
+
+        perf_trace.lap('v3_features')
+        v3_features = build_feature_snapshot(cur, SYMBOL, state=mstate)
+        perf_trace.lap('v3_classify')
+        v3_regime = v3_classify(v3_features, regime_ctx)
+
+        perf_trace.lap('v3_modify')
+        v3_price = v3_features.get('price', 0) if v3_features else 0
+        total_score = scores.get('unified', {}).get('total_score', 0) if scores.get('unified') else 0
+        # Fallback: derive total_score from long_score
+        if total_score == 0:
+            ls = scores.get('long_score', 50)
+            total_score = (ls - 50) * 2
+
+        # ── V3 comparison snapshot (pre-modification) ──
+        pre_v3_total_score = total_score
+        pre_v3_dominant = dominant
+
+        v3_mod = v3_score_mod(total_score, v3_features, v3_regime, v3_price,
+                              regime_ctx=regime_ctx)
+
+        if v3_mod.get('entry_blocked'):
+            _log(f'[V3] BLOCKED: {v3_mod.get("block_reason", "")} '
+                 f'(regime={v3_regime.get("regime_class", "?")} mode={v3_regime.get("entry_mode", "?")})')
+            return scores, None, v3_features, mtf_data, 'v3_entry_blocked'
+
+        perf_trace.lap('mtf_gate')
+        # [1-5] MTF Direction Gate (ff_unified_engine_v11 + ff_mtf_direction_gate)
+        try:
+            import feature_flags as _ff_mtf
+            if _ff_mtf.is_enabled('ff_unified_engine_v11'):
+                from mtf_direction import compute_mtf_direction, NO_TRADE, LONG_ONLY, SHORT_ONLY
+                mtf_data = compute_mtf_direction(cur, SYMBOL, state=mstate)
+
+                # TOP-LEVEL GATE (gated by ff_mtf_direction_gate)
+                _mtf_gate_on = _ff_mtf.is_enabled('ff_mtf_direction_gate')
+                if _mtf_gate_on:
+                    if mtf_data['direction'] == NO_TRADE:
+                        _log(f'[MTF] NO_TRADE: {mtf_data["reasons"]}')
+                        return scores, None, v3_features, mtf_data, 'mtf_no_trade'
+
+                    # Direction filter
+                    if mtf_data['direction'] == LONG_ONLY and dominant == 'SHORT':
+                        _log('[MTF] LONG_ONLY but signal SHORT — blocked')
+                        return scores, None, v3_features, mtf_data, 'mtf_long_only'
+                    if mtf_data['direction'] == SHORT_ONLY and dominant == 'LONG':
+                        _log('[MTF] SHORT_ONLY but signal LONG — blocked')
+                        return scores, None, v3_features, mtf_data, 'mtf_short_only'
+                else:
+                    _log(f'[MTF] gate OFF (ff_mtf_direction_gate=false) dir={mtf_data["direction"]}')
+
+                # Inject MTF direction into regime result
+                if v3_regime:
+                    v3_regime['mtf_direction'] = mtf_data['direction']
+        except Exception as e:
+            _log(f'[MTF] error (FAIL-OPEN): {e}')
+
+        perf_trace.lap('v3_risk')
+        # Mode cooloff check
+        cooloff_ok, cooloff_reason = glog.check(
+            'mode_cooloff', _check_mode_cooloff, cur, v3_regime.get('regime_class'),
+            ctx=_cycle_guard_ctx(cur))
+        if not cooloff_ok:
+            _log(f'[V3] {cooloff_reason}')
+            return scores, None, v3_features, mtf_data, 'mode_cooloff'
+
+        # Apply score modification
+        total_score = max(-100, min(100, total_score + v3_mod['modifier']))
+        new_long_score = int(max(0, min(100, 50 + total_score / 2)))
+        new_short_score = 100 - new_long_score
+        new_confidence = abs(new_long_score - new_short_score)
+        new_dominant = 'LONG' if new_long_score >= new_short_score else 'SHORT'
+
+        # Override scores
+        scores = dict(scores)
+        scores['long_score'] = new_long_score
+        scores['short_score'] = new_short_score
+        scores['confidence'] = new_confidence
+        scores['dominant_side'] = new_dominant
+
+        # Compute risk overrides
+        streak = _get_current_loss_streak(cur)
+        v3_risk_params = v3_risk(v3_features, v3_regime, loss_streak=streak)
+
+        # ── ADAPTIVE LAYERS: L1/L4/L5 (entry gate + penalty) ──
+        _adaptive_result = None
+        try:
+            import feature_flags
+            if feature_flags.is_enabled('ff_adaptive_layers'):
+                from strategy_v3.adaptive_v3 import apply_adaptive_layers
+                from strategy_v3 import compute_market_health
+                _health = compute_market_health(v3_features or {})
+                _entry_mode = v3_regime.get('entry_mode', 'MeanRev')
+                _adaptive_result = apply_adaptive_layers(
+                    cur, _entry_mode, new_dominant,
+                    v3_regime.get('regime_class', 'STATIC_RANGE'),
+                    v3_features, regime_ctx, _health)
+
+                _is_dryrun = _adaptive_result.get('dryrun', True)
+
+                if not _is_dryrun:
+                    # L4: WARN entry block
+                    if _adaptive_result.get('l4_entry_blocked'):
+                        _log('[L4] health=WARN entry blocked')
+                        return scores, None, v3_features, mtf_data, 'l4_entry_blocked'
+
+                    # L1: mode cooldown block
+                    if _adaptive_result.get('l1_cooldown_active'):
+                        _log(f'[L1] {_entry_mode} cooldown '
+                             f'{_adaptive_result.get("l1_cooldown_remaining", 0)}s')
+                        return scores, None, v3_features, mtf_data, 'l1_cooldown'
+
+                    # L1: global WR block
+                    if _adaptive_result.get('l1_global_wr_block'):
+                        effective_min = MIN_CONFIDENCE + _adaptive_result.get('l1_effective_threshold_add', 0)
+                        if new_confidence < effective_min:
+                            _log(f'[L1] global WR block: conf={new_confidence} < {effective_min}')
+                            return scores, None, v3_features, mtf_data, 'l1_global_wr'
+
+                    # Apply combined penalty to total_score
+                    penalty = _adaptive_result.get('combined_penalty', 1.0)
+                    if penalty < 1.0:
+                        total_score = total_score * penalty
+                        total_score = max(-100, min(100, total_score))
+                        new_long_score = int(max(0, min(100, 50 + total_score / 2)))
+                        new_short_score = 100 - new_long_score
+                        new_confidence = abs(new_long_score - new_short_score)
+                        new_dominant = 'LONG' if new_long_score >= new_short_score else 'SHORT'
+                        scores = dict(scores)
+                        scores['long_score'] = new_long_score
+                        scores['short_score'] = new_short_score
+                        scores['confidence'] = new_confidence
+                        scores['dominant_side'] = new_dominant
+                        _log(f'[ADAPTIVE] penalty={penalty:.2f} → score={total_score:+.0f} '
+                             f'conf={new_confidence}')
+
+                    # Propagate L4 time_stop/trailing to v3_result
+                    if _adaptive_result.get('l4_time_stop_mult', 1.0) < 1.0:
+                        v3_risk_params['l4_time_stop_mult'] = _adaptive_result['l4_time_stop_mult']
+                    if _adaptive_result.get('l4_trailing_sensitive'):
+                        v3_risk_params['l4_trailing_sensitive'] = True
+        except Exception as e:
+            _log(f'[ADAPTIVE] error (FAIL-OPEN): {e}')
+
+        # Store V3 result for signal metadata (including comparison fields)
+        v3_result = {
+            'regime_class': v3_regime.get('regime_class', 'STATIC_RANGE'),
+            'entry_mode': v3_regime.get('entry_mode', 'MeanRev'),
+            'raw_class': v3_regime.get('raw_class'),
+            'v3_confidence': v3_regime.get('confidence', 0),
+            'score_modifier': v3_mod.get('modifier', 0),
+            'reasoning': v3_mod.get('reasoning', [])[:5],
+            'sl_pct': v3_risk_params.get('sl_pct', 0.006),
+            'tp_pct': v3_risk_params.get('tp_pct', 0.0072),
+            'stage_slice_mult': v3_risk_params.get('stage_slice_mult', 1.0),
+            'pre_v3_total_score': pre_v3_total_score,
+            'post_v3_total_score': total_score,
+            'pre_v3_dominant': pre_v3_dominant,
+        }
+        # Propagate max_stage from regime risk v3
+        if 'max_stage' in v3_risk_params:
+            v3_result['max_stage'] = v3_risk_params['max_stage']
+        # Propagate L4 params
+        if 'l4_time_stop_mult' in v3_risk_params:
+            v3_result['l4_time_stop_mult'] = v3_risk_params['l4_time_stop_mult']
+        if v3_risk_params.get('l4_trailing_sensitive'):
+            v3_result['l4_trailing_sensitive'] = True
+        # Propagate adaptive debug
+        if _adaptive_result:
+            v3_result['adaptive'] = _adaptive_result.get('debug', {})
+            v3_result['adaptive_penalty'] = _adaptive_result.get('combined_penalty', 1.0)
+
+        _log(f'[V3] regime={v3_regime.get("regime_class", "?")} '
+             f'pre={pre_v3_total_score:+.0f} mod={v3_mod.get("modifier", 0):+.0f} '
+             f'post={total_score:+.0f} side={new_dominant}')
+        return scores, v3_result, v3_features, mtf_data, None
+    except Exception as e:
+        _log(f'[V3] error (FAIL-OPEN, using original scores): {e}')
+        return scores, None, v3_features, mtf_data, None
+
+
 def _cycle():
+    global _guard_ctx, _guard_log
+    _guard_ctx = None
+    _guard_log = guard_context.GuardLog()
+    glog = _guard_log
     conn = None
     try:
         conn = _db_conn()
         conn.autocommit = True
         with conn.cursor() as cur:
+            perf_trace.lap('risk_checks')
             if not _check_autopilot_enabled(cur):
                 return
 
@@ -2121,6 +2467,7 @@ def _cycle():
             # Risk checks passed → trade_switch is ON: reset transition state
             _db_reset_trade_switch(cur)
 
+            perf_trace.lap('wait_order_fill')
             # WAIT_ORDER_FILL: block signal creation while pending orders exist
             try:
                 import exchange_reader
@@ -2131,17 +2478,24 @@ def _cycle():
             except Exception as e:
                 _log(f'WAIT_ORDER_FILL check failed (FAIL-OPEN): {e}')
 
+            perf_trace.lap('market_state')
+            # One market snapshot per cycle, shared by every scorer below
+            from market_state import load_market_state
+            mstate = load_market_state(cur, SYMBOL)
+
+            perf_trace.lap('compute_scores')
             import direction_scorer
-            scores = direction_scorer.compute_scores()
+            scores = direction_scorer.compute_scores(state=mstate, max_age_sec=POLL_SEC)
             confidence = scores.get('confidence', 0)
             dominant = scores.get('dominant_side', 'LONG')
 
             _log(f'scores: L={scores.get("long_score")} S={scores.get("short_score")} '
                  f'conf={confidence} side={dominant}')
 
+            perf_trace.lap('regime')
             # Regime check: SHOCK/VETO blocks new entries
             import regime_reader
-            regime_ctx = regime_reader.get_current_regime(cur)
+            regime_ctx = regime_reader.get_current_regime(cur, state=mstate)
             if regime_ctx['available'] and regime_ctx['regime'] == 'SHOCK' and regime_ctx.get('shock_type') == 'VETO':
                 _log(f'REGIME VETO: 진입 차단 (flow_bias={regime_ctx.get("flow_bias")})')
                 return
@@ -2150,195 +2504,21 @@ def _cycle():
             global _v3_result, _v3_features
             _v3_result = None
             _v3_features = None
-            _mtf_data = None  # [1-5] MTF data placeholder
+            _mtf_data = None
             if _is_v3_enabled():
-                try:
-                    from strategy.common.features import build_feature_snapshot
-                    from strategy_v3.regime_v3 import classify as v3_classify
-                    from strategy_v3.score_v3 import compute_modifier as v3_score_mod
-                    from strategy_v3.risk_v3 import compute_risk as v3_risk
-
-                    v3_features = build_feature_snapshot(cur)
-                    _v3_features = v3_features  # cache for reuse in debounce
-                    v3_regime = v3_classify(v3_features, regime_ctx)
-
-                    v3_price = v3_features.get('price', 0) if v3_features else 0
-                    total_score = scores.get('unified', {}).get('total_score', 0) if scores.get('unified') else 0
-                    # Fallback: derive total_score from long_score
-                    if total_score == 0:
-                        ls = scores.get('long_score', 50)
-                        total_score = (ls - 50) * 2
-
-                    # ── V3 comparison snapshot (pre-modification) ──
-                    pre_v3_total_score = total_score
-                    pre_v3_dominant = dominant
-
-                    v3_mod = v3_score_mod(total_score, v3_features, v3_regime, v3_price,
-                                          regime_ctx=regime_ctx)
-
-                    if v3_mod.get('entry_blocked'):
-                        _log(f'[V3] BLOCKED: {v3_mod.get("block_reason", "")} '
-                             f'(regime={v3_regime.get("regime_class", "?")} mode={v3_regime.get("entry_mode", "?")})')
-                        return
-
-                    # [1-5] MTF Direction Gate (ff_unified_engine_v11 + ff_mtf_direction_gate)
-                    try:
-                        import feature_flags as _ff_mtf
-                        if _ff_mtf.is_enabled('ff_unified_engine_v11'):
-                            from mtf_direction import compute_mtf_direction, NO_TRADE, LONG_ONLY, SHORT_ONLY
-                            _mtf_data = compute_mtf_direction(cur)
-
-                            # TOP-LEVEL GATE (gated by ff_mtf_direction_gate)
-                            _mtf_gate_on = _ff_mtf.is_enabled('ff_mtf_direction_gate')
-                            if _mtf_gate_on:
-                                if _mtf_data['direction'] == NO_TRADE:
-                                    _log(f'[MTF] NO_TRADE: {_mtf_data["reasons"]}')
-                                    return
-
-                                # Direction filter
-                                if _mtf_data['direction'] == LONG_ONLY and dominant == 'SHORT':
-                                    _log('[MTF] LONG_ONLY but signal SHORT — blocked')
-                                    return
-                                if _mtf_data['direction'] == SHORT_ONLY and dominant == 'LONG':
-                                    _log('[MTF] SHORT_ONLY but signal LONG — blocked')
-                                    return
-                            else:
-                                _log(f'[MTF] gate OFF (ff_mtf_direction_gate=false) dir={_mtf_data["direction"]}')
-
-                            # Inject MTF direction into regime result
-                            if v3_regime:
-                                v3_regime['mtf_direction'] = _mtf_data['direction']
-                    except Exception as e:
-                        _log(f'[MTF] error (FAIL-OPEN): {e}')
-
-                    # Mode cooloff check
-                    cooloff_ok, cooloff_reason = _check_mode_cooloff(cur, v3_regime.get('regime_class'))
-                    if not cooloff_ok:
-                        _log(f'[V3] {cooloff_reason}')
-                        return
-
-                    # Apply score modification
-                    total_score = max(-100, min(100, total_score + v3_mod['modifier']))
-                    new_long_score = int(max(0, min(100, 50 + total_score / 2)))
-                    new_short_score = 100 - new_long_score
-                    new_confidence = abs(new_long_score - new_short_score)
-                    new_dominant = 'LONG' if new_long_score >= new_short_score else 'SHORT'
-
-                    # Override scores
-                    scores = dict(scores)
-                    scores['long_score'] = new_long_score
-                    scores['short_score'] = new_short_score
-                    scores['confidence'] = new_confidence
-                    scores['dominant_side'] = new_dominant
-                    confidence = new_confidence
-                    dominant = new_dominant
-
-                    # Compute risk overrides
-                    streak = _get_current_loss_streak(cur)
-                    v3_risk_params = v3_risk(v3_features, v3_regime, loss_streak=streak)
-
-                    # ── ADAPTIVE LAYERS: L1/L4/L5 (entry gate + penalty) ──
-                    _adaptive_result = None
-                    try:
-                        import feature_flags
-                        if feature_flags.is_enabled('ff_adaptive_layers'):
-                            from strategy_v3.adaptive_v3 import apply_adaptive_layers
-                            from strategy_v3 import compute_market_health
-                            _health = compute_market_health(v3_features or {})
-                            _entry_mode = v3_regime.get('entry_mode', 'MeanRev')
-                            _adaptive_result = apply_adaptive_layers(
-                                cur, _entry_mode, new_dominant,
-                                v3_regime.get('regime_class', 'STATIC_RANGE'),
-                                v3_features, regime_ctx, _health)
-
-                            _is_dryrun = _adaptive_result.get('dryrun', True)
-
-                            if not _is_dryrun:
-                                # L4: WARN entry block
-                                if _adaptive_result.get('l4_entry_blocked'):
-                                    _log('[L4] health=WARN entry blocked')
-                                    return
-
-                                # L1: mode cooldown block
-                                if _adaptive_result.get('l1_cooldown_active'):
-                                    _log(f'[L1] {_entry_mode} cooldown '
-                                         f'{_adaptive_result.get("l1_cooldown_remaining", 0)}s')
-                                    return
-
-                                # L1: global WR block
-                                if _adaptive_result.get('l1_global_wr_block'):
-                                    effective_min = MIN_CONFIDENCE + _adaptive_result.get('l1_effective_threshold_add', 0)
-                                    if new_confidence < effective_min:
-                                        _log(f'[L1] global WR block: conf={new_confidence} < {effective_min}')
-                                        return
-
-                                # Apply combined penalty to total_score
-                                penalty = _adaptive_result.get('combined_penalty', 1.0)
-                                if penalty < 1.0:
-                                    total_score = total_score * penalty
-                                    total_score = max(-100, min(100, total_score))
-                                    new_long_score = int(max(0, min(100, 50 + total_score / 2)))
-                                    new_short_score = 100 - new_long_score
-                                    new_confidence = abs(new_long_score - new_short_score)
-                                    new_dominant = 'LONG' if new_long_score >= new_short_score else 'SHORT'
-                                    scores = dict(scores)
-                                    scores['long_score'] = new_long_score
-                                    scores['short_score'] = new_short_score
-                                    scores['confidence'] = new_confidence
-                                    scores['dominant_side'] = new_dominant
-                                    confidence = new_confidence
-                                    dominant = new_dominant
-                                    _log(f'[ADAPTIVE] penalty={penalty:.2f} → score={total_score:+.0f} '
-                                         f'conf={new_confidence}')
-
-                                # Propagate L4 time_stop/trailing to _v3_result
-                                if _adaptive_result.get('l4_time_stop_mult', 1.0) < 1.0:
-                                    v3_risk_params['l4_time_stop_mult'] = _adaptive_result['l4_time_stop_mult']
-                                if _adaptive_result.get('l4_trailing_sensitive'):
-                                    v3_risk_params['l4_trailing_sensitive'] = True
-                    except Exception as e:
-                        _log(f'[ADAPTIVE] error (FAIL-OPEN): {e}')
-
-                    # Store V3 result for signal metadata (including comparison fields)
-                    _v3_result = {
-                        'regime_class': v3_regime.get('regime_class', 'STATIC_RANGE'),
-                        'entry_mode': v3_regime.get('entry_mode', 'MeanRev'),
-                        'raw_class': v3_regime.get('raw_class'),
-                        'v3_confidence': v3_regime.get('confidence', 0),
-                        'score_modifier': v3_mod.get('modifier', 0),
-                        'reasoning': v3_mod.get('reasoning', [])[:5],
-                        'sl_pct': v3_risk_params.get('sl_pct', 0.006),
-                        'tp_pct': v3_risk_params.get('tp_pct', 0.0072),
-                        'stage_slice_mult': v3_risk_params.get('stage_slice_mult', 1.0),
-                        'pre_v3_total_score': pre_v3_total_score,
-                        'post_v3_total_score': total_score,
-                        'pre_v3_dominant': pre_v3_dominant,
-                    }
-                    # Propagate max_stage from regime risk v3
-                    if 'max_stage' in v3_risk_params:
-                        _v3_result['max_stage'] = v3_risk_params['max_stage']
-                    # Propagate L4 params
-                    if 'l4_time_stop_mult' in v3_risk_params:
-                        _v3_result['l4_time_stop_mult'] = v3_risk_params['l4_time_stop_mult']
-                    if v3_risk_params.get('l4_trailing_sensitive'):
-                        _v3_result['l4_trailing_sensitive'] = True
-                    # Propagate adaptive debug
-                    if _adaptive_result:
-                        _v3_result['adaptive'] = _adaptive_result.get('debug', {})
-                        _v3_result['adaptive_penalty'] = _adaptive_result.get('combined_penalty', 1.0)
-
-                    _log(f'[V3] regime={v3_regime.get("regime_class", "?")} '
-                         f'pre={pre_v3_total_score:+.0f} mod={v3_mod.get("modifier", 0):+.0f} '
-                         f'post={total_score:+.0f} side={new_dominant}')
-                except Exception as e:
-                    _log(f'[V3] error (FAIL-OPEN, using original scores): {e}')
-                    _v3_result = None
+                scores, _v3_result, _v3_features, _mtf_data, v3_blocked = _run_v3(
+                    cur, scores, regime_ctx, mstate, glog)
+                if v3_blocked:
+                    return
+                confidence = scores.get('confidence', 0)
+                dominant = scores.get('dominant_side', 'LONG')
 
+            perf_trace.lap('strategy_v2')
             # ── STRATEGY V2: early gate check + 3-mode routing ──
             if STRATEGY_V2_ENABLED != 'off':
                 v2_result = None
                 try:
-                    v2_result = _run_strategy_v2(cur, scores, regime_ctx)
+                    v2_result = _run_strategy_v2(cur, scores, regime_ctx, state=mstate)
                 except Exception as e:
                     _log(f'strategy_v2 error (non-fatal): {e}')
 
@@ -2365,6 +2545,8 @@ def _cycle():
                 except Exception as e:
                     _log(f'early gate check FAIL-OPEN: {e}')
 
+            perf_trace.lap('guard_chain')
+            gctx = _cycle_guard_ctx(cur)
             # RECONCILE MISMATCH: block new entries when exchange/strategy disagree
             try:
                 import exchange_reader
@@ -2390,32 +2572,38 @@ def _cycle():
                 if _v3_is_drift:
                     _log(f'[V3] V1 RANGE filters skipped: regime={_v3_result["regime_class"]}')
                 else:
-                    entry_ok, entry_reason = _check_regime_entry_filter(cur, regime_ctx, scores)
+                    entry_ok, entry_reason = glog.check(
+                        'regime_entry_filter', _check_regime_entry_filter, cur, regime_ctx, scores)
                     if not entry_ok:
                         _log(f'REGIME_FILTER: {entry_reason}')
                         return
 
                     # RANGE anti-chase filter
                     if regime_ctx.get('regime') == 'RANGE':
-                        chase_ok, chase_reason = _check_anti_chase(cur, regime_ctx)
+                        chase_ok, chase_reason = glog.check(
+                            'anti_chase', _check_anti_chase, cur, regime_ctx, ctx=gctx)
                         if not chase_ok:
                             _log(f'ANTI_CHASE: {chase_reason}')
                             return
 
                 # Post-close cooldowns (TP→3min, SL→10min)
-                pc_ok, pc_reason, _ = _check_post_close_cooldown(cur, SYMBOL)
+                pc_ok, pc_reason, _ = glog.check(
+                    'post_close_cooldown', _check_post_close_cooldown, cur, SYMBOL, ctx=gctx)
                 if not pc_ok:
                     _log(f'POST_CLOSE_COOLDOWN: {pc_reason}')
                     return
 
                 # Zone re-entry ban (SL same zone)
-                zr_ok, zr_reason = _check_zone_reentry_ban(cur, SYMBOL, dominant, regime_ctx)
+                zr_ok, zr_reason = glog.check(
+                    'zone_reentry_ban', _check_zone_reentry_ban, cur, SYMBOL, dominant, regime_ctx,
+                    ctx=gctx)
                 if not zr_ok:
                     _log(f'ZONE_REENTRY: {zr_reason}')
                     return
 
                 # Post-SL opposite direction ban
-                opp_ok, opp_reason = _check_post_sl_opposite_ban(cur, SYMBOL)
+                opp_ok, opp_reason = glog.check(
+                    'post_sl_ban', _check_post_sl_opposite_ban, cur, SYMBOL, ctx=gctx)
                 if not opp_ok:
                     _log(f'POST_SL_BAN: {opp_reason}')
                     return
@@ -2425,22 +2613,28 @@ def _cycle():
                     regime_ctx.get('regime', 'UNKNOWN'), regime_ctx.get('shock_type'))
                 if regime_ctx.get('regime') == 'RANGE':
                     max_per_hour = r_params.get('max_entries_per_hour', 3)
-                    cur.execute("""
-                        SELECT count(*) FROM execution_log
-                        WHERE symbol = %s AND order_type = 'OPEN' AND status = 'FILLED'
-                          AND last_fill_at >= now() - interval '1 hour';
-                    """, (SYMBOL,))
-                    hourly_count = cur.fetchone()[0] or 0
+                    if gctx is not None:
+                        hourly_count = guard_context.entries_last_hour(gctx)
+                    else:
+                        cur.execute("""
+                            SELECT count(*) FROM execution_log
+                            WHERE symbol = %s AND order_type = 'OPEN' AND status = 'FILLED'
+                              AND last_fill_at >= now() - interval '1 hour';
+                        """, (SYMBOL,))
+                        hourly_count = cur.fetchone()[0] or 0
                     if hourly_count >= max_per_hour:
                         _log(f'RANGE 시간당 진입 제한 ({hourly_count}/{max_per_hour})')
                         return
 
                 # Consecutive same-direction loss cooldown
-                (cc_ok, cc_reason) = _check_consec_loss_cooldown(cur, dominant, r_params)
+                (cc_ok, cc_reason) = glog.check(
+                    'consec_loss_cooldown', _check_consec_loss_cooldown, cur, dominant, r_params,
+                    ctx=gctx)
                 if not cc_ok:
                     _log(f'CONSEC_LOSS: {cc_reason}')
                     return
 
+            perf_trace.lap('add_path')
             if has_position:
                 # v3: conf < CONF_ADD_THRESHOLD → ADD 금지
                 if confidence < CONF_ADD_THRESHOLD:
@@ -2487,7 +2681,8 @@ def _cycle():
                 # Evaluate ADD
                 pos_side = ps_row[0]
                 pos_qty = float(ps_row[1])
-                (decision, add_reason) = _check_position_for_add(cur, pos_side, pos_qty, scores, regime_ctx=regime_ctx)
+                (decision, add_reason) = _check_position_for_add(
+                    cur, pos_side, pos_qty, scores, regime_ctx=regime_ctx, ctx=gctx, glog=glog)
                 if decision == 'ADD':
                     _log(f'ADD decision: {add_reason}')
                     import safety_manager
@@ -2569,6 +2764,7 @@ def _cycle():
                         f'📊 ADD {decision}: {add_reason}', msg_type='add_blocked')
                 return
 
+            perf_trace.lap('entry_guards')
             # D1-1: Shock guard freeze — 신규 진입 차단 (autopilot)
             try:
                 import shock_guard as _sg_ap
@@ -2594,20 +2790,24 @@ def _cycle():
 
             # ── V3: SL cooldown + signal debounce (before emission gate) ──
             if _is_v3_enabled():
-                v3_sl_ok, v3_sl_reason = _v3_check_sl_cooldown(cur, SYMBOL, dominant)
+                v3_sl_ok, v3_sl_reason = glog.check(
+                    'v3_sl_cooldown', _v3_check_sl_cooldown, cur, SYMBOL, dominant, ctx=gctx)
                 if not v3_sl_ok:
                     _log(f'[V3] {v3_sl_reason}')
                     return
 
                 if _v3_result:
-                    v3_db_ok, v3_db_reason = _v3_check_signal_debounce(
+                    v3_db_ok, v3_db_reason = glog.check(
+                        'v3_signal_debounce', _v3_check_signal_debounce,
                         cur, SYMBOL, _v3_result, dominant, _v3_features)
                     if not v3_db_ok:
                         _log(f'[V3] {v3_db_reason}')
                         return
 
             # ── v3: Central signal emission gate ──
-            (emit_ok, emit_reason) = should_emit_signal(cur, SYMBOL, dominant, confidence, regime_ctx=regime_ctx)
+            (emit_ok, emit_reason) = glog.check(
+                'emit_gate', should_emit_signal, cur, SYMBOL, dominant, confidence,
+                regime_ctx=regime_ctx, ctx=gctx)
             if not emit_ok:
                 should_log, _ = _db_should_log_risk(cur, f'signal_suppress_{emit_reason[:30]}')
                 if should_log:
@@ -2636,7 +2836,8 @@ def _cycle():
             try:
                 import feature_flags as _ff_spam
                 if _ff_spam.is_enabled('ff_signal_spam_guard') and not _v3_is_drift:
-                    _spam_ok, _spam_remaining = _check_signal_spam(SYMBOL, dominant)
+                    _spam_ok, _spam_remaining = glog.check(
+                        'signal_spam', _check_signal_spam, SYMBOL, dominant)
                     if not _spam_ok:
                         _notify_telegram_throttled(
                             f'[Autopilot] 신호 스팸 차단: {dominant} (cooldown {_spam_remaining}s)\n'
@@ -2651,7 +2852,8 @@ def _cycle():
 
             # B3: Post-impulse chasing ban
             try:
-                _impulse_ok, _impulse_remaining = _check_impulse_ban(cur, dominant)
+                _impulse_ok, _impulse_remaining = glog.check(
+                    'impulse_ban', _check_impulse_ban, cur, dominant, ctx=gctx)
                 if not _impulse_ok:
                     _notify_telegram_throttled(
                         f'[Autopilot] 급변 추격 차단: {dominant} ({_impulse_remaining:.0f}s)\n'
@@ -2683,6 +2885,7 @@ def _cycle():
             except Exception as e:
                 _log(f'reentry check FAIL-OPEN: {e}')
 
+            perf_trace.lap('triggers')
             # [2-2] Trend-Follow Trigger Evaluation (ff_unified_engine_v11)
             _trigger_type = None
             try:
@@ -2716,6 +2919,7 @@ def _cycle():
             except Exception as e:
                 _log(f'[TRIGGER] error (FAIL-OPEN): {e}')
 
+            perf_trace.lap('enqueue')
             signal_id = _create_autopilot_signal(cur, dominant, scores, equity_limits=eq, regime_ctx=regime_ctx)
             if signal_id:
                 # Record emission for cooldown tracking
@@ -2736,27 +2940,7 @@ def _cycle():
 
                 # V3: record debounce key after successful signal creation
                 if _is_v3_enabled() and _v3_result:
-                    try:
-                        from strategy.common.dedupe import record_signal, make_v3_signal_key
-                        rp = _v3_features.get('range_position') if _v3_features else None
-                        rc = _v3_result.get('regime_class', 'UNKNOWN')
-                        if rc == 'BREAKOUT':
-                            lb = 'BREAKOUT_UP' if dominant == 'LONG' else 'BREAKOUT_DOWN'
-                        elif rp is not None:
-                            if rp <= 0.20:
-                                lb = 'VAL'
-                            elif rp >= 0.80:
-                                lb = 'VAH'
-                            elif 0.40 <= rp <= 0.60:
-                                lb = 'POC'
-                            else:
-                                lb = 'MID'
-                        else:
-                            lb = 'MID'
-                        v3_key = make_v3_signal_key(SYMBOL, rc, dominant, lb)
-                        record_signal(cur, v3_key)
-                    except Exception as e:
-                        _log(f'[V3] debounce record FAIL-OPEN: {e}')
+                    _v3_record_signal_debounce(cur, SYMBOL, _v3_result, dominant, _v3_features)
 
                 _log_trade_process(cur, signal_id, scores, 'autopilot', start_stage, entry_pct,
                                     equity_limits=eq, v3_result=_v3_result)
@@ -2784,19 +2968,23 @@ def main():
     init_watchdog(interval_sec=10)
     _consecutive_errors = 0
     _MAX_CONSECUTIVE_ERRORS = 5
+    import db_notify
+    listener = db_notify.Listener([db_notify.INDICATOR_UPDATE], log_fn=_log)
 
     while True:
         if os.path.exists(KILL_SWITCH_PATH):
             _log('KILL_SWITCH detected. Exiting.')
             sys.exit(0)
         try:
-            _cycle()
+            with _TRACER.cycle():
+                _cycle()
+            _TRACER.maybe_flush()
             _consecutive_errors = 0  # reset on success
 
             # D3: heartbeat record
             try:
-                from db_config import get_conn as _hb_get_conn
-                _hb_conn = _hb_get_conn(autocommit=True)
+                from db_config import get_pooled_conn as _hb_get_conn
+                _hb_conn = _hb_get_conn('rw', autocommit=True)
                 with _hb_conn.cursor() as _hb_cur:
                     _hb_cur.execute(
                         "INSERT INTO service_health_log (service, state) VALUES ('autopilot_daemon', 'OK');")
@@ -2809,7 +2997,9 @@ def main():
             if _consecutive_errors >= _MAX_CONSECUTIVE_ERRORS:
                 _notify_telegram(f'[autopilot] 연속 {_consecutive_errors}회 에러 — 자동 복구 시도 중')
                 _consecutive_errors = 0
-        time.sleep(POLL_SEC)
+        # New closed-bar indicators → next cycle now; POLL_SEC otherwise
+        db_notify.wait_for(listener, POLL_SEC,
+                           match=lambda ch, p: p.get('symbol') == SYMBOL)
 
 
 if __name__ == '__main__':
@@ -8,43 +8,66 @@ This is the "cold store" counterpart to real-time Bybit API backfill:
   - Hot store: Bybit API → candles (recent 180d, data_source='bybit')
   - Cold store: Binance archive → candles (historical, data_source='binance_archive')
 
+Pipeline (per month / per local file, in a process pool):
+  ZIP member stream → COPY FROM STDIN into a TEXT temp table (no Python row
+  lists) → one INSERT ... SELECT ... ON CONFLICT DO NOTHING.
+  Header lines and microsecond timestamps (2025+ archives) are handled in SQL.
+  --workers processes download/import concurrently; at most --max-conns of
+  them hold a DB connection at the same time.
+
 Usage:
     python backfill_archive.py --tf 1m --start 2024-01 --end 2025-06
-    python backfill_archive.py --tf 5m --start 2024-01 --end 2025-06
+    python backfill_archive.py --tf 5m --start 2024-01 --end 2025-06 --workers 6
     python backfill_archive.py --tf 1m --start 2024-01 --end 2025-06 --dryrun
-    python backfill_archive.py --file /path/to/BTCUSDT-1m-2024-01.csv  # local CSV
+    python backfill_archive.py --file /path/to/BTCUSDT-1m-2024-01.zip  # local ZIP/CSV
+    python backfill_archive.py --dir /data/binance/1m                  # all ZIP/CSV in dir
 """
 import os
+import re
 import sys
-import csv
 import io
 import time
 import zipfile
 import argparse
 import traceback
+import multiprocessing
 import urllib.request
+from concurrent.futures import ProcessPoolExecutor, as_completed
 from datetime import datetime, timezone
 
 sys.path.insert(0, '/root/trading-bot/app')
 from db_config import get_conn
-from psycopg2.extras import execute_values
 from psycopg2 import errors as pg_errors
-from backfill_utils import start_job, update_progress, finish_job
+from backfill_utils import (
+    start_job, get_last_cursor, update_progress, finish_job, check_stop,
+)
 
 LOG_PREFIX = '[backfill_archive]'
 JOB_NAME = 'backfill_archive'
 SYMBOL = 'BTC/USDT:USDT'
 BINANCE_BASE_URL = 'https://data.binance.vision/data/spot/monthly/klines/BTCUSDT'
+DEFAULT_WORKERS = min(6, os.cpu_count() or 1)
+DEFAULT_MAX_CONNS = 4
 
 # Binance CSV columns: open_time, open, high, low, close, volume,
 #   close_time, quote_volume, count, taker_buy_vol, taker_buy_quote_vol, ignore
-BATCH_SIZE = 5000
+STAGE_COLS = ('open_time', 'o', 'h', 'l', 'c', 'v', 'close_time', 'quote_volume',
+              'trades', 'taker_base', 'taker_quote', 'ignore')
+_FILE_RE = re.compile(r'-(\d+[mhdw])-(\d{4}-\d{2})\.(zip|csv)$')
+
+# Set per worker process by _init_worker
+_conn_slots = None
 
 
 def _log(msg):
     print(f'{LOG_PREFIX} {msg}', flush=True)
 
 
+def _init_worker(slots):
+    global _conn_slots
+    _conn_slots = slots
+
+
 def _download_zip(tf, year_month):
     """Download Binance archive ZIP for given month. Returns bytes or None."""
     url = f'{BINANCE_BASE_URL}/{tf}/BTCUSDT-{tf}-{year_month}.zip'
@@ -63,93 +86,102 @@ def _download_zip(tf, year_month):
         return None
 
 
-def _parse_csv_from_zip(zip_bytes, tf, year_month):
-    """Extract CSV from ZIP and parse OHLCV rows."""
-    csv_name = f'BTCUSDT-{tf}-{year_month}.csv'
-    rows = []
-    try:
-        with zipfile.ZipFile(io.BytesIO(zip_bytes)) as zf:
-            names = zf.namelist()
-            target = csv_name if csv_name in names else names[0]
-            with zf.open(target) as f:
-                reader = csv.reader(io.TextIOWrapper(f, encoding='utf-8'))
-                for line in reader:
-                    if len(line) < 6:
-                        continue
-                    try:
-                        ts_ms = int(line[0])
-                        o = float(line[1])
-                        h = float(line[2])
-                        l = float(line[3])
-                        c = float(line[4])
-                        v = float(line[5])
-                        rows.append((ts_ms, o, h, l, c, v))
-                    except (ValueError, IndexError):
-                        continue
-    except Exception as e:
-        _log(f'ZIP parse error: {e}')
-    return rows
-
-
-def _parse_csv_file(filepath):
-    """Parse a local CSV file."""
-    rows = []
-    with open(filepath, 'r') as f:
-        reader = csv.reader(f)
-        for line in reader:
-            if len(line) < 6:
-                continue
-            try:
-                ts_ms = int(line[0])
-                o = float(line[1])
-                h = float(line[2])
-                l = float(line[3])
-                c = float(line[4])
-                v = float(line[5])
-                rows.append((ts_ms, o, h, l, c, v))
-            except (ValueError, IndexError):
-                continue
-    return rows
-
-
-def _upsert_batch(conn, rows, tf, data_source='binance_archive'):
-    """Upsert a batch of rows into candles (1m) or market_ohlcv (5m+)."""
+def _open_source(task):
+    """Binary stream of the CSV for a task, or None. Caller closes it."""
+    if task['kind'] == 'csv':
+        return open(task['path'], 'rb')
+    if task['kind'] == 'zip':
+        zf = zipfile.ZipFile(task['path'])
+    else:
+        data = _download_zip(task['tf'], task['label'])
+        if not data:
+            return None
+        zf = zipfile.ZipFile(io.BytesIO(data))
+    names = [n for n in zf.namelist() if n.endswith('.csv')] or zf.namelist()
+    want = f'BTCUSDT-{task["tf"]}-{task["label"]}.csv'
+    return zf.open(want if want in names else names[0])
+
+
+def _count_rows(stream):
+    """Data lines in a CSV stream (header skipped), for --dryrun."""
+    n = 0
+    for line in stream:
+        if line[:1].isdigit():
+            n += 1
+    return n
+
+
+def _copy_month(conn, stream, tf, data_source='binance_archive'):
+    """COPY a CSV stream into a temp stage, then merge. Returns (rows, inserted)."""
     table = 'candles' if tf == '1m' else 'market_ohlcv'
-    values = [
-        (SYMBOL, tf,
-         datetime.fromtimestamp(ts_ms / 1000, tz=timezone.utc),
-         o, h, l, c, v, data_source)
-        for ts_ms, o, h, l, c, v in rows
-    ]
-
-    inserted = 0
     with conn.cursor() as cur:
-        # Try with data_source column first; fall back only on UndefinedColumn
+        cur.execute(f"""
+            CREATE TEMP TABLE _archive_stage ({', '.join(f'{c} TEXT' for c in STAGE_COLS)})
+            ON COMMIT DROP
+        """)
+        cur.copy_expert(
+            f'COPY _archive_stage ({", ".join(STAGE_COLS)}) FROM STDIN WITH (FORMAT csv)',
+            stream)
+        cur.execute("SELECT count(*) FROM _archive_stage WHERE open_time ~ '^[0-9]+$'")
+        rows = cur.fetchone()[0]
+        # Header lines are skipped; 2025+ archives use microsecond open_time
+        select = """
+            SELECT %s, %s,
+                   to_timestamp(open_time::bigint /
+                       CASE WHEN open_time::bigint >= 100000000000000
+                            THEN 1000000.0 ELSE 1000.0 END),
+                   o::float8, h::float8, l::float8, c::float8, v::float8{ds}
+            FROM _archive_stage
+            WHERE open_time ~ '^[0-9]+$'
+            ON CONFLICT (symbol, tf, ts) DO NOTHING
+        """
+        cur.execute('SAVEPOINT merge')
         try:
-            execute_values(cur, f"""
-                INSERT INTO {table} (symbol, tf, ts, o, h, l, c, v, data_source)
-                VALUES %s
-                ON CONFLICT (symbol, tf, ts) DO NOTHING;
-            """, values)
-            inserted = cur.rowcount
+            cur.execute(f'INSERT INTO {table} (symbol, tf, ts, o, h, l, c, v, data_source) '
+                        + select.format(ds=', %s'), (SYMBOL, tf, data_source))
         except pg_errors.UndefinedColumn:
-            conn.rollback()
             # Fallback: without data_source column
-            values_no_ds = [
-                (SYMBOL, tf,
-                 datetime.fromtimestamp(ts_ms / 1000, tz=timezone.utc),
-                 o, h, l, c, v)
-                for ts_ms, o, h, l, c, v in rows
-            ]
-            execute_values(cur, f"""
-                INSERT INTO {table} (symbol, tf, ts, o, h, l, c, v)
-                VALUES %s
-                ON CONFLICT (symbol, tf, ts) DO NOTHING;
-            """, values_no_ds)
-            inserted = cur.rowcount
-
+            cur.execute('ROLLBACK TO SAVEPOINT merge')
+            cur.execute(f'INSERT INTO {table} (symbol, tf, ts, o, h, l, c, v) '
+                        + select.format(ds=''), (SYMBOL, tf))
+        inserted = cur.rowcount
     conn.commit()
-    return inserted
+    return rows, inserted
+
+
+def _import_task(task):
+    """Worker: one month or one local file. Returns a result dict (never raises)."""
+    t0 = time.time()
+    res = {'label': task['label'], 'rows': 0, 'inserted': 0, 'skipped': False,
+           'error': None}
+    stream = None
+    try:
+        stream = _open_source(task)
+        if stream is None:
+            res['skipped'] = True
+            return res
+        if task['dryrun']:
+            res['rows'] = _count_rows(stream)
+            return res
+        with _conn_slots:
+            conn = get_conn()
+            conn.autocommit = False
+            try:
+                with conn.cursor() as cur:
+                    cur.execute("SET statement_timeout = '600000';")
+                res['rows'], res['inserted'] = _copy_month(conn, stream, task['tf'])
+            except Exception:
+                conn.rollback()
+                raise
+            finally:
+                conn.close()
+    except Exception as e:
+        res['error'] = f'{type(e).__name__}: {e}'[:500]
+    finally:
+        if stream is not None:
+            stream.close()
+        res['sec'] = round(time.time() - t0, 1)
+    return res
 
 
 def _generate_months(start_ym, end_ym):
@@ -165,114 +197,150 @@ def _generate_months(start_ym, end_ym):
             y += 1
 
 
+def local_tasks(paths, default_tf, dryrun=False):
+    """Tasks for local ZIP/CSV files (directories are scanned, sorted by name).
+
+    tf and month come from Binance file names (BTCUSDT-1m-2024-01.zip),
+    falling back to default_tf.
+    """
+    files = []
+    for p in paths:
+        if os.path.isdir(p):
+            files.extend(os.path.join(p, f) for f in sorted(os.listdir(p))
+                         if f.endswith(('.zip', '.csv')))
+        else:
+            files.append(p)
+    tasks = []
+    for f in files:
+        m = _FILE_RE.search(os.path.basename(f))
+        tasks.append({
+            'kind': 'zip' if f.endswith('.zip') else 'csv',
+            'path': f,
+            'tf': m.group(1) if m else default_tf,
+            'label': m.group(2) if m else os.path.basename(f),
+            'dryrun': dryrun,
+        })
+    return tasks
+
+
+def _ensure_data_source(tfs):
+    """Run data_source migration for the target tables."""
+    conn = get_conn()
+    try:
+        conn.autocommit = True
+        with conn.cursor() as cur:
+            for table in {'candles' if tf == '1m' else 'market_ohlcv' for tf in tfs}:
+                cur.execute(f"ALTER TABLE {table} ADD COLUMN IF NOT EXISTS "
+                            f"data_source TEXT DEFAULT 'bybit';")
+    except Exception:
+        pass
+    finally:
+        conn.close()
+
+
 def main():
     parser = argparse.ArgumentParser(description='Bulk-load Binance archive data')
     parser.add_argument('--tf', default='1m', help='Timeframe: 1m, 5m, 15m, 1h')
     parser.add_argument('--start', default='2024-01', help='Start month YYYY-MM')
     parser.add_argument('--end', default=None, help='End month YYYY-MM (default=last month)')
-    parser.add_argument('--file', default=None, help='Load from local CSV file')
+    parser.add_argument('--resume', action='store_true', help='Skip months already loaded')
+    parser.add_argument('--file', action='append', default=None,
+                        help='Load a local ZIP/CSV file (repeatable)')
+    parser.add_argument('--dir', default=None, help='Load every ZIP/CSV in a directory')
+    parser.add_argument('--workers', type=int, default=DEFAULT_WORKERS)
+    parser.add_argument('--max-conns', type=int, default=DEFAULT_MAX_CONNS,
+                        help='Max concurrent DB connections')
     parser.add_argument('--dryrun', action='store_true', help='Download and count only')
     args = parser.parse_args()
 
-    conn = get_conn()
-    conn.autocommit = False
-
-    with conn.cursor() as cur:
-        cur.execute("SET statement_timeout = '600000';")
-    conn.commit()
-
-    # Run data_source migration
-    try:
-        with conn.cursor() as cur:
-            table = 'candles' if args.tf == '1m' else 'market_ohlcv'
-            cur.execute(f"ALTER TABLE {table} ADD COLUMN IF NOT EXISTS data_source TEXT DEFAULT 'bybit';")
-        conn.commit()
-    except Exception:
-        conn.rollback()
-
-    # ── Local file mode ──
-    if args.file:
-        _log(f'Loading local file: {args.file}')
-        rows = _parse_csv_file(args.file)
-        _log(f'Parsed {len(rows):,} rows')
-        if args.dryrun:
-            _log(f'DRYRUN: would insert {len(rows):,} rows')
-            conn.close()
-            return
-        total = 0
-        for i in range(0, len(rows), BATCH_SIZE):
-            batch = rows[i:i + BATCH_SIZE]
-            _upsert_batch(conn, batch, args.tf)
-            total += len(batch)
-            _log(f'Inserted {total:,}/{len(rows):,}')
-        _log(f'DONE: {total:,} rows from file')
-        conn.close()
+    local = (args.file or []) + ([args.dir] if args.dir else [])
+    if local:
+        tasks = local_tasks(local, args.tf, dryrun=args.dryrun)
+        _log(f'Local mode: {len(tasks)} files')
+    else:
+        end_ym = args.end
+        if not end_ym:
+            now = datetime.now(timezone.utc)
+            # Default to last completed month
+            if now.month == 1:
+                end_ym = f'{now.year - 1:04d}-12'
+            else:
+                end_ym = f'{now.year:04d}-{now.month - 1:02d}'
+        months = list(_generate_months(args.start, end_ym))
+        _log(f'Archive backfill: tf={args.tf}, months={args.start[:7]}~{end_ym[:7]} '
+             f'({len(months)} months)')
+        tasks = [{'kind': 'url', 'tf': args.tf, 'label': ym, 'path': None,
+                  'dryrun': args.dryrun} for ym in months]
+    if not tasks:
+        _log('Nothing to do')
         return
 
-    # ── Monthly download mode ──
-    end_ym = args.end
-    if not end_ym:
-        now = datetime.now(timezone.utc)
-        # Default to last completed month
-        if now.month == 1:
-            end_ym = f'{now.year - 1:04d}-12'
-        else:
-            end_ym = f'{now.year:04d}-{now.month - 1:02d}'
-
-    months = list(_generate_months(args.start, end_ym))
-    _log(f'Archive backfill: tf={args.tf}, months={args.start}~{end_ym} ({len(months)} months)')
-
-    job_id = start_job(conn, JOB_NAME, metadata={
-        'tf': args.tf, 'start': args.start, 'end': end_ym,
-        'source': 'binance_archive',
+    conn = get_conn()
+    conn.autocommit = True
+    job_name = JOB_NAME if args.tf == '1m' or local else f'{JOB_NAME}_{args.tf}'
+    done_before = set()
+    if args.resume and not local:
+        cursor = get_last_cursor(conn, job_name) or {}
+        done_before.update(cursor.get('done_months') or [])
+        if cursor.get('last_month'):
+            done_before.update(t['label'] for t in tasks if t['label'] <= cursor['last_month'])
+        tasks = [t for t in tasks if t['label'] not in done_before]
+        _log(f'Resume: {len(done_before)} months already loaded, {len(tasks)} left')
+
+    if not args.dryrun:
+        _ensure_data_source({t['tf'] for t in tasks})
+
+    workers = max(1, args.workers)
+    max_conns = max(1, min(args.max_conns, workers))
+    job_id = start_job(conn, job_name, metadata={
+        'tf': args.tf, 'start': args.start, 'end': args.end,
+        'source': 'local' if local else 'binance_archive',
+        'workers': workers, 'max_conns': max_conns,
     })
+    _log(f'{len(tasks)} tasks, workers={workers} max_conns={max_conns}')
 
-    total_rows = 0
-    total_months = 0
-    skipped_months = 0
+    total_rows = total_inserted = 0
+    done, skipped, failed = [], 0, 0
+    t0 = time.time()
+    status, error = 'COMPLETED', None
 
     try:
-        for ym in months:
-            zip_bytes = _download_zip(args.tf, ym)
-            if not zip_bytes:
-                skipped_months += 1
-                continue
-
-            rows = _parse_csv_from_zip(zip_bytes, args.tf, ym)
-            if not rows:
-                _log(f'{ym}: empty CSV')
-                skipped_months += 1
-                continue
-
-            _log(f'{ym}: {len(rows):,} rows parsed')
-
-            if args.dryrun:
-                total_rows += len(rows)
-                total_months += 1
-                continue
-
-            month_inserted = 0
-            for i in range(0, len(rows), BATCH_SIZE):
-                batch = rows[i:i + BATCH_SIZE]
-                _upsert_batch(conn, batch, args.tf)
-                month_inserted += len(batch)
-
-            total_rows += month_inserted
-            total_months += 1
-            _log(f'{ym}: {month_inserted:,} upserted (total={total_rows:,})')
-
-            update_progress(conn, job_id, {'last_month': ym},
-                            inserted=total_rows)
-            time.sleep(1)  # rate limit courtesy
-
-        if args.dryrun:
-            _log(f'DRYRUN: {total_rows:,} rows across {total_months} months '
-                 f'(skipped={skipped_months})')
-        else:
-            _log(f'DONE: {total_rows:,} rows across {total_months} months '
-                 f'(skipped={skipped_months})')
-
-        finish_job(conn, job_id, status='COMPLETED')
+        slots = multiprocessing.BoundedSemaphore(max_conns)
+        with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker,
+                                 initargs=(slots,)) as ex:
+            futures = [ex.submit(_import_task, t) for t in tasks]
+            for fut in as_completed(futures):
+                res = fut.result()
+                if res['error']:
+                    failed += 1
+                    status, error = 'FAILED', res['error']
+                    _log(f'{res["label"]}: ERROR {res["error"]}')
+                elif res['skipped']:
+                    skipped += 1
+                else:
+                    done.append(res['label'])
+                    total_rows += res['rows']
+                    total_inserted += res['inserted']
+                    _log(f'{res["label"]}: rows={res["rows"]:,} '
+                         f'inserted={res["inserted"]:,} {res["sec"]}s '
+                         f'(total={total_rows:,})')
+                if not args.dryrun:
+                    update_progress(conn, job_id,
+                                    {'done_months': sorted(done_before.union(done))},
+                                    inserted=total_inserted, failed=failed)
+                if check_stop():
+                    _log('STOP signal received — cancelling queued tasks')
+                    for f in futures:
+                        f.cancel()
+                    status, error = 'PARTIAL', 'stopped_by_user'
+                    break
+
+        elapsed = time.time() - t0
+        _log(f'{"DRYRUN" if args.dryrun else "DONE"}: {total_rows:,} rows '
+             f'({total_inserted:,} new) across {len(done)} files in {elapsed:.0f}s '
+             f'({total_rows / max(elapsed, 1e-9):,.0f} rows/s, '
+             f'skipped={skipped}, failed={failed})')
+        finish_job(conn, job_id, status=status, error=error)
 
     except KeyboardInterrupt:
         _log('Interrupted')
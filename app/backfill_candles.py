@@ -2,27 +2,33 @@
 backfill_candles.py — 1m 캔들 백필 (2023-11-01 ~ 현재).
 
 Bybit V5 REST API 직접 호출로 1m OHLCV → candles 테이블 저장.
-Window-based cursor: start~end 윈도우로 순차 전진, reverse order 방어.
-1000개/배치 (Bybit max), ON CONFLICT DO UPDATE, backfill_job_runs에 커서 저장.
+범위를 1000분 윈도우 [start, end)로 미리 나누고, --concurrency 개까지
+동시에 요청 (TokenBucket으로 --rps 제한, Bybit 공개 한도 600 req/5s/IP 이하).
+윈도우는 순서 없이 완료될 수 있으므로 커서(since_ms)는 "앞에서부터 연속으로
+완료된 마지막 윈도우의 끝"까지만 전진 → 중단/재개 시 빈 구간이 생기지 않음.
+ON CONFLICT DO NOTHING, backfill_job_runs에 커서 저장.
 
 Usage:
     python backfill_candles.py                    # 전체 백필
     python backfill_candles.py --resume           # 마지막 커서부터 재개
     python backfill_candles.py --start 2024-06-01 # 특정 시작일
+    python backfill_candles.py --concurrency 8 --rps 20
 """
 import sys
 import time
 import argparse
 import traceback
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor, FIRST_COMPLETED, wait
 from datetime import datetime, timezone
 
 sys.path.insert(0, '/root/trading-bot/app')
 from db_config import get_conn
 from psycopg2.extras import execute_values
+import backfill_utils
 from backfill_utils import (
     start_job, get_last_cursor, update_progress, finish_job,
-    check_stop, check_pause,
-    fetch_bybit_kline, normalize_symbol,
+    check_stop, check_pause, normalize_symbol, TokenBucket,
 )
 
 SYMBOL = 'BTC/USDT:USDT'
@@ -31,17 +37,27 @@ TF = '1m'
 INTERVAL_MS = 60_000  # 1 minute in milliseconds
 LIMIT = 1000  # Bybit V5 max per request
 WINDOW_MS = LIMIT * INTERVAL_MS  # 1000 minutes window per request
-BATCH_SLEEP = 0.15  # rate limit safety
+DEFAULT_RPS = 10  # well under Bybit's 120 req/s per IP (shared with live daemons)
+DEFAULT_CONCURRENCY = 4
+MAX_RETRIES = 5  # per window, then the window is reported failed
+RETRY_BACKOFF = 2  # seconds, doubled per attempt (max 60)
+CHECKPOINT_EVERY = 3  # windows completed between cursor saves
 LOG_PREFIX = '[backfill_candles]'
 JOB_NAME = 'backfill_candles_1m'
 DEFAULT_START = '2023-11-01'
-MAX_STALL_STREAK = 5  # consecutive zero-data responses before force-advance
+MAX_STALL_STREAK = 5  # consecutive empty windows before a stall warning
 
 
 def _log(msg):
     print(f'{LOG_PREFIX} {msg}', flush=True)
 
 
+def _quiet(msg):
+    """Per-request API log for worker threads: errors only."""
+    if 'ERROR' in msg:
+        _log(msg)
+
+
 def _ms_to_dt(ms):
     return datetime.fromtimestamp(ms / 1000, tz=timezone.utc)
 
@@ -50,11 +66,104 @@ def _dt_fmt(ms):
     return _ms_to_dt(ms).strftime('%Y-%m-%d %H:%M')
 
 
+def plan_windows(start_ms, end_ms, window_ms=WINDOW_MS):
+    """[(w_start, w_end), ...] covering [start_ms, end_ms) in window_ms steps."""
+    windows = []
+    ws = start_ms
+    while ws < end_ms:
+        windows.append((ws, min(ws + window_ms, end_ms)))
+        ws += window_ms
+    return windows
+
+
+class Watermark:
+    """Resume cursor over windows that may complete out of order.
+
+    since_ms only moves past a window once it and every window before it
+    have completed, so a restart from since_ms never skips data.
+    """
+
+    def __init__(self, windows):
+        self._order = [ws for ws, _ in windows]
+        self._ends = dict(windows)
+        self._done = set()
+        self._i = 0
+        self.since_ms = windows[0][0] if windows else None
+
+    def complete(self, w_start):
+        """Mark a window done; returns the (possibly unchanged) since_ms."""
+        self._done.add(w_start)
+        while self._i < len(self._order) and self._order[self._i] in self._done:
+            ws = self._order[self._i]
+            self._done.discard(ws)
+            self.since_ms = self._ends[ws]
+            self._i += 1
+        return self.since_ms
+
+    @property
+    def ahead(self):
+        """Windows completed beyond the watermark (waiting on an earlier one)."""
+        return len(self._done)
+
+
+def _fetch_window(w_start, w_end, limiter, fetch_fn, retries, backoff):
+    """Worker: one window with retry. Returns a result dict (never raises)."""
+    res = {'start': w_start, 'end': w_end, 'bars': None, 'latency_ms': 0,
+           'attempts': 0, 'error': None}
+    delay = backoff
+    while True:
+        limiter.acquire()
+        res['attempts'] += 1
+        t0 = time.time()
+        try:
+            res['bars'] = fetch_fn(SYMBOL, TF, w_start, limit=LIMIT, log_fn=_quiet,
+                                   end_ms=w_end - 1, raise_on_error=True)
+            res['error'] = None
+        except Exception as e:
+            res['error'] = f'{type(e).__name__}: {e}'[:200]
+        res['latency_ms'] = int((time.time() - t0) * 1000)
+        if res['error'] is None or res['attempts'] > retries:
+            return res
+        time.sleep(delay)
+        delay = min(delay * 2, 60)
+
+
+def fetch_windows(windows, limiter, concurrency=DEFAULT_CONCURRENCY, fetch_fn=None,
+                  retries=MAX_RETRIES, backoff=RETRY_BACKOFF):
+    """Yield window results in completion order, at most `concurrency` in flight.
+
+    New windows are only submitted while the consumer pulls results, so a
+    consumer blocked on check_pause() stops the fetcher too. Closing the
+    generator early cancels queued windows and waits for in-flight ones.
+    """
+    fetch_fn = fetch_fn or backfill_utils.fetch_bybit_kline
+    todo = deque(windows)
+    pending = set()
+    ex = ThreadPoolExecutor(max_workers=max(1, concurrency))
+    try:
+        while todo or pending:
+            while todo and len(pending) < concurrency:
+                ws, we = todo.popleft()
+                pending.add(ex.submit(_fetch_window, ws, we, limiter, fetch_fn,
+                                      retries, backoff))
+            done, pending = wait(pending, return_when=FIRST_COMPLETED)
+            for fut in done:
+                yield fut.result()
+    finally:
+        for fut in pending:
+            fut.cancel()
+        ex.shutdown(wait=True)
+
+
 def main():
     parser = argparse.ArgumentParser(description='Backfill 1m candles to candles table')
     parser.add_argument('--start', default=DEFAULT_START, help='Start date YYYY-MM-DD')
     parser.add_argument('--end', default=None, help='End date YYYY-MM-DD (default=now)')
     parser.add_argument('--resume', action='store_true', help='Resume from last cursor')
+    parser.add_argument('--concurrency', type=int, default=DEFAULT_CONCURRENCY,
+                        help='Max windows in flight')
+    parser.add_argument('--rps', type=float, default=DEFAULT_RPS,
+                        help='Max Bybit requests per second')
     args = parser.parse_args()
 
     conn = get_conn()
@@ -79,10 +188,20 @@ def main():
             cursor_ms = saved['since_ms']
             _log(f'Resuming from cursor since_ms={cursor_ms} ({_dt_fmt(cursor_ms)})')
 
+    rps = min(max(args.rps, 0.1), backfill_utils.BYBIT_PUBLIC_RATE_PER_SEC)
+    concurrency = max(1, args.concurrency)
+    windows = plan_windows(cursor_ms, end_ms)
+    watermark = Watermark(windows)
+    limiter = TokenBucket(rps, capacity=concurrency)
+
     _log(f'Backfilling {TF} candles: {_dt_fmt(cursor_ms)} → {end_dt.strftime("%Y-%m-%d %H:%M")}')
-    _log(f'API params: symbol={normalize_symbol(SYMBOL)} interval=1 limit={LIMIT}')
+    _log(f'API params: symbol={normalize_symbol(SYMBOL)} interval=1 limit={LIMIT} '
+         f'windows={len(windows)} concurrency={concurrency} rps={rps:g}')
 
-    job_id = start_job(conn, JOB_NAME, metadata={'start_ms': cursor_ms, 'end_ms': end_ms})
+    job_id = start_job(conn, JOB_NAME, metadata={
+        'start_ms': cursor_ms, 'end_ms': end_ms,
+        'concurrency': concurrency, 'rps': rps,
+    })
 
     # ── Metrics ──
     total_inserted = 0
@@ -90,9 +209,9 @@ def main():
     total_failed = 0
     batch_num = 0
     api_errors = 0
-    empty_streak = 0      # consecutive batches with returned_rows==0
-    conflict_streak = 0   # consecutive batches with returned_rows>0 but inserted==0
-    backoff = 5
+    empty_streak = 0      # consecutive windows with returned_rows==0
+    conflict_streak = 0   # consecutive windows with returned_rows>0 but inserted==0
+    failed_windows = []
     last_stall_reason = None
     last_http_status = None
     last_api_latency_ms = 0
@@ -101,12 +220,14 @@ def main():
     last_last_ts = None
     last_error = None
     finished = False
+    t_start = time.time()
 
     def _save_cursor(force=False):
         """Save cursor + detailed metrics to DB."""
+        since_ms = watermark.since_ms if watermark.since_ms is not None else cursor_ms
         cursor_data = {
-            'since_ms': cursor_ms,
-            'current_cursor_ts': _dt_fmt(cursor_ms),
+            'since_ms': since_ms,
+            'current_cursor_ts': _dt_fmt(since_ms),
             'last_returned_rows': last_returned_rows,
             'last_first_ts': _dt_fmt(last_first_ts) if last_first_ts else None,
             'last_last_ts': _dt_fmt(last_last_ts) if last_last_ts else None,
@@ -117,12 +238,115 @@ def main():
             'error_count': api_errors,
             'last_error': str(last_error)[:200] if last_error else None,
             'last_stall_reason': last_stall_reason,
+            'windows_done': batch_num,
+            'windows_total': len(windows),
+            'windows_ahead': watermark.ahead,
+            'failed_windows': [_dt_fmt(ws) for ws in failed_windows[:20]],
         }
         update_progress(conn, job_id, cursor_data,
                         inserted=total_inserted, failed=total_failed)
 
+    results = fetch_windows(windows, limiter, concurrency=concurrency)
     try:
-        while cursor_ms < end_ms:
+        for res in results:
+            w_start, w_end = res['start'], res['end']
+            last_api_latency_ms = res['latency_ms']
+            api_errors += res['attempts'] - 1 + (1 if res['error'] else 0)
+
+            # ── Window failed after retries: watermark stays behind it ──
+            if res['error']:
+                last_http_status = 'ERROR'
+                last_error = res['error']
+                failed_windows.append(w_start)
+                _log(f'WINDOW FAILED {_dt_fmt(w_start)}~{_dt_fmt(w_end)} '
+                     f'after {res["attempts"]} attempts: {res["error"]}')
+                _save_cursor()
+            else:
+                last_http_status = 200
+                raw = res['bars'] or []
+                bars = [b for b in raw if w_start <= b[0] < w_end]
+                last_returned_rows = len(bars)
+                last_first_ts = bars[0][0] if bars else None
+                last_last_ts = bars[-1][0] if bars else None
+
+                # Validate first bar of the first window (API parameter mismatch)
+                if w_start == windows[0][0] and raw:
+                    drift_days = abs(raw[0][0] - w_start) / 86400_000
+                    _log(f'FIRST BAR: {_dt_fmt(raw[0][0])} '
+                         f'(requested={_dt_fmt(w_start)}, '
+                         f'drift={drift_days:.1f}d, bars={len(raw)})')
+                    if drift_days > 30:
+                        _log(f'FATAL: drift={drift_days:.0f} days — API parameter mismatch')
+                        finish_job(conn, job_id, status='FAILED',
+                                   error=f'first_bar_drift_{drift_days:.0f}d')
+                        finished = True
+                        break
+
+                if not bars:
+                    # Gap (listing start, maintenance): nothing to store
+                    empty_streak += 1
+                    conflict_streak = 0
+                    if empty_streak >= MAX_STALL_STREAK:
+                        last_stall_reason = f'empty_streak={empty_streak}'
+                        _log(f'STALL: {empty_streak} consecutive empty windows '
+                             f'(last {_dt_fmt(w_start)}~{_dt_fmt(w_end)})')
+                else:
+                    empty_streak = 0
+
+                # ── DB insert (batch upsert) ──
+                batch_inserted = 0
+                db_ok = True
+                if bars:
+                    try:
+                        with conn.cursor() as cur:
+                            values = [
+                                (DB_SYMBOL, TF,
+                                 datetime.fromtimestamp(ts_ms / 1000, tz=timezone.utc),
+                                 o, h, l, c, v)
+                                for ts_ms, o, h, l, c, v in bars
+                            ]
+                            # DO NOTHING: skip duplicates, rowcount = actual new inserts
+                            # (one page, so rowcount covers the whole window)
+                            execute_values(cur, """
+                                INSERT INTO candles (symbol, tf, ts, o, h, l, c, v)
+                                VALUES %s
+                                ON CONFLICT (symbol, tf, ts) DO NOTHING;
+                            """, values, page_size=len(values))
+                            batch_inserted = cur.rowcount
+                        conn.commit()
+                    except Exception as e:
+                        conn.rollback()
+                        db_ok = False
+                        last_error = e
+                        total_failed += last_returned_rows
+                        failed_windows.append(w_start)
+                        _log(f'DB error window {_dt_fmt(w_start)}: {e}')
+
+                if db_ok:
+                    batch_conflict = max(0, last_returned_rows - batch_inserted)
+                    total_inserted += batch_inserted
+                    total_conflict += batch_conflict
+                    batch_num += 1
+
+                    # Track conflict-only streaks (returned rows > 0 but all conflicts)
+                    if batch_inserted == 0 and last_returned_rows > 0:
+                        conflict_streak += 1
+                        if conflict_streak >= MAX_STALL_STREAK:
+                            last_stall_reason = f'conflict_streak={conflict_streak}_all_duplicates'
+                    else:
+                        conflict_streak = 0
+
+                    since_ms = watermark.complete(w_start)
+                    _log(f'W{batch_num}/{len(windows)}: {_dt_fmt(w_start)}→{_dt_fmt(w_end)} '
+                         f'bars={last_returned_rows} ins={batch_inserted} '
+                         f'dup={batch_conflict} total={total_inserted:,} '
+                         f'latency={last_api_latency_ms}ms try={res["attempts"]} '
+                         f'cursor={_dt_fmt(since_ms)} ahead={watermark.ahead}')
+
+                    # Save cursor to DB every few windows (crash-safe)
+                    if batch_num % CHECKPOINT_EVERY == 0:
+                        _save_cursor()
+
             if check_stop():
                 _log('STOP signal received')
                 _save_cursor()
@@ -136,156 +360,32 @@ def main():
                 finished = True
                 break
 
-            # ── Window-based request: [cursor_ms, chunk_end_ms) ──
-            chunk_end_ms = min(cursor_ms + WINDOW_MS, end_ms)
-            cursor_before = cursor_ms
-
-            t0 = time.time()
-            try:
-                bars = fetch_bybit_kline(SYMBOL, TF, cursor_ms, limit=LIMIT, log_fn=_log)
-                last_api_latency_ms = int((time.time() - t0) * 1000)
-                last_http_status = 200
-            except Exception as e:
-                last_api_latency_ms = int((time.time() - t0) * 1000)
-                last_http_status = 'ERROR'
-                last_error = e
-                api_errors += 1
-                _log(f'API error (#{api_errors}): {e}, latency={last_api_latency_ms}ms, backoff {backoff}s')
-                time.sleep(backoff)
-                backoff = min(backoff * 2, 60)
-                # Save metrics even on error
-                if api_errors % 3 == 0:
-                    _save_cursor()
-                continue
-
-            backoff = 5  # reset on successful HTTP call
-            last_returned_rows = len(bars) if bars else 0
-
-            # ── Sort ascending (defense against reverse order) ──
-            if bars:
-                bars.sort(key=lambda x: x[0])
-                last_first_ts = bars[0][0]
-                last_last_ts = bars[-1][0]
-            else:
-                last_first_ts = None
-                last_last_ts = None
-
-            # ── Handle empty response ──
-            if not bars:
-                empty_streak += 1
-                conflict_streak = 0
-                _log(f'EMPTY #{empty_streak}/{MAX_STALL_STREAK} '
-                     f'cursor={_dt_fmt(cursor_before)} chunk_end={_dt_fmt(chunk_end_ms)}')
-
-                if empty_streak >= MAX_STALL_STREAK:
-                    # Force-advance cursor to chunk_end instead of ABORT
-                    last_stall_reason = f'empty_streak={empty_streak}_force_advance'
-                    _log(f'STALL: {MAX_STALL_STREAK} consecutive empty. '
-                         f'Force-advancing cursor: {_dt_fmt(cursor_before)} → {_dt_fmt(chunk_end_ms)}')
-                    cursor_ms = chunk_end_ms
-                    empty_streak = 0
-                    _save_cursor()
-                else:
-                    # Advance by 1 day on each empty (gap-skip)
-                    cursor_ms = min(cursor_before + 86400_000, chunk_end_ms)
-                    time.sleep(1)
-                continue
-
-            empty_streak = 0
-
-            # Validate first bar on first batch
-            if batch_num == 0:
-                first_dt = _ms_to_dt(bars[0][0])
-                drift_days = abs(bars[0][0] - cursor_before) / 86400_000
-                _log(f'FIRST BAR: {first_dt.strftime("%Y-%m-%d %H:%M")} '
-                     f'(requested={_dt_fmt(cursor_before)}, '
-                     f'drift={drift_days:.1f}d, bars={last_returned_rows})')
-                if drift_days > 30:
-                    _log(f'FATAL: drift={drift_days:.0f} days — API parameter mismatch')
-                    finish_job(conn, job_id, status='FAILED',
-                               error=f'first_bar_drift_{drift_days:.0f}d')
-                    finished = True
-                    break
-
-            # ── DB insert (batch upsert) ──
-            batch_inserted = 0
-            try:
-                with conn.cursor() as cur:
-                    values = [
-                        (DB_SYMBOL, TF,
-                         datetime.fromtimestamp(ts_ms / 1000, tz=timezone.utc),
-                         o, h, l, c, v)
-                        for ts_ms, o, h, l, c, v in bars
-                    ]
-                    # DO NOTHING: skip duplicates, rowcount = actual new inserts
-                    execute_values(cur, """
-                        INSERT INTO candles (symbol, tf, ts, o, h, l, c, v)
-                        VALUES %s
-                        ON CONFLICT (symbol, tf, ts) DO NOTHING;
-                    """, values)
-                    batch_inserted = cur.rowcount
-                conn.commit()
-            except Exception as e:
-                conn.rollback()
-                last_error = e
-                _log(f'DB error batch {batch_num}: {e}')
-                total_failed += last_returned_rows
-                time.sleep(5)
-                # Still advance cursor to prevent infinite loop on DB errors
-                cursor_ms = bars[-1][0] + INTERVAL_MS
-                continue
-
-            # ── Conflict detection (DO NOTHING: rowcount = new inserts only) ──
-            batch_conflict = max(0, last_returned_rows - batch_inserted)
-            total_inserted += batch_inserted
-            total_conflict += batch_conflict
-            batch_num += 1
-
-            # Track conflict-only streaks (returned rows > 0 but all conflicts)
-            if batch_inserted == 0 and last_returned_rows > 0:
-                conflict_streak += 1
-                if conflict_streak >= MAX_STALL_STREAK:
-                    last_stall_reason = f'conflict_streak={conflict_streak}_all_duplicates'
-                    _log(f'WARN: {conflict_streak} consecutive conflict-only batches '
-                         f'(all duplicates). cursor advancing normally.')
-            else:
-                conflict_streak = 0
-
-            # ── Advance cursor ──
-            cursor_ms = bars[-1][0] + INTERVAL_MS
-            cursor_after_dt = _dt_fmt(cursor_ms)
-
-            # Per-batch log
-            _log(f'B{batch_num}: {_dt_fmt(cursor_before)}→{cursor_after_dt} '
-                 f'bars={last_returned_rows} ins={batch_inserted} '
-                 f'dup={batch_conflict} total={total_inserted:,} '
-                 f'latency={last_api_latency_ms}ms')
-
-            # Save cursor to DB every 3 batches (crash-safe)
-            if batch_num % 3 == 0:
-                _save_cursor()
-
-            if last_returned_rows < LIMIT:
-                _log(f'Short batch ({last_returned_rows}<{LIMIT}), reached end of data')
-                break
-
-            time.sleep(BATCH_SLEEP)
+        results.close()
 
         # Final save
         if not finished:
             _save_cursor()
-            finish_job(conn, job_id, status='COMPLETED')
+            if failed_windows:
+                finish_job(conn, job_id, status='PARTIAL',
+                           error=f'{len(failed_windows)} windows failed, '
+                                 f'resume from {_dt_fmt(watermark.since_ms)}')
+            else:
+                finish_job(conn, job_id, status='COMPLETED')
+        elapsed = time.time() - t_start
         _log(f'DONE: {total_inserted:,} inserted, {total_conflict:,} conflicts, '
-             f'{total_failed:,} failed, {api_errors} api_errors in {batch_num} batches')
+             f'{total_failed:,} failed, {api_errors} api_errors in {batch_num} windows '
+             f'({len(failed_windows)} failed) {elapsed:.0f}s')
 
     except KeyboardInterrupt:
         _log('Interrupted by user')
+        results.close()
         _save_cursor()
         finish_job(conn, job_id, status='PARTIAL', error='KeyboardInterrupt')
     except Exception as e:
         _log(f'FATAL: {e}')
         traceback.print_exc()
         try:
+            results.close()
             _save_cursor()
             finish_job(conn, job_id, status='FAILED', error=str(e)[:500])
         except Exception:
@@ -0,0 +1,352 @@
+"""
+backfill_indicators.py — Historical indicator backfill over the candle archive.
+
+The live indicators daemon only writes the current bar. This batch mode
+recomputes the full indicator set (BB, Ichimoku, RSI, ATR, MA, EMA, daily
+VWAP) for every bar of a date range, plus the MTF values (15m/1h EMA, ADX,
+Donchian, ATR) as of every 15m close into mtf_indicators_history.
+
+  - The range is split into UTC-day-aligned chunks (VWAP never spans two).
+  - Each chunk loads WARMUP_BARS bars before its start so windows are full,
+    computes everything vectorized (indicator_lib.indicator_frame,
+    mtf_resampler.mtf_history), and bulk-loads via COPY into a temp table
+    followed by one INSERT ... ON CONFLICT DO UPDATE.
+  - Chunks run in a process pool; each worker opens its own DB connection.
+  - Progress is saved to backfill_job_runs as a contiguous watermark
+    (done_through), so --resume is safe with out-of-order completion.
+
+Source: candles for 1m, market_ohlcv for other timeframes. MTF values use
+market_ohlcv 15m/1h bars (run aggregate_candles first).
+
+Usage:
+    python3 backfill_indicators.py --start 2025-01-01 [--end 2025-06-01]
+    python3 backfill_indicators.py --resume --workers 6 --chunk-days 3
+    python3 backfill_indicators.py --tf 5m --start 2024-01-01 --no-mtf
+"""
+import os
+import sys
+import io
+import csv
+import math
+import time
+import argparse
+import traceback
+from bisect import bisect_left
+from concurrent.futures import ProcessPoolExecutor, wait, FIRST_COMPLETED
+from datetime import datetime, timedelta, timezone
+
+sys.path.insert(0, '/root/trading-bot/app')
+from db_config import get_conn
+from backfill_utils import (
+    start_job, get_last_cursor, update_progress, finish_job,
+    check_stop, check_pause,
+)
+import indicator_lib as il
+from mtf_resampler import mtf_history
+
+LOG_PREFIX = '[backfill_indicators]'
+DEFAULT_SYMBOL = 'BTC/USDT:USDT'
+DEFAULT_START = '2023-11-01'
+DEFAULT_CHUNK_DAYS = 7
+DEFAULT_WORKERS = min(4, os.cpu_count() or 1)
+WARMUP_BARS = 300          # ma_200 + EMA settle, same as the live seed
+MIN_BARS = 120             # live daemon writes nothing below this
+MTF_WARMUP_BARS = 400      # per HTF, same as indicators.MTF_SEED_HTF_BARS
+MTF_MIN_1H_BARS = 20
+TF_MINUTES = {'1m': 1, '5m': 5, '15m': 15, '1h': 60}
+
+IND_COLS = (
+    'bb_mid', 'bb_up', 'bb_dn',
+    'ich_tenkan', 'ich_kijun', 'ich_span_a', 'ich_span_b',
+    'vol', 'vol_ma20', 'vol_spike',
+    'rsi_14', 'atr_14', 'ma_50', 'ma_200',
+    'ema_9', 'ema_21', 'ema_50', 'vwap',
+)
+MTF_COLS = (
+    'ema_15m_50', 'ema_15m_200', 'ema_1h_50', 'ema_1h_200', 'adx_1h',
+    'donchian_high_15m_20', 'donchian_low_15m_20', 'atr_15m',
+)
+
+
+def _log(msg):
+    print(f'{LOG_PREFIX} {msg}', flush=True)
+
+
+# ── Pure computation ─────────────────────────────────────
+
+def _clean(x):
+    """NaN → None, numpy scalars → Python types (for COPY)."""
+    if isinstance(x, float) and math.isnan(x):
+        return None
+    return x
+
+
+def indicator_rows(symbol, tf, rows, start):
+    """indicators rows for the bars of `rows` with ts >= start.
+
+    rows: (ts, o, h, l, c, v) ASC including warmup bars before `start`.
+    A short warmup means the archive begins inside it; bars are then only
+    emitted from the MIN_BARS-th bar on, like the live daemon.
+    """
+    if not rows:
+        return []
+    ts, cols = il.indicator_frame(rows)
+    first = bisect_left(ts, start)
+    if first < WARMUP_BARS:
+        first = max(first, MIN_BARS - 1)
+    lists = [cols[k].tolist() for k in IND_COLS]
+    out = []
+    for i in range(first, len(ts)):
+        out.append((symbol, tf, ts[i]) + tuple(_clean(col[i]) for col in lists))
+    return out
+
+
+def mtf_rows(symbol, bars_15m, bars_1h, start, end):
+    """mtf_indicators_history rows for 15m closes in [start, end)."""
+    out = []
+    for r in mtf_history(bars_15m, bars_1h):
+        if start <= r['ts'] < end and r['closed_1h'] >= MTF_MIN_1H_BARS:
+            out.append((symbol, r['ts']) + tuple(r[k] for k in MTF_COLS))
+    return out
+
+
+def day_chunks(start, end, days):
+    """[(chunk_start, chunk_end), ...] covering [start, end), UTC-day aligned."""
+    cur = start.replace(hour=0, minute=0, second=0, microsecond=0)
+    out = []
+    while cur < end:
+        nxt = min(cur + timedelta(days=days), end)
+        out.append((cur, nxt))
+        cur = nxt
+    return out
+
+
+# ── DB I/O (runs in workers) ─────────────────────────────
+
+def _fetch_bars(cur, table, symbol, tf, start, end, warmup):
+    """`warmup` bars before start plus every bar in [start, end), ASC."""
+    cur.execute(f"""
+        SELECT ts, o, h, l, c, v FROM {table}
+        WHERE symbol = %s AND tf = %s AND ts < %s
+        ORDER BY ts DESC LIMIT %s
+    """, (symbol, tf, start, warmup))
+    warm = list(reversed(cur.fetchall()))
+    cur.execute(f"""
+        SELECT ts, o, h, l, c, v FROM {table}
+        WHERE symbol = %s AND tf = %s AND ts >= %s AND ts < %s
+        ORDER BY ts ASC
+    """, (symbol, tf, start, end))
+    return warm + cur.fetchall()
+
+
+def _fetch_closed_htf(cur, symbol, tf, start, end, warmup):
+    """Closed market_ohlcv HTF bars whose close lies before `end`."""
+    minutes = TF_MINUTES[tf]
+    cur.execute("""
+        SELECT ts, o, h, l, c, v FROM market_ohlcv
+        WHERE symbol = %s AND tf = %s
+          AND ts >= %s AND ts < %s
+          AND ts + interval '1 minute' * %s <= now()
+        ORDER BY ts ASC
+    """, (symbol, tf, start - timedelta(minutes=minutes * warmup),
+          end - timedelta(minutes=minutes), minutes))
+    return cur.fetchall()
+
+
+def _copy_upsert(cur, table, key_cols, val_cols, rows):
+    """COPY rows into a temp stage, then one upsert into `table`. Returns count."""
+    if not rows:
+        return 0
+    cols = key_cols + val_cols
+    col_sql = ', '.join(cols)
+    cur.execute(f"""
+        CREATE TEMP TABLE _stage ON COMMIT DROP AS
+        SELECT {col_sql} FROM {table} WITH NO DATA
+    """)
+    buf = io.StringIO()
+    csv.writer(buf).writerows(rows)
+    buf.seek(0)
+    cur.copy_expert(f'COPY _stage ({col_sql}) FROM STDIN WITH (FORMAT csv)', buf)
+    updates = ', '.join(f'{c}=EXCLUDED.{c}' for c in val_cols)
+    cur.execute(f"""
+        INSERT INTO {table} ({col_sql})
+        SELECT {col_sql} FROM _stage
+        ON CONFLICT ({', '.join(key_cols)}) DO UPDATE SET {updates}
+    """)
+    return len(rows)
+
+
+def run_chunk(task):
+    """Compute + load one chunk. Returns a result dict (never raises)."""
+    t0 = time.time()
+    start, end = task['start'], task['end']
+    symbol, tf = task['symbol'], task['tf']
+    res = {'start': start, 'indicators': 0, 'mtf': 0, 'error': None}
+    conn = None
+    try:
+        conn = get_conn()
+        conn.autocommit = False
+        with conn.cursor() as cur:
+            cur.execute("SET statement_timeout = '600000';")
+            table = 'candles' if tf == '1m' else 'market_ohlcv'
+            rows = _fetch_bars(cur, table, symbol, tf, start, end, WARMUP_BARS)
+            ind = indicator_rows(symbol, tf, rows, start)
+            mtf = []
+            if task['mtf']:
+                b15 = _fetch_closed_htf(cur, symbol, '15m', start, end, MTF_WARMUP_BARS)
+                b1h = _fetch_closed_htf(cur, symbol, '1h', start, end, MTF_WARMUP_BARS)
+                mtf = mtf_rows(symbol, b15, b1h, start, end)
+            if task['dryrun']:
+                res['indicators'], res['mtf'] = len(ind), len(mtf)
+            else:
+                res['indicators'] = _copy_upsert(
+                    cur, 'indicators', ('symbol', 'tf', 'ts'), IND_COLS, ind)
+                conn.commit()
+                res['mtf'] = _copy_upsert(
+                    cur, 'mtf_indicators_history', ('symbol', 'ts'), MTF_COLS, mtf)
+                conn.commit()
+    except Exception as e:
+        res['error'] = f'{type(e).__name__}: {e}'[:500]
+        if conn:
+            try:
+                conn.rollback()
+            except Exception:
+                pass
+    finally:
+        if conn:
+            conn.close()
+    res['sec'] = round(time.time() - t0, 1)
+    return res
+
+
+# ── Driver ───────────────────────────────────────────────
+
+def _watermark(chunks, done, current):
+    """Advance past every chunk completed in order. Returns (index, done_through)."""
+    i, through = current
+    while i < len(chunks) and chunks[i][0] in done:
+        through = chunks[i][1]
+        i += 1
+    return i, through
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Backfill historical indicators')
+    parser.add_argument('--symbol', default=DEFAULT_SYMBOL)
+    parser.add_argument('--tf', default='1m', choices=sorted(TF_MINUTES))
+    parser.add_argument('--start', default=DEFAULT_START, help='Start date (YYYY-MM-DD)')
+    parser.add_argument('--end', default=None, help='End date (YYYY-MM-DD), default=now')
+    parser.add_argument('--resume', action='store_true', help='Resume from last cursor')
+    parser.add_argument('--chunk-days', type=int, default=DEFAULT_CHUNK_DAYS)
+    parser.add_argument('--workers', type=int, default=DEFAULT_WORKERS)
+    parser.add_argument('--no-mtf', action='store_true', help='Skip mtf_indicators_history')
+    parser.add_argument('--dryrun', action='store_true', help='Compute and count only')
+    args = parser.parse_args()
+
+    job_name = f'backfill_indicators_{args.tf}'
+    start_dt = datetime.strptime(args.start, '%Y-%m-%d').replace(tzinfo=timezone.utc)
+    end_dt = (
+        datetime.strptime(args.end, '%Y-%m-%d').replace(tzinfo=timezone.utc)
+        if args.end
+        else datetime.now(timezone.utc)
+    )
+
+    conn = get_conn()
+    conn.autocommit = True
+
+    if args.resume:
+        cursor = get_last_cursor(conn, job_name)
+        if cursor and 'done_through' in cursor:
+            start_dt = datetime.fromisoformat(cursor['done_through'])
+            _log(f'Resuming from done_through={cursor["done_through"]}')
+
+    chunks = day_chunks(start_dt, end_dt, max(1, args.chunk_days))
+    workers = max(1, args.workers)
+    _log(f'{args.symbol} {args.tf}: {start_dt:%Y-%m-%d} → {end_dt:%Y-%m-%d %H:%M} '
+         f'chunks={len(chunks)} x {args.chunk_days}d workers={workers} '
+         f'mtf={not args.no_mtf} dryrun={args.dryrun}')
+    if not chunks:
+        conn.close()
+        return
+
+    job_id = start_job(conn, job_name, metadata={
+        'symbol': args.symbol, 'tf': args.tf, 'start': start_dt.isoformat(),
+        'end': end_dt.isoformat(), 'chunk_days': args.chunk_days, 'workers': workers,
+    })
+
+    done = set()
+    mark = (0, start_dt)
+    total_ind = total_mtf = failed = 0
+    status, error = 'COMPLETED', None
+    t0 = time.time()
+    next_idx = 0
+    pending = {}
+
+    def _progress():
+        update_progress(conn, job_id, {'done_through': mark[1].isoformat()},
+                        inserted=total_ind, updated=total_mtf, failed=failed)
+
+    try:
+        with ProcessPoolExecutor(max_workers=workers) as ex:
+            while next_idx < len(chunks) or pending:
+                # Keep at most 2 chunks per worker in flight
+                while next_idx < len(chunks) and len(pending) < workers * 2 \
+                        and status == 'COMPLETED':
+                    if check_stop() or not check_pause():
+                        _log('STOP signal received — draining in-flight chunks')
+                        status, error = 'PARTIAL', 'stopped_by_user'
+                        break
+                    cs, ce = chunks[next_idx]
+                    fut = ex.submit(run_chunk, {
+                        'symbol': args.symbol, 'tf': args.tf, 'start': cs, 'end': ce,
+                        'mtf': not args.no_mtf, 'dryrun': args.dryrun,
+                    })
+                    pending[fut] = chunks[next_idx]
+                    next_idx += 1
+                if not pending:
+                    break
+
+                finished, _ = wait(pending, return_when=FIRST_COMPLETED)
+                for fut in finished:
+                    cs, ce = pending.pop(fut)
+                    res = fut.result()
+                    if res['error']:
+                        failed += 1
+                        status, error = 'FAILED', res['error']
+                        _log(f'{cs:%Y-%m-%d}: ERROR {res["error"]}')
+                        continue
+                    done.add(cs)
+                    total_ind += res['indicators']
+                    total_mtf += res['mtf']
+                    _log(f'{cs:%Y-%m-%d}→{ce:%Y-%m-%d}: ind={res["indicators"]:,} '
+                         f'mtf={res["mtf"]:,} {res["sec"]}s '
+                         f'(total ind={total_ind:,} mtf={total_mtf:,})')
+                mark = _watermark(chunks, done, mark)
+                _progress()
+
+        _progress()
+        finish_job(conn, job_id, status=status, error=error)
+        elapsed = time.time() - t0
+        _log(f'Done ({status}). ind={total_ind:,} mtf={total_mtf:,} '
+             f'failed_chunks={failed} in {elapsed:.0f}s '
+             f'({total_ind / max(elapsed, 1e-9):,.0f} rows/s), '
+             f'done_through={mark[1]:%Y-%m-%d %H:%M}')
+
+    except KeyboardInterrupt:
+        _log('Interrupted by user')
+        _progress()
+        finish_job(conn, job_id, status='PARTIAL', error='KeyboardInterrupt')
+    except Exception as e:
+        _log(f'FATAL: {e}')
+        traceback.print_exc()
+        try:
+            _progress()
+            finish_job(conn, job_id, status='FAILED', error=str(e)[:500])
+        except Exception:
+            pass
+    finally:
+        conn.close()
+
+
+if __name__ == '__main__':
+    main()
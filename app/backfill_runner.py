@@ -49,6 +49,7 @@ JOB_MAP = {
     'news_path':     'backfill_news_path.py',
     'prune_1m':      'prune_candles_1m.py',
     'archive':       'backfill_archive.py',
+    'indicators':    'backfill_indicators.py',
 }
 
 # Aliases: common alternative names → canonical job_key
@@ -58,6 +59,7 @@ JOB_ALIASES = {
     'backfill_ohlcv_5m': 'ohlcv_5m',
     'backfill_news_path': 'news_path',
     'aggregate_candles': 'aggregate_5m',
+    'backfill_indicators': 'indicators',
 }
 
 JOB_EXTRA_ARGS = {
@@ -35,6 +35,7 @@ from db_config import get_conn
 from backfill_utils import get_running_pid, is_backfill_enabled, check_trade_switch_off
 
 LOG_PREFIX = '[backfill_scheduler]'
+SYMBOL = 'BTC/USDT:USDT'  # backfill_candles target
 APP_DIR = '/root/trading-bot/app'
 CHECK_INTERVAL_SEC = 3600  # 1 hour between checks
 MIN_GAP_MINUTES = 60  # minimum gap to trigger backfill
@@ -55,7 +56,7 @@ def _check_candles_gap(conn):
     """
     try:
         with conn.cursor() as cur:
-            cur.execute("SELECT MAX(ts) FROM candles WHERE tf='1m';")
+            cur.execute("SELECT MAX(ts) FROM candles WHERE symbol=%s AND tf='1m';", (SYMBOL,))
             row = cur.fetchone()
             if not row or not row[0]:
                 return True, 'no_data'
@@ -83,9 +84,9 @@ def _check_aggregate_needed(conn):
     """Check if 5m aggregate is behind 1m data."""
     try:
         with conn.cursor() as cur:
-            cur.execute("SELECT MAX(ts) FROM candles WHERE tf='1m';")
+            cur.execute("SELECT MAX(ts) FROM candles WHERE symbol=%s AND tf='1m';", (SYMBOL,))
             c1m = cur.fetchone()
-            cur.execute("SELECT MAX(ts) FROM market_ohlcv WHERE tf='5m';")
+            cur.execute("SELECT MAX(ts) FROM market_ohlcv WHERE symbol=%s AND tf='5m';", (SYMBOL,))
             o5m = cur.fetchone()
 
             if not c1m or not c1m[0]:
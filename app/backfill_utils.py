@@ -8,6 +8,7 @@ Bybit V5 REST API 직접 호출 헬퍼 포함.
 Usage:
     from backfill_utils import start_job, get_last_cursor, update_progress, finish_job
     from backfill_utils import fetch_bybit_kline, normalize_symbol, TF_TO_INTERVAL
+    from backfill_utils import TokenBucket
 
     job_id = start_job(conn, 'backfill_candles')
     cursor = get_last_cursor(conn, 'backfill_candles')  # resume support
@@ -18,6 +19,7 @@ import json
 import os
 import sys
 import time
+import threading
 import urllib.parse
 import urllib.request
 
@@ -308,7 +310,36 @@ def read_exit_status():
 
 # ── Bybit V5 REST API helpers ────────────────────────────
 
-BYBIT_BASE_URL = 'https://api.bybit.com'
+BYBIT_BASE_URL = os.getenv('BYBIT_REST_URL', 'https://api.bybit.com')
+
+# Bybit V5 public market endpoints: 600 requests / 5s per IP (shared by every
+# process on the host), i.e. 120 req/s hard cap.
+BYBIT_PUBLIC_RATE_PER_SEC = 120
+
+
+class TokenBucket:
+    """Thread-safe token bucket: `rate` tokens/sec, bursts up to `capacity`."""
+
+    def __init__(self, rate, capacity=None):
+        self.rate = float(rate)
+        self.capacity = float(capacity if capacity is not None else max(1.0, rate))
+        self._tokens = self.capacity
+        self._last = time.monotonic()
+        self._lock = threading.Lock()
+
+    def acquire(self, tokens=1):
+        """Block until `tokens` are available, then take them."""
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self._tokens = min(self.capacity,
+                                   self._tokens + (now - self._last) * self.rate)
+                self._last = now
+                if self._tokens >= tokens:
+                    self._tokens -= tokens
+                    return
+                wait = (tokens - self._tokens) / self.rate
+            time.sleep(wait)
 
 # ccxt-style symbol → Bybit API symbol
 def normalize_symbol(symbol):
@@ -340,7 +371,8 @@ TF_TO_INTERVAL = {
 }
 
 
-def fetch_bybit_kline(symbol, tf, start_ms, limit=200, category='linear', log_fn=None):
+def fetch_bybit_kline(symbol, tf, start_ms, limit=200, category='linear', log_fn=None,
+                      end_ms=None, raise_on_error=False):
     """Fetch kline (OHLCV) from Bybit V5 REST API directly.
 
     Args:
@@ -350,6 +382,9 @@ def fetch_bybit_kline(symbol, tf, start_ms, limit=200, category='linear', log_fn
         limit:    Number of bars (max 1000)
         category: 'linear' (USDT perp), 'inverse', 'spot'
         log_fn:   Optional logging function
+        end_ms:   Optional inclusive end time in epoch milliseconds
+        raise_on_error: Raise RuntimeError on retCode != 0 (e.g. 10006 rate
+                  limit) instead of returning an empty list
 
     Returns:
         list of [ts_ms, open, high, low, close, volume] sorted ascending by ts.
@@ -372,6 +407,8 @@ def fetch_bybit_kline(symbol, tf, start_ms, limit=200, category='linear', log_fn
         'start': str(int(start_ms)),
         'limit': str(min(int(limit), 1000)),
     }
+    if end_ms is not None:
+        params['end'] = str(int(end_ms))
 
     url = f'{BYBIT_BASE_URL}/v5/market/kline?' + urllib.parse.urlencode(params)
     req = urllib.request.Request(url, headers={'User-Agent': 'backfill-bot/1.0'})
@@ -389,6 +426,8 @@ def fetch_bybit_kline(symbol, tf, start_ms, limit=200, category='linear', log_fn
     if ret_code != 0:
         _logf(f'API ERROR: retCode={ret_code} retMsg={ret_msg} '
               f'params={params}')
+        if raise_on_error:
+            raise RuntimeError(f'bybit retCode={ret_code} retMsg={ret_msg}')
         return []
 
     if not result_list:
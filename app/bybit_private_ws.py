@@ -0,0 +1,182 @@
+"""
+bybit_private_ws.py — Authenticated Bybit v5 private WebSocket stream.
+
+One PrivateStream owns one connection to the private endpoint: it signs the
+auth request (HMAC-SHA256 of 'GET/realtime{expires}'), subscribes the
+requested topics once auth succeeds, keeps the connection alive with
+{"op": "ping"} and hands every topic message (position, wallet, order,
+execution, ...) to on_message as a parsed dict.
+
+Private topics only push changes, so on_ready() is called after every
+successful subscribe: that is where the caller takes its REST snapshot.
+run() returns when the connection drops or goes stale (no frame, pongs
+included, for stale_sec); the caller loops for reconnects, as with
+kline_stream.run().
+
+handle() processes a single frame with an explicit send function, so the
+protocol can be driven without a socket (tests, recorded sessions).
+
+Usage:
+    stream = PrivateStream(['position', 'wallet', 'order'], on_message, on_ready=snapshot)
+    while True:
+        stream.run()
+        time.sleep(backoff)
+"""
+import hashlib
+import hmac
+import json
+import os
+import threading
+import time
+
+LOG_PREFIX = '[private_ws]'
+WS_URL = os.getenv('BYBIT_WS_PRIVATE_URL', 'wss://stream.bybit.com/v5/private')
+PING_SEC = 20
+STALE_SEC = 60
+AUTH_TTL_SEC = 10
+
+
+def _log(msg):
+    print(f'{LOG_PREFIX} {msg}', flush=True)
+
+
+def sign(secret, expires_ms):
+    return hmac.new(secret.encode(), f'GET/realtime{expires_ms}'.encode(),
+                    hashlib.sha256).hexdigest()
+
+
+def auth_message(api_key, secret, expires_ms=None):
+    if expires_ms is None:
+        expires_ms = int((time.time() + AUTH_TTL_SEC) * 1000)
+    return {'op': 'auth', 'args': [api_key, expires_ms, sign(secret, expires_ms)]}
+
+
+class PrivateStream:
+    """Auth → subscribe → dispatch for one private connection."""
+
+    def __init__(self, topics, on_message, api_key=None, secret=None, url=WS_URL,
+                 on_ready=None, log_fn=None):
+        self.topics = list(topics)
+        self.on_message = on_message
+        self.on_ready = on_ready
+        self.api_key = api_key if api_key is not None else os.getenv('BYBIT_API_KEY', '')
+        self.secret = secret if secret is not None else os.getenv('BYBIT_SECRET', '')
+        self.url = url
+        self._log = log_fn or _log
+        self.connected = False      # authenticated and subscribed
+        self.last_msg_at = None
+        self._ws = None
+        self.stats = {'connects': 0, 'msgs': 0, 'handler_errors': 0, 'auth_failures': 0}
+
+    def _topic_of(self, topic):
+        # 'order.linear' / 'position' → subscribed base name
+        return topic.split('.', 1)[0] if topic else topic
+
+    # ── protocol ──
+
+    def on_open(self, send):
+        self.connected = False
+        self.last_msg_at = time.time()
+        self.stats['connects'] += 1
+        send(json.dumps(auth_message(self.api_key, self.secret)))
+
+    def handle(self, raw, send):
+        """Process one frame. Returns the topic dispatched, or None."""
+        try:
+            data = json.loads(raw)
+        except (TypeError, ValueError):
+            return None
+        if not isinstance(data, dict):
+            return None
+        self.last_msg_at = time.time()
+        op = data.get('op')
+        if op == 'auth':
+            if data.get('success'):
+                send(json.dumps({'op': 'subscribe', 'args': self.topics}))
+            else:
+                self.stats['auth_failures'] += 1
+                self._log(f'auth failed: {data.get("ret_msg")}')
+                self.close()
+            return None
+        if op == 'subscribe':
+            if not data.get('success'):
+                self._log(f'subscribe failed: {data.get("ret_msg")}')
+                self.close()
+                return None
+            self.connected = True
+            self._log(f'subscribed {", ".join(self.topics)}')
+            if self.on_ready is not None:
+                try:
+                    self.on_ready()
+                except Exception as e:
+                    self.stats['handler_errors'] += 1
+                    self._log(f'on_ready error: {e}')
+            return None
+        topic = data.get('topic')
+        if not topic or op in ('pong', 'ping'):
+            return None
+        self.stats['msgs'] += 1
+        try:
+            self.on_message(data)
+        except Exception as e:
+            self.stats['handler_errors'] += 1
+            self._log(f'{topic} handler error: {e}')
+        return topic
+
+    def alive(self, stale_sec=STALE_SEC):
+        return (self.connected and self.last_msg_at is not None
+                and time.time() - self.last_msg_at <= stale_sec)
+
+    def close(self):
+        self.connected = False
+        ws = self._ws
+        if ws is not None:
+            try:
+                ws.close()
+            except Exception:
+                pass
+
+    # ── connection ──
+
+    def run(self, ping_sec=PING_SEC, stale_sec=STALE_SEC):
+        """Stream until the connection drops (or goes stale). Returns on close."""
+        import websocket
+        done = threading.Event()
+
+        def _on_open(ws):
+            self._log('WS connected, authenticating')
+            self.on_open(ws.send)
+
+        def _on_message(ws, message):
+            self.handle(message, ws.send)
+
+        def _on_error(ws, error):
+            self._log(f'WS error: {error}')
+
+        def _on_close(ws, code, msg):
+            self.connected = False
+            self._log(f'WS closed: code={code} msg={msg}')
+
+        ws = websocket.WebSocketApp(self.url, on_open=_on_open, on_message=_on_message,
+                                    on_error=_on_error, on_close=_on_close)
+        self._ws = ws
+
+        def _keepalive():
+            while not done.wait(min(ping_sec, stale_sec)):
+                if self.last_msg_at is not None and time.time() - self.last_msg_at > stale_sec:
+                    self._log(f'no frame for {stale_sec}s — reconnecting')
+                    self.close()
+                    return
+                try:
+                    ws.send(json.dumps({'op': 'ping'}))
+                except Exception:
+                    return
+
+        t = threading.Thread(target=_keepalive, daemon=True)
+        t.start()
+        try:
+            ws.run_forever()
+        finally:
+            done.set()
+            self.connected = False
+            self._ws = None
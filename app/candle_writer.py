@@ -0,0 +1,155 @@
+"""
+candle_writer.py — Bulk OHLCV upsert with a last-written bar cache.
+
+Shared write path for candles / market_ohlcv. Instead of one INSERT per row
+and rewriting bars that did not change:
+
+  - Rows identical to what this process last wrote for (symbol, tf, ts)
+    are dropped before they reach the DB (in-memory cache, CACHE_BARS per
+    series). Duplicate ts within one call keep the last row.
+  - The rest go out as ONE INSERT ... VALUES statement (execute_values), or
+    for large batches (>= COPY_MIN_ROWS) as COPY into a session temp table
+    followed by one INSERT ... SELECT.
+  - ON CONFLICT DO UPDATE only fires when a value actually differs
+    (IS DISTINCT FROM), so a cold cache after restart does not produce dead
+    tuples either.
+
+Every call returns {'written', 'skipped'}: rows the DB inserted/updated vs
+rows dropped by the cache or found unchanged. Running totals are in
+CandleWriter.totals.
+
+The cache is updated when the statement succeeds. If the caller's
+transaction is later rolled back, call discard(symbol, tf) so the bars are
+sent again.
+
+Usage:
+    import candle_writer
+    res = candle_writer.upsert_ohlcv(cur, 'candles', symbol, '1m', ohlcv)
+    # ohlcv: [[ts_ms, o, h, l, c, v], ...] (ccxt / Bybit order)
+"""
+import io
+import csv
+
+from psycopg2.extras import execute_values
+
+LOG_PREFIX = '[candle_writer]'
+CACHE_BARS = 1500
+COPY_MIN_ROWS = 1000
+TABLES = ('candles', 'market_ohlcv')
+
+
+def _log(msg):
+    print(f'{LOG_PREFIX} {msg}', flush=True)
+
+
+def _upsert_tail(table):
+    return f"""
+        ON CONFLICT (symbol, tf, ts) DO UPDATE
+        SET o=EXCLUDED.o, h=EXCLUDED.h, l=EXCLUDED.l,
+            c=EXCLUDED.c, v=EXCLUDED.v
+        WHERE ({table}.o, {table}.h, {table}.l, {table}.c, {table}.v)
+              IS DISTINCT FROM
+              (EXCLUDED.o, EXCLUDED.h, EXCLUDED.l, EXCLUDED.c, EXCLUDED.v)
+    """
+
+
+class CandleWriter:
+    """Bulk upserter for one OHLCV table (candles or market_ohlcv)."""
+
+    def __init__(self, table, cache_bars=CACHE_BARS, copy_min_rows=COPY_MIN_ROWS):
+        if table not in TABLES:
+            raise ValueError(f'unsupported table: {table}')
+        self.table = table
+        self.cache_bars = cache_bars
+        self.copy_min_rows = copy_min_rows
+        self._cache = {}           # (symbol, tf) → {ts_ms: (o, h, l, c, v)}
+        self.totals = {'calls': 0, 'written': 0, 'skipped': 0}
+
+    def discard(self, symbol=None, tf=None):
+        """Forget cached bars (all series if symbol is None)."""
+        if symbol is None:
+            self._cache.clear()
+        else:
+            self._cache.pop((symbol, tf), None)
+
+    def _changed(self, symbol, tf, ohlcv):
+        """Rows (ts_ms, o, h, l, c, v) not matching the cache, last-wins per ts."""
+        seen = self._cache.get((symbol, tf), {})
+        latest = {}
+        for r in ohlcv:
+            ts = int(r[0])
+            latest[ts] = tuple(float(x) for x in r[1:6])
+        return [(ts,) + vals for ts, vals in sorted(latest.items())
+                if seen.get(ts) != vals]
+
+    def _remember(self, symbol, tf, rows):
+        seen = self._cache.setdefault((symbol, tf), {})
+        for r in rows:
+            seen[r[0]] = r[1:]
+        if len(seen) > self.cache_bars * 5 // 4:
+            for ts in sorted(seen)[:-self.cache_bars]:
+                del seen[ts]
+
+    def _insert_values(self, cur, symbol, tf, rows):
+        execute_values(
+            cur,
+            f'INSERT INTO {self.table} (symbol, tf, ts, o, h, l, c, v) VALUES %s'
+            + _upsert_tail(self.table),
+            [(symbol, tf) + r for r in rows],
+            template='(%s, %s, to_timestamp(%s/1000.0), %s, %s, %s, %s, %s)',
+            page_size=len(rows),
+        )
+        return cur.rowcount
+
+    def _insert_copy(self, cur, symbol, tf, rows):
+        stage = f'_cw_stage_{self.table}'
+        cur.execute(f"""
+            CREATE TEMP TABLE IF NOT EXISTS {stage} (
+                ts_ms BIGINT, o DOUBLE PRECISION, h DOUBLE PRECISION,
+                l DOUBLE PRECISION, c DOUBLE PRECISION, v DOUBLE PRECISION
+            )
+        """)
+        cur.execute(f'TRUNCATE {stage}')
+        buf = io.StringIO()
+        csv.writer(buf).writerows(rows)
+        buf.seek(0)
+        cur.copy_expert(f'COPY {stage} (ts_ms, o, h, l, c, v) FROM STDIN WITH (FORMAT csv)', buf)
+        cur.execute(f"""
+            INSERT INTO {self.table} (symbol, tf, ts, o, h, l, c, v)
+            SELECT %s, %s, to_timestamp(ts_ms / 1000.0), o, h, l, c, v FROM {stage}
+        """ + _upsert_tail(self.table), (symbol, tf))
+        return cur.rowcount
+
+    def upsert(self, cur, symbol, tf, ohlcv):
+        """Upsert [[ts_ms, o, h, l, c, v], ...]. Returns {'written', 'skipped'}."""
+        ohlcv = list(ohlcv or [])
+        rows = self._changed(symbol, tf, ohlcv)
+        written = 0
+        if rows:
+            if len(rows) >= self.copy_min_rows:
+                written = self._insert_copy(cur, symbol, tf, rows)
+            else:
+                written = self._insert_values(cur, symbol, tf, rows)
+            written = max(written, 0)
+            self._remember(symbol, tf, rows)
+        res = {'written': written, 'skipped': len(ohlcv) - written}
+        self.totals['calls'] += 1
+        self.totals['written'] += res['written']
+        self.totals['skipped'] += res['skipped']
+        return res
+
+
+_writers = {}
+
+
+def get_writer(table):
+    """Process-wide writer (and cache) for `table`."""
+    w = _writers.get(table)
+    if w is None:
+        w = _writers[table] = CandleWriter(table)
+    return w
+
+
+def upsert_ohlcv(cur, table, symbol, tf, ohlcv):
+    """Shortcut for get_writer(table).upsert(...)."""
+    return get_writer(table).upsert(cur, symbol, tf, ohlcv)
@@ -1,106 +1,145 @@
-import os
+"""
+candles.py — Live 1m candle logger.
+
+Streams Bybit's public kline topic (kline_stream) and upserts only bars that
+changed or closed, instead of re-sending 200 REST rows every 15s. Gaps
+(startup, reconnects, failed writes) are filled over REST by the stream.
+
+Every symbol from market_symbols.get_symbols() (SYMBOLS env) shares one
+WebSocket connection and one DB connection; per-symbol lag goes to
+pipeline_lag (stage 'candles'). Each written bar close is published on
+db_notify.CANDLE_CLOSE.
+"""
 import time
 import traceback
 
-import ccxt
 from psycopg2 import OperationalError, InterfaceError
 from dotenv import load_dotenv
 from db_config import get_conn
+import candle_writer
+import db_notify
+import kline_stream
+from db_migrations import ensure_pipeline_lag
+from market_symbols import get_symbols, LagTracker
 
 load_dotenv()
 
-SYMBOL = "BTC/USDT:USDT"
+SYMBOLS = get_symbols()
+SYMBOL = SYMBOLS[0]
 TF = "1m"
-LIMIT = 200
-
-def make_exchange():
-    return ccxt.bybit({
-        "apiKey": os.getenv("BYBIT_API_KEY"),
-        "secret": os.getenv("BYBIT_SECRET"),
-        "enableRateLimit": True,
-        "timeout": 20000,
-        "options": {"defaultType": "swap"},
-    })
+RECONNECT_MAX_SEC = 60
 
 def connect_db():
     return get_conn(autocommit=False)
 
-def upsert_ohlcv(conn, ohlcv):
+def upsert_ohlcv(conn, ohlcv, symbol=SYMBOL):
+    """Bulk upsert of changed bars + commit. Returns {'written', 'skipped'}."""
     with conn.cursor() as cur:
-        for ms, o, h, l, c, v in ohlcv:
-            cur.execute(
-                """
-                INSERT INTO candles(symbol, tf, ts, o, h, l, c, v)
-                VALUES (%s, %s, to_timestamp(%s/1000.0), %s, %s, %s, %s, %s)
-                ON CONFLICT (symbol, tf, ts) DO UPDATE
-                SET o=EXCLUDED.o, h=EXCLUDED.h, l=EXCLUDED.l, c=EXCLUDED.c, v=EXCLUDED.v
-                """,
-                (SYMBOL, TF, ms, o, h, l, c, v),
-            )
+        res = candle_writer.upsert_ohlcv(cur, "candles", symbol, TF, ohlcv)
     conn.commit()
+    return res
 
 def log(msg):
     print(msg, flush=True)
 
+def last_stored_ms(conn, symbols=None):
+    """{symbol: ts (epoch ms) of the newest stored bar or None}, one query."""
+    symbols = list(symbols or SYMBOLS)
+    with conn.cursor() as cur:
+        cur.execute(
+            "SELECT symbol, extract(epoch FROM max(ts)) * 1000 FROM candles "
+            "WHERE symbol = ANY(%s) AND tf=%s GROUP BY symbol",
+            (symbols, TF),
+        )
+        found = {sym: int(ms) for sym, ms in cur.fetchall() if ms is not None}
+    conn.commit()
+    return {sym: found.get(sym) for sym in symbols}
+
 def main():
     from watchdog_helper import init_watchdog
     init_watchdog(interval_sec=10)
 
-    exchange = make_exchange()
-    backoff = 5
-    last_saved_ms = None
-
-    log("=== CANDLE LOGGER STARTED (RESILIENT) ===")
+    log(f"=== CANDLE LOGGER STARTED (WS) === symbols={','.join(SYMBOLS)}")
 
-    # DB 연결은 실패할 수 있으니 루프 안에서 보장
+    # DB 연결은 실패할 수 있으니 write 시점에 보장
     db = None
+    lag = LagTracker("candles")
 
-    while True:
-        try:
+    def make_write(symbol):
+        def write(bars):
+            nonlocal db
             if db is None or db.closed != 0:
                 db = connect_db()
-
-            ohlcv = exchange.fetch_ohlcv(SYMBOL, timeframe=TF, limit=LIMIT)
-            if not ohlcv:
-                log("[candles] empty ohlcv, sleep 10s")
-                time.sleep(10)
-                continue
-
-            last_ms = ohlcv[-1][0]
-            if last_saved_ms is not None and last_ms == last_saved_ms:
-                # Intra-bar: update current candle only
-                upsert_ohlcv(db, ohlcv[-1:])
-                time.sleep(15)
-                continue
-
-            upsert_ohlcv(db, ohlcv)
-            last_saved_ms = last_ms
-
-            log(f"[candles] Saved {TF} last_ts_ms={last_ms}")
-            backoff = 5
-            time.sleep(15)
-
-        except (ccxt.RequestTimeout, ccxt.NetworkError) as e:
-            log(f"[candles] network error: {repr(e)} | retry in {backoff}s")
-            time.sleep(backoff)
-            backoff = min(backoff * 2, 120)
-
-        except (OperationalError, InterfaceError) as e:
-            log(f"[candles] DB error: {repr(e)} | reconnect in {backoff}s")
             try:
-                if db:
+                upsert_ohlcv(db, bars, symbol)
+            except (OperationalError, InterfaceError):
+                try:
                     db.close()
+                except Exception:
+                    pass
+                db = None
+                candle_writer.get_writer("candles").discard(symbol, TF)
+                raise
             except Exception:
-                pass
+                db.rollback()
+                candle_writer.get_writer("candles").discard(symbol, TF)
+                raise
+            lag.observe(symbol, bars[-1][0])
+            lag.maybe_flush(db)
+        return write
+
+    def make_on_close(symbol):
+        def on_close(bars):
+            if db is None or db.closed != 0:
+                return
+            try:
+                with db.cursor() as cur:
+                    db_notify.notify(cur, db_notify.CANDLE_CLOSE,
+                                     {"symbol": symbol, "tf": TF, "ts": bars[-1][0]})
+                db.commit()
+            except Exception:
+                db.rollback()
+                raise
+        return on_close
+
+    last_ms = None
+    backoff = 5
+    while last_ms is None:
+        try:
+            db = connect_db()
+            with db.cursor() as cur:
+                ensure_pipeline_lag(cur)
+            db.commit()
+            last_ms = last_stored_ms(db)
+        except (OperationalError, InterfaceError) as e:
+            log(f"[candles] DB error: {repr(e)} | retry in {backoff}s")
             db = None
             time.sleep(backoff)
             backoff = min(backoff * 2, 120)
 
+    streams = [
+        kline_stream.KlineStream(
+            sym, TF, make_write(sym), last_ms=last_ms.get(sym),
+            on_close=make_on_close(sym),
+            log_fn=lambda m, tag=kline_stream.normalize_symbol(sym): log(f"[candles:{tag}] {m}"),
+        )
+        for sym in SYMBOLS
+    ]
+    backoff = 1
+    while True:
+        started = time.time()
+        try:
+            kline_stream.run(streams)
         except Exception as e:
             log(f"[candles] unexpected error: {repr(e)}")
             log(traceback.format_exc())
-            time.sleep(backoff)
-            backoff = min(backoff * 2, 120)
+        if time.time() - started > 60:
+            backoff = 1
+        stats = {s.symbol: s.stats for s in streams}
+        log(f"[candles] stream down, reconnect in {backoff}s | stats={stats} "
+            f"lag={lag.lags()} db={candle_writer.get_writer('candles').totals}")
+        time.sleep(backoff)
+        backoff = min(backoff * 2, RECONNECT_MAX_SEC)
 
 if __name__ == "__main__":
     main()
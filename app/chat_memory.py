@@ -15,8 +15,8 @@ def _log(msg):
 
 
 def _get_conn():
-    from db_config import get_conn
-    return get_conn()
+    from db_config import get_pooled_conn
+    return get_pooled_conn('rw')
 
 
 def save_turn(chat_id, role, content, metadata=None, tool_name=None):
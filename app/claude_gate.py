@@ -426,8 +426,11 @@ def call_claude(gate: str, prompt: str, cooldown_key: str = '',
         _log(f'call_claude: invalid call_type={call_type!r}, falling back to AUTO')
         call_type = CALL_TYPE_AUTO
     try:
-        return _call_claude_inner(gate, prompt, cooldown_key, context, max_tokens,
-                                  call_type)
+        import perf_trace
+        perf_trace.count('claude')
+        with perf_trace.span('claude'):
+            return _call_claude_inner(gate, prompt, cooldown_key, context, max_tokens,
+                                      call_type)
     except Exception as e:
         _log(f'call_claude error (call_type={call_type}): {e}')
         return {'fallback_used': True, 'gate_reason': f'error: {e}',
@@ -0,0 +1,296 @@
+"""
+config_store.py — Cached policy / config store with change notification.
+
+Hot paths used to re-read slow-changing config on every call:
+score_engine._load_weights (score_weights + openclaw_policies twice per
+cycle), news_event_scorer._load_watch_keywords (openclaw_policies per call),
+while feature_flags / strategy_v3.config_v3 cached YAML until a manual
+reload().
+
+  DB policies  PolicyStore: openclaw_policies + latest score_weights row,
+               loaded together into a frozen PolicySnapshot. Reloaded after
+               POLICY_TTL_SEC, or on the next lookup after a NOTIFY on
+               db_notify.OPENCLAW_POLICIES / SCORE_WEIGHTS (change triggers
+               from db_migrations.ensure_notify_triggers).
+  YAML files   YamlFile: re-stat at most every FILE_CHECK_SEC; an mtime/size
+               change re-parses the file and calls on_change subscribers
+               (feature_flags.reload, config_v3.reload).
+
+Values are frozen: mappings become MappingProxyType, lists become tuples.
+Between reloads a lookup is a dict read. Every load is FAIL-OPEN: a failed
+reload keeps the previous snapshot and retries after RETRY_SEC.
+
+Usage:
+    import config_store
+    snap = config_store.policies(cur)
+    kw = snap.get('watch_keywords', ())
+    flags = config_store.strategy_modes().section('feature_flags')
+"""
+import json
+import os
+import threading
+import time
+from dataclasses import dataclass, field
+from types import MappingProxyType
+
+LOG_PREFIX = '[config_store]'
+
+POLICY_TTL_SEC = float(os.getenv('CONFIG_POLICY_TTL_SEC', '60'))
+FILE_CHECK_SEC = float(os.getenv('CONFIG_FILE_CHECK_SEC', '1'))
+RETRY_SEC = 5
+WATCH_WAIT_SEC = 1.0
+
+STRATEGY_MODES_PATH = os.path.join(os.path.dirname(__file__),
+                                   'config', 'strategy_modes.yaml')
+SCORE_WEIGHT_COLS = ('tech_w', 'position_w', 'regime_w', 'news_event_w')
+
+_EMPTY = MappingProxyType({})
+
+
+def _log(msg):
+    print(f'{LOG_PREFIX} {msg}', flush=True)
+
+
+def freeze(value):
+    """Recursively read-only copy: dict → MappingProxyType, list → tuple."""
+    if isinstance(value, dict):
+        return MappingProxyType({k: freeze(v) for k, v in value.items()})
+    if isinstance(value, (list, tuple)):
+        return tuple(freeze(v) for v in value)
+    return value
+
+
+# ── DB policies ──
+
+@dataclass(frozen=True)
+class PolicySnapshot:
+    """openclaw_policies (key → decoded JSON value) and the newest
+    score_weights row (empty when the table has none) at loaded_at."""
+    policies: MappingProxyType = field(default_factory=lambda: _EMPTY)
+    score_weights: MappingProxyType = field(default_factory=lambda: _EMPTY)
+    loaded_at: float = 0.0
+    version: int = 0
+
+    def get(self, key, default=None):
+        return self.policies.get(key, default)
+
+
+def _decode(value):
+    if isinstance(value, (str, bytes)):
+        try:
+            return json.loads(value)
+        except ValueError:
+            return value
+    return value
+
+
+def _query_policies(cur):
+    cur.execute('SELECT key, value FROM openclaw_policies;')
+    policies = {k: _decode(v) for k, v in cur.fetchall()}
+    weights = {}
+    try:
+        cur.execute(f"""
+            SELECT {', '.join(SCORE_WEIGHT_COLS)}
+            FROM score_weights ORDER BY id DESC LIMIT 1;
+        """)
+        row = cur.fetchone()
+        if row:
+            weights = {c: float(v) for c, v in zip(SCORE_WEIGHT_COLS, row) if v is not None}
+    except Exception as e:
+        _log(f'score_weights load failed: {e}')
+    return policies, weights
+
+
+class PolicyStore:
+    """TTL cache of DB policies, invalidated early by NOTIFY.
+
+    get(cur) reads through cur when given (same connection/transaction as
+    the caller), else a pooled read-only connection. The LISTEN watcher is
+    a daemon thread started on first use (and again after fork).
+    """
+
+    def __init__(self, ttl=POLICY_TTL_SEC, query=_query_policies, listen=True,
+                 log_fn=None):
+        self.ttl = ttl
+        self._query = query
+        self._listen = listen
+        self._log = log_fn or _log
+        self._snap = PolicySnapshot()
+        self._expires = 0.0
+        self._lock = threading.Lock()
+        self._watcher_pid = None
+        self.stats = {'hits': 0, 'loads': 0, 'errors': 0, 'invalidations': 0}
+
+    def invalidate(self):
+        """Reload on the next get()."""
+        self._expires = 0.0
+        self.stats['invalidations'] += 1
+
+    def get(self, cur=None):
+        self._ensure_watcher()
+        if time.time() < self._expires:
+            self.stats['hits'] += 1
+            return self._snap
+        with self._lock:
+            if time.time() < self._expires:
+                self.stats['hits'] += 1
+                return self._snap
+            self._reload(cur)
+            return self._snap
+
+    def _reload(self, cur):
+        conn = None
+        try:
+            if cur is None:
+                from db_config import get_pooled_conn
+                conn = get_pooled_conn('ro', autocommit=True)
+                cur = conn.cursor()
+            policies, weights = self._query(cur)
+        except Exception as e:
+            self.stats['errors'] += 1
+            self._log(f'policy load FAIL-OPEN (keeping v{self._snap.version}): {e}')
+            self._expires = time.time() + RETRY_SEC
+            return
+        finally:
+            if conn is not None:
+                conn.close()
+        now = time.time()
+        self._snap = PolicySnapshot(freeze(policies), freeze(weights), now,
+                                    self._snap.version + 1)
+        self._expires = now + self.ttl
+        self.stats['loads'] += 1
+
+    def _ensure_watcher(self):
+        if not self._listen or self._watcher_pid == os.getpid():
+            return
+        with self._lock:
+            if self._watcher_pid == os.getpid():
+                return
+            self._watcher_pid = os.getpid()
+            threading.Thread(target=self._watch, name='config_store-listen',
+                             daemon=True).start()
+
+    def _watch(self):
+        import db_notify
+        listener = db_notify.Listener(
+            [db_notify.OPENCLAW_POLICIES, db_notify.SCORE_WEIGHTS], log_fn=self._log)
+        while True:
+            try:
+                if listener.wait(WATCH_WAIT_SEC):
+                    self.invalidate()
+            except Exception as e:
+                self._log(f'watcher error: {e}')
+                time.sleep(RETRY_SEC)
+
+
+_policy_store = None
+_store_lock = threading.Lock()
+
+
+def policy_store():
+    global _policy_store
+    if _policy_store is None:
+        with _store_lock:
+            if _policy_store is None:
+                _policy_store = PolicyStore()
+    return _policy_store
+
+
+def policies(cur=None):
+    """Current PolicySnapshot (cached; see PolicyStore)."""
+    return policy_store().get(cur)
+
+
+# ── YAML files ──
+
+class YamlFile:
+    """Parsed YAML file, re-read when its mtime/size changes.
+
+    The file is stat()ed at most every check_sec; a change re-parses it and
+    calls every on_change(callback). A missing or unparsable file reads as
+    empty (the previous content is kept if a re-parse fails).
+    """
+
+    def __init__(self, path, check_sec=FILE_CHECK_SEC, log_fn=None):
+        self.path = path
+        self.check_sec = check_sec
+        self._log = log_fn or _log
+        self._data = None
+        self._stamp = None
+        self._next_check = 0.0
+        self._subscribers = []
+        self._lock = threading.Lock()
+        self.version = 0
+
+    def on_change(self, callback):
+        if callback not in self._subscribers:
+            self._subscribers.append(callback)
+
+    def _stat(self):
+        try:
+            st = os.stat(self.path)
+            return (st.st_mtime_ns, st.st_size)
+        except OSError:
+            return None
+
+    def _parse(self):
+        import yaml
+        try:
+            with open(self.path, 'r') as f:
+                return freeze(yaml.safe_load(f) or {})
+        except Exception as e:
+            self._log(f'{os.path.basename(self.path)} load failed: {e}')
+            return None
+
+    def check(self):
+        """Reload if the file changed. Returns True when it was reloaded."""
+        now = time.time()
+        if self._data is not None and now < self._next_check:
+            return False
+        with self._lock:
+            self._next_check = now + self.check_sec
+            stamp = self._stat()
+            if self._data is not None and stamp == self._stamp:
+                return False
+            first = self._data is None
+            data = self._parse()
+            if data is None:
+                if not first:
+                    return False
+                data = _EMPTY
+            self._data, self._stamp = data, stamp
+            self.version += 1
+        if not first:
+            self._log(f'{os.path.basename(self.path)} changed → v{self.version}')
+            for cb in list(self._subscribers):
+                try:
+                    cb()
+                except Exception as e:
+                    self._log(f'on_change error: {e}')
+        return not first
+
+    def data(self):
+        self.check()
+        return self._data
+
+    def section(self, name):
+        val = self.data().get(name)
+        return val if isinstance(val, MappingProxyType) else _EMPTY
+
+
+_yaml_files = {}
+
+
+def yaml_file(path):
+    """Shared YamlFile per path."""
+    path = os.path.abspath(path)
+    with _store_lock:
+        f = _yaml_files.get(path)
+        if f is None:
+            f = _yaml_files[path] = YamlFile(path)
+    return f
+
+
+def strategy_modes():
+    """config/strategy_modes.yaml."""
+    return yaml_file(STRATEGY_MODES_PATH)
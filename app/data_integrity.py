@@ -310,7 +310,8 @@ def check_pre_live_gate(conn):
             # ── WARN checks ──
 
             # 2) 1m history coverage in days
-            cur.execute("SELECT MIN(ts), MAX(ts) FROM candles WHERE tf='1m';")
+            cur.execute("SELECT MIN(ts), MAX(ts) FROM candles WHERE symbol=%s AND tf='1m';",
+                        (SYMBOL,))
             row = cur.fetchone()
             if row and row[0] and row[1]:
                 min_ts, max_ts = row
@@ -325,7 +326,8 @@ def check_pre_live_gate(conn):
                         f'(need >= {MIN_1M_DAYS}d)')
 
             # 3) 5m history coverage in days
-            cur.execute("SELECT MIN(ts), MAX(ts) FROM market_ohlcv WHERE tf='5m';")
+            cur.execute("SELECT MIN(ts), MAX(ts) FROM market_ohlcv WHERE symbol=%s AND tf='5m';",
+                        (SYMBOL,))
             row = cur.fetchone()
             if row and row[0] and row[1]:
                 min_ts, max_ts = row
@@ -505,8 +507,8 @@ def _compute_data_integrity_score_recent(cur):
     # 1m recent 24h
     cur.execute("""
         SELECT COUNT(*) FROM candles
-        WHERE tf='1m' AND ts >= now() - interval '24 hours';
-    """)
+        WHERE symbol=%s AND tf='1m' AND ts >= now() - interval '24 hours';
+    """, (SYMBOL,))
     count_1m = cur.fetchone()[0]
     expected_1m = 1440
     coverage_1m = min(1.0, count_1m / expected_1m) if expected_1m > 0 else 0
@@ -516,8 +518,8 @@ def _compute_data_integrity_score_recent(cur):
     # 5m recent 24h
     cur.execute("""
         SELECT COUNT(*) FROM market_ohlcv
-        WHERE tf='5m' AND ts >= now() - interval '24 hours';
-    """)
+        WHERE symbol=%s AND tf='5m' AND ts >= now() - interval '24 hours';
+    """, (SYMBOL,))
     count_5m = cur.fetchone()[0]
     expected_5m = 288
     coverage_5m = min(1.0, count_5m / expected_5m) if expected_5m > 0 else 0
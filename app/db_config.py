@@ -9,8 +9,30 @@ Usage:
 
     # or for dict config:
     from db_config import DB_CONFIG
+
+    # pooled (long-running daemons): close() returns the connection to the pool
+    from db_config import get_pooled_conn
+    conn = get_pooled_conn(role='ro', autocommit=True)
+    try:
+        with conn.cursor() as cur:
+            ...
+    finally:
+        conn.close()
+
+Pools are process-wide, one per role:
+  rw — read-write, statement_timeout DB_RW_STATEMENT_TIMEOUT_MS (30s)
+  ro — default_transaction_read_only, statement_timeout DB_RO_STATEMENT_TIMEOUT_MS (15s)
+A connection idle longer than DB_POOL_PING_SEC is pinged (SELECT 1) before
+reuse; dead or over-age connections are dropped and replaced. pool_stats()
+returns checkout/wait/reconnect counters per role.
+
+Connections from get_conn() / the pools use CountingCursor, which counts
+each execute() as a 'db' call on the active perf_trace span (no-op when
+no cycle is being traced).
 """
 import os
+import threading
+import time
 from dotenv import load_dotenv
 
 load_dotenv('/root/trading-bot/app/.env')
@@ -40,9 +62,255 @@ SQLALCHEMY_URL = (
 )
 
 
+_cursor_class = None
+
+
+def counting_cursor():
+    """psycopg2 cursor class that reports each query to perf_trace.count('db')."""
+    global _cursor_class
+    if _cursor_class is None:
+        import psycopg2.extensions
+        import perf_trace
+
+        class CountingCursor(psycopg2.extensions.cursor):
+            def execute(self, query, vars=None):
+                perf_trace.count('db')
+                return super().execute(query, vars)
+
+            def executemany(self, query, vars_list):
+                perf_trace.count('db')
+                return super().executemany(query, vars_list)
+
+        _cursor_class = CountingCursor
+    return _cursor_class
+
+
 def get_conn(autocommit=False):
     """Create a new psycopg2 connection using centralized config."""
     import psycopg2
-    conn = psycopg2.connect(**DB_CONFIG)
+    conn = psycopg2.connect(**DB_CONFIG, cursor_factory=counting_cursor())
     conn.autocommit = autocommit
     return conn
+
+
+# ── Connection pool ──────────────────────────────────────
+
+POOL_MAX = int(os.getenv('DB_POOL_MAX', '8'))
+POOL_WAIT_SEC = float(os.getenv('DB_POOL_WAIT_SEC', '10'))
+POOL_PING_SEC = float(os.getenv('DB_POOL_PING_SEC', '30'))
+POOL_MAX_AGE_SEC = float(os.getenv('DB_POOL_MAX_AGE_SEC', '3600'))
+
+ROLE_OPTIONS = {
+    'rw': '-c statement_timeout=%d' % int(os.getenv('DB_RW_STATEMENT_TIMEOUT_MS', '30000')),
+    'ro': '-c statement_timeout=%d -c default_transaction_read_only=on'
+          % int(os.getenv('DB_RO_STATEMENT_TIMEOUT_MS', '15000')),
+}
+
+
+class PoolTimeout(Exception):
+    """No connection became free within the wait budget."""
+
+
+class PooledConnection:
+    """psycopg2 connection proxy; close() hands the connection back to its pool."""
+
+    def __init__(self, pool, raw):
+        object.__setattr__(self, '_pool', pool)
+        object.__setattr__(self, '_raw', raw)
+
+    def __getattr__(self, name):
+        raw = self._raw
+        if raw is None:
+            if name == 'closed':
+                return 1
+            raise AttributeError(f'pooled connection already returned ({name})')
+        return getattr(raw, name)
+
+    def __setattr__(self, name, value):
+        setattr(self._raw, name, value)
+
+    def __enter__(self):
+        self._raw.__enter__()
+        return self
+
+    def __exit__(self, *exc):
+        return self._raw.__exit__(*exc)
+
+    def close(self):
+        raw = self._raw
+        if raw is None:
+            return
+        object.__setattr__(self, '_raw', None)
+        self._pool.release(raw)
+
+    def __del__(self):
+        # callers that skip close() on an error path must not leak a slot
+        try:
+            self.close()
+        except Exception:
+            pass
+
+
+class ConnectionPool:
+    """Thread-safe LIFO pool of psycopg2 connections for one role."""
+
+    def __init__(self, role, maxconn=POOL_MAX, connect=None):
+        self.role = role
+        self.maxconn = maxconn
+        self._connect = connect or (lambda: _connect_role(role))
+        self._cond = threading.Condition()
+        self._idle = []            # [(raw, created_ts, returned_ts)]
+        self._born = {}            # id(raw) -> created_ts for checked-out conns
+        self._size = 0
+        self.stats = {'checkouts': 0, 'created': 0, 'reconnects': 0,
+                      'waits': 0, 'wait_ms': 0.0, 'timeouts': 0, 'discarded': 0}
+
+    def _alive(self, raw, created, returned, now):
+        if raw.closed or now - created > POOL_MAX_AGE_SEC:
+            return False
+        if now - returned < POOL_PING_SEC:
+            return True
+        try:
+            with raw.cursor() as cur:
+                cur.execute('SELECT 1;')
+            if not raw.autocommit:
+                raw.rollback()
+            return True
+        except Exception:
+            return False
+
+    def _drop(self, raw):
+        try:
+            raw.close()
+        except Exception:
+            pass
+
+    def getconn(self, autocommit=False, timeout=POOL_WAIT_SEC):
+        deadline = None
+        while True:
+            with self._cond:
+                if self._idle:
+                    raw, created, returned = self._idle.pop()
+                elif self._size < self.maxconn:
+                    self._size += 1
+                    raw = None
+                else:
+                    if deadline is None:
+                        deadline = time.time() + timeout
+                        self.stats['waits'] += 1
+                        t0 = time.time()
+                    left = deadline - time.time()
+                    if left <= 0:
+                        self.stats['timeouts'] += 1
+                        raise PoolTimeout(f'{self.role} pool exhausted ({self.maxconn} in use)')
+                    self._cond.wait(left)
+                    continue
+            now = time.time()
+            dead = raw is not None and not self._alive(raw, created, returned, now)
+            if dead:
+                self._drop(raw)
+                raw = None
+            fresh = raw is None
+            try:
+                if fresh:
+                    raw = self._connect()
+                    created = now
+                raw.autocommit = autocommit
+            except Exception:
+                if raw is not None:
+                    self._drop(raw)
+                with self._cond:
+                    self._size -= 1
+                    self.stats['discarded'] += dead
+                    self._cond.notify()
+                raise
+            with self._cond:
+                if deadline is not None:
+                    self.stats['wait_ms'] += (now - t0) * 1000
+                self.stats['created'] += fresh
+                self.stats['reconnects'] += dead
+                self.stats['checkouts'] += 1
+                self._born[id(raw)] = created
+            return PooledConnection(self, raw)
+
+    def release(self, raw):
+        with self._cond:
+            created = self._born.pop(id(raw), 0)
+        keep = not raw.closed
+        if keep:
+            try:
+                import psycopg2.extensions as ext
+                if raw.get_transaction_status() != ext.TRANSACTION_STATUS_IDLE:
+                    raw.rollback()
+            except Exception:
+                keep = False
+        with self._cond:
+            if keep:
+                self._idle.append((raw, created, time.time()))
+            else:
+                self._size -= 1
+                self.stats['discarded'] += 1
+            self._cond.notify()
+        if not keep:
+            self._drop(raw)
+
+    def closeall(self):
+        with self._cond:
+            idle, self._idle = self._idle, []
+            self._size -= len(idle)
+        for raw, _, _ in idle:
+            self._drop(raw)
+
+    def snapshot(self):
+        with self._cond:
+            return dict(self.stats, role=self.role, size=self._size,
+                        idle=len(self._idle), in_use=self._size - len(self._idle))
+
+
+def _connect_role(role):
+    import psycopg2
+    return psycopg2.connect(**dict(DB_CONFIG, options=ROLE_OPTIONS[role]),
+                            cursor_factory=counting_cursor())
+
+
+_pools = {}
+_pools_pid = None
+_pools_lock = threading.Lock()
+
+
+def get_pool(role='rw'):
+    """Process-wide pool for role ('rw' | 'ro'). Rebuilt after fork."""
+    global _pools_pid
+    if role not in ROLE_OPTIONS:
+        raise ValueError(f'unknown db role: {role}')
+    with _pools_lock:
+        if _pools_pid != os.getpid():
+            # connections inherited over fork belong to the parent
+            _pools.clear()
+            _pools_pid = os.getpid()
+        pool = _pools.get(role)
+        if pool is None:
+            pool = _pools[role] = ConnectionPool(role)
+        return pool
+
+
+def get_pooled_conn(role='rw', autocommit=False, timeout=POOL_WAIT_SEC):
+    """Check out a pooled connection. close() returns it; an open
+    transaction is rolled back on return."""
+    return get_pool(role).getconn(autocommit=autocommit, timeout=timeout)
+
+
+def pool_stats():
+    """{role: {checkouts, created, reconnects, waits, wait_ms, timeouts,
+    discarded, size, idle, in_use}} for pools created in this process."""
+    with _pools_lock:
+        pools = list(_pools.values()) if _pools_pid == os.getpid() else []
+    return {p.role: p.snapshot() for p in pools}
+
+
+def close_pools():
+    with _pools_lock:
+        pools = list(_pools.values())
+        _pools.clear()
+    for p in pools:
+        p.closeall()
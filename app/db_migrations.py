@@ -265,8 +265,9 @@ def ensure_indicator_columns(cur):
 
 
 def ensure_vol_profile_columns(cur):
-    '''Add VAH/VAL columns to vol_profile.'''
-    for col, dtype in (('vah', 'NUMERIC'), ('val', 'NUMERIC')):
+    '''Add VAH/VAL columns (4h, plus 1h/24h lookbacks) to vol_profile.'''
+    cols = ['vah', 'val'] + [f'{lv}_{w}' for w in ('1h', '24h') for lv in ('poc', 'vah', 'val')]
+    for col, dtype in ((c, 'NUMERIC') for c in cols):
         cur.execute(f"""
             ALTER TABLE vol_profile
                 ADD COLUMN IF NOT EXISTS {col} {dtype};
@@ -1613,6 +1614,123 @@ def ensure_panic_guard_events(cur):
     _log('ensure_panic_guard_events done')
 
 
+def ensure_mtf_indicators_history(cur):
+    """mtf_indicators_history — 15m 종가 시점별 MTF 지표 (backfill_indicators)."""
+    cur.execute("""
+        CREATE TABLE IF NOT EXISTS mtf_indicators_history (
+            symbol TEXT NOT NULL,
+            ts TIMESTAMPTZ NOT NULL,
+            ema_15m_50 REAL, ema_15m_200 REAL,
+            ema_1h_50 REAL, ema_1h_200 REAL,
+            adx_1h REAL,
+            donchian_high_15m_20 REAL, donchian_low_15m_20 REAL,
+            atr_15m REAL,
+            PRIMARY KEY (symbol, ts)
+        );
+    """)
+    _log('ensure_mtf_indicators_history done')
+
+
+def ensure_pipeline_lag(cur):
+    """pipeline_lag — 데이터 파이프라인 단계별·심볼별 지연 (market_symbols.LagTracker)."""
+    cur.execute("""
+        CREATE TABLE IF NOT EXISTS pipeline_lag (
+            stage TEXT NOT NULL,
+            symbol TEXT NOT NULL,
+            data_ts TIMESTAMPTZ,
+            lag_sec REAL,
+            cycle_ms INTEGER,
+            updated_at TIMESTAMPTZ NOT NULL DEFAULT now(),
+            PRIMARY KEY (stage, symbol)
+        );
+    """)
+    _log('ensure_pipeline_lag done')
+
+
+def ensure_perf_span_stats(cur):
+    """perf_span_stats — 데몬 사이클 span별 지연 히스토그램 (perf_trace.Tracer, 1분 윈도우)."""
+    cur.execute("""
+        CREATE TABLE IF NOT EXISTS perf_span_stats (
+            id BIGSERIAL PRIMARY KEY,
+            window_start TIMESTAMPTZ NOT NULL,
+            service TEXT NOT NULL,
+            span TEXT NOT NULL,
+            n INTEGER NOT NULL,
+            p50_ms REAL,
+            p95_ms REAL,
+            p99_ms REAL,
+            max_ms REAL,
+            total_ms REAL,
+            db_calls INTEGER NOT NULL DEFAULT 0,
+            api_calls INTEGER NOT NULL DEFAULT 0,
+            counters JSONB,
+            created_at TIMESTAMPTZ NOT NULL DEFAULT now()
+        );
+    """)
+    cur.execute("""
+        CREATE INDEX IF NOT EXISTS idx_perf_span_stats_service_ts
+        ON perf_span_stats (service, window_start DESC);
+    """)
+    _log('ensure_perf_span_stats done')
+
+
+def ensure_order_latency_log(cur):
+    """order_latency_log — 주문 단계별 시각 (생성→클레임→검증→전송→거래소 응답, order_latency)."""
+    cur.execute("""
+        CREATE TABLE IF NOT EXISTS order_latency_log (
+            id BIGSERIAL PRIMARY KEY,
+            ts TIMESTAMPTZ NOT NULL DEFAULT now(),
+            source TEXT NOT NULL,
+            item_id BIGINT,
+            action_type TEXT,
+            order_id TEXT,
+            outcome TEXT,
+            created_at TIMESTAMPTZ,
+            claimed_at TIMESTAMPTZ,
+            validated_at TIMESTAMPTZ,
+            sent_at TIMESTAMPTZ,
+            acked_at TIMESTAMPTZ
+        );
+    """)
+    cur.execute('CREATE INDEX IF NOT EXISTS idx_order_latency_log_ts ON order_latency_log (ts DESC);')
+    _log('ensure_order_latency_log done')
+
+
+def ensure_execution_queue_claim_column(cur):
+    '''execution_queue.claimed_at — PICKED 클레임 lease 기준 시각 (live_order_executor).'''
+    cur.execute('ALTER TABLE execution_queue ADD COLUMN IF NOT EXISTS claimed_at TIMESTAMPTZ;')
+    _log('ensure_execution_queue_claim_column done')
+
+
+def ensure_notify_triggers(cur):
+    """AFTER INSERT → pg_notify(table) on queue tables (db_notify.TRIGGER_TABLES);
+    AFTER INSERT/UPDATE/DELETE on config tables (db_notify.CHANGE_TRIGGER_TABLES)."""
+    cur.execute("""
+        CREATE OR REPLACE FUNCTION notify_table_insert() RETURNS trigger
+        LANGUAGE plpgsql AS $$
+        BEGIN
+            PERFORM pg_notify(TG_TABLE_NAME, '{}');
+            RETURN NULL;
+        END
+        $$;
+    """)
+    from db_notify import TRIGGER_TABLES, CHANGE_TRIGGER_TABLES
+    for tables, name, events in ((TRIGGER_TABLES, 'trg_notify_insert', 'INSERT'),
+                                 (CHANGE_TRIGGER_TABLES, 'trg_notify_change',
+                                  'INSERT OR UPDATE OR DELETE')):
+        for table in tables:
+            cur.execute('SELECT to_regclass(%s);', (table,))
+            if cur.fetchone()[0] is None:
+                continue
+            cur.execute(f'DROP TRIGGER IF EXISTS {name} ON {table};')
+            cur.execute(f"""
+                CREATE TRIGGER {name}
+                AFTER {events} ON {table}
+                FOR EACH STATEMENT EXECUTE PROCEDURE notify_table_insert();
+            """)
+    _log('ensure_notify_triggers done')
+
+
 def run_all():
     '''Run all migrations. Safe to call multiple times.'''
     conn = None
@@ -1798,6 +1916,14 @@ def run_all():
             ensure_event_decision_log(cur)
             # Claude periodic review proposals
             ensure_proposals(cur)
+            # Historical MTF values for backfill_indicators
+            ensure_mtf_indicators_history(cur)
+            ensure_pipeline_lag(cur)
+            ensure_perf_span_stats(cur)
+            ensure_order_latency_log(cur)
+            ensure_execution_queue_claim_column(cur)
+            # LISTEN/NOTIFY on queue inserts / config changes (after the tables exist)
+            ensure_notify_triggers(cur)
         _log('run_all complete')
     except Exception as e:
         _log(f'run_all error: {e}')
@@ -0,0 +1,164 @@
+"""
+db_notify.py — Postgres LISTEN/NOTIFY wakeups between daemons.
+
+Producers publish on bar close / new work instead of consumers polling:
+
+  candle_close      candles.py, after a 1m bar's confirm is written
+  indicator_update  indicators.py, after a closed bar's indicators are saved
+  execution_queue   AFTER INSERT trigger (db_migrations.ensure_notify_triggers)
+  signals_action_v3 AFTER INSERT trigger
+  execution_log     AFTER INSERT trigger (orders sent → fill_watcher)
+  openclaw_policies AFTER INSERT/UPDATE/DELETE trigger (config_store)
+  score_weights     AFTER INSERT/UPDATE/DELETE trigger (config_store)
+
+Table channels use triggers so every INSERT site (autopilot, telegram,
+position_manager, ...) notifies without code changes. Payloads are JSON
+objects ({} for table channels) and only a hint: consumers still read the
+tables, so a lost notification costs at most one poll interval.
+
+Consumers keep their poll loop and replace time.sleep(POLL_SEC) with
+wait_for(listener, POLL_SEC): it returns early on a notification and falls
+back to a plain sleep while the listen connection is down.
+
+Usage:
+    listener = db_notify.Listener([db_notify.EXECUTION_QUEUE])
+    while True:
+        cycle()
+        db_notify.wait_for(listener, POLL_SEC)
+"""
+import json
+import select
+import time
+
+LOG_PREFIX = '[db_notify]'
+
+CANDLE_CLOSE = 'candle_close'
+INDICATOR_UPDATE = 'indicator_update'
+EXECUTION_QUEUE = 'execution_queue'
+SIGNALS_ACTION_V3 = 'signals_action_v3'
+EXECUTION_LOG = 'execution_log'
+OPENCLAW_POLICIES = 'openclaw_policies'
+SCORE_WEIGHTS = 'score_weights'
+CHANNELS = (CANDLE_CLOSE, INDICATOR_UPDATE, EXECUTION_QUEUE, SIGNALS_ACTION_V3, EXECUTION_LOG,
+            OPENCLAW_POLICIES, SCORE_WEIGHTS)
+TRIGGER_TABLES = (EXECUTION_QUEUE, SIGNALS_ACTION_V3, EXECUTION_LOG)
+CHANGE_TRIGGER_TABLES = (OPENCLAW_POLICIES, SCORE_WEIGHTS)
+
+RECONNECT_SEC = 30
+
+
+def _log(msg):
+    print(f'{LOG_PREFIX} {msg}', flush=True)
+
+
+def _check(channel):
+    if channel not in CHANNELS:
+        raise ValueError(f'unknown channel: {channel}')
+
+
+def notify(cur, channel, payload=None):
+    """Queue a notification; delivered when cur's transaction commits."""
+    _check(channel)
+    cur.execute('SELECT pg_notify(%s, %s);',
+                (channel, json.dumps(payload or {}, default=str)))
+
+
+class Listener:
+    """Dedicated autocommit connection LISTENing on `channels`.
+
+    Not pooled: LISTEN is session state. On connection loss wait() sleeps
+    out its timeout (poll fallback) and reconnects after RECONNECT_SEC.
+    """
+
+    def __init__(self, channels, connect=None, log_fn=None):
+        for ch in channels:
+            _check(ch)
+        self.channels = tuple(channels)
+        self._connect = connect
+        self._log = log_fn or _log
+        self.conn = None
+        self._retry_at = 0
+        self.stats = {'wakeups': 0, 'timeouts': 0, 'notifies': 0, 'reconnects': 0}
+
+    def _open(self):
+        if self.conn is not None:
+            return True
+        if time.time() < self._retry_at:
+            return False
+        try:
+            if self._connect is not None:
+                conn = self._connect()
+            else:
+                from db_config import get_conn
+                conn = get_conn(autocommit=True)
+            conn.autocommit = True
+            with conn.cursor() as cur:
+                for ch in self.channels:
+                    cur.execute(f'LISTEN {ch};')
+        except Exception as e:
+            self._log(f'listen connect failed, polling: {e}')
+            self._retry_at = time.time() + RECONNECT_SEC
+            return False
+        self.conn = conn
+        self.stats['reconnects'] += 1
+        return True
+
+    def close(self):
+        conn, self.conn = self.conn, None
+        if conn is not None:
+            try:
+                conn.close()
+            except Exception:
+                pass
+
+    def _drain(self):
+        out = []
+        while self.conn.notifies:
+            n = self.conn.notifies.pop(0)
+            try:
+                payload = json.loads(n.payload) if n.payload else {}
+            except ValueError:
+                payload = {'raw': n.payload}
+            out.append((n.channel, payload))
+        self.stats['notifies'] += len(out)
+        return out
+
+    def wait(self, timeout):
+        """[(channel, payload), ...] received within timeout ([] on timeout)."""
+        if not self._open():
+            time.sleep(max(0.0, timeout))
+            return []
+        try:
+            got = self._drain()
+            if not got:
+                ready, _, _ = select.select([self.conn], [], [], max(0.0, timeout))
+                if ready:
+                    self.conn.poll()
+                    got = self._drain()
+        except Exception as e:
+            self._log(f'listen connection lost, polling: {e}')
+            self.close()
+            return []
+        self.stats['wakeups' if got else 'timeouts'] += 1
+        return got
+
+
+def wait_for(listener, timeout, match=None):
+    """Block up to timeout until a notification passes match(channel, payload).
+
+    Returns the matching notifications ([] on timeout). listener=None is a
+    plain sleep, so callers can disable LISTEN without changing their loop.
+    """
+    if listener is None:
+        time.sleep(timeout)
+        return []
+    deadline = time.time() + timeout
+    while True:
+        left = deadline - time.time()
+        if left <= 0:
+            return []
+        got = listener.wait(left)
+        if match is not None:
+            got = [n for n in got if match(*n)]
+        if got:
+            return got
@@ -0,0 +1,800 @@
+"""
+decision_replay.py — Accelerated replay of the autopilot V3 decision chain.
+
+Feeds historical 1m bars through the decision code autopilot_daemon runs
+live, one cycle per closed bar, as fast as the code runs:
+
+  direction score → regime_reader → autopilot_daemon._run_v3 (regime_v3,
+  score_v3, MTF gate, mode cooloff, risk_v3, adaptive L1/L4/L5) → entry
+  guards (post-close / zone re-entry / post-SL / RANGE hourly cap /
+  consec-loss / V3 SL cooldown / V3 signal debounce) → emission gate → OPEN
+
+  Tape          candles (1m + 5m), 1m indicators, vol_profile, market_context
+                and mtf_indicators_history for a range, read with one
+                set-based query pair per table into numpy columns;
+                state_at(i) builds the MarketState a live cycle would have
+                loaded at that bar's close
+  SimClock      replaces `time` in the decision modules, so hysteresis,
+                cooldowns and staleness run on bar time
+  SimExchange   one position at a time: market fill at the bar close
+                (slippage + taker fee), SL/TP from risk_v3 checked against
+                later bars' high/low (stop first when both are touched)
+  ReplayCursor  answers the queries the chain still issues (adaptive state,
+                execution_log results, position, mark price, V3 debounce
+                keys) from memory;
+                the entry guards get a GuardContext built from the simulated
+                fills and take their no-query path
+  TraceWriter   one row per cycle → columnar .npz (load_trace() reads it)
+
+Not replayed (no history, or they need the live DB): the regime / news
+score axes (direction score = tech + position axes with
+score_engine.DEFAULT_WEIGHTS), strategy v2 routing, order_throttle,
+reconcile, the V1 RANGE filters, shock/no-trade-zone freezes, triggers and
+the ADD path (an open position is held until SL/TP). ff_night_session_gate
+reads the wall clock, so it is forced off unless set with --flag.
+
+Flags and V3 parameters are config/strategy_modes.yaml with overrides on
+top (V3 itself forced on), so a changed threshold can be checked against
+months of bars before it reaches the YAML. Each run reports cycles/s and
+× real time (live: one cycle per 1m bar).
+
+Usage:
+    python3 decision_replay.py --start 2025-06-01 --end 2025-09-01
+    python3 decision_replay.py --start 2025-06-01 --flag ff_adaptive_layers=on --set adx_breakout_min=25
+    python3 decision_replay.py --start 2025-06-01 --cache /tmp/tape.npz --out /tmp/trace.npz
+"""
+import os
+import sys
+import json
+import time
+import argparse
+import contextlib
+from collections import Counter
+from datetime import datetime, timezone
+from types import MappingProxyType
+
+import numpy as np
+
+sys.path.insert(0, '/root/trading-bot/app')
+import guard_context
+from market_state import (
+    MarketState, CANDLES_1M, CLOSES_5M, INDICATOR_ROWS, VOL_PROFILE_ROWS,
+    INDICATOR_COLS, CONTEXT_COLS, MTF_COLS,
+)
+
+LOG_PREFIX = '[decision_replay]'
+SYMBOL = 'BTC/USDT:USDT'
+BAR_SEC = 60
+MTF_FRESH_SEC = 900 + BAR_SEC   # history is stamped per 15m close; the live row is refreshed in between
+FEE_RATE = 0.00055              # taker, each side
+SLIPPAGE_BPS = 2                # market entries and stops
+NOTIONAL_USDT = 1000.0          # per entry, × risk_v3 stage_slice_mult
+GUARD_CLOSES = 6                # guard_context.load reads the last 6 1m closes
+CLOCK_MODULES = (
+    'autopilot_daemon', 'regime_reader', 'mtf_direction', 'market_state',
+    'strategy_v3.regime_v3', 'strategy_v3.adaptive_v3',
+)
+FORCED_FLAGS = {'ff_night_session_gate': 'off'}
+CLOSE_TYPES = ('CLOSE', 'FULL_CLOSE', 'REDUCE', 'REVERSE_CLOSE')
+
+_EMPTY = MappingProxyType({})
+
+# table → (source, columns, extra WHERE, rows kept before start)
+_TABLES = {
+    'candles': ('candles', ('o', 'h', 'l', 'c', 'v'), "AND tf = '1m'", CANDLES_1M),
+    'candles_5m': ('candles', ('c',), "AND tf = '5m'", CLOSES_5M),
+    'indicators': ('indicators', INDICATOR_COLS, "AND tf = '1m'", INDICATOR_ROWS),
+    'vol_profile': ('vol_profile', ('poc', 'vah', 'val'), '', VOL_PROFILE_ROWS),
+    'market_context': ('market_context',
+                       tuple(c for c in CONTEXT_COLS if c != 'age_seconds'), '', 1),
+    'mtf': ('mtf_indicators_history',
+            tuple(c for c in MTF_COLS if c != 'updated_at'), '', 1),
+}
+_TEXT_COLS = frozenset(('regime', 'shock_type', 'price_vs_va'))
+_BOOL_COLS = frozenset(('vol_spike', 'breakout_confirmed'))
+
+
+def _log(msg):
+    print(f'{LOG_PREFIX} {msg}', flush=True)
+
+
+def _nan_none(values):
+    return [None if v != v else v for v in values]
+
+
+# ── tape ──
+
+def _columns(names, rows):
+    """Rows → {column: ndarray}: floats (NaN = NULL), text ('' = NULL), bools (int8, -1 = NULL)."""
+    cols = list(zip(*rows)) if rows else [()] * len(names)
+    out = {}
+    for name, vals in zip(names, cols):
+        if name in _TEXT_COLS:
+            out[name] = np.array(['' if v is None else str(v) for v in vals], dtype=str)
+        elif name in _BOOL_COLS:
+            out[name] = np.array([-1 if v is None else int(bool(v)) for v in vals], dtype=np.int8)
+        else:
+            out[name] = np.array([np.nan if v is None else float(v) for v in vals], dtype=np.float64)
+    return out
+
+
+def _fetch(cur, name, symbol, start, end):
+    table, cols, where, warmup = _TABLES[name]
+    sel = ', '.join(['extract(epoch FROM ts)'] + [
+        c if c in _TEXT_COLS or c in _BOOL_COLS else f'{c}::float8' for c in cols])
+    cur.execute(f"""
+        SELECT {sel} FROM {table}
+        WHERE symbol = %s {where} AND ts < %s
+        ORDER BY ts DESC LIMIT %s;
+    """, (symbol, start, warmup))
+    rows = cur.fetchall()[::-1]
+    cur.execute(f"""
+        SELECT {sel} FROM {table}
+        WHERE symbol = %s {where} AND ts >= %s AND ts < %s
+        ORDER BY ts;
+    """, (symbol, start, end))
+    rows.extend(cur.fetchall())
+    return _columns(('ts',) + cols, rows)
+
+
+def _py(arr, j):
+    v = arr[j]
+    if arr.dtype.kind == 'U':
+        return str(v) or None
+    if arr.dtype.kind == 'i':
+        return None if v < 0 else bool(v)
+    v = float(v)
+    return None if v != v else v
+
+
+class Tape:
+    """Historical rows of one symbol as numpy columns, one dict per table.
+
+    Bars before start_ts are warmup, so the first replayed MarketState is as
+    full as a live one; bars [first, len) are replayed. end_ts is the range
+    end the tables were read for (kept with a saved tape).
+    """
+
+    def __init__(self, symbol, tables, start_ts, end_ts=None):
+        self.symbol = symbol
+        self.tables = tables
+        self.start_ts = float(start_ts)
+        self.end_ts = None if end_ts is None else float(end_ts)
+        self.ts = tables['candles']['ts']
+        self.first = int(np.searchsorted(self.ts, self.start_ts))
+        close = self.ts + BAR_SEC
+        # last row of each table visible at bar i's close: closed 5m buckets,
+        # the bar's own indicator row, daemon-written rows stamped by then
+        edges = {'candles_5m': close - 300, 'indicators': self.ts}
+        self._asof = {name: np.searchsorted(cols['ts'], edges.get(name, close), side='right') - 1
+                      for name, cols in tables.items() if name != 'candles'}
+        c = tables['candles']
+        self._bars = list(zip(
+            [datetime.fromtimestamp(t, timezone.utc) for t in self.ts.tolist()],
+            *(_nan_none(c[k].tolist()) for k in ('o', 'h', 'l', 'c', 'v'))))
+        self._ind = {}
+
+    def __len__(self):
+        return len(self.ts)
+
+    def bar(self, i):
+        """(ts, o, h, l, c, v) of bar i."""
+        return self._bars[i]
+
+    def _at(self, name, i):
+        asof = self._asof.get(name)
+        return int(asof[i]) if asof is not None else -1
+
+    def _row(self, name, j):
+        return {c: _py(a, j) for c, a in self.tables[name].items() if c != 'ts'}
+
+    def _indicator(self, j):
+        row = self._ind.get(j)
+        if row is None:
+            row = self._ind[j] = MappingProxyType(self._row('indicators', j))
+            if len(self._ind) > 4 * INDICATOR_ROWS:
+                for old in [k for k in self._ind if k <= j - INDICATOR_ROWS]:
+                    del self._ind[old]
+        return row
+
+    def state_at(self, i, now, position=_EMPTY):
+        """MarketState as load_market_state would have returned it at `now`."""
+        t = self.tables
+        candles = tuple(reversed(self._bars[max(0, i - CANDLES_1M + 1):i + 1]))
+
+        j = self._at('candles_5m', i)
+        closes_5m = ()
+        if j >= 0:
+            closes_5m = tuple(_nan_none(t['candles_5m']['c'][max(0, j - CLOSES_5M + 1):j + 1][::-1].tolist()))
+
+        j = self._at('indicators', i)
+        indicators = tuple(self._indicator(k) for k in range(j, max(-1, j - INDICATOR_ROWS), -1))
+
+        j = self._at('vol_profile', i)
+        vol_profile = ()
+        if j >= 0:
+            lo = max(0, j - VOL_PROFILE_ROWS + 1)
+            vp = t['vol_profile']
+            vol_profile = tuple(zip(*(_nan_none(vp[k][lo:j + 1][::-1].tolist())
+                                      for k in ('poc', 'vah', 'val'))))
+
+        context = _EMPTY
+        j = self._at('market_context', i)
+        if j >= 0:
+            row = self._row('market_context', j)
+            row['age_seconds'] = now - float(t['market_context']['ts'][j])
+            context = MappingProxyType(row)
+
+        mtf = _EMPTY
+        j = self._at('mtf', i)
+        if j >= 0:
+            row = self._row('mtf', j)
+            ts = float(t['mtf']['ts'][j])
+            row['updated_at'] = datetime.fromtimestamp(
+                now if now - ts <= MTF_FRESH_SEC else ts, timezone.utc)
+            mtf = MappingProxyType(row)
+
+        return MarketState(
+            symbol=self.symbol, loaded_at=now, candles=candles, closes_5m=closes_5m,
+            indicators=indicators, vol_profile=vol_profile, market_context=context,
+            mtf=mtf, position=position)
+
+    def save(self, path):
+        arrays = {f'{name}.{col}': a for name, cols in self.tables.items() for col, a in cols.items()}
+        if self.end_ts is not None:
+            arrays['_end'] = np.array(self.end_ts)
+        np.savez_compressed(path, _symbol=np.array(self.symbol),
+                            _start=np.array(self.start_ts), **arrays)
+
+    @classmethod
+    def load(cls, path, start=None, end=None, symbol=None):
+        """Tape saved by save().
+
+        With start/end (and symbol), raises ValueError unless the tape was
+        loaded for that same range (and symbol); tapes without a recorded end
+        are rejected too.
+        """
+        tables = {}
+        with np.load(path) as z:
+            for key in z.files:
+                if not key.startswith('_'):
+                    name, col = key.split('.', 1)
+                    tables.setdefault(name, {})[col] = z[key]
+            tape_sym = str(z['_symbol'])
+            start_ts = float(z['_start'])
+            end_ts = float(z['_end']) if '_end' in z.files else None
+        if start is not None and end is not None:
+            if end_ts is None or [start_ts, end_ts] != [start.timestamp(), end.timestamp()]:
+                got = 'no range' if end_ts is None else ' ~ '.join(
+                    datetime.fromtimestamp(t, timezone.utc).isoformat() for t in (start_ts, end_ts))
+                raise ValueError(f'{path} holds another range ({got}); '
+                                 f'delete it or pass the matching --start/--end')
+        if symbol and tape_sym != symbol:
+            raise ValueError(f'{path} holds {tape_sym}, not {symbol}')
+        return cls(tape_sym, tables, start_ts, end_ts)
+
+
+def load_tape(cur, symbol, start, end):
+    """Read [start, end) plus warmup rows of every table the chain reads (12 queries)."""
+    tables = {name: _fetch(cur, name, symbol, start, end) for name in _TABLES}
+    return Tape(symbol, tables, start.timestamp(), end.timestamp())
+
+
+# ── simulated clock / venue / cursor ──
+
+class SimClock:
+    """Stand-in for the `time` module: time() returns the replayed bar time."""
+
+    def __init__(self, now=0.0):
+        self.now = float(now)
+
+    def time(self):
+        return self.now
+
+    def __getattr__(self, name):   # perf_counter, monotonic, sleep, ...
+        return getattr(time, name)
+
+
+class SimExchange:
+    """Single-position venue over replayed bars; `ledger` mimics execution_log."""
+
+    def __init__(self, symbol=SYMBOL, notional=NOTIONAL_USDT,
+                 fee_rate=FEE_RATE, slippage_bps=SLIPPAGE_BPS):
+        self.symbol = symbol
+        self.notional = notional
+        self.fee_rate = fee_rate
+        self.slip = slippage_bps / 1e4
+        self.position = None
+        self.ledger = []           # dicts, oldest first
+        self.equity = 0.0          # realized pnl net of fees
+        self.mark_price = None
+
+    def open(self, now, direction, price, sl_pct, tp_pct, size_mult=1.0,
+             regime_tag=None, entry_mode=None):
+        side = 1 if direction == 'LONG' else -1
+        fill = price * (1 + side * self.slip)
+        notional = self.notional * size_mult
+        self.position = {
+            'direction': direction, 'side': side, 'qty': notional / fill,
+            'entry_price': fill, 'notional': notional, 'opened_ts': now,
+            'sl': fill * (1 - side * sl_pct), 'tp': fill * (1 + side * tp_pct),
+            'regime_tag': regime_tag, 'entry_mode': entry_mode, 'peak_upnl_pct': 0.0,
+        }
+        self._record('OPEN', direction, None, now, regime_tag, entry_mode)
+
+    def on_bar(self, now, o, h, l, c):
+        """Mark to bar close; exit on SL/TP. Returns (exit_reason, pnl) or (None, 0.0)."""
+        self.mark_price = c
+        p = self.position
+        if p is None:
+            return None, 0.0
+        side = p['side']
+        hit_sl = l <= p['sl'] if side > 0 else h >= p['sl']
+        hit_tp = h >= p['tp'] if side > 0 else l <= p['tp']
+        if hit_sl:
+            # gap through the stop fills at the open
+            stop = min(o, p['sl']) if side > 0 else max(o, p['sl'])
+            return 'SL', self._close(now, stop * (1 - side * self.slip), 'SL')
+        if hit_tp:
+            return 'TP', self._close(now, max(o, p['tp']) if side > 0 else min(o, p['tp']), 'TP')
+        upnl_pct = (c / p['entry_price'] - 1) * side * 100
+        p['peak_upnl_pct'] = max(p['peak_upnl_pct'], upnl_pct)
+        return None, 0.0
+
+    def _close(self, now, price, reason):
+        p = self.position
+        pnl = (price - p['entry_price']) * p['qty'] * p['side']
+        pnl -= (p['notional'] + price * p['qty']) * self.fee_rate
+        self.equity += pnl
+        self.position = None
+        self._record('CLOSE', p['direction'], pnl, now, p['regime_tag'], p['entry_mode'], reason)
+        return pnl
+
+    def _record(self, order_type, direction, pnl, now, regime_tag, entry_mode, close_reason=None):
+        self.ledger.append({
+            'order_type': order_type, 'direction': direction, 'realized_pnl': pnl,
+            'ts': now, 'fill_ts': now, 'regime_tag': regime_tag,
+            'entry_mode': entry_mode, 'close_reason': close_reason,
+        })
+
+    def fills(self, now, hours=guard_context.HOURS):
+        """guard_context.Fill rows of the last `hours`, newest first."""
+        cutoff = now - hours * 3600
+        out = []
+        for r in reversed(self.ledger):
+            if r['ts'] < cutoff:
+                break
+            out.append(guard_context.Fill(
+                self.symbol, r['order_type'], r['direction'], r['realized_pnl'],
+                r['fill_ts'], r['ts'], r['regime_tag'], r['close_reason'] is not None))
+        return tuple(out)
+
+    def closes(self):
+        """CLOSE ledger rows, newest first."""
+        return [r for r in reversed(self.ledger) if r['order_type'] in CLOSE_TYPES]
+
+    def position_row(self):
+        """position_state row as MarketState.position."""
+        p = self.position
+        if p is None:
+            return _EMPTY
+        return MappingProxyType({
+            'side': 'long' if p['side'] > 0 else 'short', 'total_qty': p['qty'],
+            'avg_entry_price': p['entry_price'], 'stage': 1, 'trade_budget_used_pct': None})
+
+
+class UnsupportedQuery(Exception):
+    pass
+
+
+class ReplayCursor:
+    """In-memory stand-in for the queries the replayed chain still issues.
+
+    Anything else raises UnsupportedQuery, which the callers handle like a
+    DB error (their FAIL-OPEN path); `unsupported` counts those statements.
+    """
+
+    def __init__(self, exchange, clock):
+        self.exchange = exchange
+        self.clock = clock
+        self.kv = {}               # adaptive_layer_state
+        self.dedup = {}            # signal_dedup_log: key → last emit (bar time)
+        self.unsupported = Counter()
+        self._rows = []
+
+    def execute(self, sql, params=None):
+        self._rows = []
+        self._rows = self._answer(' '.join(sql.split()), params or ())
+
+    def fetchone(self):
+        return self._rows[0] if self._rows else None
+
+    def fetchall(self):
+        return list(self._rows)
+
+    def _answer(self, q, params):
+        ex = self.exchange
+        if 'adaptive_layer_state' in q:
+            if q.startswith('INSERT'):
+                self.kv[params[0]] = json.loads(params[1])
+                return []
+            return list(self.kv.items())
+        if 'signal_dedup_log' in q:
+            if q.startswith('INSERT'):
+                self.dedup[params[0]] = self.clock.now
+                return []
+            if q.startswith('SELECT 1 FROM'):
+                seen = self.dedup.get(params[0])
+                return [(1,)] if seen is not None and seen >= self.clock.now - float(params[1]) else []
+        if q.startswith('SELECT mark_price FROM market_data_cache'):
+            return [(ex.mark_price,)] if ex.mark_price else []
+        if 'FROM position_state' in q and 'peak_upnl_pct' in q:
+            p = ex.position
+            return [(p['entry_price'], p['peak_upnl_pct'])] if p else []
+        if q.startswith('SELECT enabled FROM trade_switch'):
+            return [(True,)]
+        if 'FROM trade_switch' in q:
+            return []
+        if 'FROM execution_log' in q:
+            rows = self._execution_log(q, params)
+            if rows is not None:
+                return rows
+        self.unsupported[q[:80]] += 1
+        raise UnsupportedQuery(q[:120])
+
+    def _execution_log(self, q, params):
+        ex = self.exchange
+        if q.startswith('SELECT extract(epoch from last_fill_at)'):
+            return [(ex.ledger[-1]['fill_ts'],)] if ex.ledger else []
+        if q.endswith('LIMIT %s'):
+            limit = int(params[-1])
+        else:
+            tail = q.rsplit('LIMIT', 1)[-1].strip()
+            if not tail.isdigit():
+                return None
+            limit = int(tail)
+        closes = ex.closes()
+        if q.startswith('SELECT realized_pnl, entry_mode, regime_tag'):
+            return [(r['realized_pnl'], r['entry_mode'], r['regime_tag']) for r in closes[:limit]]
+        if not q.startswith('SELECT realized_pnl FROM'):
+            return None
+        if 'make_interval(hours' in q:
+            cutoff = self.clock.now - float(params[0]) * 3600
+            closes = [r for r in closes if r['ts'] > cutoff]
+        if 'entry_mode = %s' in q:
+            mode, tag = params[1], params[2]
+            closes = [r for r in closes if r['entry_mode'] == mode
+                      or (r['entry_mode'] is None and r['regime_tag'] == tag)]
+        return [(r['realized_pnl'],) for r in closes[:limit]]
+
+
+# ── trace ──
+
+class TraceWriter:
+    """Per-cycle decision rows kept as columns; save() writes one .npz."""
+
+    NUMERIC = (
+        ('ts', np.float64), ('price', np.float64), ('score_pre', np.float32),
+        ('v3_modifier', np.float32), ('score_post', np.float32), ('confidence', np.int16),
+        ('side', np.int8), ('sl_pct', np.float32), ('tp_pct', np.float32),
+        ('slice_mult', np.float32), ('adaptive_penalty', np.float32), ('position', np.int8),
+        ('pnl', np.float64), ('equity', np.float64), ('cycle_us', np.float32),
+    )
+    CATEGORICAL = ('action', 'reason', 'exit', 'regime', 'v3_class', 'entry_mode')
+
+    def __init__(self):
+        self.cols = {name: [] for name, _ in self.NUMERIC}
+        self.cols.update({name: [] for name in self.CATEGORICAL})
+        self.labels = {name: {} for name in self.CATEGORICAL}
+
+    def __len__(self):
+        return len(self.cols['ts'])
+
+    def append(self, row):
+        for name, _ in self.NUMERIC:
+            v = row.get(name)
+            self.cols[name].append(np.nan if v is None else v)
+        for name in self.CATEGORICAL:
+            codes = self.labels[name]
+            self.cols[name].append(codes.setdefault(row.get(name) or '', len(codes)))
+
+    def arrays(self):
+        out = {}
+        for name, dtype in self.NUMERIC:
+            vals = self.cols[name]
+            if np.dtype(dtype).kind == 'i':
+                vals = [0 if v != v else v for v in vals]
+            out[name] = np.array(vals, dtype=dtype)
+        for name in self.CATEGORICAL:
+            out[name] = np.array(self.cols[name], dtype=np.int16)
+            out[f'{name}.labels'] = np.array(list(self.labels[name]), dtype=str)
+        return out
+
+    def save(self, path):
+        np.savez_compressed(path, **self.arrays())
+
+
+def load_trace(path):
+    """Trace .npz → {column: ndarray}, categorical columns decoded to strings."""
+    with np.load(path) as z:
+        out = {k: z[k] for k in z.files if not k.endswith('.labels')}
+        for name in TraceWriter.CATEGORICAL:
+            labels = z[f'{name}.labels']
+            out[name] = labels[out[name]] if len(labels) else out[name].astype(str)
+    return out
+
+
+# ── replay ──
+
+def direction_scores(state):
+    """score_engine.compute_total restricted to the tech + position axes."""
+    import tech_scorer
+    import position_scorer
+    from score_engine import DEFAULT_WEIGHTS, _total_to_legacy
+    tech = tech_scorer.compute(None, state=state).get('score', 0)
+    pos = position_scorer.compute(None, tech, state=state).get('score', 0)
+    total = DEFAULT_WEIGHTS['tech_w'] * tech + DEFAULT_WEIGHTS['position_w'] * pos
+    total = max(-100, min(100, round(total, 1)))
+    long_score, short_score = _total_to_legacy(total)
+    return {
+        'long_score': long_score,
+        'short_score': short_score,
+        'dominant_side': 'LONG' if total >= 0 else 'SHORT',
+        'confidence': abs(long_score - short_score),
+        'unified': {'total_score': total, 'tech_score': tech, 'position_score': pos},
+    }
+
+
+class Replay:
+    """Runs the decision chain over a Tape, one cycle per bar."""
+
+    def __init__(self, tape, flags=None, params=None, notional=NOTIONAL_USDT):
+        self.tape = tape
+        self.flags = dict(flags or {})
+        self.params = dict(params or {})
+        self.clock = SimClock()
+        self.exchange = SimExchange(tape.symbol, notional=notional)
+        self.cur = ReplayCursor(self.exchange, self.clock)
+        self.signals = {}          # alert_dedup_state stand-in: key → epoch
+        self.trace = TraceWriter()
+
+    @contextlib.contextmanager
+    def _patched(self, quiet=True):
+        """Sim clock, config overrides and fresh module state; all restored on exit."""
+        import feature_flags
+        import autopilot_daemon as ap
+        import regime_reader
+        import mtf_direction
+        from strategy_v3 import config_v3, regime_v3, adaptive_v3
+
+        flags = MappingProxyType({**feature_flags._load_section(), **FORCED_FLAGS, **self.flags})
+        v3 = MappingProxyType({**config_v3._load_v3_section(), 'enabled': True, **self.params})
+        saved = []
+
+        def put(obj, attr, value):
+            saved.append((obj, attr, getattr(obj, attr, None)))
+            setattr(obj, attr, value)
+
+        try:
+            for name in CLOCK_MODULES:
+                put(sys.modules[name], 'time', self.clock)
+            put(feature_flags, '_load_section', lambda: flags)
+            put(config_v3, '_load_v3_section', lambda: v3)
+            put(adaptive_v3, '_save_state_to_file', lambda: None)
+            put(adaptive_v3, '_load_state_from_file', lambda: None)
+            put(adaptive_v3, '_state', {})
+            adaptive_v3.reset_state()
+            put(regime_v3, '_v3_state', dict(regime_v3._v3_state))
+            regime_v3.reset_state()
+            for attr, value in (('_prev_regime', None), ('_prev_regime_ts', 0),
+                                ('_prev_regime_held_since', 0), ('_consecutive_same', 0)):
+                put(regime_reader, attr, value)
+            put(regime_reader._apply_transition_cooldown, '_pending', None)
+            put(mtf_direction, '_adx_was_above_enter', False)
+            put(ap, '_mode_cooloff_until', {})
+            put(ap, '_guard_ctx', None)
+            with contextlib.ExitStack() as stack:
+                if quiet:
+                    devnull = stack.enter_context(open(os.devnull, 'w'))
+                    stack.enter_context(contextlib.redirect_stdout(devnull))
+                yield
+        finally:
+            for obj, attr, value in reversed(saved):
+                setattr(obj, attr, value)
+
+    def run(self, start=None, stop=None, quiet=True):
+        """Replay bars [start, stop) (default: the whole range after warmup)."""
+        start = self.tape.first if start is None else start
+        stop = len(self.tape) if stop is None else stop
+        t0 = time.perf_counter()
+        with self._patched(quiet):
+            for i in range(start, stop):
+                self.step(i)
+        return self.summary(time.perf_counter() - t0)
+
+    def step(self, i):
+        t0 = time.perf_counter()
+        ex = self.exchange
+        _, o, h, l, c, _ = self.tape.bar(i)
+        now = float(self.tape.ts[i]) + BAR_SEC
+        self.clock.now = now
+        exit_reason, pnl = ex.on_bar(now, o, h, l, c)
+        state = self.tape.state_at(i, now, ex.position_row())
+        ctx = guard_context.GuardContext(
+            symbol=self.tape.symbol, now=now, fills=ex.fills(now),
+            closes_1m=tuple(b[4] for b in state.candles[:GUARD_CLOSES] if b[4] is not None),
+            mark_price=ex.mark_price,
+            signals={k: v for k, v in self.signals.items() if now - v < 3600})
+        row = {'ts': now, 'price': c, 'exit': exit_reason, 'pnl': pnl}
+        row['action'], row['reason'] = self._decide(state, ctx, row)
+        row['position'] = ex.position['side'] if ex.position else 0
+        row['equity'] = ex.equity
+        row['cycle_us'] = (time.perf_counter() - t0) * 1e6
+        self.trace.append(row)
+        return row
+
+    def _decide(self, state, ctx, row):
+        """One cycle of the chain; fills `row`, returns (action, reason)."""
+        import autopilot_daemon as ap
+        import regime_reader
+        cur, sym = self.cur, self.tape.symbol
+        ap._guard_ctx = ctx
+        glog = guard_context.GuardLog()
+
+        scores = direction_scores(state)
+        row['score_pre'] = scores['unified']['total_score']
+        regime_ctx = regime_reader.get_current_regime(cur, sym, state=state)
+        row['regime'] = regime_ctx.get('regime')
+        if regime_ctx['available'] and regime_ctx['regime'] == 'SHOCK' and regime_ctx.get('shock_type') == 'VETO':
+            return 'SKIP', 'regime_veto'
+
+        scores, v3, v3_features, _, blocked = ap._run_v3(cur, scores, regime_ctx, state, glog)
+        if v3:
+            row.update(v3_class=v3['regime_class'], entry_mode=v3['entry_mode'],
+                       v3_modifier=v3['score_modifier'], score_post=v3['post_v3_total_score'],
+                       sl_pct=v3['sl_pct'], tp_pct=v3['tp_pct'],
+                       slice_mult=v3['stage_slice_mult'],
+                       adaptive_penalty=v3.get('adaptive_penalty'))
+        if blocked:
+            return 'SKIP', blocked
+        conf = scores.get('confidence', 0)
+        dominant = scores.get('dominant_side', 'LONG')
+        row['confidence'] = conf
+        row['side'] = 1 if dominant == 'LONG' else -1
+        if self.exchange.position:
+            return 'HOLD', 'position_open'
+
+        r_params = regime_reader.get_regime_params(
+            regime_ctx.get('regime', 'UNKNOWN'), regime_ctx.get('shock_type'))
+        guards = (
+            ('post_close_cooldown', ap._check_post_close_cooldown, (cur, sym)),
+            ('zone_reentry_ban', ap._check_zone_reentry_ban, (cur, sym, dominant, regime_ctx)),
+            ('post_sl_ban', ap._check_post_sl_opposite_ban, (cur, sym)),
+            ('consec_loss_cooldown', ap._check_consec_loss_cooldown, (cur, dominant, r_params)),
+            ('v3_sl_cooldown', ap._v3_check_sl_cooldown, (cur, sym, dominant)),
+        )
+        for name, fn, args in guards:
+            if name == 'consec_loss_cooldown' and regime_ctx.get('regime') == 'RANGE':
+                if guard_context.entries_last_hour(ctx) >= r_params.get('max_entries_per_hour', 3):
+                    return 'SKIP', 'range_hourly_cap'
+            if not glog.check(name, fn, *args, ctx=ctx)[0]:
+                return 'SKIP', name
+        if v3 and not glog.check('v3_signal_debounce', ap._v3_check_signal_debounce,
+                                 cur, sym, v3, dominant, v3_features)[0]:
+            return 'SKIP', 'v3_signal_debounce'
+        ok, reason = glog.check('emit_gate', ap.should_emit_signal, cur, sym, dominant, conf,
+                                regime_ctx=regime_ctx, ctx=ctx)
+        if not ok:
+            return 'SKIP', f'emit:{reason.split(":")[0]}'
+        if conf < 25:
+            return 'SKIP', 'forced_block'
+
+        if v3:
+            ap._v3_record_signal_debounce(cur, sym, v3, dominant, v3_features)
+        v3 = v3 or {}
+        self.exchange.open(
+            ctx.now, dominant, self.exchange.mark_price,
+            v3.get('sl_pct', 0.006), v3.get('tp_pct', 0.0072), v3.get('stage_slice_mult', 1.0),
+            regime_tag=v3.get('regime_class') or regime_ctx.get('regime'),
+            entry_mode=v3.get('entry_mode'))
+        self.signals[f'autopilot:signal:{sym}:{dominant}'] = ctx.now
+        sig_key = ap._compute_signal_key(cur, sym, dominant, regime_ctx, ctx=ctx)
+        self.signals[f'autopilot:signal:{sig_key}'] = ctx.now
+        return 'OPEN', ''
+
+    def summary(self, wall_sec):
+        t = self.trace.cols
+        labels = {name: list(codes) for name, codes in self.trace.labels.items()}
+        actions = Counter(labels['action'][k] for k in t['action'])
+        reasons = Counter(labels['reason'][k] for k, a in zip(t['reason'], t['action'])
+                          if labels['action'][a] == 'SKIP')
+        pnls = [r['realized_pnl'] for r in self.exchange.ledger if r['order_type'] == 'CLOSE']
+        n = len(self.trace)
+        return {
+            'cycles': n,
+            'actions': dict(actions),
+            'top_blocks': reasons.most_common(8),
+            'trades': len(pnls),
+            'win_rate': sum(1 for p in pnls if p > 0) / len(pnls) if pnls else 0.0,
+            'pnl_usdt': round(self.exchange.equity, 2),
+            'open_at_end': self.exchange.position is not None,
+            'unsupported_queries': dict(self.cur.unsupported),
+            'wall_sec': round(wall_sec, 3),
+            'cycles_per_sec': round(n / wall_sec, 1) if wall_sec > 0 else 0.0,
+            'x_realtime': round(n * BAR_SEC / wall_sec, 1) if wall_sec > 0 else 0.0,
+        }
+
+
+# ── CLI ──
+
+def _parse_overrides(items, flag=False):
+    out = {}
+    for item in items or ():
+        key, _, raw = item.partition('=')
+        if flag:
+            out[key] = raw or 'on'
+            continue
+        try:
+            out[key] = json.loads(raw)
+        except ValueError:
+            out[key] = raw
+    return out
+
+
+def _parse_date(s):
+    return datetime.fromisoformat(s).replace(tzinfo=timezone.utc)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Replay the autopilot V3 decision chain over history')
+    parser.add_argument('--start', required=True, help='UTC date/time, e.g. 2025-06-01')
+    parser.add_argument('--end', default=None, help='UTC date/time (default: now; today 00:00 with --cache)')
+    parser.add_argument('--symbol', default=SYMBOL)
+    parser.add_argument('--flag', action='append', metavar='NAME=on|off', help='feature flag override')
+    parser.add_argument('--set', action='append', metavar='KEY=VALUE', help='strategy_v3 parameter override (JSON value)')
+    parser.add_argument('--notional', type=float, default=NOTIONAL_USDT)
+    parser.add_argument('--cache', default=None,
+                        help='tape .npz: read if present (same symbol / range only), else written after loading')
+    parser.add_argument('--out', default=None, help='write the per-cycle trace (.npz)')
+    parser.add_argument('--verbose', action='store_true', help='keep the decision modules\' logs')
+    args = parser.parse_args()
+
+    start = _parse_date(args.start)
+    if args.end:
+        end = _parse_date(args.end)
+    else:
+        end = datetime.now(timezone.utc)
+        if args.cache:      # a stable default, so the cached tape is found again
+            end = end.replace(hour=0, minute=0, second=0, microsecond=0)
+
+    t0 = time.perf_counter()
+    if args.cache and os.path.exists(args.cache):
+        try:
+            tape = Tape.load(args.cache, start, end, args.symbol)
+        except ValueError as e:
+            parser.error(str(e))
+        _log(f'tape from {args.cache}')
+    else:
+        from db_config import get_conn
+        conn = get_conn(autocommit=True)
+        try:
+            with conn.cursor() as cur:
+                tape = load_tape(cur, args.symbol, start, end)
+        finally:
+            conn.close()
+        if args.cache:
+            tape.save(args.cache)
+    _log(f'{len(tape) - tape.first} bars {start:%Y-%m-%d %H:%M} → {end:%Y-%m-%d %H:%M} '
+         f'loaded in {time.perf_counter() - t0:.1f}s')
+
+    replay = Replay(tape, flags=_parse_overrides(args.flag, flag=True),
+                    params=_parse_overrides(args.set), notional=args.notional)
+    summary = replay.run(quiet=not args.verbose)
+    if args.out:
+        replay.trace.save(args.out)
+        _log(f'trace → {args.out}')
+    print(json.dumps(summary, indent=2, default=str))
+
+
+if __name__ == '__main__':
+    main()
@@ -1,7 +1,8 @@
 """
 direction_scorer.py — Direction scoring engine (backward-compatible wrapper).
 
-Now delegates to score_engine.compute_total() for unified 5-axis scoring.
+Now delegates to score_engine.compute_total() for unified 5-axis scoring,
+read from score_publisher's latest-score slot when it is fresh for the bar.
 Falls back to legacy logic (_compute_scores_legacy) if score_engine fails.
 
 compute_scores() -> {long_score, short_score, dominant_side, confidence, context}
@@ -18,13 +19,18 @@ def _log(msg):
 
 
 def _db_conn():
-    from db_config import get_conn
-    return get_conn()
+    from db_config import get_pooled_conn
+    return get_pooled_conn('ro')
 
 
-def compute_scores():
+def compute_scores(state=None, max_age_sec=None):
     '''Compute directional scores via unified score engine.
 
+    state: market_state.MarketState of the caller's cycle, passed through
+    to score_engine.compute_total so market rows are not re-read.
+    The published score (score_publisher) is used when it was computed for
+    state's newest bar and is at most max_age_sec old.
+
     Returns legacy-compatible format:
         {
             "long_score": int (0-100),
@@ -36,8 +42,9 @@ def compute_scores():
         }
     '''
     try:
-        import score_engine
-        result = score_engine.compute_total()
+        import score_publisher
+        kw = {} if max_age_sec is None else {'max_age_sec': max_age_sec}
+        result = score_publisher.get_score(state=state, source='direction_scorer', **kw)
         return {
             'long_score': result['long_score'],
             'short_score': result['short_score'],
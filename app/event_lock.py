@@ -53,8 +53,8 @@ def _log(msg):
 
 
 def _db_conn():
-    from db_config import get_conn
-    return get_conn()
+    from db_config import get_pooled_conn
+    return get_pooled_conn('rw')
 
 
 def _ensure_conn(conn):
@@ -828,7 +828,7 @@ def _check_volume_spike(snapshot) -> list:
     return triggers
 
 
-VOL_PROFILE_MAX_AGE_SEC = 3600  # 1 hour — skip level_breaks if older
+VOL_PROFILE_MAX_AGE_SEC = 900  # vol_profile refreshes every closed bar — older means the daemon is stuck
 
 # Module-level state to detect *transitions* (not static positions)
 _prev_level_state = {'above_vah': False, 'below_val': False, 'poc_zone': None}
@@ -841,7 +841,7 @@ def _check_level_breaks(snapshot, cur=None) -> list:
     if not price:
         return triggers
 
-    # Skip if vol_profile data is stale (>1h)
+    # Skip if vol_profile data is stale (row ts = 5m slot start, so a healthy row is <6m old)
     vp_ts = snapshot.get('vol_profile_ts')
     if vp_ts:
         age = time.time() - vp_ts
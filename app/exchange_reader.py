@@ -38,6 +38,10 @@ def _get_exchange():
         'timeout': 20000,
         'options': {'defaultType': 'swap'},
     })
+    import perf_trace
+    import exchange_state
+    perf_trace.instrument_exchange(_exchange_cache)
+    exchange_state.track(_exchange_cache)
     return _exchange_cache
 
 
@@ -53,8 +57,9 @@ def fetch_position(symbol=None):
     """Fetch live exchange position. Returns dict with standardised labels."""
     sym = symbol or SYMBOL
     try:
+        import exchange_state
         ex = _get_exchange()
-        positions = ex.fetch_positions([sym])
+        positions = exchange_state.fetch_positions(ex, [sym])
         for p in positions:
             if p.get('symbol') != sym:
                 continue
@@ -103,8 +108,9 @@ def fetch_open_orders(symbol=None):
     """Fetch open orders from exchange."""
     sym = symbol or SYMBOL
     try:
+        import exchange_state
         ex = _get_exchange()
-        raw = ex.fetch_open_orders(sym)
+        raw = exchange_state.fetch_open_orders(ex, sym)
         orders = []
         for o in raw:
             orders.append({
@@ -136,8 +142,9 @@ def fetch_open_orders(symbol=None):
 def fetch_balance():
     """Fetch USDT balance from exchange."""
     try:
+        import exchange_state
         ex = _get_exchange()
-        bal = ex.fetch_balance()
+        bal = exchange_state.fetch_balance(ex)
         usdt = bal.get('USDT', {})
         return {
             'source': 'EXCHANGE',
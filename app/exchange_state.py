@@ -0,0 +1,627 @@
+"""
+exchange_state.py — Shared exchange state (position / balance / open orders).
+
+position_manager, exchange_reader, integrity_checker, orphan_cleanup,
+pnl_watcher, ... each polled fetch_positions / fetch_balance /
+fetch_open_orders on their own ccxt instance. This service keeps one copy
+of that state, fed by the Bybit private position / wallet / order streams
+(bybit_private_ws) with REST as the snapshot on (re)connect, the periodic
+reconcile (RECONCILE_SEC) and the fallback while the stream is down
+(REST_POLL_SEC). Every change bumps `version` and the whole state is
+published to a JSON slot in /dev/shm, replaced atomically.
+
+`live_at` is when the service last vouched for the state: the last frame
+(message or pong; the stream pings every PING_SEC) of a subscribed stream,
+stamped every HEARTBEAT_SEC while it is younger than MAX_AGE_SEC, or the
+end of a REST snapshot. A stream that goes quiet past MAX_AGE_SEC is not
+trusted: REST snapshots keep the slot live until frames arrive again. Stream updates that arrive while a REST snapshot is in flight
+are buffered and replayed on top of it, so the snapshot never rolls them
+back. Consumers call fetch_positions / fetch_balance / fetch_open_orders
+with their ccxt instance: the slot is used when live_at is younger than
+max_age_sec, otherwise the call goes to REST exactly as before. Results are
+ccxt-shaped (the unified keys the callers already read). Bybit does not push
+the position topic on mark-price moves, so the service keeps a mark per
+symbol with an open position: the position topic's markPrice when one
+arrives, else a ticker fetched every MARK_SEC. fetch_positions computes
+markPrice / unrealizedPnl from it, and goes to REST positions when the
+mark is older than max_age_sec.
+
+Rate-limit budget: track(ex) counts every REST request a process makes per
+endpoint and writes per-minute counters to /dev/shm; budget() sums them per
+service (/debug api_budget).
+
+Slot payload:
+    {"version", "updated_at", "live_at", "source" ('ws'|'rest'), "symbols",
+     "positions": {symbol: position}, "balance": {"USDT": {total, free, used}},
+     "orders": {symbol: [order, ...]}, "marks": {symbol: {price, at}}}
+
+Usage:
+    import exchange_state
+    exchange_state.track(ex)                                   # once per ccxt instance
+    positions = exchange_state.fetch_positions(ex, [SYMBOL])   # slot ≤ MAX_AGE_SEC, else REST
+    bal = exchange_state.fetch_balance(ex)
+"""
+import glob
+import json
+import os
+import sys
+import tempfile
+import threading
+import time
+import traceback
+from urllib.parse import urlparse
+
+LOG_PREFIX = '[exchange_state]'
+SYMBOL = os.getenv('SYMBOL', 'BTC/USDT:USDT')
+
+_SHM_DIR = '/dev/shm' if os.path.isdir('/dev/shm') else tempfile.gettempdir()
+SLOT_PATH = os.getenv('EXCHANGE_STATE_PATH', os.path.join(_SHM_DIR, 'trading_bot_exchange_state.json'))
+BUDGET_DIR = os.getenv('API_BUDGET_DIR', os.path.join(_SHM_DIR, 'trading_bot_api_budget'))
+MAX_AGE_SEC = float(os.getenv('EXCHANGE_STATE_MAX_AGE_SEC', '5'))
+HEARTBEAT_SEC = 1
+PING_SEC = 2            # private stream keepalive: a pong well inside MAX_AGE_SEC
+MARK_SEC = 2
+RECONCILE_SEC = 300
+REST_POLL_SEC = 5
+BUDGET_FLUSH_SEC = 10
+BUDGET_KEEP_MIN = 10
+# Bybit v5 HTTP limit per IP: 600 requests / 5s
+BYBIT_IP_LIMIT_PER_MIN = 7200
+
+_OPEN_STATUSES = {'New': 'open', 'PartiallyFilled': 'open', 'Untriggered': 'open'}
+_CONDITIONAL = 'Untriggered'
+
+_cache = {'stamp': None, 'slot': None}
+_cache_lock = threading.Lock()
+
+
+def _log(msg):
+    print(f'{LOG_PREFIX} {msg}', flush=True)
+
+
+def _f(v):
+    try:
+        return float(v) if v not in (None, '') else 0.0
+    except (TypeError, ValueError):
+        return 0.0
+
+
+def _bybit_symbol(symbol):
+    return symbol.split(':')[0].replace('/', '')
+
+
+def _iso(ms):
+    """ccxt 'datetime' (ISO 8601, ms, Z) for an epoch-ms timestamp, or None."""
+    if not ms:
+        return None
+    t = time.gmtime(ms / 1000)
+    return time.strftime('%Y-%m-%dT%H:%M:%S', t) + f'.{int(ms) % 1000:03d}Z'
+
+
+# ── normalisation (WS / REST → ccxt-shaped subsets) ──
+
+def _ws_position(d, symbol):
+    side = {'Buy': 'long', 'Sell': 'short'}.get(d.get('side'))
+    contracts = _f(d.get('size'))
+    return {
+        'symbol': symbol,
+        'side': side if contracts else None,
+        'contracts': contracts,
+        'entryPrice': _f(d.get('entryPrice') or d.get('avgPrice')),
+        'leverage': _f(d.get('leverage')),
+        'liquidationPrice': _f(d.get('liqPrice')),
+        'info': {'positionIdx': d.get('positionIdx'), 'seq': d.get('seq'),
+                 'updatedTime': d.get('updatedTime')},
+    }
+
+
+def _rest_position(p):
+    return {
+        'symbol': p.get('symbol'),
+        'side': p.get('side') if _f(p.get('contracts')) else None,
+        'contracts': _f(p.get('contracts')),
+        'entryPrice': _f(p.get('entryPrice')),
+        'leverage': _f(p.get('leverage')),
+        'liquidationPrice': _f(p.get('liquidationPrice')),
+        'info': {'positionIdx': (p.get('info') or {}).get('positionIdx')},
+    }
+
+
+def _ws_order(d, symbol):
+    return {
+        'id': d.get('orderId'),
+        'clientOrderId': d.get('orderLinkId') or None,
+        'symbol': symbol,
+        'side': (d.get('side') or '').lower(),
+        'type': (d.get('orderType') or '').lower(),
+        'price': _f(d.get('price')),
+        'amount': _f(d.get('qty')),
+        'filled': _f(d.get('cumExecQty')),
+        'status': _OPEN_STATUSES.get(d.get('orderStatus'), 'closed'),
+        'reduceOnly': bool(d.get('reduceOnly')),
+        'stopPrice': _f(d.get('triggerPrice')) or None,
+        'timestamp': int(_f(d.get('createdTime'))) or None,
+        'datetime': _iso(_f(d.get('createdTime'))),
+        'info': {'orderStatus': d.get('orderStatus'),
+                 'stopOrderType': d.get('stopOrderType') or ''},
+    }
+
+
+def _rest_order(o, conditional):
+    info = o.get('info') or {}
+    return {
+        'id': o.get('id'),
+        'clientOrderId': o.get('clientOrderId'),
+        'symbol': o.get('symbol'),
+        'side': o.get('side'),
+        'type': o.get('type'),
+        'price': _f(o.get('price')),
+        'amount': _f(o.get('amount')),
+        'filled': _f(o.get('filled')),
+        'status': 'open',
+        'reduceOnly': bool(o.get('reduceOnly')),
+        'stopPrice': _f(o.get('stopPrice') or o.get('triggerPrice')) or None,
+        'timestamp': o.get('timestamp'),
+        'datetime': o.get('datetime') or _iso(o.get('timestamp')),
+        'info': {'orderStatus': info.get('orderStatus') or (_CONDITIONAL if conditional else 'New'),
+                 'stopOrderType': info.get('stopOrderType') or ''},
+    }
+
+
+def _ws_balance(accounts):
+    for acct in accounts:
+        for c in acct.get('coin') or []:
+            if c.get('coin') != 'USDT':
+                continue
+            total = _f(c.get('walletBalance'))
+            free = _f(c.get('availableToWithdraw')) or _f(acct.get('totalAvailableBalance'))
+            return {'USDT': {'total': total, 'free': free, 'used': max(total - free, 0.0)}}
+    return None
+
+
+def _is_conditional(order):
+    return order['info'].get('orderStatus') == _CONDITIONAL
+
+
+# ── state (service side) ──
+
+class ExchangeState:
+    """Latest position / balance / open orders for a set of symbols."""
+
+    def __init__(self, symbols=(SYMBOL,), log_fn=None):
+        self.symbols = list(symbols)
+        self._by_bybit = {_bybit_symbol(s): s for s in self.symbols}
+        self._log = log_fn or _log
+        self._lock = threading.Lock()
+        self.positions = {}
+        self.balance = None
+        self.orders = {s: {} for s in self.symbols}
+        self.marks = {}             # symbol → {'price', 'at'}; not part of `version`
+        self.version = 0
+        self.updated_at = None
+        self.live_at = None
+        self.source = None
+        self._deltas = None         # stream messages seen while a REST snapshot runs
+        self.stats = {'ws_updates': 0, 'rest_snapshots': 0, 'rest_errors': 0, 'mark_errors': 0}
+
+    def _changed(self, source):
+        self.version += 1
+        self.updated_at = time.time()
+        self.source = source
+
+    def handle(self, msg):
+        """Apply one private-stream message. Returns True if state changed."""
+        with self._lock:
+            if self._deltas is not None:
+                self._deltas.append(msg)
+            if (msg.get('topic') or '').startswith('position'):
+                for d in msg.get('data') or []:
+                    sym = self._by_bybit.get(d.get('symbol'))
+                    if sym is not None and _f(d.get('markPrice')):
+                        self.marks[sym] = {'price': _f(d.get('markPrice')), 'at': time.time()}
+            changed = self._apply(msg)
+            if changed:
+                self.stats['ws_updates'] += 1
+                self._changed('ws')
+        return changed
+
+    def _apply(self, msg):
+        """Apply msg to the state (caller holds the lock). True if anything changed."""
+        topic = (msg.get('topic') or '').split('.', 1)[0]
+        data = msg.get('data') or []
+        changed = False
+        if topic == 'position':
+            for d in data:
+                sym = self._by_bybit.get(d.get('symbol'))
+                if sym is None or d.get('category', 'linear') != 'linear':
+                    continue
+                pos = _ws_position(d, sym)
+                if self.positions.get(sym) != pos:
+                    self.positions[sym] = pos
+                    changed = True
+        elif topic == 'wallet':
+            bal = _ws_balance(data)
+            if bal is not None and bal != self.balance:
+                self.balance = bal
+                changed = True
+        elif topic == 'order':
+            for d in data:
+                sym = self._by_bybit.get(d.get('symbol'))
+                if sym is None:
+                    continue
+                book = self.orders[sym]
+                order = _ws_order(d, sym)
+                if order['status'] == 'open':
+                    book[order['id']] = order
+                else:
+                    book.pop(order['id'], None)
+                changed = True
+        return changed
+
+    def snapshot_rest(self, ex):
+        """Replace the whole state from REST (4 calls per symbol + balance).
+
+        Stream messages handled during the fetches are newer than (or as new
+        as) what REST returned; they are replayed on top of the snapshot."""
+        with self._lock:
+            self._deltas = []
+        try:
+            positions = {}
+            for p in ex.fetch_positions(self.symbols):
+                if p.get('symbol') in self._by_bybit.values():
+                    positions[p['symbol']] = _rest_position(p)
+            for sym in self.symbols:
+                positions.setdefault(sym, _rest_position({'symbol': sym}))
+            raw_bal = ex.fetch_balance().get('USDT') or {}
+            balance = {'USDT': {'total': _f(raw_bal.get('total')), 'free': _f(raw_bal.get('free')),
+                                'used': _f(raw_bal.get('used'))}}
+            orders = {}
+            for sym in self.symbols:
+                book = {}
+                for o in ex.fetch_open_orders(sym):
+                    book[o.get('id')] = _rest_order(o, False)
+                for o in ex.fetch_open_orders(sym, params={'orderFilter': 'StopOrder'}):
+                    book[o.get('id')] = _rest_order(o, True)
+                orders[sym] = book
+        except Exception as e:
+            with self._lock:
+                self._deltas = None
+            self.stats['rest_errors'] += 1
+            self._log(f'REST snapshot error: {e}')
+            return False
+        with self._lock:
+            before = (self.positions, self.balance, self.orders)
+            self.positions, self.balance, self.orders = positions, balance, orders
+            for msg in self._deltas:
+                self._apply(msg)
+            self._deltas = None
+            changed = (self.positions, self.balance, self.orders) != before
+            if changed or self.version == 0:
+                self._changed('rest')
+            self.live_at = time.time()
+            self.stats['rest_snapshots'] += 1
+        return True
+
+    def refresh_marks(self, ex, max_age_sec=MARK_SEC):
+        """Ticker mark for each open position whose mark is older than
+        max_age_sec. Returns True if any mark was updated."""
+        with self._lock:
+            due = [s for s, p in self.positions.items()
+                   if p.get('contracts') and p.get('side')
+                   and time.time() - (self.marks.get(s) or {}).get('at', 0) >= max_age_sec]
+        updated = False
+        for sym in due:
+            try:
+                t = ex.fetch_ticker(sym)
+                mark = (_f(t.get('markPrice')) or _f((t.get('info') or {}).get('markPrice'))
+                        or _f(t.get('last')))
+            except Exception as e:
+                self.stats['mark_errors'] += 1
+                self._log(f'ticker error {sym}: {e}')
+                continue
+            if mark:
+                with self._lock:
+                    self.marks[sym] = {'price': mark, 'at': time.time()}
+                updated = True
+        return updated
+
+    def mark_live(self, at=None):
+        """Vouch for the state as of `at` (epoch s; default now)."""
+        with self._lock:
+            self.live_at = time.time() if at is None else at
+
+    def payload(self):
+        with self._lock:
+            return {
+                'version': self.version,
+                'updated_at': self.updated_at,
+                'live_at': self.live_at,
+                'source': self.source,
+                'symbols': self.symbols,
+                'positions': dict(self.positions),
+                'balance': self.balance,
+                'orders': {s: list(b.values()) for s, b in self.orders.items()},
+                'marks': dict(self.marks),
+            }
+
+
+# ── slot ──
+
+def publish(payload, path=None):
+    """Atomically replace the slot."""
+    path = path or SLOT_PATH
+    tmp = f'{path}.{os.getpid()}.tmp'
+    try:
+        with open(tmp, 'w') as f:
+            json.dump(payload, f, default=str)
+        os.replace(tmp, path)
+        return True
+    except Exception as e:
+        _log(f'publish failed: {e}')
+        try:
+            os.unlink(tmp)
+        except OSError:
+            pass
+        return False
+
+
+def read_slot(path=None):
+    """Current slot payload, or None. Re-parsed only when the file changes."""
+    path = path or SLOT_PATH
+    try:
+        st = os.stat(path)
+    except OSError:
+        return None
+    stamp = (path, st.st_mtime_ns, st.st_size, st.st_ino)
+    with _cache_lock:
+        if _cache['stamp'] == stamp:
+            return _cache['slot']
+    try:
+        with open(path) as f:
+            slot = json.load(f)
+    except (OSError, ValueError):
+        return None
+    if not isinstance(slot, dict) or 'positions' not in slot:
+        return None
+    with _cache_lock:
+        _cache['stamp'], _cache['slot'] = stamp, slot
+    return slot
+
+
+def latest(max_age_sec=MAX_AGE_SEC, path=None):
+    """Slot payload if the service vouched for it within max_age_sec, else None."""
+    slot = read_slot(path)
+    if slot is None or slot.get('live_at') is None:
+        return None
+    age = time.time() - float(slot['live_at'])
+    if age > max_age_sec:
+        return None
+    out = dict(slot)
+    out['age_sec'] = round(age, 2)
+    return out
+
+
+# ── consumer API (slot first, REST fallback) ──
+
+def _with_mark(slot, pos, max_age_sec):
+    """pos with markPrice / unrealizedPnl from the slot's mark (open positions)."""
+    pos['markPrice'], pos['unrealizedPnl'] = 0.0, 0.0
+    if not pos.get('contracts') or pos.get('side') not in ('long', 'short'):
+        return pos
+    m = (slot.get('marks') or {}).get(pos['symbol'])
+    if not m or time.time() - float(m['at']) > max_age_sec:
+        raise ValueError(f'no fresh mark price for {pos["symbol"]}')
+    mark = float(m['price'])
+    sign = 1 if pos['side'] == 'long' else -1
+    pos['markPrice'] = mark
+    pos['unrealizedPnl'] = (mark - pos['entryPrice']) * pos['contracts'] * sign
+    return pos
+
+
+def fetch_positions(ex, symbols, max_age_sec=MAX_AGE_SEC, path=None):
+    """ex.fetch_positions(symbols), served from the slot when fresh.
+
+    Side / size / entry come from the slot; markPrice and unrealizedPnl of
+    open positions from the slot's mark (REST positions if it is missing or
+    older than max_age_sec)."""
+    slot = latest(max_age_sec, path)
+    if slot is not None and all(s in slot['positions'] for s in symbols):
+        try:
+            return [_with_mark(slot, dict(slot['positions'][s]), max_age_sec) for s in symbols]
+        except Exception as e:
+            _log(f'mark price unavailable, REST positions: {e}')
+    return ex.fetch_positions(symbols)
+
+
+def fetch_balance(ex, max_age_sec=MAX_AGE_SEC, path=None):
+    """ex.fetch_balance() (USDT entry), served from the slot when fresh."""
+    slot = latest(max_age_sec, path)
+    if slot is not None and slot.get('balance'):
+        return {'USDT': dict(slot['balance']['USDT'])}
+    return ex.fetch_balance()
+
+
+def fetch_open_orders(ex, symbol, params=None, max_age_sec=MAX_AGE_SEC, path=None):
+    """ex.fetch_open_orders(symbol[, params]); orderFilter=StopOrder → conditional only."""
+    slot = latest(max_age_sec, path)
+    if slot is not None and symbol in (slot.get('orders') or {}):
+        conditional = (params or {}).get('orderFilter') == 'StopOrder'
+        return [dict(o) for o in slot['orders'][symbol] if _is_conditional(o) == conditional]
+    if params:
+        return ex.fetch_open_orders(symbol, params=params)
+    return ex.fetch_open_orders(symbol)
+
+
+# ── rate-limit budget ──
+
+class _Budget:
+    """Per-process REST call counter: {minute_epoch: {endpoint: n}}."""
+
+    def __init__(self, service):
+        self.service = service
+        self.minutes = {}
+        self.lock = threading.Lock()
+        self.flushed_at = 0.0
+
+    def add(self, endpoint):
+        minute = int(time.time() // 60) * 60
+        with self.lock:
+            bucket = self.minutes.setdefault(minute, {})
+            bucket[endpoint] = bucket.get(endpoint, 0) + 1
+            for m in [m for m in self.minutes if m < minute - BUDGET_KEEP_MIN * 60]:
+                del self.minutes[m]
+        if time.time() - self.flushed_at >= BUDGET_FLUSH_SEC:
+            self.flush()
+
+    def flush(self, budget_dir=None):
+        budget_dir = budget_dir or BUDGET_DIR
+        self.flushed_at = time.time()
+        with self.lock:
+            payload = {'service': self.service, 'pid': os.getpid(), 'updated_at': self.flushed_at,
+                       'minutes': {str(m): dict(b) for m, b in self.minutes.items()}}
+        try:
+            os.makedirs(budget_dir, exist_ok=True)
+            path = os.path.join(budget_dir, f'{self.service}.{os.getpid()}.json')
+            tmp = f'{path}.{threading.get_ident()}.tmp'
+            with open(tmp, 'w') as f:
+                json.dump(payload, f)
+            os.replace(tmp, path)
+        except Exception as e:
+            _log(f'budget flush failed: {e}')
+
+
+_budgets = {}
+
+
+def _service_name():
+    return os.path.splitext(os.path.basename(sys.argv[0] or 'python'))[0] or 'python'
+
+
+def track(ex, service=None):
+    """Count every REST request on ex per endpoint for budget() (idempotent)."""
+    if getattr(ex, '_budget_tracked', False):
+        return ex
+    service = service or _service_name()
+    budget = _budgets.get(service)
+    if budget is None:
+        budget = _budgets[service] = _Budget(service)
+    fetch = ex.fetch
+
+    def counted_fetch(url, *args, **kwargs):
+        try:
+            budget.add(urlparse(url).path or url)
+        except Exception:
+            pass
+        return fetch(url, *args, **kwargs)
+    ex.fetch = counted_fetch
+    ex._budget_tracked = True
+    return ex
+
+
+def budget(window_sec=60, budget_dir=None):
+    """{service: {endpoint: calls}} over the last window_sec, summed across processes."""
+    budget_dir = budget_dir or BUDGET_DIR
+    since = time.time() - window_sec
+    out = {}
+    for path in glob.glob(os.path.join(budget_dir, '*.json')):
+        try:
+            with open(path) as f:
+                data = json.load(f)
+        except (OSError, ValueError):
+            continue
+        if data.get('updated_at', 0) < since - 60:
+            continue
+        svc = out.setdefault(data.get('service', '?'), {})
+        for minute, bucket in (data.get('minutes') or {}).items():
+            if int(minute) + 60 <= since:
+                continue
+            for endpoint, n in bucket.items():
+                svc[endpoint] = svc.get(endpoint, 0) + n
+    return out
+
+
+# ── service ──
+
+def heartbeat(state, stream, ex, last_rest, snapshot, max_age_sec=MAX_AGE_SEC):
+    """One HEARTBEAT_SEC tick. Returns 'reconcile', 'live', 'rest' or None.
+
+    Refreshes the marks of open positions (ticker every MARK_SEC). The slot
+    is vouched for only while the stream's last frame is younger than
+    max_age_sec; otherwise (down, or silently stalled) REST snapshots every
+    REST_POLL_SEC keep it live."""
+    marks = state.refresh_marks(ex)
+    now = time.time()
+    if stream.alive(max_age_sec):
+        if now - last_rest[0] >= RECONCILE_SEC:
+            snapshot()
+            return 'reconcile'
+        state.mark_live(stream.last_msg_at)
+        publish(state.payload())
+        return 'live'
+    if now - last_rest[0] >= REST_POLL_SEC:
+        snapshot()
+        return 'rest'
+    if marks:
+        publish(state.payload())
+    return None
+
+
+def _make_exchange():
+    import ccxt
+    ex = ccxt.bybit({
+        'apiKey': os.getenv('BYBIT_API_KEY'),
+        'secret': os.getenv('BYBIT_SECRET'),
+        'enableRateLimit': True,
+        'timeout': 15000,
+        'options': {'defaultType': 'swap'},
+    })
+    ex.load_markets()
+    return track(ex, 'exchange_state')
+
+
+def main():
+    _log(f'=== EXCHANGE STATE START === slot={SLOT_PATH}')
+    from watchdog_helper import init_watchdog
+    from bybit_private_ws import PrivateStream
+    init_watchdog(interval_sec=10)
+    ex = _make_exchange()
+    state = ExchangeState([SYMBOL])
+    last_rest = [0.0]
+    rest_lock = threading.Lock()
+
+    def _snapshot():
+        with rest_lock:
+            if state.snapshot_rest(ex):
+                last_rest[0] = time.time()
+            publish(state.payload())
+
+    def _on_message(msg):
+        if state.handle(msg):
+            publish(state.payload())
+
+    stream = PrivateStream(['position', 'wallet', 'order'], _on_message, on_ready=_snapshot)
+
+    def _heartbeat():
+        while True:
+            time.sleep(HEARTBEAT_SEC)
+            try:
+                heartbeat(state, stream, ex, last_rest, _snapshot)
+            except Exception:
+                traceback.print_exc()
+
+    threading.Thread(target=_heartbeat, daemon=True).start()
+    backoff = 1
+    while True:
+        try:
+            t0 = time.time()
+            stream.run(ping_sec=PING_SEC)
+            if time.time() - t0 > 60:
+                backoff = 1
+        except Exception:
+            traceback.print_exc()
+        time.sleep(backoff)
+        backoff = min(backoff * 2, 60)
+
+
+if __name__ == '__main__':
+    main()
@@ -3,18 +3,18 @@ feature_flags.py — YAML-based feature flag loader.
 
 Loads feature_flags section from config/strategy_modes.yaml.
 Thread-safe, cached, FAIL-CLOSED (unknown/error → False).
+The file is watched by config_store (mtime, checked at most once a second);
+an edit drops the cache, so flag changes apply without reload().
 """
 
-import os
 import threading
-import yaml
+import config_store
 
 LOG_PREFIX = '[feature_flags]'
 
 _cache = None
 _lock = threading.Lock()
-_CONFIG_PATH = os.path.join(os.path.dirname(__file__),
-                            'config', 'strategy_modes.yaml')
+_CONFIG_PATH = config_store.STRATEGY_MODES_PATH
 
 
 def _log(msg):
@@ -22,17 +22,19 @@ def _log(msg):
 
 
 def _load_section():
-    """Load feature_flags section from YAML. Returns dict (empty on error)."""
+    """feature_flags section from YAML as a read-only mapping (empty on error)."""
     global _cache
+    try:
+        _file().check()
+    except Exception as e:
+        _log(f'check FAIL-CLOSED: {e}')
     if _cache is not None:
         return _cache
     with _lock:
         if _cache is not None:
             return _cache
         try:
-            with open(_CONFIG_PATH, 'r') as f:
-                full = yaml.safe_load(f) or {}
-            _cache = full.get('feature_flags', {})
+            _cache = _file().section('feature_flags')
             return _cache
         except Exception as e:
             _log(f'load FAIL-CLOSED: {e}')
@@ -40,6 +42,12 @@ def _load_section():
             return _cache
 
 
+def _file():
+    f = config_store.yaml_file(_CONFIG_PATH)
+    f.on_change(reload)
+    return f
+
+
 def is_enabled(flag_name):
     """Check if a feature flag is enabled. FAIL-CLOSED: returns False on error/missing."""
     try:
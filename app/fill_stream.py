@@ -0,0 +1,253 @@
+"""
+fill_stream.py — Push-driven fill tracking for fill_watcher.
+
+fill_watcher used to find fills by polling execution_log every POLL_SEC and
+calling fetch_closed_order / fetch_order per order, then sleeping
+POSITION_VERIFY_DELAY_SEC before a fetch_positions to verify the position.
+FillTracker is fed by the Bybit private order / execution / position topics
+(bybit_private_ws.PrivateStream) instead:
+
+  - order / execution messages are merged per orderId into a ccxt-shaped
+    order (status, filled, average, fee) — what _process_order reads from
+    fetch_order — and handle() returns the orderIds that changed so the
+    caller can dispatch them right away.
+  - position messages keep the latest (side, qty) per symbol with Bybit's
+    updatedTime; wait_position() blocks until the position has been updated
+    at or after the fill, which replaces the fixed sleep + REST read.
+
+Dispatcher runs per-order work on a small thread pool so one slow position
+verification does not hold up other orders. An order already in flight is
+not run twice; an update that arrives meanwhile re-runs it once afterwards.
+
+Usage:
+    tracker = FillTracker([SYMBOL])
+    dispatcher = Dispatcher(workers=FILL_WORKERS)
+    stream = PrivateStream(['order', 'execution', 'position'],
+                           lambda m: [dispatcher.submit(oid, work, oid) for oid in tracker.handle(m)])
+    order = tracker.order(order_id)                          # ccxt-shaped or None
+    pos = tracker.wait_position(SYMBOL, since_ms, timeout)   # (side, qty) or None
+"""
+import threading
+import time
+import traceback
+from concurrent.futures import ThreadPoolExecutor
+
+LOG_PREFIX = '[fill_stream]'
+FILL_WORKERS = 4
+MAX_ORDERS = 500
+
+# Bybit v5 orderStatus → ccxt status
+_STATUS = {
+    'New': 'open', 'PartiallyFilled': 'open', 'Untriggered': 'open', 'Triggered': 'open',
+    'Filled': 'closed',
+    'Cancelled': 'canceled', 'PartiallyFilledCanceled': 'canceled', 'Deactivated': 'canceled',
+    'Rejected': 'rejected',
+}
+
+
+def _log(msg):
+    print(f'{LOG_PREFIX} {msg}', flush=True)
+
+
+def _f(v):
+    try:
+        return float(v) if v not in (None, '') else 0.0
+    except (TypeError, ValueError):
+        return 0.0
+
+
+def _bybit_symbol(symbol):
+    return symbol.split(':')[0].replace('/', '')
+
+
+class FillTracker:
+    """Latest order / fill / position state from the private stream."""
+
+    def __init__(self, symbols, fee_currency='USDT', log_fn=None):
+        self._symbols = {_bybit_symbol(s): s for s in symbols}
+        self.fee_currency = fee_currency
+        self._log = log_fn or _log
+        self._orders = {}           # orderId → merged record (insertion-ordered)
+        self._positions = {}        # symbol → (side, qty, updated_ms)
+        self._cond = threading.Condition()
+        self.ready_at = None        # set by mark_ready() after each (re)subscribe
+        self.stats = {'orders': 0, 'executions': 0, 'positions': 0}
+
+    def mark_ready(self):
+        """Stream (re)subscribed: updates missed while it was down are unknown."""
+        with self._cond:
+            self.ready_at = time.time()
+
+    def seen_since_ready(self, sent_ts):
+        """True if an order sent at sent_ts (epoch s) would have been pushed to us."""
+        return self.ready_at is not None and sent_ts is not None and sent_ts >= self.ready_at
+
+    # ── stream input ──
+
+    def handle(self, msg):
+        """Apply one topic message. Returns the orderIds whose state changed."""
+        topic = (msg.get('topic') or '').split('.', 1)[0]
+        rows = msg.get('data') or []
+        if isinstance(rows, dict):
+            rows = [rows]
+        if topic == 'order':
+            return self._apply(rows, self._apply_order, 'orders')
+        if topic == 'execution':
+            return self._apply(rows, self._apply_execution, 'executions')
+        if topic == 'position':
+            with self._cond:
+                for d in rows:
+                    self._apply_position(d)
+                self._cond.notify_all()
+        return []
+
+    def _apply(self, rows, fn, stat):
+        changed = []
+        with self._cond:
+            for d in rows:
+                if d.get('symbol') not in self._symbols or not d.get('orderId'):
+                    continue
+                self.stats[stat] += 1
+                if fn(d) and d['orderId'] not in changed:
+                    changed.append(d['orderId'])
+            while len(self._orders) > MAX_ORDERS:
+                self._orders.pop(next(iter(self._orders)))
+        return changed
+
+    def _record(self, oid, symbol):
+        rec = self._orders.get(oid)
+        if rec is None:
+            # 'cum': cumulative figures from the order topic, 'exec': sums of
+            # execution messages; whichever has seen more quantity is used.
+            rec = {'symbol': self._symbols[symbol], 'status': 'open', 'orderStatus': None,
+                   'amount': 0.0, 'cum': [0.0, 0.0, 0.0], 'exec': [0.0, 0.0, 0.0],
+                   'exec_ids': set(), 'updated_ms': 0, 'info': {}}
+            self._orders[oid] = rec
+        return rec
+
+    def _apply_order(self, d):
+        rec = self._record(d['orderId'], d['symbol'])
+        before = (rec['orderStatus'], list(rec['cum']))
+        rec['orderStatus'] = d.get('orderStatus')
+        rec['status'] = _STATUS.get(d.get('orderStatus'), rec['status'])
+        rec['amount'] = _f(d.get('qty')) or rec['amount']
+        filled = _f(d.get('cumExecQty'))
+        if filled >= rec['cum'][0]:
+            cost = _f(d.get('cumExecValue')) or filled * _f(d.get('avgPrice'))
+            rec['cum'] = [filled, cost, _f(d.get('cumExecFee'))]
+        rec['updated_ms'] = max(rec['updated_ms'], int(_f(d.get('updatedTime'))))
+        rec['info'] = d
+        return (rec['orderStatus'], rec['cum']) != before
+
+    def _apply_execution(self, d):
+        rec = self._record(d['orderId'], d['symbol'])
+        exec_id = d.get('execId')
+        if exec_id in rec['exec_ids']:
+            return False
+        rec['exec_ids'].add(exec_id)
+        qty = _f(d.get('execQty'))
+        ex = rec['exec']
+        ex[0] += qty
+        ex[1] += _f(d.get('execValue')) or qty * _f(d.get('execPrice'))
+        ex[2] += _f(d.get('execFee'))
+        rec['amount'] = rec['amount'] or _f(d.get('orderQty'))
+        rec['updated_ms'] = max(rec['updated_ms'], int(_f(d.get('execTime'))))
+        if (rec['status'] == 'open' and d.get('leavesQty') not in (None, '')
+                and _f(d.get('leavesQty')) == 0):
+            rec['status'] = 'closed'
+        return True
+
+    def _apply_position(self, d):
+        symbol = self._symbols.get(d.get('symbol'))
+        if symbol is None:
+            return
+        self.stats['positions'] += 1
+        qty = _f(d.get('size'))
+        side = {'Buy': 'long', 'Sell': 'short'}.get(d.get('side')) if qty else None
+        updated = int(_f(d.get('updatedTime'))) or int(time.time() * 1000)
+        prev = self._positions.get(symbol)
+        if prev is None or updated >= prev[2]:
+            self._positions[symbol] = (side, qty if side else 0, updated)
+
+    # ── consumers ──
+
+    def order(self, order_id):
+        """ccxt-shaped order (the fetch_order keys fill_watcher reads), or None."""
+        with self._cond:
+            rec = self._orders.get(order_id)
+            if rec is None:
+                return None
+            filled, cost, fee = max(rec['cum'], rec['exec'], key=lambda v: v[0])
+            return {
+                'id': order_id,
+                'symbol': rec['symbol'],
+                'status': rec['status'],
+                'amount': rec['amount'],
+                'filled': filled,
+                'average': cost / filled if filled else 0.0,
+                'fee': {'cost': fee, 'currency': self.fee_currency},
+                'lastUpdateTimestamp': rec['updated_ms'] or None,
+                'info': dict(rec['info'], source='ws'),
+            }
+
+    def position(self, symbol):
+        with self._cond:
+            return self._positions.get(symbol)
+
+    def wait_position(self, symbol, since_ms, timeout):
+        """(side, qty) once the position was updated at/after since_ms, else None on timeout."""
+        deadline = time.time() + timeout
+        with self._cond:
+            while True:
+                pos = self._positions.get(symbol)
+                if pos is not None and pos[2] >= (since_ms or 0):
+                    return (pos[0], pos[1])
+                left = deadline - time.time()
+                if left <= 0:
+                    return None
+                self._cond.wait(left)
+
+
+class Dispatcher:
+    """Per-key work on a thread pool: one run per key at a time, coalesced reruns."""
+
+    def __init__(self, workers=FILL_WORKERS, log_fn=None):
+        self._pool = ThreadPoolExecutor(max_workers=workers, thread_name_prefix='fill')
+        self._lock = threading.Lock()
+        self._running = set()
+        self._again = {}
+        self._log = log_fn or _log
+        self.stats = {'submitted': 0, 'coalesced': 0, 'errors': 0}
+
+    def submit(self, key, fn, *args):
+        """Run fn(*args) for key unless it is already running (then re-run once after)."""
+        with self._lock:
+            self.stats['submitted'] += 1
+            if key in self._running:
+                self._again[key] = (fn, args)
+                self.stats['coalesced'] += 1
+                return False
+            self._running.add(key)
+        self._pool.submit(self._run, key, fn, args)
+        return True
+
+    def busy(self, key):
+        with self._lock:
+            return key in self._running
+
+    def _run(self, key, fn, args):
+        while True:
+            try:
+                fn(*args)
+            except Exception:
+                self.stats['errors'] += 1
+                traceback.print_exc()
+            with self._lock:
+                nxt = self._again.pop(key, None)
+                if nxt is None:
+                    self._running.discard(key)
+                    return
+            fn, args = nxt
+
+    def shutdown(self, wait=True):
+        self._pool.shutdown(wait=wait)
@@ -1,11 +1,23 @@
 """
 fill_watcher.py — Bybit order fill verification daemon
 
-Polls execution_log for SENT / PARTIALLY_FILLED orders every 5 seconds.
+Fills are pushed by the Bybit private order / execution / position topics
+(fill_stream.FillTracker); each changed order is processed right away on a
+small worker pool (fill_stream.Dispatcher), so one slow verification does
+not hold up other orders. Each worker thread has its own ccxt client; the
+position_state row is locked (FOR UPDATE) once the exchange wait is over,
+so fills for the same symbol apply their read-modify-write one at a time,
+and a REVERSE_OPEN waits for its REVERSE_CLOSE. execution_log is still
+polled every 5 seconds (a new row wakes it early, db_notify) as the
+reconciliation backstop: orders the stream has not reported — sent before
+it (re)connected, or older than STREAM_GRACE_SEC — are checked over REST as
+before.
 For each order:
-  1. fetch_order() from Bybit -> verify actual fill status
+  1. Order state from the stream (fetch_order() over REST as the backstop)
   2. Update execution_log with fill details
-  3. For EXIT/EMERGENCY: verify position=0 before declaring "정리 완료"
+  3. Verify the position from the position update that follows the fill
+     (fixed delay + fetch_positions() when the stream is down);
+     for EXIT/EMERGENCY: verify position=0 before declaring "정리 완료"
   4. Send Telegram notifications based on verified facts only
 
 Statuses: SENT -> PARTIALLY_FILLED -> FILLED -> VERIFIED
@@ -16,21 +28,34 @@ import sys
 import time
 import json
 import datetime
+import threading
 import traceback
 import urllib.parse
 import urllib.request
 import ccxt
 from db_config import get_conn
 import report_formatter
+import db_notify
+import fill_stream
 
 POLL_SEC = 5
 ORDER_TIMEOUT_SEC = 60
 POSITION_VERIFY_DELAY_SEC = 2
 MAX_POLLS_PER_ORDER = 30
+STREAM_GRACE_SEC = 10      # stream up: REST only for orders unreported this long
 SYMBOL = 'BTC/USDT:USDT'
 KILL_SWITCH_PATH = '/root/trading-bot/app/KILL_SWITCH'
 ACTION_TBL = 'signals_action_v3'
 _TG_CONFIG = {}
+_ROW_COLS = '''id, order_id, order_type, direction, signal_id, decision_id,
+               close_reason, requested_qty, ticker_price, status,
+               order_sent_at, poll_count, symbol, source_queue, execution_queue_id'''
+
+# Private stream state (set up in main(); None → REST polling only)
+_tracker = None
+_dispatcher = None
+_stream = None
+_fill_local = threading.local()
 
 
 def log(msg):
@@ -48,6 +73,8 @@ def _exchange():
         'enableRateLimit': True,
         'timeout': 20000,
         'options': {'defaultType': 'swap'}})
+    import exchange_state
+    exchange_state.track(ex)
     ex.load_markets()
     return ex
 
@@ -105,6 +132,50 @@ def _fetch_position(ex):
     return (None, 0)
 
 
+def _worker_exchange():
+    '''ccxt client of the calling worker thread (ccxt clients are not thread-safe).'''
+    ex = getattr(_fill_local, 'ex', None)
+    if ex is None:
+        ex = _fill_local.ex = _exchange()
+    return ex
+
+
+def _lock_position_state(cur):
+    '''Row-lock position_state for SYMBOL until commit (serializes fill handlers).'''
+    cur.execute('SELECT 1 FROM position_state WHERE symbol = %s FOR UPDATE;', (SYMBOL,))
+
+
+def _reverse_close_pending(cur, eid):
+    '''True if an earlier REVERSE_CLOSE is still unprocessed (REVERSE_OPEN waits for it).'''
+    cur.execute("""
+        SELECT 1 FROM execution_log
+        WHERE order_type = 'REVERSE_CLOSE' AND id < %s
+          AND status IN ('SENT', 'PARTIALLY_FILLED')
+        LIMIT 1;
+    """, (eid,))
+    return cur.fetchone() is not None
+
+
+def _stream_live():
+    return _stream is not None and _tracker is not None and _stream.alive()
+
+
+def _verify_position(ex):
+    '''(side, qty) after the fill being handled on this thread.
+
+    Stream up: the first position update at/after the fill (REST if none
+    arrives within POSITION_VERIFY_DELAY_SEC). Otherwise the fixed delay +
+    fetch_positions.'''
+    since_ms = getattr(_fill_local, 'fill_ms', None)
+    if since_ms and _stream_live():
+        pos = _tracker.wait_position(SYMBOL, since_ms, POSITION_VERIFY_DELAY_SEC)
+        if pos is not None:
+            return pos
+        return _fetch_position(ex)
+    time.sleep(POSITION_VERIFY_DELAY_SEC)
+    return _fetch_position(ex)
+
+
 def _update_stage(cur, sig_id, stage):
     if not sig_id:
         return None
@@ -154,10 +225,8 @@ def _poll_cycle(ex):
                     pass
                 traceback.print_exc()
 
-            cur.execute("""
-                SELECT id, order_id, order_type, direction, signal_id, decision_id,
-                       close_reason, requested_qty, ticker_price, status,
-                       order_sent_at, poll_count, symbol, source_queue, execution_queue_id
+            cur.execute(f"""
+                SELECT {_ROW_COLS}
                 FROM execution_log
                 WHERE status IN ('SENT', 'PARTIALLY_FILLED')
                 ORDER BY id ASC;
@@ -167,6 +236,9 @@ def _poll_cycle(ex):
             if not rows:
                 return
             for row in rows:
+                if _dispatcher is not None and row[1]:
+                    _dispatcher.submit(row[1], _process_claimed, row[1])
+                    continue
                 try:
                     _process_order(ex, cur, row)
                     conn.commit()
@@ -189,11 +261,67 @@ def _poll_cycle(ex):
             pass
 
 
+def _process_claimed(order_id):
+    '''Worker: lock the pending execution_log row for order_id and process it.'''
+    ex = _worker_exchange()
+    conn = db_conn()
+    try:
+        conn.autocommit = False
+        with conn.cursor() as cur:
+            cur.execute(f"""
+                SELECT {_ROW_COLS}
+                FROM execution_log
+                WHERE order_id = %s AND status IN ('SENT', 'PARTIALLY_FILLED')
+                ORDER BY id ASC LIMIT 1
+                FOR UPDATE SKIP LOCKED;
+            """, (order_id,))
+            row = cur.fetchone()
+            if row is not None:
+                _process_order(ex, cur, row)
+            conn.commit()
+    except Exception:
+        try:
+            conn.rollback()
+        except Exception:
+            pass
+        traceback.print_exc()
+    finally:
+        try:
+            conn.close()
+        except Exception:
+            pass
+
+
+def _fetch_order_state(ex, order_id, sym, order_sent_at, elapsed):
+    '''Order state: the stream's copy, else REST unless the stream will push it.'''
+    if _tracker is not None:
+        fetched = _tracker.order(order_id)
+        if fetched is not None:
+            return fetched
+        sent_ts = order_sent_at.timestamp() if order_sent_at else None
+        if (_stream_live() and _tracker.seen_since_ready(sent_ts)
+                and elapsed <= STREAM_GRACE_SEC):
+            return None
+    try:
+        return ex.fetch_closed_order(order_id, sym)
+    except Exception:
+        try:
+            return ex.fetch_order(order_id, sym)
+        except Exception:
+            traceback.print_exc()
+            return None
+
+
 def _process_order(ex, cur, row):
     (eid, order_id, order_type, direction, signal_id, decision_id,
      close_reason, requested_qty, ticker_price, status,
      order_sent_at, poll_count, symbol, source_queue, execution_queue_id) = row
 
+    if order_type == 'REVERSE_OPEN' and _reverse_close_pending(cur, eid):
+        # Its REVERSE_CLOSE resets position_state to flat: apply that one first
+        # (the poll loop retries this order once the close is processed).
+        return None
+
     poll_count = (poll_count or 0) + 1
     cur.execute("""
         UPDATE execution_log SET poll_count = %s, last_poll_at = now() WHERE id = %s;
@@ -206,18 +334,10 @@ def _process_order(ex, cur, row):
     sym = symbol or SYMBOL
     elapsed = time.time() - order_sent_at.timestamp() if order_sent_at else 999
 
-    fetched = None
-    try:
-        fetched = ex.fetch_closed_order(order_id, sym)
-    except Exception:
-        try:
-            fetched = ex.fetch_order(order_id, sym)
-        except Exception:
-            traceback.print_exc()
-            return None
-
+    fetched = _fetch_order_state(ex, order_id, sym, order_sent_at, elapsed)
     if fetched is None:
         return None
+    _fill_local.fill_ms = fetched.get('lastUpdateTimestamp') or fetched.get('timestamp')
 
     fx_status = fetched.get('status', '')
     filled_qty = float(fetched.get('filled', 0) or 0)
@@ -315,8 +435,8 @@ def _handle_entry_filled(ex, cur, eid, order_id, direction, signal_id,
     _update_trade_process_log(cur, signal_id,
                                order_fill_time=datetime.datetime.now(datetime.timezone.utc),
                                fill_price=avg_price)
-    time.sleep(POSITION_VERIFY_DELAY_SEC)
-    (pos_side, pos_qty) = _fetch_position(ex)
+    (pos_side, pos_qty) = _verify_position(ex)
+    _lock_position_state(cur)
     cur.execute("""
         UPDATE execution_log SET
             status = 'VERIFIED',
@@ -428,8 +548,8 @@ def _handle_exit_filled(ex, cur, eid, order_id, order_type, direction,
                          signal_id, decision_id, close_reason,
                          filled_qty, avg_price, fee_cost, fee_currency):
     '''Exit/emergency order filled -> verify position=0 + PnL.'''
-    time.sleep(POSITION_VERIFY_DELAY_SEC)
-    (pos_side, pos_qty) = _fetch_position(ex)
+    (pos_side, pos_qty) = _verify_position(ex)
+    _lock_position_state(cur)
     position_verified = pos_qty < 1e-09
     realized_pnl = None
     entry_price = None
@@ -504,6 +624,7 @@ def _handle_exit_filled(ex, cur, eid, order_id, order_type, direction,
 
 def _handle_timeout(cur, eid, order_id, order_type, direction, signal_id):
     '''Order not filled within timeout.'''
+    _lock_position_state(cur)
     cur.execute("""
         UPDATE execution_log SET status = 'TIMEOUT', error_detail = 'order_timeout'
         WHERE id = %s;
@@ -529,6 +650,7 @@ def _handle_timeout(cur, eid, order_id, order_type, direction, signal_id):
 
 def _handle_canceled(cur, eid, order_id, order_type, direction, signal_id):
     '''Order canceled by exchange.'''
+    _lock_position_state(cur)
     cur.execute("""
         UPDATE execution_log SET status = 'CANCELED', error_detail = 'exchange_canceled'
         WHERE id = %s;
@@ -717,8 +839,8 @@ def _sync_position_state(cur, pos_side, pos_qty, avg_price=None, stage_delta=0,
 def _handle_add_filled(ex, cur, eid, order_id, direction, filled_qty, avg_price,
                         fee_cost, fee_currency, execution_queue_id):
     '''ADD order filled -> update position_state with budget tracking + Telegram.'''
-    time.sleep(POSITION_VERIFY_DELAY_SEC)
-    (pos_side, pos_qty) = _fetch_position(ex)
+    (pos_side, pos_qty) = _verify_position(ex)
+    _lock_position_state(cur)
     cur.execute("""
         UPDATE execution_log SET
             status = 'VERIFIED',
@@ -824,8 +946,8 @@ def _handle_add_filled(ex, cur, eid, order_id, direction, filled_qty, avg_price,
 def _handle_reduce_filled(ex, cur, eid, order_id, direction, filled_qty, avg_price,
                            fee_cost, fee_currency, close_reason, execution_queue_id):
     '''REDUCE order filled -> calc partial PnL + Telegram.'''
-    time.sleep(POSITION_VERIFY_DELAY_SEC)
-    (pos_side, pos_qty) = _fetch_position(ex)
+    (pos_side, pos_qty) = _verify_position(ex)
+    _lock_position_state(cur)
     realized_pnl = None
     cur.execute('SELECT avg_entry_price, total_qty, accumulated_entry_fee FROM position_state WHERE symbol = %s;', (SYMBOL,))
     row = cur.fetchone()
@@ -875,8 +997,8 @@ def _handle_reverse_close_filled(ex, cur, eid, order_id, direction, filled_qty,
                                    fee_cost, fee_currency, close_reason, signal_id,
                                    decision_id, execution_queue_id):
     '''REVERSE_CLOSE filled -> verify position=0 + PnL.'''
-    time.sleep(POSITION_VERIFY_DELAY_SEC)
-    (pos_side, pos_qty) = _fetch_position(ex)
+    (pos_side, pos_qty) = _verify_position(ex)
+    _lock_position_state(cur)
     position_verified = pos_qty < 1e-09
     realized_pnl = None
 
@@ -927,8 +1049,8 @@ def _handle_reverse_close_filled(ex, cur, eid, order_id, direction, filled_qty,
 def _handle_reverse_open_filled(ex, cur, eid, order_id, direction, filled_qty, avg_price,
                                   fee_cost, fee_currency, execution_queue_id):
     '''REVERSE_OPEN filled -> reset position_state with budget tracking + Telegram.'''
-    time.sleep(POSITION_VERIFY_DELAY_SEC)
-    (pos_side, pos_qty) = _fetch_position(ex)
+    (pos_side, pos_qty) = _verify_position(ex)
+    _lock_position_state(cur)
     cur.execute("""
         UPDATE execution_log SET
             status = 'VERIFIED',
@@ -983,6 +1105,43 @@ def _handle_reverse_open_filled(ex, cur, eid, order_id, direction, filled_qty, a
     log(f'REVERSE_OPEN VERIFIED: {direction} qty={filled_qty} price={avg_price} stage={start_stage}')
 
 
+def _start_stream():
+    '''Private order / execution / position stream → tracker + dispatcher (FAIL-OPEN).'''
+    global _tracker, _dispatcher, _stream
+    try:
+        from bybit_private_ws import PrivateStream
+        tracker = fill_stream.FillTracker([SYMBOL])
+        dispatcher = fill_stream.Dispatcher(fill_stream.FILL_WORKERS, log_fn=log)
+
+        def _on_message(msg):
+            for oid in tracker.handle(msg):
+                dispatcher.submit(oid, _process_claimed, oid)
+
+        stream = PrivateStream(['order', 'execution', 'position'], _on_message,
+                               on_ready=tracker.mark_ready, log_fn=log)
+    except Exception:
+        traceback.print_exc()
+        log('private stream unavailable — REST polling only')
+        return None
+
+    def _loop():
+        backoff = 1
+        while True:
+            try:
+                t0 = time.time()
+                stream.run()
+                if time.time() - t0 > 60:
+                    backoff = 1
+            except Exception:
+                traceback.print_exc()
+            time.sleep(backoff)
+            backoff = min(backoff * 2, 60)
+
+    _tracker, _dispatcher, _stream = tracker, dispatcher, stream
+    threading.Thread(target=_loop, name='fill_stream', daemon=True).start()
+    return stream
+
+
 def main():
     log('=== FILL WATCHER START ===')
     ex = _exchange()
@@ -1002,8 +1161,11 @@ def main():
     except Exception:
         traceback.print_exc()
 
+    _start_stream()
+
     _consecutive_errors = 0
     _MAX_CONSECUTIVE_ERRORS = 5
+    listener = db_notify.Listener([db_notify.EXECUTION_LOG], log_fn=log)
 
     while True:
         try:
@@ -1029,7 +1191,7 @@ def main():
             if _consecutive_errors >= _MAX_CONSECUTIVE_ERRORS:
                 _send_telegram(f'[fill_watcher] 연속 {_consecutive_errors}회 에러 — 자동 복구 시도 중')
                 _consecutive_errors = 0
-        time.sleep(POLL_SEC)
+        db_notify.wait_for(listener, POLL_SEC)
 
 
 if __name__ == '__main__':
@@ -0,0 +1,348 @@
+"""
+guard_context.py — Per-cycle prefetch for autopilot entry guards.
+
+The autopilot guard chain used to run one execution_log / execution_queue /
+candles query per guard (post-close cooldown, zone re-entry ban, ADD rate
+limits, loss-streak and consecutive-loss cooldowns, impulse ban, same-dir
+re-entry, ...), each with its own window. load() fetches everything those
+guards read in two queries:
+
+  1. FILLED execution_log rows of the last HOURS (opens, closes, stops) plus
+     live execution_queue ADDs of the last hour
+  2. now(), the newest 1m closes, mark_price and the autopilot signal
+     emission stamps from alert_dedup_state
+
+into a frozen GuardContext. The guard functions below are pure over that
+context (times are epoch seconds against ctx.now, the DB clock), so they
+can be unit-tested without a DB. autopilot_daemon's _check_* wrappers take
+ctx= and fall back to their own query when called without one (/snapshot,
+/debug).
+
+GuardLog records each guard's verdict and timing: every check runs in a
+perf_trace span 'guard:<name>' (→ perf_span_stats histograms) counting
+'pass' / 'block', and the entries of the last cycle stay in memory.
+
+Usage:
+    import guard_context
+    ctx = guard_context.load(cur, SYMBOL)
+    glog = guard_context.GuardLog()
+    ok, reason, _ = glog.check('post_close_cooldown', guard_context.post_close_cooldown, ctx)
+"""
+import os
+import time
+from dataclasses import dataclass, field
+from typing import Optional
+
+import perf_trace
+
+LOG_PREFIX = '[guard_context]'
+
+# Widest window any guard reads (mode cooloff: 24h win rate per regime_tag)
+HOURS = int(os.getenv('GUARD_CONTEXT_HOURS', '24'))
+CLOSE_TYPES = ('CLOSE', 'FULL_CLOSE')
+LOSS_TYPES = ('CLOSE', 'FULL_CLOSE', 'REDUCE', 'REVERSE_CLOSE')
+SIGNAL_KEY_PREFIX = 'autopilot:signal:'
+
+
+def _log(msg):
+    print(f'{LOG_PREFIX} {msg}', flush=True)
+
+
+@dataclass(frozen=True)
+class Fill:
+    """One FILLED execution_log row (times as epoch seconds)."""
+    symbol: str
+    order_type: str
+    direction: Optional[str]
+    realized_pnl: Optional[float]
+    fill_ts: Optional[float]      # last_fill_at
+    ts: float                     # row ts
+    regime_tag: Optional[str] = None
+    closed: bool = False          # close_reason IS NOT NULL
+
+    @property
+    def is_loss(self):
+        return self.realized_pnl is not None and self.realized_pnl < 0
+
+
+@dataclass(frozen=True)
+class GuardContext:
+    symbol: str
+    now: float
+    hours: int = HOURS
+    fills: tuple = ()             # Fill, newest ts first, all symbols
+    adds: tuple = ()              # execution_queue ADD ts, newest first
+    closes_1m: tuple = ()         # newest 1m candle closes first
+    mark_price: Optional[float] = None
+    signals: dict = field(default_factory=dict)   # alert_dedup_state key → last_sent epoch
+
+
+def _f(v):
+    return float(v) if v is not None else None
+
+
+def load(cur, symbol, hours=HOURS):
+    """Prefetch everything the entry guards read (2 queries)."""
+    cur.execute("""
+        SELECT 'fill', symbol, order_type, direction, realized_pnl,
+               extract(epoch FROM last_fill_at), extract(epoch FROM ts),
+               regime_tag, close_reason IS NOT NULL
+        FROM execution_log
+        WHERE status = 'FILLED'
+          AND (ts >= now() - make_interval(hours => %s)
+               OR last_fill_at >= now() - make_interval(hours => %s))
+        UNION ALL
+        SELECT 'add', symbol, action_type, direction, NULL,
+               NULL, extract(epoch FROM ts), NULL, false
+        FROM execution_queue
+        WHERE symbol = %s AND action_type = 'ADD'
+          AND status NOT IN ('FAILED', 'CANCELLED', 'EXPIRED')
+          AND ts >= now() - interval '1 hour';
+    """, (hours, hours, symbol))
+    fills, adds = [], []
+    for (kind, sym, otype, direction, pnl, fill_ts, ts, regime_tag, closed) in cur.fetchall():
+        if kind == 'add':
+            adds.append(float(ts))
+        else:
+            fills.append(Fill(sym, otype, direction, _f(pnl), _f(fill_ts), float(ts),
+                              regime_tag, bool(closed)))
+    fills.sort(key=lambda r: r.ts, reverse=True)
+    adds.sort(reverse=True)
+
+    cur.execute("""
+        SELECT extract(epoch FROM now()),
+               (SELECT array_agg(c ORDER BY ts DESC) FROM (
+                    SELECT ts, c FROM candles
+                    WHERE symbol = %s AND tf = '1m'
+                    ORDER BY ts DESC LIMIT 6) t),
+               (SELECT mark_price FROM market_data_cache WHERE symbol = %s),
+               (SELECT json_object_agg(key, extract(epoch FROM last_sent_ts))
+                FROM alert_dedup_state
+                WHERE key LIKE %s AND last_sent_ts >= now() - interval '1 hour');
+    """, (symbol, symbol, SIGNAL_KEY_PREFIX + '%'))
+    now, closes, mark, signals = cur.fetchone()
+    return GuardContext(
+        symbol=symbol,
+        now=float(now),
+        hours=hours,
+        fills=tuple(fills),
+        adds=tuple(adds),
+        closes_1m=tuple(float(c) for c in (closes or ()) if c is not None),
+        mark_price=_f(mark) or None,
+        signals={k: float(v) for k, v in (signals or {}).items() if v is not None},
+    )
+
+
+# ── row selection ──
+
+def _closes(ctx, types=CLOSE_TYPES, within_sec=None, losses=False):
+    """This symbol's closes by last_fill_at desc, optionally within_sec / losses only."""
+    rows = [r for r in ctx.fills
+            if r.symbol == ctx.symbol and r.order_type in types and r.fill_ts is not None
+            and (within_sec is None or r.fill_ts >= ctx.now - within_sec)
+            and (not losses or r.is_loss)]
+    rows.sort(key=lambda r: r.fill_ts, reverse=True)
+    return rows
+
+
+def last_stop(ctx, within_sec):
+    """Most recent losing CLOSE/FULL_CLOSE within within_sec, or None."""
+    rows = _closes(ctx, within_sec=within_sec, losses=True)
+    return rows[0] if rows else None
+
+
+def _recent_results(ctx, window_hours):
+    """Realized PnL of LOSS_TYPES closes (any symbol) within window_hours, newest first."""
+    since = ctx.now - window_hours * 3600
+    return [r for r in ctx.fills if r.order_type in LOSS_TYPES and r.ts > since]
+
+
+# ── guards (pure) ──
+
+def stop_loss_cooldown(ctx, window_sec, trigger, pause_sec):
+    """>= trigger losing closes within window_sec → pause. (ok, reason, remaining_sec)."""
+    rows = _closes(ctx, types=LOSS_TYPES, within_sec=window_sec, losses=True)
+    if len(rows) >= trigger:
+        elapsed = ctx.now - rows[0].fill_ts
+        if elapsed < pause_sec:
+            return (False,
+                    f'COOLDOWN_AFTER_CONSECUTIVE_STOPS: stops={len(rows)} '
+                    f'window={window_sec // 60}m cooldown={pause_sec // 60}m',
+                    int(pause_sec - elapsed))
+    return (True, '', 0)
+
+
+def loss_streak(ctx, window_hours, limit=10):
+    """Consecutive losses from the most recent close (looking at up to limit)."""
+    streak = 0
+    for r in _recent_results(ctx, window_hours)[:limit]:
+        if not r.is_loss:
+            break
+        streak += 1
+    return streak
+
+
+def loss_streak_cooldown(ctx, trigger, cooldown_sec, window_hours):
+    """trigger consecutive losses → cooldown_sec after the last one. (ok, reason)."""
+    rows = _recent_results(ctx, window_hours)
+    if len(rows) < trigger:
+        return (True, '')
+    streak = loss_streak(ctx, window_hours, limit=trigger)
+    if streak >= trigger:
+        last_loss = next(r for r in rows if r.is_loss)
+        remaining = int(cooldown_sec - (ctx.now - last_loss.ts))
+        if remaining > 0:
+            return (False, f'LOSS_STREAK_COOLDOWN: {streak} consecutive losses, {remaining}s remaining')
+    return (True, '')
+
+
+def regime_results(ctx, regime_tag, window_hours=24):
+    """(total, wins) of LOSS_TYPES closes tagged regime_tag within window_hours."""
+    rows = [r for r in _recent_results(ctx, window_hours) if r.regime_tag == regime_tag]
+    return len(rows), sum(1 for r in rows if r.realized_pnl is not None and r.realized_pnl > 0)
+
+
+def consec_loss_cooldown(ctx, direction, cooldown_min):
+    """2+ consecutive same-direction losses in 2h → cooldown_min. (ok, reason)."""
+    rows = _closes(ctx, within_sec=7200)[:3]
+    consec = 0
+    for r in rows:
+        if r.direction == direction and r.is_loss:
+            consec += 1
+        else:
+            break
+    if consec >= 2:
+        elapsed_min = (ctx.now - rows[0].fill_ts) / 60
+        if elapsed_min < cooldown_min:
+            return (False, f'연속 손절 쿨다운 ({consec}회, {int(cooldown_min - elapsed_min)}분 남음)')
+    return (True, '')
+
+
+def post_close_cooldown(ctx, sl_sec=600, tp_sec=180):
+    """Last close within 15m: SL → sl_sec, TP → tp_sec. (ok, reason, remaining_sec)."""
+    rows = _closes(ctx, within_sec=900)
+    if rows:
+        last = rows[0]
+        elapsed = ctx.now - last.fill_ts
+        kind, cooldown = ('SL', sl_sec) if last.is_loss else ('TP', tp_sec)
+        if elapsed < cooldown:
+            remaining = int(cooldown - elapsed)
+            return (False, f'POST_{kind}_COOLDOWN: {remaining}s remaining', remaining)
+    return (True, '', 0)
+
+
+def post_sl_ban(ctx, ban_sec=600):
+    """Any SL within ban_sec blocks every direction. (ok, reason)."""
+    stop = last_stop(ctx, ban_sec)
+    if stop is not None:
+        remaining = int(ban_sec - (ctx.now - stop.fill_ts))
+        if remaining > 0:
+            return (False, f'POST_SL_BAN: all entries blocked ({remaining}s remaining)')
+    return (True, '')
+
+
+def sl_cooldown_same_dir(ctx, direction, cooldown_sec):
+    """Last SL within cooldown_sec was direction → blocked. (ok, remaining_sec)."""
+    stop = last_stop(ctx, cooldown_sec)
+    if stop is not None and stop.direction:
+        sl_dir = 'LONG' if stop.direction.lower() == 'long' else 'SHORT'
+        elapsed = ctx.now - stop.fill_ts
+        if sl_dir == direction and elapsed < cooldown_sec:
+            return (False, int(cooldown_sec - elapsed))
+    return (True, 0)
+
+
+def entries_last_hour(ctx):
+    """FILLED OPENs of this symbol in the last hour."""
+    return len(_closes(ctx, types=('OPEN',), within_sec=3600))
+
+
+def add_interval(ctx, min_interval):
+    """Seconds since the last live ADD must reach min_interval. (ok, remaining_sec)."""
+    if ctx.adds:
+        elapsed = int(ctx.now - ctx.adds[0])
+        if elapsed < min_interval:
+            return (False, min_interval - elapsed)
+    return (True, 0)
+
+
+def adds_per_30m(ctx, max_adds):
+    """Live ADDs in the last 30m below max_adds. (ok, count, limit)."""
+    n = sum(1 for ts in ctx.adds if ts >= ctx.now - 1800)
+    return (n < max_adds, n, max_adds)
+
+
+def same_dir_reentry(ctx, direction, cooldown_sec):
+    """Same-direction closed position within cooldown_sec (1h window). (ok, remaining_sec)."""
+    tss = [r.ts for r in ctx.fills
+           if r.symbol == ctx.symbol and r.direction == direction and r.closed
+           and r.ts >= ctx.now - 3600]
+    if tss:
+        elapsed = int(ctx.now - max(tss))
+        if elapsed < cooldown_sec:
+            return (False, cooldown_sec - elapsed)
+    return (True, 0)
+
+
+def impulse_ban_sec(ctx, direction):
+    """5 x 1m move >= 1% → 600s ban (1200s for SHORT after a >= 1.5% drop); 0 if calm."""
+    closes = ctx.closes_1m[:5]
+    if len(closes) < 2 or closes[-1] <= 0:
+        return 0
+    latest, oldest = closes[0], closes[-1]
+    change_pct = abs(latest - oldest) / oldest * 100
+    if change_pct < 1.0:
+        return 0
+    if oldest > latest and direction == 'SHORT' and change_pct >= 1.5:
+        return 1200
+    return 600
+
+
+def chase_move(ctx, ret_1m_threshold, ret_5m_threshold):
+    """'' or the 1m / 5m return that exceeded its threshold."""
+    closes = ctx.closes_1m
+    if len(closes) >= 2 and closes[1] > 0:
+        ret_1m = abs(closes[0] - closes[1]) / closes[1] * 100
+        if ret_1m > ret_1m_threshold:
+            return f'ret_1m={ret_1m:.2f}% > {ret_1m_threshold}%'
+    if len(closes) >= 6 and closes[5] > 0:
+        ret_5m = abs(closes[0] - closes[5]) / closes[5] * 100
+        if ret_5m > ret_5m_threshold:
+            return f'ret_5m={ret_5m:.2f}% > {ret_5m_threshold}%'
+    return ''
+
+
+def signal_age(ctx, key):
+    """Seconds since alert_dedup_state key was last sent (None if not within 1h)."""
+    ts = ctx.signals.get(key)
+    return int(ctx.now - ts) if ts is not None else None
+
+
+# ── verdict / timing log ──
+
+class GuardLog:
+    """Verdict and timing of each guard run in one cycle."""
+
+    def __init__(self):
+        self.entries = []        # (name, ok, detail, ms)
+
+    def check(self, name, fn, *args, **kwargs):
+        """Run fn (returning (ok, ...)) in span 'guard:<name>' and record its verdict."""
+        t0 = time.perf_counter()
+        with perf_trace.span(f'guard:{name}'):
+            result = fn(*args, **kwargs)
+            ok = bool(result[0])
+            perf_trace.count('pass' if ok else 'block')
+        self.entries.append((name, ok, result[1:], (time.perf_counter() - t0) * 1000))
+        return result
+
+    def blocked(self):
+        """Name of the guard that blocked, or None."""
+        for name, ok, _, _ in self.entries:
+            if not ok:
+                return name
+        return None
+
+    def summary(self):
+        return ' '.join(f'{n}={"ok" if ok else "BLOCK"}({ms:.1f}ms)'
+                        for n, ok, _, ms in self.entries)
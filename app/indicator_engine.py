@@ -0,0 +1,337 @@
+"""
+indicator_engine.py — Streaming incremental indicator engine.
+
+Keeps BB / Ichimoku / RSI / ATR / MA / EMA / VWAP state for one symbol+tf and
+updates it in O(1) per bar instead of recomputing 300 candles every tick.
+
+Bars are fed in ts order via update(). Feeding the same ts again revises the
+open (forming) bar; feeding a newer ts closes the previous bar and opens a new
+one. Committed state only ever contains closed bars, so intra-bar revisions
+never have to be undone.
+
+compute_full() is the reference full recompute (indicator_lib) and is used
+by tests to check the engine for equivalence.
+
+Usage:
+    from indicator_engine import IndicatorEngine
+    eng = IndicatorEngine()
+    eng.seed(rows)                      # rows: [(ts, o, h, l, c, v), ...] ASC
+    vals = eng.update(ts, o, h, l, c, v)
+"""
+import math
+from collections import deque
+
+import indicator_lib as il
+
+BB_PERIOD = 20
+BB_STD = 2
+ICHI_TENKAN = 9
+ICHI_KIJUN = 26
+ICHI_SPAN_B = 52
+VOL_MA_PERIOD = 20
+RSI_PERIOD = 14
+ATR_PERIOD = 14
+MA_PERIODS = (50, 200)
+EMA_PERIODS = (9, 21, 50)
+
+# Rolling sums are rebuilt from their window every N pushes to bound
+# floating-point drift from repeated add/subtract.
+_RESYNC_EVERY = 1024
+
+
+# ── Full recompute (reference) ───────────────────────────
+
+def compute_full(rows):
+    """Recompute all indicators from scratch for the last row.
+
+    rows: list of (ts, o, h, l, c, v) sorted ASC by ts.
+    VWAP accumulates every row on the last row's UTC day.
+    Returns dict keyed like the indicators table columns.
+    """
+    return il.latest_indicators(rows)
+
+
+# ── Rolling primitives ───────────────────────────────────
+
+class _RollingSum:
+    """Sum (and optionally sum of squares) of the last `size` pushed values.
+
+    Values are stored relative to a shift so that the variance of prices near
+    100k does not lose precision to cancellation.
+    """
+
+    __slots__ = ('size', 'buf', 'total', 'total_sq', 'shift', '_pushes')
+
+    def __init__(self, size):
+        self.size = size
+        self.buf = deque()
+        self.total = 0.0
+        self.total_sq = 0.0
+        self.shift = None
+        self._pushes = 0
+
+    def push(self, x):
+        if self.size <= 0:
+            return
+        if self.shift is None:
+            self.shift = x
+        d = x - self.shift
+        self.buf.append(x)
+        self.total += d
+        self.total_sq += d * d
+        if len(self.buf) > self.size:
+            old = self.buf.popleft() - self.shift
+            self.total -= old
+            self.total_sq -= old * old
+        self._pushes += 1
+        if self._pushes >= _RESYNC_EVERY:
+            self._resync()
+
+    def _resync(self):
+        self._pushes = 0
+        self.shift = self.buf[-1] if self.buf else None
+        if self.shift is None:
+            self.total = self.total_sq = 0.0
+            return
+        ds = [x - self.shift for x in self.buf]
+        self.total = math.fsum(ds)
+        self.total_sq = math.fsum(d * d for d in ds)
+
+    def __len__(self):
+        return len(self.buf)
+
+    def window_sum(self):
+        """Sum of the values currently in the window."""
+        if self.shift is None:
+            return 0.0
+        return self.total + self.shift * len(self.buf)
+
+    def sum_with(self, x):
+        """Sum of the window plus one extra (uncommitted) value."""
+        shift = self.shift if self.shift is not None else x
+        return self.total + shift * len(self.buf) + x
+
+    def mean_var_with(self, x):
+        """(mean, population variance) of the window plus one extra value."""
+        shift = self.shift if self.shift is not None else x
+        n = len(self.buf) + 1
+        d = x - shift
+        s = self.total + d
+        sq = self.total_sq + d * d
+        mean_d = s / n
+        var = sq / n - mean_d * mean_d
+        return shift + mean_d, max(var, 0.0)
+
+
+class _RollingExtreme:
+    """Max (or min) of the last `size` pushed values via a monotonic deque."""
+
+    __slots__ = ('size', 'is_max', 'dq', 'idx')
+
+    def __init__(self, size, is_max):
+        self.size = size
+        self.is_max = is_max
+        self.dq = deque()   # (idx, value), values monotonic
+        self.idx = 0
+
+    def push(self, x):
+        if self.size <= 0:
+            return
+        dq = self.dq
+        if self.is_max:
+            while dq and dq[-1][1] <= x:
+                dq.pop()
+        else:
+            while dq and dq[-1][1] >= x:
+                dq.pop()
+        dq.append((self.idx, x))
+        self.idx += 1
+        while dq[0][0] <= self.idx - 1 - self.size:
+            dq.popleft()
+
+    def extreme_with(self, x):
+        """Extreme of the window plus one extra (uncommitted) value."""
+        if not self.dq:
+            return x
+        cur = self.dq[0][1]
+        return max(cur, x) if self.is_max else min(cur, x)
+
+
+class _RunningEma:
+    """EMA seeded with the SMA of the first `period` values (matches ema())."""
+
+    __slots__ = ('period', 'k', 'count', 'seed_sum', 'value')
+
+    def __init__(self, period):
+        self.period = period
+        self.k = 2 / (period + 1)
+        self.count = 0
+        self.seed_sum = 0.0
+        self.value = None
+
+    def push(self, x):
+        self.count += 1
+        if self.count < self.period:
+            self.seed_sum += x
+        elif self.count == self.period:
+            self.value = (self.seed_sum + x) / self.period
+        else:
+            self.value = (x - self.value) * self.k + self.value
+
+    def value_with(self, x):
+        n = self.count + 1
+        if n < self.period:
+            return None
+        if n == self.period:
+            return (self.seed_sum + x) / self.period
+        return (x - self.value) * self.k + self.value
+
+
+# ── Engine ───────────────────────────────────────────────
+
+class IndicatorEngine:
+    """O(1)-per-bar indicator state for a single symbol/timeframe."""
+
+    def __init__(self):
+        self.reset()
+
+    def reset(self):
+        # Each window holds period-1 closed bars; the open bar is the +1.
+        self._closes_bb = _RollingSum(BB_PERIOD - 1)
+        self._closes_ma = {p: _RollingSum(p - 1) for p in MA_PERIODS}
+        self._vols = _RollingSum(VOL_MA_PERIOD - 1)
+        self._gains = _RollingSum(RSI_PERIOD - 1)
+        self._losses = _RollingSum(RSI_PERIOD - 1)
+        self._trs = _RollingSum(ATR_PERIOD - 1)
+        self._hi = {p: _RollingExtreme(p - 1, True)
+                    for p in (ICHI_TENKAN, ICHI_KIJUN, ICHI_SPAN_B)}
+        self._lo = {p: _RollingExtreme(p - 1, False)
+                    for p in (ICHI_TENKAN, ICHI_KIJUN, ICHI_SPAN_B)}
+        self._emas = {p: _RunningEma(p) for p in EMA_PERIODS}
+        self._vwap_day = None
+        self._vwap_pv = 0.0
+        self._vwap_vol = 0.0
+        self._prev_close = None
+        self.closed_count = 0
+        self._open = None   # (ts, o, h, l, c, v) of the forming bar
+
+    @property
+    def bar_count(self):
+        """Closed bars plus the open bar, i.e. len(rows) for compute_full."""
+        return self.closed_count + (1 if self._open else 0)
+
+    @property
+    def last_ts(self):
+        return self._open[0] if self._open else None
+
+    def seed(self, rows):
+        """Feed a history of (ts, o, h, l, c, v) rows ASC. Returns last values."""
+        self.reset()
+        vals = None
+        for r in rows:
+            vals = self.update(*r)
+        return vals
+
+    def update(self, ts, o, h, l, c, v):
+        """Feed a bar. Same ts as the open bar revises it; a newer ts closes it.
+
+        Returns the indicator dict for this bar, or None for an out-of-order
+        (older) bar, which is ignored.
+        """
+        bar = (ts, float(o), float(h), float(l), float(c), float(v))
+        if self._open is not None:
+            if ts < self._open[0]:
+                return None
+            if ts > self._open[0]:
+                self._commit(self._open)
+        self._open = bar
+        return self._values(bar)
+
+    def current(self):
+        """Indicator dict for the open bar, or None before the first bar."""
+        return self._values(self._open) if self._open else None
+
+    def _tr(self, h, l):
+        pc = self._prev_close
+        return max(h - l, abs(h - pc), abs(l - pc))
+
+    def _commit(self, bar):
+        ts, _o, h, l, c, v = bar
+        self._closes_bb.push(c)
+        for s in self._closes_ma.values():
+            s.push(c)
+        self._vols.push(v)
+        if self._prev_close is not None:
+            d = c - self._prev_close
+            self._gains.push(d if d > 0 else 0.0)
+            self._losses.push(-d if d < 0 else 0.0)
+            self._trs.push(self._tr(h, l))
+        for p in self._hi:
+            self._hi[p].push(h)
+            self._lo[p].push(l)
+        for e in self._emas.values():
+            e.push(c)
+        day = il.utc_day(ts)
+        if day != self._vwap_day:
+            self._vwap_day = day
+            self._vwap_pv = 0.0
+            self._vwap_vol = 0.0
+        self._vwap_pv += (h + l + c) / 3 * v
+        self._vwap_vol += v
+        self._prev_close = c
+        self.closed_count += 1
+
+    def _values(self, bar):
+        ts, _o, h, l, c, v = bar
+        n = self.closed_count + 1
+
+        bb_mid = bb_up = bb_dn = None
+        if n >= BB_PERIOD:
+            bb_mid, var = self._closes_bb.mean_var_with(c)
+            sd = var ** 0.5
+            bb_up = bb_mid + BB_STD * sd
+            bb_dn = bb_mid - BB_STD * sd
+
+        hi = {p: e.extreme_with(h) for p, e in self._hi.items()}
+        lo = {p: e.extreme_with(l) for p, e in self._lo.items()}
+        tenkan = (hi[ICHI_TENKAN] + lo[ICHI_TENKAN]) / 2
+        kijun = (hi[ICHI_KIJUN] + lo[ICHI_KIJUN]) / 2
+        span_a = (tenkan + kijun) / 2
+        span_b = (hi[ICHI_SPAN_B] + lo[ICHI_SPAN_B]) / 2
+
+        vol_ma20 = self._vols.sum_with(v) / min(n, VOL_MA_PERIOD)
+        vol_spike = v > vol_ma20 * 2
+
+        rsi_14 = atr_14 = None
+        if n >= RSI_PERIOD + 1:
+            d = c - self._prev_close
+            avg_gain = self._gains.sum_with(d if d > 0 else 0.0) / RSI_PERIOD
+            avg_loss = self._losses.sum_with(-d if d < 0 else 0.0) / RSI_PERIOD
+            if avg_loss > 0:
+                rsi_14 = 100 - 100 / (1 + avg_gain / avg_loss)
+            else:
+                rsi_14 = 100.0
+        if n >= ATR_PERIOD + 1:
+            atr_14 = self._trs.sum_with(self._tr(h, l)) / ATR_PERIOD
+
+        ma = {p: (s.sum_with(c) / p if n >= p else None)
+              for p, s in self._closes_ma.items()}
+        emas = {p: e.value_with(c) for p, e in self._emas.items()}
+
+        pv, vv = (self._vwap_pv, self._vwap_vol) \
+            if il.utc_day(ts) == self._vwap_day else (0.0, 0.0)
+        pv += (h + l + c) / 3 * v
+        vv += v
+        vwap_val = pv / vv if vv > 0 else None
+
+        return {
+            'ts': ts,
+            'bb_mid': bb_mid, 'bb_up': bb_up, 'bb_dn': bb_dn,
+            'ich_tenkan': tenkan, 'ich_kijun': kijun,
+            'ich_span_a': span_a, 'ich_span_b': span_b,
+            'vol': v, 'vol_ma20': vol_ma20, 'vol_spike': vol_spike,
+            'rsi_14': rsi_14, 'atr_14': atr_14,
+            'ma_50': ma[50], 'ma_200': ma[200],
+            'ema_9': emas[9], 'ema_21': emas[21], 'ema_50': emas[50],
+            'vwap': vwap_val,
+        }
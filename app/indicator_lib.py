@@ -0,0 +1,374 @@
+"""
+indicator_lib.py — Shared vectorized indicator library (NumPy, float64).
+
+Single implementation of the indicators used across daemons (indicators,
+mtf_resampler, market_snapshot, strategy features, market_context ADX).
+All inputs are converted once to contiguous float64 arrays.
+
+Two APIs:
+  - Batch:  sma(x, n), ema(x, n), rsi(c, n), atr(h, l, c, n), bollinger(c),
+            ichimoku(h, l), adx(h, l, c, n) ... → arrays aligned with the
+            input, NaN where the window is not yet full.
+  - Last:   *_last(...) → float (or None) for the newest bar only, computed
+            on the minimal tail where the indicator allows it.
+  - Frame:  indicator_frame(rows) → every indicators-table column for every
+            row at once (historical backfill); row i equals
+            latest_indicators(rows[:i + 1]).
+
+Definitions follow what the repo has always stored:
+  - RSI / ATR use a simple average over the last `n` deltas / true ranges.
+  - ADX uses Wilder smoothing; the first DX is taken from the seed averages
+    (market_context/adx_calculator semantics).
+  - EMA is seeded with the SMA of the first `n` values.
+
+Usage:
+    import indicator_lib as il
+    c = il.as_array(closes)
+    il.ema_last(c, 21); il.rsi(c, 14)
+    il.latest_indicators(rows)   # rows: [(ts, o, h, l, c, v), ...] ASC
+"""
+from datetime import datetime, timezone
+
+import numpy as np
+from numpy.lib.stride_tricks import sliding_window_view
+
+
+def as_array(xs):
+    """Contiguous float64 view/copy of a sequence (Decimal/None-free)."""
+    return np.ascontiguousarray(xs, dtype=np.float64)
+
+
+def ohlcv_arrays(rows):
+    """Split (ts, o, h, l, c, v) rows into (ts_list, o, h, l, c, v) arrays."""
+    if not rows:
+        e = np.empty(0, dtype=np.float64)
+        return [], e, e, e, e, e
+    cols = list(zip(*rows))
+    return (list(cols[0]), as_array(cols[1]), as_array(cols[2]),
+            as_array(cols[3]), as_array(cols[4]), as_array(cols[5]))
+
+
+def _nan(n):
+    return np.full(n, np.nan)
+
+
+def _last(arr):
+    """Last element as float, or None if empty/NaN."""
+    if len(arr) == 0:
+        return None
+    v = float(arr[-1])
+    return None if np.isnan(v) else v
+
+
+# ── Rolling windows ──────────────────────────────────────
+
+def _rolling(x, n, fn):
+    x = as_array(x)
+    out = _nan(len(x))
+    if n > 0 and len(x) >= n:
+        out[n - 1:] = fn(sliding_window_view(x, n), axis=1)
+    return out
+
+
+def _rolling_partial(x, n, fn):
+    """Like _rolling, but the first n-1 entries use the shorter window available."""
+    x = as_array(x)
+    out = _rolling(x, n, fn)
+    for i in range(min(n - 1, len(x))):
+        out[i] = fn(x[:i + 1])
+    return out
+
+
+def sma(x, n):
+    return _rolling(x, n, np.mean)
+
+
+def rolling_std(x, n):
+    """Population standard deviation over `n` values."""
+    return _rolling(x, n, np.std)
+
+
+def rolling_max(x, n):
+    return _rolling(x, n, np.max)
+
+
+def rolling_min(x, n):
+    return _rolling(x, n, np.min)
+
+
+def ema(x, n):
+    """EMA seeded with SMA(first n). NaN before index n-1."""
+    x = as_array(x)
+    out = _nan(len(x))
+    if len(x) < n:
+        return out
+    k = 2 / (n + 1)
+    v = float(x[:n].mean())
+    vals = [v]
+    for p in x[n:].tolist():
+        v = (p - v) * k + v
+        vals.append(v)
+    out[n - 1:] = vals
+    return out
+
+
+def true_range(h, l, c):
+    """True range; index 0 is NaN (no previous close)."""
+    h, l, c = as_array(h), as_array(l), as_array(c)
+    out = _nan(len(c))
+    if len(c) >= 2:
+        pc = c[:-1]
+        out[1:] = np.maximum(h[1:] - l[1:],
+                             np.maximum(np.abs(h[1:] - pc), np.abs(l[1:] - pc)))
+    return out
+
+
+def atr(h, l, c, n=14):
+    """Simple average of the last `n` true ranges (needs n+1 bars)."""
+    tr = true_range(h, l, c)
+    out = _nan(len(tr))
+    if len(tr) >= n + 1:
+        out[n:] = sma(tr[1:], n)[n - 1:]
+    return out
+
+
+def rsi(c, n=14):
+    """RSI from simple averages of the last `n` gains/losses (needs n+1 bars)."""
+    c = as_array(c)
+    out = _nan(len(c))
+    if len(c) < n + 1:
+        return out
+    d = np.diff(c)
+    g = sma(np.where(d > 0, d, 0.0), n)[n - 1:]
+    lo = sma(np.where(d < 0, -d, 0.0), n)[n - 1:]
+    with np.errstate(divide='ignore', invalid='ignore'):
+        r = np.where(lo > 0, 100 - 100 / (1 + g / lo), 100.0)
+    out[n:] = r
+    return out
+
+
+def bollinger(c, n=20, k=2):
+    """(mid, upper, lower) Bollinger Bands with population std."""
+    mid = sma(c, n)
+    sd = rolling_std(c, n)
+    return mid, mid + k * sd, mid - k * sd
+
+
+def donchian(h, l, n=20):
+    """(upper, lower) Donchian channel."""
+    return rolling_max(h, n), rolling_min(l, n)
+
+
+def ichimoku(h, l, tenkan=9, kijun=26, span_b=52):
+    """(tenkan, kijun, span_a, span_b) — unshifted, as stored in indicators."""
+    t = (rolling_max(h, tenkan) + rolling_min(l, tenkan)) / 2
+    kj = (rolling_max(h, kijun) + rolling_min(l, kijun)) / 2
+    sb = (rolling_max(h, span_b) + rolling_min(l, span_b)) / 2
+    return t, kj, (t + kj) / 2, sb
+
+
+def adx(h, l, c, n=14):
+    """(adx, plus_di, minus_di) arrays using Wilder smoothing.
+
+    DI is defined from bar n (first smoothed window), ADX from bar 2n-1.
+    """
+    h, l, c = as_array(h), as_array(l), as_array(c)
+    size = len(c)
+    adx_out, pdi_out, mdi_out = _nan(size), _nan(size), _nan(size)
+    if size < n + 1:
+        return adx_out, pdi_out, mdi_out
+
+    up = h[1:] - h[:-1]
+    down = l[:-1] - l[1:]
+    pdm = np.where((up > down) & (up > 0), up, 0.0)
+    mdm = np.where((down > up) & (down > 0), down, 0.0)
+    tr = true_range(h, l, c)[1:]
+
+    s_tr = float(tr[:n].sum())
+    s_p = float(pdm[:n].sum())
+    s_m = float(mdm[:n].sum())
+    tr_l, p_l, m_l = tr[n:].tolist(), pdm[n:].tolist(), mdm[n:].tolist()
+
+    pdis, mdis, dxs = [], [], []
+    i = 0
+    while True:
+        if s_tr > 0:
+            pdi = 100 * s_p / s_tr
+            mdi = 100 * s_m / s_tr
+        else:
+            pdi = mdi = 0.0
+        di_sum = pdi + mdi
+        pdis.append(pdi)
+        mdis.append(mdi)
+        dxs.append(100 * abs(pdi - mdi) / di_sum if di_sum > 0 else 0.0)
+        if i >= len(tr_l):
+            break
+        s_tr = s_tr - s_tr / n + tr_l[i]
+        s_p = s_p - s_p / n + p_l[i]
+        s_m = s_m - s_m / n + m_l[i]
+        i += 1
+
+    pdi_out[n:] = pdis
+    mdi_out[n:] = mdis
+    if len(dxs) >= n:
+        a = sum(dxs[:n]) / n
+        adxs = [a]
+        for dx in dxs[n:]:
+            a = (a * (n - 1) + dx) / n
+            adxs.append(a)
+        adx_out[2 * n - 1:] = adxs
+    return adx_out, pdi_out, mdi_out
+
+
+def zscore_last(x, window):
+    """(x[-1] - mean) / std of the `window` values before it (population)."""
+    x = as_array(x)
+    if len(x) < 2:
+        return None
+    hist = x[-(window + 1):-1]
+    sd = float(hist.std())
+    if sd == 0:
+        return 0.0
+    return (float(x[-1]) - float(hist.mean())) / sd
+
+
+def logret_std(c):
+    """Population std of log returns of a price series (fraction, not %)."""
+    c = as_array(c)
+    if len(c) < 2:
+        return None
+    return float(np.diff(np.log(c)).std())
+
+
+def vwap(ts, h, l, c, v):
+    """Volume-weighted typical price of bars on the last bar's UTC day."""
+    if not ts:
+        return None
+    day = utc_day(ts[-1])
+    start = len(ts)
+    while start > 0 and utc_day(ts[start - 1]) == day:
+        start -= 1
+    h, l, c, v = as_array(h)[start:], as_array(l)[start:], as_array(c)[start:], as_array(v)[start:]
+    vol = float(v.sum())
+    if vol <= 0:
+        return None
+    return float((((h + l + c) / 3) * v).sum()) / vol
+
+
+def daily_vwap(ts, h, l, c, v):
+    """VWAP array that resets at every UTC midnight (NaN while day volume is 0)."""
+    h, l, c, v = as_array(h), as_array(l), as_array(c), as_array(v)
+    out = _nan(len(ts))
+    pv = (h + l + c) / 3 * v
+    start = 0
+    while start < len(ts):
+        day = utc_day(ts[start])
+        end = start + 1
+        while end < len(ts) and utc_day(ts[end]) == day:
+            end += 1
+        cum_v = np.cumsum(v[start:end])
+        with np.errstate(divide='ignore', invalid='ignore'):
+            out[start:end] = np.where(cum_v > 0, np.cumsum(pv[start:end]) / cum_v, np.nan)
+        start = end
+    return out
+
+
+def utc_day(ts):
+    """UTC calendar date of a bar timestamp (datetime or epoch ms)."""
+    if isinstance(ts, (int, float)):
+        return datetime.fromtimestamp(ts / 1000, tz=timezone.utc).date()
+    if ts.tzinfo is None:
+        return ts.replace(tzinfo=timezone.utc).date()
+    return ts.astimezone(timezone.utc).date()
+
+
+# ── Last-value API ───────────────────────────────────────
+
+def sma_last(x, n):
+    x = as_array(x)
+    return float(x[-n:].mean()) if len(x) >= n else None
+
+
+def ema_last(x, n):
+    return _last(ema(x, n))
+
+
+def rsi_last(c, n=14):
+    return _last(rsi(as_array(c)[-(n + 1):], n))
+
+
+def atr_last(h, l, c, n=14):
+    t = n + 1
+    return _last(atr(as_array(h)[-t:], as_array(l)[-t:], as_array(c)[-t:], n))
+
+
+def adx_last(h, l, c, n=14):
+    """Latest {'adx', 'plus_di', 'minus_di'} or None if ADX is undefined."""
+    a, p, m = adx(h, l, c, n)
+    if _last(a) is None:
+        return None
+    return {'adx': _last(a), 'plus_di': _last(p), 'minus_di': _last(m)}
+
+
+def donchian_last(h, l, n=20):
+    h, l = as_array(h), as_array(l)
+    if len(h) < n:
+        return None, None
+    return float(h[-n:].max()), float(l[-n:].min())
+
+
+def latest_indicators(rows):
+    """Full indicators-table row for the newest of (ts, o, h, l, c, v) rows ASC.
+
+    Windows shorter than their period use what is available for Ichimoku and
+    vol_ma20 (as the original daemon did); RSI/ATR/MA/EMA are None until full.
+    """
+    ts, _o, h, l, c, v = ohlcv_arrays(rows)
+    w = min(20, len(c))
+    mid = float(c[-w:].mean())
+    sd = float(c[-w:].std())
+
+    def _hl(n):
+        return (float(h[-n:].max()) + float(l[-n:].min())) / 2
+
+    tenkan, kijun, span_b = _hl(9), _hl(26), _hl(52)
+    vol = float(v[-1])
+    vol_ma20 = float(v[-20:].mean())
+    return {
+        'ts': ts[-1],
+        'bb_mid': mid, 'bb_up': mid + 2 * sd, 'bb_dn': mid - 2 * sd,
+        'ich_tenkan': tenkan, 'ich_kijun': kijun,
+        'ich_span_a': (tenkan + kijun) / 2, 'ich_span_b': span_b,
+        'vol': vol, 'vol_ma20': vol_ma20, 'vol_spike': vol > vol_ma20 * 2,
+        'rsi_14': rsi_last(c, 14), 'atr_14': atr_last(h, l, c, 14),
+        'ma_50': sma_last(c, 50), 'ma_200': sma_last(c, 200),
+        'ema_9': ema_last(c, 9), 'ema_21': ema_last(c, 21), 'ema_50': ema_last(c, 50),
+        'vwap': vwap(ts, h, l, c, v),
+    }
+
+
+def indicator_frame(rows):
+    """indicators-table columns for every row of (ts, o, h, l, c, v) rows ASC.
+
+    Returns (ts_list, {column: float64 array}) with NaN where latest_indicators
+    would return None; vol_spike is a bool array.
+    """
+    ts, _o, h, l, c, v = ohlcv_arrays(rows)
+    mid = _rolling_partial(c, 20, np.mean)
+    sd = _rolling_partial(c, 20, np.std)
+
+    def _hl(n):
+        return (_rolling_partial(h, n, np.max) + _rolling_partial(l, n, np.min)) / 2
+
+    tenkan, kijun, span_b = _hl(9), _hl(26), _hl(52)
+    vol_ma20 = _rolling_partial(v, 20, np.mean)
+    return ts, {
+        'bb_mid': mid, 'bb_up': mid + 2 * sd, 'bb_dn': mid - 2 * sd,
+        'ich_tenkan': tenkan, 'ich_kijun': kijun,
+        'ich_span_a': (tenkan + kijun) / 2, 'ich_span_b': span_b,
+        'vol': v, 'vol_ma20': vol_ma20, 'vol_spike': v > vol_ma20 * 2,
+        'rsi_14': rsi(c, 14), 'atr_14': atr(h, l, c, 14),
+        'ma_50': sma(c, 50), 'ma_200': sma(c, 200),
+        'ema_9': ema(c, 9), 'ema_21': ema(c, 21), 'ema_50': ema(c, 50),
+        'vwap': daily_vwap(ts, h, l, c, v),
+    }
@@ -12,6 +12,8 @@ All functions are FAIL-OPEN: errors return safe defaults.
 import os
 import time
 
+import exchange_state
+
 SYMBOL = 'BTC/USDT:USDT'
 LOG_PREFIX = '[integrity]'
 
@@ -42,7 +44,7 @@ def check_integrity(ex, cur, symbol) -> dict:
         exch_side = None
         exch_qty = 0.0
         try:
-            positions = ex.fetch_positions([symbol])
+            positions = exchange_state.fetch_positions(ex, [symbol])
             for p in positions:
                 qty = abs(float(p.get('contracts', 0) or 0))
                 if qty > 1e-09:
@@ -63,12 +65,13 @@ def check_integrity(ex, cur, symbol) -> dict:
         active_count = 0
         conditional_count = 0
         try:
-            active_orders = ex.fetch_open_orders(symbol)
+            active_orders = exchange_state.fetch_open_orders(ex, symbol)
             active_count = len(active_orders) if active_orders else 0
         except Exception:
             pass
         try:
-            cond_orders = ex.fetch_open_orders(symbol, params={'orderFilter': 'StopOrder'})
+            cond_orders = exchange_state.fetch_open_orders(
+                ex, symbol, params={'orderFilter': 'StopOrder'})
             conditional_count = len(cond_orders) if cond_orders else 0
         except Exception:
             pass
@@ -0,0 +1,268 @@
+"""
+kline_stream.py — Bybit public kline WebSocket → candle writer.
+
+Replaces REST polling for the live candle feed. KlineStream turns kline
+topic messages into [ts_ms, o, h, l, c, v] bars and hands only bars that
+changed (or just closed, confirm=true) to a write callback.
+
+Gaps are filled over REST (backfill_utils.fetch_bybit_kline):
+  - on every (re)connect, from the last closed bar written up to the first
+    streamed bar;
+  - when the stream skips bars, or moves on without the previous bar's
+    confirm message;
+  - after a failed write (the bar may never have reached the DB).
+
+run() owns one WebSocket connection, shared by every symbol's stream, and
+returns when it drops; the caller loops for reconnects. A watchdog closes
+the socket if no kline arrives within STALE_SEC so half-open connections do
+not go unnoticed.
+
+Usage:
+    stream = KlineStream('BTC/USDT:USDT', '1m', write_fn, last_ms=db_max_ts_ms)
+    while True:
+        kline_stream.run(stream)        # or run([btc_stream, eth_stream, ...])
+        time.sleep(backoff)
+"""
+import os
+import json
+import time
+import threading
+
+import websocket
+
+from backfill_utils import fetch_bybit_kline, normalize_symbol, TF_TO_INTERVAL
+
+LOG_PREFIX = '[kline_stream]'
+WS_URL = os.getenv('BYBIT_WS_PUBLIC_URL', 'wss://stream.bybit.com/v5/public/linear')
+TF_MS = {'1m': 60_000, '3m': 180_000, '5m': 300_000, '15m': 900_000, '1h': 3_600_000}
+REST_LIMIT = 1000
+MAX_GAP_BARS = 10_000      # older holes are backfill_candles' job
+GAP_RETRY_SEC = 10
+KEEP_WRITTEN = 8           # recent bars remembered for change detection
+STALE_SEC = 90
+
+
+def _log(msg):
+    print(f'{LOG_PREFIX} {msg}', flush=True)
+
+
+class KlineStream:
+    """Kline message handling + REST gap fill for one symbol/timeframe.
+
+    write_fn(bars) receives [[ts_ms, o, h, l, c, v], ...] ASC and must raise
+    on failure; bars are only remembered as written once it returns.
+    on_close(bars), if given, then gets the written bars that are closed
+    (confirm / gap fill); its errors are logged, not raised.
+    """
+
+    def __init__(self, symbol, tf, write_fn, fetch_fn=fetch_bybit_kline,
+                 last_ms=None, log_fn=None, on_close=None):
+        self.symbol = symbol
+        self.tf = tf
+        self.step = TF_MS[tf]
+        self.topic = f'kline.{TF_TO_INTERVAL[tf]}.{normalize_symbol(symbol)}'
+        self.write_fn = write_fn
+        self.fetch_fn = fetch_fn
+        self.on_close = on_close
+        self._log = log_fn or _log
+        # The newest stored bar may still have been open — refetch it
+        self.last_seen_ms = last_ms
+        self.last_closed_ms = last_ms - self.step if last_ms is not None else None
+        self.last_msg_at = None
+        self._written = {}         # ts_ms → ((o, h, l, c, v), closed)
+        self._gap_pending = True
+        self._gap_retry_at = 0
+        self.stats = {'msgs': 0, 'written': 0, 'skipped': 0,
+                      'gap_fills': 0, 'gap_bars': 0, 'write_errors': 0}
+
+    def on_connect(self):
+        """Anything may have been missed while disconnected."""
+        self._gap_pending = True
+        self._gap_retry_at = 0
+
+    # ── Change tracking ──
+
+    def _is_new(self, bar, closed):
+        prev = self._written.get(bar[0])
+        if prev is None:
+            return True
+        # Same values: only the close transition is worth a write
+        return prev[0] != tuple(bar[1:]) or (closed and not prev[1])
+
+    def _mark(self, bars, closed_flags):
+        for bar, closed in zip(bars, closed_flags):
+            ts = bar[0]
+            self._written[ts] = (tuple(bar[1:]), closed)
+            if self.last_seen_ms is None or ts > self.last_seen_ms:
+                self.last_seen_ms = ts
+            if closed and (self.last_closed_ms is None or ts > self.last_closed_ms):
+                self.last_closed_ms = ts
+        while len(self._written) > KEEP_WRITTEN:
+            del self._written[min(self._written)]
+
+    def _write(self, bars, closed_flags):
+        if not bars:
+            return 0
+        try:
+            self.write_fn(bars)
+        except Exception as e:
+            self.stats['write_errors'] += 1
+            self._gap_pending = True
+            self._log(f'write error ({len(bars)} bars): {e}')
+            return 0
+        self._mark(bars, closed_flags)
+        self.stats['written'] += len(bars)
+        closed = [b for b, c in zip(bars, closed_flags) if c]
+        if closed and self.on_close is not None:
+            try:
+                self.on_close(closed)
+            except Exception as e:
+                self._log(f'on_close error: {e}')
+        return len(bars)
+
+    # ── Gap fill ──
+
+    def _fill_gap(self, upto_ms):
+        """Fetch closed bars in [last_closed + 1 bar, upto_ms) over REST."""
+        if self.last_closed_ms is not None:
+            since = self.last_closed_ms + self.step
+        else:
+            since = self.last_seen_ms
+        if since is None or since >= upto_ms:
+            return True
+        if (upto_ms - since) // self.step > MAX_GAP_BARS:
+            self._log(f'gap of {(upto_ms - since) // self.step} bars truncated '
+                      f'to {MAX_GAP_BARS}')
+            since = upto_ms - MAX_GAP_BARS * self.step
+        self.stats['gap_fills'] += 1
+        filled = 0
+        while since < upto_ms:
+            try:
+                rest = self.fetch_fn(self.symbol, self.tf, since,
+                                     limit=REST_LIMIT, log_fn=self._log)
+            except Exception as e:
+                self._log(f'gap fill REST error: {e}')
+                return False
+            bars = [list(b) for b in rest if since <= b[0] < upto_ms]
+            if not bars:
+                break
+            todo = [b for b in bars if self._is_new(b, True)]
+            if todo and not self._write(todo, [True] * len(todo)):
+                return False
+            filled += len(todo)
+            # Bars before upto_ms are closed even if unchanged
+            self._mark(bars, [True] * len(bars))
+            since = bars[-1][0] + self.step
+        self.stats['gap_bars'] += filled
+        if filled:
+            self._log(f'gap filled: {filled} bars up to {upto_ms}')
+        return True
+
+    # ── Messages ──
+
+    def handle_message(self, raw):
+        """Process one WS message. Returns the number of bars written."""
+        try:
+            data = json.loads(raw)
+        except (TypeError, ValueError):
+            return 0
+        if data.get('topic') != self.topic:
+            if data.get('op') == 'subscribe' and not data.get('success', True):
+                self._log(f'subscribe failed: {data.get("ret_msg")}')
+            return 0
+        self.stats['msgs'] += 1
+        self.last_msg_at = time.time()
+
+        bars = []
+        for k in data.get('data') or []:
+            try:
+                bars.append(([int(k['start']), float(k['open']), float(k['high']),
+                              float(k['low']), float(k['close']), float(k['volume'])],
+                             bool(k.get('confirm'))))
+            except (KeyError, TypeError, ValueError):
+                continue
+        if not bars:
+            return 0
+        bars.sort(key=lambda b: b[0][0])
+
+        first = bars[0][0][0]
+        # Skipped bars, or the previous bar rolled over without its confirm
+        jumped = self.last_seen_ms is not None and first > self.last_seen_ms and (
+            first > self.last_seen_ms + self.step
+            or self.last_closed_ms is None or self.last_closed_ms < self.last_seen_ms)
+        if (self._gap_pending or jumped) and time.time() >= self._gap_retry_at:
+            if self._fill_gap(first):
+                self._gap_pending = False
+            else:
+                self._gap_pending = True
+                self._gap_retry_at = time.time() + GAP_RETRY_SEC
+
+        todo, flags = [], []
+        for bar, closed in bars:
+            if self._is_new(bar, closed):
+                todo.append(bar)
+                flags.append(closed)
+            else:
+                self.stats['skipped'] += 1
+        n = self._write(todo, flags)
+        for bar, closed in zip(todo, flags):
+            if closed and n:
+                self._log(f'closed {self.tf} ts_ms={bar[0]} c={bar[4]}')
+        return n
+
+
+def run(streams, url=WS_URL, ping_interval=20, ping_timeout=10, stale_sec=STALE_SEC):
+    """Stream until the connection drops (or goes stale). Returns on close.
+
+    streams: one KlineStream or a list of them; all topics share a single
+    connection and messages are dispatched by topic.
+    """
+    if isinstance(streams, KlineStream):
+        streams = [streams]
+    by_topic = {s.topic: s for s in streams}
+    head = streams[0]
+    done = threading.Event()
+
+    def _on_open(ws):
+        head._log(f'WS connected, subscribing {", ".join(by_topic)}')
+        now = time.time()
+        for s in streams:
+            s.on_connect()
+            s.last_msg_at = now
+        ws.send(json.dumps({'op': 'subscribe', 'args': list(by_topic)}))
+
+    def _on_message(ws, message):
+        try:
+            topic = json.loads(message).get('topic')
+        except (TypeError, ValueError, AttributeError):
+            return
+        stream = by_topic.get(topic)
+        if stream is not None:
+            stream.handle_message(message)
+        else:
+            head.handle_message(message)     # subscribe acks / errors
+
+    def _on_error(ws, error):
+        head._log(f'WS error: {error}')
+
+    def _on_close(ws, code, msg):
+        head._log(f'WS closed: code={code} msg={msg}')
+
+    ws = websocket.WebSocketApp(url, on_open=_on_open, on_message=_on_message,
+                                on_error=_on_error, on_close=_on_close)
+
+    def _watchdog():
+        # Connection-level liveness: any topic counts
+        while not done.wait(min(5, stale_sec)):
+            seen = [s.last_msg_at for s in streams if s.last_msg_at is not None]
+            if seen and time.time() - max(seen) > stale_sec:
+                head._log(f'no kline for {stale_sec}s — reconnecting')
+                ws.close()
+                return
+
+    t = threading.Thread(target=_watchdog, daemon=True)
+    t.start()
+    try:
+        ws.run_forever(ping_interval=ping_interval, ping_timeout=ping_timeout)
+    finally:
+        done.set()
@@ -4,8 +4,12 @@ live_event_detector.py — Real-time volatility spike detection daemon.
 Every 30s:
   1. Check KILL_SWITCH
   2. Fetch latest 10 5m candles from Bybit -> upsert to market_ohlcv
+     (every symbol in market_symbols.get_symbols(), longest-waiting first)
   3. Compute z-score from last 2h of market_ohlcv rolling stats
+     (one query for all symbols)
   4. If z-score > 2.0 and no event in last 2 min -> create LIVE_VOL_SPIKE event
+     (trading symbol only; other symbols are tracked and logged — the events
+     table feeds BTC scoring)
   5. Link recent news (+/-30 min) via event_news
 """
 import os
@@ -21,9 +25,14 @@ import ccxt
 from psycopg2 import OperationalError, InterfaceError
 from ccxt.base.errors import RateLimitExceeded, NetworkError
 from db_config import get_conn
+import candle_writer
 import fact_categories
+from db_migrations import ensure_pipeline_lag
+from market_symbols import get_symbols, FairScheduler, LagTracker
 
-SYMBOL = 'BTC/USDT:USDT'
+SYMBOLS = get_symbols()
+SYMBOL = SYMBOLS[0]
+EVENT_SYMBOLS = frozenset({SYMBOL})
 TF = '5m'
 POLL_SEC = 30
 ZSCORE_THRESHOLD = 2.0    # 기존 3.0 — 더 빈번한 변동성 감지
@@ -57,7 +66,11 @@ def _get_exchange():
     return _exchange
 
 
-def _fetch_and_upsert(cur):
+_sched = FairScheduler(SYMBOLS)
+_lag = LagTracker('live_event_5m')
+
+
+def _fetch_and_upsert(cur, symbol=SYMBOL):
     """Fetch latest 5m candles and upsert to market_ohlcv.
 
     Retries once on RateLimitExceeded with a 2s pause.
@@ -65,7 +78,7 @@ def _fetch_and_upsert(cur):
     ex = _get_exchange()
     for attempt in range(2):
         try:
-            ohlcv = ex.fetch_ohlcv(SYMBOL, timeframe=TF, limit=10)
+            ohlcv = ex.fetch_ohlcv(symbol, timeframe=TF, limit=10)
             break
         except RateLimitExceeded:
             if attempt == 0:
@@ -75,39 +88,55 @@ def _fetch_and_upsert(cur):
                 raise
     if not ohlcv:
         return 0
-    for ms, o, h, l, c, v in ohlcv:
-        cur.execute("""
-            INSERT INTO market_ohlcv (symbol, tf, ts, o, h, l, c, v)
-            VALUES (%s, %s, to_timestamp(%s/1000.0), %s, %s, %s, %s, %s)
-            ON CONFLICT (symbol, tf, ts) DO UPDATE
-            SET o=EXCLUDED.o, h=EXCLUDED.h, l=EXCLUDED.l,
-                c=EXCLUDED.c, v=EXCLUDED.v;
-        """, (SYMBOL, TF, ms, o, h, l, c, v))
+    try:
+        res = candle_writer.upsert_ohlcv(cur, 'market_ohlcv', symbol, TF, ohlcv)
+    except Exception:
+        candle_writer.get_writer('market_ohlcv').discard(symbol, TF)
+        raise
+    if res['written']:
+        _log(f"market_ohlcv {symbol} {TF}: written={res['written']} skipped={res['skipped']}")
+    _lag.observe(symbol, ohlcv[-1][0])
     return len(ohlcv)
 
 
-def _compute_zscore(cur):
+def _fetch_closes(cur, symbols):
+    """Last 26 5m closes per symbol (ASC), one query. {symbol: [close, ...]}."""
+    cur.execute("""
+        SELECT s.symbol, m.ts, m.c
+        FROM unnest(%s::text[]) AS s(symbol)
+        CROSS JOIN LATERAL (
+            SELECT ts, c FROM market_ohlcv
+            WHERE symbol = s.symbol AND tf = '5m'
+            ORDER BY ts DESC
+            LIMIT 26
+        ) m
+        ORDER BY s.symbol, m.ts ASC;
+    """, (list(symbols),))
+    out = {sym: [] for sym in symbols}
+    for sym, _, c in cur.fetchall():
+        out[sym].append(float(c))
+    return out
+
+
+def _compute_zscore(cur, symbol=SYMBOL):
     """Compute current volatility z-score from last 2h of 5m data.
 
+    Returns (zscore, price, direction) or (None, None, None).
+    """
+    return _zscore_from_closes(_fetch_closes(cur, [symbol])[symbol])
+
+
+def _zscore_from_closes(closes):
+    """z-score of the latest 5m log return.
+
     Uses the prior 12 returns (excluding current) as the reference window
     to avoid dampening the z-score when current return is extreme.
 
-    Returns (zscore, btc_price, direction) or (None, None, None).
+    closes: ASC. Returns (zscore, price, direction) or (None, None, None).
     """
-    cur.execute("""
-        SELECT ts, c FROM market_ohlcv
-        WHERE symbol = 'BTC/USDT:USDT' AND tf = '5m'
-        ORDER BY ts DESC
-        LIMIT 26;
-    """)
-    rows = cur.fetchall()
-    if len(rows) < 14:
+    if len(closes) < 14:
         return None, None, None
 
-    # Rows are DESC, reverse to ASC
-    rows = list(reversed(rows))
-    closes = [float(r[1]) for r in rows]
-
     # Compute log returns
     log_returns = []
     for i in range(1, len(closes)):
@@ -132,24 +161,24 @@ def _compute_zscore(cur):
         return 0.0, closes[-1], 'FLAT'
 
     zscore = (current_return - mean) / std
-    btc_price = closes[-1]
+    price = closes[-1]
     direction = 'UP' if current_return > 0 else 'DOWN'
 
-    return zscore, btc_price, direction
+    return zscore, price, direction
 
 
-def _check_cooldown(cur):
+def _check_cooldown(cur, symbol=SYMBOL):
     """Return True if we should skip (event too recent)."""
     cur.execute("""
         SELECT id FROM events
-        WHERE kind = 'LIVE_VOL_SPIKE'
+        WHERE kind = 'LIVE_VOL_SPIKE' AND symbol = %s
           AND created_at >= now() - interval '%s seconds'
         LIMIT 1;
-    """, (COOLDOWN_SEC,))
+    """, (symbol, COOLDOWN_SEC))
     return cur.fetchone() is not None
 
 
-def _create_event(cur, zscore, btc_price, direction):
+def _create_event(cur, zscore, btc_price, direction, symbol=SYMBOL):
     """Create a LIVE_VOL_SPIKE event and link nearby news."""
     cur.execute("""
         SELECT id, title, summary FROM news
@@ -171,7 +200,7 @@ def _create_event(cur, zscore, btc_price, direction):
         VALUES ('LIVE_VOL_SPIKE', now(), %s, %s,
                 %s, %s, %s, %s, %s::jsonb)
         RETURNING id;
-    """, (SYMBOL, abs(zscore), btc_price, direction, category, keywords,
+    """, (symbol, abs(zscore), btc_price, direction, category, keywords,
           json.dumps({'news_count': len(related_news)}, default=str)))
 
     event_id = cur.fetchone()[0]
@@ -183,7 +212,7 @@ def _create_event(cur, zscore, btc_price, direction):
             ON CONFLICT (event_id, news_id) DO NOTHING;
         """, (event_id, news_id))
 
-    _log(f"LIVE_VOL_SPIKE created: id={event_id} zscore={zscore:.2f} "
+    _log(f"LIVE_VOL_SPIKE created: id={event_id} symbol={symbol} zscore={zscore:.2f} "
          f"price={btc_price:.1f} dir={direction} cat={category} "
          f"news={len(related_news)}")
     return event_id
@@ -206,23 +235,38 @@ def _cycle(conn):
     except Exception:
         conn.rollback()
 
+    fetched = []
     with conn.cursor() as cur:
-        count = _fetch_and_upsert(cur)
-        if count == 0:
-            return
-
-        zscore, btc_price, direction = _compute_zscore(cur)
-        if zscore is None:
+        for symbol in _sched.order():
+            try:
+                if _fetch_and_upsert(cur, symbol):
+                    fetched.append(symbol)
+            except (RateLimitExceeded, NetworkError) as e:
+                # One symbol's exchange trouble must not starve the others
+                _log(f"{symbol}: exchange transient error: {type(e).__name__}")
+            _sched.served(symbol)
+        if not fetched:
             return
 
-        abs_z = abs(zscore)
-        if abs_z > ZSCORE_THRESHOLD:
-            if _check_cooldown(cur):
-                _log(f"z={zscore:.2f} but cooldown active, skipping.")
-                return
-            _create_event(cur, zscore, btc_price, direction)
-        elif abs_z > 1.5:
-            _log(f"Elevated z={zscore:.2f} (below threshold {ZSCORE_THRESHOLD})")
+        closes = _fetch_closes(cur, fetched)
+        for symbol in fetched:
+            zscore, price, direction = _zscore_from_closes(closes[symbol])
+            if zscore is None:
+                continue
+
+            abs_z = abs(zscore)
+            if abs_z > ZSCORE_THRESHOLD:
+                if symbol not in EVENT_SYMBOLS:
+                    _log(f"{symbol}: z={zscore:.2f} price={price} dir={direction} "
+                         f"(tracking only, no event)")
+                    continue
+                if _check_cooldown(cur, symbol):
+                    _log(f"{symbol}: z={zscore:.2f} but cooldown active, skipping.")
+                    continue
+                _create_event(cur, zscore, price, direction, symbol)
+            elif abs_z > 1.5:
+                _log(f"{symbol}: elevated z={zscore:.2f} (below threshold {ZSCORE_THRESHOLD})")
+    _lag.maybe_flush(conn)
 
 
 def _acquire_pid_lock():
@@ -257,9 +301,11 @@ def _release_pid_lock():
 
 def main():
     _acquire_pid_lock()
-    _log('=== LIVE EVENT DETECTOR START ===')
+    _log(f'=== LIVE EVENT DETECTOR START === symbols={",".join(SYMBOLS)}')
     conn = _db_conn()
     conn.autocommit = True
+    with conn.cursor() as cur:
+        ensure_pipeline_lag(cur)
     backoff = 5
 
     while True:
@@ -276,6 +322,8 @@ def main():
 
         except (OperationalError, InterfaceError) as e:
             _log(f"DB error: {repr(e)} | reconnect in {backoff}s")
+            # The last writes may not have landed: re-send them after reconnect
+            candle_writer.get_writer('market_ohlcv').discard()
             try:
                 if conn:
                     conn.close()
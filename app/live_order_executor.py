@@ -3,7 +3,14 @@
 """
 live_order_executor.py  --  Dynamic Capital Live Trading Daemon
 
-Polls signals_action_v3 (OPEN) and trade_decision (CLOSE) every 3 seconds.
+Polls signals_action_v3 (OPEN) and trade_decision (CLOSE) every 3 seconds;
+signals_action_v3 / execution_queue inserts wake it early (db_notify).
+Work is claimed atomically (UPDATE ... FOR UPDATE SKIP LOCKED): execution_queue
+rows PENDING → PICKED, OPEN signals processed=true; items that must wait
+(depends_on, throttle) are released back. A claim is a lease: rows still
+PICKED CLAIM_LEASE_SEC after claimed_at (the process died mid-batch) are
+expired, so producers' in-flight checks stop blocking. Each claimed item gets an
+order_latency ledger row (created → claimed → validated → sent → acked).
 Guard chain prevents unintended orders.  All decisions logged to live_executor_log.
 
 Rollback:
@@ -27,6 +34,8 @@ from db_config import get_conn
 import exchange_compliance as ecl
 from trading_config import SYMBOL, ALLOWED_SYMBOLS
 import order_throttle
+import order_latency
+import db_notify
 
 # ============================================================
 # Constants
@@ -36,6 +45,7 @@ MIN_ORDER_INTERVAL_SEC = 10        # was 60 — scalp-optimized
 EMERGENCY_LOSS_PCT = -2.0          # unrealised PnL threshold for auto-close
 KILL_SWITCH_PATH = "/root/trading-bot/app/KILL_SWITCH"
 EQ_DRY_RUN = os.getenv("EQ_DRY_RUN", "1") != "0"  # default True = log-only
+CLAIM_LEASE_SEC = 120              # PICKED longer than this = abandoned claim
 
 ACTION_TBL = "signals_action_v3"
 
@@ -99,12 +109,13 @@ def _send_telegram(text):
 
 
 def exchange():
-    return ccxt.bybit({
+    import exchange_state
+    return exchange_state.track(ccxt.bybit({
         "apiKey": os.getenv("BYBIT_API_KEY"),
         "secret": os.getenv("BYBIT_SECRET"),
         "enableRateLimit": True,
         "options": {"defaultType": "swap"},
-    })
+    }))
 
 
 # ============================================================
@@ -277,17 +288,31 @@ def fetch_close_decisions(cur, last_id: int):
     return cur.fetchall()
 
 
-def fetch_unprocessed_open_signal(cur):
-    """Oldest unprocessed OPEN signal for our symbol."""
+def claim_open_signal(cur):
+    """Claim the oldest unprocessed OPEN signal for our symbol (processed=true).
+
+    Returns (id, action, signal, meta, price, created_at_unix) or None.
+    release_signal() hands it back when it must be retried.
+    """
     cur.execute(f"""
-        SELECT id, action, signal, meta, price
-        FROM {ACTION_TBL}
-        WHERE processed = false AND action = 'OPEN' AND symbol = %s
-        ORDER BY id ASC LIMIT 1;
+        UPDATE {ACTION_TBL} SET processed = true
+        WHERE id = (
+            SELECT id FROM {ACTION_TBL}
+            WHERE processed = false AND action = 'OPEN' AND symbol = %s
+            ORDER BY id ASC LIMIT 1
+            FOR UPDATE SKIP LOCKED)
+        RETURNING id, action, signal, meta, price, created_at_unix;
     """, (SYMBOL,))
     return cur.fetchone()
 
 
+def release_signal(cur, action_id: int):
+    cur.execute(
+        f"UPDATE {ACTION_TBL} SET processed = false WHERE id = %s;",
+        (action_id,),
+    )
+
+
 def fetch_unprocessed_nonopen_signals(cur):
     """All unprocessed non-OPEN signals (STOPPED etc) — bulk mark them processed."""
     cur.execute(f"""
@@ -300,6 +325,7 @@ def fetch_unprocessed_nonopen_signals(cur):
 
 
 def mark_processed(cur, action_id: int):
+    order_latency.set_outcome("PROCESSED")
     cur.execute(
         f"UPDATE {ACTION_TBL} SET processed = true WHERE id = %s;",
         (action_id,),
@@ -309,21 +335,39 @@ def mark_processed(cur, action_id: int):
 # ============================================================
 # Execution Queue (EQ) consumer helpers
 # ============================================================
-def _fetch_pending_eq_items(cur):
-    """Fetch up to 5 PENDING items ordered by priority (low=urgent), then id."""
+def _claim_eq_items(cur):
+    """Claim up to 5 PENDING items (→ PICKED) by priority (low=urgent), then id.
+
+    Returns [(item, created_at), ...]; item is the row _process_eq_item takes.
+    """
     cur.execute("""
-        SELECT id, action_type, direction, target_qty, target_usdt,
-               reduce_pct, reason, meta, expire_at, depends_on
-        FROM execution_queue
-        WHERE symbol = %s AND status = 'PENDING'
-        ORDER BY priority ASC, id ASC
-        LIMIT 5;
+        UPDATE execution_queue q SET status = 'PICKED', claimed_at = now()
+        FROM (
+            SELECT id FROM execution_queue
+            WHERE symbol = %s AND status = 'PENDING'
+            ORDER BY priority ASC, id ASC
+            LIMIT 5
+            FOR UPDATE SKIP LOCKED) c
+        WHERE q.id = c.id
+        RETURNING q.id, q.action_type, q.direction, q.target_qty, q.target_usdt,
+                  q.reduce_pct, q.reason, q.meta, q.expire_at, q.depends_on,
+                  q.priority, q.ts;
     """, (SYMBOL,))
-    return cur.fetchall()
+    rows = sorted(cur.fetchall(), key=lambda r: (r[10], r[0]))
+    return [(r[:10], r[11]) for r in rows]
+
+
+def _release_eq_item(cur, eq_id):
+    """Hand a claimed item back (PICKED → PENDING) to retry next cycle."""
+    _update_eq_status(cur, eq_id, "PENDING")
 
 
 def _expire_stale_eq_items(cur):
-    """Mark items past expire_at as EXPIRED."""
+    """Mark items past expire_at, and claims past their lease, as EXPIRED.
+
+    An abandoned claim is not handed back to PENDING: the order may already
+    be on the exchange, and the producers re-decide from the live position.
+    """
     cur.execute("""
         UPDATE execution_queue
         SET status = 'EXPIRED'
@@ -335,13 +379,25 @@ def _expire_stale_eq_items(cur):
     for (eid,) in expired:
         log(f"EQ item id={eid} EXPIRED")
         audit(cur, "EQ_EXPIRED", SYMBOL, {"eq_id": eid})
-    return len(expired)
+    cur.execute("""
+        UPDATE execution_queue
+        SET status = 'EXPIRED'
+        WHERE symbol = %s AND status = 'PICKED'
+          AND claimed_at < now() - make_interval(secs => %s)
+        RETURNING id, claimed_at;
+    """, (SYMBOL, CLAIM_LEASE_SEC))
+    abandoned = cur.fetchall()
+    for eid, claimed_at in abandoned:
+        log(f"EQ item id={eid} claim abandoned (PICKED since {claimed_at}) — EXPIRED")
+        audit(cur, "EQ_CLAIM_EXPIRED", SYMBOL, {"eq_id": eid, "claimed_at": str(claimed_at)})
+    return len(expired) + len(abandoned)
 
 
 def _update_eq_status(cur, eq_id, status):
     """Update execution_queue row status."""
     if not eq_id:
         return
+    order_latency.set_outcome(status)
     cur.execute(
         "UPDATE execution_queue SET status = %s WHERE id = %s;",
         (status, eq_id),
@@ -384,18 +440,24 @@ def _insert_exec_log(cur, order, order_type, direction, qty, reason,
 
 
 def _process_execution_queue(ex, cur, pos_side, pos_qty, entry_enabled=True):
-    """Main EQ consumer: expire stale, then process pending items."""
+    """Main EQ consumer: expire stale, then claim and process pending items."""
     _expire_stale_eq_items(cur)
-    items = _fetch_pending_eq_items(cur)
-    if not items:
-        return
-    for item in items:
+    claimed = _claim_eq_items(cur)
+    for item, created_at in claimed:
+        eq_id = item[0]
+        entry = order_latency.begin("execution_queue", eq_id, item[1], created_at=created_at)
         try:
             _process_eq_item(ex, cur, item, pos_side, pos_qty, entry_enabled=entry_enabled)
         except Exception as e:
-            eq_id = item[0]
             log(f"EQ item id={eq_id} processing error: {type(e).__name__}: {e}")
             audit(cur, "EQ_ITEM_ERROR", SYMBOL, {"eq_id": eq_id, "error": str(e)})
+            if entry.outcome is None:
+                # failed before it was picked for sending: retry like a wait
+                _release_eq_item(cur, eq_id)
+            else:
+                order_latency.set_outcome("ERROR")
+        finally:
+            order_latency.finish(cur)
 
 
 def _update_position_order_state(cur, eq_id, action_type, direction, target_usdt):
@@ -459,7 +521,8 @@ def _process_eq_item(ex, cur, item, pos_side, pos_qty, entry_enabled=True):
         dep_row = cur.fetchone()
         if dep_row and dep_row[0] not in ("FILLED", "DRY_RUN_LOGGED"):
             log(f"EQ id={eq_id} waiting on depends_on={dep_id} (status={dep_row[0]})")
-            return  # stay PENDING, retry next cycle
+            _release_eq_item(cur, eq_id)  # back to PENDING, retry next cycle
+            return
 
     # THROTTLE gate: check order throttle before entry actions
     if action_type in ("ADD", "REVERSE_OPEN"):
@@ -473,7 +536,8 @@ def _process_eq_item(ex, cur, item, pos_side, pos_qty, entry_enabled=True):
         throttle_ok, throttle_reason, throttle_meta = order_throttle.check_all(cur, action_type, direction=direction, regime=_regime_for_throttle)
         if not throttle_ok:
             log(f"EQ id={eq_id} {action_type} throttled: {throttle_reason}")
-            # Keep PENDING (5-min expire_at will auto-GC)
+            # Back to PENDING (5-min expire_at will auto-GC)
+            _release_eq_item(cur, eq_id)
             return
 
     # ENTRY gate: ADD/REVERSE_OPEN require entry_enabled
@@ -871,14 +935,17 @@ def place_close_order(ex, side: str, qty: float, cur=None):
         raise ValueError(f"ECL reject: {comp.reject_reason or comp.reason}")
 
     final_qty = comp.corrected_qty if comp.corrected_qty is not None else qty
+    order_latency.mark('validated')
 
     coid = _generate_client_order_id('CLOSE', side)
     params = {"reduceOnly": True, "orderLinkId": coid}
     try:
+        order_latency.mark('sent')
         if side == "long":
             order = ex.create_market_sell_order(SYMBOL, final_qty, params)
         else:
             order = ex.create_market_buy_order(SYMBOL, final_qty, params)
+        order_latency.mark('acked', order_id=order.get('id'))
         order['_client_order_id'] = coid
         ecl.record_order_sent(SYMBOL, side=side)
         ecl.record_success(SYMBOL)
@@ -1017,14 +1084,17 @@ def place_open_order(ex, direction: str, usdt_size: float, cur=None, meta=None):
         raise ValueError(f"ECL reject: {comp.reject_reason or comp.reason}")
 
     final_amount = comp.corrected_qty if comp.corrected_qty is not None else amount
+    order_latency.mark('validated')
 
     coid = _generate_client_order_id('OPEN', direction)
     open_params = {'orderLinkId': coid}
     try:
+        order_latency.mark('sent')
         if direction == "LONG":
             order = ex.create_market_buy_order(SYMBOL, final_amount, params=open_params)
         else:
             order = ex.create_market_sell_order(SYMBOL, final_amount, params=open_params)
+        order_latency.mark('acked', order_id=order.get('id'))
         order['_client_order_id'] = coid
         ecl.record_order_sent(SYMBOL, price=price, side=direction.lower())
         ecl.record_success(SYMBOL)
@@ -1062,10 +1132,12 @@ def place_open_order(ex, direction: str, usdt_size: float, cur=None, meta=None):
                 try:
                     retry_coid = _generate_client_order_id('RETRY', direction)
                     retry_params = {'orderLinkId': retry_coid}
+                    order_latency.mark('sent')
                     if direction == "LONG":
                         order = ex.create_market_buy_order(SYMBOL, corrected_amount, params=retry_params)
                     else:
                         order = ex.create_market_sell_order(SYMBOL, corrected_amount, params=retry_params)
+                    order_latency.mark('acked', order_id=order.get('id'))
                     order['_client_order_id'] = retry_coid
                     ecl.record_order_sent(SYMBOL, price=price, side=direction.lower())
                     ecl.record_success(SYMBOL)
@@ -1126,11 +1198,16 @@ def main():
             db_migrations.ensure_compliance_log(cur)
             db_migrations.ensure_live_order_once_lock(cur)
             db_migrations.ensure_upsert_constraints(cur)
+            db_migrations.ensure_order_latency_log(cur)
+            db_migrations.ensure_execution_queue_claim_column(cur)
         except Exception:
             pass
         audit(cur, "DAEMON_START", SYMBOL, {"pid": os.getpid()})
     conn.close()
 
+    listener = db_notify.Listener(
+        [db_notify.SIGNALS_ACTION_V3, db_notify.EXECUTION_QUEUE], log_fn=log)
+
     while True:
         try:
             _cycle(ex, last_order_ts)
@@ -1146,7 +1223,7 @@ def main():
                 c.close()
             except Exception:
                 pass
-        time.sleep(POLL_SEC)
+        db_notify.wait_for(listener, POLL_SEC)
 
 
 def _cycle(ex, _last_order_ts_unused):
@@ -1258,134 +1335,158 @@ def _cycle(ex, _last_order_ts_unused):
             # --- OPEN signal (entry_enabled gate) ---
             if not entry_enabled:
                 return
-            row = fetch_unprocessed_open_signal(cur)
+            row = claim_open_signal(cur)
             if not row:
                 return
+            _run_open_signal(ex, cur, row, side, qty)
 
-            sig_id, action, signal, meta_raw, price = row
+    finally:
+        conn.close()
 
-            # Parse meta
-            meta = {}
-            if meta_raw:
-                if isinstance(meta_raw, str):
-                    try:
-                        meta = json.loads(meta_raw)
-                    except Exception:
-                        meta = {}
-                elif isinstance(meta_raw, dict):
-                    meta = meta_raw
-
-            # Guard: dry_run flag in meta
-            if meta.get("dry_run") is True:
-                log(f"SKIP signal id={sig_id}: meta.dry_run=true")
-                audit(cur, "GUARD_BLOCK", SYMBOL, {
-                    "signal_id": sig_id, "guard": "dry_run_meta",
-                })
-                mark_processed(cur, sig_id)
-                return
 
-            direction = meta.get("direction", "LONG")
+def _run_open_signal(ex, cur, row, side, qty):
+    """Process a claimed OPEN signal inside its latency ledger entry."""
+    entry = order_latency.begin("signal", row[0], "OPEN", created_at=row[5])
+    try:
+        _process_open_signal(ex, cur, row, side, qty)
+    except Exception:
+        if "sent" not in entry.stages:
+            release_signal(cur, row[0])  # nothing went out: retry next cycle
+            order_latency.set_outcome("PENDING")
+        else:
+            order_latency.set_outcome("ERROR")
+        raise
+    finally:
+        order_latency.finish(cur)
 
-            # Guard: once_lock
-            if has_once_lock(cur, SYMBOL):
-                log(f"GUARD: once_lock exists for {SYMBOL} — skip signal id={sig_id}")
-                audit(cur, "GUARD_BLOCK", SYMBOL, {
-                    "signal_id": sig_id, "guard": "once_lock",
-                })
-                mark_processed(cur, sig_id)
-                return
 
-            # Guard: already has Bybit position
-            if side and qty > 0:
-                log(f"GUARD: Bybit position exists ({side} qty={qty}) — skip signal id={sig_id}")
-                audit(cur, "GUARD_BLOCK", SYMBOL, {
-                    "signal_id": sig_id, "guard": "bybit_position_exists",
-                    "side": side, "qty": qty,
-                })
-                mark_processed(cur, sig_id)
-                return
+def _process_open_signal(ex, cur, row, side, qty):
+    """Guards + OPEN order for a claimed signal (see claim_open_signal)."""
+    sig_id, action, signal, meta_raw, price, _created = row
 
-            # Guard: order throttle (replaces simple rate limit)
-            _regime_for_throttle = None
+    # Parse meta
+    meta = {}
+    if meta_raw:
+        if isinstance(meta_raw, str):
             try:
-                import regime_reader
-                _rc = regime_reader.get_current_regime(cur)
-                _regime_for_throttle = _rc.get('regime') if _rc.get('available') else None
+                meta = json.loads(meta_raw)
             except Exception:
-                pass
-            throttle_ok, throttle_reason, throttle_meta = order_throttle.check_all(cur, 'OPEN', direction=direction, regime=_regime_for_throttle)
-            if not throttle_ok:
-                log(f"GUARD: throttle — {throttle_reason}")
-                audit(cur, "GUARD_BLOCK", SYMBOL, {
-                    "signal_id": sig_id, "guard": "order_throttle",
-                    "reason": throttle_reason,
-                })
-                # do NOT mark processed — retry next cycle
-                return
+                meta = {}
+        elif isinstance(meta_raw, dict):
+            meta = meta_raw
 
-            # --- Protection mode check for OPEN ---
-            pm_ok, pm_reason = ecl.check_protection_mode_for_action('OPEN')
-            if not pm_ok:
-                log(f"OPEN blocked by protection mode: {pm_reason}")
-                audit(cur, "GUARD_BLOCK", SYMBOL, {
-                    "signal_id": sig_id, "guard": "protection_mode",
-                    "reason": pm_reason,
-                })
-                mark_processed(cur, sig_id)
-                report = ecl.format_protection_mode_report()
-                if report:
-                    _send_telegram(report)
-                return
+    # Guard: dry_run flag in meta
+    if meta.get("dry_run") is True:
+        log(f"SKIP signal id={sig_id}: meta.dry_run=true")
+        audit(cur, "GUARD_BLOCK", SYMBOL, {
+            "signal_id": sig_id, "guard": "dry_run_meta",
+        })
+        mark_processed(cur, sig_id)
+        return
 
-            # A2: Pre-flight orphan order cleanup (enhanced [0-1])
-            try:
-                from orphan_cleanup import cleanup_if_flat
-                cleaned, detail = cleanup_if_flat(ex, SYMBOL, reason='pre_entry_cleanup')
-                if cleaned:
-                    log(f"[PRE_ENTRY_CLEANUP] {detail}")
-            except Exception as e:
-                log(f"pre_entry_cleanup error (FAIL-OPEN): {e}")
-
-            # --- Execute OPEN ---
-            order_cap = _get_order_cap(cur)
-            usdt_size = min(float(meta.get("qty", order_cap)), order_cap)
-            if usdt_size <= 0:
-                usdt_size = order_cap
-
-            # Exposure cap enforcement
-            usdt_size, cap_reason = enforce_exposure_cap(ex, usdt_size, cur=cur)
-            if usdt_size <= 0:
-                log(f"OPEN blocked by exposure cap: {cap_reason}")
-                audit(cur, "GUARD_BLOCK", SYMBOL, {
-                    "signal_id": sig_id, "guard": "exposure_cap",
-                    "reason": cap_reason,
-                })
-                mark_processed(cur, sig_id)
-                return
+    direction = meta.get("direction", "LONG")
 
-            log(f"OPEN {direction} signal_id={sig_id} usdt={usdt_size}")
-            try:
-                order, exec_price, amount = place_open_order(ex, direction, usdt_size, cur=cur)
-            except Exception as e:
-                log(f"OPEN signal_id={sig_id} FAILED: {e}")
-                audit(cur, "OPEN_FAILED", SYMBOL, {
-                    "signal_id": sig_id, "error": str(e)})
-                mark_processed(cur, sig_id)
-                return
+    # Guard: once_lock
+    if has_once_lock(cur, SYMBOL):
+        log(f"GUARD: once_lock exists for {SYMBOL} — skip signal id={sig_id}")
+        audit(cur, "GUARD_BLOCK", SYMBOL, {
+            "signal_id": sig_id, "guard": "once_lock",
+        })
+        mark_processed(cur, sig_id)
+        return
 
-            set_once_lock(cur, SYMBOL)
-            mark_processed(cur, sig_id)
-            _state["last_order_ts"] = time.time()
+    # Guard: already has Bybit position
+    if side and qty > 0:
+        log(f"GUARD: Bybit position exists ({side} qty={qty}) — skip signal id={sig_id}")
+        audit(cur, "GUARD_BLOCK", SYMBOL, {
+            "signal_id": sig_id, "guard": "bybit_position_exists",
+            "side": side, "qty": qty,
+        })
+        mark_processed(cur, sig_id)
+        return
 
-            audit(cur, "OPEN_SENT", SYMBOL, {
-                "signal_id": sig_id, "direction": direction,
-                "usdt": usdt_size, "price": exec_price, "amount": amount,
-                "order_id": order.get("id"),
-            })
-            log(f"OPEN SENT: {direction} amount={amount} price={exec_price} order={order.get('id')}")
+    # Guard: order throttle (replaces simple rate limit)
+    _regime_for_throttle = None
+    try:
+        import regime_reader
+        _rc = regime_reader.get_current_regime(cur)
+        _regime_for_throttle = _rc.get('regime') if _rc.get('available') else None
+    except Exception:
+        pass
+    throttle_ok, throttle_reason, throttle_meta = order_throttle.check_all(cur, 'OPEN', direction=direction, regime=_regime_for_throttle)
+    if not throttle_ok:
+        log(f"GUARD: throttle — {throttle_reason}")
+        audit(cur, "GUARD_BLOCK", SYMBOL, {
+            "signal_id": sig_id, "guard": "order_throttle",
+            "reason": throttle_reason,
+        })
+        # hand the signal back — retry next cycle
+        release_signal(cur, sig_id)
+        order_latency.set_outcome("PENDING")
+        return
 
-    finally:
-        conn.close()
+    # --- Protection mode check for OPEN ---
+    pm_ok, pm_reason = ecl.check_protection_mode_for_action('OPEN')
+    if not pm_ok:
+        log(f"OPEN blocked by protection mode: {pm_reason}")
+        audit(cur, "GUARD_BLOCK", SYMBOL, {
+            "signal_id": sig_id, "guard": "protection_mode",
+            "reason": pm_reason,
+        })
+        mark_processed(cur, sig_id)
+        report = ecl.format_protection_mode_report()
+        if report:
+            _send_telegram(report)
+        return
+
+    # A2: Pre-flight orphan order cleanup (enhanced [0-1])
+    try:
+        from orphan_cleanup import cleanup_if_flat
+        cleaned, detail = cleanup_if_flat(ex, SYMBOL, reason='pre_entry_cleanup')
+        if cleaned:
+            log(f"[PRE_ENTRY_CLEANUP] {detail}")
+    except Exception as e:
+        log(f"pre_entry_cleanup error (FAIL-OPEN): {e}")
+
+    # --- Execute OPEN ---
+    order_cap = _get_order_cap(cur)
+    usdt_size = min(float(meta.get("qty", order_cap)), order_cap)
+    if usdt_size <= 0:
+        usdt_size = order_cap
+
+    # Exposure cap enforcement
+    usdt_size, cap_reason = enforce_exposure_cap(ex, usdt_size, cur=cur)
+    if usdt_size <= 0:
+        log(f"OPEN blocked by exposure cap: {cap_reason}")
+        audit(cur, "GUARD_BLOCK", SYMBOL, {
+            "signal_id": sig_id, "guard": "exposure_cap",
+            "reason": cap_reason,
+        })
+        mark_processed(cur, sig_id)
+        return
+
+    log(f"OPEN {direction} signal_id={sig_id} usdt={usdt_size}")
+    try:
+        order, exec_price, amount = place_open_order(ex, direction, usdt_size, cur=cur)
+    except Exception as e:
+        log(f"OPEN signal_id={sig_id} FAILED: {e}")
+        audit(cur, "OPEN_FAILED", SYMBOL, {
+            "signal_id": sig_id, "error": str(e)})
+        mark_processed(cur, sig_id)
+        order_latency.set_outcome("FAILED")
+        return
+
+    set_once_lock(cur, SYMBOL)
+    mark_processed(cur, sig_id)
+    order_latency.set_outcome("SENT")
+    _state["last_order_ts"] = time.time()
+
+    audit(cur, "OPEN_SENT", SYMBOL, {
+        "signal_id": sig_id, "direction": direction,
+        "usdt": usdt_size, "price": exec_price, "amount": amount,
+        "order_id": order.get("id"),
+    })
+    log(f"OPEN SENT: {direction} amount={amount} price={exec_price} order={order.get('id')}")
 
 
 # mutable state shared across cycles
@@ -9,7 +9,7 @@ import os
 import re
 import subprocess
 import time as _time
-from db_config import get_conn, DB_CONFIG
+from db_config import get_pooled_conn, DB_CONFIG
 import exchange_reader
 import response_envelope
 
@@ -50,7 +50,7 @@ SERVICE_NAMES_KO = {
     'position_watcher': '포지션 감시'}
 
 def _db():
-    return get_conn(autocommit=True)
+    return get_pooled_conn('rw', autocommit=True)
 
 
 def _run(cmd, timeout=25):
@@ -130,6 +130,10 @@ def execute(query_type=None, original_text=None):
         'debug_integrity': _debug_integrity,
         'debug_order_safety': _debug_order_safety,
         'debug_perf_6h': _debug_perf_6h,
+        'debug_perf': _debug_perf,
+        'debug_guards': _debug_guards,
+        'debug_api_budget': _debug_api_budget,
+        'debug_order_latency': _debug_order_latency,
         'debug_mtf': _debug_mtf}
     handler = handlers.get(query_type, _unknown)
     return handler(original_text)
@@ -666,8 +670,8 @@ def _combined_snapshot(_text=None):
 
             # 3. Score summary
             try:
-                import score_engine
-                scores = score_engine.compute_total()
+                import score_publisher
+                scores = score_publisher.get_score(source='local_query')
                 total = scores.get('total_score', 0)
                 dominant = scores.get('dominant_side', '?')
                 sig_stage = scores.get('signal_stage', '?')
@@ -1005,8 +1009,8 @@ def _snapshot(_text=None):
 
 def _score_summary(_text=None):
     try:
-        import score_engine
-        r = score_engine.compute_total()
+        import score_publisher
+        r = score_publisher.get_score(source='local_query')
         ne = r.get('news_event_score', 0)
         guarded = r.get('news_event_guarded', False)
         ne_detail = r.get('axis_details', {}).get('news_event', {})
@@ -2830,19 +2834,19 @@ def _debug_news_reaction_sample(_text=None):
             # Eligible news: news within candle coverage range + 24h lookahead
             cur.execute("""
                 SELECT count(*) FROM news n
-                WHERE n.ts >= (SELECT MIN(ts) FROM candles WHERE tf='1m')
-                  AND n.ts + interval '24 hours' <= (SELECT MAX(ts) FROM candles WHERE tf='1m')
+                WHERE n.ts >= (SELECT MIN(ts) FROM candles WHERE symbol = %s AND tf='1m')
+                  AND n.ts + interval '24 hours' <= (SELECT MAX(ts) FROM candles WHERE symbol = %s AND tf='1m')
                   AND n.ts < now() - interval '24 hours';
-            """)
+            """, (SYMBOL, SYMBOL))
             eligible_news = cur.fetchone()[0] or 0
 
             # Eligible traced
             cur.execute("""
                 SELECT count(*) FROM macro_trace mt
                 JOIN news n ON n.id = mt.news_id
-                WHERE n.ts >= (SELECT MIN(ts) FROM candles WHERE tf='1m')
-                  AND n.ts + interval '24 hours' <= (SELECT MAX(ts) FROM candles WHERE tf='1m');
-            """)
+                WHERE n.ts >= (SELECT MIN(ts) FROM candles WHERE symbol = %s AND tf='1m')
+                  AND n.ts + interval '24 hours' <= (SELECT MAX(ts) FROM candles WHERE symbol = %s AND tf='1m');
+            """, (SYMBOL, SYMBOL))
             eligible_traced = cur.fetchone()[0] or 0
             eligible_pct = (eligible_traced / eligible_news * 100) if eligible_news > 0 else 0
             traced_pct = raw_pct
@@ -2940,8 +2944,8 @@ def _backfill_dryrun_summary(cur):
     try:
         cur.execute("""
             SELECT EXTRACT(EPOCH FROM (now() - '2023-11-01'::timestamp)) / 60 AS expected,
-                   (SELECT count(*) FROM candles WHERE tf = '1m') AS actual;
-        """)
+                   (SELECT count(*) FROM candles WHERE symbol = %s AND tf = '1m') AS actual;
+        """, (SYMBOL,))
         r = cur.fetchone()
         exp, act = int(r[0] or 0), int(r[1] or 0)
         summary.append(f'  candles_1m: remaining={max(0, exp - act):,}')
@@ -2951,8 +2955,8 @@ def _backfill_dryrun_summary(cur):
     try:
         cur.execute("""
             SELECT EXTRACT(EPOCH FROM (now() - '2023-11-01'::timestamp)) / 300 AS expected,
-                   (SELECT count(*) FROM market_ohlcv) AS actual;
-        """)
+                   (SELECT count(*) FROM market_ohlcv WHERE symbol = %s) AS actual;
+        """, (SYMBOL,))
         r = cur.fetchone()
         exp, act = int(r[0] or 0), int(r[1] or 0)
         summary.append(f'  ohlcv_5m: remaining={max(0, exp - act):,}')
@@ -3188,12 +3192,12 @@ def _debug_backfill_status(_text=None):
         try:
             with conn.cursor() as cur_range:
                 cur_range.execute("""
-                    SELECT MIN(ts), MAX(ts), COUNT(*) FROM candles WHERE tf='1m';
-                """)
+                    SELECT MIN(ts), MAX(ts), COUNT(*) FROM candles WHERE symbol = %s AND tf='1m';
+                """, (SYMBOL,))
                 c1m = cur_range.fetchone()
                 cur_range.execute("""
-                    SELECT MIN(ts), MAX(ts), COUNT(*) FROM market_ohlcv WHERE tf='5m';
-                """)
+                    SELECT MIN(ts), MAX(ts), COUNT(*) FROM market_ohlcv WHERE symbol = %s AND tf='5m';
+                """, (SYMBOL,))
                 o5m = cur_range.fetchone()
             if c1m and c1m[2]:
                 lines.append(f'  candles(1m):      {str(c1m[0])[:10]} ~ {str(c1m[1])[:10]} ({c1m[2]:,} rows)')
@@ -3280,8 +3284,8 @@ def _debug_backfill_dryrun(_text=None):
             try:
                 cur.execute("""
                     SELECT EXTRACT(EPOCH FROM (now() - '2023-11-01'::timestamp)) / 60 AS expected,
-                           (SELECT count(*) FROM candles WHERE tf = '1m') AS actual;
-                """)
+                           (SELECT count(*) FROM candles WHERE symbol = %s AND tf = '1m') AS actual;
+                """, (SYMBOL,))
                 r = cur.fetchone()
                 expected = int(r[0]) if r[0] else 0
                 actual = int(r[1]) if r[1] else 0
@@ -3297,8 +3301,8 @@ def _debug_backfill_dryrun(_text=None):
             try:
                 cur.execute("""
                     SELECT EXTRACT(EPOCH FROM (now() - '2023-11-01'::timestamp)) / 300 AS expected,
-                           (SELECT count(*) FROM market_ohlcv) AS actual;
-                """)
+                           (SELECT count(*) FROM market_ohlcv WHERE symbol = %s) AS actual;
+                """, (SYMBOL,))
                 r = cur.fetchone()
                 expected = int(r[0]) if r[0] else 0
                 actual = int(r[1]) if r[1] else 0
@@ -3665,6 +3669,7 @@ _BACKFILL_JOBS = {
     'news_path':     'backfill_news_path.py — 뉴스 24h 경로 분석',
     'prune_1m':      'prune_candles_1m.py — 오래된 1m 캔들 정리 (>180d)',
     'archive':       'backfill_archive.py — Binance 아카이브 벌크 적재 (cold store)',
+    'indicators':    'backfill_indicators.py — 과거 지표/MTF 일괄 계산 (COPY)',
 }
 
 # Aliases for common alternative job names
@@ -3674,6 +3679,7 @@ _BACKFILL_JOB_ALIASES = {
     'backfill_ohlcv_5m': 'ohlcv_5m',
     'backfill_news_path': 'news_path',
     'aggregate_candles': 'aggregate_5m',
+    'backfill_indicators': 'indicators',
 }
 
 
@@ -4007,14 +4013,16 @@ def _debug_storage(_text=None):
             lines.append('')
             lines.append('[데이터 범위]')
 
-            cur.execute("SELECT MIN(ts), MAX(ts) FROM candles WHERE tf='1m';")
+            cur.execute("SELECT MIN(ts), MAX(ts) FROM candles WHERE symbol = %s AND tf='1m';",
+                        (SYMBOL,))
             c1m = cur.fetchone()
             if c1m and c1m[0]:
                 lines.append(f'  candles(1m): {str(c1m[0])[:10]} ~ {str(c1m[1])[:10]}')
             else:
                 lines.append('  candles(1m): 데이터 없음')
 
-            cur.execute("SELECT MIN(ts), MAX(ts) FROM market_ohlcv WHERE tf='5m';")
+            cur.execute("SELECT MIN(ts), MAX(ts) FROM market_ohlcv WHERE symbol = %s AND tf='5m';",
+                        (SYMBOL,))
             o5m = cur.fetchone()
             if o5m and o5m[0]:
                 lines.append(f'  market_ohlcv(5m): {str(o5m[0])[:10]} ~ {str(o5m[1])[:10]}')
@@ -4125,19 +4133,19 @@ def _debug_news_path_sample(_text=None):
             # Eligible: news within candle coverage + 24h lookahead
             cur2.execute("""
                 SELECT count(*) FROM news n
-                WHERE n.ts >= (SELECT COALESCE(MIN(ts), now()) FROM candles WHERE tf='1m')
-                  AND n.ts + interval '24 hours' <= (SELECT COALESCE(MAX(ts), now()) FROM candles WHERE tf='1m')
+                WHERE n.ts >= (SELECT COALESCE(MIN(ts), now()) FROM candles WHERE symbol = %s AND tf='1m')
+                  AND n.ts + interval '24 hours' <= (SELECT COALESCE(MAX(ts), now()) FROM candles WHERE symbol = %s AND tf='1m')
                   AND n.ts < now() - interval '24 hours';
-            """)
+            """, (SYMBOL, SYMBOL))
             eligible = cur2.fetchone()[0] or 0
 
             # Eligible traced
             cur2.execute("""
                 SELECT count(*) FROM news_price_path npp
                 JOIN news n ON n.id = npp.news_id
-                WHERE n.ts >= (SELECT COALESCE(MIN(ts), now()) FROM candles WHERE tf='1m')
-                  AND n.ts + interval '24 hours' <= (SELECT COALESCE(MAX(ts), now()) FROM candles WHERE tf='1m');
-            """)
+                WHERE n.ts >= (SELECT COALESCE(MIN(ts), now()) FROM candles WHERE symbol = %s AND tf='1m')
+                  AND n.ts + interval '24 hours' <= (SELECT COALESCE(MAX(ts), now()) FROM candles WHERE symbol = %s AND tf='1m');
+            """, (SYMBOL, SYMBOL))
             eligible_traced = cur2.fetchone()[0] or 0
             elig_pct = (eligible_traced / eligible * 100) if eligible > 0 else 0
 
@@ -5880,6 +5888,128 @@ def _debug_perf_6h(_text=None):
                 pass
 
 
+def _debug_perf(_text=None):
+    """Debug: daemon cycle span latency (perf_span_stats, last 15 min)."""
+    conn = None
+    try:
+        conn = _db()
+        with conn.cursor() as cur:
+            cur.execute("""
+                SELECT service, span, sum(n), max(p50_ms), max(p95_ms), max(p99_ms),
+                       max(max_ms), sum(total_ms), sum(db_calls), sum(api_calls)
+                FROM perf_span_stats
+                WHERE window_start >= now() - interval '15 minutes'
+                GROUP BY service, span
+                ORDER BY service, span;
+            """)
+            rows = cur.fetchall()
+        if not rows:
+            return 'perf: no samples (15m)'
+        lines = ['=== Cycle perf (15m, worst 1m window) ===',
+                 'span  n  p50/p95/p99 ms  db/cycle api/cycle']
+        service = None
+        for (svc, span, n, p50, p95, p99, mx, total, db_calls, api_calls) in rows:
+            if svc != service:
+                service = svc
+                lines.append(f'[{svc}]')
+            n = int(n or 0)
+            depth = span.count('/')
+            name = span.rsplit('/', 1)[-1]
+            lines.append(
+                f'{"  " * depth}{name}  {n}  '
+                f'{p50 or 0:.1f}/{p95 or 0:.1f}/{p99 or 0:.1f}  '
+                f'{(db_calls or 0) / max(n, 1):.1f} {(api_calls or 0) / max(n, 1):.1f}')
+        return '\n'.join(lines)
+    except Exception as e:
+        return f'debug_perf error: {e}'
+    finally:
+        if conn:
+            try:
+                conn.close()
+            except Exception:
+                pass
+
+
+def _debug_guards(_text=None):
+    """Debug: autopilot guard verdicts + timing (perf_span_stats 'guard:*' spans, 1h)."""
+    conn = None
+    try:
+        conn = _db()
+        with conn.cursor() as cur:
+            cur.execute("""
+                SELECT split_part(span, 'guard:', 2) AS guard, sum(n), max(p95_ms), max(max_ms),
+                       sum(coalesce((counters->>'block')::int, 0)), sum(db_calls)
+                FROM perf_span_stats
+                WHERE service = 'autopilot' AND span LIKE '%/guard:%'
+                  AND window_start >= now() - interval '1 hour'
+                GROUP BY 1
+                ORDER BY 5 DESC, 1;
+            """)
+            rows = cur.fetchall()
+        if not rows:
+            return 'guards: no samples (1h)'
+        lines = ['=== Autopilot guards (1h) ===',
+                 'guard  runs  blocked  p95/max ms  db/run']
+        for (guard, n, p95, mx, blocked, db_calls) in rows:
+            n = int(n or 0)
+            lines.append(f'{guard}  {n}  {int(blocked or 0)}  '
+                         f'{p95 or 0:.1f}/{mx or 0:.1f}  {(db_calls or 0) / max(n, 1):.1f}')
+        return '\n'.join(lines)
+    except Exception as e:
+        return f'debug_guards error: {e}'
+    finally:
+        if conn:
+            try:
+                conn.close()
+            except Exception:
+                pass
+
+
+def _debug_api_budget(_text=None):
+    """Debug: Bybit REST calls per service/endpoint (last 60s) + exchange_state slot."""
+    try:
+        import exchange_state
+        usage = exchange_state.budget(60)
+        total = sum(sum(eps.values()) for eps in usage.values())
+        lines = ['=== Bybit REST budget (60s) ===',
+                 f'total {total} / IP limit {exchange_state.BYBIT_IP_LIMIT_PER_MIN} '
+                 f'({total / exchange_state.BYBIT_IP_LIMIT_PER_MIN * 100:.1f}%)']
+        for svc, eps in sorted(usage.items(), key=lambda kv: -sum(kv[1].values())):
+            lines.append(f'[{svc}] {sum(eps.values())}')
+            for ep, n in sorted(eps.items(), key=lambda kv: -kv[1]):
+                lines.append(f'  {ep}  {n}')
+        slot = exchange_state.read_slot()
+        if slot is None:
+            lines.append('slot: none (exchange_state service down)')
+        else:
+            now = _time.time()
+            live_age = now - slot['live_at'] if slot.get('live_at') else None
+            lines.append(f'slot: v{slot.get("version")} source={slot.get("source")} '
+                         f'live_age={f"{live_age:.1f}s" if live_age is not None else "-"}')
+        return '\n'.join(lines)
+    except Exception as e:
+        return f'debug_api_budget error: {e}'
+
+
+def _debug_order_latency(_text=None):
+    """Debug: live_order_executor stage latency percentiles (order_latency_log, 24h)."""
+    conn = None
+    try:
+        import order_latency
+        conn = _db()
+        with conn.cursor() as cur:
+            summary = order_latency.summarize(order_latency.report(cur, hours=24))
+        return order_latency.format_report(summary, hours=24)
+    except Exception as e:
+        return f'debug_order_latency error: {e}'
+    finally:
+        if conn:
+            try:
+                conn.close()
+            except Exception:
+                pass
+
+
 def _debug_mtf(_text=None):
     """[5-2] Debug: MTF direction status."""
     conn = None
@@ -10,6 +10,8 @@ import sys
 import time
 
 sys.path.insert(0, '/root/trading-bot/app')
+import candle_writer
+import indicator_lib as il
 
 LOG_PREFIX = '[market_snapshot]'
 
@@ -31,10 +33,6 @@ def _log(msg):
     print(f'{LOG_PREFIX} {msg}', flush=True)
 
 
-def _sma(xs):
-    return sum(xs) / len(xs) if xs else 0
-
-
 def build_snapshot(exchange, cur, symbol=None) -> dict:
     """Build real-time market snapshot.
 
@@ -44,9 +42,20 @@ def build_snapshot(exchange, cur, symbol=None) -> dict:
     4. DB: 24h high/low, vol_profile(POC/VAH/VAL)
     5. ret_1m, ret_5m, ret_15m return calculations
     6. snapshot_ts = time.time()
+
+    If this raises after the candle upsert, the candle_writer cache for the
+    series is dropped (the caller's transaction may be rolled back); callers
+    that roll back after a successful build must discard it themselves.
     """
     sym = symbol or SYMBOL
+    try:
+        return _build_snapshot(exchange, cur, sym)
+    except Exception:
+        candle_writer.get_writer('candles').discard(sym, TF)
+        raise
 
+
+def _build_snapshot(exchange, cur, sym):
     # 1. Realtime ticker
     ticker = exchange.fetch_ticker(sym)
     price = float(ticker.get('last') or ticker.get('close') or 0)
@@ -56,14 +65,7 @@ def build_snapshot(exchange, cur, symbol=None) -> dict:
     # 2. Fetch recent 1m candles and upsert
     ohlcv = exchange.fetch_ohlcv(sym, TF, limit=120)
     if ohlcv:
-        for ms, o, h, l, c, v in ohlcv:
-            cur.execute("""
-                INSERT INTO candles(symbol, tf, ts, o, h, l, c, v)
-                VALUES (%s, %s, to_timestamp(%s/1000.0), %s, %s, %s, %s, %s)
-                ON CONFLICT (symbol, tf, ts) DO UPDATE
-                SET o=EXCLUDED.o, h=EXCLUDED.h, l=EXCLUDED.l,
-                    c=EXCLUDED.c, v=EXCLUDED.v
-            """, (sym, TF, ms, o, h, l, c, v))
+        candle_writer.upsert_ohlcv(cur, 'candles', sym, TF, ohlcv)
 
     # 3. Read last 300 candles from DB
     cur.execute("""
@@ -79,25 +81,14 @@ def build_snapshot(exchange, cur, symbol=None) -> dict:
         raise SnapshotError(f'not enough candles ({candle_count})')
 
     rows = list(reversed(rows))  # ASC order
-    closes = [float(r[4]) for r in rows]
-    highs = [float(r[2]) for r in rows]
-    lows = [float(r[3]) for r in rows]
-    vols = [float(r[5]) for r in rows]
-
-    # ── Indicator calculations ─────────────────────────────
-    # BB (20, 2σ)
-    bb_win = closes[-20:]
-    bb_mid = _sma(bb_win)
-    bb_var = sum((x - bb_mid) ** 2 for x in bb_win) / 20
-    bb_sd = bb_var ** 0.5
-    bb_upper = bb_mid + 2 * bb_sd
-    bb_lower = bb_mid - 2 * bb_sd
-
-    # Ichimoku (9/26/52)
-    tenkan = (max(highs[-9:]) + min(lows[-9:])) / 2
-    kijun = (max(highs[-26:]) + min(lows[-26:])) / 2
-    span_a = (tenkan + kijun) / 2
-    span_b = (max(highs[-52:]) + min(lows[-52:])) / 2
+    closes = il.as_array([r[4] for r in rows]).tolist()
+
+    # ── Indicator calculations (indicator_lib) ─────────────
+    # BB(20,2σ), Ichimoku(9/26/52), RSI(14), ATR(14), MA50/200, EMA9/21/50, VWAP
+    ind = il.latest_indicators(rows)
+    bb_mid, bb_upper, bb_lower = ind['bb_mid'], ind['bb_up'], ind['bb_dn']
+    tenkan, kijun = ind['ich_tenkan'], ind['ich_kijun']
+    span_a, span_b = ind['ich_span_a'], ind['ich_span_b']
     cloud_top = max(span_a, span_b)
     cloud_bot = min(span_a, span_b)
     if price > cloud_top:
@@ -107,78 +98,12 @@ def build_snapshot(exchange, cur, symbol=None) -> dict:
     else:
         cloud_position = 'inside'
 
-    # Volume
-    vol_last = vols[-1]
-    vol_ma20 = _sma(vols[-20:])
+    vol_last, vol_ma20 = ind['vol'], ind['vol_ma20']
     vol_ratio = vol_last / vol_ma20 if vol_ma20 > 0 else 1.0
-
-    # RSI (14)
-    rsi_14 = None
-    if len(closes) >= 15:
-        deltas = [closes[i] - closes[i - 1] for i in range(1, len(closes))]
-        recent = deltas[-14:]
-        gains = [d if d > 0 else 0 for d in recent]
-        losses = [-d if d < 0 else 0 for d in recent]
-        avg_gain = sum(gains) / 14
-        avg_loss = sum(losses) / 14
-        if avg_loss > 0:
-            rs = avg_gain / avg_loss
-            rsi_14 = 100 - 100 / (1 + rs)
-        else:
-            rsi_14 = 100.0
-
-    # ATR (14)
-    atr_14 = None
-    if len(closes) >= 15:
-        trs = []
-        for i in range(-14, 0):
-            hi = highs[i]
-            lo = lows[i]
-            prev_c = closes[i - 1]
-            tr = max(hi - lo, abs(hi - prev_c), abs(lo - prev_c))
-            trs.append(tr)
-        atr_14 = sum(trs) / 14
-
-    # MA 50 / 200
-    ma_50 = _sma(closes[-50:]) if len(closes) >= 50 else None
-    ma_200 = _sma(closes[-200:]) if len(closes) >= 200 else None
-
-    # EMA (9/21/50)
-    def _ema(xs, period):
-        if len(xs) < period:
-            return None
-        multiplier = 2 / (period + 1)
-        ema_val = _sma(xs[:period])
-        for p in xs[period:]:
-            ema_val = (p - ema_val) * multiplier + ema_val
-        return ema_val
-
-    ema_9 = _ema(closes, 9)
-    ema_21 = _ema(closes, 21)
-    ema_50 = _ema(closes, 50) if len(closes) >= 50 else None
-
-    # VWAP (UTC 00:00 intraday reset)
-    vwap_val = None
-    try:
-        from datetime import datetime, timezone
-        utc_today = datetime.now(timezone.utc).replace(hour=0, minute=0, second=0, microsecond=0)
-        cum_vp = 0.0
-        cum_vol = 0.0
-        for r in rows:
-            row_ts = r[0]
-            if hasattr(row_ts, 'astimezone'):
-                row_ts_utc = row_ts.astimezone(timezone.utc)
-            else:
-                row_ts_utc = row_ts.replace(tzinfo=timezone.utc)
-            if row_ts_utc >= utc_today:
-                typical = (float(r[2]) + float(r[3]) + float(r[4])) / 3
-                vol_r = float(r[5])
-                cum_vp += typical * vol_r
-                cum_vol += vol_r
-        if cum_vol > 0:
-            vwap_val = cum_vp / cum_vol
-    except Exception:
-        pass
+    rsi_14, atr_14 = ind['rsi_14'], ind['atr_14']
+    ma_50, ma_200 = ind['ma_50'], ind['ma_200']
+    ema_9, ema_21, ema_50 = ind['ema_9'], ind['ema_21'], ind['ema_50']
+    vwap_val = ind['vwap']
 
     # Upsert indicators
     ts_last = rows[-1][0]
@@ -205,7 +130,7 @@ def build_snapshot(exchange, cur, symbol=None) -> dict:
         sym, TF, ts_last,
         bb_mid, bb_upper, bb_lower,
         tenkan, kijun, span_a, span_b,
-        vol_last, vol_ma20, vol_last > vol_ma20 * 2,
+        vol_last, vol_ma20, ind['vol_spike'],
         rsi_14, atr_14, ma_50, ma_200,
         ema_9, ema_21, ema_50, vwap_val,
     ))
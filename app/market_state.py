@@ -0,0 +1,244 @@
+"""
+market_state.py — Per-cycle immutable market snapshot.
+
+One autopilot cycle used to read the same latest rows dozens of times:
+build_feature_snapshot (~15 single-row queries), score_engine.compute_total
+→ tech_scorer / position_scorer / regime_reader, then mtf_direction, each
+with its own SELECT ... ORDER BY ts DESC LIMIT 1.
+
+load_market_state(cur) reads everything those consumers need with a few
+set-based queries and returns a frozen MarketState; consumers take it via
+an optional `state=` argument and fall back to their own queries when it
+is not given (standalone / __main__ use).
+
+  1. candles    — last CANDLES_1M 1m bars + last CLOSES_5M 5m closes (one LATERAL query)
+  2. indicators — last INDICATOR_ROWS 1m rows (latest row + ATR history)
+  3. vol_profile — last VOL_PROFILE_ROWS rows (POC drift / slope / VA quality)
+  4. context    — market_context_latest, mtf_indicators, position_state,
+                  safety_limits in one row
+  5. spread     — market_data_cache bid/ask (own query: FAIL-OPEN, columns optional)
+
+Every section is FAIL-OPEN: a failed query leaves that section empty and
+the consumer falls back to its existing default, as before.
+
+Usage:
+    from market_state import load_market_state
+    state = load_market_state(cur, SYMBOL)
+    scores = score_engine.compute_total(cur, state=state)
+    features = build_feature_snapshot(cur, SYMBOL, state=state)
+"""
+import time
+from dataclasses import dataclass, field
+from types import MappingProxyType
+
+LOG_PREFIX = '[market_state]'
+SYMBOL = 'BTC/USDT:USDT'
+
+CANDLES_1M = 51        # volume_z / liquidity_ok window (50) + current bar
+CLOSES_5M = 21         # vol_pct window (20) + 1
+INDICATOR_ROWS = 21    # atr_ratio window (20) + current
+VOL_PROFILE_ROWS = 10  # drift / range_quality lookback
+
+INDICATOR_COLS = (
+    'ich_tenkan', 'ich_kijun', 'bb_mid', 'bb_up', 'bb_dn', 'vol_spike',
+    'rsi_14', 'ma_50', 'ma_200', 'vol', 'vol_ma20', 'atr_14',
+    'ema_9', 'ema_21', 'ema_50', 'vwap', 'ich_span_a', 'ich_span_b',
+)
+CONTEXT_COLS = (
+    'regime', 'regime_confidence', 'shock_type', 'flow_bias',
+    'breakout_confirmed', 'age_seconds',
+    'adx_14', 'vah', 'val', 'poc', 'price_vs_va', 'bbw_ratio',
+)
+MTF_COLS = (
+    'ema_15m_50', 'ema_15m_200', 'ema_1h_50', 'ema_1h_200',
+    'adx_1h', 'donchian_high_15m_20', 'donchian_low_15m_20',
+    'atr_15m', 'updated_at',
+)
+POSITION_COLS = ('side', 'total_qty', 'avg_entry_price', 'stage', 'trade_budget_used_pct')
+SAFETY_COLS = ('stop_loss_pct', 'dynamic_sl_base_pct')
+
+_EMPTY = MappingProxyType({})
+
+
+def _log(msg):
+    print(f'{LOG_PREFIX} {msg}', flush=True)
+
+
+def _num(v):
+    return float(v) if v is not None else None
+
+
+@dataclass(frozen=True)
+class MarketState:
+    """Read-only view of one symbol's market data at loaded_at.
+
+    Sequences are tuples, newest first; rows are read-only mappings with
+    raw DB values (None kept), so each consumer applies its own defaults.
+    An empty section means "not loaded" — consumers treat it like a
+    missing row.
+    """
+    symbol: str
+    loaded_at: float
+    candles: tuple = ()           # ((ts, o, h, l, c, v), ...) 1m, newest first
+    closes_5m: tuple = ()         # (c, ...) 5m, newest first
+    indicators: tuple = ()        # (mapping, ...) 1m, newest first
+    vol_profile: tuple = ()       # ((poc, vah, val), ...) newest first
+    market_context: MappingProxyType = field(default_factory=lambda: _EMPTY)
+    mtf: MappingProxyType = field(default_factory=lambda: _EMPTY)
+    position: MappingProxyType = field(default_factory=lambda: _EMPTY)
+    safety: MappingProxyType = field(default_factory=lambda: _EMPTY)
+    bid: float = None
+    ask: float = None
+    errors: tuple = ()
+
+    @property
+    def age_sec(self):
+        return time.time() - self.loaded_at
+
+    @property
+    def price(self):
+        """Latest 1m close (None if no candles)."""
+        return self.candles[0][4] if self.candles else None
+
+    @property
+    def indicator(self):
+        """Latest 1m indicator row (empty mapping if none)."""
+        return self.indicators[0] if self.indicators else _EMPTY
+
+    @property
+    def atr(self):
+        return self.indicator.get('atr_14')
+
+
+def _load_candles(cur, symbol):
+    cur.execute("""
+        SELECT w.tf, c.ts, c.o, c.h, c.l, c.c, c.v
+        FROM (VALUES ('1m', %s), ('5m', %s)) AS w(tf, n)
+        CROSS JOIN LATERAL (
+            SELECT ts, o, h, l, c, v FROM candles
+            WHERE symbol = %s AND tf = w.tf
+            ORDER BY ts DESC LIMIT w.n
+        ) c
+        ORDER BY w.tf, c.ts DESC;
+    """, (CANDLES_1M, CLOSES_5M, symbol))
+    bars, closes_5m = [], []
+    for r in cur.fetchall():
+        if r[0] == '1m':
+            bars.append((r[1],) + tuple(_num(v) for v in r[2:7]))
+        else:
+            closes_5m.append(_num(r[5]))
+    return {'candles': tuple(bars), 'closes_5m': tuple(closes_5m)}
+
+
+def _load_indicators(cur, symbol):
+    cur.execute(f"""
+        SELECT {', '.join(INDICATOR_COLS)}
+        FROM indicators
+        WHERE symbol = %s AND tf = '1m'
+        ORDER BY ts DESC LIMIT %s;
+    """, (symbol, INDICATOR_ROWS))
+    rows = []
+    for r in cur.fetchall():
+        rows.append(MappingProxyType({
+            c: (v if c == 'vol_spike' else _num(v)) for c, v in zip(INDICATOR_COLS, r)}))
+    return {'indicators': tuple(rows)}
+
+
+def _load_vol_profile(cur, symbol):
+    cur.execute("""
+        SELECT poc, vah, val FROM vol_profile
+        WHERE symbol = %s
+        ORDER BY ts DESC LIMIT %s;
+    """, (symbol, VOL_PROFILE_ROWS))
+    return {'vol_profile': tuple(tuple(_num(v) for v in r) for r in cur.fetchall())}
+
+
+_CONTEXT_PARTS = (
+    # key, columns, FROM/WHERE (one row), takes symbol
+    ('market_context', CONTEXT_COLS, 'market_context_latest WHERE symbol = %s', True),
+    ('mtf', MTF_COLS, 'mtf_indicators WHERE symbol = %s LIMIT 1', True),
+    ('position', POSITION_COLS, 'position_state WHERE symbol = %s', True),
+    ('safety', SAFETY_COLS, 'safety_limits ORDER BY id DESC LIMIT 1', False),
+)
+
+
+def _load_context(cur, symbol):
+    """All one-row lookups in a single statement (LEFT JOIN LATERAL each).
+
+    If that fails (e.g. mtf_indicators not created yet on a fresh DB),
+    each part is read on its own so one missing table only empties its part.
+    """
+    joins, cols, params = [], [], []
+    for i, (key, names, src, by_symbol) in enumerate(_CONTEXT_PARTS):
+        joins.append(f'LEFT JOIN LATERAL (SELECT true AS _hit, * FROM {src}) t{i} ON true')
+        cols.append(f't{i}._hit')
+        cols.extend(f't{i}.{c}' for c in names)
+        if by_symbol:
+            params.append(symbol)
+    try:
+        cur.execute(f"""
+            SELECT {', '.join(cols)}
+            FROM (SELECT 1) one
+            {' '.join(joins)};
+        """, tuple(params))
+        row = cur.fetchone() or ()
+    except Exception as e:
+        _log(f'context join FAIL-OPEN, reading parts: {e}')
+        return _load_context_parts(cur, symbol)
+    out = {}
+    i = 0
+    for key, names, _, _ in _CONTEXT_PARTS:
+        part = row[i:i + 1 + len(names)]
+        i += 1 + len(names)
+        if part and part[0]:
+            out[key] = MappingProxyType(dict(zip(names, part[1:])))
+    return out
+
+
+def _load_context_parts(cur, symbol):
+    out = {}
+    for key, names, src, by_symbol in _CONTEXT_PARTS:
+        try:
+            cur.execute(f"SELECT {', '.join(names)} FROM {src};",
+                        (symbol,) if by_symbol else None)
+            row = cur.fetchone()
+            if row:
+                out[key] = MappingProxyType(dict(zip(names, row)))
+        except Exception as e:
+            _log(f'{key} load FAIL-OPEN: {e}')
+    return out
+
+
+def _load_spread(cur, symbol):
+    cur.execute("""
+        SELECT bid, ask FROM market_data_cache
+        WHERE symbol = %s
+        ORDER BY ts DESC LIMIT 1;
+    """, (symbol,))
+    row = cur.fetchone()
+    if not row:
+        return {}
+    return {'bid': _num(row[0]), 'ask': _num(row[1])}
+
+
+_SECTIONS = (
+    ('candles', _load_candles),
+    ('indicators', _load_indicators),
+    ('vol_profile', _load_vol_profile),
+    ('context', _load_context),
+    ('spread', _load_spread),      # last: column set varies by deployment
+)
+
+
+def load_market_state(cur, symbol=SYMBOL):
+    """Load one MarketState with len(_SECTIONS) queries. Never raises."""
+    data = {}
+    errors = []
+    for name, loader in _SECTIONS:
+        try:
+            data.update(loader(cur, symbol))
+        except Exception as e:
+            errors.append(name)
+            if name != 'spread':
+                _log(f'{name} load FAIL-OPEN: {e}')
+    return MarketState(symbol=symbol, loaded_at=time.time(), errors=tuple(errors), **data)
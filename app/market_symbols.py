@@ -0,0 +1,155 @@
+"""
+market_symbols.py — Symbol list, fair scheduling and lag metric for the
+market-data daemons (candles, indicators, vol_profile, aggregate_candles,
+live_event_detector, market_context/ctx_collector).
+
+One process per stage serves every configured symbol instead of one
+process per symbol. Trading itself stays on trading_config.SYMBOL;
+the extra symbols (ETH, SOL, ...) are tracked for regime correlation.
+
+  SYMBOLS env: comma-separated list, e.g.
+      SYMBOLS="BTC/USDT:USDT,ETH/USDT:USDT,SOL/USDT:USDT"
+  Falls back to the legacy SYMBOL env, then trading_config.SYMBOL.
+  The trading symbol is always included and always first.
+
+Lag: every stage reports, per symbol, how far the newest data it has
+processed is behind wall-clock time (pipeline_lag table, one row per
+stage/symbol, upserted in one statement per flush).
+
+Usage:
+    from market_symbols import get_symbols, FairScheduler, LagTracker
+    symbols = get_symbols()
+    sched = FairScheduler(symbols)
+    lag = LagTracker('indicators')
+    for sym in sched.order():
+        ...
+        sched.served(sym)
+        lag.observe(sym, newest_ts)
+    lag.maybe_flush(conn)
+"""
+import os
+import time
+from datetime import datetime, timezone
+
+from psycopg2.extras import execute_values
+
+from trading_config import SYMBOL as PRIMARY_SYMBOL
+
+LOG_PREFIX = '[market_symbols]'
+LAG_FLUSH_SEC = 10
+
+
+def _log(msg):
+    print(f'{LOG_PREFIX} {msg}', flush=True)
+
+
+def get_symbols(env=None):
+    """Configured market-data symbols, trading symbol first, no duplicates."""
+    env = os.environ if env is None else env
+    raw = env.get('SYMBOLS') or env.get('SYMBOL') or ''
+    out = [PRIMARY_SYMBOL]
+    for s in raw.split(','):
+        s = s.strip()
+        if s and s not in out:
+            out.append(s)
+    return out
+
+
+class FairScheduler:
+    """Serve the symbol that has waited longest first.
+
+    A symbol that is slow (reseeding, REST retries) is served last on the
+    next round, so it cannot keep delaying the same neighbours; ties keep
+    the configured order, so the trading symbol goes first on a fresh start.
+    """
+
+    def __init__(self, symbols):
+        self.symbols = list(symbols)
+        self._last = {s: 0.0 for s in self.symbols}
+
+    def order(self):
+        rank = {s: i for i, s in enumerate(self.symbols)}
+        return sorted(self.symbols, key=lambda s: (self._last[s], rank[s]))
+
+    def served(self, symbol, now=None):
+        self._last[symbol] = time.monotonic() if now is None else now
+
+
+def _to_epoch(ts):
+    if ts is None:
+        return None
+    if isinstance(ts, datetime):
+        if ts.tzinfo is None:
+            ts = ts.replace(tzinfo=timezone.utc)
+        return ts.timestamp()
+    ts = float(ts)
+    return ts / 1000.0 if ts > 1e11 else ts     # epoch ms or s
+
+
+class LagTracker:
+    """Per-symbol lag of one pipeline stage.
+
+    observe(symbol, data_ts) records the newest data timestamp handled
+    (datetime, epoch s or epoch ms); lag_sec = now - data_ts, so a 1m bar
+    stage reads 0-60s when healthy.
+    """
+
+    def __init__(self, stage, flush_sec=LAG_FLUSH_SEC):
+        self.stage = stage
+        self.flush_sec = flush_sec
+        self._data_ts = {}           # symbol → epoch s
+        self._cycle_ms = {}          # symbol → last processing time
+        self._last_flush = 0.0
+
+    def observe(self, symbol, data_ts, cycle_ms=None):
+        if cycle_ms is not None:
+            self._cycle_ms[symbol] = int(cycle_ms)
+        ts = _to_epoch(data_ts)
+        if ts is None:
+            return
+        prev = self._data_ts.get(symbol)
+        if prev is None or ts > prev:
+            self._data_ts[symbol] = ts
+
+    def lags(self, now=None):
+        """{symbol: lag_sec} for every observed symbol."""
+        now = time.time() if now is None else now
+        return {s: round(now - ts, 1) for s, ts in self._data_ts.items()}
+
+    def flush(self, cur, now=None):
+        """Upsert all observed symbols into pipeline_lag in one statement."""
+        if not self._data_ts:
+            return 0
+        now = time.time() if now is None else now
+        rows = [(self.stage, s, datetime.fromtimestamp(ts, tz=timezone.utc),
+                 round(now - ts, 1), self._cycle_ms.get(s))
+                for s, ts in sorted(self._data_ts.items())]
+        execute_values(cur, """
+            INSERT INTO pipeline_lag (stage, symbol, data_ts, lag_sec, cycle_ms)
+            VALUES %s
+            ON CONFLICT (stage, symbol) DO UPDATE SET
+                data_ts = EXCLUDED.data_ts, lag_sec = EXCLUDED.lag_sec,
+                cycle_ms = EXCLUDED.cycle_ms, updated_at = now()
+        """, rows, template='(%s, %s, %s, %s, %s)', page_size=len(rows))
+        self._last_flush = now
+        return len(rows)
+
+    def maybe_flush(self, conn, now=None):
+        """flush() at most every flush_sec; never raises (metric only)."""
+        now = time.time() if now is None else now
+        if now - self._last_flush < self.flush_sec:
+            return 0
+        self._last_flush = now
+        try:
+            with conn.cursor() as cur:
+                n = self.flush(cur, now=now)
+            if not conn.autocommit:
+                conn.commit()
+            return n
+        except Exception as e:
+            _log(f'{self.stage}: lag flush failed: {e}')
+            try:
+                conn.rollback()
+            except Exception:
+                pass
+            return 0
@@ -10,6 +10,8 @@ Direction:
   NO_TRADE   — 조건 불충분 또는 conflicting
 
 FAIL-OPEN: 에러 시 NO_TRADE 반환 (안전).
+
+state=MarketState (market_state.py) 를 넘기면 mtf_indicators 를 다시 조회하지 않음.
 """
 
 import time
@@ -31,13 +33,8 @@ def _log(msg):
 def _get_config():
     """Load v1.1 config params from top-level unified_v11 YAML section."""
     try:
-        import yaml, os
-        _path = os.path.join(os.path.dirname(__file__), 'config', 'strategy_modes.yaml')
-        with open(_path, 'r') as _f:
-            _full = yaml.safe_load(_f) or {}
-        v11 = _full.get('unified_v11', {})
-        if not isinstance(v11, dict):
-            v11 = {}
+        import config_store
+        v11 = config_store.strategy_modes().section('unified_v11')
     except Exception:
         v11 = {}
     return {
@@ -47,18 +44,22 @@ def _get_config():
     }
 
 
-def _fetch_mtf(cur, symbol='BTC/USDT:USDT'):
-    """Fetch MTF indicators from DB."""
+def _fetch_mtf(cur, symbol='BTC/USDT:USDT', state=None):
+    """Fetch MTF indicators from DB (or from the cycle's MarketState)."""
     try:
-        cur.execute("""
-            SELECT ema_15m_50, ema_15m_200, ema_1h_50, ema_1h_200,
-                   adx_1h, donchian_high_15m_20, donchian_low_15m_20,
-                   atr_15m, updated_at
-            FROM mtf_indicators
-            WHERE symbol = %s
-            LIMIT 1;
-        """, (symbol,))
-        row = cur.fetchone()
+        if state is not None:
+            from market_state import MTF_COLS
+            row = tuple(state.mtf[c] for c in MTF_COLS) if state.mtf else None
+        else:
+            cur.execute("""
+                SELECT ema_15m_50, ema_15m_200, ema_1h_50, ema_1h_200,
+                       adx_1h, donchian_high_15m_20, donchian_low_15m_20,
+                       atr_15m, updated_at
+                FROM mtf_indicators
+                WHERE symbol = %s
+                LIMIT 1;
+            """, (symbol,))
+            row = cur.fetchone()
         if not row:
             return None
         return {
@@ -115,9 +116,11 @@ def _compute_adx_state(adx_1h, cfg=None):
         return 'BELOW'
 
 
-def compute_mtf_direction(cur, symbol='BTC/USDT:USDT'):
+def compute_mtf_direction(cur, symbol='BTC/USDT:USDT', state=None):
     """Compute MTF direction gate.
 
+    state: market_state.MarketState for this cycle (optional).
+
     Returns: dict with:
         direction: LONG_ONLY | SHORT_ONLY | NO_TRADE
         adx_1h: float
@@ -128,7 +131,7 @@ def compute_mtf_direction(cur, symbol='BTC/USDT:USDT'):
     """
     try:
         cfg = _get_config()
-        row = _fetch_mtf(cur, symbol)
+        row = _fetch_mtf(cur, symbol, state)
 
         base = {
             'direction': NO_TRADE,
@@ -0,0 +1,316 @@
+"""
+mtf_resampler.py — Incremental 1m → 15m/1h resampler with MTF indicator state.
+
+Replaces the 13,000-row fetch + full resample that indicators.py ran every 60s.
+Higher-timeframe (HTF) bars are clock-aligned buckets (same as
+aggregate_candles / market_ohlcv). Closed HTF bars are seeded once from
+market_ohlcv, then only new 1m bars are fed in; EMA50/200, ADX(14, Wilder),
+Donchian(20) and ATR(14) are updated as each HTF bar closes.
+
+An HTF bar closes when the first 1m bar of the next bucket arrives. Indicators
+are computed over closed HTF bars only, as before.
+
+The full-recompute helpers (_resample_candles, _compute_adx,
+_compute_donchian) are kept for tests; the latter two delegate to
+indicator_lib so streaming and batch share one definition.
+
+Usage:
+    from mtf_resampler import MtfResampler
+    mtf = MtfResampler()
+    mtf.seed_htf('15m', bars_15m); mtf.seed_htf('1h', bars_1h)
+    closed = mtf.update_1m(ts, o, h, l, c, v)   # list of (tf, bar) closed
+    row = mtf.values()                          # mtf_indicators columns
+
+mtf_history() is the batch counterpart for historical backfill: the same
+values at every 15m close, computed from closed 15m/1h bars in one pass.
+"""
+from collections import deque
+from datetime import datetime, timedelta, timezone
+
+import numpy as np
+
+import indicator_lib as il
+from indicator_engine import _RollingExtreme, _RollingSum, _RunningEma
+
+HTF_MINUTES = {'15m': 15, '1h': 60}
+KEEP_CLOSED = 400
+
+
+# ── Reference full recompute ─────────────────────────────
+
+def _resample_candles(candles_1m, target_tf_minutes):
+    """Resample 1m candles to target timeframe.
+    candles_1m: list of (ts, o, h, l, c, v) sorted ASC by ts.
+    Returns list of (ts, o, h, l, c, v) for target tf."""
+    if not candles_1m or target_tf_minutes <= 1:
+        return candles_1m
+    result = []
+    group = []
+    for candle in candles_1m:
+        group.append(candle)
+        if len(group) >= target_tf_minutes:
+            ts_first = group[0][0]
+            o_first = float(group[0][1])
+            h_max = max(float(g[2]) for g in group)
+            l_min = min(float(g[3]) for g in group)
+            c_last = float(group[-1][4])
+            v_sum = sum(float(g[5]) for g in group)
+            result.append((ts_first, o_first, h_max, l_min, c_last, v_sum))
+            group = []
+    return result
+
+
+def _compute_adx(highs, lows, closes, period=14):
+    """Compute ADX from high/low/close arrays (full recompute)."""
+    res = il.adx_last(highs, lows, closes, period)
+    return res['adx'] if res else None
+
+
+def _compute_donchian(highs, lows, period=20):
+    """Compute Donchian Channel high/low."""
+    return il.donchian_last(highs, lows, period)
+
+
+# ── Streaming state ──────────────────────────────────────
+
+def _bucket_start(ts, minutes):
+    """Floor a bar timestamp to its clock-aligned HTF bucket (UTC)."""
+    if ts.tzinfo is None:
+        ts = ts.replace(tzinfo=timezone.utc)
+    step = minutes * 60
+    epoch = int(ts.timestamp()) // step * step
+    return datetime.fromtimestamp(epoch, tz=timezone.utc)
+
+
+class _StreamingAdx:
+    """Wilder ADX updated one bar at a time (matches indicator_lib.adx)."""
+
+    __slots__ = ('period', 'prev', 'n_tr', 's_tr', 's_p', 's_m',
+                 'n_dx', 'dx_sum', 'adx')
+
+    def __init__(self, period=14):
+        self.period = period
+        self.prev = None        # (h, l, c) of previous bar
+        self.n_tr = 0
+        self.s_tr = self.s_p = self.s_m = 0.0
+        self.n_dx = 0
+        self.dx_sum = 0.0
+        self.adx = None
+
+    def push(self, h, l, c):
+        p = self.period
+        if self.prev is None:
+            self.prev = (h, l, c)
+            return
+        ph, pl, pc = self.prev
+        self.prev = (h, l, c)
+        up = h - ph
+        down = pl - l
+        pdm = up if up > down and up > 0 else 0.0
+        mdm = down if down > up and down > 0 else 0.0
+        tr = max(h - l, abs(h - pc), abs(l - pc))
+        self.n_tr += 1
+
+        if self.n_tr <= p:
+            # Seed sums; the first DX comes from the full seed window
+            self.s_tr += tr
+            self.s_p += pdm
+            self.s_m += mdm
+            if self.n_tr < p:
+                return
+        else:
+            self.s_tr = self.s_tr - self.s_tr / p + tr
+            self.s_p = self.s_p - self.s_p / p + pdm
+            self.s_m = self.s_m - self.s_m / p + mdm
+
+        if self.s_tr > 0:
+            plus_di = 100 * self.s_p / self.s_tr
+            minus_di = 100 * self.s_m / self.s_tr
+        else:
+            plus_di = minus_di = 0.0
+        di_sum = plus_di + minus_di
+        dx = 100 * abs(plus_di - minus_di) / di_sum if di_sum > 0 else 0.0
+
+        self.n_dx += 1
+        if self.n_dx < p:
+            self.dx_sum += dx
+        elif self.n_dx == p:
+            self.adx = (self.dx_sum + dx) / p
+        else:
+            self.adx = (self.adx * (p - 1) + dx) / p
+
+
+class HtfSeries:
+    """One higher timeframe: open/closed bars plus indicator state."""
+
+    def __init__(self, minutes, keep=KEEP_CLOSED):
+        self.minutes = minutes
+        self.closed = deque(maxlen=keep)   # (ts, o, h, l, c, v)
+        self._open_start = None
+        self._open_minutes = {}            # 1m ts → bar, revisions replace
+        self.ema50 = _RunningEma(50)
+        self.ema200 = _RunningEma(200)
+        self.adx = _StreamingAdx(14)
+        self.dc_high = _RollingExtreme(20, True)
+        self.dc_low = _RollingExtreme(20, False)
+        self.trs = _RollingSum(14)
+        self._prev_close = None
+
+    @property
+    def last_closed_start(self):
+        return self.closed[-1][0] if self.closed else None
+
+    @property
+    def open_bar(self):
+        """Aggregate of the 1m bars seen so far in the open bucket."""
+        if not self._open_minutes:
+            return None
+        mins = [self._open_minutes[k] for k in sorted(self._open_minutes)]
+        return (self._open_start, mins[0][1],
+                max(m[2] for m in mins), min(m[3] for m in mins),
+                mins[-1][4], sum(m[5] for m in mins))
+
+    def add_closed(self, bar):
+        """Append an already-closed HTF bar and advance indicator state."""
+        bar = (bar[0],) + tuple(float(x) for x in bar[1:])
+        _ts, _o, h, l, c, _v = bar
+        self.closed.append(bar)
+        self.ema50.push(c)
+        self.ema200.push(c)
+        self.adx.push(h, l, c)
+        self.dc_high.push(h)
+        self.dc_low.push(l)
+        if self._prev_close is not None:
+            pc = self._prev_close
+            self.trs.push(max(h - l, abs(h - pc), abs(l - pc)))
+        self._prev_close = c
+
+    def update_1m(self, ts, o, h, l, c, v):
+        """Feed a 1m bar. Returns the HTF bar it closed, or None."""
+        start = _bucket_start(ts, self.minutes)
+        last = self.last_closed_start
+        if last is not None and start <= last:
+            return None   # bucket already closed/seeded
+        closed_bar = None
+        if self._open_start is not None and start != self._open_start:
+            if start < self._open_start:
+                return None
+            closed_bar = self.open_bar
+            self.add_closed(closed_bar)
+            self._open_minutes = {}
+        self._open_start = start
+        self._open_minutes[ts] = (ts, float(o), float(h), float(l), float(c), float(v))
+        return closed_bar
+
+    def atr14(self):
+        if len(self.trs) < 14:
+            return None
+        return self.trs.window_sum() / 14
+
+    def donchian20(self):
+        if len(self.closed) < 20:
+            return None, None
+        return self.dc_high.dq[0][1], self.dc_low.dq[0][1]
+
+
+class MtfResampler:
+    """15m + 1h series for one symbol, producing mtf_indicators rows."""
+
+    def __init__(self):
+        self.series = {tf: HtfSeries(m) for tf, m in HTF_MINUTES.items()}
+
+    def seed_htf(self, tf, bars):
+        """Seed closed HTF bars (ts, o, h, l, c, v) ASC, e.g. from market_ohlcv."""
+        s = self.series[tf]
+        for b in bars:
+            if s.last_closed_start is None or b[0] > s.last_closed_start:
+                s.add_closed(b)
+
+    def update_1m(self, ts, o, h, l, c, v):
+        """Feed a 1m bar into every series. Returns [(tf, closed_bar), ...]."""
+        closed = []
+        for tf, s in self.series.items():
+            bar = s.update_1m(ts, o, h, l, c, v)
+            if bar is not None:
+                closed.append((tf, bar))
+        return closed
+
+    def closed_count(self, tf):
+        return self.series[tf].ema50.count
+
+    def values(self):
+        """Current mtf_indicators column values (closed HTF bars only)."""
+        s15 = self.series['15m']
+        s1h = self.series['1h']
+        dc_high, dc_low = s15.donchian20()
+        return {
+            'ema_15m_50': s15.ema50.value,
+            'ema_15m_200': s15.ema200.value,
+            'ema_1h_50': s1h.ema50.value,
+            'ema_1h_200': s1h.ema200.value,
+            'adx_1h': s1h.adx.adx,
+            'donchian_high_15m_20': dc_high,
+            'donchian_low_15m_20': dc_low,
+            'atr_15m': s15.atr14(),
+        }
+
+
+# ── Batch (historical) ───────────────────────────────────
+
+def _epoch(ts):
+    if ts.tzinfo is None:
+        ts = ts.replace(tzinfo=timezone.utc)
+    return ts.timestamp()
+
+
+def mtf_history(bars_15m, bars_1h):
+    """mtf_indicators values as of every 15m close.
+
+    bars_15m / bars_1h: closed, clock-aligned (ts, o, h, l, c, v) bars ASC.
+    Returns a list of dicts with 'ts' (the 15m close time, i.e. bucket start
+    + 15m — when the row became current), 'closed_1h' (1h bars closed by
+    then) and the MtfResampler.values() columns. Matches what MtfResampler
+    reports right after each 15m bar closes.
+    """
+    if not bars_15m:
+        return []
+    _, _o, h15, l15, c15, _v = il.ohlcv_arrays(bars_15m)
+    e15_50, e15_200 = il.ema(c15, 50), il.ema(c15, 200)
+    dc_high, dc_low = il.donchian(h15, l15, 20)
+    atr15 = il.atr(h15, l15, c15, 14)
+
+    if bars_1h:
+        _, _o, h1, l1, c1, _v = il.ohlcv_arrays(bars_1h)
+        e1_50, e1_200 = il.ema(c1, 50), il.ema(c1, 200)
+        adx1 = il.adx(h1, l1, c1, 14)[0]
+        ends_1h = np.array([_epoch(b[0]) + 3600 for b in bars_1h])
+    else:
+        e1_50 = e1_200 = adx1 = np.empty(0)
+        ends_1h = np.empty(0)
+
+    ends_15m = np.array([_epoch(b[0]) + 900 for b in bars_15m])
+    # Index of the last 1h bar closed at each 15m close (-1 = none yet)
+    j1h = np.searchsorted(ends_1h, ends_15m, side='right') - 1
+
+    def _v(arr, i):
+        if i < 0:
+            return None
+        x = float(arr[i])
+        return None if np.isnan(x) else x
+
+    out = []
+    for i, b in enumerate(bars_15m):
+        j = int(j1h[i])
+        out.append({
+            'ts': b[0] + timedelta(minutes=15),
+            'closed_1h': j + 1,
+            'ema_15m_50': _v(e15_50, i),
+            'ema_15m_200': _v(e15_200, i),
+            'ema_1h_50': _v(e1_50, j),
+            'ema_1h_200': _v(e1_200, j),
+            'adx_1h': _v(adx1, j),
+            'donchian_high_15m_20': _v(dc_high, i),
+            'donchian_low_15m_20': _v(dc_low, i),
+            'atr_15m': _v(atr15, i),
+        })
+    return out
@@ -251,14 +251,12 @@ def _load_db_category_weights(cur):
 
 
 def _load_watch_keywords(cur):
-    """Load watch keywords from openclaw_policies."""
+    """Watch keywords from openclaw_policies (config_store snapshot)."""
     try:
-        cur.execute("SELECT value FROM openclaw_policies WHERE key = 'watch_keywords';")
-        row = cur.fetchone()
-        if row and row[0]:
-            val = row[0] if isinstance(row[0], list) else json.loads(row[0])
-            if isinstance(val, list) and val:
-                return [str(k).lower() for k in val]
+        import config_store
+        val = config_store.policies(cur).get('watch_keywords')
+        if isinstance(val, tuple) and val:
+            return [str(k).lower() for k in val]
     except Exception:
         pass
     return WATCH_KEYWORDS_DEFAULT
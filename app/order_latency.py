@@ -0,0 +1,227 @@
+"""
+order_latency.py — Signal-to-order latency ledger for live_order_executor.
+
+Every work item the executor claims (an execution_queue row or an OPEN
+signal) gets one ledger entry with the time of each stage:
+
+  created    producer inserted the row (execution_queue.ts /
+             signals_action_v3.created_at_unix)
+  claimed    executor took it (UPDATE ... FOR UPDATE SKIP LOCKED claim)
+  validated  exchange_compliance accepted the order
+  sent       create_*_order request issued
+  acked      exchange answered the request (order id known)
+
+begin() opens the entry for the current thread; mark() stamps a stage on
+it and is a no-op without one, so place_close_order / place_open_order
+mark their stages without extra parameters. finish() writes one
+order_latency_log row when the item reached an outcome (a status other
+than the claim itself) and drops it otherwise (item released back to
+PENDING, retried later). Writing never raises into the caller.
+
+report() reads the last N hours and summarize() turns them into
+p50/p90/p99/max per stage gap and source (/debug order_latency):
+
+  queue     claimed   - created
+  validate  validated - claimed
+  send      sent      - validated
+  ack       acked     - sent
+  total     acked     - created   (signal-to-exchange-ack)
+
+Usage:
+    order_latency.begin('execution_queue', eq_id, 'ADD', created_at=ts)
+    order_latency.mark('validated')
+    order_latency.finish(cur)
+"""
+import math
+import threading
+import time
+from dataclasses import dataclass, field
+from datetime import datetime
+
+LOG_PREFIX = '[order_latency]'
+STAGES = ('created', 'claimed', 'validated', 'sent', 'acked')
+GAPS = (
+    ('queue', 'created', 'claimed'),
+    ('validate', 'claimed', 'validated'),
+    ('send', 'validated', 'sent'),
+    ('ack', 'sent', 'acked'),
+    ('total', 'created', 'acked'),
+)
+QUANTILES = (0.50, 0.90, 0.99)
+CLAIM_OUTCOMES = (None, 'PENDING')
+
+_local = threading.local()
+_table_ready = False
+
+
+def _log(msg):
+    print(f'{LOG_PREFIX} {msg}', flush=True)
+
+
+def _epoch(v):
+    if v is None:
+        return None
+    if isinstance(v, datetime):
+        return v.timestamp()
+    try:
+        return float(v)
+    except (TypeError, ValueError):
+        return None
+
+
+@dataclass
+class Entry:
+    source: str
+    item_id: int
+    action: str = None
+    stages: dict = field(default_factory=dict)
+    outcome: str = None
+    order_id: str = None
+
+    def mark(self, stage, ts=None):
+        self.stages[stage] = time.time() if ts is None else ts
+
+    def gaps_ms(self):
+        out = {}
+        for name, a, b in GAPS:
+            ta, tb = self.stages.get(a), self.stages.get(b)
+            if ta is not None and tb is not None:
+                out[name] = max(0.0, (tb - ta) * 1000)
+        return out
+
+
+def begin(source, item_id, action=None, created_at=None, claimed_at=None):
+    """Open the ledger entry for the item being processed on this thread."""
+    e = Entry(source, item_id, action)
+    ts = _epoch(created_at)
+    if ts is not None:
+        e.mark('created', ts)
+    e.mark('claimed', _epoch(claimed_at))
+    _local.entry = e
+    return e
+
+
+def current():
+    return getattr(_local, 'entry', None)
+
+
+def mark(stage, order_id=None):
+    e = current()
+    if e is None:
+        return
+    e.mark(stage)
+    if order_id:
+        e.order_id = str(order_id)
+
+
+def set_outcome(outcome):
+    e = current()
+    if e is not None:
+        e.outcome = outcome
+
+
+def finish(cur, outcome=None):
+    """Close the current entry; write it if the item reached an outcome.
+
+    Returns the entry written, or None (no entry / still pending / error).
+    """
+    e = current()
+    _local.entry = None
+    if e is None:
+        return None
+    if outcome is not None:
+        e.outcome = outcome
+    if e.outcome in CLAIM_OUTCOMES:
+        return None
+    try:
+        _write(cur, e)
+        return e
+    except Exception as ex:
+        _log(f'write failed ({e.source} {e.item_id}): {ex}')
+        return None
+
+
+def _write(cur, e):
+    global _table_ready
+    if not _table_ready:
+        import db_migrations
+        db_migrations.ensure_order_latency_log(cur)
+        _table_ready = True
+    s = e.stages
+    cur.execute("""
+        INSERT INTO order_latency_log
+            (source, item_id, action_type, order_id, outcome,
+             created_at, claimed_at, validated_at, sent_at, acked_at)
+        VALUES (%s, %s, %s, %s, %s,
+                to_timestamp(%s), to_timestamp(%s), to_timestamp(%s),
+                to_timestamp(%s), to_timestamp(%s));
+    """, (e.source, e.item_id, e.action, e.order_id, e.outcome,
+          s.get('created'), s.get('claimed'), s.get('validated'),
+          s.get('sent'), s.get('acked')))
+
+
+# ── report ──
+
+def report(cur, hours=24):
+    """Ledger rows of the last `hours` as Entry objects (oldest first)."""
+    cur.execute("""
+        SELECT source, item_id, action_type, order_id, outcome,
+               extract(epoch FROM created_at), extract(epoch FROM claimed_at),
+               extract(epoch FROM validated_at), extract(epoch FROM sent_at),
+               extract(epoch FROM acked_at)
+        FROM order_latency_log
+        WHERE ts >= now() - make_interval(hours => %s)
+        ORDER BY id ASC;
+    """, (int(hours),))
+    out = []
+    for (source, item_id, action, order_id, outcome, *stamps) in cur.fetchall():
+        e = Entry(source, item_id, action, outcome=outcome, order_id=order_id)
+        for stage, ts in zip(STAGES, stamps):
+            if ts is not None:
+                e.stages[stage] = float(ts)
+        out.append(e)
+    return out
+
+
+def percentile(values, q):
+    """Nearest-rank percentile of a non-empty list."""
+    vals = sorted(values)
+    return vals[max(0, math.ceil(q * len(vals)) - 1)]
+
+
+def summarize(entries):
+    """{source: {'n', 'sent', gap: {'n', 'p50', 'p90', 'p99', 'max'}}} (ms)."""
+    by_source = {}
+    for e in entries:
+        by_source.setdefault(e.source, []).append(e)
+    out = {}
+    for source, items in by_source.items():
+        row = {'n': len(items), 'sent': sum(1 for e in items if 'acked' in e.stages)}
+        samples = {}
+        for e in items:
+            for name, ms in e.gaps_ms().items():
+                samples.setdefault(name, []).append(ms)
+        for name, _, _ in GAPS:
+            vals = samples.get(name)
+            if not vals:
+                continue
+            row[name] = {'n': len(vals), 'max': max(vals),
+                         **{f'p{int(q * 100)}': percentile(vals, q) for q in QUANTILES}}
+        out[source] = row
+    return out
+
+
+def format_report(summary, hours=24):
+    if not summary:
+        return f'order latency: no ledger rows ({hours}h)'
+    lines = [f'=== Order latency ({hours}h) ===', 'stage  n  p50/p90/p99/max ms']
+    for source in sorted(summary):
+        row = summary[source]
+        lines.append(f'[{source}] items={row["n"]} sent={row["sent"]}')
+        for name, _, _ in GAPS:
+            g = row.get(name)
+            if g is None:
+                continue
+            lines.append(f'  {name}  {g["n"]}  '
+                         f'{g["p50"]:.0f}/{g["p90"]:.0f}/{g["p99"]:.0f}/{g["max"]:.0f}')
+    return '\n'.join(lines)
@@ -13,6 +13,8 @@ import time
 import urllib.parse
 import urllib.request
 
+import exchange_state
+
 SYMBOL = 'BTC/USDT:USDT'
 LOG_PREFIX = '[orphan_cleanup]'
 _DEBOUNCE_SEC = 60
@@ -43,7 +45,7 @@ def _send_telegram(text):
 def _get_position_qty(ex, symbol):
     """Fetch current position qty from exchange. Returns abs qty (float)."""
     try:
-        positions = ex.fetch_positions([symbol])
+        positions = exchange_state.fetch_positions(ex, [symbol])
         for p in positions:
             qty = abs(float(p.get('contracts', 0) or 0))
             if qty > 1e-09:
@@ -212,7 +214,7 @@ def pre_flight_cleanup(ex, cur, symbol):
         # Check if there are any pending orders
         has_orders = False
         try:
-            active = ex.fetch_open_orders(symbol)
+            active = exchange_state.fetch_open_orders(ex, symbol)
             if active:
                 has_orders = True
         except Exception:
@@ -220,7 +222,8 @@ def pre_flight_cleanup(ex, cur, symbol):
 
         if not has_orders:
             try:
-                cond = ex.fetch_open_orders(symbol, params={'orderFilter': 'StopOrder'})
+                cond = exchange_state.fetch_open_orders(
+                    ex, symbol, params={'orderFilter': 'StopOrder'})
                 if cond:
                     has_orders = True
             except Exception:
@@ -0,0 +1,297 @@
+"""
+perf_trace.py — Lightweight hot-path span timers for daemon cycles.
+
+A Tracer times one daemon cycle as a tree of named spans and aggregates
+each span path ('cycle/v3/features') into a log-bucket histogram plus
+call counters ('db' queries, 'api' ccxt requests, 'telegram', 'claude').
+Every FLUSH_SEC the window's p50/p95/p99 per span is written to
+perf_span_stats and the window is reset, so the table holds rolling
+per-minute histograms. /debug perf (local_query_executor) reads it.
+
+  tracer = perf_trace.Tracer('autopilot')
+  with tracer.cycle():
+      with perf_trace.span('risk_checks'):
+          ...
+      perf_trace.lap('guard_chain')      # ends the previous lap, starts this one
+  tracer.maybe_flush()
+
+span()/lap()/count() act on the current thread's active cycle and are
+no-ops outside one, so library code (scorers, db_config cursors, ccxt)
+can be instrumented without passing the tracer around. Counts go to the
+innermost open span and are rolled up into its parents when it closes.
+
+Cost is two perf_counter() calls and a dict update per span (a few µs);
+a cycle with ~20 spans stays far below 1% of a 100ms+ cycle. Tracing
+never raises into the caller: flush errors are logged and the window is
+dropped.
+"""
+import bisect
+import math
+import os
+import threading
+import time
+from contextlib import contextmanager
+from datetime import datetime, timezone
+
+LOG_PREFIX = '[perf_trace]'
+
+FLUSH_SEC = float(os.getenv('PERF_FLUSH_SEC', '60'))
+ENABLED = os.getenv('PERF_TRACE', '1') != '0'
+
+# Log-spaced bucket bounds in ms: 0.01ms .. ~20min, ratio 1.25 (≤12.5% error)
+_RATIO = 1.25
+BUCKETS_MS = tuple(0.01 * _RATIO ** i for i in range(int(math.log(1.2e6 / 0.01, _RATIO)) + 2))
+
+_local = threading.local()
+
+
+def _log(msg):
+    print(f'{LOG_PREFIX} {msg}', flush=True)
+
+
+class Histogram:
+    """Fixed log-bucket latency histogram (ms)."""
+
+    __slots__ = ('counts', 'n', 'total', 'max')
+
+    def __init__(self):
+        self.counts = [0] * (len(BUCKETS_MS) + 1)
+        self.n = 0
+        self.total = 0.0
+        self.max = 0.0
+
+    def add(self, ms):
+        self.counts[bisect.bisect_left(BUCKETS_MS, ms)] += 1
+        self.n += 1
+        self.total += ms
+        if ms > self.max:
+            self.max = ms
+
+    def quantile(self, q):
+        """Upper bound of the bucket holding the q-quantile (capped at max)."""
+        if not self.n:
+            return None
+        rank = max(1, math.ceil(q * self.n))
+        seen = 0
+        for i, c in enumerate(self.counts):
+            seen += c
+            if seen >= rank:
+                bound = BUCKETS_MS[i] if i < len(BUCKETS_MS) else self.max
+                return min(bound, self.max)
+        return self.max
+
+
+class _SpanStats:
+    __slots__ = ('hist', 'counters')
+
+    def __init__(self):
+        self.hist = Histogram()
+        self.counters = {}
+
+
+class _Span:
+    __slots__ = ('path', 't0', 'counts')
+
+    def __init__(self, path):
+        self.path = path
+        self.t0 = time.perf_counter()
+        self.counts = {}
+
+
+class Tracer:
+    """Per-daemon span aggregator. One cycle at a time per thread."""
+
+    def __init__(self, service, flush_sec=FLUSH_SEC, enabled=ENABLED, log_fn=None):
+        self.service = service
+        self.flush_sec = flush_sec
+        self.enabled = enabled
+        self._log = log_fn or _log
+        self._stats = {}
+        self._lock = threading.Lock()
+        self._window_start = time.time()
+        self._table_ready = False
+
+    # ── recording ──
+
+    @contextmanager
+    def cycle(self, name='cycle'):
+        if not self.enabled or getattr(_local, 'tracer', None) is not None:
+            yield
+            return
+        _local.tracer = self
+        _local.stack = [_Span(name)]
+        _local.lap = None
+        try:
+            yield
+        finally:
+            _end_lap()
+            stack = _local.stack
+            while stack:
+                self._close(stack)
+            _local.tracer = None
+
+    def _close(self, stack):
+        sp = stack.pop()
+        ms = (time.perf_counter() - sp.t0) * 1000
+        if stack:
+            parent = stack[-1].counts
+            for k, v in sp.counts.items():
+                parent[k] = parent.get(k, 0) + v
+        with self._lock:
+            st = self._stats.get(sp.path)
+            if st is None:
+                st = self._stats[sp.path] = _SpanStats()
+            st.hist.add(ms)
+            for k, v in sp.counts.items():
+                st.counters[k] = st.counters.get(k, 0) + v
+
+    # ── reporting ──
+
+    def summary(self):
+        """{path: {n, p50_ms, p95_ms, p99_ms, max_ms, total_ms, counters}} of the open window."""
+        with self._lock:
+            items = list(self._stats.items())
+        out = {}
+        for path, st in items:
+            h = st.hist
+            out[path] = {
+                'n': h.n, 'p50_ms': h.quantile(0.50), 'p95_ms': h.quantile(0.95),
+                'p99_ms': h.quantile(0.99), 'max_ms': h.max, 'total_ms': h.total,
+                'counters': dict(st.counters),
+            }
+        return out
+
+    def reset(self):
+        with self._lock:
+            self._stats = {}
+            self._window_start = time.time()
+
+    def maybe_flush(self, conn=None, force=False):
+        """Write the window to perf_span_stats if flush_sec elapsed, then reset.
+
+        conn: autocommit connection to use (else a pooled one).
+        """
+        if not self.enabled or not (force or time.time() - self._window_start >= self.flush_sec):
+            return False
+        window_start = self._window_start
+        rows = self.summary()
+        self.reset()
+        if not rows:
+            return False
+        own = conn is None
+        try:
+            if own:
+                from db_config import get_pooled_conn
+                conn = get_pooled_conn('rw', autocommit=True)
+            with conn.cursor() as cur:
+                if not self._table_ready:
+                    import db_migrations
+                    db_migrations.ensure_perf_span_stats(cur)
+                    self._table_ready = True
+                _write_rows(cur, self.service, window_start, rows)
+            return True
+        except Exception as e:
+            self._log(f'flush failed ({len(rows)} spans dropped): {e}')
+            return False
+        finally:
+            if own and conn is not None:
+                try:
+                    conn.close()
+                except Exception:
+                    pass
+
+
+def _write_rows(cur, service, window_start, rows):
+    from psycopg2.extras import execute_values, Json
+    execute_values(cur, """
+        INSERT INTO perf_span_stats
+            (window_start, service, span, n, p50_ms, p95_ms, p99_ms, max_ms, total_ms,
+             db_calls, api_calls, counters)
+        VALUES %s;
+    """, [
+        (datetime.fromtimestamp(window_start, timezone.utc), service, path,
+         r['n'], r['p50_ms'], r['p95_ms'], r['p99_ms'], r['max_ms'], r['total_ms'],
+         r['counters'].get('db', 0), r['counters'].get('api', 0), Json(r['counters']))
+        for path, r in rows.items()
+    ])
+
+
+# ── thread-local helpers (no-ops outside Tracer.cycle) ──
+
+def active():
+    return getattr(_local, 'tracer', None) is not None
+
+
+@contextmanager
+def span(name):
+    """Nested timer under the current span."""
+    tracer = getattr(_local, 'tracer', None)
+    if tracer is None:
+        yield
+        return
+    stack = _local.stack
+    stack.append(_Span(f'{stack[-1].path}/{name}'))
+    depth = len(stack)
+    try:
+        yield
+    finally:
+        # Close anything a lap() left open inside this span, then this span
+        while len(stack) >= depth:
+            if _local.lap is stack[-1]:
+                _local.lap = None
+            tracer._close(stack)
+
+
+def lap(name):
+    """End the previous lap (if any) and start span `name` under the cycle.
+
+    For long straight-line stages that would otherwise need re-indenting
+    under `with span()`. Laps end at the next lap(), end_lap() or cycle end.
+    """
+    tracer = getattr(_local, 'tracer', None)
+    if tracer is None:
+        return
+    _end_lap()
+    stack = _local.stack
+    sp = _Span(f'{stack[-1].path}/{name}')
+    stack.append(sp)
+    _local.lap = sp
+
+
+def end_lap():
+    if getattr(_local, 'tracer', None) is not None:
+        _end_lap()
+
+
+def _end_lap():
+    sp = getattr(_local, 'lap', None)
+    if sp is None:
+        return
+    _local.lap = None
+    stack = _local.stack
+    if sp in stack:
+        while stack and stack[-1] is not sp:
+            _local.tracer._close(stack)
+        _local.tracer._close(stack)
+
+
+def count(kind, n=1):
+    """Add n to counter `kind` on the innermost open span."""
+    if getattr(_local, 'tracer', None) is None:
+        return
+    c = _local.stack[-1].counts
+    c[kind] = c.get(kind, 0) + n
+
+
+def instrument_exchange(ex):
+    """Count every ccxt HTTP request on ex as 'api' (idempotent)."""
+    if getattr(ex, '_perf_instrumented', False):
+        return ex
+    fetch = ex.fetch
+
+    def counted_fetch(*args, **kwargs):
+        count('api')
+        return fetch(*args, **kwargs)
+    ex.fetch = counted_fetch
+    ex._perf_instrumented = True
+    return ex
@@ -3,6 +3,7 @@ import time
 import traceback
 import ccxt
 from dotenv import load_dotenv
+import exchange_state
 load_dotenv('/root/trading-bot/app/.env')
 
 # =========================
@@ -39,6 +40,7 @@ def _get_exchange():
         "timeout": 20000,
         "options": {"defaultType": "swap"},
     })
+    exchange_state.track(_exchange)
     _exchange.load_markets()
     return _exchange
 
@@ -52,7 +54,7 @@ print(f"[CONFIG] SYMBOL={SYMBOL} upper={PNL_UPPER_USD} lower={PNL_LOWER_USD}")
 while True:
     try:
         ex = _get_exchange()
-        positions = ex.fetch_positions([SYMBOL])
+        positions = exchange_state.fetch_positions(ex, [SYMBOL])
 
         has_position = False
         for p in positions:
@@ -11,6 +11,7 @@ position_manager.py — Core position management daemon.
   7. If action != HOLD, insert into execution_queue
 
 Never places orders directly — all actions go through execution_queue.
+Cycle phases are timed by perf_trace laps into perf_span_stats (/debug perf).
 """
 import copy
 import os
@@ -28,6 +29,8 @@ from dotenv import load_dotenv
 import test_utils
 import report_formatter
 import event_lock
+import perf_trace
+import exchange_state
 load_dotenv('/root/trading-bot/app/.env')
 
 SYMBOL = 'BTC/USDT:USDT'
@@ -160,6 +163,8 @@ def _get_exchange():
             'defaultType': 'swap',
             'recvWindow': 10000,
         }})
+    perf_trace.instrument_exchange(_exchange)
+    exchange_state.track(_exchange)
     _exchange.load_markets()
     return _exchange
 
@@ -189,6 +194,7 @@ def _send_telegram(text=None):
     chat_id = cfg.get('TELEGRAM_ALLOWED_CHAT_ID', '')
     if not token or not chat_id:
         return None
+    perf_trace.count('telegram')
     try:
         text = report_formatter.korean_output_guard(text)
         url = f'https://api.telegram.org/bot{token}/sendMessage'
@@ -223,8 +229,8 @@ def _send_telegram_throttled(text, msg_type='info'):
 
 
 def _fetch_position(ex=None):
-    '''Fetch current Bybit position. Returns dict or None.'''
-    positions = ex.fetch_positions([SYMBOL])
+    '''Fetch current Bybit position (exchange_state slot when fresh). Returns dict or None.'''
+    positions = exchange_state.fetch_positions(ex, [SYMBOL])
     for p in positions:
         if p.get('symbol') != SYMBOL:
             continue
@@ -340,8 +346,8 @@ def _build_context(cur=None, pos=None, snapshot=None):
 
     # Scores
     try:
-        import score_engine
-        scores = score_engine.compute_total(cur=cur, exchange=_get_exchange())
+        import score_publisher
+        scores = score_publisher.get_score(cur=cur, source='position_manager')
         ctx['scores'] = scores
         ctx['unified_score'] = scores
     except Exception:
@@ -2502,11 +2508,13 @@ def _cycle():
                 _log('test period ended, sleeping')
                 return LOOP_SLOW_SEC
 
+            perf_trace.lap('async_claude')
             # Phase 0: Check async Claude result from previous cycle
             async_action = _check_async_claude_result(cur)
             if async_action and async_action not in ('HOLD', None):
                 _reset_hold_tracker(f'async_claude action: {async_action}')
 
+            perf_trace.lap('fetch_position')
             # Fetch Bybit position
             ex = _get_exchange()
             pos = _fetch_position(ex)
@@ -2554,6 +2562,7 @@ def _cycle():
 
             _prev_position_side = current_side
 
+            perf_trace.lap('snapshot')
             # Phase 1: Real-time snapshot build
             import market_snapshot
             import event_trigger
@@ -2565,9 +2574,11 @@ def _cycle():
                 # Fallback: continue with DB-only context
                 pass
 
+            perf_trace.lap('build_context')
             # Phase 2: Build context (using snapshot if available)
             ctx = _build_context(cur, pos, snapshot=snapshot)
 
+            perf_trace.lap('proactive')
             # Phase 2.5: Proactive Manager — 적극적 중간관리자
             try:
                 import proactive_manager
@@ -2596,11 +2607,13 @@ def _cycle():
             except Exception as _pm_err:
                 _log(f'[proactive] error (FAIL-OPEN): {_pm_err}')
 
+            perf_trace.lap('event_trigger')
             # Phase 3: Event trigger evaluation
             event_result = event_trigger.evaluate(
                 snapshot=snapshot, prev_scores=_prev_scores,
                 position=pos, cur=cur, symbol=SYMBOL)
 
+            perf_trace.lap('event_handling')
             # Phase 4: Mode-based handling (DB-lock dedup)
             if event_result.mode == event_trigger.MODE_EMERGENCY:
                 em_types = [t['type'] for t in event_result.triggers]
@@ -2866,6 +2879,7 @@ def _cycle():
                 # DEFAULT: score_engine only, no Claude call
                 _log('DEFAULT mode, score_engine only')
 
+            perf_trace.lap('shock_guard')
             # P0-4: Shock guard check (1m rapid move defense)
             try:
                 import shock_guard
@@ -2875,10 +2889,12 @@ def _cycle():
             except Exception as _sg_err:
                 _log(f'shock_guard check error (FAIL-OPEN): {_sg_err}')
 
+            perf_trace.lap('decide')
             # Run decision engine (DEFAULT mode)
             (action, reason) = _decide(ctx)
             _log(f'decision: {action} - {reason}')
 
+            perf_trace.lap('guard_chain')
             # P0-4: Shock guard freeze — block ENTRY/ADD actions, allow EXIT
             try:
                 import shock_guard
@@ -2917,6 +2933,7 @@ def _cycle():
             except Exception as _pg_err:
                 _log(f'panic guard fallback error (FAIL-OPEN): {_pg_err}')
 
+            perf_trace.lap('stop_sync')
             # P0-2: Sync server-side stop order (after _decide, before action execution)
             try:
                 import server_stop_manager
@@ -2960,6 +2977,7 @@ def _cycle():
             if action != 'HOLD':
                 _reset_hold_tracker(f'default action: {action}')
 
+            perf_trace.lap('log_decision')
             # Log decision
             dec_id = _log_decision(cur, ctx, action, reason,
                                    model_used='local_score_engine',
@@ -2984,6 +3002,7 @@ def _cycle():
                         action = 'HOLD'
                         reason = 'deferred to strategy_intent'
 
+            perf_trace.lap('enqueue')
             # Execute non-HOLD actions
             if action == 'ADD':
                 import safety_manager
@@ -3033,6 +3052,7 @@ def _cycle():
                     pm_decision_id=dec_id,
                     priority=2)
 
+            perf_trace.lap('sync_state')
             # Sync position state (with peak uPnL tracking)
             _upnl_pct = None
             if pos and pos.get('side') and pos.get('entry_price') and ctx.get('price'):
@@ -3045,6 +3065,7 @@ def _cycle():
                         _upnl_pct = (_entry - _price) / _entry * 100
             _sync_position_state(cur, pos, upnl_pct=_upnl_pct)
 
+            perf_trace.lap('reconcile')
             # RECONCILE auto-recovery (every 5th cycle ≈ 50-75s)
             global _reconcile_cycle_count
             _reconcile_cycle_count += 1
@@ -3097,9 +3118,12 @@ def main():
     event_lock.cleanup_expired()
     global _last_cleanup_ts
     _last_cleanup_ts = time.time()
+    tracer = perf_trace.Tracer('position_manager')
     while True:
         try:
-            sleep_sec = _cycle()
+            with tracer.cycle():
+                sleep_sec = _cycle()
+            tracer.maybe_flush()
             time.sleep(sleep_sec)
         except Exception:
             traceback.print_exc()
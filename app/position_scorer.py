@@ -89,12 +89,25 @@ def _score_side_alignment(pos_side=None, tech_score=None):
     return int(round(alignment * 25))
 
 
-def compute(cur=None, tech_score=None):
+def _inputs_from_state(state):
+    '''(position_state row, atr, mark_price, sl_pct) from a MarketState.'''
+    from market_state import POSITION_COLS
+    ps = state.position
+    row = tuple(ps[c] for c in POSITION_COLS) if ps else None
+    atr = state.atr or None
+    mark_price = state.price or 0
+    sl = state.safety.get('stop_loss_pct')
+    sl_pct = float(sl) if sl else 2.0
+    return row, atr, mark_price, sl_pct
+
+
+def compute(cur=None, tech_score=None, state=None):
     '''Compute position context score.
 
     Args:
         cur: Database cursor
         tech_score: Current technical score for alignment check
+        state: market_state.MarketState for this cycle (no queries)
 
     Returns:
         {
@@ -118,13 +131,16 @@ def compute(cur=None, tech_score=None):
         'has_position': False}
 
     try:
-        cur.execute("""
-            SELECT side, total_qty, avg_entry_price, stage,
-                   trade_budget_used_pct
-            FROM position_state
-            WHERE symbol = %s;
-        """, (SYMBOL,))
-        row = cur.fetchone()
+        if state is not None:
+            row, atr, mark_price, sl_pct = _inputs_from_state(state)
+        else:
+            cur.execute("""
+                SELECT side, total_qty, avg_entry_price, stage,
+                       trade_budget_used_pct
+                FROM position_state
+                WHERE symbol = %s;
+            """, (SYMBOL,))
+            row = cur.fetchone()
 
         if not row or not row[0] or float(row[1] or 0) == 0:
             return no_position_result
@@ -135,28 +151,29 @@ def compute(cur=None, tech_score=None):
         stage = int(row[3]) if row[3] else 0
         budget_pct = float(row[4]) if row[4] else 0
 
-        # Fetch ATR
-        cur.execute("""
-            SELECT atr_14 FROM indicators
-            WHERE symbol = %s AND tf = '1m'
-            ORDER BY ts DESC LIMIT 1;
-        """, (SYMBOL,))
-        ind_row = cur.fetchone()
-        atr = float(ind_row[0]) if ind_row and ind_row[0] else None
-
-        # Fetch current price
-        cur.execute("""
-            SELECT c FROM candles
-            WHERE symbol = %s AND tf = '1m'
-            ORDER BY ts DESC LIMIT 1;
-        """, (SYMBOL,))
-        price_row = cur.fetchone()
-        mark_price = float(price_row[0]) if price_row and price_row[0] else 0
-
-        # Fetch stop-loss pct
-        cur.execute('SELECT stop_loss_pct FROM safety_limits ORDER BY id DESC LIMIT 1;')
-        sl_row = cur.fetchone()
-        sl_pct = float(sl_row[0]) if sl_row and sl_row[0] else 2.0
+        if state is None:
+            # Fetch ATR
+            cur.execute("""
+                SELECT atr_14 FROM indicators
+                WHERE symbol = %s AND tf = '1m'
+                ORDER BY ts DESC LIMIT 1;
+            """, (SYMBOL,))
+            ind_row = cur.fetchone()
+            atr = float(ind_row[0]) if ind_row and ind_row[0] else None
+
+            # Fetch current price
+            cur.execute("""
+                SELECT c FROM candles
+                WHERE symbol = %s AND tf = '1m'
+                ORDER BY ts DESC LIMIT 1;
+            """, (SYMBOL,))
+            price_row = cur.fetchone()
+            mark_price = float(price_row[0]) if price_row and price_row[0] else 0
+
+            # Fetch stop-loss pct
+            cur.execute('SELECT stop_loss_pct FROM safety_limits ORDER BY id DESC LIMIT 1;')
+            sl_row = cur.fetchone()
+            sl_pct = float(sl_row[0]) if sl_row and sl_row[0] else 2.0
 
         pos = {
             'side': side,
@@ -4,6 +4,9 @@ regime_reader.py — Read-only helper for live trading bot to read market regime
 FAIL-OPEN guarantee:
   - Table missing / empty / stale (>5 min) → returns UNKNOWN → existing behavior preserved.
   - Never blocks, never raises.
+
+get_current_regime(cur, state=MarketState) reads market_context_latest and
+the BB row from the cycle snapshot (market_state.py) instead of the DB.
 """
 
 import time
@@ -110,9 +113,21 @@ def _apply_transition_cooldown(new_regime):
     return _prev_regime
 
 
-def get_current_regime(cur, symbol='BTC/USDT:USDT'):
+def _rows_from_state(state):
+    """(market_context row, (bb_up, bb_dn, bb_mid)) from a MarketState."""
+    from market_state import CONTEXT_COLS
+    mc = state.market_context
+    row = tuple(mc[c] for c in CONTEXT_COLS) if mc else None
+    ind = state.indicator
+    bb_row = (ind.get('bb_up'), ind.get('bb_dn'), ind.get('bb_mid')) if ind else None
+    return row, bb_row
+
+
+def get_current_regime(cur, symbol='BTC/USDT:USDT', state=None):
     """Read latest regime from market_context_latest view.
 
+    state: market_state.MarketState for this cycle (no queries).
+
     Returns:
     {
         'regime': 'RANGE'|'BREAKOUT'|'SHOCK'|'UNKNOWN',
@@ -125,14 +140,17 @@ def get_current_regime(cur, symbol='BTC/USDT:USDT'):
     }
     """
     try:
-        cur.execute("""
-            SELECT regime, regime_confidence, shock_type, flow_bias,
-                   breakout_confirmed, age_seconds,
-                   adx_14, vah, val, poc, price_vs_va, bbw_ratio
-            FROM market_context_latest
-            WHERE symbol = %s;
-        """, (symbol,))
-        row = cur.fetchone()
+        if state is not None:
+            row, bb_row = _rows_from_state(state)
+        else:
+            cur.execute("""
+                SELECT regime, regime_confidence, shock_type, flow_bias,
+                       breakout_confirmed, age_seconds,
+                       adx_14, vah, val, poc, price_vs_va, bbw_ratio
+                FROM market_context_latest
+                WHERE symbol = %s;
+            """, (symbol,))
+            row = cur.fetchone()
         if not row:
             return _default()
 
@@ -150,12 +168,13 @@ def get_current_regime(cur, symbol='BTC/USDT:USDT'):
         # v14.1: Compute absolute bb_width_pct from indicators table
         bb_width_pct = None
         try:
-            cur.execute("""
-                SELECT bb_up, bb_dn, bb_mid FROM indicators
-                WHERE symbol = %s
-                ORDER BY ts DESC LIMIT 1;
-            """, (symbol,))
-            bb_row = cur.fetchone()
+            if state is None:
+                cur.execute("""
+                    SELECT bb_up, bb_dn, bb_mid FROM indicators
+                    WHERE symbol = %s
+                    ORDER BY ts DESC LIMIT 1;
+                """, (symbol,))
+                bb_row = cur.fetchone()
             if bb_row and bb_row[0] and bb_row[1] and bb_row[2]:
                 bb_mid_val = float(bb_row[2])
                 if bb_mid_val > 0:
@@ -13,6 +13,11 @@ GUARD: NEWS_EVENT cannot trigger trades alone.
 Each axis: -100 (short) to +100 (long).
 Output: total_score, abs_score (0-100), stage (1-7), dynamic_stop_loss_pct.
 Legacy compatibility: long_score/short_score (0-100).
+
+Market rows (candles / indicators / market_context / position_state /
+safety_limits) are read once per call into a market_state.MarketState and
+shared by tech_scorer, position_scorer and regime_reader; callers that
+already hold the cycle's snapshot pass it as compute_total(state=...).
 """
 import sys
 import json
@@ -50,35 +55,24 @@ def _log(msg):
 
 
 def _db_conn():
-    from db_config import get_conn
-    return get_conn()
+    from db_config import get_pooled_conn
+    return get_pooled_conn('rw')
 
 
 def _load_weights(cur=None):
-    '''Load axis weights from score_weights table, with openclaw_policies override.'''
+    '''Axis weights: score_weights row, openclaw_policies override, emergency bump.
+
+    Read from the config_store policy snapshot (cached, NOTIFY-invalidated).
+    '''
+    import config_store
     weights = dict(DEFAULT_WEIGHTS)
-    try:
-        cur.execute("""
-            SELECT tech_w, position_w, regime_w, news_event_w
-            FROM score_weights ORDER BY id DESC LIMIT 1;
-        """)
-        row = cur.fetchone()
-        if row:
-            weights = {
-                'tech_w': float(row[0]),
-                'position_w': float(row[1]),
-                'regime_w': float(row[2]),
-                'news_event_w': float(row[3])}
-    except Exception:
-        pass
+    snap = config_store.policies(cur)
+    if len(snap.score_weights) == len(DEFAULT_WEIGHTS):
+        weights.update(snap.score_weights)
     # openclaw_policies override
     try:
-        cur.execute("""
-            SELECT value FROM openclaw_policies WHERE key = 'score_weight_override';
-        """)
-        row = cur.fetchone()
-        if row and row[0]:
-            override = row[0] if isinstance(row[0], dict) else json.loads(row[0])
+        override = snap.get('score_weight_override')
+        if override:
             for k in ('tech_w', 'position_w', 'regime_w', 'news_event_w'):
                 if k in override:
                     weights[k] = float(override[k])
@@ -86,22 +80,20 @@ def _load_weights(cur=None):
         pass
     # Emergency news weight bump (TTL-based)
     try:
-        cur.execute("SELECT value FROM openclaw_policies WHERE key = 'news_emergency_bump';")
-        row = cur.fetchone()
-        if row and row[0]:
+        bump = snap.get('news_emergency_bump')
+        if bump and bump.get('active'):
             from datetime import datetime, timezone
-            bump = row[0] if isinstance(row[0], dict) else json.loads(row[0])
-            if bump.get('active'):
-                expires_at = datetime.fromisoformat(bump['expires_at'])
-                now = datetime.now(timezone.utc)
-                if now < expires_at:
-                    weights['news_event_w'] = float(bump.get('weight', 0.15))
-                else:
-                    cur.execute("DELETE FROM openclaw_policies WHERE key = 'news_emergency_bump';")
-                    try:
-                        cur.connection.commit()
-                    except Exception:
-                        pass
+            expires_at = datetime.fromisoformat(bump['expires_at'])
+            now = datetime.now(timezone.utc)
+            if now < expires_at:
+                weights['news_event_w'] = float(bump.get('weight', 0.15))
+            else:
+                cur.execute("DELETE FROM openclaw_policies WHERE key = 'news_emergency_bump';")
+                try:
+                    cur.connection.commit()
+                except Exception:
+                    pass
+                config_store.policy_store().invalidate()
     except Exception:
         pass
     return weights
@@ -243,7 +235,7 @@ def _compute_regime_from_events(cur):
                 'details': {'error': str(e)}}
 
 
-def compute_total(cur=None, exchange=None):
+def compute_total(cur=None, exchange=None, state=None):
     '''Compute unified 4-axis total score.
 
     Formula: TOTAL = 0.75*TECH + 0.10*POSITION + 0.10*REGIME + 0.05*NEWS_EVENT
@@ -255,6 +247,7 @@ def compute_total(cur=None, exchange=None):
     Args:
         cur: Database cursor (creates own connection if None)
         exchange: ccxt exchange instance (unused, kept for compat)
+        state: market_state.MarketState for this cycle (loaded if None)
 
     Returns:
         {
@@ -295,13 +288,17 @@ def compute_total(cur=None, exchange=None):
 
         weights = _load_weights(cur)
 
+        if state is None:
+            from market_state import load_market_state
+            state = load_market_state(cur, SYMBOL)
+
         # Import and compute each axis
         import tech_scorer
         import macro_scorer
         import position_scorer
         import news_event_scorer
 
-        tech_result = tech_scorer.compute(cur)
+        tech_result = tech_scorer.compute(cur, state=state)
         tech_score = tech_result.get('score', 0)
 
         macro_result = macro_scorer.compute(cur)
@@ -312,7 +309,7 @@ def compute_total(cur=None, exchange=None):
         regime_score = regime_result.get('score', 0)
         regime_detail = regime_result
 
-        pos_result = position_scorer.compute(cur, tech_score)
+        pos_result = position_scorer.compute(cur, tech_score, state=state)
         position_score = pos_result.get('score', 0)
 
         # NEWS_EVENT score (supplementary)
@@ -368,7 +365,7 @@ def compute_total(cur=None, exchange=None):
         breakout_news_override = False
         try:
             import regime_reader
-            current_regime = regime_reader.get_current_regime(cur)
+            current_regime = regime_reader.get_current_regime(cur, state=state)
             if current_regime.get('available') and current_regime.get('regime') == 'BREAKOUT':
                 # Increase news weight to 0.10-0.20 based on news strength
                 base_news_w = weights['news_event_w']
@@ -383,9 +380,9 @@ def compute_total(cur=None, exchange=None):
                 if delta > 0:
                     # Guard: if spread/liquidity bad, don't increase news weight
                     try:
-                        from strategy.common.features import compute_spread_ok, compute_liquidity_ok
-                        spread_ok = compute_spread_ok(cur)
-                        liquidity_ok = compute_liquidity_ok(cur)
+                        from strategy.common.features import _spread_ok_from, _liquidity_ok_from
+                        spread_ok = _spread_ok_from(state.bid, state.ask)
+                        liquidity_ok = _liquidity_ok_from([b[5] for b in state.candles])
                         if not spread_ok or not liquidity_ok:
                             delta = 0  # Don't increase news weight with bad liquidity
                             _log('BREAKOUT news_w override blocked: spread/liquidity not OK')
@@ -506,10 +503,8 @@ def compute_total(cur=None, exchange=None):
         # Dynamic stop-loss
         sl_base = 2.0
         try:
-            cur.execute('SELECT dynamic_sl_base_pct FROM safety_limits ORDER BY id DESC LIMIT 1;')
-            sl_row = cur.fetchone()
-            if sl_row and sl_row[0]:
-                sl_base = float(sl_row[0])
+            if state.safety.get('dynamic_sl_base_pct'):
+                sl_base = float(state.safety['dynamic_sl_base_pct'])
         except Exception:
             pass
 
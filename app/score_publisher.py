@@ -0,0 +1,178 @@
+"""
+score_publisher.py — Single producer of the unified score.
+
+score_engine.compute_total (4 axes incl. news_event_scorer) used to run
+separately in autopilot (direction_scorer), position_manager, the Telegram
+poller and local_query_executor. This service computes it once per 1m bar
+(woken by db_notify.INDICATOR_UPDATE, REFRESH_SEC fallback), records it to
+score_history (compute_total does) and publishes it to a shared latest-score
+slot: a JSON file in /dev/shm, replaced atomically.
+
+Consumers call get_score(): the slot is returned when it is younger than
+max_age_sec (and, when the caller passes its MarketState, computed for the
+same newest 1m bar). Otherwise the caller computes it as before and
+publishes the result, so a stopped publisher only costs the old behaviour.
+
+Slot payload:
+    {"symbol", "published_at" (epoch s), "bar_ts" (epoch s of newest 1m
+     candle or null), "source", "result": compute_total() result}
+get_score() returns the result dict plus 'published_at', 'score_age_sec',
+'score_source'.
+
+Usage:
+    import score_publisher
+    scores = score_publisher.get_score(cur=cur)                 # ≤ MAX_AGE_SEC old
+    scores = score_publisher.get_score(state=mstate, max_age_sec=20)
+"""
+import json
+import os
+import tempfile
+import threading
+import time
+import traceback
+
+LOG_PREFIX = '[score_publisher]'
+SYMBOL = 'BTC/USDT:USDT'
+
+_SHM_DIR = '/dev/shm' if os.path.isdir('/dev/shm') else tempfile.gettempdir()
+SLOT_PATH = os.getenv('SCORE_SLOT_PATH', os.path.join(_SHM_DIR, 'trading_bot_score.json'))
+MAX_AGE_SEC = float(os.getenv('SCORE_MAX_AGE_SEC', '60'))
+REFRESH_SEC = float(os.getenv('SCORE_REFRESH_SEC', '30'))
+
+_cache = {'stamp': None, 'slot': None}
+_cache_lock = threading.Lock()
+
+
+def _log(msg):
+    print(f'{LOG_PREFIX} {msg}', flush=True)
+
+
+def bar_ts_of(state):
+    """Epoch seconds of the newest 1m candle in a MarketState (None if empty)."""
+    if state is None or not state.candles:
+        return None
+    ts = state.candles[0][0]
+    return ts.timestamp() if hasattr(ts, 'timestamp') else float(ts)
+
+
+def publish(result, bar_ts=None, source='', path=None):
+    """Atomically replace the slot with result."""
+    path = path or SLOT_PATH
+    payload = {
+        'symbol': SYMBOL,
+        'published_at': time.time(),
+        'bar_ts': bar_ts,
+        'source': source,
+        'result': result,
+    }
+    tmp = f'{path}.{os.getpid()}.tmp'
+    try:
+        with open(tmp, 'w') as f:
+            json.dump(payload, f, default=str, ensure_ascii=False)
+        os.replace(tmp, path)
+        return True
+    except Exception as e:
+        _log(f'publish failed: {e}')
+        try:
+            os.unlink(tmp)
+        except OSError:
+            pass
+        return False
+
+
+def read_slot(path=None):
+    """Current slot payload, or None. Re-parsed only when the file changes."""
+    path = path or SLOT_PATH
+    try:
+        st = os.stat(path)
+    except OSError:
+        return None
+    stamp = (path, st.st_mtime_ns, st.st_size, st.st_ino)
+    with _cache_lock:
+        if _cache['stamp'] == stamp:
+            return _cache['slot']
+    try:
+        with open(path) as f:
+            slot = json.load(f)
+    except (OSError, ValueError):
+        return None
+    if not isinstance(slot, dict) or not isinstance(slot.get('result'), dict):
+        return None
+    with _cache_lock:
+        _cache['stamp'], _cache['slot'] = stamp, slot
+    return slot
+
+
+def latest(max_age_sec=MAX_AGE_SEC, bar_ts=None, path=None):
+    """Published result if fresh enough (and for bar_ts or later), else None."""
+    slot = read_slot(path)
+    if slot is None or slot.get('symbol') != SYMBOL:
+        return None
+    age = time.time() - float(slot.get('published_at') or 0)
+    if age > max_age_sec:
+        return None
+    if bar_ts is not None and (slot.get('bar_ts') is None or slot['bar_ts'] < bar_ts):
+        return None
+    out = dict(slot['result'])
+    out['published_at'] = slot['published_at']
+    out['score_age_sec'] = round(age, 1)
+    out['score_source'] = slot.get('source', '')
+    return out
+
+
+def get_score(cur=None, state=None, max_age_sec=MAX_AGE_SEC, source='', path=None):
+    """Latest published score, recomputing (and publishing) only when stale."""
+    bar_ts = bar_ts_of(state)
+    cached = latest(max_age_sec, bar_ts=bar_ts, path=path)
+    if cached is not None:
+        return cached
+    import score_engine
+    result = score_engine.compute_total(cur=cur, state=state)
+    if not result.get('error'):
+        publish(result, bar_ts=bar_ts, source=source or f'pid{os.getpid()}', path=path)
+    out = dict(result)
+    out['published_at'] = time.time()
+    out['score_age_sec'] = 0.0
+    out['score_source'] = 'computed'
+    return out
+
+
+def _publish_once(source='score_publisher'):
+    """Compute for the newest bar unless a consumer already published it."""
+    from db_config import get_pooled_conn
+    from market_state import load_market_state
+    import score_engine
+    conn = get_pooled_conn('rw', autocommit=True)
+    try:
+        with conn.cursor() as cur:
+            state = load_market_state(cur, SYMBOL)
+            bar_ts = bar_ts_of(state)
+            if latest(REFRESH_SEC, bar_ts=bar_ts) is not None:
+                return False
+            result = score_engine.compute_total(cur=cur, state=state)
+    finally:
+        conn.close()
+    if result.get('error'):
+        return False
+    return publish(result, bar_ts=bar_ts, source=source)
+
+
+def main():
+    _log(f'=== SCORE PUBLISHER START === slot={SLOT_PATH}')
+    from watchdog_helper import init_watchdog
+    init_watchdog(interval_sec=10)
+    import db_notify
+    listener = db_notify.Listener([db_notify.INDICATOR_UPDATE], log_fn=_log)
+    while True:
+        try:
+            t0 = time.time()
+            if _publish_once():
+                _log(f'published ({(time.time() - t0) * 1000:.0f}ms)')
+        except Exception:
+            traceback.print_exc()
+        db_notify.wait_for(listener, REFRESH_SEC,
+                           match=lambda ch, p: p.get('symbol') == SYMBOL)
+
+
+if __name__ == '__main__':
+    main()
@@ -17,6 +17,7 @@ sys.path.insert(0, '/root/trading-bot/app')
 ENV_PATH = '/root/trading-bot/app/telegram_cmd.env'
 STATE_FILE = '/root/trading-bot/app/.stopped_watchdog_state.json'
 COOLDOWN_SEC = 600
+SYMBOL = os.getenv('SYMBOL', 'BTC/USDT:USDT')
 
 def load_env(path=None):
     env = {}
@@ -68,8 +69,9 @@ def check():
 
             # Check indicators freshness
             cur.execute("""
-                SELECT EXTRACT(EPOCH FROM (now() - MAX(ts))) / 60 FROM indicators;
-            """)
+                SELECT EXTRACT(EPOCH FROM (now() - MAX(ts))) / 60 FROM indicators
+                WHERE symbol = %s;
+            """, (SYMBOL,))
             ind_row = cur.fetchone()
             ind_age = round(ind_row[0]) if ind_row and ind_row[0] else 9999
             ind_ok = ind_age < 10
@@ -4,10 +4,18 @@ strategy.common.features — Feature computation from existing DB data.
 Uses existing `indicators`, `vol_profile`, and `candles` tables.
 No new indicators are computed; this module extracts and packages
 existing data into a feature snapshot for the regime router.
+
+Each compute_*(cur, ...) reads its own rows and delegates to a pure
+_*_from(...) helper; build_feature_snapshot() feeds the same helpers from
+one market_state.MarketState (a handful of queries per cycle instead of
+one or two per feature).
 """
 
 import math
 
+import indicator_lib as il
+from market_state import load_market_state
+
 LOG_PREFIX = '[strategy.features]'
 
 
@@ -33,14 +41,18 @@ def compute_atr_pct(cur, symbol='BTC/USDT:USDT'):
             ORDER BY ts DESC LIMIT 1
         """, (symbol,))
         c_row = cur.fetchone()
-        if not c_row or c_row[0] is None or float(c_row[0]) == 0:
-            return None
-        return atr / float(c_row[0])
+        return _atr_pct_from(atr, c_row[0] if c_row else None)
     except Exception as e:
         _log(f'compute_atr_pct error: {e}')
         return None
 
 
+def _atr_pct_from(atr, price):
+    if atr is None or price is None or float(price) == 0:
+        return None
+    return float(atr) / float(price)
+
+
 def compute_bb_width(cur, symbol='BTC/USDT:USDT'):
     """Bollinger Band width as fraction: (upper - lower) / mid.  Returns float or None."""
     try:
@@ -49,17 +61,23 @@ def compute_bb_width(cur, symbol='BTC/USDT:USDT'):
             WHERE symbol = %s AND tf = '1m' ORDER BY ts DESC LIMIT 1
         """, (symbol,))
         row = cur.fetchone()
-        if not row or any(v is None for v in row):
-            return None
-        bb_up, bb_dn, bb_mid = float(row[0]), float(row[1]), float(row[2])
-        if bb_mid == 0:
+        if not row:
             return None
-        return (bb_up - bb_dn) / bb_mid
+        return _bb_width_from(*row)
     except Exception as e:
         _log(f'compute_bb_width error: {e}')
         return None
 
 
+def _bb_width_from(bb_up, bb_dn, bb_mid):
+    if bb_up is None or bb_dn is None or bb_mid is None:
+        return None
+    bb_up, bb_dn, bb_mid = float(bb_up), float(bb_dn), float(bb_mid)
+    if bb_mid == 0:
+        return None
+    return (bb_up - bb_dn) / bb_mid
+
+
 def compute_volume_z(cur, symbol='BTC/USDT:USDT', window=50):
     """Volume Z-score: (current_vol - mean) / stdev over `window` candles.
     Returns float or None."""
@@ -69,25 +87,22 @@ def compute_volume_z(cur, symbol='BTC/USDT:USDT', window=50):
             WHERE symbol = %s AND tf = '1m'
             ORDER BY ts DESC LIMIT %s
         """, (symbol, window + 1))
-        rows = cur.fetchall()
-        if not rows or len(rows) < 10:
-            return None
-        volumes = [float(r[0]) for r in rows if r[0] is not None]
-        if len(volumes) < 10:
-            return None
-        current = volumes[0]
-        hist = volumes[1:]
-        mean = sum(hist) / len(hist)
-        variance = sum((v - mean) ** 2 for v in hist) / len(hist)
-        stdev = math.sqrt(variance) if variance > 0 else 0
-        if stdev == 0:
-            return 0.0
-        return (current - mean) / stdev
+        return _volume_z_from([r[0] for r in cur.fetchall()])
     except Exception as e:
         _log(f'compute_volume_z error: {e}')
         return None
 
 
+def _volume_z_from(vols_desc):
+    if not vols_desc or len(vols_desc) < 10:
+        return None
+    volumes = [float(v) for v in vols_desc if v is not None]
+    if len(volumes) < 10:
+        return None
+    # DESC → ASC; z of the newest bar vs all older fetched bars
+    return il.zscore_last(volumes[::-1], len(volumes) - 1)
+
+
 def compute_impulse(cur, symbol='BTC/USDT:USDT'):
     """Impulse: abs(close - open) / ATR for latest candle.  Returns float or None."""
     try:
@@ -105,15 +120,18 @@ def compute_impulse(cur, symbol='BTC/USDT:USDT'):
             WHERE symbol = %s AND tf = '1m' ORDER BY ts DESC LIMIT 1
         """, (symbol,))
         atr_row = cur.fetchone()
-        if not atr_row or atr_row[0] is None or float(atr_row[0]) == 0:
-            return None
-
-        return abs(float(candle[1]) - float(candle[0])) / float(atr_row[0])
+        return _impulse_from(candle[0], candle[1], atr_row[0] if atr_row else None)
     except Exception as e:
         _log(f'compute_impulse error: {e}')
         return None
 
 
+def _impulse_from(o, c, atr):
+    if o is None or c is None or atr is None or float(atr) == 0:
+        return None
+    return abs(float(c) - float(o)) / float(atr)
+
+
 def compute_range_position(price, vah, val):
     """Position within value area: 0.0 (at VAL) to 1.0 (at VAH).
     Returns float or None if inputs invalid."""
@@ -134,24 +152,27 @@ def compute_drift_score(cur, symbol='BTC/USDT:USDT', lookback=10):
             WHERE symbol = %s
             ORDER BY ts DESC LIMIT %s
         """, (symbol, lookback))
-        rows = cur.fetchall()
-        if not rows or len(rows) < 3:
-            return (0.0, 'NONE')
-        pocs = [float(r[0]) for r in rows if r[0] is not None]
-        if len(pocs) < 3:
-            return (0.0, 'NONE')
-        # Compute linear drift: (newest - oldest) / oldest
-        newest, oldest = pocs[0], pocs[-1]
-        if oldest == 0:
-            return (0.0, 'NONE')
-        drift = (newest - oldest) / oldest
-        direction = 'UP' if drift > 0.0005 else ('DOWN' if drift < -0.0005 else 'NONE')
-        return (abs(drift), direction)
+        return _drift_from([r[0] for r in cur.fetchall()])
     except Exception as e:
         _log(f'compute_drift_score error: {e}')
         return (0.0, 'NONE')
 
 
+def _drift_from(pocs_desc):
+    if not pocs_desc or len(pocs_desc) < 3:
+        return (0.0, 'NONE')
+    pocs = [float(p) for p in pocs_desc if p is not None]
+    if len(pocs) < 3:
+        return (0.0, 'NONE')
+    # Compute linear drift: (newest - oldest) / oldest
+    newest, oldest = pocs[0], pocs[-1]
+    if oldest == 0:
+        return (0.0, 'NONE')
+    drift = (newest - oldest) / oldest
+    direction = 'UP' if drift > 0.0005 else ('DOWN' if drift < -0.0005 else 'NONE')
+    return (abs(drift), direction)
+
+
 def compute_poc_slope(cur, symbol='BTC/USDT:USDT', lookback=5):
     """POC slope: average per-step change / price over `lookback` entries.
     Returns float or None."""
@@ -161,70 +182,22 @@ def compute_poc_slope(cur, symbol='BTC/USDT:USDT', lookback=5):
             WHERE symbol = %s
             ORDER BY ts DESC LIMIT %s
         """, (symbol, lookback))
-        rows = cur.fetchall()
-        if not rows or len(rows) < 2:
-            return None
-        pocs = [float(r[0]) for r in rows if r[0] is not None]
-        if len(pocs) < 2 or pocs[-1] == 0:
-            return None
-        # Average step change as fraction of price
-        steps = [abs(pocs[i] - pocs[i + 1]) for i in range(len(pocs) - 1)]
-        avg_step = sum(steps) / len(steps)
-        return avg_step / pocs[-1]
+        return _poc_slope_from([r[0] for r in cur.fetchall()])
     except Exception as e:
         _log(f'compute_poc_slope error: {e}')
         return None
 
 
-def _get_current_price(cur, symbol='BTC/USDT:USDT'):
-    """Get current price from latest 1m candle close."""
-    try:
-        cur.execute("""
-            SELECT c FROM candles
-            WHERE symbol = %s AND tf = '1m'
-            ORDER BY ts DESC LIMIT 1
-        """, (symbol,))
-        row = cur.fetchone()
-        if row and row[0] is not None:
-            return float(row[0])
-    except Exception:
-        pass
-    return None
-
-
-def _get_adx(cur, symbol='BTC/USDT:USDT'):
-    """Get ADX from market_context_latest view."""
-    try:
-        cur.execute("""
-            SELECT adx_14 FROM market_context_latest
-            WHERE symbol = %s
-        """, (symbol,))
-        row = cur.fetchone()
-        if row and row[0] is not None:
-            return float(row[0])
-    except Exception:
-        pass
-    return None
-
-
-def _get_vol_profile(cur, symbol='BTC/USDT:USDT'):
-    """Get latest POC/VAH/VAL."""
-    try:
-        cur.execute("""
-            SELECT poc, vah, val FROM vol_profile
-            WHERE symbol = %s
-            ORDER BY ts DESC LIMIT 1
-        """, (symbol,))
-        row = cur.fetchone()
-        if row:
-            return {
-                'poc': float(row[0]) if row[0] is not None else None,
-                'vah': float(row[1]) if row[1] is not None else None,
-                'val': float(row[2]) if row[2] is not None else None,
-            }
-    except Exception:
-        pass
-    return {'poc': None, 'vah': None, 'val': None}
+def _poc_slope_from(pocs_desc):
+    if not pocs_desc or len(pocs_desc) < 2:
+        return None
+    pocs = [float(p) for p in pocs_desc if p is not None]
+    if len(pocs) < 2 or pocs[-1] == 0:
+        return None
+    # Average step change as fraction of price
+    steps = [abs(pocs[i] - pocs[i + 1]) for i in range(len(pocs) - 1)]
+    avg_step = sum(steps) / len(steps)
+    return avg_step / pocs[-1]
 
 
 def compute_vol_pct(cur, symbol='BTC/USDT:USDT', window=20):
@@ -236,26 +209,23 @@ def compute_vol_pct(cur, symbol='BTC/USDT:USDT', window=20):
             WHERE symbol = %s AND tf = '5m'
             ORDER BY ts DESC LIMIT %s
         """, (symbol, window + 1))
-        rows = cur.fetchall()
-        if not rows or len(rows) < 5:
-            return None
-        closes = [float(r[0]) for r in rows if r[0] is not None]
-        if len(closes) < 5:
-            return None
-        returns = []
-        for i in range(len(closes) - 1):
-            if closes[i + 1] > 0:
-                returns.append(math.log(closes[i] / closes[i + 1]))
-        if len(returns) < 3:
-            return None
-        mean_r = sum(returns) / len(returns)
-        variance = sum((r - mean_r) ** 2 for r in returns) / len(returns)
-        return math.sqrt(variance) * 100  # as percentage
+        return _vol_pct_from([r[0] for r in cur.fetchall()])
     except Exception as e:
         _log(f'compute_vol_pct error: {e}')
         return None
 
 
+def _vol_pct_from(closes_desc):
+    if not closes_desc or len(closes_desc) < 5:
+        return None
+    closes = [float(c) for c in closes_desc if c is not None]
+    if len(closes) < 5:
+        return None
+    if min(closes) <= 0:
+        return None
+    return il.logret_std(closes[::-1]) * 100  # as percentage
+
+
 def compute_trend_strength(adx):
     """ADX normalized to 0-1 (ADX/50 capped at 1.0). Returns float or None."""
     if adx is None:
@@ -273,29 +243,33 @@ def compute_range_quality(cur, symbol='BTC/USDT:USDT', lookback=10):
             WHERE symbol = %s
             ORDER BY ts DESC LIMIT %s
         """, (symbol, lookback))
-        rows = cur.fetchall()
-        if not rows or len(rows) < 3:
-            return None
-        widths = []
-        for r in rows:
-            if r[0] is not None and r[1] is not None:
-                vah, val = float(r[0]), float(r[1])
-                if val > 0:
-                    widths.append((vah - val) / val)
-        if len(widths) < 3:
-            return None
-        mean_w = sum(widths) / len(widths)
-        if mean_w == 0:
-            return 1.0
-        variance = sum((w - mean_w) ** 2 for w in widths) / len(widths)
-        cv = math.sqrt(variance) / mean_w if mean_w > 0 else 0
-        # Lower CV = more consistent = higher quality
-        return max(0.0, min(1.0, 1.0 - cv))
+        return _range_quality_from(cur.fetchall())
     except Exception as e:
         _log(f'compute_range_quality error: {e}')
         return None
 
 
+def _range_quality_from(va_rows):
+    """va_rows: [(vah, val), ...] newest first."""
+    if not va_rows or len(va_rows) < 3:
+        return None
+    widths = []
+    for r in va_rows:
+        if r[0] is not None and r[1] is not None:
+            vah, val = float(r[0]), float(r[1])
+            if val > 0:
+                widths.append((vah - val) / val)
+    if len(widths) < 3:
+        return None
+    mean_w = sum(widths) / len(widths)
+    if mean_w == 0:
+        return 1.0
+    variance = sum((w - mean_w) ** 2 for w in widths) / len(widths)
+    cv = math.sqrt(variance) / mean_w if mean_w > 0 else 0
+    # Lower CV = more consistent = higher quality
+    return max(0.0, min(1.0, 1.0 - cv))
+
+
 def compute_atr_ratio(cur, symbol='BTC/USDT:USDT', window=20):
     """ATR expansion ratio: current ATR / SMA of recent ATR values.
     Returns float (>1.0 = expanding) or None.  FAIL-OPEN."""
@@ -305,23 +279,26 @@ def compute_atr_ratio(cur, symbol='BTC/USDT:USDT', window=20):
             WHERE symbol = %s AND tf = '1m'
             ORDER BY ts DESC LIMIT %s
         """, (symbol, window + 1))
-        rows = cur.fetchall()
-        if not rows or len(rows) < 5:
-            return None
-        atrs = [float(r[0]) for r in rows if r[0] is not None]
-        if len(atrs) < 5:
-            return None
-        current = atrs[0]
-        hist = atrs[1:]
-        mean_atr = sum(hist) / len(hist)
-        if mean_atr <= 0:
-            return None
-        return current / mean_atr
+        return _atr_ratio_from([r[0] for r in cur.fetchall()])
     except Exception as e:
         _log(f'compute_atr_ratio error: {e}')
         return None
 
 
+def _atr_ratio_from(atrs_desc):
+    if not atrs_desc or len(atrs_desc) < 5:
+        return None
+    atrs = [float(a) for a in atrs_desc if a is not None]
+    if len(atrs) < 5:
+        return None
+    current = atrs[0]
+    hist = atrs[1:]
+    mean_atr = sum(hist) / len(hist)
+    if mean_atr <= 0:
+        return None
+    return current / mean_atr
+
+
 def compute_structure_breakout(cur, vah, val, atr_val, price, symbol='BTC/USDT:USDT',
                                n=3, m=2, k_dist=0.25, pct_dist=0.0015):
     """Structure breakout check: M of N recent candle closes outside VA ± min_dist.
@@ -335,18 +312,32 @@ def compute_structure_breakout(cur, vah, val, atr_val, price, symbol='BTC/USDT:U
         if vah <= val or atr_val <= 0:
             return (False, None, {})
 
-        min_dist = max(atr_val * k_dist, price * pct_dist)
-
         cur.execute("""
             SELECT c FROM candles
             WHERE symbol = %s AND tf = '1m'
             ORDER BY ts DESC LIMIT %s
         """, (symbol, n))
-        rows = cur.fetchall()
-        if not rows or len(rows) < n:
+        return _structure_breakout_from([r[0] for r in cur.fetchall()],
+                                        vah, val, atr_val, price, n, m, k_dist, pct_dist)
+    except Exception as e:
+        _log(f'compute_structure_breakout error: {e}')
+        return (False, None, {})
+
+
+def _structure_breakout_from(closes_desc, vah, val, atr_val, price,
+                             n=3, m=2, k_dist=0.25, pct_dist=0.0015):
+    try:
+        if vah is None or val is None or atr_val is None or price is None:
+            return (False, None, {})
+        if vah <= val or atr_val <= 0:
+            return (False, None, {})
+
+        min_dist = max(atr_val * k_dist, price * pct_dist)
+
+        if not closes_desc or len(closes_desc) < n:
             return (False, None, {})
 
-        closes = [float(r[0]) for r in rows if r[0] is not None]
+        closes = [float(c) for c in closes_desc[:n] if c is not None]
         if len(closes) < n:
             return (False, None, {})
 
@@ -381,17 +372,23 @@ def compute_spread_ok(cur, symbol='BTC/USDT:USDT', max_spread_pct=0.05):
             ORDER BY ts DESC LIMIT 1
         """, (symbol,))
         row = cur.fetchone()
-        if not row or row[0] is None or row[1] is None:
+        if not row:
             return True  # FAIL-OPEN
-        bid, ask = float(row[0]), float(row[1])
-        if bid <= 0:
-            return True
-        spread_pct = ((ask - bid) / bid) * 100
-        return spread_pct < max_spread_pct
+        return _spread_ok_from(row[0], row[1], max_spread_pct)
     except Exception:
         return True  # FAIL-OPEN
 
 
+def _spread_ok_from(bid, ask, max_spread_pct=0.05):
+    if bid is None or ask is None:
+        return True  # FAIL-OPEN
+    bid, ask = float(bid), float(ask)
+    if bid <= 0:
+        return True
+    spread_pct = ((ask - bid) / bid) * 100
+    return spread_pct < max_spread_pct
+
+
 def compute_liquidity_ok(cur, symbol='BTC/USDT:USDT', window=50, min_ratio=0.2):
     """Check if current volume >= min_ratio of median last `window` bars.
     FAIL-OPEN: returns True if data unavailable."""
@@ -401,10 +398,16 @@ def compute_liquidity_ok(cur, symbol='BTC/USDT:USDT', window=50, min_ratio=0.2):
             WHERE symbol = %s AND tf = '1m'
             ORDER BY ts DESC LIMIT %s
         """, (symbol, window + 1))
-        rows = cur.fetchall()
-        if not rows or len(rows) < 10:
+        return _liquidity_ok_from([r[0] for r in cur.fetchall()], min_ratio)
+    except Exception:
+        return True  # FAIL-OPEN
+
+
+def _liquidity_ok_from(vols_desc, min_ratio=0.2):
+    try:
+        if not vols_desc or len(vols_desc) < 10:
             return True  # FAIL-OPEN
-        volumes = [float(r[0]) for r in rows if r[0] is not None]
+        volumes = [float(v) for v in vols_desc if v is not None]
         if len(volumes) < 10:
             return True
         # Use previous COMPLETE candle (volumes[1]) to avoid incomplete current candle bias
@@ -418,17 +421,33 @@ def compute_liquidity_ok(cur, symbol='BTC/USDT:USDT', window=50, min_ratio=0.2):
         return True  # FAIL-OPEN
 
 
-def build_feature_snapshot(cur, symbol='BTC/USDT:USDT'):
+def build_feature_snapshot(cur, symbol='BTC/USDT:USDT', state=None):
     """Build complete feature snapshot for regime routing.
 
+    state: market_state.MarketState for this cycle; loaded from `cur` if
+    not given.
+
     Returns dict with all features. Missing features are None.
     Never raises — returns partial snapshot on error.
     """
-    vp = _get_vol_profile(cur, symbol)
-    price = _get_current_price(cur, symbol)
-    drift_score, drift_dir = compute_drift_score(cur, symbol)
-    adx = _get_adx(cur, symbol)
-    atr_pct = compute_atr_pct(cur, symbol)
+    if state is None:
+        state = load_market_state(cur, symbol)
+    return features_from_state(state)
+
+
+def features_from_state(state):
+    """Feature snapshot computed from a MarketState only (no DB access)."""
+    candles = state.candles
+    closes = [b[4] for b in candles]
+    volumes = [b[5] for b in candles]
+    vp_rows = state.vol_profile
+    vp = dict(zip(('poc', 'vah', 'val'), vp_rows[0])) if vp_rows else \
+        {'poc': None, 'vah': None, 'val': None}
+    price = state.price
+    adx = state.market_context.get('adx_14')
+    adx = float(adx) if adx is not None else None
+    ind = state.indicator
+    atr_pct = _atr_pct_from(ind.get('atr_14'), price)
 
     # Structure breakout computation (reuse already-fetched vah/val/atr/price)
     atr_val = (atr_pct * price) if (atr_pct is not None and price is not None) else None
@@ -441,17 +460,19 @@ def build_feature_snapshot(cur, symbol='BTC/USDT:USDT'):
     except Exception:
         sb_n, sb_m, sb_k, sb_pct = 3, 2, 0.25, 0.0015
 
-    struct_pass, struct_dir, _struct_detail = compute_structure_breakout(
-        cur, vp['vah'], vp['val'], atr_val, price, symbol,
+    struct_pass, struct_dir, _struct_detail = _structure_breakout_from(
+        closes, vp['vah'], vp['val'], atr_val, price,
         n=sb_n, m=sb_m, k_dist=sb_k, pct_dist=sb_pct)
+    drift_score, drift_dir = _drift_from([r[0] for r in vp_rows])
 
     return {
-        'symbol': symbol,
+        'symbol': state.symbol,
         'price': price,
         'atr_pct': atr_pct,
-        'bb_width': compute_bb_width(cur, symbol),
-        'volume_z': compute_volume_z(cur, symbol),
-        'impulse': compute_impulse(cur, symbol),
+        'bb_width': _bb_width_from(ind.get('bb_up'), ind.get('bb_dn'), ind.get('bb_mid')),
+        'volume_z': _volume_z_from(volumes),
+        'impulse': _impulse_from(candles[0][1], candles[0][4], ind.get('atr_14'))
+        if candles else None,
         'adx': adx,
         'poc': vp['poc'],
         'vah': vp['vah'],
@@ -459,15 +480,15 @@ def build_feature_snapshot(cur, symbol='BTC/USDT:USDT'):
         'range_position': compute_range_position(price, vp['vah'], vp['val']),
         'drift_score': drift_score,
         'drift_direction': drift_dir,
-        'poc_slope': compute_poc_slope(cur, symbol),
+        'poc_slope': _poc_slope_from([r[0] for r in vp_rows[:5]]),
         # New mctx fields (Step 9)
-        'vol_pct': compute_vol_pct(cur, symbol),
+        'vol_pct': _vol_pct_from(list(state.closes_5m)),
         'trend_strength': compute_trend_strength(adx),
-        'range_quality': compute_range_quality(cur, symbol),
-        'spread_ok': compute_spread_ok(cur, symbol),
-        'liquidity_ok': compute_liquidity_ok(cur, symbol),
+        'range_quality': _range_quality_from([(r[1], r[2]) for r in vp_rows]),
+        'spread_ok': _spread_ok_from(state.bid, state.ask),
+        'liquidity_ok': _liquidity_ok_from(volumes),
         # Strict breakout fields
-        'atr_ratio': compute_atr_ratio(cur, symbol),
+        'atr_ratio': _atr_ratio_from([r.get('atr_14') for r in state.indicators]),
         'structure_breakout_pass': struct_pass,
         'structure_breakout_dir': struct_dir,
     }
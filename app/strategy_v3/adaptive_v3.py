@@ -12,6 +12,7 @@ State persistence: DB (adaptive_layer_state) + JSON fallback.
 FAIL-OPEN: any error → no penalty, no block.
 """
 
+import copy
 import json
 import os
 import time
@@ -34,6 +35,13 @@ _state = {
     'wr_recovery_consecutive': 0,  # 연속 개선 카운트
     'last_wr_sample': 0.0,         # 직전 WR 값
 }
+_INITIAL_STATE = copy.deepcopy(_state)
+
+
+def reset_state():
+    """Reset in-memory layer state (for testing / replay)."""
+    _state.clear()
+    _state.update(copy.deepcopy(_INITIAL_STATE))
 
 
 def _log(msg):
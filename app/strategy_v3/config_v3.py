@@ -2,19 +2,18 @@
 strategy_v3.config_v3 — V3 parameter loader with defaults.
 
 All V3 parameters live in config/strategy_modes.yaml → strategy_v3 section.
-This module provides fallback defaults and a typed getter.
+This module provides fallback defaults and a typed getter. File edits are
+picked up via config_store's mtime watch (no reload() needed).
 """
 
-import os
 import threading
-import yaml
+import config_store
 
 LOG_PREFIX = '[config_v3]'
 
 _config_cache = None
 _config_lock = threading.Lock()
-_CONFIG_PATH = os.path.join(os.path.dirname(os.path.dirname(__file__)),
-                            'config', 'strategy_modes.yaml')
+_CONFIG_PATH = config_store.STRATEGY_MODES_PATH
 
 # ── Default values (fallback when YAML key is missing) ──
 
@@ -138,17 +137,19 @@ def _log(msg):
 
 
 def _load_v3_section():
-    """Load strategy_v3 section from YAML. Returns dict (empty on error)."""
+    """strategy_v3 section from YAML as a read-only mapping (empty on error)."""
     global _config_cache
+    try:
+        _file().check()
+    except Exception as e:
+        _log(f'check FAIL-OPEN: {e}')
     if _config_cache is not None:
         return _config_cache
     with _config_lock:
         if _config_cache is not None:
             return _config_cache
         try:
-            with open(_CONFIG_PATH, 'r') as f:
-                full = yaml.safe_load(f) or {}
-            _config_cache = full.get('strategy_v3', {})
+            _config_cache = _file().section('strategy_v3')
             return _config_cache
         except Exception as e:
             _log(f'load FAIL-OPEN: {e}')
@@ -156,6 +157,12 @@ def _load_v3_section():
             return _config_cache
 
 
+def _file():
+    f = config_store.yaml_file(_CONFIG_PATH)
+    f.on_change(reload)
+    return f
+
+
 def reload():
     """Force-reload config (for hot reload / testing)."""
     global _config_cache
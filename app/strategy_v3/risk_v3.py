@@ -177,15 +177,9 @@ def compute_risk_v11(features, v3_regime, equity, mtf_data=None):
     """
     try:
         # Load unified_v11 from top-level YAML (not strategy_v3 section)
-        import yaml, os
-        _yaml_path = os.path.join(os.path.dirname(os.path.dirname(__file__)),
-                                  'config', 'strategy_modes.yaml')
         try:
-            with open(_yaml_path, 'r') as _f:
-                _full_cfg = yaml.safe_load(_f) or {}
-            v11 = _full_cfg.get('unified_v11', {})
-            if not isinstance(v11, dict):
-                v11 = {}
+            import config_store
+            v11 = config_store.strategy_modes().section('unified_v11')
         except Exception:
             v11 = {}
 
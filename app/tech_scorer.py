@@ -13,6 +13,9 @@ Components (weighted to sum ~100 max per side):
   - Volume spike:                 +/-5   (Amplifier)
   - Momentum (5-min):             +/-5   (Secondary)
   - Structure (MA-50 vs MA-200):  +/-5   (Secondary)
+
+compute(cur, state=MarketState) scores from the per-cycle snapshot
+(market_state.py) without touching the DB.
 """
 import os
 import sys
@@ -36,7 +39,11 @@ def _fetch_latest_indicator(cur=None):
         WHERE symbol = %s AND tf = '1m'
         ORDER BY ts DESC LIMIT 1;
     """, (SYMBOL,))
-    row = cur.fetchone()
+    return _parse_indicator(cur.fetchone())
+
+
+def _parse_indicator(row=None):
+    '''Indicator row (column order of _fetch_latest_indicator) → dict.'''
     if not row:
         return None
     return {
@@ -235,9 +242,22 @@ def _score_cloud_position(ind=None, price=None):
     return 0
 
 
-def compute(cur=None):
+def _inputs_from_state(state):
+    '''(indicator dict, price, last 5 closes oldest first) from a MarketState.'''
+    from market_state import INDICATOR_COLS
+    ind = state.indicator
+    ind = _parse_indicator(tuple(ind[c] for c in INDICATOR_COLS)) if ind else None
+    price = state.price or None
+    closes = [b[4] for b in state.candles[:5] if b[4]][::-1]
+    return ind, price, closes
+
+
+def compute(cur=None, state=None):
     '''Compute technical score (scalp-optimized v2).
 
+    state: market_state.MarketState for this cycle (no queries); without
+    it the latest rows are read from `cur`.
+
     Returns:
         {
             "score": int (-100 to +100),
@@ -256,7 +276,10 @@ def compute(cur=None):
             "indicators": dict,
         }
     '''
-    ind = _fetch_latest_indicator(cur)
+    if state is not None:
+        ind, price, closes = _inputs_from_state(state)
+    else:
+        ind = _fetch_latest_indicator(cur)
     if not ind:
         return {
             'score': 0,
@@ -265,8 +288,9 @@ def compute(cur=None):
             'indicators': {},
             'error': 'no indicator data'}
 
-    price = _fetch_latest_price(cur)
-    closes = _fetch_recent_closes(cur, 5)
+    if state is None:
+        price = _fetch_latest_price(cur)
+        closes = _fetch_recent_closes(cur, 5)
 
     ema_c = _score_ema_cross(ind)
     vwap_s = _score_vwap(ind, price)
@@ -1003,6 +1003,8 @@ def _get_exchange():
         'timeout': 20000,
         'options': {'defaultType': 'swap'},
     })
+    import exchange_state
+    exchange_state.track(_exchange_cache)
     return _exchange_cache
 
 
@@ -1450,7 +1452,7 @@ def _ai_strategy_advisory(text: str, call_type: str = 'AUTO') -> tuple:
     """Engine-first strategy pipeline: Score → Engine final → Claude risk advice.
     Engine determines final action. Claude provides risk parameters only. Returns (text, provider)."""
     no_fallback = call_type in ('USER', 'EMERGENCY')
-    import score_engine
+    import score_publisher
     import claude_api
 
     conn = None
@@ -1468,7 +1470,7 @@ def _ai_strategy_advisory(text: str, call_type: str = 'AUTO') -> tuple:
                 return (f'⚠️ 실시간 데이터 불가 — 전략 중단\n{e}', 'error')
 
             # Phase 1: Score + position + context + news (Claude input)
-            scores = score_engine.compute_total(cur=cur)
+            scores = score_publisher.get_score(cur=cur, source='telegram')
             pos_state = _fetch_position_state(cur)
             strategy_ctx = _fetch_strategy_context(cur)
             news_items = _fetch_news_summary(cur)
@@ -2206,6 +2208,10 @@ _DEBUG_SUBCMDS = {
     # Unified Engine v1.1 debug commands
     'order_safety': 'debug_order_safety',
     'perf_6h': 'debug_perf_6h',
+    'perf': 'debug_perf',
+    'guards': 'debug_guards',
+    'api_budget': 'debug_api_budget',
+    'order_latency': 'debug_order_latency',
     'mtf': 'debug_mtf',
 }
 
@@ -2243,6 +2249,10 @@ _DEBUG_HELP = (
     '  /debug order_safety — 주문 안전 상태 (서버스탑/고아주문)\n'
     '  /debug perf_6h — 6시간 성과 요약\n'
     '  /debug mtf — MTF 방향 상태\n'
+    '  /debug perf — 데몬 사이클 span 지연 p50/p95/p99 (15분)\n'
+    '  /debug guards — autopilot 가드별 차단 횟수/지연 (1시간)\n'
+    '  /debug api_budget — 서비스별 Bybit REST 호출량 (60초) + 거래소 상태 슬롯\n'
+    '  /debug order_latency — 주문 단계별 지연 p50/p90/p99 (생성→클레임→검증→전송→응답, 24시간)\n'
     '  /debug on|off — 디버그 모드 토글\n'
     '\n'
     '  aliases: reaction, coverage, backfill, dryrun, gate,\n'
@@ -2409,7 +2419,7 @@ def _format_command_result(action, eq_id, parsed, pos, scores):
 
 def _execute_trade_command(parsed, text):
     """Execute trade COMMAND intent. Returns response string."""
-    import score_engine
+    import score_publisher
 
     intent = parsed.get('intent')
     test_mode = parsed.get('test_mode', False)
@@ -2437,7 +2447,7 @@ def _execute_trade_command(parsed, text):
 
             # 3. Position + scores
             pos = _fetch_position_state(cur)
-            scores = score_engine.compute_total(cur=cur)
+            scores = score_publisher.get_score(cur=cur, source='telegram')
 
             # 4. Map intent to action
             action_map = {
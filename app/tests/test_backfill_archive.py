@@ -0,0 +1,92 @@
+"""
+tests/test_backfill_archive.py — Local archive discovery and streaming (no DB).
+
+Covers:
+  1. --dir / --file discovery: tf + month from Binance file names
+  2. ZIP member is streamed (dryrun count), header line skipped
+  3. Missing download → task skipped, not failed
+  4. Month range generation
+"""
+
+import sys
+import os
+import shutil
+import zipfile
+import tempfile
+import unittest
+from unittest.mock import patch
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+import backfill_archive as ba
+
+HEADER = ('open_time,open,high,low,close,volume,close_time,quote_volume,count,'
+          'taker_buy_volume,taker_buy_quote_volume,ignore\n')
+
+
+def _csv_lines(n, t0=1704067200000):
+    return ''.join(f'{t0 + i * 60000},42000.1,42010.0,41990.5,42005.2,12.5,'
+                   f'{t0 + i * 60000 + 59999},525000.0,100,6.1,256000.0,0\n'
+                   for i in range(n))
+
+
+class TestBackfillArchive(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.tmp)
+
+    def _zip(self, name, body):
+        path = os.path.join(self.tmp, name)
+        with zipfile.ZipFile(path, 'w', zipfile.ZIP_DEFLATED) as zf:
+            zf.writestr(name.replace('.zip', '.csv'), body)
+        return path
+
+    # ── Test 1: discovery ──
+    def test_local_tasks_from_dir(self):
+        self._zip('BTCUSDT-1m-2024-02.zip', _csv_lines(3))
+        self._zip('BTCUSDT-5m-2024-01.zip', _csv_lines(3))
+        with open(os.path.join(self.tmp, 'notes.txt'), 'w') as f:
+            f.write('x')
+        tasks = ba.local_tasks([self.tmp], '1m')
+        self.assertEqual([(t['kind'], t['tf'], t['label']) for t in tasks],
+                         [('zip', '1m', '2024-02'), ('zip', '5m', '2024-01')])
+
+        other = os.path.join(self.tmp, 'dump.csv')
+        with open(other, 'w') as f:
+            f.write(_csv_lines(2))
+        t = ba.local_tasks([other], '15m')[0]
+        self.assertEqual((t['kind'], t['tf'], t['label']), ('csv', '15m', 'dump.csv'))
+
+    # ── Test 2: streaming count ──
+    def test_dryrun_streams_zip_and_csv(self):
+        path = self._zip('BTCUSDT-1m-2025-01.zip', HEADER + _csv_lines(1440))
+        res = ba._import_task(ba.local_tasks([path], '1m', dryrun=True)[0])
+        self.assertIsNone(res['error'])
+        self.assertEqual(res['rows'], 1440)
+
+        csv_path = os.path.join(self.tmp, 'BTCUSDT-1m-2024-03.csv')
+        with open(csv_path, 'w') as f:
+            f.write(_csv_lines(7))
+        res = ba._import_task(ba.local_tasks([csv_path], '1m', dryrun=True)[0])
+        self.assertEqual(res['rows'], 7)
+
+    # ── Test 3: missing month ──
+    def test_missing_download_is_skipped(self):
+        task = {'kind': 'url', 'tf': '1m', 'label': '2019-01', 'path': None, 'dryrun': True}
+        with patch.object(ba, '_download_zip', return_value=None):
+            res = ba._import_task(task)
+        self.assertTrue(res['skipped'])
+        self.assertIsNone(res['error'])
+
+    # ── Test 4: months ──
+    def test_generate_months(self):
+        self.assertEqual(list(ba._generate_months('2024-11', '2025-02')),
+                         ['2024-11', '2024-12', '2025-01', '2025-02'])
+        self.assertEqual(list(ba._generate_months('2024-01-15', '2024-01')), ['2024-01'])
+
+
+if __name__ == '__main__':
+    unittest.main()
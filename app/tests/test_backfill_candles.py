@@ -0,0 +1,220 @@
+"""
+tests/test_backfill_candles.py — Concurrent kline fetch against a local HTTP stand-in.
+
+_KlineServer serves /v5/market/kline (start/end/limit, newest first) from
+recorded 1m bars, with per-request latency that makes windows finish out
+of order and injectable HTTP 429 / retCode 10006 rate-limit replies.
+backfill_utils.BYBIT_BASE_URL is pointed at it.
+
+Covers:
+  1. TokenBucket paces requests to the configured rate
+  2. Watermark only advances over contiguous completed windows
+  3. Concurrent fetch: every recorded bar returned once, in-flight bounded,
+     rate-limited requests retried
+  4. Closing the fetch early (stop signal) stops new requests
+  5. Window that keeps failing is reported, not dropped
+"""
+
+import sys
+import os
+import json
+import time
+import random
+import threading
+import unittest
+import urllib.parse
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from unittest.mock import patch
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+import backfill_utils
+import backfill_candles as bc
+from backfill_utils import TokenBucket
+
+T0 = 1772323200000          # 2026-03-01 00:00 UTC
+STEP = 60_000
+
+
+def _record(n, seed=5):
+    rng = random.Random(seed)
+    price = 90000.0
+    bars = []
+    for i in range(n):
+        c = round(price + rng.gauss(0, 20), 1)
+        bars.append([T0 + i * STEP, price, max(price, c) + 1.0, min(price, c) - 1.0,
+                     c, round(abs(rng.gauss(30, 5)), 3)])
+        price = c
+    return bars
+
+
+class _KlineServer:
+    """Threaded HTTP stand-in for Bybit's public kline endpoint."""
+
+    def __init__(self, bars, delay_fn=None, fail=None):
+        self.bars = bars
+        self.delay_fn = delay_fn or (lambda start: 0)
+        self.fail = dict(fail or {})      # start_ms → ['429' | '10006', ...]
+        self.requests = []
+        self.in_flight = 0
+        self.max_in_flight = 0
+        self._lock = threading.Lock()
+        srv = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def log_message(self, *a):
+                pass
+
+            def do_GET(self):
+                srv._handle(self)
+
+        self.httpd = ThreadingHTTPServer(('127.0.0.1', 0), Handler)
+        self.url = f'http://127.0.0.1:{self.httpd.server_address[1]}'
+        threading.Thread(target=self.httpd.serve_forever, daemon=True).start()
+
+    def _reply(self, h, code, body):
+        data = json.dumps(body).encode()
+        h.send_response(code)
+        h.send_header('Content-Type', 'application/json')
+        h.send_header('Content-Length', str(len(data)))
+        h.end_headers()
+        h.wfile.write(data)
+
+    def _handle(self, h):
+        q = dict(urllib.parse.parse_qsl(urllib.parse.urlparse(h.path).query))
+        start = int(q['start'])
+        end = int(q.get('end', 2 ** 62))
+        with self._lock:
+            self.requests.append(start)
+            self.in_flight += 1
+            self.max_in_flight = max(self.max_in_flight, self.in_flight)
+            fails = self.fail.get(start)
+            mode = fails.pop(0) if fails else None
+        try:
+            time.sleep(self.delay_fn(start))
+            if mode == '429':
+                return self._reply(h, 429, {'retCode': 10006, 'retMsg': 'Too many visits!'})
+            if mode == '10006':
+                return self._reply(h, 200, {'retCode': 10006, 'retMsg': 'Too many visits!',
+                                            'result': {}})
+            rows = [b for b in self.bars if start <= b[0] <= end][:int(q['limit'])]
+            self._reply(h, 200, {'retCode': 0, 'retMsg': 'OK', 'result': {
+                'symbol': q['symbol'], 'category': q['category'],
+                'list': [[str(x) for x in b] + ['0'] for b in reversed(rows)]}})
+        finally:
+            with self._lock:
+                self.in_flight -= 1
+
+    def close(self):
+        self.httpd.shutdown()
+        self.httpd.server_close()
+
+
+class TestBackfillCandles(unittest.TestCase):
+
+    def _serve(self, *args, **kw):
+        srv = _KlineServer(*args, **kw)
+        self.addCleanup(srv.close)
+        p = patch.object(backfill_utils, 'BYBIT_BASE_URL', srv.url)
+        p.start()
+        self.addCleanup(p.stop)
+        return srv
+
+    # ── Test 1: token bucket ──
+    def test_token_bucket_paces(self):
+        bucket = TokenBucket(40, capacity=2)
+        t0 = time.monotonic()
+        for _ in range(12):                  # 2 burst + 10 paced at 40/s
+            bucket.acquire()
+        self.assertGreaterEqual(time.monotonic() - t0, 0.23)
+
+        stamps = []
+        bucket = TokenBucket(50, capacity=1)
+        threads = [threading.Thread(target=lambda: (bucket.acquire(),
+                                                    stamps.append(time.monotonic())))
+                   for _ in range(6)]
+        t0 = time.monotonic()
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+        self.assertGreaterEqual(max(stamps) - t0, 0.09)
+
+    # ── Test 2: watermark ──
+    def test_watermark_out_of_order(self):
+        windows = bc.plan_windows(0, 4500, window_ms=1000)
+        self.assertEqual(windows, [(0, 1000), (1000, 2000), (2000, 3000),
+                                   (3000, 4000), (4000, 4500)])
+        wm = bc.Watermark(windows)
+        self.assertEqual(wm.since_ms, 0)
+        self.assertEqual(wm.complete(2000), 0)
+        self.assertEqual(wm.complete(1000), 0)
+        self.assertEqual(wm.ahead, 2)
+        self.assertEqual(wm.complete(0), 3000)
+        self.assertEqual(wm.ahead, 0)
+        self.assertEqual(wm.complete(4000), 3000)
+        self.assertEqual(wm.complete(3000), 4500)
+        self.assertIsNone(bc.Watermark([]).since_ms)
+
+    # ── Test 3: concurrent fetch ──
+    def test_concurrent_fetch_matches_recorded(self):
+        recorded = _record(5500)
+        windows = bc.plan_windows(T0, T0 + 5500 * STEP)
+        # Earlier windows answer slower → completion order differs from plan
+        delays = {ws: 0.02 * (len(windows) - i) for i, (ws, _) in enumerate(windows)}
+        srv = self._serve(recorded, delay_fn=lambda s: delays.get(s, 0),
+                          fail={windows[1][0]: ['429'], windows[3][0]: ['10006']})
+
+        got, order = {}, []
+        wm = bc.Watermark(windows)
+        for res in bc.fetch_windows(windows, TokenBucket(200, capacity=3),
+                                    concurrency=3, backoff=0.01):
+            self.assertIsNone(res['error'])
+            order.append(res['start'])
+            for b in res['bars']:
+                self.assertNotIn(b[0], got)
+                got[b[0]] = b
+            wm.complete(res['start'])
+
+        self.assertEqual([got[t] for t in sorted(got)], recorded)
+        self.assertNotEqual(order, [ws for ws, _ in windows])
+        self.assertEqual(wm.since_ms, windows[-1][1])
+        self.assertLessEqual(srv.max_in_flight, 3)
+        self.assertEqual(len(srv.requests), len(windows) + 2)
+
+    # ── Test 4: early stop ──
+    def test_close_stops_new_requests(self):
+        recorded = _record(20 * 1000)
+        windows = bc.plan_windows(T0, T0 + len(recorded) * STEP)
+        srv = self._serve(recorded, delay_fn=lambda s: 0.01)
+        wm = bc.Watermark(windows)
+        gen = bc.fetch_windows(windows, TokenBucket(500, capacity=2), concurrency=2)
+        for n, res in enumerate(gen):
+            wm.complete(res['start'])
+            if n == 2:
+                break
+        gen.close()
+        seen = len(srv.requests)
+        time.sleep(0.1)
+        self.assertEqual(len(srv.requests), seen)
+        self.assertLess(seen, len(windows))
+        self.assertLessEqual(wm.since_ms, windows[3][0])
+
+    # ── Test 5: persistent failure ──
+    def test_window_failure_reported(self):
+        recorded = _record(3000)
+        windows = bc.plan_windows(T0, T0 + 3000 * STEP)
+        self._serve(recorded, fail={windows[1][0]: ['429'] * 10})
+        results = {r['start']: r for r in bc.fetch_windows(
+            windows, TokenBucket(500), concurrency=3, retries=2, backoff=0.01)}
+        self.assertEqual(results[windows[1][0]]['attempts'], 3)
+        self.assertIn('HTTPError', results[windows[1][0]]['error'])
+        wm = bc.Watermark(windows)
+        for ws, r in results.items():
+            if not r['error']:
+                wm.complete(ws)
+        self.assertEqual(wm.since_ms, windows[1][0])
+
+
+if __name__ == '__main__':
+    unittest.main()
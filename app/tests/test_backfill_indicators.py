@@ -0,0 +1,136 @@
+"""
+tests/test_backfill_indicators.py — Batch indicator backfill vs the live definitions.
+
+Covers:
+  1. indicator_frame row i == latest_indicators(rows[:i+1]) (incl. VWAP reset)
+  2. Chunked backfill (warmup per chunk) == one pass over the whole range
+  3. Archive start: nothing before the MIN_BARS-th bar
+  4. mtf_history == MtfResampler.values() right after every 15m close
+  5. day_chunks alignment + out-of-order watermark
+"""
+
+import sys
+import os
+import math
+import random
+import unittest
+from bisect import bisect_left
+from datetime import datetime, timedelta, timezone
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+import indicator_lib as il
+from mtf_resampler import MtfResampler
+from backfill_indicators import (
+    indicator_rows, mtf_rows, day_chunks, _watermark,
+    IND_COLS, MTF_COLS, WARMUP_BARS, MIN_BARS,
+)
+
+SYM = 'BTC/USDT:USDT'
+
+
+def _make_rows(n, start=None, seed=11):
+    rng = random.Random(seed)
+    ts = start or datetime(2026, 3, 1, 0, 0, tzinfo=timezone.utc)
+    price = 100000.0
+    rows = []
+    for _ in range(n):
+        o = price
+        c = o + rng.gauss(0, 40)
+        h = max(o, c) + abs(rng.gauss(0, 15))
+        l = min(o, c) - abs(rng.gauss(0, 15))
+        rows.append((ts, o, h, l, c, abs(rng.gauss(50, 20))))
+        price = c
+        ts += timedelta(minutes=1)
+    return rows
+
+
+class TestBackfillIndicators(unittest.TestCase):
+
+    def assertClose(self, got, want, rel=1e-9, msg=''):
+        if want is None:
+            self.assertIsNone(got, msg)
+        else:
+            self.assertIsNotNone(got, msg)
+            self.assertAlmostEqual(got, want, delta=max(abs(want), 1.0) * rel, msg=msg)
+
+    # ── Test 1: frame vs latest ──
+    def test_frame_matches_latest(self):
+        rows = _make_rows(400, start=datetime(2026, 3, 1, 22, 0, tzinfo=timezone.utc))
+        ts, cols = il.indicator_frame(rows)
+        self.assertEqual(ts, [r[0] for r in rows])
+        for i in (0, 1, 8, 19, 51, 120, 199, 200, 239, 240, 399):
+            want = il.latest_indicators(rows[:i + 1])
+            for k in IND_COLS:
+                got = cols[k][i]
+                if k == 'vol_spike':
+                    self.assertEqual(bool(got), want[k], f'{k} i={i}')
+                else:
+                    got = None if math.isnan(got) else float(got)
+                    self.assertClose(got, want[k], msg=f'{k} i={i}')
+
+    # ── Test 2: chunked == single pass ──
+    def test_chunked_matches_single_pass(self):
+        rows = _make_rows(3 * 1440 + 500)
+        ts = [r[0] for r in rows]
+        full = {r[2]: r for r in indicator_rows(SYM, '1m', rows, ts[0])}
+        chunked = {}
+        for cs, ce in day_chunks(ts[0], ts[-1] + timedelta(minutes=1), 1):
+            lo, hi = bisect_left(ts, cs), bisect_left(ts, ce)
+            part = rows[max(0, lo - WARMUP_BARS):hi]
+            for r in indicator_rows(SYM, '1m', part, cs):
+                self.assertNotIn(r[2], chunked)
+                chunked[r[2]] = r
+        self.assertEqual(sorted(chunked), sorted(full))
+        for t, r in chunked.items():
+            for j, k in enumerate(IND_COLS):
+                # EMA seeds differ by chunk; the seed weight has decayed by now
+                self.assertClose(r[3 + j], full[t][3 + j], rel=1e-6, msg=f'{k} {t}')
+
+    # ── Test 3: archive start ──
+    def test_archive_start_skips_short_history(self):
+        rows = _make_rows(300)
+        out = indicator_rows(SYM, '1m', rows, rows[0][0])
+        self.assertEqual(out[0][2], rows[MIN_BARS - 1][0])
+        self.assertEqual(len(out), 300 - (MIN_BARS - 1))
+        self.assertEqual(indicator_rows(SYM, '1m', [], rows[0][0]), [])
+
+    # ── Test 4: MTF batch vs streaming ──
+    def test_mtf_history_matches_streaming(self):
+        rows = _make_rows(60 * 80 + 30, start=datetime(2026, 3, 1, 0, 0, tzinfo=timezone.utc))
+        mtf = MtfResampler()
+        expected = {}
+        for r in rows:
+            for tf, bar in mtf.update_1m(*r):
+                if tf == '15m':
+                    expected[bar[0] + timedelta(minutes=15)] = mtf.values()
+        b15 = list(mtf.series['15m'].closed)
+        b1h = list(mtf.series['1h'].closed)
+        start, end = rows[0][0], rows[-1][0] + timedelta(minutes=1)
+        got = mtf_rows(SYM, b15, b1h, start, end)
+        self.assertTrue(got)
+        # Rows only once 20 1h bars have closed
+        self.assertEqual(got[0][1], datetime(2026, 3, 1, 20, 0, tzinfo=timezone.utc))
+        for r in got:
+            want = expected[r[1]]
+            for j, k in enumerate(MTF_COLS):
+                self.assertClose(r[2 + j], want[k], msg=f'{k} {r[1]}')
+
+    # ── Test 5: chunks + watermark ──
+    def test_chunks_and_watermark(self):
+        start = datetime(2026, 1, 1, 13, 30, tzinfo=timezone.utc)
+        end = datetime(2026, 1, 10, 6, 0, tzinfo=timezone.utc)
+        chunks = day_chunks(start, end, 4)
+        self.assertEqual(chunks[0][0], datetime(2026, 1, 1, tzinfo=timezone.utc))
+        self.assertEqual(chunks[-1][1], end)
+        self.assertEqual([c[1] for c in chunks[:-1]], [c[0] for c in chunks[1:]])
+
+        mark = (0, chunks[0][0])
+        mark = _watermark(chunks, {chunks[1][0]}, mark)
+        self.assertEqual(mark, (0, chunks[0][0]))     # chunk 0 still running
+        mark = _watermark(chunks, {chunks[0][0], chunks[1][0]}, mark)
+        self.assertEqual(mark, (2, chunks[1][1]))
+
+
+if __name__ == '__main__':
+    unittest.main()
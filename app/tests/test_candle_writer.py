@@ -0,0 +1,175 @@
+"""
+tests/test_candle_writer.py — CandleWriter batching, change filter and counts.
+
+_FakeCursor emulates just enough of a psycopg2 cursor + an OHLCV table
+(execute_values mogrify/execute, copy_expert, rowcount with the
+IS DISTINCT FROM guard) to observe what reaches the DB.
+
+Covers:
+  1. One statement per call; identical repeats skipped via cache
+  2. Only the changed bar is re-sent (open bar revision)
+  3. Cold cache: DB-side unchanged rows count as skipped, not written
+  4. Large batches go through COPY + one INSERT ... SELECT
+  5. discard() forces a resend; duplicate ts in one call keep the last row
+  6. market_snapshot.build_snapshot failing after its upsert drops the cache
+"""
+
+import sys
+import os
+import csv
+import unittest
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+import candle_writer
+from candle_writer import CandleWriter
+
+SYM = 'BTC/USDT:USDT'
+
+
+class _Conn:
+    encoding = 'UTF8'
+
+
+class _FakeCursor:
+
+    def __init__(self, table=None):
+        self.connection = _Conn()
+        self.table = {} if table is None else table   # (sym, tf, ts_ms) → vals
+        self.statements = []
+        self.rowcount = -1
+        self._pending = []
+        self._stage = []
+
+    def mogrify(self, template, args):
+        self._pending.append(tuple(args))
+        return b'(...)'
+
+    def _apply(self, rows):
+        n = 0
+        for sym, tf, ts, *vals in rows:
+            key = (sym, tf, int(ts))
+            vals = tuple(float(x) for x in vals)
+            if self.table.get(key) != vals:
+                self.table[key] = vals
+                n += 1
+        return n
+
+    def execute(self, sql, params=None):
+        sql = sql.decode() if isinstance(sql, bytes) else sql
+        self.statements.append(sql.split()[0].upper())
+        if sql.lstrip().startswith('INSERT') and 'VALUES' in sql:
+            self.rowcount = self._apply(self._pending)
+            self._pending = []
+        elif sql.lstrip().startswith('INSERT'):
+            sym, tf = params
+            self.rowcount = self._apply([(sym, tf) + tuple(r) for r in self._stage])
+        elif sql.lstrip().startswith('TRUNCATE'):
+            self._stage = []
+
+    def fetchall(self):
+        return []
+
+    def copy_expert(self, sql, buf):
+        self.statements.append('COPY')
+        self._stage = [tuple(r) for r in csv.reader(buf)]
+
+
+def _bars(n, t0=1772323200000, price=90000.0):
+    return [[t0 + i * 60_000, price + i, price + i + 5, price + i - 5, price + i + 1, 10.0 + i]
+            for i in range(n)]
+
+
+class TestCandleWriter(unittest.TestCase):
+
+    # ── Test 1: batching + cache ──
+    def test_single_statement_and_cache_skip(self):
+        w = CandleWriter('candles')
+        cur = _FakeCursor()
+        bars = _bars(120)
+        res = w.upsert(cur, SYM, '1m', bars)
+        self.assertEqual(res, {'written': 120, 'skipped': 0})
+        self.assertEqual(cur.statements, ['INSERT'])
+
+        cur.statements = []
+        res = w.upsert(cur, SYM, '1m', bars)
+        self.assertEqual(res, {'written': 0, 'skipped': 120})
+        self.assertEqual(cur.statements, [])
+
+    # ── Test 2: open-bar revision ──
+    def test_only_changed_bar_sent(self):
+        w = CandleWriter('candles')
+        cur = _FakeCursor()
+        bars = _bars(200)
+        w.upsert(cur, SYM, '1m', bars)
+        bars[-1] = bars[-1][:4] + [bars[-1][4] + 2.5, bars[-1][5] + 1]
+        cur.statements = []
+        res = w.upsert(cur, SYM, '1m', bars)
+        self.assertEqual(res, {'written': 1, 'skipped': 199})
+        self.assertEqual(cur.statements, ['INSERT'])
+        self.assertEqual(cur.table[(SYM, '1m', bars[-1][0])][3], bars[-1][4])
+        self.assertEqual(w.totals, {'calls': 2, 'written': 201, 'skipped': 199})
+
+    # ── Test 3: cold cache ──
+    def test_cold_cache_counts_db_unchanged_as_skipped(self):
+        table = {}
+        CandleWriter('market_ohlcv').upsert(_FakeCursor(table), SYM, '5m', _bars(10))
+        fresh = CandleWriter('market_ohlcv')     # e.g. after a restart
+        bars = _bars(10)
+        bars[-1][4] += 1
+        res = fresh.upsert(_FakeCursor(table), SYM, '5m', bars)
+        self.assertEqual(res, {'written': 1, 'skipped': 9})
+
+    # ── Test 4: COPY path ──
+    def test_large_batch_uses_copy(self):
+        w = CandleWriter('candles', copy_min_rows=500)
+        cur = _FakeCursor()
+        res = w.upsert(cur, SYM, '1m', _bars(1440))
+        self.assertEqual(res, {'written': 1440, 'skipped': 0})
+        self.assertEqual(cur.statements, ['CREATE', 'TRUNCATE', 'COPY', 'INSERT'])
+        self.assertEqual(len(cur.table), 1440)
+
+    # ── Test 5: discard + duplicates ──
+    def test_discard_and_duplicates(self):
+        w = CandleWriter('candles')
+        cur = _FakeCursor()
+        bars = _bars(3)
+        dup = bars + [bars[1][:4] + [1.0, 1.0]]
+        res = w.upsert(cur, SYM, '1m', dup)
+        self.assertEqual(res, {'written': 3, 'skipped': 1})
+        self.assertEqual(cur.table[(SYM, '1m', bars[1][0])][3], 1.0)
+
+        # Rolled back elsewhere: table lost the rows, cache must not hide them
+        cur.table.clear()
+        w.discard(SYM, '1m')
+        res = w.upsert(cur, SYM, '1m', bars)
+        self.assertEqual(res['written'], 3)
+        with self.assertRaises(ValueError):
+            CandleWriter('indicators')
+
+    # ── Test 6: failed snapshot build (caller rolls back) ──
+    def test_snapshot_failure_discards(self):
+        import market_snapshot
+
+        class _Ex:
+            def fetch_ticker(self, sym):
+                return {'last': 90000.0}
+
+            def fetch_ohlcv(self, sym, tf, limit=None):
+                return _bars(3)
+
+        candle_writer._writers.pop('candles', None)
+        try:
+            cur = _FakeCursor()
+            with self.assertRaises(market_snapshot.SnapshotError):
+                market_snapshot.build_snapshot(_Ex(), cur, SYM)   # < 52 candles read back
+            self.assertEqual(len(cur.table), 3)
+            cur.table.clear()
+            res = candle_writer.upsert_ohlcv(cur, 'candles', SYM, '1m', _bars(3))
+            self.assertEqual(res['written'], 3)
+        finally:
+            candle_writer._writers.pop('candles', None)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,156 @@
+"""
+tests/test_config_store.py — config_store policy / YAML caches (no DB).
+
+Covers:
+  1. freeze(): nested dicts / lists become read-only
+  2. PolicyStore: cached between loads, reloaded after TTL or invalidate()
+  3. PolicyStore: failed reload keeps the previous snapshot (FAIL-OPEN)
+  4. YamlFile: edit detected by mtime/size, subscribers called, bad YAML kept
+  5. score_engine._load_weights reads weights / override from the snapshot
+"""
+
+import sys
+import os
+import shutil
+import tempfile
+import time
+import unittest
+from types import MappingProxyType
+from unittest import mock
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+import config_store
+from config_store import PolicyStore, PolicySnapshot, YamlFile, freeze
+
+
+def _quiet(msg):
+    pass
+
+
+class TestFreeze(unittest.TestCase):
+
+    def test_nested(self):
+        v = freeze({'a': [1, {'b': [2]}], 'c': 3})
+        self.assertIsInstance(v, MappingProxyType)
+        self.assertEqual(v['a'][0], 1)
+        self.assertEqual(v['a'][1]['b'], (2,))
+        with self.assertRaises(TypeError):
+            v['c'] = 4
+        with self.assertRaises(TypeError):
+            v['a'][1]['b'] = 5
+
+
+class TestPolicyStore(unittest.TestCase):
+
+    def setUp(self):
+        self.calls = 0
+        self.fail = False
+        self.policies = {'watch_keywords': ['fomc', 'cpi']}
+
+        def query(cur):
+            self.calls += 1
+            if self.fail:
+                raise RuntimeError('db down')
+            return dict(self.policies), {'tech_w': 0.7, 'position_w': 0.1,
+                                         'regime_w': 0.1, 'news_event_w': 0.1}
+        self.store = PolicyStore(ttl=60, query=query, listen=False, log_fn=_quiet)
+
+    def test_cached_until_invalidated(self):
+        snap = self.store.get(object())
+        self.assertEqual(snap.get('watch_keywords'), ('fomc', 'cpi'))
+        self.assertEqual(snap.score_weights['tech_w'], 0.7)
+        self.assertIs(self.store.get(object()), snap)
+        self.assertEqual(self.calls, 1)
+
+        self.policies['watch_keywords'] = ['etf']
+        self.store.invalidate()
+        snap2 = self.store.get(object())
+        self.assertEqual(snap2.get('watch_keywords'), ('etf',))
+        self.assertEqual(snap2.version, snap.version + 1)
+        self.assertEqual(self.calls, 2)
+
+    def test_ttl_expiry(self):
+        self.store.ttl = 0
+        self.store.get(object())
+        self.store.get(object())
+        self.assertEqual(self.calls, 2)
+
+    def test_fail_open_keeps_snapshot(self):
+        snap = self.store.get(object())
+        self.store.invalidate()
+        self.fail = True
+        self.assertIs(self.store.get(object()), snap)
+        self.assertEqual(self.store.stats['errors'], 1)
+        # Retry is backed off, not attempted on every lookup
+        self.store.get(object())
+        self.assertEqual(self.calls, 2)
+
+
+class TestYamlFile(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp = tempfile.mkdtemp()
+        self.path = os.path.join(self.tmp, 'modes.yaml')
+        self._write('feature_flags:\n  ff_a: true\n')
+        self.f = YamlFile(self.path, check_sec=0, log_fn=_quiet)
+
+    def tearDown(self):
+        shutil.rmtree(self.tmp)
+
+    def _write(self, text):
+        with open(self.path, 'w') as fh:
+            fh.write(text)
+        # mtime granularity: make every write visible as a change
+        st = os.stat(self.path)
+        os.utime(self.path, ns=(st.st_atime_ns, st.st_mtime_ns + 1_000_000_000))
+
+    def test_change_detected(self):
+        changes = []
+        self.f.on_change(lambda: changes.append(1))
+        self.assertTrue(self.f.section('feature_flags')['ff_a'])
+        self.assertFalse(self.f.check())
+
+        self._write('feature_flags:\n  ff_a: false\n  ff_b: true\n')
+        self.assertFalse(self.f.section('feature_flags')['ff_a'])
+        self.assertEqual(changes, [1])
+        self.assertEqual(self.f.version, 2)
+
+    def test_check_throttled(self):
+        self.f.check_sec = 60
+        self.f.data()
+        self._write('feature_flags:\n  ff_a: false\n')
+        self.assertTrue(self.f.section('feature_flags')['ff_a'])
+
+    def test_bad_yaml_keeps_previous(self):
+        self.f.data()
+        self._write('feature_flags: [unclosed\n')
+        self.assertTrue(self.f.section('feature_flags')['ff_a'])
+
+    def test_missing_file_empty(self):
+        f = YamlFile(os.path.join(self.tmp, 'nope.yaml'), log_fn=_quiet)
+        self.assertEqual(dict(f.section('feature_flags')), {})
+
+
+class TestScoreEngineWeights(unittest.TestCase):
+
+    def test_snapshot_weights_and_override(self):
+        import score_engine
+        snap = PolicySnapshot(
+            freeze({'score_weight_override': {'news_event_w': 0.2}}),
+            freeze({'tech_w': 0.6, 'position_w': 0.1, 'regime_w': 0.1, 'news_event_w': 0.05}),
+            time.time(), 1)
+        with mock.patch.object(config_store, 'policies', return_value=snap):
+            w = score_engine._load_weights(cur=None)
+        self.assertEqual(w, {'tech_w': 0.6, 'position_w': 0.1, 'regime_w': 0.1,
+                             'news_event_w': 0.2})
+
+    def test_empty_snapshot_defaults(self):
+        import score_engine
+        with mock.patch.object(config_store, 'policies', return_value=PolicySnapshot()):
+            w = score_engine._load_weights(cur=None)
+        self.assertEqual(w, score_engine.DEFAULT_WEIGHTS)
+
+
+if __name__ == '__main__':
+    unittest.main()
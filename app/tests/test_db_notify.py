@@ -0,0 +1,179 @@
+"""
+tests/test_db_notify.py — LISTEN/NOTIFY wakeups (no DB, fake connections).
+
+Covers:
+  1. notify() sends JSON payloads; unknown channels rejected
+  2. Listener LISTENs on every channel and returns queued notifications
+  3. wait() blocks on the socket and wakes when it becomes readable
+  4. Connect failure / lost connection fall back to sleeping out the timeout
+  5. wait_for() filters with match and returns [] on timeout
+"""
+
+import sys
+import os
+import socket
+import time
+import unittest
+from collections import namedtuple
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+import db_notify
+
+Notify = namedtuple('Notify', 'pid channel payload')
+
+
+class _FakeCursor:
+    def __init__(self, conn=None):
+        self.conn = conn
+        self.executed = []
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+    def execute(self, sql, params=None):
+        self.executed.append((sql, params))
+        if self.conn is not None:
+            self.conn.executed.append(sql)
+
+
+class _FakeConn:
+    """Socket-backed so select() works; push() queues a notification."""
+
+    def __init__(self):
+        self._r, self._w = socket.socketpair()
+        self.notifies = []
+        self._pending = []
+        self.executed = []
+        self.autocommit = False
+        self.broken = False
+        self.closed = 0
+
+    def cursor(self):
+        return _FakeCursor(self)
+
+    def fileno(self):
+        return self._r.fileno()
+
+    def push(self, channel, payload='{}'):
+        self._pending.append(Notify(1, channel, payload))
+        self._w.send(b'x')
+
+    def poll(self):
+        if self.broken:
+            raise RuntimeError('server closed the connection unexpectedly')
+        self._r.recv(1024)
+        self.notifies.extend(self._pending)
+        self._pending = []
+
+    def close(self):
+        self.closed = 1
+        self._r.close()
+        self._w.close()
+
+
+class TestNotify(unittest.TestCase):
+
+    def test_payload_is_json(self):
+        cur = _FakeCursor()
+        db_notify.notify(cur, db_notify.CANDLE_CLOSE, {'symbol': 'BTC', 'ts': 1})
+        sql, params = cur.executed[0]
+        self.assertIn('pg_notify', sql)
+        self.assertEqual(params, ('candle_close', '{"symbol": "BTC", "ts": 1}'))
+
+    def test_unknown_channel(self):
+        with self.assertRaises(ValueError):
+            db_notify.notify(_FakeCursor(), 'nope')
+        with self.assertRaises(ValueError):
+            db_notify.Listener(['nope'])
+
+
+class TestListener(unittest.TestCase):
+
+    def setUp(self):
+        self.conn = _FakeConn()
+        self.listener = db_notify.Listener(
+            [db_notify.EXECUTION_QUEUE, db_notify.SIGNALS_ACTION_V3],
+            connect=lambda: self.conn, log_fn=lambda m: None)
+
+    def tearDown(self):
+        self.listener.close()
+
+    def test_listens_on_all_channels(self):
+        self.assertEqual(self.listener.wait(0), [])
+        self.assertTrue(self.conn.autocommit)
+        self.assertEqual(self.conn.executed,
+                         ['LISTEN execution_queue;', 'LISTEN signals_action_v3;'])
+
+    def test_returns_pending(self):
+        self.conn.push('execution_queue')
+        self.conn.push('signals_action_v3', '{"id": 7}')
+        got = self.listener.wait(1.0)
+        self.assertEqual(got, [('execution_queue', {}), ('signals_action_v3', {'id': 7})])
+        self.assertEqual(self.listener.stats['notifies'], 2)
+
+    def test_timeout(self):
+        t0 = time.time()
+        self.assertEqual(self.listener.wait(0.05), [])
+        self.assertGreaterEqual(time.time() - t0, 0.04)
+        self.assertEqual(self.listener.stats['timeouts'], 1)
+
+    def test_wakes_early(self):
+        self.listener.wait(0)
+        import threading
+        threading.Timer(0.05, self.conn.push, args=('execution_queue',)).start()
+        t0 = time.time()
+        got = self.listener.wait(5.0)
+        self.assertEqual(got, [('execution_queue', {})])
+        self.assertLess(time.time() - t0, 2.0)
+
+    def test_lost_connection_closes(self):
+        self.listener.wait(0)
+        self.conn.broken = True
+        self.conn.push('execution_queue')
+        self.assertEqual(self.listener.wait(1.0), [])
+        self.assertIsNone(self.listener.conn)
+        self.assertEqual(self.conn.closed, 1)
+
+    def test_connect_failure_sleeps(self):
+        def boom():
+            raise RuntimeError('refused')
+        listener = db_notify.Listener([db_notify.EXECUTION_LOG], connect=boom,
+                                      log_fn=lambda m: None)
+        t0 = time.time()
+        self.assertEqual(listener.wait(0.05), [])
+        self.assertGreaterEqual(time.time() - t0, 0.04)
+        self.assertIsNone(listener.conn)
+
+
+class TestWaitFor(unittest.TestCase):
+
+    def test_none_listener_sleeps(self):
+        t0 = time.time()
+        self.assertEqual(db_notify.wait_for(None, 0.05), [])
+        self.assertGreaterEqual(time.time() - t0, 0.04)
+
+    def test_match_filters(self):
+        conn = _FakeConn()
+        listener = db_notify.Listener([db_notify.INDICATOR_UPDATE],
+                                      connect=lambda: conn, log_fn=lambda m: None)
+        try:
+            conn.push('indicator_update', '{"symbol": "ETH/USDT:USDT"}')
+            conn.push('indicator_update', '{"symbol": "BTC/USDT:USDT"}')
+            got = db_notify.wait_for(listener, 1.0,
+                                     match=lambda ch, p: p['symbol'] == 'BTC/USDT:USDT')
+            self.assertEqual(got, [('indicator_update', {'symbol': 'BTC/USDT:USDT'})])
+
+            conn.push('indicator_update', '{"symbol": "ETH/USDT:USDT"}')
+            got = db_notify.wait_for(listener, 0.1,
+                                     match=lambda ch, p: p['symbol'] == 'BTC/USDT:USDT')
+            self.assertEqual(got, [])
+        finally:
+            listener.close()
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,177 @@
+"""
+tests/test_db_pool.py — db_config connection pool (no DB, fake connections).
+
+Covers:
+  1. close() returns the connection; next checkout reuses it
+  2. Open transaction rolled back on return; autocommit set per checkout
+  3. Dead / failed-ping connections replaced (reconnect counter)
+  4. Exhausted pool waits, then PoolTimeout; release wakes a waiter
+  5. Connect failure frees the slot; dropped proxy released; roles / fork reset
+"""
+
+import sys
+import os
+import gc
+import threading
+import time
+import unittest
+from unittest import mock
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+import psycopg2.extensions as ext
+import db_config
+from db_config import ConnectionPool, PoolTimeout
+
+
+class _FakeCursor:
+    def __init__(self, conn):
+        self.conn = conn
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+    def execute(self, sql, params=None):
+        if self.conn.broken:
+            raise RuntimeError('server closed the connection unexpectedly')
+        self.conn.executed.append(sql)
+        if not self.conn.autocommit:
+            self.conn.status = ext.TRANSACTION_STATUS_INTRANS
+
+
+class _FakeRaw:
+    def __init__(self):
+        self.closed = 0
+        self.autocommit = False
+        self.broken = False
+        self.status = ext.TRANSACTION_STATUS_IDLE
+        self.executed = []
+        self.rollbacks = 0
+
+    def cursor(self):
+        return _FakeCursor(self)
+
+    def rollback(self):
+        self.rollbacks += 1
+        self.status = ext.TRANSACTION_STATUS_IDLE
+
+    def get_transaction_status(self):
+        return self.status
+
+    def close(self):
+        self.closed = 1
+
+
+def _pool(maxconn=2):
+    made = []
+
+    def connect():
+        made.append(_FakeRaw())
+        return made[-1]
+    return ConnectionPool('rw', maxconn=maxconn, connect=connect), made
+
+
+class TestDbPool(unittest.TestCase):
+
+    # ── Test 1: reuse ──
+    def test_reuse(self):
+        pool, made = _pool()
+        c1 = pool.getconn()
+        with c1.cursor() as cur:
+            cur.execute('SELECT 1;')
+        c1.close()
+        c1.close()
+        self.assertEqual(c1.closed, 1)
+        c2 = pool.getconn()
+        self.assertIs(c2._raw, made[0])
+        self.assertEqual(len(made), 1)
+        st = pool.snapshot()
+        self.assertEqual((st['checkouts'], st['created'], st['in_use'], st['idle']), (2, 1, 1, 0))
+        c2.close()
+        self.assertEqual(pool.snapshot()['idle'], 1)
+
+    # ── Test 2: transaction reset ──
+    def test_rollback_and_autocommit(self):
+        pool, made = _pool()
+        c = pool.getconn(autocommit=False)
+        with c.cursor() as cur:
+            cur.execute("UPDATE t SET x = 1;")
+        c.close()
+        self.assertEqual(made[0].rollbacks, 1)
+        c = pool.getconn(autocommit=True)
+        self.assertTrue(c.autocommit)
+        c.autocommit = False
+        self.assertFalse(made[0].autocommit)
+        c.close()
+
+    # ── Test 3: health check ──
+    def test_dead_and_ping(self):
+        pool, made = _pool()
+        pool.getconn().close()
+        made[0].closed = 1
+        c = pool.getconn()
+        self.assertIs(c._raw, made[1])
+        c.close()
+
+        made[1].broken = True
+        with mock.patch.object(db_config, 'POOL_PING_SEC', 0):
+            c = pool.getconn()
+        self.assertIs(c._raw, made[2])
+        self.assertEqual(made[1].closed, 1)
+        c.close()
+
+        with mock.patch.object(db_config, 'POOL_PING_SEC', 0):
+            pool.getconn().close()
+        self.assertEqual(made[2].executed, ['SELECT 1;'])
+        st = pool.snapshot()
+        self.assertEqual((st['reconnects'], st['created'], st['size']), (2, 3, 1))
+
+    # ── Test 4: exhaustion ──
+    def test_wait_and_timeout(self):
+        pool, _ = _pool(maxconn=1)
+        held = pool.getconn()
+        with self.assertRaises(PoolTimeout):
+            pool.getconn(timeout=0.05)
+
+        got = []
+        t = threading.Thread(target=lambda: got.append(pool.getconn(timeout=5)))
+        t.start()
+        time.sleep(0.05)
+        held.close()
+        t.join(2)
+        self.assertEqual(len(got), 1)
+        st = pool.snapshot()
+        self.assertEqual((st['waits'], st['timeouts'], st['size']), (2, 1, 1))
+        self.assertGreater(st['wait_ms'], 0)
+        got[0].close()
+
+    # ── Test 5: failures / process-wide pools ──
+    def test_connect_failure_gc_roles(self):
+        pool = ConnectionPool('rw', maxconn=1, connect=mock.Mock(side_effect=OSError('refused')))
+        for _ in range(2):
+            with self.assertRaises(OSError):
+                pool.getconn()
+        self.assertEqual(pool.snapshot()['size'], 0)
+
+        pool, made = _pool(maxconn=1)
+        c = pool.getconn()
+        del c
+        gc.collect()
+        self.assertEqual(pool.snapshot()['idle'], 1)
+
+        self.assertIn('default_transaction_read_only=on', db_config.ROLE_OPTIONS['ro'])
+        with self.assertRaises(ValueError):
+            db_config.get_pool('admin')
+        ro = db_config.get_pool('ro')
+        self.assertIs(db_config.get_pool('ro'), ro)
+        self.assertIn('ro', db_config.pool_stats())
+        with mock.patch.object(db_config.os, 'getpid', return_value=-1):
+            self.assertIsNot(db_config.get_pool('ro'), ro)
+        db_config.close_pools()
+
+
+if __name__ == '__main__':
+    unittest.main()
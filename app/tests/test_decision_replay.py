@@ -0,0 +1,249 @@
+"""
+tests/test_decision_replay.py — decision replay harness (synthetic tape, no DB).
+
+Covers:
+  1. Tape.state_at builds the live MarketState shape as of each bar; save/load,
+     a cached tape of another range / symbol is rejected
+  2. SimExchange fills, SL-before-TP exits, fees, Fill rows for the guards
+  3. ReplayCursor answers adaptive / execution_log / V3 debounce queries,
+     rejects the rest
+  4. Replay.run traces every bar, honors overrides and restores module state
+"""
+
+import sys
+import os
+import math
+import tempfile
+import time
+import unittest
+from datetime import datetime, timedelta, timezone
+
+import numpy as np
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+import decision_replay
+from decision_replay import (
+    Tape, SimClock, SimExchange, ReplayCursor, UnsupportedQuery, Replay, load_trace,
+)
+from market_state import CANDLES_1M, CLOSES_5M, INDICATOR_ROWS, INDICATOR_COLS
+
+T0 = 1_750_000_020.0 - (1_750_000_020.0 % 3600)
+
+
+def _tape(n=300, warmup=60):
+    ts = T0 + 60.0 * np.arange(n)
+    c = 60000 + 300 * np.sin(np.arange(n) / 15.0) + 2 * np.arange(n)
+    o = np.r_[c[0], c[:-1]]
+    h = np.maximum(o, c) + 20
+    l = np.minimum(o, c) - 20
+    candles = {'ts': ts, 'o': o, 'h': h, 'l': l, 'c': c, 'v': np.full(n, 10.0)}
+    ts5 = ts[::5]
+    ind = {'ts': ts}
+    for col in INDICATOR_COLS:
+        ind[col] = c.copy()
+    ind['vol_spike'] = np.zeros(n, dtype=np.int8)
+    ind['rsi_14'] = np.full(n, 50.0)
+    ind['atr_14'] = np.full(n, 60.0)
+    ind['vol'] = np.full(n, 10.0)
+    ind['vol_ma20'] = np.full(n, 10.0)
+    ind['bb_up'] = c + 150
+    ind['bb_dn'] = c - 150
+    ctx_ts = ts[::15]
+    k = len(ctx_ts)
+    tables = {
+        'candles': candles,
+        'candles_5m': {'ts': ts5, 'c': c[4::5]},
+        'indicators': ind,
+        'vol_profile': {'ts': ctx_ts, 'poc': c[::15], 'vah': c[::15] + 200, 'val': c[::15] - 200},
+        'market_context': {
+            'ts': ctx_ts, 'regime': np.array(['RANGE'] * k), 'regime_confidence': np.full(k, 60.0),
+            'shock_type': np.array([''] * k), 'flow_bias': np.zeros(k),
+            'breakout_confirmed': np.zeros(k, dtype=np.int8), 'adx_14': np.full(k, 18.0),
+            'vah': c[::15] + 200, 'val': c[::15] - 200, 'poc': c[::15],
+            'price_vs_va': np.array(['INSIDE'] * k), 'bbw_ratio': np.full(k, 1.0)},
+        'mtf': {'ts': ctx_ts, 'ema_15m_50': c[::15], 'ema_15m_200': c[::15] - 50,
+                'ema_1h_50': c[::15], 'ema_1h_200': c[::15] - 100, 'adx_1h': np.full(k, 20.0),
+                'donchian_high_15m_20': c[::15] + 300, 'donchian_low_15m_20': c[::15] - 300,
+                'atr_15m': np.full(k, 120.0)},
+    }
+    return Tape('BTC/USDT:USDT', tables, ts[warmup])
+
+
+class TestTape(unittest.TestCase):
+
+    def test_state_at(self):
+        tape = _tape()
+        self.assertEqual(tape.first, 60)
+        i = 150
+        now = float(tape.ts[i]) + 60
+        st = tape.state_at(i, now)
+        self.assertEqual(len(st.candles), CANDLES_1M)
+        self.assertEqual(st.candles[0][4], tape.tables['candles']['c'][i])
+        self.assertGreater(st.candles[0][0], st.candles[1][0])
+        self.assertEqual(len(st.closes_5m), CLOSES_5M)
+        self.assertEqual(len(st.indicators), INDICATOR_ROWS)
+        self.assertIs(st.indicators[0]['vol_spike'], False)
+        ctx = st.market_context
+        self.assertEqual(ctx['regime'], 'RANGE')
+        self.assertIsNone(ctx['shock_type'])
+        self.assertEqual(ctx['age_seconds'], 60.0)
+        self.assertEqual(st.mtf['updated_at'].timestamp(), now)
+        self.assertEqual(len(st.vol_profile), 10)
+        # closed 5m buckets only: bar 150 closes at +151min, the 150-min bucket is still open
+        self.assertEqual(st.closes_5m[0], tape.tables['candles_5m']['c'][29])
+
+    def test_save_load(self):
+        tape = _tape(n=120)
+        with tempfile.TemporaryDirectory() as d:
+            path = os.path.join(d, 'tape.npz')
+            tape.save(path)
+            back = Tape.load(path)
+        self.assertEqual((back.symbol, back.first, len(back)), (tape.symbol, tape.first, len(tape)))
+        now = float(tape.ts[90]) + 60
+        self.assertEqual(back.state_at(90, now), tape.state_at(90, now))
+
+    def test_load_checks_range_and_symbol(self):
+        tape = _tape(n=120)
+        start = datetime.fromtimestamp(tape.start_ts, timezone.utc)
+        end = start + timedelta(hours=1)
+        with tempfile.TemporaryDirectory() as d:
+            path = os.path.join(d, 'tape.npz')
+            tape.save(path)
+            with self.assertRaises(ValueError):        # saved without an end
+                Tape.load(path, start, end)
+            Tape(tape.symbol, tape.tables, tape.start_ts, end.timestamp()).save(path)
+            back = Tape.load(path, start, end, 'BTC/USDT:USDT')
+            self.assertEqual(back.end_ts, end.timestamp())
+            with self.assertRaises(ValueError):
+                Tape.load(path, start, end + timedelta(minutes=1))
+            with self.assertRaises(ValueError):
+                Tape.load(path, start - timedelta(days=1), end)
+            with self.assertRaises(ValueError):
+                Tape.load(path, start, end, 'ETH/USDT:USDT')
+
+
+class TestSimExchange(unittest.TestCase):
+
+    def test_long_stop_before_target(self):
+        ex = SimExchange(notional=1000, fee_rate=0.001, slippage_bps=0)
+        ex.open(100.0, 'LONG', 100.0, 0.01, 0.01, regime_tag='STATIC_RANGE', entry_mode='MeanRev')
+        self.assertEqual(ex.position_row()['side'], 'long')
+        self.assertEqual(ex.on_bar(160.0, 100.0, 100.5, 99.5, 100.2), (None, 0.0))
+        reason, pnl = ex.on_bar(220.0, 100.0, 101.5, 98.5, 100.0)
+        self.assertEqual(reason, 'SL')
+        self.assertAlmostEqual(pnl, -10 - 1 - 0.99)
+        self.assertIsNone(ex.position)
+        self.assertEqual(ex.position_row(), {})
+        fills = ex.fills(300.0)
+        self.assertEqual([f.order_type for f in fills], ['CLOSE', 'OPEN'])
+        self.assertTrue(fills[0].is_loss and fills[0].closed)
+        self.assertEqual(fills[0].regime_tag, 'STATIC_RANGE')
+        self.assertEqual(ex.fills(300.0 + 25 * 3600), ())
+
+    def test_short_target_and_gap(self):
+        ex = SimExchange(notional=1000, fee_rate=0.0, slippage_bps=0)
+        ex.open(0.0, 'SHORT', 100.0, 0.02, 0.01)
+        reason, pnl = ex.on_bar(60.0, 98.0, 98.5, 97.5, 98.0)
+        self.assertEqual(reason, 'TP')
+        self.assertAlmostEqual(pnl, 20.0)        # gapped below the target: filled at the open
+        self.assertAlmostEqual(ex.equity, 20.0)
+
+
+class TestReplayCursor(unittest.TestCase):
+
+    def setUp(self):
+        self.clock = SimClock(10_000.0)
+        self.ex = SimExchange(slippage_bps=0, fee_rate=0)
+        self.cur = ReplayCursor(self.ex, self.clock)
+        for ts, pnl, mode in ((1000.0, 5.0, 'MeanRev'), (8000.0, -1.0, 'DriftFollow'),
+                              (9000.0, -2.0, 'MeanRev')):
+            self.ex._record('CLOSE', 'LONG', pnl, ts, None, mode, 'SL')
+
+    def test_adaptive_state_round_trip(self):
+        from strategy_v3 import adaptive_v3
+        adaptive_v3._save_state_to_db(self.cur, 'last_trade_ts', {'ts': 123.0})
+        self.assertEqual(adaptive_v3._load_state_from_db(self.cur), {'last_trade_ts': {'ts': 123.0}})
+
+    def test_execution_log_queries(self):
+        from strategy_v3 import adaptive_v3
+        self.assertEqual(adaptive_v3._query_global_wr(self.cur, 20), (1 / 3, 3))
+        self.assertEqual(adaptive_v3._query_mode_wr(self.cur, 'MeanRev', 20), (0.5, 2))
+        self.assertEqual(adaptive_v3._query_mode_loss_streak(self.cur, 'MeanRev'), 1)
+        self.assertEqual(adaptive_v3._get_last_trade_ts(self.cur), 9000.0)
+        import autopilot_daemon
+        self.assertEqual(autopilot_daemon._get_current_loss_streak(self.cur), 2)
+
+    def test_v3_signal_debounce(self):
+        import autopilot_daemon as ap
+        from strategy_v3.config_v3 import get as v3_get
+        window = v3_get('signal_debounce_sec', 300)
+        v3 = {'regime_class': 'STATIC_RANGE'}
+        features = {'range_position': 0.1}
+        check = lambda side: ap._v3_check_signal_debounce(self.cur, 'BTC/USDT:USDT', v3, side, features)[0]
+        self.assertTrue(check('LONG'))
+        ap._v3_record_signal_debounce(self.cur, 'BTC/USDT:USDT', v3, 'LONG', features)
+        self.assertFalse(check('LONG'))
+        self.assertTrue(check('SHORT'))
+        self.clock.now += window + 1
+        self.assertTrue(check('LONG'))
+        self.assertEqual(sum(self.cur.unsupported.values()), 0)
+
+    def test_unsupported(self):
+        with self.assertRaises(UnsupportedQuery):
+            self.cur.execute('SELECT 1 FROM news;')
+        with self.assertRaises(UnsupportedQuery):
+            self.cur.execute('SELECT count(*) FROM execution_log WHERE ts > now();')
+        self.assertEqual(sum(self.cur.unsupported.values()), 2)
+
+
+class TestReplay(unittest.TestCase):
+
+    def test_run_traces_and_restores(self):
+        import feature_flags
+        import autopilot_daemon
+        from strategy_v3 import config_v3, adaptive_v3
+        load_section = feature_flags._load_section
+        adaptive_state = adaptive_v3._state
+        seen = []
+
+        replay = Replay(_tape(), flags={'ff_adaptive_layers': 'on'},
+                        params={'adx_breakout_min': 99})
+        decide = replay._decide
+
+        def spy(state, ctx, row):
+            seen.append((autopilot_daemon.time.time(),
+                         config_v3.get('adx_breakout_min'), config_v3.is_enabled(),
+                         feature_flags.is_enabled('ff_adaptive_layers'),
+                         feature_flags.is_enabled('ff_night_session_gate')))
+            return decide(state, ctx, row)
+
+        replay._decide = spy
+        summary = replay.run()
+
+        self.assertEqual(summary['cycles'], 240)
+        self.assertEqual(sum(summary['actions'].values()), 240)
+        self.assertGreater(summary['x_realtime'], 1)
+        self.assertEqual(seen[0], (float(replay.tape.ts[60]) + 60, 99, True, True, False))
+        # patches undone
+        self.assertIs(autopilot_daemon.time, time)
+        self.assertIs(feature_flags._load_section, load_section)
+        self.assertIs(adaptive_v3._state, adaptive_state)
+        self.assertIsNone(autopilot_daemon._guard_ctx)
+
+        with tempfile.TemporaryDirectory() as d:
+            path = os.path.join(d, 'trace.npz')
+            replay.trace.save(path)
+            trace = load_trace(path)
+        self.assertEqual(len(trace['ts']), 240)
+        self.assertTrue(np.all(np.diff(trace['ts']) == 60))
+        self.assertEqual(set(trace['action']), set(summary['actions']))
+        opens = int(np.sum(trace['action'] == 'OPEN'))
+        self.assertEqual(opens, sum(1 for r in replay.exchange.ledger if r['order_type'] == 'OPEN'))
+        exits = trace['exit'][trace['exit'] != '']
+        self.assertEqual(len(exits), summary['trades'])
+        self.assertTrue(math.isclose(float(np.nansum(trace['pnl'])), summary['pnl_usdt'], abs_tol=0.01))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,322 @@
+"""
+tests/test_exchange_state.py — shared exchange state + private WS protocol (no network).
+
+Covers:
+  1. Private-stream position / wallet / order messages update state + version
+  2. REST snapshot replaces the state from a fake ccxt instance; stream
+     updates during the fetch are replayed on top of it
+  3. Marks: position topic markPrice, else a ticker per open position every
+     MARK_SEC (service side); consumers get mark / uPnL from the slot without
+     any REST call, a stale mark or slot falls back to REST
+  4. Conditional vs active orders split like orderFilter=StopOrder
+  5. track() / budget(): per-service endpoint counts across processes
+  6. PrivateStream: auth → subscribe → on_ready → dispatch, auth failure closes
+  7. heartbeat(): live_at follows the stream's last frame only while it is
+     younger than MAX_AGE_SEC; a stalled stream falls back to REST snapshots
+"""
+
+import sys
+import os
+import json
+import shutil
+import tempfile
+import time
+import unittest
+from unittest import mock
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+import exchange_state
+from exchange_state import ExchangeState
+from bybit_private_ws import PrivateStream, sign
+
+SYM = 'BTC/USDT:USDT'
+
+
+def _quiet(msg):
+    pass
+
+
+def _pos_msg(size='0.01', side='Buy'):
+    return {'topic': 'position', 'data': [{
+        'category': 'linear', 'symbol': 'BTCUSDT', 'side': side, 'size': size,
+        'entryPrice': '60000', 'markPrice': '60100', 'unrealisedPnl': '1',
+        'leverage': '5', 'liqPrice': '50000', 'positionIdx': 0}]}
+
+
+def _order_msg(oid, status, stop=False):
+    return {'topic': 'order', 'data': [{
+        'symbol': 'BTCUSDT', 'orderId': oid, 'side': 'Sell', 'orderType': 'Market',
+        'price': '0', 'qty': '0.01', 'cumExecQty': '0', 'orderStatus': status,
+        'stopOrderType': 'StopLoss' if stop else '', 'triggerPrice': '59000' if stop else '',
+        'reduceOnly': True, 'createdTime': '1700000000000'}]}
+
+
+class FakeExchange:
+    def __init__(self, during_fetch=None):
+        self.calls = []
+        self.during_fetch = during_fetch
+
+    def fetch_positions(self, symbols):
+        self.calls.append('positions')
+        if self.during_fetch:
+            self.during_fetch()
+        return [{'symbol': SYM, 'side': 'short', 'contracts': 0.02, 'entryPrice': 61000,
+                 'markPrice': 60900, 'unrealizedPnl': 2, 'leverage': 5,
+                 'liquidationPrice': 70000, 'info': {'positionIdx': '0'}}]
+
+    def fetch_balance(self):
+        self.calls.append('balance')
+        return {'USDT': {'total': 1000, 'free': 800, 'used': 200}}
+
+    def fetch_open_orders(self, symbol, params=None):
+        self.calls.append('orders')
+        if params:
+            return [{'id': 'sl1', 'symbol': SYM, 'side': 'buy', 'type': 'market',
+                     'amount': 0.02, 'stopPrice': 63000, 'info': {}}]
+        return []
+
+    def fetch_ticker(self, symbol):
+        self.calls.append('ticker')
+        return {'symbol': symbol, 'last': 60850.0, 'markPrice': 60800.0}
+
+
+class TestState(unittest.TestCase):
+
+    def setUp(self):
+        self.st = ExchangeState([SYM], log_fn=_quiet)
+
+    def test_ws_messages(self):
+        self.assertTrue(self.st.handle(_pos_msg()))
+        pos = self.st.positions[SYM]
+        self.assertEqual((pos['side'], pos['contracts'], pos['entryPrice']), ('long', 0.01, 60000.0))
+        self.assertFalse(self.st.handle(_pos_msg()))          # unchanged → no bump
+        self.assertEqual(self.st.version, 1)
+        self.st.handle(_pos_msg(size='0', side=''))
+        self.assertIsNone(self.st.positions[SYM]['side'])
+
+        self.st.handle({'topic': 'wallet', 'data': [{'totalAvailableBalance': '700', 'coin': [
+            {'coin': 'USDT', 'walletBalance': '1000', 'availableToWithdraw': ''}]}]})
+        self.assertEqual(self.st.balance['USDT'], {'total': 1000.0, 'free': 700.0, 'used': 300.0})
+
+        self.st.handle(_order_msg('o1', 'New'))
+        self.assertIn('o1', self.st.orders[SYM])
+        self.st.handle(_order_msg('o1', 'Filled'))
+        self.assertNotIn('o1', self.st.orders[SYM])
+        self.assertEqual(self.st.source, 'ws')
+
+    def test_other_symbols_ignored(self):
+        msg = _pos_msg()
+        msg['data'][0]['symbol'] = 'ETHUSDT'
+        self.assertFalse(self.st.handle(msg))
+
+    def test_rest_snapshot(self):
+        ex = FakeExchange()
+        self.assertTrue(self.st.snapshot_rest(ex))
+        self.assertEqual(self.st.positions[SYM]['side'], 'short')
+        self.assertEqual(self.st.balance['USDT']['free'], 800.0)
+        self.assertEqual(list(self.st.orders[SYM]), ['sl1'])
+        self.assertEqual(self.st.source, 'rest')
+        self.assertIsNotNone(self.st.live_at)
+        self.assertNotIn('markPrice', self.st.positions[SYM])
+
+    def test_stream_update_during_snapshot_wins(self):
+        # The position closes on the stream while REST still returns it open
+        ex = FakeExchange(during_fetch=lambda: self.st.handle(_pos_msg(size='0', side='')))
+        ex_orders = ex.fetch_open_orders
+        ex.fetch_open_orders = lambda sym, params=None: (
+            self.st.handle(_order_msg('sl1', 'Cancelled', stop=True)), ex_orders(sym, params))[1]
+        self.assertTrue(self.st.snapshot_rest(ex))
+        self.assertIsNone(self.st.positions[SYM]['side'])
+        self.assertEqual(self.st.positions[SYM]['contracts'], 0.0)
+        self.assertNotIn('sl1', self.st.orders[SYM])
+        self.assertIsNone(self.st._deltas)
+        # later stream updates are applied directly again
+        self.st.handle(_pos_msg())
+        self.assertEqual(self.st.positions[SYM]['side'], 'long')
+
+    def test_marks(self):
+        ex = FakeExchange()
+        self.assertFalse(self.st.refresh_marks(ex))           # no open position
+        self.st.handle(_pos_msg())
+        self.assertEqual(self.st.marks[SYM]['price'], 60100.0)
+        self.assertFalse(self.st.refresh_marks(ex))           # position topic mark is fresh
+        self.st.marks[SYM]['at'] -= exchange_state.MARK_SEC
+        self.assertTrue(self.st.refresh_marks(ex))
+        self.assertEqual(self.st.marks[SYM]['price'], 60800.0)
+        self.assertEqual(ex.calls, ['ticker'])
+        ex.fetch_ticker = lambda symbol: 1 / 0
+        self.st.marks[SYM]['at'] -= exchange_state.MARK_SEC
+        self.assertFalse(self.st.refresh_marks(ex))
+        self.assertEqual(self.st.stats['mark_errors'], 1)
+
+    def test_order_datetime(self):
+        self.st.handle(_order_msg('o1', 'New'))
+        self.assertEqual(self.st.orders[SYM]['o1']['datetime'], '2023-11-14T22:13:20.000Z')
+
+
+class TestSlotConsumers(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp = tempfile.mkdtemp()
+        self.path = os.path.join(self.tmp, 'state.json')
+        self.st = ExchangeState([SYM], log_fn=_quiet)
+        self.st.snapshot_rest(FakeExchange())
+        self.st.refresh_marks(FakeExchange())
+        self.st.handle(_order_msg('o2', 'New'))
+
+    def tearDown(self):
+        shutil.rmtree(self.tmp)
+
+    def test_fresh_slot_no_rest(self):
+        exchange_state.publish(self.st.payload(), path=self.path)
+        ex = FakeExchange()
+        pos = exchange_state.fetch_positions(ex, [SYM], path=self.path)
+        self.assertEqual(pos[0]['contracts'], 0.02)
+        self.assertEqual(pos[0]['markPrice'], 60800.0)
+        self.assertAlmostEqual(pos[0]['unrealizedPnl'], (61000 - 60800) * 0.02)
+        self.assertEqual(exchange_state.fetch_balance(ex, path=self.path)['USDT']['total'], 1000.0)
+        active = exchange_state.fetch_open_orders(ex, SYM, path=self.path)
+        cond = exchange_state.fetch_open_orders(ex, SYM, params={'orderFilter': 'StopOrder'},
+                                                path=self.path)
+        self.assertEqual([o['id'] for o in active], ['o2'])
+        self.assertEqual([o['id'] for o in cond], ['sl1'])
+        self.assertEqual(ex.calls, [])
+
+    def test_stale_mark_falls_back(self):
+        payload = self.st.payload()
+        payload['marks'][SYM] = {'price': 60800.0, 'at': time.time() - 60}
+        exchange_state.publish(payload, path=self.path)
+        ex = FakeExchange()
+        with mock.patch.object(exchange_state, '_log'):
+            pos = exchange_state.fetch_positions(ex, [SYM], path=self.path)
+        self.assertEqual(pos[0]['markPrice'], 60900)
+        self.assertEqual(ex.calls, ['positions'])
+
+    def test_stale_slot_falls_back(self):
+        payload = self.st.payload()
+        payload['live_at'] = time.time() - 60
+        exchange_state.publish(payload, path=self.path)
+        ex = FakeExchange()
+        exchange_state.fetch_positions(ex, [SYM], path=self.path)
+        exchange_state.fetch_open_orders(ex, SYM, path=self.path)
+        self.assertEqual(ex.calls, ['positions', 'orders'])
+
+    def test_missing_slot_or_symbol(self):
+        ex = FakeExchange()
+        exchange_state.fetch_positions(ex, [SYM], path=self.path)
+        exchange_state.publish(self.st.payload(), path=self.path)
+        exchange_state.fetch_positions(ex, ['ETH/USDT:USDT'], path=self.path)
+        self.assertEqual(ex.calls, ['positions', 'positions'])
+
+
+class TestBudget(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp = tempfile.mkdtemp()
+        self.patch = mock.patch.object(exchange_state, 'BUDGET_DIR', self.tmp)
+        self.patch.start()
+        exchange_state._budgets.clear()
+
+    def tearDown(self):
+        self.patch.stop()
+        exchange_state._budgets.clear()
+        shutil.rmtree(self.tmp)
+
+    def test_track_and_budget(self):
+        class Ex:
+            def fetch(self, url, method='GET'):
+                return url
+        ex = exchange_state.track(Ex(), service='svc_a')
+        exchange_state.track(ex, service='svc_a')    # idempotent
+        for _ in range(3):
+            ex.fetch('https://api.bybit.com/v5/position/list?symbol=BTCUSDT')
+        ex.fetch('https://api.bybit.com/v5/order/realtime')
+        exchange_state._budgets['svc_a'].flush()
+        # A second process' file
+        with open(os.path.join(self.tmp, 'svc_b.1.json'), 'w') as f:
+            json.dump({'service': 'svc_b', 'updated_at': time.time(),
+                       'minutes': {str(int(time.time() // 60) * 60): {'/v5/account/wallet-balance': 2}}}, f)
+        usage = exchange_state.budget(60)
+        self.assertEqual(usage['svc_a'], {'/v5/position/list': 3, '/v5/order/realtime': 1})
+        self.assertEqual(usage['svc_b'], {'/v5/account/wallet-balance': 2})
+
+
+class TestHeartbeat(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp = tempfile.mkdtemp()
+        self.patch = mock.patch.object(exchange_state, 'SLOT_PATH', os.path.join(self.tmp, 's.json'))
+        self.patch.start()
+        self.st = ExchangeState([SYM], log_fn=_quiet)
+        self.stream = PrivateStream(['position'], lambda m: None, api_key='k', secret='s',
+                                    log_fn=_quiet)
+        self.stream.connected = True
+        self.snapshots = []
+        self.last_rest = [time.time()]
+
+    def tearDown(self):
+        self.patch.stop()
+        shutil.rmtree(self.tmp)
+
+    def _tick(self):
+        return exchange_state.heartbeat(self.st, self.stream, FakeExchange(), self.last_rest,
+                                        lambda: self.snapshots.append(1))
+
+    def test_recent_frame_marks_live(self):
+        self.stream.last_msg_at = time.time() - 1
+        self.assertEqual(self._tick(), 'live')
+        self.assertEqual(self.st.live_at, self.stream.last_msg_at)
+        self.assertIsNotNone(exchange_state.latest())
+        self.assertEqual(self.snapshots, [])
+
+    def test_stalled_stream_uses_rest(self):
+        # connected and inside the 60s reconnect window, but silent for 10s
+        self.stream.last_msg_at = time.time() - 10
+        self.assertTrue(self.stream.alive())
+        self.assertIsNone(self._tick())                   # last REST snapshot is recent
+        self.assertIsNone(self.st.live_at)
+        self.last_rest[0] -= exchange_state.REST_POLL_SEC
+        self.assertEqual(self._tick(), 'rest')
+        self.assertEqual(self.snapshots, [1])
+
+    def test_reconcile(self):
+        self.stream.last_msg_at = time.time()
+        self.last_rest[0] -= exchange_state.RECONCILE_SEC
+        self.assertEqual(self._tick(), 'reconcile')
+        self.assertEqual(self.snapshots, [1])
+
+
+class TestPrivateStream(unittest.TestCase):
+
+    def test_auth_subscribe_dispatch(self):
+        got, ready, sent = [], [], []
+        ps = PrivateStream(['position', 'order'], got.append, api_key='k', secret='s',
+                           on_ready=lambda: ready.append(1), log_fn=_quiet)
+        ps.on_open(sent.append)
+        auth = json.loads(sent[0])
+        self.assertEqual(auth['op'], 'auth')
+        self.assertEqual(auth['args'][2], sign('s', auth['args'][1]))
+
+        ps.handle(json.dumps({'op': 'auth', 'success': True}), sent.append)
+        self.assertEqual(json.loads(sent[1]), {'op': 'subscribe', 'args': ['position', 'order']})
+        self.assertFalse(ps.connected)
+        ps.handle(json.dumps({'op': 'subscribe', 'success': True}), sent.append)
+        self.assertTrue(ps.connected and ready == [1])
+
+        self.assertEqual(ps.handle(json.dumps(_pos_msg()), sent.append), 'position')
+        self.assertIsNone(ps.handle(json.dumps({'op': 'pong'}), sent.append))
+        self.assertEqual(len(got), 1)
+        self.assertTrue(ps.alive())
+
+    def test_auth_failure_and_handler_error(self):
+        ps = PrivateStream(['order'], lambda m: 1 / 0, api_key='k', secret='s', log_fn=_quiet)
+        ps.handle(json.dumps({'op': 'auth', 'success': False, 'ret_msg': 'bad sig'}), lambda m: None)
+        self.assertEqual(ps.stats['auth_failures'], 1)
+        self.assertFalse(ps.connected)
+        ps.handle(json.dumps(_order_msg('x', 'New')), lambda m: None)
+        self.assertEqual(ps.stats['handler_errors'], 1)
+
+
+if __name__ == '__main__':
+    unittest.main()
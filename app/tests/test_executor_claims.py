@@ -0,0 +1,132 @@
+"""
+tests/test_executor_claims.py — execution_queue claims and their lease (in-memory queue).
+
+Covers:
+  1. _claim_eq_items: PENDING rows of the symbol → PICKED by priority, then id
+  2. _process_execution_queue: a PICKED row past CLAIM_LEASE_SEC is EXPIRED
+     (EQ_CLAIM_EXPIRED audit), never re-claimed or processed; a PICKED row
+     inside its lease is left alone until the lease runs out; other symbols
+     are untouched
+"""
+
+import sys
+import os
+import unittest
+from unittest import mock
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+# live_order_executor exits at import without the live-trading opt-in
+os.environ.setdefault('LIVE_TRADING', 'YES_I_UNDERSTAND')
+try:
+    import live_order_executor as loe
+except ImportError:         # ccxt not installed
+    loe = None
+
+NOW = 1_750_000_000.0
+_RETURN_COLS = ('id', 'action_type', 'direction', 'target_qty', 'target_usdt', 'reduce_pct',
+                'reason', 'meta', 'expire_at', 'depends_on', 'priority', 'ts')
+
+
+class QueueCursor:
+    """execution_queue rows in memory; now() is `self.now` (epoch s)."""
+
+    def __init__(self, rows):
+        self.rows = {r['id']: r for r in rows}
+        self.now = NOW
+        self._rows = []
+
+    def execute(self, sql, params=None):
+        q = ' '.join(sql.split())
+        self._rows = []
+        if q.startswith('UPDATE execution_queue q SET status = \'PICKED\''):
+            pending = sorted((r for r in self.rows.values()
+                              if r['symbol'] == params[0] and r['status'] == 'PENDING'),
+                             key=lambda r: (r['priority'], r['id']))[:5]
+            for r in pending:
+                r.update(status='PICKED', claimed_at=self.now)
+            self._rows = [tuple(r.get(c) for c in _RETURN_COLS) for r in pending]
+        elif "status = 'PENDING' AND expire_at IS NOT NULL" in q:
+            hits = [r for r in self.rows.values() if r['symbol'] == params[0]
+                    and r['status'] == 'PENDING' and r.get('expire_at')
+                    and r['expire_at'] < self.now]
+            for r in hits:
+                r['status'] = 'EXPIRED'
+            self._rows = [(r['id'],) for r in hits]
+        elif "status = 'PICKED' AND claimed_at < now() - make_interval(secs => %s)" in q:
+            hits = [r for r in self.rows.values() if r['symbol'] == params[0]
+                    and r['status'] == 'PICKED' and r['claimed_at'] < self.now - params[1]]
+            for r in hits:
+                r['status'] = 'EXPIRED'
+            self._rows = [(r['id'], r['claimed_at']) for r in hits]
+        else:
+            raise AssertionError(f'unexpected query: {q[:80]}')
+
+    def fetchall(self):
+        return list(self._rows)
+
+    def fetchone(self):
+        return self._rows[0] if self._rows else None
+
+
+def _row(eid, status, symbol=None, claimed_ago=None, priority=5):
+    return {'id': eid, 'symbol': symbol or loe.SYMBOL, 'status': status, 'priority': priority,
+            'action_type': 'ADD', 'direction': 'LONG', 'ts': NOW - 600,
+            'claimed_at': None if claimed_ago is None else NOW - claimed_ago}
+
+
+@unittest.skipIf(loe is None, 'live_order_executor needs ccxt')
+class TestClaimLease(unittest.TestCase):
+
+    def setUp(self):
+        self.audits = []
+        self.processed = []
+        for target, value in (
+                ('audit', lambda cur, event, symbol, detail: self.audits.append((event, detail['eq_id']))),
+                ('log', lambda msg: None),
+                ('_process_eq_item', lambda ex, cur, item, *a, **k: self.processed.append(item[0]))):
+            p = mock.patch.object(loe, target, value)
+            p.start()
+            self.addCleanup(p.stop)
+        for target in ('begin', 'finish'):
+            p = mock.patch.object(loe.order_latency, target,
+                                  return_value=mock.Mock(outcome=None))
+            p.start()
+            self.addCleanup(p.stop)
+
+    def _cycle(self, cur):
+        loe._process_execution_queue(None, cur, None, 0)
+
+    def test_claim_order(self):
+        cur = QueueCursor([_row(1, 'PENDING', priority=5), _row(2, 'PENDING', priority=1),
+                           _row(3, 'PENDING', priority=5), _row(4, 'PICKED', claimed_ago=5),
+                           _row(5, 'PENDING', symbol='ETH/USDT:USDT')])
+        claimed = loe._claim_eq_items(cur)
+        self.assertEqual([item[0] for item, _ in claimed], [2, 1, 3])
+        self.assertEqual(claimed[0][1], NOW - 600)
+        self.assertEqual({r['id']: r['status'] for r in cur.rows.values()},
+                         {1: 'PICKED', 2: 'PICKED', 3: 'PICKED', 4: 'PICKED', 5: 'PENDING'})
+
+    def test_expired_lease_reclaimed(self):
+        lease = loe.CLAIM_LEASE_SEC
+        cur = QueueCursor([
+            _row(1, 'PICKED', claimed_ago=lease + 30),                       # abandoned
+            _row(2, 'PICKED', claimed_ago=lease - 30),                       # still leased
+            _row(3, 'PENDING'),
+            _row(4, 'PICKED', symbol='ETH/USDT:USDT', claimed_ago=lease * 10),
+        ])
+        self._cycle(cur)
+        status = lambda: {r['id']: r['status'] for r in cur.rows.values()}
+        self.assertEqual(status(), {1: 'EXPIRED', 2: 'PICKED', 3: 'PICKED', 4: 'PICKED'})
+        self.assertEqual(self.audits, [('EQ_CLAIM_EXPIRED', 1)])
+        self.assertEqual(self.processed, [3])
+
+        cur.now += 60                  # row 2's lease runs out; row 3 was claimed just now
+        self._cycle(cur)
+        self.assertEqual(status(), {1: 'EXPIRED', 2: 'EXPIRED', 3: 'PICKED', 4: 'PICKED'})
+        self.assertEqual(self.audits, [('EQ_CLAIM_EXPIRED', 1), ('EQ_CLAIM_EXPIRED', 2)])
+        self.assertEqual(self.processed, [3])
+
+
+if __name__ == '__main__':
+    unittest.main()
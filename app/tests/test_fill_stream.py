@@ -0,0 +1,211 @@
+"""
+tests/test_fill_stream.py — push-driven fill tracking (no network, no DB).
+
+A local WS stand-in replays a recorded private-stream session through
+PrivateStream, the way fill_watcher wires it.
+
+Covers:
+  1. Replayed session: auth → subscribe → execution / order / position frames
+  2. order + execution merge: no double counting, avg price / fee, statuses
+  3. wait_position(): waits for the post-fill update, times out on stale state
+  4. Dispatcher: per-order dedupe with one coalesced re-run, orders in parallel
+"""
+
+import sys
+import os
+import json
+import threading
+import time
+import unittest
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+from bybit_private_ws import PrivateStream
+from fill_stream import FillTracker, Dispatcher
+
+SYM = 'BTC/USDT:USDT'
+T0 = 1_700_000_000_000
+
+# Recorded private-stream frames (Bybit v5) for one market ENTRY fill, trimmed.
+SESSION = [
+    {'op': 'auth', 'success': True, 'ret_msg': '', 'conn_id': 'c1'},
+    {'op': 'subscribe', 'success': True, 'ret_msg': '', 'conn_id': 'c1'},
+    {'op': 'pong', 'args': ['1700000000000'], 'conn_id': 'c1'},
+    {'topic': 'execution', 'creationTime': T0 + 12, 'data': [
+        {'category': 'linear', 'symbol': 'BTCUSDT', 'orderId': 'o-1', 'execId': 'e-1',
+         'side': 'Buy', 'orderQty': '0.010', 'execQty': '0.004', 'execPrice': '60000',
+         'execValue': '240', 'execFee': '0.132', 'leavesQty': '0.006', 'execTime': str(T0 + 10)},
+        {'category': 'linear', 'symbol': 'BTCUSDT', 'orderId': 'o-1', 'execId': 'e-2',
+         'side': 'Buy', 'orderQty': '0.010', 'execQty': '0.006', 'execPrice': '60010',
+         'execValue': '360.06', 'execFee': '0.198', 'leavesQty': '0', 'execTime': str(T0 + 11)}]},
+    {'topic': 'order', 'creationTime': T0 + 14, 'data': [
+        {'category': 'linear', 'symbol': 'BTCUSDT', 'orderId': 'o-1', 'side': 'Buy',
+         'orderType': 'Market', 'qty': '0.010', 'orderStatus': 'Filled',
+         'cumExecQty': '0.010', 'cumExecValue': '600.06', 'cumExecFee': '0.33',
+         'avgPrice': '60006', 'updatedTime': str(T0 + 11)}]},
+    {'topic': 'position', 'creationTime': T0 + 15, 'data': [
+        {'category': 'linear', 'symbol': 'BTCUSDT', 'side': 'Buy', 'size': '0.010',
+         'entryPrice': '60006', 'updatedTime': str(T0 + 11)}]},
+    {'topic': 'order', 'creationTime': T0 + 20, 'data': [
+        {'category': 'linear', 'symbol': 'ETHUSDT', 'orderId': 'o-eth', 'orderStatus': 'Filled',
+         'cumExecQty': '1', 'updatedTime': str(T0 + 20)}]},
+]
+
+
+def _quiet(msg):
+    pass
+
+
+class ReplaySocket:
+    """Local stand-in for the private WS endpoint: replays recorded frames."""
+
+    def __init__(self, frames):
+        self.frames = [json.dumps(f) for f in frames]
+        self.sent = []
+
+    def send(self, raw):
+        self.sent.append(json.loads(raw))
+
+    def run(self, stream):
+        stream.on_open(self.send)
+        for raw in self.frames:
+            stream.handle(raw, self.send)
+
+
+def _order(oid, status, cum='0', value='0', fee='0', ts=T0):
+    return {'topic': 'order', 'data': [{
+        'symbol': 'BTCUSDT', 'orderId': oid, 'qty': '0.010', 'orderStatus': status,
+        'cumExecQty': cum, 'cumExecValue': value, 'cumExecFee': fee, 'updatedTime': str(ts)}]}
+
+
+def _position(size, side='Buy', ts=T0):
+    return {'topic': 'position', 'data': [
+        {'symbol': 'BTCUSDT', 'side': side, 'size': size, 'updatedTime': str(ts)}]}
+
+
+class TestReplay(unittest.TestCase):
+
+    def test_recorded_session(self):
+        tracker = FillTracker([SYM], log_fn=_quiet)
+        dispatched = []
+        stream = PrivateStream(['order', 'execution', 'position'],
+                               lambda m: dispatched.extend(tracker.handle(m)),
+                               api_key='k', secret='s', on_ready=tracker.mark_ready,
+                               log_fn=_quiet)
+        sock = ReplaySocket(SESSION)
+        sock.run(stream)
+
+        self.assertEqual([m['op'] for m in sock.sent], ['auth', 'subscribe'])
+        self.assertEqual(sock.sent[1]['args'], ['order', 'execution', 'position'])
+        self.assertTrue(stream.connected)
+        self.assertIsNotNone(tracker.ready_at)
+        # Executions dispatch before the order update arrives; ETH is ignored
+        self.assertEqual(dispatched, ['o-1', 'o-1'])
+
+        o = tracker.order('o-1')
+        self.assertEqual(o['status'], 'closed')
+        self.assertAlmostEqual(o['filled'], 0.010)
+        self.assertAlmostEqual(o['average'], 60006.0)
+        self.assertAlmostEqual(o['fee']['cost'], 0.33)
+        self.assertEqual(o['fee']['currency'], 'USDT')
+        self.assertEqual(o['lastUpdateTimestamp'], T0 + 11)
+        self.assertIsNone(tracker.order('o-eth'))
+        self.assertEqual(tracker.wait_position(SYM, T0 + 11, 0), ('long', 0.010))
+
+
+class TestMerge(unittest.TestCase):
+
+    def setUp(self):
+        self.t = FillTracker([SYM], log_fn=_quiet)
+
+    def test_order_then_execution_not_double_counted(self):
+        self.t.handle(_order('o', 'Filled', cum='0.010', value='600', fee='0.33'))
+        self.assertEqual(self.t.handle(SESSION[3] | {'data': [
+            dict(d, orderId='o') for d in SESSION[3]['data']]}), ['o'])
+        o = self.t.order('o')
+        self.assertAlmostEqual(o['filled'], 0.010)
+        self.assertAlmostEqual(o['average'], 60000.0)
+        # Replayed execution ids are ignored
+        self.assertEqual(self.t.handle(SESSION[3] | {'data': [
+            dict(d, orderId='o') for d in SESSION[3]['data']]}), [])
+
+    def test_statuses(self):
+        self.t.handle(_order('p', 'PartiallyFilled', cum='0.004', value='240'))
+        o = self.t.order('p')
+        self.assertEqual((o['status'], o['filled'], o['average']), ('open', 0.004, 60000.0))
+        self.assertEqual(self.t.handle(_order('p', 'PartiallyFilled', cum='0.004', value='240')), [])
+        self.t.handle(_order('p', 'PartiallyFilledCanceled', cum='0.004', value='240'))
+        self.assertEqual(self.t.order('p')['status'], 'canceled')
+        self.t.handle(_order('r', 'Rejected'))
+        self.assertEqual(self.t.order('r')['status'], 'rejected')
+        # A late execution never reopens or overrides a terminal status
+        self.t.handle({'topic': 'execution', 'data': [
+            {'symbol': 'BTCUSDT', 'orderId': 'p', 'execId': 'x', 'execQty': '0',
+             'leavesQty': '0', 'execTime': str(T0)}]})
+        self.assertEqual(self.t.order('p')['status'], 'canceled')
+
+
+class TestWaitPosition(unittest.TestCase):
+
+    def test_waits_for_post_fill_update(self):
+        t = FillTracker([SYM], log_fn=_quiet)
+        t.handle(_position('0', side='', ts=T0 - 5000))
+
+        def _push():
+            time.sleep(0.05)
+            t.handle(_position('0.010', ts=T0 + 3))
+
+        threading.Thread(target=_push).start()
+        t0 = time.time()
+        self.assertEqual(t.wait_position(SYM, T0, 2), ('long', 0.010))
+        self.assertLess(time.time() - t0, 1)
+
+    def test_stale_position_times_out(self):
+        t = FillTracker([SYM], log_fn=_quiet)
+        t.handle(_position('0.010', ts=T0 - 1))
+        self.assertIsNone(t.wait_position(SYM, T0, 0.05))
+        t.handle(_position('0', side='', ts=T0 + 1))
+        self.assertEqual(t.wait_position(SYM, T0, 0), (None, 0))
+        # Out-of-order older update does not overwrite
+        t.handle(_position('0.010', ts=T0 - 1))
+        self.assertEqual(t.position(SYM)[:2], (None, 0))
+
+
+class TestDispatcher(unittest.TestCase):
+
+    def test_dedupe_and_parallel(self):
+        d = Dispatcher(workers=2, log_fn=_quiet)
+        release = threading.Event()
+        started = {'a': threading.Event(), 'b': threading.Event()}
+        runs = []
+
+        def work(key):
+            runs.append(key)
+            started[key].set()
+            release.wait(2)
+
+        self.assertTrue(d.submit('a', work, 'a'))
+        self.assertTrue(started['a'].wait(1))
+        self.assertFalse(d.submit('a', work, 'a'))
+        self.assertFalse(d.submit('a', work, 'a'))
+        # 'b' runs while 'a' is blocked
+        d.submit('b', work, 'b')
+        self.assertTrue(started['b'].wait(1))
+        release.set()
+        d.shutdown()
+        self.assertEqual(sorted(runs), ['a', 'a', 'b'])
+        self.assertEqual(d.stats['coalesced'], 2)
+        self.assertFalse(d.busy('a'))
+
+    def test_errors_counted(self):
+        d = Dispatcher(workers=1, log_fn=_quiet)
+        import io
+        from contextlib import redirect_stderr
+        with redirect_stderr(io.StringIO()):
+            d.submit('x', lambda: 1 / 0)
+            d.shutdown()
+        self.assertEqual(d.stats['errors'], 1)
+
+
+if __name__ == '__main__':
+    unittest.main()
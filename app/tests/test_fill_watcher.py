@@ -0,0 +1,196 @@
+"""
+tests/test_fill_watcher.py — per-symbol serialization of fill handlers (in-memory DB).
+
+Covers:
+  1. Two workers handling orders of the same symbol at once: the
+     position_state row lock (_lock_position_state) admits one at a time,
+     the other waits for its commit
+  2. REVERSE pair processed open-first: the REVERSE_OPEN is left untouched
+     while its REVERSE_CLOSE is pending (_reverse_close_pending), and its
+     handler runs only after the close's
+"""
+
+import sys
+import os
+import threading
+import time
+import unittest
+from unittest import mock
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+try:
+    import fill_watcher
+except ImportError:         # ccxt not installed
+    fill_watcher = None
+
+_COLS = [c.strip() for c in
+         'id, order_id, order_type, direction, signal_id, decision_id, close_reason, '
+         'requested_qty, ticker_price, status, order_sent_at, poll_count, symbol, '
+         'source_queue, execution_queue_id'.split(',')]
+_OPEN = ('SENT', 'PARTIALLY_FILLED')
+
+
+class FakeDB:
+    """execution_log rows by id + the position_state row lock."""
+
+    def __init__(self):
+        self.rows = {}
+        self.row_lock = threading.Lock()
+        self.holders = 0
+        self.max_holders = 0
+        self.waits = 0
+        self.mu = threading.Lock()
+
+    def add(self, eid, order_id, order_type, direction='LONG'):
+        self.rows[eid] = {'id': eid, 'order_id': order_id, 'order_type': order_type,
+                          'direction': direction, 'status': 'SENT', 'poll_count': 0,
+                          'symbol': fill_watcher.SYMBOL}
+
+    def connect(self):
+        return FakeConn(self)
+
+
+class FakeConn:
+    def __init__(self, db):
+        self.db = db
+        self.autocommit = True
+        self.locked = False
+
+    def cursor(self):
+        return FakeCursor(self)
+
+    def _release(self):
+        if self.locked:
+            self.locked = False
+            with self.db.mu:
+                self.db.holders -= 1
+            self.db.row_lock.release()
+
+    def commit(self):
+        self._release()
+
+    def rollback(self):
+        self._release()
+
+    def close(self):
+        self._release()
+
+
+class FakeCursor:
+    def __init__(self, conn):
+        self.conn = conn
+        self.db = conn.db
+        self._rows = []
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+    def execute(self, sql, params=None):
+        q = ' '.join(sql.split())
+        rows = self.db.rows
+        self._rows = []
+        if q.startswith('SELECT 1 FROM position_state') and 'FOR UPDATE' in q:
+            if not self.conn.locked:
+                if not self.db.row_lock.acquire(blocking=False):
+                    with self.db.mu:
+                        self.db.waits += 1
+                    self.db.row_lock.acquire()
+                self.conn.locked = True
+                with self.db.mu:
+                    self.db.holders += 1
+                    self.db.max_holders = max(self.db.max_holders, self.db.holders)
+        elif q.startswith('SELECT id, order_id') and 'WHERE order_id = %s' in q:
+            hits = sorted((r for r in rows.values()
+                           if r['order_id'] == params[0] and r['status'] in _OPEN),
+                          key=lambda r: r['id'])
+            self._rows = [tuple(r.get(c) for c in _COLS) for r in hits[:1]]
+        elif "order_type = 'REVERSE_CLOSE' AND id < %s" in q:
+            self._rows = [(1,) for r in rows.values() if r['order_type'] == 'REVERSE_CLOSE'
+                          and r['id'] < params[0] and r['status'] in _OPEN][:1]
+        elif q.startswith('UPDATE execution_log SET poll_count'):
+            rows[params[1]]['poll_count'] = params[0]
+        elif q.startswith("UPDATE execution_log SET status = 'CANCELED'"):
+            rows[params[0]]['status'] = 'CANCELED'
+        elif q.startswith("UPDATE execution_log SET status = 'FILLED'"):
+            rows[params[-1]]['status'] = 'FILLED'
+
+    def fetchone(self):
+        return self._rows[0] if self._rows else None
+
+    def fetchall(self):
+        return list(self._rows)
+
+
+@unittest.skipIf(fill_watcher is None, 'fill_watcher needs ccxt')
+class TestFillSerialization(unittest.TestCase):
+
+    def setUp(self):
+        self.db = FakeDB()
+        self.fetched = []
+        self.handled = []
+        self.fetch_state = lambda ex, oid, sym, sent_at, elapsed: {'status': 'closed', 'filled': 0.01}
+        for target, value in (
+                ('db_conn', self.db.connect),
+                ('_worker_exchange', lambda: object()),
+                ('_fetch_order_state', self._fetch),
+                ('_send_telegram', lambda text=None: time.sleep(0.05)),
+                ('_update_eq_status', lambda cur, eq_id, status: None),
+                ('_handle_reverse_close_filled', self._handler('REVERSE_CLOSE')),
+                ('_handle_reverse_open_filled', self._handler('REVERSE_OPEN')),
+                ('log', lambda msg: None)):
+            p = mock.patch.object(fill_watcher, target, value)
+            p.start()
+            self.addCleanup(p.stop)
+
+    def _fetch(self, ex, order_id, sym, sent_at, elapsed):
+        self.fetched.append(order_id)
+        return self.fetch_state(ex, order_id, sym, sent_at, elapsed)
+
+    def _handler(self, name):
+        def handle(ex, cur, eid, *args):
+            fill_watcher._lock_position_state(cur)
+            self.handled.append(name)
+        return handle
+
+    def test_concurrent_claimers_serialized(self):
+        self.db.add(1, 'o1', 'ENTRY')
+        self.db.add(2, 'o2', 'EXIT')
+        both_fetched = threading.Barrier(2, timeout=5)
+
+        def canceled(ex, order_id, sym, sent_at, elapsed):
+            both_fetched.wait()       # both workers reach the row lock together
+            return {'status': 'canceled'}
+        self.fetch_state = canceled
+        workers = [threading.Thread(target=fill_watcher._process_claimed, args=(oid,))
+                   for oid in ('o1', 'o2')]
+        for t in workers:
+            t.start()
+        for t in workers:
+            t.join(5)
+        self.assertEqual([self.db.rows[i]['status'] for i in (1, 2)], ['CANCELED', 'CANCELED'])
+        self.assertEqual(self.db.max_holders, 1)
+        self.assertEqual(self.db.waits, 1)
+        self.assertEqual(self.db.holders, 0)
+
+    def test_reverse_open_waits_for_close(self):
+        self.db.add(10, 'close', 'REVERSE_CLOSE', direction='LONG')
+        self.db.add(11, 'open', 'REVERSE_OPEN', direction='SHORT')
+
+        fill_watcher._process_claimed('open')
+        self.assertEqual(self.fetched, [])
+        self.assertEqual((self.db.rows[11]['status'], self.db.rows[11]['poll_count']), ('SENT', 0))
+
+        fill_watcher._process_claimed('close')
+        fill_watcher._process_claimed('open')
+        self.assertEqual(self.fetched, ['close', 'open'])
+        self.assertEqual(self.handled, ['REVERSE_CLOSE', 'REVERSE_OPEN'])
+        self.assertEqual([self.db.rows[i]['status'] for i in (10, 11)], ['FILLED', 'FILLED'])
+        self.assertEqual(self.db.holders, 0)
+
+
+if __name__ == '__main__':
+    unittest.main()
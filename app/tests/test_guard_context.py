@@ -0,0 +1,216 @@
+"""
+tests/test_guard_context.py — guard_context prefetch + pure guards (no DB).
+
+Covers:
+  1. load(): two queries, fills / ADDs / closes / signals parsed
+  2. Close-based guards: post-close, post-SL ban, stop-loss, loss streak,
+     consecutive same-direction losses, same-dir re-entry, mode results
+  3. ADD rate limits and hourly entry count
+  4. Candle guards: impulse ban, anti-chase move
+  5. autopilot_daemon wrappers use ctx without touching the cursor
+  6. GuardLog records verdicts / timings and perf_trace 'guard:*' spans
+"""
+
+import sys
+import os
+import unittest
+from unittest import mock
+from unittest.mock import MagicMock
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+import guard_context
+import perf_trace
+from guard_context import Fill, GuardContext, GuardLog
+
+SYM = 'BTC/USDT:USDT'
+NOW = 1_800_000_000.0
+
+
+def _close(ago, pnl, direction='LONG', otype='CLOSE', symbol=SYM, regime=None):
+    return Fill(symbol, otype, direction, pnl, NOW - ago, NOW - ago, regime, True)
+
+
+def _ctx(fills=(), **kw):
+    fills = tuple(sorted(fills, key=lambda r: r.ts, reverse=True))
+    return GuardContext(symbol=SYM, now=NOW, fills=fills, **kw)
+
+
+class _NoQueryCursor:
+    def execute(self, *a, **k):
+        raise AssertionError('guard queried the DB despite ctx')
+
+
+class TestLoad(unittest.TestCase):
+
+    def test_two_queries(self):
+        cur = MagicMock()
+        cur.fetchall.return_value = [
+            ('fill', SYM, 'CLOSE', 'LONG', -5, NOW - 60, NOW - 61, 'STATIC_RANGE', True),
+            ('fill', SYM, 'OPEN', 'LONG', None, NOW - 600, NOW - 600, None, False),
+            ('add', SYM, 'ADD', 'LONG', None, None, NOW - 100, None, False),
+        ]
+        cur.fetchone.return_value = (NOW, [101.0, 100.0], 99.5,
+                                     {'autopilot:signal:BTC/USDT:USDT:LONG': NOW - 30})
+        ctx = guard_context.load(cur, SYM)
+        self.assertEqual(cur.execute.call_count, 2)
+        self.assertEqual([f.order_type for f in ctx.fills], ['CLOSE', 'OPEN'])
+        self.assertTrue(ctx.fills[0].is_loss)
+        self.assertEqual(ctx.adds, (NOW - 100,))
+        self.assertEqual(ctx.closes_1m, (101.0, 100.0))
+        self.assertEqual(ctx.mark_price, 99.5)
+        self.assertEqual(guard_context.signal_age(ctx, 'autopilot:signal:BTC/USDT:USDT:LONG'), 30)
+        self.assertIsNone(guard_context.signal_age(ctx, 'other'))
+
+
+class TestCloseGuards(unittest.TestCase):
+
+    def test_post_close(self):
+        self.assertEqual(guard_context.post_close_cooldown(_ctx()), (True, '', 0))
+        ok, reason, rem = guard_context.post_close_cooldown(_ctx([_close(100, -3)]))
+        self.assertFalse(ok)
+        self.assertIn('POST_SL_COOLDOWN', reason)
+        self.assertEqual(rem, 500)
+        ok, reason, _ = guard_context.post_close_cooldown(_ctx([_close(100, 3)]))
+        self.assertIn('POST_TP_COOLDOWN', reason)
+        self.assertTrue(guard_context.post_close_cooldown(_ctx([_close(200, 3)]))[0])
+        # Other symbols ignored
+        self.assertTrue(guard_context.post_close_cooldown(
+            _ctx([_close(100, -3, symbol='ETH/USDT:USDT')]))[0])
+
+    def test_post_sl_ban_and_same_dir_sl(self):
+        ctx = _ctx([_close(60, -1, direction='long')])
+        self.assertFalse(guard_context.post_sl_ban(ctx)[0])
+        self.assertEqual(guard_context.sl_cooldown_same_dir(ctx, 'LONG', 600), (False, 540))
+        self.assertTrue(guard_context.sl_cooldown_same_dir(ctx, 'SHORT', 600)[0])
+        self.assertTrue(guard_context.post_sl_ban(_ctx([_close(700, -1)]))[0])
+
+    def test_stop_loss_cooldown(self):
+        one = _ctx([_close(100, -1)])
+        self.assertTrue(guard_context.stop_loss_cooldown(one, 3600, 2, 1800)[0])
+        two = _ctx([_close(100, -1, otype='REDUCE'), _close(900, -2)])
+        ok, reason, rem = guard_context.stop_loss_cooldown(two, 3600, 2, 1800)
+        self.assertFalse(ok)
+        self.assertIn('stops=2', reason)
+        self.assertEqual(rem, 1700)
+
+    def test_loss_streak(self):
+        fills = [_close(60, -1), _close(120, -2), _close(180, -3), _close(240, 5)]
+        ctx = _ctx(fills)
+        self.assertEqual(guard_context.loss_streak(ctx, 3), 3)
+        ok, reason = guard_context.loss_streak_cooldown(ctx, 3, 1200, 3)
+        self.assertFalse(ok)
+        self.assertIn('LOSS_STREAK_COOLDOWN', reason)
+        # Too few closes in the window → no cooldown
+        self.assertTrue(guard_context.loss_streak_cooldown(_ctx(fills[:2]), 3, 1200, 3)[0])
+        # Streak broken by a win
+        self.assertTrue(guard_context.loss_streak_cooldown(
+            _ctx([_close(30, 1)] + fills), 3, 1200, 3)[0])
+
+    def test_consec_loss(self):
+        ctx = _ctx([_close(60, -1), _close(600, -2)])
+        self.assertFalse(guard_context.consec_loss_cooldown(ctx, 'LONG', 45)[0])
+        self.assertTrue(guard_context.consec_loss_cooldown(ctx, 'SHORT', 45)[0])
+        self.assertTrue(guard_context.consec_loss_cooldown(ctx, 'LONG', 1)[0])
+
+    def test_same_dir_reentry_and_regime_results(self):
+        ctx = _ctx([_close(100, 2, regime='STATIC_RANGE'), _close(5000, -1, regime='STATIC_RANGE'),
+                    _close(90000, -1, regime='STATIC_RANGE')])
+        self.assertEqual(guard_context.same_dir_reentry(ctx, 'LONG', 600), (False, 500))
+        self.assertTrue(guard_context.same_dir_reentry(ctx, 'SHORT', 600)[0])
+        self.assertEqual(guard_context.regime_results(ctx, 'STATIC_RANGE'), (2, 1))
+
+
+class TestAddAndEntryCounts(unittest.TestCase):
+
+    def test_add_limits(self):
+        ctx = _ctx(adds=(NOW - 100, NOW - 1000, NOW - 1700, NOW - 2000))
+        self.assertEqual(guard_context.add_interval(ctx, 300), (False, 200))
+        self.assertEqual(guard_context.adds_per_30m(ctx, 3), (False, 3, 3))
+        self.assertEqual(guard_context.adds_per_30m(ctx, 4), (True, 3, 4))
+        self.assertEqual(guard_context.add_interval(_ctx(), 300), (True, 0))
+
+    def test_entries_last_hour(self):
+        opens = [Fill(SYM, 'OPEN', 'LONG', None, NOW - s, NOW - s) for s in (60, 1200, 4000)]
+        self.assertEqual(guard_context.entries_last_hour(_ctx(opens)), 2)
+
+
+class TestCandleGuards(unittest.TestCase):
+
+    def test_impulse(self):
+        calm = _ctx(closes_1m=(100.5, 100.2, 100.0, 100.1, 100.0))
+        self.assertEqual(guard_context.impulse_ban_sec(calm, 'LONG'), 0)
+        crash = _ctx(closes_1m=(98.0, 99.0, 99.5, 100.0, 100.0))
+        self.assertEqual(guard_context.impulse_ban_sec(crash, 'SHORT'), 1200)
+        self.assertEqual(guard_context.impulse_ban_sec(crash, 'LONG'), 600)
+
+    def test_chase(self):
+        ctx = _ctx(closes_1m=(100.3, 100.0, 100.0, 100.0, 100.0, 100.0))
+        self.assertIn('ret_1m', guard_context.chase_move(ctx, 0.25, 0.6))
+        ctx = _ctx(closes_1m=(100.7, 100.5, 100.3, 100.2, 100.1, 100.0))
+        self.assertIn('ret_5m', guard_context.chase_move(ctx, 0.25, 0.6))
+        self.assertEqual(guard_context.chase_move(_ctx(closes_1m=(100.0,)), 0.25, 0.6), '')
+
+
+class TestAutopilotWrappers(unittest.TestCase):
+
+    def setUp(self):
+        import autopilot_daemon
+        self.ap = autopilot_daemon
+        self.ap._impulse_ban_until = 0
+        self.cur = _NoQueryCursor()
+
+    def tearDown(self):
+        self.ap._impulse_ban_until = 0
+
+    def test_wrappers_use_ctx(self):
+        ctx = _ctx([_close(100, -3)], adds=(NOW - 100,), closes_1m=(100.0, 100.0))
+        ap = self.ap
+        self.assertFalse(ap._check_post_close_cooldown(self.cur, SYM, ctx=ctx)[0])
+        self.assertFalse(ap._check_post_sl_opposite_ban(self.cur, SYM, ctx=ctx)[0])
+        self.assertTrue(ap._check_consec_loss_cooldown(self.cur, 'LONG', {}, ctx=ctx)[0])
+        self.assertFalse(ap._check_add_interval(self.cur, {}, ctx=ctx)[0])
+        self.assertTrue(ap._check_adds_per_30m(self.cur, {}, ctx=ctx)[0])
+        self.assertFalse(ap._check_same_dir_reentry_cooldown(self.cur, 'LONG', {}, ctx=ctx)[0])
+        self.assertTrue(ap._check_impulse_ban(self.cur, 'LONG', ctx=ctx)[0])
+        self.assertTrue(ap._check_stop_loss_cooldown(self.cur, SYM, ctx=ctx)[0])
+
+    def test_zone_reentry_uses_ctx_price(self):
+        ctx = _ctx([_close(100, -3)], mark_price=95.0)
+        regime_ctx = {'regime': 'RANGE', 'poc': 100.0}
+        ok, reason = self.ap._check_zone_reentry_ban(self.cur, SYM, 'LONG', regime_ctx, ctx=ctx)
+        self.assertFalse(ok)
+        self.assertIn('ZONE_REENTRY_BAN', reason)
+
+    def test_repeat_cooldown_from_ctx(self):
+        key = f'autopilot:signal:{SYM}:LONG'
+        ctx = _ctx(signals={key: NOW - 100})
+        self.assertEqual(self.ap._is_in_repeat_cooldown(self.cur, SYM, 'LONG', ctx=ctx),
+                         (True, self.ap.REPEAT_SIGNAL_COOLDOWN_SEC - 100))
+        self.assertEqual(self.ap._is_in_repeat_cooldown(self.cur, SYM, 'SHORT', ctx=ctx), (False, 0))
+
+
+class TestGuardLog(unittest.TestCase):
+
+    def test_verdicts_and_spans(self):
+        t = perf_trace.Tracer('t', enabled=True, log_fn=lambda m: None)
+        glog = GuardLog()
+        with t.cycle():
+            self.assertEqual(glog.check('a', lambda: (True, '')), (True, ''))
+            glog.check('b', lambda x: (False, x, 3), 'blocked')
+        self.assertEqual([(n, ok, detail) for n, ok, detail, _ in glog.entries],
+                         [('a', True, ('',)), ('b', False, ('blocked', 3))])
+        self.assertEqual(glog.blocked(), 'b')
+        self.assertIn('b=BLOCK', glog.summary())
+        s = t.summary()
+        self.assertEqual(s['cycle/guard:a']['counters'], {'pass': 1})
+        self.assertEqual(s['cycle/guard:b']['counters'], {'block': 1})
+
+    def test_outside_cycle(self):
+        glog = GuardLog()
+        glog.check('a', lambda: (True, 0))
+        self.assertIsNone(glog.blocked())
+
+
+if __name__ == '__main__':
+    unittest.main()
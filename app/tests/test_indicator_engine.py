@@ -0,0 +1,109 @@
+"""
+tests/test_indicator_engine.py — IndicatorEngine vs full recompute equivalence.
+
+Covers:
+  1. Closed bars: every indicator matches compute_full over the same history
+  2. Intra-bar revisions: re-feeding the open bar matches a recompute of the revision
+  3. VWAP resets at UTC midnight
+  4. Long runs past the rolling-sum resync keep matching
+  5. Out-of-order (older) bars are ignored
+"""
+
+import sys
+import os
+import random
+import unittest
+from datetime import datetime, timedelta, timezone
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+from indicator_engine import IndicatorEngine, compute_full
+
+
+def _make_rows(n, start=None, seed=7):
+    """Random-walk 1m candles around 100k."""
+    rng = random.Random(seed)
+    ts = start or datetime(2026, 2, 10, 20, 0, tzinfo=timezone.utc)
+    price = 100000.0
+    rows = []
+    for _ in range(n):
+        o = price
+        c = o + rng.gauss(0, 40)
+        h = max(o, c) + abs(rng.gauss(0, 15))
+        l = min(o, c) - abs(rng.gauss(0, 15))
+        v = abs(rng.gauss(50, 20))
+        rows.append((ts, o, h, l, c, v))
+        price = c
+        ts += timedelta(minutes=1)
+    return rows
+
+
+class TestIndicatorEngine(unittest.TestCase):
+
+    def assertValuesMatch(self, got, want, ctx=''):
+        self.assertEqual(set(got), set(want))
+        for k, w in want.items():
+            g = got[k]
+            if w is None or isinstance(w, (bool, datetime)):
+                self.assertEqual(g, w, f'{k} {ctx}')
+            else:
+                self.assertAlmostEqual(g, w, delta=max(abs(w), 1.0) * 1e-9,
+                                       msg=f'{k} {ctx}')
+
+    # ── Test 1: closed bars ──
+    def test_matches_full_recompute(self):
+        rows = _make_rows(400)
+        eng = IndicatorEngine()
+        for i, r in enumerate(rows):
+            vals = eng.update(*r)
+            if i + 1 >= 20:
+                self.assertValuesMatch(vals, compute_full(rows[:i + 1]), f'bar={i}')
+        self.assertEqual(eng.bar_count, 400)
+
+    # ── Test 2: intra-bar revisions ──
+    def test_intrabar_revision(self):
+        rows = _make_rows(260, seed=11)
+        eng = IndicatorEngine()
+        eng.seed(rows[:-1])
+        ts, o, h, l, c, v = rows[-1]
+        for frac in (0.2, 0.5, 1.0):
+            partial = (ts, o, max(o, o + (h - o) * frac), min(o, o - (o - l) * frac),
+                       o + (c - o) * frac, v * frac)
+            vals = eng.update(*partial)
+            self.assertValuesMatch(vals, compute_full(rows[:-1] + [partial]),
+                                   f'frac={frac}')
+        self.assertEqual(eng.closed_count, 259)
+
+    # ── Test 3: VWAP daily reset ──
+    def test_vwap_resets_at_utc_midnight(self):
+        start = datetime(2026, 2, 10, 23, 50, tzinfo=timezone.utc)
+        rows = _make_rows(30, start=start)
+        eng = IndicatorEngine()
+        vals = eng.seed(rows[:11])   # last bar is 00:00
+        _, _, h, l, c, _ = rows[10]
+        self.assertAlmostEqual(vals['vwap'], (h + l + c) / 3, places=6)
+        vals = eng.update(*rows[20])
+        self.assertAlmostEqual(vals['vwap'], compute_full(rows[:11] + [rows[20]])['vwap'],
+                               places=6)
+
+    # ── Test 4: long run past resync ──
+    def test_long_run_past_resync(self):
+        rows = _make_rows(2600, seed=3)
+        eng = IndicatorEngine()
+        for i, r in enumerate(rows):
+            vals = eng.update(*r)
+            if i >= 200 and i % 250 == 0:
+                self.assertValuesMatch(vals, compute_full(rows[:i + 1]), f'bar={i}')
+
+    # ── Test 5: out-of-order bar ignored ──
+    def test_older_bar_ignored(self):
+        rows = _make_rows(60)
+        eng = IndicatorEngine()
+        eng.seed(rows)
+        self.assertIsNone(eng.update(*rows[10]))
+        self.assertEqual(eng.last_ts, rows[-1][0])
+        self.assertValuesMatch(eng.current(), compute_full(rows))
+
+
+if __name__ == '__main__':
+    unittest.main()
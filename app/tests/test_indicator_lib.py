@@ -0,0 +1,261 @@
+"""
+tests/test_indicator_lib.py — indicator_lib equivalence with the implementations it replaced.
+
+The _legacy_* helpers below are verbatim copies of the pure-Python code that
+used to live in indicators.py / market_snapshot.py, market_context/adx_calculator.py
+and strategy/common/features.py.
+
+Covers:
+  1. latest_indicators == old indicators/market_snapshot block (BB/Ichimoku/RSI/ATR/MA/EMA/VWAP)
+  2. adx == market_context adx_calculator (exact, incl. +DI/-DI)
+  3. adx vs old indicators._compute_adx: converges (seed DX only differs)
+  4. Batch arrays agree with *_last at every index
+  5. volume z-score / realized vol == strategy features helpers
+"""
+
+import sys
+import os
+import math
+import random
+import unittest
+from datetime import datetime, timedelta, timezone
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+import indicator_lib as il
+
+
+def _make_rows(n, seed=9, start=None):
+    rng = random.Random(seed)
+    ts = start or datetime(2026, 2, 10, 21, 0, tzinfo=timezone.utc)
+    price = 100000.0
+    rows = []
+    for _ in range(n):
+        o = price
+        c = o + rng.gauss(0, 40)
+        h = max(o, c) + abs(rng.gauss(0, 15))
+        l = min(o, c) - abs(rng.gauss(0, 15))
+        rows.append((ts, o, h, l, c, abs(rng.gauss(50, 20))))
+        price = c
+        ts += timedelta(minutes=1)
+    return rows
+
+
+# ── Legacy implementations ───────────────────────────────
+
+def _sma(xs):
+    return sum(xs) / len(xs)
+
+
+def _legacy_ema(xs, period):
+    if len(xs) < period:
+        return None
+    multiplier = 2 / (period + 1)
+    ema_val = _sma(xs[:period])
+    for price in xs[period:]:
+        ema_val = (price - ema_val) * multiplier + ema_val
+    return ema_val
+
+
+def _legacy_snapshot(rows):
+    closes = [float(r[4]) for r in rows]
+    highs = [float(r[2]) for r in rows]
+    lows = [float(r[3]) for r in rows]
+    vols = [float(r[5]) for r in rows]
+    win = closes[-20:]
+    mid = _sma(win)
+    sd = (sum((x - mid) ** 2 for x in win) / 20) ** 0.5
+    tenkan = (max(highs[-9:]) + min(lows[-9:])) / 2
+    kijun = (max(highs[-26:]) + min(lows[-26:])) / 2
+    span_b = (max(highs[-52:]) + min(lows[-52:])) / 2
+    vol_ma20 = _sma(vols[-20:])
+    deltas = [closes[i] - closes[i - 1] for i in range(1, len(closes))]
+    recent = deltas[-14:]
+    avg_gain = sum(d if d > 0 else 0 for d in recent) / 14
+    avg_loss = sum(-d if d < 0 else 0 for d in recent) / 14
+    rsi_14 = 100 - 100 / (1 + avg_gain / avg_loss) if avg_loss > 0 else 100.0
+    trs = []
+    for i in range(-14, 0):
+        trs.append(max(highs[i] - lows[i], abs(highs[i] - closes[i - 1]),
+                       abs(lows[i] - closes[i - 1])))
+    day = rows[-1][0].astimezone(timezone.utc).date()
+    cum_vp = cum_vol = 0.0
+    for r in rows:
+        if r[0].astimezone(timezone.utc).date() == day:
+            cum_vp += (float(r[2]) + float(r[3]) + float(r[4])) / 3 * float(r[5])
+            cum_vol += float(r[5])
+    return {
+        'ts': rows[-1][0],
+        'bb_mid': mid, 'bb_up': mid + 2 * sd, 'bb_dn': mid - 2 * sd,
+        'ich_tenkan': tenkan, 'ich_kijun': kijun,
+        'ich_span_a': (tenkan + kijun) / 2, 'ich_span_b': span_b,
+        'vol': vols[-1], 'vol_ma20': vol_ma20, 'vol_spike': vols[-1] > vol_ma20 * 2,
+        'rsi_14': rsi_14, 'atr_14': sum(trs) / 14,
+        'ma_50': _sma(closes[-50:]) if len(closes) >= 50 else None,
+        'ma_200': _sma(closes[-200:]) if len(closes) >= 200 else None,
+        'ema_9': _legacy_ema(closes, 9), 'ema_21': _legacy_ema(closes, 21),
+        'ema_50': _legacy_ema(closes, 50),
+        'vwap': cum_vp / cum_vol if cum_vol > 0 else None,
+    }
+
+
+def _legacy_adx_calculator(candles, period=14):
+    n = len(candles)
+    if n < period + 1:
+        return None
+    plus_dm, minus_dm, tr_list = [], [], []
+    for i in range(1, n):
+        high, low = candles[i]['h'], candles[i]['l']
+        prev_high, prev_low, prev_close = candles[i - 1]['h'], candles[i - 1]['l'], candles[i - 1]['c']
+        up_move = high - prev_high
+        down_move = prev_low - low
+        plus_dm.append(up_move if up_move > down_move and up_move > 0 else 0)
+        minus_dm.append(down_move if down_move > up_move and down_move > 0 else 0)
+        tr_list.append(max(high - low, abs(high - prev_close), abs(low - prev_close)))
+    if len(tr_list) < period:
+        return None
+    s_pdm, s_mdm, s_tr = sum(plus_dm[:period]), sum(minus_dm[:period]), sum(tr_list[:period])
+    pdis, mdis, dxs = [], [], []
+
+    def _di():
+        pdi = 100 * s_pdm / s_tr if s_tr > 0 else 0
+        mdi = 100 * s_mdm / s_tr if s_tr > 0 else 0
+        pdis.append(pdi)
+        mdis.append(mdi)
+        dxs.append(100 * abs(pdi - mdi) / (pdi + mdi) if pdi + mdi > 0 else 0)
+
+    _di()
+    for i in range(period, len(tr_list)):
+        s_pdm = s_pdm - (s_pdm / period) + plus_dm[i]
+        s_mdm = s_mdm - (s_mdm / period) + minus_dm[i]
+        s_tr = s_tr - (s_tr / period) + tr_list[i]
+        _di()
+    if len(dxs) < period:
+        return None
+    adx = sum(dxs[:period]) / period
+    for i in range(period, len(dxs)):
+        adx = (adx * (period - 1) + dxs[i]) / period
+    return {'adx': round(adx, 2), 'plus_di': round(pdis[-1], 2), 'minus_di': round(mdis[-1], 2)}
+
+
+def _legacy_indicators_adx(highs, lows, closes, period=14):
+    if len(highs) < period * 2 + 1:
+        return None
+    plus_dm, minus_dm, tr_list = [], [], []
+    for i in range(1, len(highs)):
+        h_diff = highs[i] - highs[i - 1]
+        l_diff = lows[i - 1] - lows[i]
+        plus_dm.append(h_diff if h_diff > l_diff and h_diff > 0 else 0)
+        minus_dm.append(l_diff if l_diff > h_diff and l_diff > 0 else 0)
+        tr_list.append(max(highs[i] - lows[i], abs(highs[i] - closes[i - 1]),
+                           abs(lows[i] - closes[i - 1])))
+    atr = sum(tr_list[:period]) / period
+    p_s = sum(plus_dm[:period]) / period
+    m_s = sum(minus_dm[:period]) / period
+    dx_list = []
+    for i in range(period, len(tr_list)):
+        atr = (atr * (period - 1) + tr_list[i]) / period
+        p_s = (p_s * (period - 1) + plus_dm[i]) / period
+        m_s = (m_s * (period - 1) + minus_dm[i]) / period
+        pdi = 100 * p_s / atr if atr > 0 else 0
+        mdi = 100 * m_s / atr if atr > 0 else 0
+        dx_list.append(100 * abs(pdi - mdi) / (pdi + mdi) if pdi + mdi > 0 else 0)
+    if len(dx_list) < period:
+        return None
+    adx = sum(dx_list[:period]) / period
+    for i in range(period, len(dx_list)):
+        adx = (adx * (period - 1) + dx_list[i]) / period
+    return adx
+
+
+def _legacy_volume_z(volumes_desc):
+    current = volumes_desc[0]
+    hist = volumes_desc[1:]
+    mean = sum(hist) / len(hist)
+    variance = sum((v - mean) ** 2 for v in hist) / len(hist)
+    stdev = math.sqrt(variance) if variance > 0 else 0
+    if stdev == 0:
+        return 0.0
+    return (current - mean) / stdev
+
+
+def _legacy_vol_pct(closes_desc):
+    returns = [math.log(closes_desc[i] / closes_desc[i + 1])
+               for i in range(len(closes_desc) - 1)]
+    mean_r = sum(returns) / len(returns)
+    return math.sqrt(sum((r - mean_r) ** 2 for r in returns) / len(returns)) * 100
+
+
+class TestIndicatorLib(unittest.TestCase):
+
+    def assertClose(self, got, want, rel=1e-9, msg=''):
+        if want is None:
+            self.assertIsNone(got, msg)
+        else:
+            self.assertAlmostEqual(got, want, delta=max(abs(want), 1.0) * rel, msg=msg)
+
+    # ── Test 1: full snapshot ──
+    def test_latest_indicators_matches_legacy(self):
+        rows = _make_rows(300)   # spans UTC midnight
+        for end in (60, 181, 300):
+            got = il.latest_indicators(rows[:end])
+            want = _legacy_snapshot(rows[:end])
+            for k, w in want.items():
+                if isinstance(w, (bool, datetime)):
+                    self.assertEqual(got[k], w, k)
+                else:
+                    self.assertClose(got[k], w, msg=f'{k} end={end}')
+
+    # ── Test 2: ADX vs adx_calculator ──
+    def test_adx_matches_adx_calculator(self):
+        rows = _make_rows(60, seed=2)
+        candles = [{'h': r[2], 'l': r[3], 'c': r[4]} for r in rows]
+        want = _legacy_adx_calculator(candles)
+        got = il.adx_last([r[2] for r in rows], [r[3] for r in rows], [r[4] for r in rows])
+        for k in ('adx', 'plus_di', 'minus_di'):
+            self.assertAlmostEqual(round(got[k], 2), want[k], places=6, msg=k)
+        # Too short for ADX but long enough for DI
+        self.assertIsNone(il.adx_last([1.0] * 20, [0.5] * 20, [0.8] * 20))
+
+    # ── Test 3: ADX vs old indicators._compute_adx ──
+    def test_adx_converges_to_old_indicators_variant(self):
+        rows = _make_rows(400, seed=4)
+        h, l, c = [r[2] for r in rows], [r[3] for r in rows], [r[4] for r in rows]
+        self.assertAlmostEqual(il.adx_last(h, l, c)['adx'],
+                               _legacy_indicators_adx(h, l, c), delta=1e-6)
+
+    # ── Test 4: batch vs last ──
+    def test_batch_matches_last(self):
+        rows = _make_rows(120, seed=6)
+        _, _o, h, l, c, _v = il.ohlcv_arrays(rows)
+        rsi = il.rsi(c, 14)
+        atr = il.atr(h, l, c, 14)
+        ema = il.ema(c, 21)
+        adx = il.adx(h, l, c, 14)[0]
+        for i in (14, 15, 40, 119):
+            self.assertClose(il.rsi_last(c[:i + 1]), _nan_none(rsi[i]), msg=f'rsi {i}')
+            self.assertClose(il.atr_last(h[:i + 1], l[:i + 1], c[:i + 1]),
+                             _nan_none(atr[i]), msg=f'atr {i}')
+            self.assertClose(_legacy_ema(c[:i + 1].tolist(), 21), _nan_none(ema[i]),
+                             msg=f'ema {i}')
+            res = il.adx_last(h[:i + 1], l[:i + 1], c[:i + 1])
+            self.assertClose(res['adx'] if res else None, _nan_none(adx[i]), msg=f'adx {i}')
+        self.assertIsNone(_nan_none(rsi[13]))
+        self.assertIsNone(_nan_none(adx[26]))
+
+    # ── Test 5: strategy feature helpers ──
+    def test_feature_helpers(self):
+        rows = _make_rows(60, seed=8)
+        vols_desc = [r[5] for r in reversed(rows)][:51]
+        self.assertClose(il.zscore_last(vols_desc[::-1], 50), _legacy_volume_z(vols_desc))
+        closes_desc = [r[4] for r in reversed(rows)][:21]
+        self.assertClose(il.logret_std(closes_desc[::-1]) * 100, _legacy_vol_pct(closes_desc))
+        self.assertEqual(il.zscore_last([5.0] * 10, 9), 0.0)
+
+
+def _nan_none(x):
+    return None if math.isnan(x) else float(x)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,322 @@
+"""
+tests/test_kline_stream.py — KlineStream against a local replay WebSocket server.
+
+The server speaks just enough RFC 6455 to accept a websocket-client
+connection, read the subscribe frame and replay recorded kline messages;
+each connection plays one session and then drops. REST gap fills are served
+from the same recorded candles.
+
+Covers:
+  1. Replay: only changed/closed bars written, final rows == recorded candles
+  2. Reconnect gap: bars missed while disconnected are filled over REST
+  3. Startup gap from the last stored bar
+  4. Failed write → bar refetched on the next message
+  5. Rollover without the confirm message refetches the previous bar
+  6. Several symbols on one connection: one subscribe, messages routed by topic
+  7. on_close gets only confirmed bars; its errors don't fail the write
+"""
+
+import sys
+import os
+import json
+import socket
+import base64
+import hashlib
+import random
+import struct
+import threading
+import unittest
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+import kline_stream
+from kline_stream import KlineStream
+
+T0 = 1772323200000          # 2026-03-01 00:00 UTC
+STEP = 60_000
+TOPIC = 'kline.1.BTCUSDT'
+
+
+def _record_candles(n, seed=3):
+    rng = random.Random(seed)
+    price = 90000.0
+    bars = []
+    for i in range(n):
+        o = price
+        c = round(o + rng.gauss(0, 30), 1)
+        h = round(max(o, c) + abs(rng.gauss(0, 10)), 1)
+        l = round(min(o, c) - abs(rng.gauss(0, 10)), 1)
+        bars.append([T0 + i * STEP, o, h, l, c, round(abs(rng.gauss(40, 10)), 3)])
+        price = c
+    return bars
+
+
+def _kline_msg(bar, confirm, topic=TOPIC):
+    ts, o, h, l, c, v = bar
+    return json.dumps({
+        'topic': topic, 'type': 'snapshot', 'ts': ts + 1000,
+        'data': [{'start': ts, 'end': ts + STEP - 1, 'interval': '1',
+                  'open': str(o), 'high': str(h), 'low': str(l), 'close': str(c),
+                  'volume': str(v), 'turnover': '0', 'confirm': confirm,
+                  'timestamp': ts + 1000}],
+    })
+
+
+def _ticks(bar):
+    """Intrabar replay: partial, repeated partial (no-op), final confirm."""
+    ts, o, h, l, c, v = bar
+    partial = [ts, o, max(o, (o + c) / 2), min(o, (o + c) / 2), (o + c) / 2, v / 2]
+    return [_kline_msg(partial, False), _kline_msg(partial, False), _kline_msg(bar, True)]
+
+
+class _ReplayWsServer:
+    """One recorded session per accepted connection, then close."""
+
+    GUID = '258EAFA5-E914-47DA-95CA-C5AB0DC85B11'
+
+    def __init__(self, sessions):
+        self.sessions = list(sessions)
+        self.subscribes = []
+        self.sock = socket.socket()
+        self.sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+        self.sock.bind(('127.0.0.1', 0))
+        self.sock.listen(4)
+        self.url = f'ws://127.0.0.1:{self.sock.getsockname()[1]}/v5/public/linear'
+        self.thread = threading.Thread(target=self._serve, daemon=True)
+        self.thread.start()
+
+    def _recv_exact(self, conn, n):
+        buf = b''
+        while len(buf) < n:
+            chunk = conn.recv(n - len(buf))
+            if not chunk:
+                raise ConnectionError('client closed')
+            buf += chunk
+        return buf
+
+    def _recv_frame(self, conn):
+        b0, b1 = self._recv_exact(conn, 2)
+        n = b1 & 0x7f
+        if n == 126:
+            n = struct.unpack('>H', self._recv_exact(conn, 2))[0]
+        elif n == 127:
+            n = struct.unpack('>Q', self._recv_exact(conn, 8))[0]
+        mask = self._recv_exact(conn, 4) if b1 & 0x80 else b'\0\0\0\0'
+        data = self._recv_exact(conn, n)
+        return b0 & 0x0f, bytes(b ^ mask[i % 4] for i, b in enumerate(data))
+
+    @staticmethod
+    def _frame(opcode, payload):
+        n = len(payload)
+        if n < 126:
+            head = struct.pack('>BB', 0x80 | opcode, n)
+        elif n < 65536:
+            head = struct.pack('>BBH', 0x80 | opcode, 126, n)
+        else:
+            head = struct.pack('>BBQ', 0x80 | opcode, 127, n)
+        return head + payload
+
+    def _serve(self):
+        while self.sessions:
+            try:
+                conn, _ = self.sock.accept()
+            except OSError:
+                return
+            messages = self.sessions.pop(0)
+            try:
+                req = b''
+                while b'\r\n\r\n' not in req:
+                    req += conn.recv(4096)
+                key = [ln.split(':', 1)[1].strip() for ln in req.decode().split('\r\n')
+                       if ln.lower().startswith('sec-websocket-key:')][0]
+                accept = base64.b64encode(
+                    hashlib.sha1((key + self.GUID).encode()).digest()).decode()
+                conn.sendall(('HTTP/1.1 101 Switching Protocols\r\n'
+                              'Upgrade: websocket\r\nConnection: Upgrade\r\n'
+                              f'Sec-WebSocket-Accept: {accept}\r\n\r\n').encode())
+                opcode, payload = self._recv_frame(conn)
+                while opcode != 0x1:    # skip pings until the subscribe text
+                    opcode, payload = self._recv_frame(conn)
+                self.subscribes.append(json.loads(payload))
+                conn.sendall(self._frame(0x1, json.dumps(
+                    {'op': 'subscribe', 'success': True}).encode()))
+                for m in messages:
+                    conn.sendall(self._frame(0x1, m.encode()))
+                conn.sendall(self._frame(0x8, struct.pack('>H', 1000)))
+            except (ConnectionError, OSError):
+                pass
+            finally:
+                conn.close()
+
+    def close(self):
+        self.sock.close()
+
+
+class _Store:
+    """Stands in for the candles table: ts_ms → bar, plus a write log."""
+
+    def __init__(self, fail_times=0):
+        self.rows = {}
+        self.writes = []
+        self.fail_times = fail_times
+
+    def write(self, bars):
+        if self.fail_times:
+            self.fail_times -= 1
+            raise RuntimeError('db down')
+        self.writes.append([list(b) for b in bars])
+        for b in bars:
+            self.rows[b[0]] = list(b)
+
+
+def _rest_from(recorded, calls=None):
+    def fetch(symbol, tf, start_ms, limit=200, log_fn=None):
+        if calls is not None:
+            calls.append(start_ms)
+        return [list(b) for b in recorded if b[0] >= start_ms][:limit]
+    return fetch
+
+
+def _quiet(msg):
+    pass
+
+
+class TestKlineStream(unittest.TestCase):
+
+    def _run_sessions(self, stream, sessions):
+        srv = _ReplayWsServer(sessions)
+        try:
+            for _ in sessions:
+                kline_stream.run(stream, url=srv.url, ping_interval=0, stale_sec=30)
+        finally:
+            srv.close()
+        return srv
+
+    def _assert_rows(self, store, recorded):
+        self.assertEqual(sorted(store.rows), [b[0] for b in recorded])
+        for b in recorded:
+            self.assertEqual(store.rows[b[0]], b)
+
+    # ── Test 1: replay ──
+    def test_replay_writes_changed_and_closed_only(self):
+        recorded = _record_candles(5)
+        store = _Store()
+        calls = []
+        stream = KlineStream('BTC/USDT:USDT', '1m', store.write,
+                             fetch_fn=_rest_from(recorded, calls), log_fn=_quiet)
+        session = [m for b in recorded for m in _ticks(b)]
+        srv = self._run_sessions(stream, [session])
+
+        self.assertEqual(srv.subscribes, [{'op': 'subscribe', 'args': [TOPIC]}])
+        self._assert_rows(store, recorded)
+        # partial + final per bar; the repeated partial is skipped
+        self.assertEqual(stream.stats['written'], 10)
+        self.assertEqual(stream.stats['skipped'], 5)
+        self.assertEqual(calls, [])     # nothing to fill on a fresh table
+        self.assertEqual(stream.last_closed_ms, recorded[-1][0])
+
+    # ── Test 2: reconnect gap ──
+    def test_reconnect_gap_filled_over_rest(self):
+        recorded = _record_candles(10)
+        store = _Store()
+        calls = []
+        stream = KlineStream('BTC/USDT:USDT', '1m', store.write,
+                             fetch_fn=_rest_from(recorded, calls), log_fn=_quiet)
+        # Session 1 drops mid-bar 3 (no confirm); session 2 resumes at bar 7
+        s1 = [m for b in recorded[:3] for m in _ticks(b)] + _ticks(recorded[3])[:1]
+        s2 = [m for b in recorded[7:] for m in _ticks(b)]
+        self._run_sessions(stream, [s1, s2])
+
+        self._assert_rows(store, recorded)
+        self.assertEqual(calls, [recorded[3][0]])
+        self.assertEqual(stream.stats['gap_bars'], 4)   # bars 3..6
+
+    # ── Test 3: startup gap ──
+    def test_startup_gap_from_last_stored(self):
+        recorded = _record_candles(8)
+        store = _Store()
+        stream = KlineStream('BTC/USDT:USDT', '1m', store.write,
+                             fetch_fn=_rest_from(recorded), last_ms=recorded[2][0],
+                             log_fn=_quiet)
+        stream.on_connect()
+        stream.handle_message(_kline_msg(recorded[6], False))
+        # Bar 2 (possibly open when stored) through 5 refetched, 6 streamed
+        self.assertEqual(sorted(store.rows), [b[0] for b in recorded[2:7]])
+        self.assertEqual(stream.last_closed_ms, recorded[5][0])
+
+    # ── Test 4: write failure ──
+    def test_failed_write_is_refetched(self):
+        recorded = _record_candles(4)
+        store = _Store()
+        stream = KlineStream('BTC/USDT:USDT', '1m', store.write,
+                             fetch_fn=_rest_from(recorded), log_fn=_quiet)
+        stream.handle_message(_kline_msg(recorded[0], True))
+        store.fail_times = 1
+        stream.handle_message(_kline_msg(recorded[1], True))      # lost
+        self.assertNotIn(recorded[1][0], store.rows)
+        stream.handle_message(_kline_msg(recorded[2], False))
+        self.assertEqual(store.rows[recorded[1][0]], recorded[1])
+        self.assertEqual(stream.stats['write_errors'], 1)
+
+    # ── Test 5: missing confirm ──
+    def test_rollover_without_confirm(self):
+        recorded = _record_candles(3)
+        store = _Store()
+        calls = []
+        stream = KlineStream('BTC/USDT:USDT', '1m', store.write,
+                             fetch_fn=_rest_from(recorded, calls), log_fn=_quiet)
+        stream.handle_message(_kline_msg(recorded[0], True))
+        stream.handle_message(_ticks(recorded[1])[0])             # partial only
+        stream.handle_message(_kline_msg(recorded[2], False))
+        self.assertEqual(calls, [recorded[1][0]])
+        self.assertEqual(store.rows[recorded[1][0]], recorded[1])
+
+    # ── Test 6: multi-symbol connection ──
+    def test_multi_symbol_single_connection(self):
+        btc = _record_candles(4)
+        eth = [[b[0], b[1] / 30, b[2] / 30, b[3] / 30, b[4] / 30, b[5] * 10]
+               for b in _record_candles(4, seed=9)]
+        stores = {'BTC': _Store(), 'ETH': _Store()}
+        s_btc = KlineStream('BTC/USDT:USDT', '1m', stores['BTC'].write,
+                            fetch_fn=_rest_from(btc), log_fn=_quiet)
+        s_eth = KlineStream('ETH/USDT:USDT', '1m', stores['ETH'].write,
+                            fetch_fn=_rest_from(eth), log_fn=_quiet)
+        session = []
+        for b, e in zip(btc, eth):
+            session += [_kline_msg(b, True), _kline_msg(e, True, 'kline.1.ETHUSDT')]
+        srv = _ReplayWsServer([session])
+        try:
+            kline_stream.run([s_btc, s_eth], url=srv.url, ping_interval=0, stale_sec=30)
+        finally:
+            srv.close()
+
+        self.assertEqual(srv.subscribes, [{'op': 'subscribe',
+                                           'args': [TOPIC, 'kline.1.ETHUSDT']}])
+        self._assert_rows(stores['BTC'], btc)
+        self._assert_rows(stores['ETH'], eth)
+        self.assertEqual((s_btc.stats['msgs'], s_eth.stats['msgs']), (4, 4))
+
+
+    # ── Test 7: on_close ──
+    def test_on_close_confirmed_only(self):
+        recorded = _record_candles(3)
+        store = _Store()
+        closed = []
+        stream = KlineStream('BTC/USDT:USDT', '1m', store.write,
+                             fetch_fn=_rest_from(recorded), log_fn=_quiet,
+                             on_close=closed.append)
+        for b in recorded:
+            for m in _ticks(b):
+                stream.handle_message(m)
+        self.assertEqual(closed, [[b] for b in recorded])
+
+        def boom(bars):
+            raise RuntimeError('notify failed')
+        stream.on_close = boom
+        bar = [recorded[-1][0] + STEP] + recorded[-1][1:]
+        self.assertEqual(stream.handle_message(_kline_msg(bar, True)), 1)
+        self.assertEqual(store.rows[bar[0]], bar)
+
+
+if __name__ == '__main__':
+    unittest.main()
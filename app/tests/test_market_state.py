@@ -0,0 +1,263 @@
+"""
+tests/test_market_state.py — Per-cycle market snapshot vs per-query readers (no DB).
+
+_FakeDB answers the single-row reader queries (SELECT cols FROM table
+WHERE symbol ... ORDER BY ts DESC LIMIT n) and the snapshot's set-based
+queries from the same in-memory rows, counting executes.
+
+Covers:
+  1. load_market_state: 5 queries, rows newest first, snapshot is read-only
+  2. features_from_state == the compute_* readers on the same data
+  3. tech / position / regime / mtf: state= gives the same result, no queries
+  4. Context join failure falls back to per-table reads
+  5. Empty DB / broken cursor: FAIL-OPEN defaults, never raises
+"""
+
+import sys
+import os
+import re
+import random
+import dataclasses
+import unittest
+from datetime import datetime, timedelta, timezone
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+import market_state
+from market_state import load_market_state, INDICATOR_COLS
+from strategy.common import features as F
+import tech_scorer
+import position_scorer
+import regime_reader
+import mtf_direction
+
+BTC = 'BTC/USDT:USDT'
+T0 = datetime(2026, 3, 1, tzinfo=timezone.utc)
+
+
+def _tables(seed=3):
+    rng = random.Random(seed)
+    candles, price = [], 90000.0
+    for i in range(120):
+        c = price + rng.gauss(0, 40)
+        candles.append({'symbol': BTC, 'tf': '1m', 'ts': T0 + timedelta(minutes=i),
+                        'o': price, 'h': max(price, c) + 5, 'l': min(price, c) - 5,
+                        'c': c, 'v': rng.uniform(1, 60)})
+        price = c
+    for i in range(30):
+        candles.append({'symbol': BTC, 'tf': '5m', 'ts': T0 + timedelta(minutes=5 * i),
+                        'c': 90000 + rng.gauss(0, 80)})
+    indicators = []
+    for i in range(40):
+        row = {c: 90000 + rng.gauss(0, 50) for c in INDICATOR_COLS}
+        row.update(symbol=BTC, tf='1m', ts=T0 + timedelta(minutes=i), vol_spike=(i % 2 == 0),
+                   rsi_14=rng.uniform(20, 80), atr_14=rng.uniform(30, 90),
+                   bb_up=90100 + i, bb_dn=89900 - i, bb_mid=90000.0)
+        indicators.append(row)
+    vol_profile = [{'symbol': BTC, 'ts': T0 + timedelta(minutes=5 * i),
+                    'poc': 90000 + 10 * i, 'vah': 90200 + 12 * i, 'val': 89800 + 9 * i}
+                   for i in range(15)]
+    now = datetime.now(timezone.utc)
+    return {
+        'candles': candles,
+        'indicators': indicators,
+        'vol_profile': vol_profile,
+        'market_context_latest': [{
+            'symbol': BTC, 'regime': 'RANGE', 'regime_confidence': 70, 'shock_type': None,
+            'flow_bias': 0.2, 'breakout_confirmed': False, 'age_seconds': 30,
+            'adx_14': 18.5, 'vah': 90300, 'val': 89700, 'poc': 90010,
+            'price_vs_va': 'INSIDE', 'bbw_ratio': 0.9}],
+        'mtf_indicators': [{
+            'symbol': BTC, 'ema_15m_50': 90100, 'ema_15m_200': 89900, 'ema_1h_50': 90200,
+            'ema_1h_200': 89800, 'adx_1h': 31.0, 'donchian_high_15m_20': 90500,
+            'donchian_low_15m_20': 89500, 'atr_15m': 120, 'updated_at': now}],
+        'position_state': [{
+            'symbol': BTC, 'side': 'long', 'total_qty': 0.01, 'avg_entry_price': 89950,
+            'stage': 2, 'trade_budget_used_pct': 30}],
+        'safety_limits': [{'id': 1, 'stop_loss_pct': 1.5, 'dynamic_sl_base_pct': 2.2}],
+        'market_data_cache': [{'symbol': BTC, 'ts': now, 'bid': 90000.0, 'ask': 90010.0}],
+    }
+
+
+class _FakeDB:
+    """Cursor over in-memory tables for the query shapes used by the readers."""
+
+    def __init__(self, tables=None, join_ok=True, broken=False):
+        self.tables = tables if tables is not None else _tables()
+        self.join_ok = join_ok
+        self.broken = broken
+        self.queries = []
+        self._rows = []
+
+    def _select(self, table, cols, params, sql):
+        rows = [r for r in self.tables.get(table, [])
+                if 'WHERE symbol' not in sql or r.get('symbol') == params[0]]
+        tf = re.search(r"tf = '(\w+)'", sql)
+        if tf:
+            rows = [r for r in rows if r.get('tf') == tf.group(1)]
+        key = 'id' if 'ORDER BY id' in sql else 'ts'
+        if 'ORDER BY' in sql:
+            rows = sorted(rows, key=lambda r: r[key], reverse=True)
+        limit = params[-1] if 'LIMIT %s' in sql else 1
+        return [tuple(r.get(c) for c in cols) for r in rows[:limit]]
+
+    def execute(self, sql, params=None):
+        self.queries.append(sql)
+        if self.broken:
+            raise RuntimeError('connection lost')
+        sql = ' '.join(sql.split())
+        params = params or ()
+        if 'FROM (VALUES' in sql:
+            n1, n5, sym = params
+            out = []
+            for tf, n in (('1m', n1), ('5m', n5)):
+                for r in self._select('candles', ('ts', 'o', 'h', 'l', 'c', 'v'),
+                                      (sym, n), f"WHERE symbol tf = '{tf}' ORDER BY LIMIT %s"):
+                    out.append((tf,) + r)
+            self._rows = out
+        elif 'LEFT JOIN LATERAL' in sql:
+            if not self.join_ok:
+                raise RuntimeError('relation "mtf_indicators" does not exist')
+            row = ()
+            for _, names, src, by_symbol in market_state._CONTEXT_PARTS:
+                got = self._select(src.split()[0], names, (BTC,) if by_symbol else (), src)
+                row += (True,) + got[0] if got else (None,) * (1 + len(names))
+            self._rows = [row]
+        else:
+            inner = re.search(r'FROM \( SELECT (.*?) FROM (\w+)', sql)
+            m = inner or re.search(r'SELECT (.*?) FROM (\w+)', sql)
+            cols = [c.strip() for c in m.group(1).split(',')]
+            self._rows = self._select(m.group(2), cols, params, sql)
+            if inner:
+                self._rows = self._rows[::-1]
+                self._rows = [r[:1] for r in self._rows]
+
+    def fetchone(self):
+        return self._rows[0] if self._rows else None
+
+    def fetchall(self):
+        return list(self._rows)
+
+
+class TestMarketState(unittest.TestCase):
+
+    def setUp(self):
+        regime_reader._prev_regime = None
+        mtf_direction._adx_was_above_enter = False
+
+    # ── Test 1: load ──
+    def test_load_shapes_and_frozen(self):
+        db = _FakeDB()
+        st = load_market_state(db, BTC)
+        self.assertEqual(len(db.queries), len(market_state._SECTIONS))
+        self.assertEqual(st.errors, ())
+        self.assertEqual(len(st.candles), market_state.CANDLES_1M)
+        self.assertEqual(len(st.closes_5m), market_state.CLOSES_5M)
+        self.assertEqual(len(st.indicators), market_state.INDICATOR_ROWS)
+        self.assertEqual(len(st.vol_profile), market_state.VOL_PROFILE_ROWS)
+        self.assertGreater(st.candles[0][0], st.candles[1][0])
+        self.assertEqual(st.price, db.tables['candles'][119]['c'])
+        self.assertEqual(st.position['side'], 'long')
+        self.assertEqual(st.safety['stop_loss_pct'], 1.5)
+        self.assertEqual((st.bid, st.ask), (90000.0, 90010.0))
+
+        with self.assertRaises(dataclasses.FrozenInstanceError):
+            st.candles = ()
+        with self.assertRaises(TypeError):
+            st.indicator['atr_14'] = 0
+
+    # ── Test 2: features ──
+    def test_features_match_readers(self):
+        db = _FakeDB()
+        feats = F.features_from_state(load_market_state(db, BTC))
+        expect = {
+            'price': db.tables['candles'][119]['c'],
+            'atr_pct': F.compute_atr_pct(db),
+            'bb_width': F.compute_bb_width(db),
+            'volume_z': F.compute_volume_z(db),
+            'impulse': F.compute_impulse(db),
+            'drift_score': F.compute_drift_score(db)[0],
+            'drift_direction': F.compute_drift_score(db)[1],
+            'poc_slope': F.compute_poc_slope(db),
+            'vol_pct': F.compute_vol_pct(db),
+            'range_quality': F.compute_range_quality(db),
+            'spread_ok': F.compute_spread_ok(db),
+            'liquidity_ok': F.compute_liquidity_ok(db),
+            'atr_ratio': F.compute_atr_ratio(db),
+            'adx': 18.5,
+            'poc': 90140.0,
+        }
+        for k, v in expect.items():
+            self.assertIsNotNone(v, k)
+            self.assertEqual(feats[k], v, k)
+
+        atr_val = feats['atr_pct'] * feats['price']
+        struct = F.compute_structure_breakout(db, feats['vah'], feats['val'], atr_val,
+                                              feats['price'])
+        self.assertEqual(F._structure_breakout_from(
+            [b[4] for b in load_market_state(db, BTC).candles],
+            feats['vah'], feats['val'], atr_val, feats['price']), struct)
+
+    # ── Test 3: scorers ──
+    def test_scorers_state_equals_cursor(self):
+        db = _FakeDB()
+        st = load_market_state(db, BTC)
+        n = len(db.queries)
+
+        tech_state = tech_scorer.compute(db, state=st)
+        pos_state = position_scorer.compute(db, tech_state['score'], state=st)
+        regime_state = regime_reader.get_current_regime(db, state=st)
+        mtf_state = mtf_direction.compute_mtf_direction(db, state=st)
+        self.assertEqual(len(db.queries), n)
+
+        regime_reader._prev_regime = None
+        mtf_direction._adx_was_above_enter = False
+        self.assertEqual(tech_scorer.compute(db), tech_state)
+        self.assertEqual(position_scorer.compute(db, tech_state['score']), pos_state)
+        self.assertEqual(regime_reader.get_current_regime(db), regime_state)
+        self.assertEqual(mtf_direction.compute_mtf_direction(db), mtf_state)
+        self.assertGreater(len(db.queries), n + 8)
+
+        self.assertTrue(pos_state['has_position'])
+        self.assertEqual(regime_state['regime'], 'RANGE')
+        self.assertIsNotNone(regime_state['bb_width_pct'])
+        self.assertEqual(mtf_state['direction'], mtf_direction.LONG_ONLY)
+
+    # ── Test 4: context fallback ──
+    def test_context_join_fallback(self):
+        tables = _tables()
+        joined = load_market_state(_FakeDB(tables), BTC)
+        db = _FakeDB(tables, join_ok=False)
+        parts = load_market_state(db, BTC)
+        for k in ('market_context', 'mtf', 'position', 'safety'):
+            self.assertEqual(dict(getattr(parts, k)), dict(getattr(joined, k)), k)
+        self.assertEqual(len(db.queries), len(market_state._SECTIONS) + 4)
+
+        tables = _tables()
+        del tables['position_state']
+        st = load_market_state(_FakeDB(tables, join_ok=False), BTC)
+        self.assertEqual(dict(st.position), {})
+        self.assertEqual(position_scorer.compute(None, 10, state=st)['has_position'], False)
+
+    # ── Test 5: FAIL-OPEN ──
+    def test_empty_and_broken(self):
+        for db in (_FakeDB(tables={}), _FakeDB(broken=True)):
+            st = load_market_state(db, BTC)
+            feats = F.build_feature_snapshot(db, BTC, state=st)
+            self.assertIsNone(feats['price'])
+            self.assertIsNone(feats['impulse'])
+            self.assertEqual((feats['drift_score'], feats['drift_direction']), (0.0, 'NONE'))
+            self.assertTrue(feats['spread_ok'])
+            self.assertTrue(feats['liquidity_ok'])
+            self.assertFalse(feats['structure_breakout_pass'])
+            self.assertEqual(tech_scorer.compute(db, state=st)['score'], 0)
+            self.assertEqual(regime_reader.get_current_regime(db, state=st)['regime'], 'UNKNOWN')
+            self.assertEqual(mtf_direction.compute_mtf_direction(db, state=st)['direction'],
+                             mtf_direction.NO_TRADE)
+        # context swallows per-part failures after the join fails
+        self.assertEqual(load_market_state(_FakeDB(broken=True), BTC).errors,
+                         ('candles', 'indicators', 'vol_profile', 'spread'))
+
+
+if __name__ == '__main__':
+    unittest.main()
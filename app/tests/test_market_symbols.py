@@ -0,0 +1,150 @@
+"""
+tests/test_market_symbols.py — Multi-symbol market data helpers (no DB).
+
+Covers:
+  1. get_symbols: SYMBOLS / legacy SYMBOL env, trading symbol first, no dups
+  2. FairScheduler: longest-waiting symbol served first
+  3. LagTracker: newest ts per symbol, one pipeline_lag statement per flush
+  4. indicators: per-symbol engines fed from one grouped read, one write
+  5. vol_profile: per-symbol bucket size; BTC profile unchanged
+"""
+
+import sys
+import os
+import unittest
+from datetime import datetime, timedelta, timezone
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+from market_symbols import get_symbols, FairScheduler, LagTracker
+import indicators
+import vol_profile
+
+BTC, ETH, SOL = 'BTC/USDT:USDT', 'ETH/USDT:USDT', 'SOL/USDT:USDT'
+T0 = datetime(2026, 3, 1, tzinfo=timezone.utc)
+
+
+class _Conn:
+    encoding = 'UTF8'
+
+
+class _FakeCursor:
+    """execute_values-compatible cursor recording statements and rows."""
+
+    def __init__(self, fetch=None):
+        self.connection = _Conn()
+        self.statements = []
+        self.rows = []
+        self.params = []
+        self._fetch = fetch or []
+
+    def mogrify(self, template, args):
+        self.rows.append(tuple(args))
+        return b'(...)'
+
+    def execute(self, sql, params=None):
+        sql = sql.decode() if isinstance(sql, bytes) else sql
+        self.statements.append(' '.join(sql.split()))
+        self.params.append(params)
+
+    def fetchall(self):
+        return self._fetch
+
+
+def _bars(n, price, t0=T0):
+    return [(t0 + timedelta(minutes=i), price + i % 7, price + i % 7 + 2,
+             price + i % 7 - 2, price + i % 5, 10.0 + i % 3) for i in range(n)]
+
+
+class TestMarketSymbols(unittest.TestCase):
+
+    # ── Test 1: symbol list ──
+    def test_get_symbols(self):
+        self.assertEqual(get_symbols({}), [BTC])
+        self.assertEqual(get_symbols({'SYMBOLS': f' {ETH},{BTC} ,,{SOL},{ETH}'}),
+                         [BTC, ETH, SOL])
+        self.assertEqual(get_symbols({'SYMBOL': ETH}), [BTC, ETH])
+
+    # ── Test 2: fair order ──
+    def test_fair_scheduler(self):
+        sched = FairScheduler([BTC, ETH, SOL])
+        self.assertEqual(sched.order(), [BTC, ETH, SOL])
+        sched.served(BTC, now=1)
+        sched.served(ETH, now=2)
+        self.assertEqual(sched.order(), [SOL, BTC, ETH])
+        sched.served(SOL, now=5)     # slow one goes to the back
+        sched.served(BTC, now=3)
+        self.assertEqual(sched.order(), [ETH, BTC, SOL])
+
+    # ── Test 3: lag ──
+    def test_lag_tracker(self):
+        lag = LagTracker('indicators')
+        now = T0.timestamp() + 90
+        lag.observe(BTC, T0 + timedelta(minutes=1))
+        lag.observe(BTC, T0)                               # older: ignored
+        lag.observe(ETH, int(T0.timestamp() * 1000))       # epoch ms
+        lag.observe(SOL, None, cycle_ms=12)                # cycle time only
+        self.assertEqual(lag.lags(now=now), {BTC: 30.0, ETH: 90.0})
+
+        cur = _FakeCursor()
+        self.assertEqual(lag.flush(cur, now=now), 2)
+        self.assertEqual(len(cur.statements), 1)
+        self.assertIn('INSERT INTO pipeline_lag', cur.statements[0])
+        self.assertEqual([(r[0], r[1], r[3]) for r in cur.rows],
+                         [('indicators', BTC, 30.0), ('indicators', ETH, 90.0)])
+
+    # ── Test 4: indicators batching ──
+    def test_indicators_multi_symbol(self):
+        seed = {BTC: _bars(200, 90000.0), ETH: _bars(200, 3000.0)}
+        states = {}
+        for sym, rows in seed.items():
+            st = indicators._SymbolState(sym)
+            st.engine = indicators.IndicatorEngine()
+            st.engine.seed(rows)
+            states[sym] = st
+
+        since = {sym: st.engine.last_ts for sym, st in states.items()}
+        nxt = {sym: _bars(2, rows[-1][1], t0=rows[-1][0] + timedelta(minutes=1))
+               for sym, rows in seed.items()}
+        fetched = [(sym,) + r for sym in (BTC, ETH)
+                   for r in [seed[sym][-1]] + nxt[sym]]
+        cur = _FakeCursor(fetch=fetched)
+        new_rows = indicators._fetch_new_rows(cur, since)
+        self.assertEqual(cur.params[0][0], [BTC, ETH])
+        self.assertEqual({s: len(r) for s, r in new_rows.items()}, {BTC: 3, ETH: 3})
+
+        to_save = []
+        for sym, st in states.items():
+            to_save.extend((sym, v) for v in indicators._step(st, new_rows[sym]))
+        # closed open-bar + closed new bar + new open bar, per symbol
+        self.assertEqual([s for s, _ in to_save], [BTC] * 3 + [ETH] * 3)
+        self.assertGreater(to_save[0][1]['ma_50'], 10 * to_save[3][1]['ma_50'])
+
+        out = _FakeCursor()
+        indicators._save_indicators(out, to_save)
+        self.assertEqual(len(out.statements), 1)
+        self.assertEqual(len(out.rows), 6)
+        self.assertEqual(len(out.rows[0]), 3 + len(indicators.IND_COLS))
+
+        # Unchanged open bar is not rewritten on the next tick
+        self.assertEqual(indicators._step(states[BTC], [nxt[BTC][-1]]), [])
+
+    # ── Test 5: vol_profile bins ──
+    def test_vol_profile_bins(self):
+        self.assertEqual(vol_profile.bin_size_for(BTC, 97000), 50)
+        self.assertEqual(vol_profile.bin_size_for(ETH, 3200), 2)
+        self.assertEqual(vol_profile.bin_size_for(SOL, 150), 0.1)
+
+        candles = [{'l': 97012.0, 'h': 97160.0, 'v': 4.0},
+                   {'l': 97100.0, 'h': 97149.0, 'v': 2.0}]
+        self.assertEqual(vol_profile.build_profile(candles),
+                         {'97000.0': 1.0, '97050.0': 1.0, '97100.0': 3.0, '97150.0': 1.0})
+
+        sol = vol_profile.build_profile([{'l': 150.04, 'h': 150.31, 'v': 4.0}], 0.1)
+        self.assertEqual(sorted(sol), ['150.0', '150.1', '150.2', '150.3'])
+        poc = vol_profile.calc_poc(sol)
+        self.assertIsNotNone(vol_profile.calc_value_area(sol, poc)[0])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,141 @@
+"""
+tests/test_mtf_resampler.py — MtfResampler vs full resample + recompute.
+
+Covers:
+  1. Clock-aligned 15m/1h bars match _resample_candles on aligned, gap-free input
+  2. EMA / ADX / Donchian / ATR match the full recompute over the same bars
+  3. Seeding closed HTF bars then streaming 1m gives the same state
+  4. 1m revisions inside the open bucket replace, not double-count
+  5. Unaligned start: first partial bucket is its own bar
+"""
+
+import sys
+import os
+import random
+import unittest
+from datetime import datetime, timedelta, timezone
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+import indicator_lib as il
+from mtf_resampler import (
+    MtfResampler, _resample_candles, _compute_adx, _compute_donchian,
+)
+
+
+def _make_rows(n, start=None, seed=5):
+    rng = random.Random(seed)
+    ts = start or datetime(2026, 2, 1, 0, 0, tzinfo=timezone.utc)
+    price = 100000.0
+    rows = []
+    for _ in range(n):
+        o = price
+        c = o + rng.gauss(0, 40)
+        h = max(o, c) + abs(rng.gauss(0, 15))
+        l = min(o, c) - abs(rng.gauss(0, 15))
+        rows.append((ts, o, h, l, c, abs(rng.gauss(50, 20))))
+        price = c
+        ts += timedelta(minutes=1)
+    return rows
+
+
+def _atr14(bars):
+    if len(bars) < 15:
+        return None
+    trs = []
+    for i in range(-14, 0):
+        hi, lo, pc = bars[i][2], bars[i][3], bars[i - 1][4]
+        trs.append(max(hi - lo, abs(hi - pc), abs(lo - pc)))
+    return sum(trs) / 14
+
+
+class TestMtfResampler(unittest.TestCase):
+
+    def assertClose(self, got, want, msg=''):
+        if want is None:
+            self.assertIsNone(got, msg)
+        else:
+            self.assertAlmostEqual(got, want, delta=max(abs(want), 1.0) * 1e-9, msg=msg)
+
+    def _check_against_full(self, mtf, rows):
+        """Closed HTF bars = full groups, i.e. everything but the open bucket."""
+        b15 = _resample_candles(rows, 15)
+        b1h = _resample_candles(rows, 60)
+        if len(rows) % 15 == 0:
+            b15 = b15[:-1]
+        if len(rows) % 60 == 0:
+            b1h = b1h[:-1]
+        v = mtf.values()
+        c15 = [b[4] for b in b15]
+        c1h = [b[4] for b in b1h]
+        self.assertClose(v['ema_15m_50'], il.ema_last(c15, 50), 'ema_15m_50')
+        self.assertClose(v['ema_15m_200'], il.ema_last(c15, 200), 'ema_15m_200')
+        self.assertClose(v['ema_1h_50'], il.ema_last(c1h, 50), 'ema_1h_50')
+        self.assertClose(v['adx_1h'], _compute_adx(
+            [b[2] for b in b1h], [b[3] for b in b1h], c1h, 14), 'adx_1h')
+        dc_h, dc_l = _compute_donchian([b[2] for b in b15], [b[3] for b in b15], 20)
+        self.assertClose(v['donchian_high_15m_20'], dc_h, 'dc_high')
+        self.assertClose(v['donchian_low_15m_20'], dc_l, 'dc_low')
+        self.assertClose(v['atr_15m'], _atr14(b15), 'atr_15m')
+
+    # ── Test 1 + 2: bars and indicators ──
+    def test_matches_full_recompute(self):
+        rows = _make_rows(60 * 70 + 7)
+        mtf = MtfResampler()
+        closes = []
+        for r in rows:
+            closes.extend(mtf.update_1m(*r))
+        full_15 = _resample_candles(rows, 15)
+        got_15 = [b for tf, b in closes if tf == '15m']
+        self.assertEqual(len(got_15), len(full_15))
+        for g, w in zip(got_15, full_15):
+            self.assertEqual(g[0], w[0])
+            for i in range(1, 6):
+                self.assertAlmostEqual(g[i], w[i], places=6)
+        self.assertEqual(mtf.closed_count('1h'), 70)
+        self._check_against_full(mtf, rows)
+
+    # ── Test 3: seed from HTF bars, then stream ──
+    def test_seed_then_stream(self):
+        rows = _make_rows(60 * 60)
+        cut = 60 * 40
+        mtf = MtfResampler()
+        mtf.seed_htf('15m', _resample_candles(rows[:cut], 15))
+        mtf.seed_htf('1h', _resample_candles(rows[:cut], 60))
+        # Overlap with the seeded range must be ignored
+        for r in rows[cut - 90:]:
+            mtf.update_1m(*r)
+        self._check_against_full(mtf, rows)
+
+    # ── Test 4: revisions in the open bucket ──
+    def test_revision_replaces(self):
+        rows = _make_rows(31)
+        mtf = MtfResampler()
+        for r in rows:
+            mtf.update_1m(*r)
+        ts, o, h, l, c, v = rows[-1]
+        mtf.update_1m(ts, o, h + 500, l, c, v * 3)
+        bar = mtf.series['15m'].open_bar
+        self.assertEqual(bar[0], rows[30][0])
+        self.assertAlmostEqual(bar[2], h + 500)
+        self.assertAlmostEqual(bar[5], v * 3)
+        # Older bucket is ignored once closed
+        self.assertEqual(mtf.update_1m(*rows[0]), [])
+
+    # ── Test 5: unaligned start ──
+    def test_unaligned_start(self):
+        start = datetime(2026, 2, 1, 0, 7, tzinfo=timezone.utc)
+        rows = _make_rows(20, start=start)
+        mtf = MtfResampler()
+        closed = []
+        for r in rows:
+            closed.extend(mtf.update_1m(*r))
+        self.assertEqual(len(closed), 1)
+        tf, bar = closed[0]
+        self.assertEqual(tf, '15m')
+        self.assertEqual(bar[0], datetime(2026, 2, 1, 0, 0, tzinfo=timezone.utc))
+        self.assertAlmostEqual(bar[4], rows[7][4])
+
+
+if __name__ == '__main__':
+    unittest.main()
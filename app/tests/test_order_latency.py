@@ -0,0 +1,112 @@
+"""
+tests/test_order_latency.py — order latency ledger (no DB).
+
+Covers:
+  1. begin → mark → finish writes one row with every stage timestamp
+  2. Items released back to PENDING / never decided are not written
+  3. mark() outside an entry is a no-op; write errors never raise
+  4. report() rows → summarize() percentiles per source and stage gap
+"""
+
+import sys
+import os
+import unittest
+from datetime import datetime, timezone
+from unittest import mock
+from unittest.mock import MagicMock
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+import order_latency
+from order_latency import Entry
+
+
+class TestLedger(unittest.TestCase):
+
+    def setUp(self):
+        self.patch = mock.patch.object(order_latency, '_table_ready', True)
+        self.patch.start()
+
+    def tearDown(self):
+        self.patch.stop()
+        order_latency._local.entry = None
+
+    def test_full_entry_written(self):
+        created = datetime.fromtimestamp(1000.0, timezone.utc)
+        e = order_latency.begin('execution_queue', 7, 'ADD', created_at=created, claimed_at=1000.2)
+        with mock.patch.object(order_latency.time, 'time', side_effect=[1000.25, 1000.3, 1000.45]):
+            order_latency.mark('validated')
+            order_latency.mark('sent')
+            order_latency.mark('acked', order_id='abc')
+        order_latency.set_outcome('SENT')
+        cur = MagicMock()
+        self.assertIs(order_latency.finish(cur), e)
+        self.assertIsNone(order_latency.current())
+        args = cur.execute.call_args[0][1]
+        self.assertEqual(args[:5], ('execution_queue', 7, 'ADD', 'abc', 'SENT'))
+        self.assertEqual(args[5:], (1000.0, 1000.2, 1000.25, 1000.3, 1000.45))
+        gaps = e.gaps_ms()
+        self.assertAlmostEqual(gaps['queue'], 200, places=3)
+        self.assertAlmostEqual(gaps['ack'], 150, places=3)
+        self.assertAlmostEqual(gaps['total'], 450, places=3)
+
+    def test_pending_not_written(self):
+        cur = MagicMock()
+        order_latency.begin('signal', 1, 'OPEN')
+        self.assertIsNone(order_latency.finish(cur))
+        order_latency.begin('execution_queue', 2, 'ADD')
+        order_latency.set_outcome('PICKED')
+        order_latency.set_outcome('PENDING')
+        self.assertIsNone(order_latency.finish(cur))
+        cur.execute.assert_not_called()
+
+    def test_no_entry_and_write_error(self):
+        order_latency.mark('sent')
+        order_latency.set_outcome('SENT')
+        self.assertIsNone(order_latency.finish(MagicMock()))
+        cur = MagicMock()
+        cur.execute.side_effect = RuntimeError('db down')
+        order_latency.begin('signal', 3, 'OPEN')
+        with mock.patch.object(order_latency, '_log'):
+            self.assertIsNone(order_latency.finish(cur, 'SENT'))
+
+
+class TestReport(unittest.TestCase):
+
+    def test_report_and_summary(self):
+        cur = MagicMock()
+        rows = []
+        for i in range(10):
+            t0 = 100.0 * i
+            rows.append(('execution_queue', i, 'ADD', f'o{i}', 'SENT',
+                         t0, t0 + 0.1 * (i + 1), t0 + 0.2 * (i + 1), t0 + 0.2 * (i + 1), t0 + 0.3 * (i + 1)))
+        rows.append(('signal', 99, 'OPEN', None, 'PROCESSED', 5.0, 5.5, None, None, None))
+        cur.fetchall.return_value = rows
+        entries = order_latency.report(cur, hours=6)
+        self.assertEqual(cur.execute.call_args[0][1], (6,))
+        self.assertEqual(len(entries), 11)
+
+        s = order_latency.summarize(entries)
+        eq = s['execution_queue']
+        self.assertEqual((eq['n'], eq['sent']), (10, 10))
+        self.assertAlmostEqual(eq['queue']['p50'], 500, places=3)
+        self.assertAlmostEqual(eq['queue']['p90'], 900, places=3)
+        self.assertAlmostEqual(eq['total']['max'], 3000, places=3)
+        sig = s['signal']
+        self.assertEqual((sig['n'], sig['sent']), (1, 0))
+        self.assertNotIn('total', sig)
+        self.assertAlmostEqual(sig['queue']['p99'], 500, places=3)
+
+        text = order_latency.format_report(s, hours=6)
+        self.assertIn('[execution_queue] items=10 sent=10', text)
+        self.assertIn('total  10', text)
+        self.assertIn('no ledger rows', order_latency.format_report({}))
+
+    def test_percentile(self):
+        self.assertEqual(order_latency.percentile([3, 1, 2], 0.5), 2)
+        self.assertEqual(order_latency.percentile([5], 0.99), 5)
+        self.assertEqual(Entry('s', 1).gaps_ms(), {})
+
+
+if __name__ == '__main__':
+    unittest.main()
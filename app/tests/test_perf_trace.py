@@ -0,0 +1,186 @@
+"""
+tests/test_perf_trace.py — perf_trace span timers (no DB).
+
+Covers:
+  1. Nested spans and laps produce per-path histograms
+  2. Counters land on the innermost span and roll up to parents
+  3. Helpers are no-ops outside a traced cycle
+  4. Histogram quantiles within one bucket of the exact value
+  5. maybe_flush writes one row per span, resets the window, survives errors
+  6. instrument_exchange counts ccxt fetches; per-span overhead is small
+"""
+
+import sys
+import os
+import time
+import unittest
+from unittest import mock
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+import perf_trace
+from perf_trace import Tracer, Histogram
+
+
+def _quiet(msg):
+    pass
+
+
+class TestSpans(unittest.TestCase):
+
+    def setUp(self):
+        self.t = Tracer('test', flush_sec=60, enabled=True, log_fn=_quiet)
+
+    def test_nested_and_laps(self):
+        for _ in range(3):
+            with self.t.cycle():
+                perf_trace.lap('risk')
+                perf_trace.count('db', 2)
+                perf_trace.lap('scores')
+                with perf_trace.span('tech'):
+                    perf_trace.count('db')
+                    with perf_trace.span('inner'):
+                        perf_trace.count('api')
+                perf_trace.count('db')
+        s = self.t.summary()
+        self.assertEqual(set(s), {'cycle', 'cycle/risk', 'cycle/scores',
+                                  'cycle/scores/tech', 'cycle/scores/tech/inner'})
+        self.assertTrue(all(v['n'] == 3 for v in s.values()))
+        self.assertEqual(s['cycle/risk']['counters'], {'db': 6})
+        self.assertEqual(s['cycle/scores/tech/inner']['counters'], {'api': 3})
+        self.assertEqual(s['cycle/scores/tech']['counters'], {'db': 3, 'api': 3})
+        self.assertEqual(s['cycle/scores']['counters'], {'db': 6, 'api': 3})
+        self.assertEqual(s['cycle']['counters'], {'db': 12, 'api': 3})
+
+    def test_lap_inside_span_closed_with_span(self):
+        with self.t.cycle():
+            with perf_trace.span('outer'):
+                perf_trace.lap('a')
+                perf_trace.lap('b')
+            perf_trace.lap('after')
+        self.assertEqual(set(self.t.summary()),
+                         {'cycle', 'cycle/outer', 'cycle/outer/a', 'cycle/outer/b',
+                          'cycle/after'})
+
+    def test_exception_closes_spans(self):
+        with self.assertRaises(ValueError):
+            with self.t.cycle():
+                perf_trace.lap('x')
+                with perf_trace.span('y'):
+                    raise ValueError('boom')
+        self.assertFalse(perf_trace.active())
+        self.assertEqual(set(self.t.summary()), {'cycle', 'cycle/x', 'cycle/x/y'})
+
+    def test_noop_outside_cycle(self):
+        perf_trace.count('db')
+        perf_trace.lap('x')
+        perf_trace.end_lap()
+        with perf_trace.span('y'):
+            pass
+        self.assertEqual(self.t.summary(), {})
+
+    def test_disabled(self):
+        t = Tracer('off', enabled=False, log_fn=_quiet)
+        with t.cycle():
+            perf_trace.lap('x')
+        self.assertEqual(t.summary(), {})
+
+
+class TestHistogram(unittest.TestCase):
+
+    def test_quantiles(self):
+        h = Histogram()
+        for ms in range(1, 1001):
+            h.add(float(ms))
+        for q, exact in ((0.5, 500), (0.95, 950), (0.99, 990)):
+            got = h.quantile(q)
+            self.assertGreaterEqual(got, exact)
+            self.assertLessEqual(got, exact * 1.25)
+        self.assertEqual(h.max, 1000.0)
+        self.assertIsNone(Histogram().quantile(0.5))
+
+    def test_quantile_capped_at_max(self):
+        h = Histogram()
+        h.add(3.0)
+        self.assertEqual(h.quantile(0.99), 3.0)
+
+
+class _FakeCursor:
+    def __init__(self):
+        self.executed = []
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+
+class _FakeConn:
+    def __init__(self):
+        self.cur = _FakeCursor()
+
+    def cursor(self):
+        return self.cur
+
+
+class TestFlush(unittest.TestCase):
+
+    def test_flush_and_reset(self):
+        t = Tracer('svc', flush_sec=60, enabled=True, log_fn=_quiet)
+        with t.cycle():
+            perf_trace.lap('a')
+            perf_trace.count('db')
+        self.assertFalse(t.maybe_flush(_FakeConn()))   # window not elapsed
+        written = []
+        with mock.patch('db_migrations.ensure_perf_span_stats') as ens, \
+                mock.patch.object(perf_trace, '_write_rows',
+                                  side_effect=lambda cur, svc, ws, rows: written.append((svc, rows))):
+            self.assertTrue(t.maybe_flush(_FakeConn(), force=True))
+            ens.assert_called_once()
+        svc, rows = written[0]
+        self.assertEqual(svc, 'svc')
+        self.assertEqual(set(rows), {'cycle', 'cycle/a'})
+        self.assertEqual(rows['cycle/a']['counters'], {'db': 1})
+        self.assertEqual(t.summary(), {})
+
+    def test_flush_error_drops_window(self):
+        t = Tracer('svc', flush_sec=0, enabled=True, log_fn=_quiet)
+        t._table_ready = True
+        with t.cycle():
+            pass
+        with mock.patch.object(perf_trace, '_write_rows', side_effect=RuntimeError('db down')):
+            self.assertFalse(t.maybe_flush(_FakeConn()))
+        self.assertEqual(t.summary(), {})
+
+
+class TestExchangeAndOverhead(unittest.TestCase):
+
+    def test_instrument_exchange(self):
+        class Ex:
+            def fetch(self, url, method='GET'):
+                return {'url': url}
+        ex = perf_trace.instrument_exchange(Ex())
+        perf_trace.instrument_exchange(ex)    # idempotent
+        t = Tracer('x', enabled=True, log_fn=_quiet)
+        with t.cycle():
+            with perf_trace.span('pos'):
+                self.assertEqual(ex.fetch('u'), {'url': 'u'})
+                ex.fetch('v')
+        self.assertEqual(t.summary()['cycle/pos']['counters'], {'api': 2})
+
+    def test_span_overhead_small(self):
+        t = Tracer('x', enabled=True, log_fn=_quiet)
+        n = 2000
+        t0 = time.perf_counter()
+        with t.cycle():
+            for i in range(n):
+                perf_trace.lap('a' if i % 2 else 'b')
+                perf_trace.count('db')
+        per_span_us = (time.perf_counter() - t0) / n * 1e6
+        # ~20 spans per cycle must stay well under 1% of a 100ms cycle (1ms)
+        self.assertLess(per_span_us * 20, 1000)
+
+
+if __name__ == '__main__':
+    unittest.main()
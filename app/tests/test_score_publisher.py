@@ -0,0 +1,98 @@
+"""
+tests/test_score_publisher.py — latest-score slot (tmp file, no DB).
+
+Covers:
+  1. publish → latest round trip with age / source stamps
+  2. Stale slot (max_age_sec) or older bar than the caller's state → None
+  3. get_score: fresh slot skips compute_total; stale slot recomputes + publishes
+  4. Errored compute_total results are not published
+  5. Missing / corrupt slot reads as None
+"""
+
+import sys
+import os
+import shutil
+import tempfile
+import time
+import unittest
+from datetime import datetime, timezone
+from unittest import mock
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+import score_publisher
+from market_state import MarketState
+
+RESULT = {'total_score': 12.5, 'long_score': 56, 'short_score': 44,
+          'dominant_side': 'LONG', 'confidence': 12}
+
+
+def _state(minute):
+    ts = datetime(2026, 3, 1, 0, minute, tzinfo=timezone.utc)
+    return MarketState(symbol='BTC/USDT:USDT', loaded_at=time.time(),
+                       candles=((ts, 1.0, 1.0, 1.0, 1.0, 1.0),))
+
+
+class TestScorePublisher(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp = tempfile.mkdtemp()
+        self.path = os.path.join(self.tmp, 'score.json')
+
+    def tearDown(self):
+        shutil.rmtree(self.tmp)
+
+    def test_round_trip(self):
+        self.assertTrue(score_publisher.publish(RESULT, bar_ts=100.0, source='t',
+                                                path=self.path))
+        got = score_publisher.latest(60, path=self.path)
+        self.assertEqual(got['total_score'], 12.5)
+        self.assertEqual(got['score_source'], 't')
+        self.assertLess(got['score_age_sec'], 5)
+        self.assertEqual(os.listdir(self.tmp), ['score.json'])   # no tmp left
+
+    def test_stale_and_old_bar(self):
+        bar = score_publisher.bar_ts_of(_state(5))
+        score_publisher.publish(RESULT, bar_ts=bar, path=self.path)
+        self.assertIsNotNone(score_publisher.latest(60, bar_ts=bar, path=self.path))
+        self.assertIsNone(score_publisher.latest(60, bar_ts=bar + 60, path=self.path))
+        self.assertIsNone(score_publisher.latest(-1, path=self.path))
+
+    def test_get_score_uses_fresh_slot(self):
+        st = _state(5)
+        score_publisher.publish(RESULT, bar_ts=score_publisher.bar_ts_of(st), path=self.path)
+        with mock.patch('score_engine.compute_total') as ct:
+            got = score_publisher.get_score(state=st, path=self.path)
+        ct.assert_not_called()
+        self.assertEqual(got['long_score'], 56)
+
+    def test_get_score_recomputes_on_new_bar(self):
+        score_publisher.publish(RESULT, bar_ts=score_publisher.bar_ts_of(_state(5)),
+                                path=self.path)
+        fresh = dict(RESULT, total_score=-20.0)
+        st = _state(6)
+        with mock.patch('score_engine.compute_total', return_value=fresh) as ct:
+            got = score_publisher.get_score(state=st, source='ap', path=self.path)
+        ct.assert_called_once_with(cur=None, state=st)
+        self.assertEqual(got['total_score'], -20.0)
+        self.assertEqual(got['score_source'], 'computed')
+        # Published for the next consumer
+        again = score_publisher.latest(60, bar_ts=score_publisher.bar_ts_of(st), path=self.path)
+        self.assertEqual(again['total_score'], -20.0)
+        self.assertEqual(again['score_source'], 'ap')
+
+    def test_error_not_published(self):
+        with mock.patch('score_engine.compute_total',
+                        return_value=dict(RESULT, error='db down')):
+            score_publisher.get_score(path=self.path)
+        self.assertFalse(os.path.exists(self.path))
+
+    def test_missing_or_corrupt(self):
+        self.assertIsNone(score_publisher.latest(60, path=self.path))
+        with open(self.path, 'w') as f:
+            f.write('{not json')
+        self.assertIsNone(score_publisher.latest(60, path=self.path))
+
+
+if __name__ == '__main__':
+    unittest.main()
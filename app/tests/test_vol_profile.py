@@ -0,0 +1,163 @@
+"""
+tests/test_vol_profile.py — Rolling volume profile (no DB).
+
+Covers:
+  1. RollingProfile matches build_profile/calc_poc/calc_value_area over the
+     same window after many add/evict steps
+  2. Eviction is by time: a gap in candles shrinks the window
+  3. MultiProfile: 1h/4h/24h windows from one feed, MIN_BARS gate
+  4. run_once: new closed bars only, one upsert per tick keyed by 5m slot
+"""
+
+import sys
+import os
+import random
+import unittest
+from datetime import datetime, timedelta, timezone
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+import vol_profile as vp
+
+BTC, ETH = 'BTC/USDT:USDT', 'ETH/USDT:USDT'
+T0 = datetime(2026, 3, 1, tzinfo=timezone.utc)
+
+
+class _Conn:
+    encoding = 'UTF8'
+
+
+class _FakeCursor:
+    """execute_values-compatible cursor recording statements and rows."""
+
+    def __init__(self, fetch=None):
+        self.connection = _Conn()
+        self.statements = []
+        self.rows = []
+        self.params = []
+        self._fetch = fetch or []
+
+    def mogrify(self, template, args):
+        self.rows.append(tuple(args))
+        return b'(...)'
+
+    def execute(self, sql, params=None):
+        sql = sql.decode() if isinstance(sql, bytes) else sql
+        self.statements.append(' '.join(sql.split()))
+        self.params.append(params)
+
+    def fetchall(self):
+        return self._fetch
+
+
+def _walk(n, price=90000.0, seed=7, t0=T0):
+    rng = random.Random(seed)
+    out = []
+    for i in range(n):
+        c = price + rng.gauss(0, 40)
+        out.append({'ts': t0 + timedelta(minutes=i), 'o': price,
+                    'h': max(price, c) + rng.uniform(0, 60),
+                    'l': min(price, c) - rng.uniform(0, 60),
+                    'c': c, 'v': rng.uniform(0.5, 80.0)})
+        price = c
+    return out
+
+
+def _assert_profile_close(tc, got, want):
+    tc.assertEqual(sorted(got), sorted(want))
+    for k in want:
+        tc.assertAlmostEqual(got[k], want[k], places=6)
+
+
+class TestVolProfile(unittest.TestCase):
+
+    # ── Test 1: rolling == full rebuild ──
+    def test_rolling_matches_rebuild(self):
+        candles = _walk(900)
+        window = 240
+        mp = vp.MultiProfile(vp.BIN_SIZE, windows=(('4h', window * 60),))
+        for i, c in enumerate(candles):
+            mp.add_bar(c)
+            prof = mp.windows['4h']
+            if i < 50 or i % 37:
+                continue
+            ref = vp.build_profile(candles[max(0, i - window + 1):i + 1])
+            _assert_profile_close(self, prof.profile(), ref)
+            poc, vah, val = prof.levels()
+            self.assertEqual(poc, vp.calc_poc(ref))
+            self.assertEqual((vah, val), vp.calc_value_area(ref, vp.calc_poc(ref)))
+            self.assertEqual(len(prof), window if i >= window - 1 else i + 1)
+
+        # Resync keeps the same histogram
+        before = prof.profile()
+        prof._resync()
+        _assert_profile_close(self, prof.profile(), before)
+
+    # ── Test 2: time-based eviction ──
+    def test_gap_evicts_by_time(self):
+        prof = vp.RollingProfile(600, 50)
+        t = T0.timestamp()
+        for i in range(10):
+            prof.add(t + i * 60, 1800, 1801, 1.0)
+        self.assertEqual(len(prof), 10)
+        prof.add(t + 9 * 60 + 300, 1900, 1900, 6.0)   # 4 bars missing
+        self.assertEqual(len(prof), 6)
+        self.assertEqual(prof.levels()[0], 95000.0)
+        # Old POC bucket drains fully → removed from histogram
+        prof.add(t + 9 * 60 + 900, 1900, 1900, 1.0)
+        self.assertEqual(list(prof.profile()), ['95000.0'])
+
+    # ── Test 3: multi-window ──
+    def test_multi_window(self):
+        candles = _walk(1500, seed=11)
+        mp = vp.MultiProfile(vp.BIN_SIZE)
+        for c in candles[:5]:
+            mp.add_bar(c)
+        self.assertEqual(mp.levels()['1h'], (None, None, None))
+        for c in candles[5:]:
+            mp.add_bar(c)
+        self.assertEqual({w: len(p) for w, p in mp.windows.items()},
+                         {'1h': 60, '4h': 240, '24h': 1440})
+        lv = mp.levels()
+        for w, n in (('1h', 60), ('24h', 1440)):
+            ref = vp.build_profile(candles[-n:])
+            poc = vp.calc_poc(ref)
+            self.assertEqual(lv[w], (poc,) + vp.calc_value_area(ref, poc))
+        self.assertEqual(mp.last_ts, candles[-1]['ts'])
+
+    # ── Test 4: daemon tick ──
+    def test_run_once_upserts_slot(self):
+        btc = _walk(300)
+        eth = _walk(300, price=3000.0, seed=3)
+        for c in eth:
+            c.update(h=c['h'] / 30, l=c['l'] / 30)
+        seed_rows = [(sym, c['ts'], c['o'], c['h'], c['l'], c['c'], c['v'])
+                     for sym, cs in ((BTC, btc[:-3]), (ETH, eth[:-1]))
+                     for c in reversed(cs)]
+        states = vp.seed(_FakeCursor(fetch=seed_rows), [BTC, ETH])
+        self.assertEqual(states[ETH].bin_size, vp.bin_size_for(ETH, eth[-2]['c']))
+
+        new = [(sym, c['ts'], c['o'], c['h'], c['l'], c['c'], c['v'])
+               for sym, cs in ((BTC, btc[-3:]), (ETH, eth[-1:])) for c in cs]
+        cur = _FakeCursor(fetch=new)
+        self.assertEqual(vp.run_once(cur, states), 2)
+        self.assertEqual(cur.params[0][0], [BTC, ETH])
+        self.assertEqual(cur.params[0][1], [btc[-4]['ts'], eth[-2]['ts']])
+        self.assertEqual(sum('INSERT INTO vol_profile' in s for s in cur.statements), 1)
+
+        row = cur.rows[0]
+        self.assertEqual(row[:3], (BTC, '1m', datetime(2026, 3, 1, 4, 55, tzinfo=timezone.utc)))
+        ref = vp.build_profile(btc[-240:])
+        poc = vp.calc_poc(ref)
+        self.assertEqual(row[5:8], (poc,) + vp.calc_value_area(ref, poc))
+        self.assertEqual(len(row), 14)
+        self.assertEqual(states[BTC].last_ts, btc[-1]['ts'])
+
+        # Nothing new → nothing written
+        cur = _FakeCursor(fetch=[])
+        self.assertEqual(vp.run_once(cur, states), 0)
+        self.assertFalse(any('INSERT' in s for s in cur.statements))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -1,27 +1,56 @@
 """
 vol_profile.py — Volume Profile calculator daemon.
 
-Runs every 5 minutes:
-  1. Fetch last 240 1m candles from DB
-  2. Build volume profile (price buckets of $50)
-  3. Calculate POC (Point of Control), VAH/VAL (Value Area 70%)
-  4. Upsert to vol_profile table
+Keeps a rolling volume histogram per symbol and lookback, updated bar by bar:
+  1. Seed each symbol from its last 24h of closed 1m candles (one query for
+     all symbols), then every POLL_SEC read only newly closed bars
+  2. Each bar's volume is spread evenly across the price buckets between its
+     low and high ($50 for BTC; other symbols get ~0.05% of price, rounded
+     to 1/2/5 x 10^n); the bar is added to the 1h/4h/24h histograms and
+     bars leaving a window are evicted — O(buckets touched) per bar
+  3. POC is tracked on update; VAH/VAL (Value Area 70%) are re-expanded from
+     the histogram only when it changed
+  4. Upsert to vol_profile (one statement for all symbols): poc/vah/val and
+     profile are the 4h window as before, plus poc/vah/val_1h and _24h
+
+Rows are keyed by 5-minute slot (ts = slot start), so history keeps one row
+per 5 minutes while the latest row is refreshed on every closed bar.
+Histograms are rebuilt from candles every RESEED_SEC to pick up late
+corrections to older bars.
 
 Consumed by: market_snapshot.py, position_manager.py, event_trigger.py, telegram_cmd_poller.py
 """
 import json
 import time
-import os
+import bisect
 import traceback
+import math
+from collections import deque
+from datetime import datetime, timezone
 import psycopg2
+from psycopg2.extras import execute_values
 from db_config import get_conn
+from db_migrations import ensure_pipeline_lag, ensure_vol_profile_columns
+from market_symbols import get_symbols, FairScheduler, LagTracker
 
-SYMBOL = os.getenv('SYMBOL', 'BTC/USDT:USDT')
+SYMBOLS = get_symbols()
+SYMBOL = SYMBOLS[0]
 TF = '1m'
 LOOKBACK = 240       # 4 hours of 1m candles
 BIN_SIZE = 50        # $50 price buckets
+BIN_SIZES = {'BTC/USDT:USDT': BIN_SIZE}
+AUTO_BIN_PCT = 0.0005  # bucket ≈ 0.05% of price for symbols not in BIN_SIZES
 VALUE_AREA_PCT = 0.7  # 70% of total volume
-LOOP_INTERVAL = 300   # 5 minutes
+WINDOWS = (('1h', 3600), ('4h', LOOKBACK * 60), ('24h', 86400))
+MAIN_WINDOW = '4h'    # → poc / vah / val / profile columns
+MIN_BARS = 10         # per window, else that window's levels are NULL
+SLOT_SEC = 300        # one vol_profile row per 5 minutes
+POLL_SEC = 10
+RESEED_SEC = 3600
+
+# Histogram sums are rebuilt from their bars every N evictions to bound
+# floating-point drift from repeated add/subtract.
+_RESYNC_EVERY = 4096
 
 LOG_PREFIX = '[vol_profile]'
 
@@ -30,9 +59,20 @@ def _log(msg):
     print(f'{LOG_PREFIX} {msg}', flush=True)
 
 
-def bucket(px):
+def bucket(px, bin_size=BIN_SIZE):
     """Round price down to nearest bin_size bucket."""
-    return float(int(px // BIN_SIZE) * BIN_SIZE)
+    return round(float(int(px // bin_size) * bin_size), 8)
+
+
+def bin_size_for(symbol, price):
+    """Bucket size: fixed per symbol, else ~AUTO_BIN_PCT of price (1/2/5 x 10^n)."""
+    if symbol in BIN_SIZES:
+        return BIN_SIZES[symbol]
+    raw = max(float(price or 0) * AUTO_BIN_PCT, 1e-8)
+    exp = math.floor(math.log10(raw))
+    for m in (1, 2, 5, 10):
+        if m * 10 ** exp >= raw:
+            return round(m * 10 ** exp, 10)
 
 
 def _get_db():
@@ -40,22 +80,65 @@ def _get_db():
     return get_conn(autocommit=True)
 
 
-def fetch_candles(cur):
-    """Fetch last LOOKBACK 1m candles from DB."""
+def _epoch(ts):
+    if isinstance(ts, datetime):
+        if ts.tzinfo is None:
+            ts = ts.replace(tzinfo=timezone.utc)
+        return ts.timestamp()
+    return float(ts)
+
+
+def _candle(r):
+    return {'ts': r[0], 'o': float(r[1]), 'h': float(r[2]),
+            'l': float(r[3]), 'c': float(r[4]), 'v': float(r[5])}
+
+
+def fetch_candles(cur, symbols=None, lookback=LOOKBACK, closed_only=False):
+    """Fetch last `lookback` 1m candles per symbol (newest first), one query.
+
+    Returns {symbol: [candle dict, ...]}.
+    """
+    symbols = list(symbols or SYMBOLS)
+    closed = "AND ts < date_trunc('minute', now())" if closed_only else ''
+    cur.execute(f"""
+        SELECT s.symbol, c.ts, c.o, c.h, c.l, c.c, c.v
+        FROM unnest(%s::text[]) AS s(symbol)
+        CROSS JOIN LATERAL (
+            SELECT ts, o, h, l, c, v FROM candles
+            WHERE symbol = s.symbol AND tf = %s {closed}
+            ORDER BY ts DESC LIMIT %s
+        ) c
+        ORDER BY s.symbol, c.ts DESC;
+    """, (symbols, TF, lookback))
+    out = {sym: [] for sym in symbols}
+    for r in cur.fetchall():
+        out[r[0]].append(_candle(r[1:]))
+    return out
+
+
+def fetch_closed_since(cur, since_by_symbol):
+    """Closed 1m candles after each symbol's last ingested bar, one query.
+
+    Returns {symbol: [candle dict, ...] ASC}.
+    """
+    if not since_by_symbol:
+        return {}
+    syms = list(since_by_symbol)
     cur.execute("""
-        SELECT ts, o, h, l, c, v FROM candles
-        WHERE symbol = %s AND tf = %s
-        ORDER BY ts DESC LIMIT %s;
-    """, (SYMBOL, TF, LOOKBACK))
-    rows = cur.fetchall()
-    if not rows:
-        return []
-    return [{'ts': r[0], 'o': float(r[1]), 'h': float(r[2]),
-             'l': float(r[3]), 'c': float(r[4]), 'v': float(r[5])}
-            for r in rows]
-
-
-def build_profile(candles):
+        SELECT c.symbol, c.ts, c.o, c.h, c.l, c.c, c.v
+        FROM candles c
+        JOIN unnest(%s::text[], %s::timestamptz[]) AS s(symbol, since)
+          ON c.symbol = s.symbol AND c.ts > s.since
+        WHERE c.tf = %s AND c.ts < date_trunc('minute', now())
+        ORDER BY c.symbol, c.ts ASC;
+    """, (syms, [since_by_symbol[x] for x in syms], TF))
+    out = {x: [] for x in syms}
+    for r in cur.fetchall():
+        out[r[0]].append(_candle(r[1:]))
+    return out
+
+
+def build_profile(candles, bin_size=BIN_SIZE):
     """Build volume profile from candles.
 
     For each candle, distribute volume across price buckets
@@ -65,16 +148,14 @@ def build_profile(candles):
     """
     profile = {}
     for c in candles:
-        low_bucket = bucket(c['l'])
-        high_bucket = bucket(c['h'])
+        low_bucket = bucket(c['l'], bin_size)
+        high_bucket = bucket(c['h'], bin_size)
         # Number of buckets this candle spans
-        n_buckets = max(1, int((high_bucket - low_bucket) / BIN_SIZE) + 1)
+        n_buckets = max(1, int(round((high_bucket - low_bucket) / bin_size)) + 1)
         vol_per_bucket = c['v'] / n_buckets
-        px = low_bucket
-        while px <= high_bucket:
-            key = str(px)
+        for i in range(n_buckets):
+            key = str(round(low_bucket + i * bin_size, 8))
             profile[key] = profile.get(key, 0) + vol_per_bucket
-            px += BIN_SIZE
     return profile
 
 
@@ -85,6 +166,33 @@ def calc_poc(profile):
     return float(max(profile, key=profile.get))
 
 
+def _expand_value_area(vols, poc_idx, target_vol):
+    """Grow [lo, hi] around poc_idx over price-sorted bucket volumes.
+
+    Adds the higher-volume adjacent bucket until target_vol is reached.
+    Returns (lo, hi) positions.
+    """
+    area_vol = vols[poc_idx]
+    lo_idx = hi_idx = poc_idx
+    while area_vol < target_vol:
+        can_go_lo = lo_idx > 0
+        can_go_hi = hi_idx < len(vols) - 1
+
+        if not can_go_lo and not can_go_hi:
+            break
+
+        lo_vol = vols[lo_idx - 1] if can_go_lo else -1
+        hi_vol = vols[hi_idx + 1] if can_go_hi else -1
+
+        if lo_vol >= hi_vol:
+            lo_idx -= 1
+            area_vol += lo_vol
+        else:
+            hi_idx += 1
+            area_vol += hi_vol
+    return lo_idx, hi_idx
+
+
 def calc_value_area(profile, poc_price):
     """Calculate Value Area High/Low (70% of total volume, centered on POC).
 
@@ -100,94 +208,267 @@ def calc_value_area(profile, poc_price):
     if total_vol <= 0:
         return None, None
 
-    target_vol = total_vol * VALUE_AREA_PCT
     sorted_buckets = sorted(profile.keys(), key=lambda k: float(k))
 
     poc_key = str(poc_price)
     if poc_key not in profile:
         return None, None
 
-    poc_idx = sorted_buckets.index(poc_key)
-    area_vol = profile[poc_key]
-    lo_idx = poc_idx
-    hi_idx = poc_idx
-
-    while area_vol < target_vol:
-        can_go_lo = lo_idx > 0
-        can_go_hi = hi_idx < len(sorted_buckets) - 1
-
-        if not can_go_lo and not can_go_hi:
-            break
-
-        lo_vol = profile.get(sorted_buckets[lo_idx - 1], 0) if can_go_lo else -1
-        hi_vol = profile.get(sorted_buckets[hi_idx + 1], 0) if can_go_hi else -1
-
-        if lo_vol >= hi_vol:
-            lo_idx -= 1
-            area_vol += lo_vol
-        else:
-            hi_idx += 1
-            area_vol += hi_vol
-
+    lo_idx, hi_idx = _expand_value_area(
+        [profile[k] for k in sorted_buckets], sorted_buckets.index(poc_key),
+        total_vol * VALUE_AREA_PCT)
     val = float(sorted_buckets[lo_idx])
     vah = float(sorted_buckets[hi_idx])
     return vah, val
 
 
-def upsert_profile(cur, ts, profile, poc, vah, val):
-    """Upsert volume profile to DB."""
-    cur.execute("""
-        INSERT INTO vol_profile (symbol, tf, ts, bin_size, profile, poc, vah, val)
-        VALUES (%s, %s, %s, %s, %s::jsonb, %s, %s, %s)
+# ── Rolling histogram ───────────────────────────────────
+
+class RollingProfile:
+    """Volume histogram over the bars of the last `window_sec`.
+
+    Buckets are integer indices (price // bin_size). Each bar contributes
+    vol_per to buckets [lo, hi]; add() and the evictions it triggers touch
+    only those buckets. Bars are evicted by time (ts <= newest - window), so
+    missing candles do not stretch the window.
+    """
+
+    def __init__(self, window_sec, bin_size):
+        self.window_sec = window_sec
+        self.bin_size = bin_size
+        self._bars = deque()         # (ts_epoch, lo, hi, vol_per)
+        self._hist = {}              # bucket → [volume, contributing bars]
+        self._keys = []              # sorted buckets present in _hist
+        self._total = 0.0
+        self._poc = None
+        self._poc_stale = False
+        self._va = None              # cached (vah, val), None when dirty
+        self._evictions = 0
+
+    def __len__(self):
+        return len(self._bars)
+
+    @property
+    def newest_ts(self):
+        return self._bars[-1][0] if self._bars else None
+
+    def _touch(self, lo, hi, vol_per, sign):
+        hist = self._hist
+        for b in range(lo, hi + 1):
+            cell = hist.get(b)
+            if sign > 0:
+                if cell is None:
+                    cell = hist[b] = [0.0, 0]
+                    bisect.insort(self._keys, b)
+                cell[0] += vol_per
+                cell[1] += 1
+                poc = self._poc
+                if not self._poc_stale and (
+                        poc is None or cell[0] > hist[poc][0]
+                        or (cell[0] == hist[poc][0] and b < poc)):
+                    self._poc = b
+            else:
+                cell[0] -= vol_per
+                cell[1] -= 1
+                if cell[1] == 0:
+                    del hist[b]
+                    del self._keys[bisect.bisect_left(self._keys, b)]
+                if b == self._poc:
+                    self._poc_stale = True
+        self._total += sign * vol_per * (hi - lo + 1)
+        self._va = None
+
+    def add(self, ts, lo, hi, vol_per):
+        """Add one bar's contribution, then evict bars that left the window."""
+        self._bars.append((ts, lo, hi, vol_per))
+        self._touch(lo, hi, vol_per, +1)
+        cutoff = ts - self.window_sec
+        while self._bars and self._bars[0][0] <= cutoff:
+            _, o_lo, o_hi, o_vol = self._bars.popleft()
+            self._touch(o_lo, o_hi, o_vol, -1)
+            self._evictions += 1
+        if self._evictions >= _RESYNC_EVERY:
+            self._resync()
+
+    def _resync(self):
+        bars = list(self._bars)
+        self._bars.clear()
+        self._hist, self._keys = {}, []
+        self._total, self._poc, self._poc_stale = 0.0, None, False
+        for bar in bars:
+            self._bars.append(bar)
+            self._touch(bar[1], bar[2], bar[3], +1)
+        self._evictions = 0
+
+    def _price(self, b):
+        return round(float(b * self.bin_size), 8)
+
+    def poc_bucket(self):
+        if self._poc_stale:
+            hist = self._hist
+            # Highest volume, lowest price on ties
+            self._poc = min(hist, key=lambda b: (-hist[b][0], b)) if hist else None
+            self._poc_stale = False
+        return self._poc
+
+    def levels(self):
+        """(poc, vah, val) prices, or (None, None, None) when empty."""
+        poc = self.poc_bucket()
+        if poc is None or self._total <= 0:
+            return None, None, None
+        if self._va is None:
+            keys = self._keys
+            lo, hi = _expand_value_area([self._hist[b][0] for b in keys],
+                                        bisect.bisect_left(keys, poc),
+                                        self._total * VALUE_AREA_PCT)
+            self._va = (self._price(keys[hi]), self._price(keys[lo]))
+        return (self._price(poc),) + self._va
+
+    def profile(self):
+        """{bucket_price_str: volume} like build_profile()."""
+        return {str(self._price(b)): self._hist[b][0] for b in self._keys}
+
+
+class MultiProfile:
+    """One symbol's RollingProfiles for every lookback in WINDOWS."""
+
+    def __init__(self, bin_size, windows=WINDOWS):
+        self.bin_size = bin_size
+        self.windows = {name: RollingProfile(sec, bin_size) for name, sec in windows}
+        self.last_ts = None          # newest ingested bar (as read from the DB)
+
+    def add_bar(self, c):
+        """Spread the bar's volume over its low..high buckets in every window."""
+        lo = int(c['l'] // self.bin_size)
+        hi = max(lo, int(c['h'] // self.bin_size))
+        vol_per = c['v'] / (hi - lo + 1)
+        ts = _epoch(c['ts'])
+        for prof in self.windows.values():
+            prof.add(ts, lo, hi, vol_per)
+        self.last_ts = c['ts']
+
+    def levels(self):
+        """{window: (poc, vah, val)}; None levels for windows under MIN_BARS."""
+        return {name: (prof.levels() if len(prof) >= MIN_BARS else (None, None, None))
+                for name, prof in self.windows.items()}
+
+
+def _slot_ts(ts):
+    ep = _epoch(ts)
+    return datetime.fromtimestamp(ep - ep % SLOT_SEC, tz=timezone.utc)
+
+
+def upsert_profiles(cur, items):
+    """Upsert [(symbol, ts, bin_size, profile, {window: (poc, vah, val)}), ...]
+    in one statement."""
+    if not items:
+        return
+    rows = []
+    for sym, ts, bin_size, profile, lv in items:
+        main = lv.get(MAIN_WINDOW, (None, None, None))
+        extra = lv.get('1h', (None, None, None)) + lv.get('24h', (None, None, None))
+        rows.append((sym, TF, ts, bin_size, json.dumps(profile, ensure_ascii=False))
+                    + tuple(main) + tuple(extra))
+    execute_values(cur, """
+        INSERT INTO vol_profile (symbol, tf, ts, bin_size, profile, poc, vah, val,
+                                 poc_1h, vah_1h, val_1h, poc_24h, vah_24h, val_24h)
+        VALUES %s
         ON CONFLICT (symbol, tf, ts) DO UPDATE SET
             bin_size = EXCLUDED.bin_size,
             profile = EXCLUDED.profile,
             poc = EXCLUDED.poc,
             vah = EXCLUDED.vah,
-            val = EXCLUDED.val;
-    """, (SYMBOL, TF, ts, BIN_SIZE,
-          json.dumps(profile, ensure_ascii=False),
-          poc, vah, val))
-
-
-def run_once(cur):
-    """Single calculation cycle."""
-    candles = fetch_candles(cur)
-    if len(candles) < 10:
-        _log(f'not enough candles: {len(candles)}')
-        return
-
-    profile = build_profile(candles)
-    poc = calc_poc(profile)
-    vah, val = calc_value_area(profile, poc)
-
-    # Use the most recent candle's timestamp
-    latest_ts = candles[0]['ts']
-    upsert_profile(cur, latest_ts, profile, poc, vah, val)
-    _log(f'updated: POC=${poc:,.0f} VAH=${vah:,.0f} VAL=${val:,.0f} '
-         f'buckets={len(profile)} candles={len(candles)}')
+            val = EXCLUDED.val,
+            poc_1h = EXCLUDED.poc_1h, vah_1h = EXCLUDED.vah_1h, val_1h = EXCLUDED.val_1h,
+            poc_24h = EXCLUDED.poc_24h, vah_24h = EXCLUDED.vah_24h, val_24h = EXCLUDED.val_24h;
+    """, rows, template='(%s, %s, %s, %s, %s::jsonb' + ', %s' * 9 + ')',
+        page_size=len(rows))
+
+
+def seed(cur, symbols):
+    """Fresh MultiProfiles from the last 24h of closed candles, one query."""
+    max_bars = max(sec for _, sec in WINDOWS) // 60
+    out = {}
+    for sym, candles in fetch_candles(cur, symbols, lookback=max_bars,
+                                      closed_only=True).items():
+        if not candles:
+            continue
+        mp = MultiProfile(bin_size_for(sym, candles[0]['c']))
+        for c in reversed(candles):
+            mp.add_bar(c)
+        out[sym] = mp
+    return out
+
+
+def run_once(cur, states, sched=None, lag=None):
+    """Feed newly closed bars to every symbol and upsert changed profiles.
+
+    states: {symbol: MultiProfile}, updated in place. Returns rows written.
+    """
+    live = {sym: mp for sym, mp in states.items() if mp.last_ts is not None}
+    new_bars = fetch_closed_since(cur, {sym: mp.last_ts for sym, mp in live.items()})
+    items = []
+    for sym in (sched.order() if sched else list(live)):
+        bars = new_bars.get(sym)
+        if sched:
+            sched.served(sym)
+        if not bars:
+            continue
+        mp = live[sym]
+        for c in bars:
+            mp.add_bar(c)
+        lv = mp.levels()
+        main = mp.windows[MAIN_WINDOW]
+        if lv[MAIN_WINDOW][0] is None:
+            _log(f'{sym}: not enough candles: {len(main)}')
+            continue
+        items.append((sym, _slot_ts(mp.last_ts), mp.bin_size, main.profile(), lv))
+        if lag is not None:
+            lag.observe(sym, mp.last_ts)
+        poc, vah, val = lv[MAIN_WINDOW]
+        _log(f'{sym}: POC={poc:,.6g} VAH={vah:,.6g} VAL={val:,.6g} bin={mp.bin_size:g} '
+             f'1h={lv["1h"][0]} 24h={lv["24h"][0]} buckets={len(main._keys)} '
+             f'bars={len(main)}')
+    upsert_profiles(cur, items)
+    return len(items)
 
 
 def main():
     _log('=== VOLUME PROFILE STARTED ===')
     conn = _get_db()
-    _log(f'symbol={SYMBOL} tf={TF} lookback={LOOKBACK} bin=${BIN_SIZE} interval={LOOP_INTERVAL}s')
+    with conn.cursor() as cur:
+        ensure_pipeline_lag(cur)
+        ensure_vol_profile_columns(cur)
+    sched = FairScheduler(SYMBOLS)
+    lag = LagTracker('vol_profile')
+    states = {}
+    last_seed = 0
+    _log(f'symbols={",".join(SYMBOLS)} tf={TF} windows={[w for w, _ in WINDOWS]} '
+         f'bin=${BIN_SIZE} poll={POLL_SEC}s')
 
     while True:
         try:
             with conn.cursor() as cur:
-                run_once(cur)
+                # Periodic rebuild; symbols without candles yet retry each minute
+                since_seed = time.time() - last_seed
+                if since_seed >= RESEED_SEC or (len(states) < len(SYMBOLS) and since_seed >= 60):
+                    states = seed(cur, SYMBOLS)
+                    last_seed = time.time()
+                    _log(f'seeded {sorted(states)}')
+                run_once(cur, states, sched, lag)
+            lag.maybe_flush(conn)
         except psycopg2.OperationalError:
             _log('DB connection lost, reconnecting...')
             try:
                 conn.close()
             except Exception:
                 pass
+            states, last_seed = {}, 0
             conn = _get_db()
         except Exception:
             traceback.print_exc()
 
-        time.sleep(LOOP_INTERVAL)
+        time.sleep(POLL_SEC)
 
 
 if __name__ == '__main__':
@@ -131,6 +131,8 @@ def _get_exchange():
         'enableRateLimit': True,
         'timeout': 20000,
         'options': {'defaultType': 'swap'}})
+    import exchange_state
+    exchange_state.track(ex)
     ex.load_markets()
     return ex
 
@@ -12,10 +12,30 @@ State machine per strategy:
   SHORT + FLAT  → close SHORT
   SHORT + LONG  → close + open LONG (flip)
   Same signal   → HOLD
+
+Positions and equity are kept in memory (VirtualBook); the DB tables are the
+durable copy, written in batches:
+  - the first call rebuilds the book from bench_virtual_positions and the
+    latest bench_equity_timeseries row of each strategy source
+  - every change becomes an op (execution / equity point / position row),
+    appended and fsync'd to the write-ahead journal (WAL_PATH) before
+    process_signal returns
+  - flush() writes all queued ops in one transaction and then truncates the
+    journal; bench_collector flushes once per cycle, maybe_flush() on a
+    timer / op count
+  - at startup, ops left in the journal by a crash are written before the
+    book is loaded. Every op is idempotent (exec_id conflict, equity point
+    keyed by (source_id, ts), position upsert), so replaying ops that were
+    already committed is harmless.
+
+VirtualBook(wal_path=None) used without a connection is a pure in-memory
+engine for offline replays (pass ts= per signal, read ops with drain()).
 """
 import json
-from datetime import datetime, timezone, timedelta
+import os
 import threading
+import time
+from datetime import datetime, timezone
 
 LOG_PREFIX = '[backtest_engine]'
 
@@ -28,6 +48,12 @@ INITIAL_EQUITY = 1000.0   # $1000 starting capital
 # Funding: 8-hour intervals (Bybit perpetual standard)
 FUNDING_INTERVAL_SEC = 8 * 3600
 
+# Batched persistence
+WAL_PATH = os.getenv('BENCH_ENGINE_WAL',
+                     os.path.join(os.path.dirname(os.path.abspath(__file__)), '.engine_wal.jsonl'))
+FLUSH_INTERVAL_SEC = 30
+FLUSH_MAX_OPS = 5000
+
 # Thread-safe counter for unique exec_id generation within same millisecond
 _exec_counter = 0
 _exec_lock = threading.Lock()
@@ -37,95 +63,8 @@ def _log(msg):
     print(f'{LOG_PREFIX} {msg}', flush=True)
 
 
-def initialize_strategy_equity(bench_conn, source_id):
-    """Set initial equity for a strategy source if no equity row exists."""
-    with bench_conn.cursor() as cur:
-        cur.execute("""
-            SELECT count(*) FROM bench_equity_timeseries WHERE source_id = %s;
-        """, (source_id,))
-        if cur.fetchone()[0] == 0:
-            cur.execute("""
-                INSERT INTO bench_equity_timeseries
-                    (source_id, equity, wallet_balance, available_balance)
-                VALUES (%s, %s, %s, %s);
-            """, (source_id, INITIAL_EQUITY, INITIAL_EQUITY, INITIAL_EQUITY))
-            bench_conn.commit()
-            _log(f'initialized equity ${INITIAL_EQUITY} for source {source_id}')
-
-
-def process_signal(bench_conn, source_id, strategy_name, signal, confidence, price,
-                   funding_rate=None):
-    """Process a strategy signal through the virtual execution engine.
-
-    Returns: {'action': str, 'details': dict}
-    """
-    pos = _get_virtual_position(bench_conn, source_id)
-    current_side = pos.get('side') if pos else None
-    price = float(price)
-
-    # State machine
-    if not current_side:
-        # FLAT
-        if signal == 'LONG':
-            _open_position(bench_conn, source_id, strategy_name, 'LONG', price)
-            return {'action': 'OPEN_LONG', 'details': {'price': price}}
-        elif signal == 'SHORT':
-            _open_position(bench_conn, source_id, strategy_name, 'SHORT', price)
-            return {'action': 'OPEN_SHORT', 'details': {'price': price}}
-        else:
-            return {'action': 'HOLD', 'details': {'state': 'FLAT'}}
-
-    elif current_side == 'LONG':
-        if signal == 'FLAT':
-            details = _close_position(bench_conn, source_id, strategy_name, price,
-                                      funding_rate)
-            return {'action': 'CLOSE_LONG', 'details': details}
-        elif signal == 'SHORT':
-            close_details = _close_position(bench_conn, source_id, strategy_name, price,
-                                            funding_rate)
-            _open_position(bench_conn, source_id, strategy_name, 'SHORT', price)
-            return {'action': 'FLIP_TO_SHORT', 'details': close_details}
-        else:
-            # Same signal (LONG) → accumulate funding
-            _accumulate_funding(bench_conn, source_id, strategy_name, pos,
-                                funding_rate)
-            return {'action': 'HOLD', 'details': {'state': 'LONG'}}
-
-    elif current_side == 'SHORT':
-        if signal == 'FLAT':
-            details = _close_position(bench_conn, source_id, strategy_name, price,
-                                      funding_rate)
-            return {'action': 'CLOSE_SHORT', 'details': details}
-        elif signal == 'LONG':
-            close_details = _close_position(bench_conn, source_id, strategy_name, price,
-                                            funding_rate)
-            _open_position(bench_conn, source_id, strategy_name, 'LONG', price)
-            return {'action': 'FLIP_TO_LONG', 'details': close_details}
-        else:
-            _accumulate_funding(bench_conn, source_id, strategy_name, pos,
-                                funding_rate)
-            return {'action': 'HOLD', 'details': {'state': 'SHORT'}}
-
-    return {'action': 'HOLD', 'details': {}}
-
-
-def _get_virtual_position(bench_conn, source_id):
-    """Get current virtual position for a strategy source."""
-    with bench_conn.cursor() as cur:
-        cur.execute("""
-            SELECT id, strategy_name, side, size, entry_price, entry_ts,
-                   notional, accumulated_funding
-            FROM bench_virtual_positions WHERE source_id = %s;
-        """, (source_id,))
-        row = cur.fetchone()
-        if row and row[2]:  # has side
-            return {
-                'id': row[0], 'strategy_name': row[1], 'side': row[2],
-                'size': float(row[3]), 'entry_price': float(row[4]),
-                'entry_ts': row[5], 'notional': float(row[6] or 0),
-                'accumulated_funding': float(row[7] or 0),
-            }
-    return None
+def _dt(ts):
+    return datetime.fromtimestamp(ts, timezone.utc) if ts is not None else None
 
 
 def _apply_slippage(price, side):
@@ -137,165 +76,370 @@ def _apply_slippage(price, side):
         return price - slip  # sell lower
 
 
-def _open_position(bench_conn, source_id, strategy_name, side, price):
-    """Open a virtual position with slippage + taker fee."""
-    fill_price = _apply_slippage(price, side)
-    size = FIXED_NOTIONAL / fill_price
-    fee = FIXED_NOTIONAL * TAKER_FEE
-    now = datetime.now(timezone.utc)
-
-    # Record execution
-    exec_id = _make_exec_id(strategy_name)
-    exec_side = 'BUY' if side == 'LONG' else 'SELL'
-    _record_execution(bench_conn, source_id, exec_side, size, fill_price, fee,
-                      exec_id, {'action': 'OPEN', 'virtual': True})
-
-    # Upsert virtual position
-    with bench_conn.cursor() as cur:
-        cur.execute("""
-            INSERT INTO bench_virtual_positions
-                (source_id, strategy_name, side, size, entry_price, entry_ts,
-                 notional, accumulated_funding, updated_at)
-            VALUES (%s, %s, %s, %s, %s, %s, %s, 0, now())
-            ON CONFLICT (strategy_name) DO UPDATE SET
-                side = EXCLUDED.side, size = EXCLUDED.size,
-                entry_price = EXCLUDED.entry_price, entry_ts = EXCLUDED.entry_ts,
-                notional = EXCLUDED.notional, accumulated_funding = 0,
-                updated_at = now();
-        """, (source_id, strategy_name, side, size, fill_price, now,
-              FIXED_NOTIONAL))
-    bench_conn.commit()
-
-
-def _close_position(bench_conn, source_id, strategy_name, price, funding_rate=None):
-    """Close virtual position, compute PnL, update equity."""
-    pos = _get_virtual_position(bench_conn, source_id)
-    if not pos:
-        return {'error': 'no position to close'}
-
-    # Apply slippage (opposite direction for close)
-    close_side = 'SHORT' if pos['side'] == 'LONG' else 'LONG'
-    fill_price = _apply_slippage(price, close_side)
-    fee = pos['notional'] * TAKER_FEE
-
-    # PnL calculation
-    if pos['side'] == 'LONG':
-        raw_pnl = pos['size'] * (fill_price - pos['entry_price'])
-    else:
-        raw_pnl = pos['size'] * (pos['entry_price'] - fill_price)
-
-    # Subtract opening + closing fees and accumulated funding
-    open_fee = pos['notional'] * TAKER_FEE
-    total_fees = open_fee + fee
-    funding_cost = pos['accumulated_funding']
-    net_pnl = raw_pnl - total_fees - funding_cost
-
-    # Record close execution
-    exec_id = _make_exec_id(strategy_name)
-    exec_side = 'SELL' if pos['side'] == 'LONG' else 'BUY'
-    _record_execution(bench_conn, source_id, exec_side, pos['size'], fill_price, fee,
-                      exec_id, {
-                          'action': 'CLOSE', 'virtual': True,
-                          'pnl': round(net_pnl, 6),
-                          'funding_cost': round(funding_cost, 6),
-                          'entry_price': pos['entry_price'],
-                      })
-
-    # Update equity
-    _update_equity(bench_conn, source_id, net_pnl)
-
-    # Clear virtual position (set to flat)
-    with bench_conn.cursor() as cur:
-        cur.execute("""
-            UPDATE bench_virtual_positions
-            SET side = NULL, size = 0, entry_price = NULL, entry_ts = NULL,
-                notional = NULL, accumulated_funding = 0, updated_at = now()
-            WHERE source_id = %s;
-        """, (source_id,))
-    bench_conn.commit()
-
-    return {
-        'side': pos['side'], 'entry': pos['entry_price'], 'exit': fill_price,
-        'raw_pnl': round(raw_pnl, 6), 'fees': round(total_fees, 6),
-        'funding': round(funding_cost, 6), 'net_pnl': round(net_pnl, 6),
-    }
-
-
-def _accumulate_funding(bench_conn, source_id, strategy_name, pos, funding_rate):
-    """Accumulate funding if 8h interval has passed since last update."""
-    if funding_rate is None or not pos:
-        return
-    funding_rate = float(funding_rate)
-    if funding_rate == 0:
-        return
-
-    entry_ts = pos.get('entry_ts')
-    if not entry_ts:
-        return
-
-    now = datetime.now(timezone.utc)
-    if entry_ts.tzinfo is None:
-        entry_ts = entry_ts.replace(tzinfo=timezone.utc)
-
-    # Check if a funding interval has passed since entry/last accumulation
-    elapsed = (now - entry_ts).total_seconds()
-    funding_periods = int(elapsed / FUNDING_INTERVAL_SEC)
-    if funding_periods <= 0:
-        return
-
-    # Funding cost = notional * rate * periods (since entry)
-    # We only add incremental funding (already accumulated is stored)
-    notional = pos.get('notional', FIXED_NOTIONAL)
-    total_expected = abs(notional * funding_rate * funding_periods)
-    already = pos.get('accumulated_funding', 0)
-    incremental = max(0, total_expected - already)
-
-    if incremental > 0:
-        with bench_conn.cursor() as cur:
-            cur.execute("""
-                UPDATE bench_virtual_positions
-                SET accumulated_funding = accumulated_funding + %s, updated_at = now()
-                WHERE source_id = %s;
-            """, (incremental, source_id))
-        bench_conn.commit()
-
-
-def _make_exec_id(strategy_name):
+def _make_exec_id(strategy_name, ts):
     """Generate unique exec_id (safe for flip: close+open in same ms)."""
     global _exec_counter
-    now = datetime.now(timezone.utc)
     with _exec_lock:
         _exec_counter += 1
         seq = _exec_counter
-    return f'vm_{strategy_name}_{int(now.timestamp() * 1000)}_{seq}'
-
+    return f'vm_{strategy_name}_{int(ts * 1000)}_{seq}'
+
+
+class VirtualBook:
+    """Virtual positions + equity per strategy source, persisted in batches."""
+
+    def __init__(self, wal_path=None):
+        self.positions = {}     # source_id → position dict (entry_ts as epoch s)
+        self.equity = {}        # source_id → latest equity
+        self.pending = []       # ops not yet written to the DB
+        self.wal_path = wal_path
+        self.loaded = False
+        self.last_flush = time.time()
+        self._lock = threading.RLock()
+
+    # ── startup ──
+
+    def load(self, bench_conn):
+        """Write ops left in the journal, then rebuild the book from the DB."""
+        with self._lock:
+            ops = self._read_wal()
+            if ops:
+                _write_ops(bench_conn, ops)
+                bench_conn.commit()
+                self._truncate_wal()
+                _log(f'recovered {len(ops)} journaled ops')
+            with bench_conn.cursor() as cur:
+                cur.execute("""
+                    SELECT source_id, strategy_name, side, size, entry_price, entry_ts,
+                           notional, accumulated_funding
+                    FROM bench_virtual_positions;
+                """)
+                self.positions = {}
+                for row in cur.fetchall():
+                    if row[2]:
+                        self.positions[row[0]] = {
+                            'strategy_name': row[1], 'side': row[2],
+                            'size': float(row[3]), 'entry_price': float(row[4]),
+                            'entry_ts': row[5].timestamp() if row[5] else None,
+                            'notional': float(row[6] or 0),
+                            'accumulated_funding': float(row[7] or 0),
+                        }
+                cur.execute("""
+                    SELECT DISTINCT ON (source_id) source_id, equity
+                    FROM bench_equity_timeseries
+                    WHERE source_id IN (SELECT id FROM benchmark_sources
+                                        WHERE kind = 'STRATEGY_SIGNAL')
+                    ORDER BY source_id, ts DESC, id DESC;
+                """)
+                self.equity = {r[0]: float(r[1]) for r in cur.fetchall()}
+            bench_conn.commit()
+            self.loaded = True
+            _log(f'book loaded: {len(self.positions)} open positions, '
+                 f'{len(self.equity)} equity sources')
+
+    # ── signals ──
+
+    def initialize_equity(self, source_id, ts=None):
+        """Start a source at INITIAL_EQUITY if it has no equity yet. True if started."""
+        with self._lock:
+            if source_id in self.equity:
+                return False
+            self.equity[source_id] = INITIAL_EQUITY
+            self._emit([{'op': 'equity', 'source_id': source_id, 'equity': INITIAL_EQUITY,
+                         'ts': time.time() if ts is None else ts}])
+            return True
+
+    def process(self, source_id, strategy_name, signal, price, funding_rate=None, ts=None):
+        """Apply one signal. Returns: {'action': str, 'details': dict}"""
+        ts = time.time() if ts is None else ts
+        price = float(price)
+        with self._lock:
+            pos = self.positions.get(source_id)
+            current_side = pos['side'] if pos else None
+            ops = []
+            try:
+                # State machine
+                if not current_side:
+                    # FLAT
+                    if signal in ('LONG', 'SHORT'):
+                        self._open(ops, source_id, strategy_name, signal, price, ts)
+                        return {'action': f'OPEN_{signal}', 'details': {'price': price}}
+                    return {'action': 'HOLD', 'details': {'state': 'FLAT'}}
+
+                if signal == current_side:
+                    # Same signal → accumulate funding
+                    self._accumulate_funding(ops, source_id, pos, funding_rate, ts)
+                    return {'action': 'HOLD', 'details': {'state': current_side}}
+
+                if signal == 'FLAT':
+                    details = self._close(ops, source_id, strategy_name, price, ts)
+                    return {'action': f'CLOSE_{current_side}', 'details': details}
+
+                if signal in ('LONG', 'SHORT'):
+                    details = self._close(ops, source_id, strategy_name, price, ts)
+                    self._open(ops, source_id, strategy_name, signal, price, ts)
+                    return {'action': f'FLIP_TO_{signal}', 'details': details}
+
+                return {'action': 'HOLD', 'details': {}}
+            finally:
+                if ops:
+                    self._emit(ops)
+
+    def _open(self, ops, source_id, strategy_name, side, price, ts):
+        """Open a virtual position with slippage + taker fee."""
+        fill_price = _apply_slippage(price, side)
+        size = FIXED_NOTIONAL / fill_price
+        fee = FIXED_NOTIONAL * TAKER_FEE
+
+        ops.append(_exec_op(source_id, strategy_name, 'BUY' if side == 'LONG' else 'SELL',
+                            size, fill_price, fee, ts, {'action': 'OPEN', 'virtual': True}))
+        pos = {'strategy_name': strategy_name, 'side': side, 'size': size,
+               'entry_price': fill_price, 'entry_ts': ts,
+               'notional': FIXED_NOTIONAL, 'accumulated_funding': 0.0}
+        self.positions[source_id] = pos
+        ops.append(_position_op(source_id, strategy_name, pos, ts))
+
+    def _close(self, ops, source_id, strategy_name, price, ts):
+        """Close virtual position, compute PnL, update equity."""
+        pos = self.positions.get(source_id)
+        if not pos:
+            return {'error': 'no position to close'}
+
+        # Apply slippage (opposite direction for close)
+        close_side = 'SHORT' if pos['side'] == 'LONG' else 'LONG'
+        fill_price = _apply_slippage(price, close_side)
+        fee = pos['notional'] * TAKER_FEE
+
+        # PnL calculation
+        if pos['side'] == 'LONG':
+            raw_pnl = pos['size'] * (fill_price - pos['entry_price'])
+        else:
+            raw_pnl = pos['size'] * (pos['entry_price'] - fill_price)
+
+        # Subtract opening + closing fees and accumulated funding
+        open_fee = pos['notional'] * TAKER_FEE
+        total_fees = open_fee + fee
+        funding_cost = pos['accumulated_funding']
+        net_pnl = raw_pnl - total_fees - funding_cost
+
+        ops.append(_exec_op(source_id, strategy_name, 'SELL' if pos['side'] == 'LONG' else 'BUY',
+                            pos['size'], fill_price, fee, ts, {
+                                'action': 'CLOSE', 'virtual': True,
+                                'pnl': round(net_pnl, 6),
+                                'funding_cost': round(funding_cost, 6),
+                                'entry_price': pos['entry_price'],
+                            }))
+
+        equity = self.equity.get(source_id, INITIAL_EQUITY) + net_pnl
+        self.equity[source_id] = equity
+        ops.append({'op': 'equity', 'source_id': source_id, 'equity': equity, 'ts': ts})
+
+        # Flat row keeps the strategy's position slot
+        self.positions.pop(source_id, None)
+        ops.append(_position_op(source_id, strategy_name, None, ts))
+
+        return {
+            'side': pos['side'], 'entry': pos['entry_price'], 'exit': fill_price,
+            'raw_pnl': round(raw_pnl, 6), 'fees': round(total_fees, 6),
+            'funding': round(funding_cost, 6), 'net_pnl': round(net_pnl, 6),
+        }
+
+    def _accumulate_funding(self, ops, source_id, pos, funding_rate, ts):
+        """Accumulate funding if 8h interval has passed since last update."""
+        if funding_rate is None or not pos:
+            return
+        funding_rate = float(funding_rate)
+        if funding_rate == 0:
+            return
+
+        entry_ts = pos.get('entry_ts')
+        if not entry_ts:
+            return
+
+        # Check if a funding interval has passed since entry/last accumulation
+        elapsed = ts - entry_ts
+        funding_periods = int(elapsed / FUNDING_INTERVAL_SEC)
+        if funding_periods <= 0:
+            return
+
+        # Funding cost = notional * rate * periods (since entry)
+        # We only add incremental funding (already accumulated is stored)
+        notional = pos.get('notional', FIXED_NOTIONAL)
+        total_expected = abs(notional * funding_rate * funding_periods)
+        already = pos.get('accumulated_funding', 0)
+        incremental = max(0, total_expected - already)
+
+        if incremental > 0:
+            pos['accumulated_funding'] = already + incremental
+            ops.append(_position_op(source_id, pos['strategy_name'], pos, ts))
+
+    # ── persistence ──
+
+    def _emit(self, ops):
+        self.pending.extend(ops)
+        if not self.wal_path:
+            return
+        try:
+            with open(self.wal_path, 'a') as f:
+                f.write(''.join(json.dumps(op, default=str) + '\n' for op in ops))
+                f.flush()
+                os.fsync(f.fileno())
+        except OSError as e:
+            _log(f'journal write failed ({len(ops)} ops kept in memory): {e}')
+
+    def _read_wal(self):
+        if not self.wal_path or not os.path.isfile(self.wal_path):
+            return []
+        ops = []
+        with open(self.wal_path) as f:
+            for line in f:
+                try:
+                    ops.append(json.loads(line))
+                except ValueError:
+                    _log('journal: skipping torn line')
+        return ops
+
+    def _truncate_wal(self):
+        if self.wal_path and os.path.isfile(self.wal_path):
+            with open(self.wal_path, 'w'):
+                pass
+
+    def flush(self, bench_conn):
+        """Write queued ops in one transaction. Returns the number written (0 on error)."""
+        with self._lock:
+            ops = self.pending
+            if not ops:
+                return 0
+            try:
+                _write_ops(bench_conn, ops)
+                bench_conn.commit()
+            except Exception as e:
+                bench_conn.rollback()
+                _log(f'flush failed, {len(ops)} ops kept: {e}')
+                return 0
+            self.pending = []
+            self._truncate_wal()
+            self.last_flush = time.time()
+            return len(ops)
+
+    def maybe_flush(self, bench_conn):
+        """flush() once FLUSH_INTERVAL_SEC passed or FLUSH_MAX_OPS are queued."""
+        if self.pending and (len(self.pending) >= FLUSH_MAX_OPS
+                             or time.time() - self.last_flush >= FLUSH_INTERVAL_SEC):
+            return self.flush(bench_conn)
+        return 0
+
+    def drain(self):
+        """Queued ops, cleared (offline replays without a DB)."""
+        with self._lock:
+            ops, self.pending = self.pending, []
+            return ops
+
+
+def _exec_op(source_id, strategy_name, side, qty, price, fee, ts, meta):
+    return {'op': 'exec', 'source_id': source_id, 'side': side, 'qty': qty, 'price': price,
+            'fee': fee, 'exec_id': _make_exec_id(strategy_name, ts), 'meta': meta, 'ts': ts}
+
+
+def _position_op(source_id, strategy_name, pos, ts):
+    """Full bench_virtual_positions row for source_id (pos=None → flat)."""
+    pos = pos or {}
+    return {'op': 'position', 'source_id': source_id, 'strategy_name': strategy_name,
+            'side': pos.get('side'), 'size': pos.get('size', 0),
+            'entry_price': pos.get('entry_price'), 'entry_ts': pos.get('entry_ts'),
+            'notional': pos.get('notional'),
+            'accumulated_funding': pos.get('accumulated_funding', 0), 'ts': ts}
+
+
+def _write_ops(bench_conn, ops):
+    """Write ops (idempotently) without committing."""
+    from psycopg2.extras import execute_values
+
+    execs = [(o['source_id'], _dt(o['ts']), o['side'], o['qty'], o['price'], o['fee'],
+              o['exec_id'], json.dumps(o['meta'])) for o in ops if o['op'] == 'exec']
+    equity = [(o['source_id'], _dt(o['ts']), o['equity']) for o in ops if o['op'] == 'equity']
+    # Only the last row per strategy matters
+    positions = {o['strategy_name']: o for o in ops if o['op'] == 'position'}
 
-def _record_execution(bench_conn, source_id, side, qty, price, fee, exec_id, meta):
-    """Record a virtual execution in bench_executions."""
     with bench_conn.cursor() as cur:
-        cur.execute("""
-            INSERT INTO bench_executions
-                (source_id, symbol, side, qty, price, fee, exec_id, meta)
-            VALUES (%s, 'BTC/USDT:USDT', %s, %s, %s, %s, %s, %s)
-            ON CONFLICT (source_id, exec_id) DO NOTHING;
-        """, (source_id, side, qty, price, fee, exec_id, json.dumps(meta)))
-    bench_conn.commit()
+        if execs:
+            execute_values(cur, """
+                INSERT INTO bench_executions
+                    (source_id, ts, symbol, side, qty, price, fee, exec_id, meta)
+                VALUES %s
+                ON CONFLICT (source_id, exec_id) DO NOTHING;
+            """, execs, template="(%s, %s, 'BTC/USDT:USDT', %s, %s, %s, %s, %s, %s)",
+                page_size=1000)
+        if equity:
+            execute_values(cur, """
+                INSERT INTO bench_equity_timeseries
+                    (source_id, ts, equity, wallet_balance, available_balance)
+                SELECT v.source_id, v.ts, v.equity, v.equity, v.equity
+                FROM (VALUES %s) AS v(source_id, ts, equity)
+                WHERE NOT EXISTS (
+                    SELECT 1 FROM bench_equity_timeseries e
+                    WHERE e.source_id = v.source_id AND e.ts = v.ts);
+            """, equity, template='(%s::bigint, %s::timestamptz, %s::numeric)', page_size=1000)
+        if positions:
+            execute_values(cur, """
+                INSERT INTO bench_virtual_positions
+                    (source_id, strategy_name, side, size, entry_price, entry_ts,
+                     notional, accumulated_funding, updated_at)
+                VALUES %s
+                ON CONFLICT (strategy_name) DO UPDATE SET
+                    source_id = EXCLUDED.source_id,
+                    side = EXCLUDED.side, size = EXCLUDED.size,
+                    entry_price = EXCLUDED.entry_price, entry_ts = EXCLUDED.entry_ts,
+                    notional = EXCLUDED.notional,
+                    accumulated_funding = EXCLUDED.accumulated_funding,
+                    updated_at = EXCLUDED.updated_at;
+            """, [(o['source_id'], o['strategy_name'], o['side'], o['size'], o['entry_price'],
+                   _dt(o['entry_ts']), o['notional'], o['accumulated_funding'], _dt(o['ts']))
+                  for o in positions.values()])
+
+
+def ops_to_series(ops, source_id):
+    """(executions, equity_series) of one source from ops, shaped for compute_metrics."""
+    executions, equity_series = [], []
+    for o in ops:
+        if o['source_id'] != source_id:
+            continue
+        if o['op'] == 'exec':
+            executions.append({'ts': _dt(o['ts']), 'side': o['side'], 'qty': o['qty'],
+                               'price': o['price'], 'fee': o['fee']})
+        elif o['op'] == 'equity':
+            equity_series.append({'ts': _dt(o['ts']), 'equity': o['equity']})
+    return executions, equity_series
+
+
+# ── live engine (bench_collector) ──
+
+_book = VirtualBook(wal_path=WAL_PATH)
+
+
+def _loaded_book(bench_conn):
+    if not _book.loaded:
+        _book.load(bench_conn)
+    return _book
 
 
-def _update_equity(bench_conn, source_id, pnl_delta):
-    """Get latest equity and record new equity after PnL."""
-    with bench_conn.cursor() as cur:
-        cur.execute("""
-            SELECT equity FROM bench_equity_timeseries
-            WHERE source_id = %s ORDER BY ts DESC LIMIT 1;
-        """, (source_id,))
-        row = cur.fetchone()
-        prev_equity = float(row[0]) if row else INITIAL_EQUITY
-        new_equity = prev_equity + pnl_delta
-
-        cur.execute("""
-            INSERT INTO bench_equity_timeseries
-                (source_id, equity, wallet_balance, available_balance)
-            VALUES (%s, %s, %s, %s);
-        """, (source_id, new_equity, new_equity, new_equity))
-    bench_conn.commit()
+def initialize_strategy_equity(bench_conn, source_id):
+    """Set initial equity for a strategy source if no equity row exists."""
+    if _loaded_book(bench_conn).initialize_equity(source_id):
+        _log(f'initialized equity ${INITIAL_EQUITY} for source {source_id}')
+
+
+def process_signal(bench_conn, source_id, strategy_name, signal, confidence, price,
+                   funding_rate=None):
+    """Process a strategy signal through the virtual execution engine.
+
+    Changes are journaled; they reach the DB on the next flush().
+    Returns: {'action': str, 'details': dict}
+    """
+    return _loaded_book(bench_conn).process(source_id, strategy_name, signal, price,
+                                            funding_rate=funding_rate)
+
+
+def flush(bench_conn):
+    """Write the ops queued since the last flush (bench_collector: once per cycle)."""
+    return _book.flush(bench_conn) if _book.loaded else 0
@@ -546,6 +546,9 @@ def _collect_strategy_signals(bench_conn):
                 bench_conn.rollback()
                 _log(f'strategy {name} error: {e}')
 
+        # One batched write of this cycle's executions / equity / positions
+        bench_backtest_engine.flush(bench_conn)
+
         if computed > 0:
             _log(f'strategy signals: {computed} strategies computed at price=${price:.2f}')
 
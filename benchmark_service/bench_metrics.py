@@ -55,25 +55,79 @@ def compute_metrics(executions, equity_series):
         metrics['end_equity'] = 0.0
 
     # Trade-based metrics
-    metrics['trade_count'] = len(trades)
-    metrics['cumulative_pnl'] = round(sum(t['pnl'] for t in trades), 4) if trades else 0.0
-    metrics['win_rate'] = _compute_win_rate(trades)
-    metrics['profit_factor'] = _compute_profit_factor(trades)
+    metrics.update(_trade_metrics(trades))
     metrics['max_drawdown_pct'] = _compute_max_drawdown(equity_series)
-    metrics['avg_hold_time_min'] = _compute_avg_hold_time(trades)
-    metrics['ev_per_trade'] = _compute_ev(trades)
     metrics['fee_ratio_pct'] = _compute_fee_ratio(executions)
-    metrics['long_short_ratio'] = _compute_long_short_ratio(trades)
-
-    # Raw trade counts
-    winning = sum(1 for t in trades if t['pnl'] > 0)
-    losing = sum(1 for t in trades if t['pnl'] <= 0)
-    metrics['winning_trades'] = winning
-    metrics['losing_trades'] = losing
 
     return metrics
 
 
+def compute_sliced_metrics(executions, slice_fn):
+    """Trade metrics per slice of the round trips in executions.
+
+    slice_fn(trade) → label (e.g. the market regime at trade['open_ts']).
+    Each slice also carries gross_profit / gross_loss so slices of several
+    runs can be merged (merge_sliced_metrics).
+    """
+    slices = {}
+    for t in _pair_trades(executions):
+        slices.setdefault(slice_fn(t), []).append(t)
+    out = {}
+    for label, trades in slices.items():
+        m = _trade_metrics(trades)
+        m['gross_profit'] = round(sum(t['pnl'] for t in trades if t['pnl'] > 0), 4)
+        m['gross_loss'] = round(abs(sum(t['pnl'] for t in trades if t['pnl'] < 0)), 4)
+        out[label] = m
+    return out
+
+
+def merge_sliced_metrics(sliced_list):
+    """Combine compute_sliced_metrics results: counts and PnL add up, ratios are recomputed."""
+    acc = {}
+    for sliced in sliced_list:
+        for label, m in (sliced or {}).items():
+            a = acc.setdefault(label, {'trade_count': 0, 'winning_trades': 0, 'losing_trades': 0,
+                                       'cumulative_pnl': 0.0, 'gross_profit': 0.0,
+                                       'gross_loss': 0.0, 'hold_min': 0.0})
+            for k in ('trade_count', 'winning_trades', 'losing_trades',
+                      'cumulative_pnl', 'gross_profit', 'gross_loss'):
+                a[k] += m.get(k) or 0
+            a['hold_min'] += (m.get('avg_hold_time_min') or 0) * (m.get('trade_count') or 0)
+    out = {}
+    for label, a in acc.items():
+        n = a.pop('trade_count')
+        hold = a.pop('hold_min')
+        gp, gl = a['gross_profit'], a['gross_loss']
+        out[label] = {
+            'trade_count': n,
+            'cumulative_pnl': round(a['cumulative_pnl'], 4),
+            'win_rate': round(a['winning_trades'] / n * 100, 1) if n else 0.0,
+            'profit_factor': round(gp / gl, 2) if gl else (float('inf') if gp > 0 else 0.0),
+            'avg_hold_time_min': round(hold / n, 1) if n else 0.0,
+            'ev_per_trade': round(a['cumulative_pnl'] / n, 4) if n else 0.0,
+            'winning_trades': a['winning_trades'],
+            'losing_trades': a['losing_trades'],
+            'gross_profit': round(gp, 4),
+            'gross_loss': round(gl, 4),
+        }
+    return out
+
+
+def _trade_metrics(trades):
+    """Metrics that depend only on the paired round trips."""
+    return {
+        'trade_count': len(trades),
+        'cumulative_pnl': round(sum(t['pnl'] for t in trades), 4) if trades else 0.0,
+        'win_rate': _compute_win_rate(trades),
+        'profit_factor': _compute_profit_factor(trades),
+        'avg_hold_time_min': _compute_avg_hold_time(trades),
+        'ev_per_trade': _compute_ev(trades),
+        'long_short_ratio': _compute_long_short_ratio(trades),
+        'winning_trades': sum(1 for t in trades if t['pnl'] > 0),
+        'losing_trades': sum(1 for t in trades if t['pnl'] <= 0),
+    }
+
+
 def _pair_trades(executions):
     """FIFO round-trip trade matching. Handles partial fills.
 
@@ -3,6 +3,11 @@ bench_proposal_engine.py — Generate parameter adjustment proposals.
 
 Reads latest report metrics, compares ours vs benchmark, applies rules,
 and saves DRAFT proposals. NEVER auto-applies.
+
+generate_sweep_proposal() instead proposes the best evaluated alternative
+of a saved bench_sweep ranking when it beats the current thresholds over
+the same history. Those thresholds live in code, so such proposals are
+marked manual and /apply_confirm does not write them.
 """
 import os
 import sys
@@ -39,6 +44,7 @@ def generate_proposal(report_id=None):
             else:
                 cur.execute("""
                     SELECT id, payload_json FROM bench_reports
+                    WHERE period NOT LIKE 'sweep:%' AND period NOT LIKE 'walkforward:%'
                     ORDER BY created_at DESC LIMIT 1;
                 """)
             row = cur.fetchone()
@@ -183,9 +189,128 @@ def generate_proposal(report_id=None):
                 pass
 
 
+SWEEP_MIN_GAIN = 0.5     # rank_by units the best alternative must beat the baseline by
+
+
+def generate_sweep_proposal(report_id=None):
+    """DRAFT proposal from a saved sweep ranking (latest one by default).
+
+    Proposes the top-ranked parameter set when it is not the current one and
+    beats the baseline's rank_by metric by SWEEP_MIN_GAIN over the same range.
+
+    Returns (proposal_id, proposal_text) or (None, reason_text).
+    """
+    bench_conn = None
+    try:
+        bench_conn = get_bench_conn()
+        with bench_conn.cursor() as cur:
+            if report_id:
+                cur.execute("""
+                    SELECT id, payload_json FROM bench_reports
+                    WHERE id = %s AND period LIKE 'sweep:%%';
+                """, (report_id,))
+            else:
+                cur.execute("""
+                    SELECT id, payload_json FROM bench_reports
+                    WHERE period LIKE 'sweep:%'
+                    ORDER BY created_at DESC LIMIT 1;
+                """)
+            row = cur.fetchone()
+            if not row:
+                return None, 'No sweep reports found.'
+            report_id = row[0]
+            payload = row[1] if isinstance(row[1], dict) else json.loads(row[1])
+
+        target = payload.get('target')
+        rank_by = payload.get('rank_by', 'total_return_pct')
+        defaults = payload.get('defaults') or {}
+        baseline = payload.get('baseline')
+        top = payload.get('top') or []
+        if not top or not baseline:
+            return None, f'Sweep report #{report_id} has no baseline to compare against.'
+
+        best = top[0]
+        if best['params'] == defaults:
+            return None, f'Sweep #{report_id} ({target}): current thresholds ranked first.'
+        best_val = float(best['metrics'].get(rank_by) or 0)
+        base_val = float(baseline['metrics'].get(rank_by) or 0)
+        gain = base_val - best_val if rank_by in ('max_drawdown_pct', 'fee_ratio_pct') \
+            else best_val - base_val
+        if gain < SWEEP_MIN_GAIN:
+            return None, (f'Sweep #{report_id} ({target}): best alternative improves '
+                          f'{rank_by} by only {gain:+.2f}.')
+
+        changes = {f'{target}.{k}': v for k, v in best['params'].items() if defaults.get(k) != v}
+        current = {key: defaults.get(key.split('.', 1)[1]) for key in changes}
+        reasons = [
+            f'Sweep over {payload.get("start", "?")[:10]} ~ {payload.get("end", "?")[:10]} '
+            f'({payload.get("evaluated", 0)} evaluated, {payload.get("method")}): '
+            f'{rank_by} {base_val:+.2f} → {best_val:+.2f}',
+            f'Baseline: {_metrics_line(baseline["metrics"])}',
+            f'Best:     {_metrics_line(best["metrics"])}',
+        ]
+        proposed = {
+            'current': current,
+            'proposed': changes,
+            'reasons': reasons,
+            'manual': True,
+            'sweep': {'report_id': report_id, 'target': target, 'rank_by': rank_by,
+                      'baseline': baseline, 'alternatives': top[:5]},
+        }
+        with bench_conn.cursor() as cur:
+            cur.execute("""
+                INSERT INTO bench_proposals
+                    (based_on_report_id, proposed_changes, status)
+                VALUES (%s, %s, 'DRAFT')
+                RETURNING id;
+            """, (report_id, json.dumps(proposed, default=str)))
+            proposal_id = cur.fetchone()[0]
+        bench_conn.commit()
+
+        lines = [
+            f'Proposal #{proposal_id} (DRAFT, sweep)',
+            '━━━━━━━━━━━━━━━━━━',
+            f'Based on sweep report #{report_id}',
+            '',
+        ]
+        for reason in reasons:
+            lines.append(f'  - {reason}')
+        lines.append('')
+        lines.append('Changes:')
+        for key, val in changes.items():
+            lines.append(f'  {key}: {current.get(key)} → {val}')
+        lines.append('')
+        lines.append('Strategy thresholds are set in code: apply manually after review.')
+
+        _log(f'sweep proposal generated: id={proposal_id}')
+        return proposal_id, '\n'.join(lines)
+
+    except Exception as e:
+        if bench_conn:
+            bench_conn.rollback()
+        _log(f'generate_sweep_proposal error: {e}')
+        return None, f'Sweep proposal failed: {e}'
+    finally:
+        if bench_conn:
+            try:
+                bench_conn.close()
+            except Exception:
+                pass
+
+
+def _metrics_line(m):
+    return (f'return {m.get("total_return_pct", 0):+.2f}%, WR {m.get("win_rate", 0):.1f}%, '
+            f'MDD {m.get("max_drawdown_pct", 0):.2f}%, trades {m.get("trade_count", 0)}')
+
+
 if __name__ == '__main__':
     from bench_utils import load_env
     load_env()
-    rid = int(sys.argv[1]) if len(sys.argv) > 1 else None
-    pid, text = generate_proposal(rid)
+    args = sys.argv[1:]
+    if args and args[0] == 'sweep':
+        rid = int(args[1]) if len(args) > 1 else None
+        pid, text = generate_sweep_proposal(rid)
+    else:
+        rid = int(args[0]) if args else None
+        pid, text = generate_proposal(rid)
     print(text)
@@ -83,6 +83,31 @@ def _format_multi_strategy_table(our_metrics, our_label, bench_list, period):
     return '\n'.join(lines)
 
 
+def load_source_series(conn, src_id, start_ts, end_ts):
+    """Executions and equity series of one source in [start_ts, end_ts] for compute_metrics."""
+    with conn.cursor() as cur:
+        cur.execute("""
+            SELECT ts, side, qty, price, fee
+            FROM bench_executions
+            WHERE source_id = %s AND ts >= %s AND ts <= %s
+            ORDER BY ts;
+        """, (src_id, start_ts, end_ts))
+        executions = [
+            {'ts': r[0], 'side': r[1], 'qty': r[2], 'price': r[3], 'fee': r[4]}
+            for r in cur.fetchall()
+        ]
+
+        cur.execute("""
+            SELECT ts, equity
+            FROM bench_equity_timeseries
+            WHERE source_id = %s AND ts >= %s AND ts <= %s
+            ORDER BY ts;
+        """, (src_id, start_ts, end_ts))
+        equity_series = [{'ts': r[0], 'equity': r[1]} for r in cur.fetchall()]
+
+    return executions, equity_series
+
+
 def generate_report(period_days):
     """Generate comparison report for given period.
 
@@ -110,32 +135,7 @@ def generate_report(period_days):
         bench_metrics_list = []
 
         for src_id, kind, label in sources:
-            # Fetch executions
-            with conn.cursor() as cur:
-                cur.execute("""
-                    SELECT ts, side, qty, price, fee
-                    FROM bench_executions
-                    WHERE source_id = %s AND ts >= %s AND ts <= %s
-                    ORDER BY ts;
-                """, (src_id, start_ts, end_ts))
-                exec_rows = cur.fetchall()
-
-            executions = [
-                {'ts': r[0], 'side': r[1], 'qty': r[2], 'price': r[3], 'fee': r[4]}
-                for r in exec_rows
-            ]
-
-            # Fetch equity series
-            with conn.cursor() as cur:
-                cur.execute("""
-                    SELECT ts, equity
-                    FROM bench_equity_timeseries
-                    WHERE source_id = %s AND ts >= %s AND ts <= %s
-                    ORDER BY ts;
-                """, (src_id, start_ts, end_ts))
-                eq_rows = cur.fetchall()
-
-            equity_series = [{'ts': r[0], 'equity': r[1]} for r in eq_rows]
+            executions, equity_series = load_source_series(conn, src_id, start_ts, end_ts)
 
             metrics = bench_metrics.compute_metrics(executions, equity_series)
             metrics['source_label'] = label
@@ -0,0 +1,380 @@
+#!/usr/bin/env python3
+"""
+bench_sweep.py — Parallel parameter sweep for benchmark strategies.
+
+Evaluates many threshold sets of one target over the same historical range
+and ranks them by a bench_metrics key:
+
+  - candidates: full grid (--steps points per parameter), uniform random or
+    Latin-hypercube sample of TARGETS[target]['space']; the current
+    defaults are always evaluated as the baseline
+  - the history is loaded once (bench_vector_backtest.load_history or an
+    npz cache saved for the same range / symbol) and copied into shared
+    memory; pool workers map the arrays instead of each receiving a copy
+  - every finished evaluation is appended to a JSONL results file, so an
+    interrupted sweep resumes where it stopped when run again with the same
+    target / range (already evaluated candidates are skipped)
+  - --save stores the ranked table in bench_reports (period 'sweep:<target>');
+    bench_proposal_engine.generate_sweep_proposal() turns the best evaluated
+    alternative into a DRAFT proposal (--propose)
+
+Targets are the vectorized bench strategies (bench_vector_backtest.PARAMS).
+
+Usage:
+    python3 bench_sweep.py mean_reversion --start 2025-01-01 --method lhs --samples 200
+    python3 bench_sweep.py volatility_regime --start 2025-01-01 --method grid --steps 3
+    python3 bench_sweep.py volume_vp --start 2025-01-01 --cache /tmp/btc_1m.npz --save --propose
+"""
+import os
+import sys
+import json
+import time
+import argparse
+import itertools
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from datetime import datetime, timezone
+from multiprocessing import shared_memory
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from bench_utils import _log
+import bench_vector_backtest as vb
+
+SWEEP_DIR = os.getenv('BENCH_SWEEP_DIR',
+                      os.path.join(os.path.dirname(os.path.abspath(__file__)), 'sweeps'))
+METRIC_KEYS = (
+    'total_return_pct', 'cumulative_pnl', 'win_rate', 'profit_factor', 'max_drawdown_pct',
+    'trade_count', 'ev_per_trade', 'fee_ratio_pct', 'avg_hold_time_min', 'long_short_ratio',
+)
+LOWER_IS_BETTER = ('max_drawdown_pct', 'fee_ratio_pct')
+TOP_N = 15
+
+# (low, high, 'int' | 'float') per parameter
+TARGETS = {
+    'trend_follow': {'space': {
+        'min_ema_dist_pct': (0.0, 0.1, 'float'),
+        'min_cloud_gap_pct': (0.0, 0.3, 'float'),
+    }},
+    'mean_reversion': {'space': {
+        'rsi_oversold': (20, 40, 'int'),
+        'rsi_overbought': (60, 80, 'int'),
+        'band_tol': (0.0, 0.005, 'float'),
+    }},
+    'volume_vp': {'space': {
+        'edge_margin': (0.02, 0.3, 'float'),
+        'poc_zone': (0.0, 0.15, 'float'),
+    }},
+    'volatility_regime': {'space': {
+        'expansion_ratio': (1.05, 1.6, 'float'),
+        'contraction_ratio': (0.5, 0.95, 'float'),
+        'pos_low': (0.05, 0.35, 'float'),
+        'pos_high': (0.65, 0.95, 'float'),
+        'rsi_low': (30, 50, 'int'),
+        'rsi_high': (50, 70, 'int'),
+    }},
+}
+for _name, _t in TARGETS.items():
+    _t['defaults'] = dict(vb.PARAMS[_name])
+
+
+# ── candidates ──
+
+def _cast(v, kind):
+    return int(round(v)) if kind == 'int' else round(float(v), 6)
+
+
+def _key(params):
+    return json.dumps(params, sort_keys=True)
+
+
+def grid(space, steps):
+    axes = [sorted({_cast(v, kind) for v in np.linspace(lo, hi, steps)})
+            for lo, hi, kind in space.values()]
+    return [dict(zip(space, combo)) for combo in itertools.product(*axes)]
+
+
+def random_sample(space, n, seed=0):
+    rng = np.random.default_rng(seed)
+    cols = {k: lo + rng.random(n) * (hi - lo) for k, (lo, hi, _) in space.items()}
+    return [{k: _cast(cols[k][i], space[k][2]) for k in space} for i in range(n)]
+
+
+def lhs(space, n, seed=0):
+    """Latin hypercube: each parameter's range cut into n strata, one sample per stratum."""
+    rng = np.random.default_rng(seed)
+    cols = {}
+    for k, (lo, hi, _) in space.items():
+        u = (rng.permutation(n) + rng.random(n)) / n
+        cols[k] = lo + u * (hi - lo)
+    return [{k: _cast(cols[k][i], space[k][2]) for k in space} for i in range(n)]
+
+
+def candidates(target, method, samples=100, steps=3, seed=0):
+    """Baseline (defaults) first, then unique sampled parameter sets."""
+    t = TARGETS[target]
+    if method == 'grid':
+        sampled = grid(t['space'], steps)
+    elif method == 'random':
+        sampled = random_sample(t['space'], samples, seed)
+    elif method == 'lhs':
+        sampled = lhs(t['space'], samples, seed)
+    else:
+        raise ValueError(f'unknown method: {method}')
+    out, seen = [], set()
+    for p in [dict(t['defaults'])] + [{**t['defaults'], **s} for s in sampled]:
+        k = _key(p)
+        if k not in seen:
+            seen.add(k)
+            out.append(p)
+    return out
+
+
+# ── shared-memory history ──
+
+class SharedHistory:
+    """Copies a loaded history into shared memory blocks; spec lets workers map them."""
+
+    def __init__(self, h):
+        self._blocks = []
+        self.spec = {'first': int(h['first']), 'arrays': {}}
+        for k, v in h.items():
+            if k == 'first':
+                continue
+            v = np.ascontiguousarray(v)
+            shm = shared_memory.SharedMemory(create=True, size=max(v.nbytes, 1))
+            np.ndarray(v.shape, dtype=v.dtype, buffer=shm.buf)[:] = v
+            self._blocks.append(shm)
+            self.spec['arrays'][k] = (shm.name, v.shape, v.dtype.str)
+
+    def close(self):
+        for shm in self._blocks:
+            shm.close()
+            shm.unlink()
+        self._blocks = []
+
+
+def attach(spec):
+    """(history dict of views, blocks to keep open) from a SharedHistory spec."""
+    blocks, h = [], {'first': spec['first']}
+    for k, (name, shape, dtype) in spec['arrays'].items():
+        shm = shared_memory.SharedMemory(name=name)
+        blocks.append(shm)
+        h[k] = np.ndarray(tuple(shape), dtype=np.dtype(dtype), buffer=shm.buf)
+    return h, blocks
+
+
+_worker = {}
+
+
+def _init_worker(spec):
+    _worker['h'], _worker['blocks'] = attach(spec)
+
+
+def _evaluate(target, params):
+    t0 = time.time()
+    m = vb.backtest(target, _worker['h'], params)
+    return {'params': params, 'metrics': {k: m.get(k) for k in METRIC_KEYS},
+            'elapsed_ms': round((time.time() - t0) * 1000, 1)}
+
+
+# ── results file ──
+
+def _read_results(path, meta):
+    """Evaluations already in path; raises if it belongs to another sweep."""
+    if not os.path.isfile(path):
+        return []
+    done = []
+    with open(path) as f:
+        for line in f:
+            try:
+                row = json.loads(line)
+            except ValueError:
+                continue          # torn last line of an interrupted run
+            if 'meta' in row:
+                old = {k: row['meta'].get(k) for k in ('target', 'start', 'end', 'symbol')}
+                if old != {k: meta[k] for k in old}:
+                    raise ValueError(f'{path} holds another sweep ({old}); use --out or --fresh')
+            else:
+                done.append(row)
+    return done
+
+
+def _ends_with_newline(path):
+    with open(path, 'rb') as f:
+        f.seek(0, os.SEEK_END)
+        if f.tell() == 0:
+            return True
+        f.seek(-1, os.SEEK_END)
+        return f.read(1) == b'\n'
+
+
+def run(target, h, cands, path, meta, workers=None):
+    """Evaluate cands not yet in path over a process pool. Returns all results."""
+    done = _read_results(path, meta)
+    have = {_key(r['params']) for r in done}
+    todo = [p for p in cands if _key(p) not in have]
+    _log(f'sweep {target}: {len(cands)} candidates, {len(done)} done, {len(todo)} to run')
+    if not todo:
+        return done
+
+    os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+    new_file = not os.path.isfile(path)
+    shared = SharedHistory(h)
+    t0 = time.time()
+    try:
+        with open(path, 'a') as out, \
+                ProcessPoolExecutor(max_workers=workers or os.cpu_count(),
+                                    initializer=_init_worker, initargs=(shared.spec,)) as pool:
+            if new_file:
+                out.write(json.dumps({'meta': meta}) + '\n')
+            elif not _ends_with_newline(path):
+                out.write('\n')
+            futures = [pool.submit(_evaluate, target, p) for p in todo]
+            try:
+                for n, fut in enumerate(as_completed(futures), 1):
+                    row = fut.result()
+                    out.write(json.dumps(row) + '\n')
+                    out.flush()
+                    done.append(row)
+                    if n % 25 == 0 or n == len(todo):
+                        _log(f'sweep {target}: {n}/{len(todo)} '
+                             f'({n / max(time.time() - t0, 1e-9):.1f}/s)')
+            except KeyboardInterrupt:
+                for fut in futures:
+                    fut.cancel()
+                _log(f'sweep {target}: interrupted, {len(done)} results kept in {path}')
+                raise
+    finally:
+        shared.close()
+    return done
+
+
+# ── ranking / output ──
+
+def rank(results, rank_by='total_return_pct', min_trades=0):
+    rows = [r for r in results if (r['metrics'].get('trade_count') or 0) >= min_trades]
+    sign = 1 if rank_by in LOWER_IS_BETTER else -1
+    return sorted(rows, key=lambda r: sign * float(r['metrics'].get(rank_by) or 0))
+
+
+def format_table(target, ranked, defaults, rank_by, top=TOP_N):
+    keys = list(TARGETS[target]['space'])
+    cols = [('Return %', 'total_return_pct', '.2f'), ('PF', 'profit_factor', '.2f'),
+            ('WR %', 'win_rate', '.1f'), ('MDD %', 'max_drawdown_pct', '.2f'),
+            ('Trades', 'trade_count', 'd'), ('EV', 'ev_per_trade', '.4f')]
+    head = f'{"#":>3} ' + ' '.join(f'{k[:12]:>12}' for k in keys) \
+        + ' ' + ' '.join(f'{c[0]:>9}' for c in cols)
+    lines = [f'Sweep {target} — ranked by {rank_by} ({len(ranked)} evaluated)', head,
+             '─' * len(head)]
+    for i, r in enumerate(ranked[:top], 1):
+        mark = '*' if r['params'] == defaults else ' '
+        vals = ' '.join(f'{r["params"][k]:>12}' for k in keys)
+        mets = []
+        for _, k, fmt in cols:
+            v = r['metrics'].get(k)
+            mets.append(f'{"inf" if v == float("inf") else format(v or 0, fmt):>9}')
+        lines.append(f'{i:>2}{mark} {vals} {" ".join(mets)}')
+    base = next((i for i, r in enumerate(ranked, 1) if r['params'] == defaults), None)
+    lines.append(f'* = current thresholds (rank {base or "n/a"})')
+    return '\n'.join(lines)
+
+
+def save_report(bench_conn, meta, ranked, defaults, text, top=TOP_N):
+    """Store the ranked sweep in bench_reports. Returns the report id."""
+    baseline = next((r for r in ranked if r['params'] == defaults), None)
+    payload = {'kind': 'sweep', **meta, 'evaluated': len(ranked), 'defaults': defaults,
+               'baseline': baseline, 'top': ranked[:top]}
+    with bench_conn.cursor() as cur:
+        cur.execute("""
+            INSERT INTO bench_reports (period, start_ts, end_ts, payload_md, payload_json)
+            VALUES (%s, %s, %s, %s, %s)
+            RETURNING id;
+        """, (f'sweep:{meta["target"]}', meta['start'], meta['end'], text,
+              json.dumps(payload, default=str)))
+        report_id = cur.fetchone()[0]
+    bench_conn.commit()
+    return report_id
+
+
+def _parse_date(s):
+    return datetime.strptime(s, '%Y-%m-%d').replace(tzinfo=timezone.utc)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Parallel parameter sweep of a bench strategy')
+    parser.add_argument('target', choices=sorted(TARGETS))
+    parser.add_argument('--start', required=True, help='Start date YYYY-MM-DD')
+    parser.add_argument('--end', default=None, help='End date YYYY-MM-DD (default=today 00:00 UTC)')
+    parser.add_argument('--symbol', default=vb.SYMBOL)
+    parser.add_argument('--method', choices=('grid', 'random', 'lhs'), default='lhs')
+    parser.add_argument('--samples', type=int, default=100, help='random / lhs sample count')
+    parser.add_argument('--steps', type=int, default=3, help='grid points per parameter')
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--workers', type=int, default=None)
+    parser.add_argument('--rank-by', default='total_return_pct', choices=METRIC_KEYS)
+    parser.add_argument('--min-trades', type=int, default=10)
+    parser.add_argument('--cache', default=None,
+                        help='npz history: load if present (same range only), else save')
+    parser.add_argument('--out', default=None, help='results JSONL (default: SWEEP_DIR/...)')
+    parser.add_argument('--fresh', action='store_true', help='discard earlier results')
+    parser.add_argument('--save', action='store_true', help='store the ranking in bench_reports')
+    parser.add_argument('--propose', action='store_true',
+                        help='DRAFT proposal from the saved ranking (implies --save)')
+    args = parser.parse_args()
+
+    start = _parse_date(args.start)
+    end = _parse_date(args.end) if args.end else \
+        datetime.now(timezone.utc).replace(hour=0, minute=0, second=0, microsecond=0)
+    meta = {'target': args.target, 'start': start.isoformat(), 'end': end.isoformat(),
+            'symbol': args.symbol, 'method': args.method, 'seed': args.seed}
+    path = args.out or os.path.join(
+        SWEEP_DIR, f'{args.target}_{start:%Y%m%d}_{end:%Y%m%d}.jsonl')
+    if args.fresh and os.path.isfile(path):
+        os.remove(path)
+
+    from db_config_bench import get_bench_conn, get_main_conn_ro
+    if args.cache and os.path.isfile(args.cache):
+        try:
+            h = vb.load_cached(args.cache, start, end, args.symbol)
+        except ValueError as e:
+            parser.error(str(e))
+    else:
+        main_conn, bench_conn = get_main_conn_ro(), get_bench_conn()
+        try:
+            h = vb.load_history(main_conn, start, end, symbol=args.symbol, bench_conn=bench_conn)
+        finally:
+            main_conn.close()
+            bench_conn.close()
+        if h is None:
+            _log('sweep: no indicator rows in range')
+            return
+        if args.cache:
+            vb.save_history(h, args.cache, start, end, args.symbol)
+
+    cands = candidates(args.target, args.method, args.samples, args.steps, args.seed)
+    results = run(args.target, h, cands, path, meta, workers=args.workers)
+
+    defaults = TARGETS[args.target]['defaults']
+    ranked = rank(results, args.rank_by, args.min_trades)
+    text = format_table(args.target, ranked, defaults, args.rank_by)
+    print(text)
+
+    if args.save or args.propose:
+        bench_conn = get_bench_conn()
+        try:
+            report_id = save_report(bench_conn, {**meta, 'rank_by': args.rank_by,
+                                                 'min_trades': args.min_trades},
+                                    ranked, defaults, text)
+        finally:
+            bench_conn.close()
+        _log(f'sweep {args.target}: saved as report {report_id}')
+        if args.propose:
+            import bench_proposal_engine
+            _, msg = bench_proposal_engine.generate_sweep_proposal(report_id)
+            print(msg)
+
+
+if __name__ == '__main__':
+    main()
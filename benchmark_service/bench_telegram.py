@@ -343,6 +343,8 @@ def _cmd_apply_proposal(proposal_id):
             old_val = live.get(key, current.get(key, '?'))
             lines.append(f'  {key}: {old_val} → {new_val}')
         lines.append('')
+        if changes_dict.get('manual'):
+            lines.append('Manual proposal: /apply_confirm will not write these.')
         lines.append(f'Status: DRAFT → PENDING')
         lines.append(f'To confirm: /apply_confirm {pid}')
 
@@ -397,6 +399,9 @@ def _cmd_apply_confirm(proposal_id):
 
         if not proposed:
             return f'Proposal #{pid} has no changes to apply.'
+        if changes_dict.get('manual'):
+            return (f'Proposal #{pid} changes strategy thresholds in code; '
+                    'apply it manually, nothing was written.')
 
         # Write to main DB
         main_conn = get_main_conn_rw()
@@ -0,0 +1,612 @@
+#!/usr/bin/env python3
+"""
+bench_vector_backtest.py — Offline vectorized backtest for benchmark strategies.
+
+bench_collector evaluates each strategy forward in time, one compute_signal
+call per 30s poll, so bench metrics only cover the days collected so far.
+This runs a registered strategy over a historical range in one pass:
+
+  load_history()  1m indicators (+ candle close, vol_profile as-of, bench
+                  funding rate as-of, market_context regime as-of) → numpy
+                  arrays, one row per bar
+  signals()       per-bar signal (1/-1/0) and confidence as arrays; the four
+                  bench strategies have vectorized ports of their scalar
+                  rules, anything else registered falls back to calling
+                  compute_signal per bar
+  simulate()      position = signal (the process_signal state machine), fills
+                  with bench_backtest_engine's TAKER_FEE / SLIPPAGE_BPS /
+                  FIXED_NOTIONAL and 8h funding accumulation
+  backtest()      → bench_metrics.compute_metrics() dict, same keys as the
+                  live bench report, plus 'by_regime' (trade metrics per
+                  regime active at entry)
+
+check_parity() compares the vectorized signals with compute_signal on
+sampled bars. Each bar sees what the collector would have seen at that
+time: that bar's indicators, its close (bb_mid if no candle), the latest
+vol_profile and funding rate, and the last 20 indicator rows.
+
+The vectorized rules read their thresholds from PARAMS (defaults = the
+constants in compute_signal); signals()/backtest() take overrides, which
+is what bench_sweep searches over.
+
+Usage:
+    python3 bench_vector_backtest.py --start 2025-01-01 --end 2026-01-01
+    python3 bench_vector_backtest.py --start 2025-01-01 --strategy trend_follow --check 5000
+    python3 bench_vector_backtest.py --start 2025-01-01 --cache /tmp/btc_1m.npz --compare
+"""
+import os
+import sys
+import time
+import argparse
+from datetime import datetime, timezone, timedelta
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from bench_utils import _log
+from bench_strategies import STRATEGY_REGISTRY, STRATEGY_LABELS
+from bench_backtest_engine import (
+    TAKER_FEE, SLIPPAGE_BPS, FIXED_NOTIONAL, INITIAL_EQUITY, FUNDING_INTERVAL_SEC,
+)
+import bench_metrics
+
+SYMBOL = os.getenv('SYMBOL', 'BTC/USDT:USDT')
+TF = '1m'
+HIST_ROWS = 20            # historical_indicators window (bench_collector)
+WARMUP_BARS = HIST_ROWS - 1
+
+IND_COLS = (
+    'bb_mid', 'bb_up', 'bb_dn',
+    'ich_tenkan', 'ich_kijun', 'ich_span_a', 'ich_span_b',
+    'vol', 'vol_ma20', 'vol_spike', 'rsi_14', 'atr_14',
+    'ma_50', 'ma_200', 'ema_9', 'ema_21', 'ema_50', 'vwap',
+)
+VP_COLS = ('poc', 'vah', 'val')
+SIDE = {1: 'LONG', -1: 'SHORT', 0: 'FLAT'}
+REGIMES = ('UNKNOWN', 'RANGE', 'BREAKOUT', 'SHOCK')   # h['regime'] codes
+REGIME_MAX_AGE_SEC = 900  # older market_context row → UNKNOWN
+
+
+# ── history ──
+
+def load_history(main_conn, start, end, symbol=SYMBOL, bench_conn=None):
+    """Bars in [start, end) as {column: ndarray} plus 'first' (index of start).
+
+    NULL indicator values become 0 (the strategies read them with `or 0`).
+    WARMUP_BARS earlier rows are included for the volatility_regime window.
+    """
+    t0 = time.time()
+    with main_conn.cursor() as cur:
+        # ::float8 in SQL: NUMERIC → Decimal → float per cell is the slow part
+        cur.execute(f"""
+            SELECT extract(epoch FROM i.ts)::float8, c.c::float8,
+                   {', '.join(f'(i.{c} IS TRUE)::int::float8' if c == 'vol_spike'
+                              else f'i.{c}::float8' for c in IND_COLS)}
+            FROM indicators i
+            LEFT JOIN candles c ON c.symbol = i.symbol AND c.tf = i.tf AND c.ts = i.ts
+            WHERE i.symbol = %s AND i.tf = %s AND i.ts >= %s AND i.ts < %s
+            ORDER BY i.ts;
+        """, (symbol, TF, start - timedelta(minutes=WARMUP_BARS), end))
+        rows = cur.fetchall()
+        if not rows:
+            return None
+        m = np.nan_to_num(np.array(rows, dtype=np.float64), nan=0.0)
+
+        h = {'ts': m[:, 0], 'close': m[:, 1]}
+        for k, c in enumerate(IND_COLS):
+            h[c] = m[:, 2 + k]
+        h['vol_spike'] = h['vol_spike'] > 0
+        h['price'] = np.where(h['close'] > 0, h['close'], h['bb_mid'])
+
+        cur.execute("""
+            SELECT extract(epoch FROM ts)::float8, poc::float8, vah::float8, val::float8
+            FROM vol_profile
+            WHERE symbol = %s AND tf = %s AND ts < %s
+              AND ts >= (SELECT coalesce(max(ts), '-infinity') FROM vol_profile
+                         WHERE symbol = %s AND tf = %s AND ts <= %s)
+            ORDER BY ts;
+        """, (symbol, TF, end, symbol, TF, start - timedelta(minutes=WARMUP_BARS)))
+        vp = cur.fetchall()
+
+        cur.execute("""
+            SELECT extract(epoch FROM ts)::float8, regime
+            FROM market_context
+            WHERE symbol = %s AND ts < %s
+              AND ts >= (SELECT coalesce(max(ts), '-infinity') FROM market_context
+                         WHERE symbol = %s AND ts <= %s)
+            ORDER BY ts;
+        """, (symbol, end, symbol, start - timedelta(minutes=WARMUP_BARS)))
+        regimes = cur.fetchall()
+    vp = np.nan_to_num(np.array(vp, dtype=np.float64).reshape(-1, 4), nan=0.0)
+    for k, c in enumerate(VP_COLS):
+        h[c] = _asof(vp[:, 0], vp[:, 1 + k], h['ts'], fill=0.0)
+    h['regime'] = _regime_codes(regimes, h['ts'])
+
+    h['funding'] = np.full(len(h['ts']), np.nan)
+    if bench_conn is not None:
+        with bench_conn.cursor() as cur:
+            # Latest snapshot per minute, usable from the end of that minute
+            cur.execute("""
+                SELECT DISTINCT ON (date_trunc('minute', ts))
+                       extract(epoch FROM date_trunc('minute', ts))::float8 + 60,
+                       funding_rate::float8
+                FROM bench_market_snapshots
+                WHERE ts >= %s AND ts < %s
+                ORDER BY date_trunc('minute', ts), ts DESC;
+            """, (start - timedelta(days=1), end))
+            fr = np.array(cur.fetchall(), dtype=np.float64).reshape(-1, 2)
+        h['funding'] = _asof(fr[:, 0], fr[:, 1], h['ts'], fill=np.nan)
+
+    h['first'] = int(np.searchsorted(h['ts'], start.timestamp()))
+    _log(f'vector_backtest: loaded {len(h["ts"]) - h["first"]} bars '
+         f'({len(vp)} vol_profile) in {time.time() - t0:.1f}s')
+    return h
+
+
+def _asof(src_ts, src_val, ts, fill):
+    """Latest src_val at or before each ts (fill before the first one)."""
+    idx = np.searchsorted(src_ts, ts, side='right') - 1
+    out = np.where(idx >= 0, src_val[np.clip(idx, 0, None)] if len(src_val) else fill, fill)
+    return out.astype(np.float64)
+
+
+def _regime_codes(rows, ts):
+    """REGIMES index of the market_context regime active at each ts (int8)."""
+    src_ts = np.array([r[0] for r in rows], dtype=np.float64)
+    codes = np.array([REGIMES.index(r[1]) if r[1] in REGIMES else 0 for r in rows], dtype=np.int8)
+    idx = np.searchsorted(src_ts, ts, side='right') - 1
+    ok = idx >= 0
+    safe = np.clip(idx, 0, None)
+    if len(src_ts):
+        ok &= ts - src_ts[safe] <= REGIME_MAX_AGE_SEC
+    return np.where(ok, codes[safe] if len(codes) else 0, 0).astype(np.int8)
+
+
+def regime_at(h, when):
+    """Regime label at bar time `when` (datetime); UNKNOWN without regime data."""
+    if 'regime' not in h or not len(h['ts']):
+        return REGIMES[0]
+    i = min(int(np.searchsorted(h['ts'], when.timestamp())), len(h['ts']) - 1)
+    return REGIMES[int(h['regime'][i])]
+
+
+def save_history(h, path, start=None, end=None, symbol=None):
+    """npz cache of h; start/end (datetimes) and symbol record what was loaded."""
+    arrays = {k: np.asarray(v) for k, v in h.items()}
+    if start is not None and end is not None:
+        arrays['_range'] = np.array([start.timestamp(), end.timestamp()])
+    if symbol:
+        arrays['_symbol'] = np.array(symbol)
+    np.savez(path, **arrays)
+
+
+def load_cached(path, start=None, end=None, symbol=None):
+    """History saved by save_history.
+
+    With start/end (and symbol), raises ValueError unless the cache was saved
+    for that same range (and symbol); caches without a recorded range are
+    rejected too.
+    """
+    with np.load(path) as z:
+        h = {k: z[k] for k in z.files}
+    rng = h.pop('_range', None)
+    sym = h.pop('_symbol', None)
+    if start is not None and end is not None:
+        want = [start.timestamp(), end.timestamp()]
+        if rng is None or [float(x) for x in rng] != want:
+            got = 'no range' if rng is None else ' ~ '.join(
+                datetime.fromtimestamp(float(x), timezone.utc).isoformat() for x in rng)
+            raise ValueError(f'{path} holds another range ({got}); '
+                             f'delete it or pass the matching --start/--end')
+    if symbol and sym is not None and str(sym) != symbol:
+        raise ValueError(f'{path} holds {sym}, not {symbol}')
+    h['first'] = int(h['first'])
+    return h
+
+
+def slice_history(h, start_ts, end_ts):
+    """Sub-range [start_ts, end_ts) (epoch s) of a loaded history, keeping the warmup rows."""
+    ts = h['ts']
+    lo = int(np.searchsorted(ts, start_ts))
+    hi = int(np.searchsorted(ts, end_ts))
+    base = max(0, lo - WARMUP_BARS)
+    out = {k: v[base:hi] for k, v in h.items() if k != 'first'}
+    out['first'] = lo - base
+    return out
+
+
+# ── vectorized signals (mirror bench_strategies/*.compute_signal) ──
+
+def _trunc_clip(x, lo, hi):
+    """max(lo, min(hi, int(x))) elementwise."""
+    return np.clip(np.trunc(np.nan_to_num(x)), lo, hi)
+
+
+def _trend_follow(h, prm):
+    p, e9, e21, vwap = h['price'], h['ema_9'], h['ema_21'], h['vwap']
+    top = np.maximum(h['ich_span_a'], h['ich_span_b'])
+    bot = np.minimum(h['ich_span_a'], h['ich_span_b'])
+    sig = np.zeros(len(p), dtype=np.int8)
+    conf = np.zeros(len(p))
+
+    ok = (p != 0) & (e9 != 0) & (e21 != 0) & (vwap != 0) & (top != 0)
+    inside = ok & (bot <= p) & (p <= top)
+    rest = ok & ~inside
+    conf[inside] = 25
+    conf[rest] = 30
+
+    with np.errstate(divide='ignore', invalid='ignore'):
+        ema_l, gap_l = (e9 - e21) / e21 * 100, (p - top) / top * 100
+        ema_s = (e21 - e9) / e21 * 100
+        gap_s = np.where(bot != 0, (bot - p) / bot * 100, 0)
+        c_long = 60 + np.minimum(ema_l * 40, 20) + np.minimum(gap_l * 20, 20)
+        c_short = 60 + np.minimum(ema_s * 40, 20) + np.minimum(gap_s * 20, 20)
+    long_ = rest & (e9 > e21) & (p > vwap) & (p > top) \
+        & (ema_l >= prm['min_ema_dist_pct']) & (gap_l >= prm['min_cloud_gap_pct'])
+    short = rest & (e9 < e21) & (p < vwap) & (p < bot) \
+        & (ema_s >= prm['min_ema_dist_pct']) & (gap_s >= prm['min_cloud_gap_pct'])
+    sig[long_], conf[long_] = 1, _trunc_clip(c_long, 60, 100)[long_]
+    sig[short], conf[short] = -1, _trunc_clip(c_short, 60, 100)[short]
+    return sig, conf
+
+
+def _mean_reversion(h, prm):
+    p, up, dn, mid = h['price'], h['bb_up'], h['bb_dn'], h['bb_mid']
+    rsi = np.where(h['rsi_14'] != 0, h['rsi_14'], 50.0)
+    sig = np.zeros(len(p), dtype=np.int8)
+    conf = np.zeros(len(p))
+
+    width = up - dn
+    ok = (p != 0) & (up != 0) & (dn != 0) & (mid != 0) & (width > 0)
+    os_, ob = prm['rsi_oversold'], prm['rsi_overbought']
+    long_ = ok & (p <= dn * (1 + prm['band_tol'])) & (rsi < os_)
+    short = ok & ~long_ & (p >= up * (1 - prm['band_tol'])) & (rsi > ob)
+    conf[ok] = 30
+
+    with np.errstate(divide='ignore', invalid='ignore'):
+        depth_l = np.where(p < dn, np.minimum((dn - p) / width * 50, 25), 0)
+        c_long = 50 + np.minimum((os_ - rsi) / 35 * 25, 25) + depth_l
+        depth_s = np.where(p > up, np.minimum((p - up) / width * 50, 25), 0)
+        c_short = 50 + np.minimum((rsi - ob) / 35 * 25, 25) + depth_s
+    sig[long_], conf[long_] = 1, _trunc_clip(c_long, 50, 100)[long_]
+    sig[short], conf[short] = -1, _trunc_clip(c_short, 50, 100)[short]
+    return sig, conf
+
+
+def _volume_vp(h, prm):
+    p, poc, vah, val, spike = h['price'], h['poc'], h['vah'], h['val'], h['vol_spike']
+    sig = np.zeros(len(p), dtype=np.int8)
+    conf = np.zeros(len(p))
+
+    rng = vah - val
+    ok = (p != 0) & (poc != 0) & (vah != 0) & (val != 0) & (rng > 0)
+    at_poc = ok & (np.abs(p - poc) <= rng * prm['poc_zone'])
+    rest = ok & ~at_poc
+    near_val = p <= val + rng * prm['edge_margin']
+    near_vah = p >= vah - rng * prm['edge_margin']
+    long_ = rest & near_val & spike
+    short = rest & ~long_ & near_vah & spike
+    conf[at_poc] = 20
+    conf[rest] = 25
+    conf[rest & (near_val | near_vah)] = 35
+
+    with np.errstate(divide='ignore', invalid='ignore'):
+        c_long = 55 + np.where(p < val, (val - p) / rng, 0) * 70
+        c_short = 55 + np.where(p > vah, (p - vah) / rng, 0) * 70
+    sig[long_], conf[long_] = 1, _trunc_clip(c_long, 55, 90)[long_]
+    sig[short], conf[short] = -1, _trunc_clip(c_short, 55, 90)[short]
+    return sig, conf
+
+
+def _volatility_regime(h, prm):
+    p, up, dn, mid = h['price'], h['bb_up'], h['bb_dn'], h['bb_mid']
+    e9, e21 = h['ema_9'], h['ema_21']
+    rsi = np.where(h['rsi_14'] != 0, h['rsi_14'], 50.0)
+    n = len(p)
+    sig = np.zeros(n, dtype=np.int8)
+    conf = np.zeros(n)
+
+    with np.errstate(divide='ignore', invalid='ignore'):
+        bbw = np.where(mid > 0, (up - dn) / mid, 0.0)
+    # Mean of the positive BBW over the last HIST_ROWS rows (current first),
+    # summed in the same order as the scalar version.
+    total = np.zeros(n)
+    count = np.zeros(n, dtype=np.int64)
+    for k in range(HIST_ROWS):
+        v = np.zeros(n)
+        v[k:] = bbw[:n - k] if k else bbw
+        pos = v > 0
+        total += np.where(pos, v, 0.0)
+        count += pos
+    rows = np.minimum(np.arange(n) + 1, HIST_ROWS)
+
+    ok = (p != 0) & (mid != 0) & (up != 0) & (dn != 0)
+    short_hist = ok & (rows < 5)
+    conf[short_hist] = 20
+    ok &= ~short_hist & (count > 0)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        ratio = bbw / (total / count)
+
+        exp_r, con_r = prm['expansion_ratio'], prm['contraction_ratio']
+        expn = ok & (ratio > exp_r)
+        ema_ok = (e9 != 0) & (e21 != 0)
+        c_exp = 55 + np.minimum((ratio - exp_r) * 50, 20) \
+            + np.minimum(np.abs(e9 - e21) / e21 * 100 * 25, 25)
+        conf[expn] = 30
+        go = expn & ema_ok
+        sig[go] = np.where(e9 > e21, 1, -1)[go]
+        conf[go] = _trunc_clip(c_exp, 55, 100)[go]
+
+        cont = ok & ~expn & (ratio < con_r)
+        width = up - dn
+        conf[ok & ~expn & ~cont] = 25
+        conf[cont] = np.where(width > 0, 30, 25)[cont]
+        cont &= width > 0
+        bb_pos = (p - dn) / width
+        lo, hi = prm['pos_low'], prm['pos_high']
+        bonus = np.minimum((con_r - ratio) * 50, 20)
+        long_ = cont & (bb_pos < lo) & (rsi < prm['rsi_low'])
+        short = cont & ~long_ & (bb_pos > hi) & (rsi > prm['rsi_high'])
+        c_long = 50 + bonus + np.minimum((lo - bb_pos) * 60, 30)
+        c_short = 50 + bonus + np.minimum((bb_pos - hi) * 60, 30)
+    sig[long_], conf[long_] = 1, _trunc_clip(c_long, 50, 95)[long_]
+    sig[short], conf[short] = -1, _trunc_clip(c_short, 50, 95)[short]
+    return sig, conf
+
+
+# Thresholds of the vectorized rules; the defaults are the compute_signal constants
+PARAMS = {
+    'trend_follow': {'min_ema_dist_pct': 0.0, 'min_cloud_gap_pct': 0.0},
+    'mean_reversion': {'rsi_oversold': 35, 'rsi_overbought': 65, 'band_tol': 0.002},
+    'volume_vp': {'edge_margin': 0.1, 'poc_zone': 0.05},
+    'volatility_regime': {'expansion_ratio': 1.2, 'contraction_ratio': 0.8,
+                          'pos_low': 0.2, 'pos_high': 0.8, 'rsi_low': 45, 'rsi_high': 55},
+}
+
+VECTOR_SIGNALS = {
+    'trend_follow': _trend_follow,
+    'mean_reversion': _mean_reversion,
+    'volume_vp': _volume_vp,
+    'volatility_regime': _volatility_regime,
+}
+
+
+def _scalar_inputs(h, i):
+    """compute_signal arguments for bar i, as bench_collector builds them."""
+    indicators = {c: (bool(h[c][i]) if c == 'vol_spike' else float(h[c][i])) for c in IND_COLS}
+    vol_profile = {c: float(h[c][i]) for c in VP_COLS}
+    lo = max(0, i - HIST_ROWS + 1)
+    hist = [{c: float(h[c][j]) for c in ('bb_mid', 'bb_up', 'bb_dn', 'ema_9', 'ema_21',
+                                          'rsi_14', 'atr_14')}
+            for j in range(i, lo - 1, -1)]
+    candles = [float(c) for c in h['close'][lo:i + 1][::-1] if c]
+    return indicators, vol_profile, float(h['price'][i]), candles, hist
+
+
+def scalar_signal(name, h, i):
+    indicators, vol_profile, price, candles, hist = _scalar_inputs(h, i)
+    return STRATEGY_REGISTRY[name](indicators, vol_profile, price, candles,
+                                   historical_indicators=hist)
+
+
+def signals(name, h, params=None):
+    """(sig int8 1/-1/0, conf) per bar; bars before h['first'] are FLAT.
+
+    params override PARAMS[name] (vectorized strategies only).
+    """
+    fn = VECTOR_SIGNALS.get(name)
+    if fn is not None:
+        sig, conf = fn(h, {**PARAMS.get(name, {}), **(params or {})})
+    else:
+        n = len(h['ts'])
+        sig, conf = np.zeros(n, dtype=np.int8), np.zeros(n)
+        for i in range(h['first'], n):
+            s = scalar_signal(name, h, i)
+            sig[i] = {'LONG': 1, 'SHORT': -1}.get(s.get('signal'), 0)
+            conf[i] = s.get('confidence', 0)
+    sig[:h['first']] = 0
+    conf[:h['first']] = 0
+    return sig, conf
+
+
+def check_parity(name, h, sample=2000, seed=0):
+    """Bars where the vectorized signal differs from compute_signal: [(i, vec, scalar)]."""
+    sig, conf = signals(name, h)
+    idx = np.arange(h['first'], len(h['ts']))
+    if sample and len(idx) > sample:
+        idx = np.sort(np.random.default_rng(seed).choice(idx, sample, replace=False))
+    out = []
+    for i in idx:
+        s = scalar_signal(name, h, int(i))
+        vec = (SIDE[int(sig[i])], int(conf[i]))
+        ref = (s['signal'], int(s['confidence']))
+        if vec != ref:
+            out.append((int(i), vec, ref))
+    return out
+
+
+# ── fills ──
+
+def _slip(price, side):
+    """bench_backtest_engine._apply_slippage: worse fill for taker."""
+    slip = price * SLIPPAGE_BPS / 10000
+    return price + slip if side == 1 else price - slip
+
+
+def _funding_per_segment(h, sig, starts):
+    """Funding accumulated by each position segment (process_signal HOLD rule).
+
+    While held, the engine raises accumulated funding to
+    |notional * rate * whole 8h periods since entry| with the latest rate;
+    the segment total is the largest such value on its HOLD bars.
+    """
+    ts, rate = h['ts'], h['funding']
+    n = len(ts)
+    if not len(starts) or np.isnan(rate).all():
+        return np.zeros(len(starts))
+    entry = np.zeros(n, dtype=np.int64)
+    entry[starts] = starts
+    entry = np.maximum.accumulate(entry)
+    periods = np.floor((ts - ts[entry]) / FUNDING_INTERVAL_SEC)
+    cost = np.abs(FIXED_NOTIONAL * np.nan_to_num(rate) * periods)
+    cost[sig == 0] = 0.0
+    return np.maximum.reduceat(cost, starts)
+
+
+def simulate(h, sig):
+    """Replay sig through the engine's state machine.
+
+    Returns {'executions', 'equity_series', 'open_side', 'funding'}: execution
+    and equity rows in the bench_executions / bench_equity_timeseries shapes
+    compute_metrics reads. A position still open at the end stays open.
+    """
+    ts, price = h['ts'], h['price']
+    prev = np.concatenate(([0], sig[:-1])).astype(np.int8)
+    starts = np.flatnonzero(sig != prev)
+    funding = _funding_per_segment(h, sig, starts)
+
+    executions = []
+    t0 = ts[h['first']] if h['first'] < len(ts) else (ts[-1] if len(ts) else 0)
+    equity = INITIAL_EQUITY
+    equity_series = [{'ts': datetime.fromtimestamp(t0, timezone.utc), 'equity': equity}]
+    pos = None          # (side, size, entry_fill)
+    funding_total = 0.0
+    for k, i in enumerate(starts):
+        when = datetime.fromtimestamp(ts[i], timezone.utc)
+        p = float(price[i])
+        if pos is not None:
+            side, size, entry = pos
+            fill = _slip(p, -side)
+            fee = FIXED_NOTIONAL * TAKER_FEE
+            raw = size * (fill - entry) if side == 1 else size * (entry - fill)
+            cost = float(funding[k - 1])
+            equity += raw - 2 * fee - cost
+            funding_total += cost
+            executions.append({'ts': when, 'side': 'SELL' if side == 1 else 'BUY',
+                               'qty': size, 'price': fill, 'fee': fee})
+            equity_series.append({'ts': when, 'equity': equity})
+            pos = None
+        if sig[i] != 0:
+            side = int(sig[i])
+            fill = _slip(p, side)
+            size = FIXED_NOTIONAL / fill
+            executions.append({'ts': when, 'side': 'BUY' if side == 1 else 'SELL',
+                               'qty': size, 'price': fill, 'fee': FIXED_NOTIONAL * TAKER_FEE})
+            pos = (side, size, fill)
+    return {'executions': executions, 'equity_series': equity_series,
+            'open_side': SIDE[pos[0]] if pos else None, 'funding': round(funding_total, 6)}
+
+
+def backtest(name, h, params=None):
+    """compute_metrics() dict for one strategy over a loaded history (+ run info)."""
+    t0 = time.time()
+    sig, _ = signals(name, h, params)
+    t1 = time.time()
+    sim = simulate(h, sig)
+    metrics = bench_metrics.compute_metrics(sim['executions'], sim['equity_series'])
+    if 'regime' in h:
+        metrics['by_regime'] = bench_metrics.compute_sliced_metrics(
+            sim['executions'], lambda t: regime_at(h, t['open_ts']))
+    live = sig[h['first']:]
+    metrics.update({
+        'strategy': name,
+        'bars': int(len(live)),
+        'long_bars': int((live == 1).sum()),
+        'short_bars': int((live == -1).sum()),
+        'funding_cost': sim['funding'],
+        'open_side': sim['open_side'],
+        'vectorized': name in VECTOR_SIGNALS,
+        'signal_ms': round((t1 - t0) * 1000, 1),
+        'total_ms': round((time.time() - t0) * 1000, 1),
+    })
+    return metrics
+
+
+# ── CLI ──
+
+def _our_strategy_metrics(bench_conn, start, end):
+    """OUR_STRATEGY metrics from collected bench data over the same range."""
+    from bench_reporter import load_source_series
+    with bench_conn.cursor() as cur:
+        cur.execute("""
+            SELECT id, label FROM benchmark_sources
+            WHERE kind = 'OUR_STRATEGY' AND enabled = true ORDER BY id LIMIT 1;
+        """)
+        row = cur.fetchone()
+    if not row:
+        return None, None
+    executions, equity_series = load_source_series(bench_conn, row[0], start, end)
+    return row[1], bench_metrics.compute_metrics(executions, equity_series)
+
+
+def _parse_date(s):
+    return datetime.strptime(s, '%Y-%m-%d').replace(tzinfo=timezone.utc)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Vectorized backtest of bench strategies')
+    parser.add_argument('--start', required=True, help='Start date YYYY-MM-DD')
+    parser.add_argument('--end', default=None, help='End date YYYY-MM-DD (default=now)')
+    parser.add_argument('--strategy', action='append', default=None,
+                        help='Strategy name (repeatable, default=all registered)')
+    parser.add_argument('--symbol', default=SYMBOL)
+    parser.add_argument('--cache', default=None, help='npz file: load if present, else save')
+    parser.add_argument('--check', type=int, default=0,
+                        help='Compare N sampled bars against compute_signal')
+    parser.add_argument('--compare', action='store_true',
+                        help='Add OUR_STRATEGY from bench data over the same range')
+    args = parser.parse_args()
+
+    start = _parse_date(args.start)
+    end = _parse_date(args.end) if args.end else datetime.now(timezone.utc)
+    names = args.strategy or list(STRATEGY_REGISTRY)
+    for name in names:
+        if name not in STRATEGY_REGISTRY:
+            parser.error(f'unknown strategy: {name}')
+
+    from db_config_bench import get_bench_conn, get_main_conn_ro
+    cached = bool(args.cache) and os.path.isfile(args.cache)
+    bench_conn = get_bench_conn() if args.compare or not cached else None
+    if cached:
+        h = load_cached(args.cache)
+        _log(f'vector_backtest: loaded cache {args.cache} ({len(h["ts"])} rows)')
+    else:
+        main_conn = get_main_conn_ro()
+        try:
+            h = load_history(main_conn, start, end, symbol=args.symbol, bench_conn=bench_conn)
+        finally:
+            main_conn.close()
+        if h is None:
+            _log('vector_backtest: no indicator rows in range')
+            return
+        if args.cache:
+            save_history(h, args.cache, start, end, args.symbol)
+
+    results = []
+    for name in names:
+        m = backtest(name, h)
+        _log(f'vector_backtest: {name} bars={m["bars"]} trades={m["trade_count"]} '
+             f'return={m["total_return_pct"]:+.2f}% in {m["total_ms"]:.0f}ms')
+        if args.check:
+            bad = check_parity(name, h, sample=args.check)
+            _log(f'vector_backtest: {name} parity {args.check - len(bad)}/{args.check} '
+                 f'match{"" if not bad else f", first mismatch {bad[0]}"}')
+        results.append((STRATEGY_LABELS.get(name, name), m))
+
+    period = f'{start:%Y-%m-%d}~{end:%Y-%m-%d}'
+    our_label, our_metrics = None, None
+    if args.compare:
+        our_label, our_metrics = _our_strategy_metrics(bench_conn, start, end)
+    if bench_conn is not None:
+        bench_conn.close()
+
+    from bench_reporter import _format_multi_strategy_table
+    if our_metrics is not None:
+        print(_format_multi_strategy_table(our_metrics, our_label, results, period))
+    else:
+        print(_format_multi_strategy_table(results[0][1], results[0][0], results[1:], period))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,287 @@
+#!/usr/bin/env python3
+"""
+bench_walkforward.py — Walk-forward and regime-sliced evaluation of bench strategies.
+
+bench_reporter compares sources over one trailing period; a strategy's
+edge often sits in one market regime and one lucky stretch. This rolls
+train/test windows over a historical range:
+
+  - windows: train_days followed by test_days, moved forward by step_days
+    (default: test_days, so test periods tile the range)
+  - train: for sweepable targets (bench_sweep.TARGETS) the candidates of
+    bench_sweep.candidates() are ranked on the train slice and the best
+    set is chosen; other strategies (or --samples 0) keep their defaults
+  - test: the chosen set and the defaults are evaluated out-of-sample;
+    trades are sliced by the market_context regime active at entry
+    (RANGE / BREAKOUT / SHOCK / UNKNOWN, bench_vector_backtest.REGIMES)
+  - windows run in a process pool over one shared-memory copy of the
+    history (bench_sweep.SharedHistory), loaded once or from an npz cache
+    saved for the same range
+  - --save stores one report per strategy in bench_reports
+    (period 'walkforward:<strategy>')
+
+Usage:
+    python3 bench_walkforward.py --start 2025-01-01 --train-days 30 --test-days 7
+    python3 bench_walkforward.py --start 2025-01-01 --strategy mean_reversion --samples 60 --save
+    python3 bench_walkforward.py --start 2025-01-01 --cache /tmp/btc_1m.npz --samples 0
+"""
+import os
+import sys
+import json
+import time
+import argparse
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from datetime import datetime, timezone
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from bench_utils import _log
+from bench_strategies import STRATEGY_REGISTRY
+import bench_metrics
+import bench_sweep
+import bench_vector_backtest as vb
+
+DAY_SEC = 86400
+WINDOW_KEYS = ('total_return_pct', 'cumulative_pnl', 'win_rate', 'profit_factor',
+               'max_drawdown_pct', 'trade_count', 'ev_per_trade')
+
+
+# ── windows ──
+
+def windows(start_ts, end_ts, train_days, test_days, step_days=None):
+    """[(train_start, test_start, test_end)] in epoch seconds, rolling forward."""
+    train, test = train_days * DAY_SEC, test_days * DAY_SEC
+    step = (step_days or test_days) * DAY_SEC
+    out = []
+    t = start_ts
+    while t + train + test <= end_ts:
+        out.append((t, t + train, t + train + test))
+        t += step
+    return out
+
+
+def _evaluate(name, h, params):
+    m = vb.backtest(name, h, params)
+    out = {k: m.get(k) for k in WINDOW_KEYS}
+    out['by_regime'] = m.get('by_regime', {})
+    return out
+
+
+def _run_window(name, k, win, cands, rank_by, min_trades):
+    """Train-select then test one window (pool worker, history from bench_sweep)."""
+    t0 = time.time()
+    h = bench_sweep._worker['h']
+    train_start, split, test_end = win
+    train = vb.slice_history(h, train_start, split)
+    test = vb.slice_history(h, split, test_end)
+    defaults = cands[0]
+
+    chosen, train_metrics = defaults, None
+    if len(cands) > 1:
+        evaluated = [{'params': p, 'metrics': vb.backtest(name, train, p)} for p in cands]
+        ranked = bench_sweep.rank(evaluated, rank_by, min_trades)
+        if ranked:
+            chosen = ranked[0]['params']
+            train_metrics = {k: ranked[0]['metrics'].get(k) for k in WINDOW_KEYS}
+    return {
+        'window': k,
+        'train_start': train_start, 'test_start': split, 'test_end': test_end,
+        'params': chosen,
+        'train': train_metrics,
+        'test': _evaluate(name, test, chosen),
+        'baseline': _evaluate(name, test, defaults) if chosen != defaults else None,
+        'elapsed_ms': round((time.time() - t0) * 1000, 1),
+    }
+
+
+def run(names, h, wins, samples=0, method='lhs', seed=0, rank_by='total_return_pct',
+        min_trades=10, workers=None):
+    """{strategy: [window result, ...]} with every (strategy, window) run in the pool."""
+    jobs = []
+    for name in names:
+        if samples and name in bench_sweep.TARGETS:
+            cands = bench_sweep.candidates(name, method, samples, seed=seed)
+        else:
+            cands = [dict(vb.PARAMS.get(name, {}))]
+        jobs.extend((name, k, win, cands) for k, win in enumerate(wins))
+
+    results = {name: [] for name in names}
+    shared = bench_sweep.SharedHistory(h)
+    t0 = time.time()
+    try:
+        with ProcessPoolExecutor(max_workers=workers or os.cpu_count(),
+                                 initializer=bench_sweep._init_worker,
+                                 initargs=(shared.spec,)) as pool:
+            futures = {pool.submit(_run_window, name, k, win, cands, rank_by, min_trades): name
+                       for name, k, win, cands in jobs}
+            for n, fut in enumerate(as_completed(futures), 1):
+                results[futures[fut]].append(fut.result())
+                if n % 10 == 0 or n == len(futures):
+                    _log(f'walkforward: {n}/{len(futures)} windows '
+                         f'({n / max(time.time() - t0, 1e-9):.1f}/s)')
+    finally:
+        shared.close()
+    for rows in results.values():
+        rows.sort(key=lambda r: r['window'])
+    return results
+
+
+# ── summary / output ──
+
+def summarize(rows):
+    """Out-of-sample totals over the windows, chosen vs defaults, and per regime."""
+    def side(key):
+        tests = [(r[key] or r['test']) for r in rows]
+        return {
+            'return_pct_sum': round(sum(t['total_return_pct'] or 0 for t in tests), 2),
+            'pnl': round(sum(t['cumulative_pnl'] or 0 for t in tests), 4),
+            'trades': sum(t['trade_count'] or 0 for t in tests),
+            'positive_windows': sum(1 for t in tests if (t['total_return_pct'] or 0) > 0),
+            'worst_mdd_pct': max((t['max_drawdown_pct'] or 0 for t in tests), default=0.0),
+            'by_regime': bench_metrics.merge_sliced_metrics([t['by_regime'] for t in tests]),
+        }
+    return {'windows': len(rows), 'chosen': side('test'), 'baseline': side('baseline')}
+
+
+def _fmt(v, fmt):
+    return 'inf' if v == float('inf') else format(v or 0, fmt)
+
+
+def _day(ts):
+    return datetime.fromtimestamp(ts, timezone.utc).strftime('%m-%d')
+
+
+def format_report(name, rows, summary, meta):
+    optimized = meta.get('samples') and name in bench_sweep.TARGETS
+    lines = [
+        f'Walk-forward {name} — {summary["windows"]} windows '
+        f'(train {meta["train_days"]}d / test {meta["test_days"]}d, step {meta["step_days"]}d)'
+        + (f', chosen by {meta["rank_by"]} over {meta["method"]} {meta["samples"]}'
+           if optimized else ', default thresholds'),
+        f'{"#":>3} {"test":>11} {"IS %":>7} {"OOS %":>7} {"base %":>7} {"trades":>6} '
+        f'{"WR %":>5} {"PF":>5}',
+    ]
+    for r in rows:
+        t, b = r['test'], r['baseline'] or r['test']
+        is_ret = _fmt(r['train']['total_return_pct'], '+.2f') if r['train'] else '-'
+        lines.append(
+            f'{r["window"] + 1:>3} {_day(r["test_start"])}~{_day(r["test_end"])} {is_ret:>7} '
+            f'{_fmt(t["total_return_pct"], "+.2f"):>7} {_fmt(b["total_return_pct"], "+.2f"):>7} '
+            f'{t["trade_count"] or 0:>6} {_fmt(t["win_rate"], ".1f"):>5} '
+            f'{_fmt(t["profit_factor"], ".2f"):>5}')
+    c, b = summary['chosen'], summary['baseline']
+    lines.append(f'OOS: {c["return_pct_sum"]:+.2f}% ({c["positive_windows"]}/{summary["windows"]} '
+                 f'windows > 0, {c["trades"]} trades) vs defaults {b["return_pct_sum"]:+.2f}% '
+                 f'({b["positive_windows"]}/{summary["windows"]})')
+    lines.append('')
+    lines.append('By regime at entry (OOS):')
+    lines.append(f'{"Regime":<9} {"Trades":>6} {"WR %":>5} {"PnL":>10} {"EV":>8} {"PF":>5}')
+    for regime in vb.REGIMES[1:] + vb.REGIMES[:1]:
+        m = c['by_regime'].get(regime)
+        if not m:
+            continue
+        lines.append(f'{regime:<9} {m["trade_count"]:>6} {_fmt(m["win_rate"], ".1f"):>5} '
+                     f'{_fmt(m["cumulative_pnl"], "+.2f"):>10} {_fmt(m["ev_per_trade"], "+.4f"):>8} '
+                     f'{_fmt(m["profit_factor"], ".2f"):>5}')
+    return '\n'.join(lines)
+
+
+def save_report(bench_conn, name, meta, rows, summary, text):
+    """Store one strategy's walk-forward in bench_reports. Returns the report id."""
+    payload = {'kind': 'walkforward', 'strategy': name, **meta, 'summary': summary,
+               'windows': rows}
+    with bench_conn.cursor() as cur:
+        cur.execute("""
+            INSERT INTO bench_reports (period, start_ts, end_ts, payload_md, payload_json)
+            VALUES (%s, %s, %s, %s, %s)
+            RETURNING id;
+        """, (f'walkforward:{name}', meta['start'], meta['end'], text,
+              json.dumps(payload, default=str)))
+        report_id = cur.fetchone()[0]
+    bench_conn.commit()
+    return report_id
+
+
+def _parse_date(s):
+    return datetime.strptime(s, '%Y-%m-%d').replace(tzinfo=timezone.utc)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Walk-forward, regime-sliced bench evaluation')
+    parser.add_argument('--start', required=True, help='Start date YYYY-MM-DD')
+    parser.add_argument('--end', default=None, help='End date YYYY-MM-DD (default=today 00:00 UTC)')
+    parser.add_argument('--strategy', action='append', default=None,
+                        help='Strategy name (repeatable, default=all registered)')
+    parser.add_argument('--symbol', default=vb.SYMBOL)
+    parser.add_argument('--train-days', type=int, default=30)
+    parser.add_argument('--test-days', type=int, default=7)
+    parser.add_argument('--step-days', type=int, default=None, help='default: --test-days')
+    parser.add_argument('--samples', type=int, default=40,
+                        help='candidates per train window (0 = defaults only)')
+    parser.add_argument('--method', choices=('grid', 'random', 'lhs'), default='lhs')
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--rank-by', default='total_return_pct', choices=bench_sweep.METRIC_KEYS)
+    parser.add_argument('--min-trades', type=int, default=10)
+    parser.add_argument('--workers', type=int, default=None)
+    parser.add_argument('--cache', default=None,
+                        help='npz history: load if present (same range only), else save')
+    parser.add_argument('--save', action='store_true', help='store the reports in bench_reports')
+    args = parser.parse_args()
+
+    start = _parse_date(args.start)
+    end = _parse_date(args.end) if args.end else \
+        datetime.now(timezone.utc).replace(hour=0, minute=0, second=0, microsecond=0)
+    names = args.strategy or list(STRATEGY_REGISTRY)
+    for name in names:
+        if name not in STRATEGY_REGISTRY:
+            parser.error(f'unknown strategy: {name}')
+    wins = windows(start.timestamp(), end.timestamp(), args.train_days, args.test_days,
+                   args.step_days)
+    if not wins:
+        parser.error('range shorter than one train + test window')
+
+    from db_config_bench import get_bench_conn, get_main_conn_ro
+    if args.cache and os.path.isfile(args.cache):
+        try:
+            h = vb.load_cached(args.cache, start, end, args.symbol)
+        except ValueError as e:
+            parser.error(str(e))
+    else:
+        main_conn, bench_conn = get_main_conn_ro(), get_bench_conn()
+        try:
+            h = vb.load_history(main_conn, start, end, symbol=args.symbol, bench_conn=bench_conn)
+        finally:
+            main_conn.close()
+            bench_conn.close()
+        if h is None:
+            _log('walkforward: no indicator rows in range')
+            return
+        if args.cache:
+            vb.save_history(h, args.cache, start, end, args.symbol)
+    if 'regime' not in h:
+        _log('walkforward: history has no regime column (old cache?) — all trades UNKNOWN')
+
+    meta = {'start': start.isoformat(), 'end': end.isoformat(), 'symbol': args.symbol,
+            'train_days': args.train_days, 'test_days': args.test_days,
+            'step_days': args.step_days or args.test_days, 'samples': args.samples,
+            'method': args.method, 'seed': args.seed, 'rank_by': args.rank_by,
+            'min_trades': args.min_trades}
+    results = run(names, h, wins, args.samples, args.method, args.seed, args.rank_by,
+                  args.min_trades, args.workers)
+
+    bench_conn = get_bench_conn() if args.save else None
+    try:
+        for name in names:
+            summary = summarize(results[name])
+            text = format_report(name, results[name], summary, meta)
+            print(text + '\n')
+            if bench_conn is not None:
+                report_id = save_report(bench_conn, name, meta, results[name], summary, text)
+                _log(f'walkforward {name}: saved as report {report_id}')
+    finally:
+        if bench_conn is not None:
+            bench_conn.close()
+
+
+if __name__ == '__main__':
+    main()
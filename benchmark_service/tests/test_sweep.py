@@ -0,0 +1,179 @@
+"""
+tests/test_sweep.py — bench_sweep candidates, resume file, ranking, history cache.
+
+Covers:
+  1. candidates(): baseline first, grid size, LHS one sample per stratum,
+     int casting, duplicates (incl. the baseline) evaluated once
+  2. _read_results(): torn last line skipped, another sweep's file rejected,
+     run() with everything done resumes without evaluating
+  3. rank(): min_trades filter, higher / lower-is-better ordering, None metrics
+  4. save_history / load_cached: the npz records its range, another range
+     (or a cache without one) is rejected
+"""
+
+import sys
+import os
+import json
+import shutil
+import tempfile
+import unittest
+from datetime import datetime, timezone
+from unittest import mock
+
+import numpy as np
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+import bench_sweep
+import bench_vector_backtest as vb
+from bench_sweep import candidates, rank, _read_results, _key
+
+META = {'target': 'mean_reversion', 'start': '2025-01-01T00:00:00+00:00',
+        'end': '2025-03-01T00:00:00+00:00', 'symbol': 'BTC/USDT:USDT',
+        'method': 'lhs', 'seed': 0}
+
+
+def _row(trades, ret, mdd=5.0, **params):
+    return {'params': params or {'x': ret},
+            'metrics': {'trade_count': trades, 'total_return_pct': ret, 'max_drawdown_pct': mdd}}
+
+
+class TestCandidates(unittest.TestCase):
+
+    def test_baseline_first_and_grid(self):
+        c = candidates('mean_reversion', 'grid', steps=3)
+        self.assertEqual(c[0], vb.PARAMS['mean_reversion'])
+        self.assertEqual(len(c), 1 + 27)
+        self.assertEqual({p['rsi_oversold'] for p in c[1:]}, {20, 30, 40})
+        self.assertEqual(len({_key(p) for p in c}), len(c))
+
+    def test_grid_dedupe(self):
+        # the (0, 0) grid corner is the baseline
+        c = candidates('trend_follow', 'grid', steps=2)
+        self.assertEqual(len(c), 4)
+        # int axes collapse when steps exceed the range
+        c = candidates('mean_reversion', 'grid', steps=41)
+        axis = {p['rsi_oversold'] for p in c[1:]}
+        self.assertEqual(axis, set(range(20, 41)))
+        self.assertEqual(len({_key(p) for p in c}), len(c))
+
+    def test_lhs_strata(self):
+        n = 50
+        space = bench_sweep.TARGETS['volatility_regime']['space']
+        c = candidates('volatility_regime', 'lhs', samples=n, seed=3)
+        self.assertEqual(c[0], vb.PARAMS['volatility_regime'])
+        self.assertEqual(len(c), n + 1)
+        for k, (lo, hi, kind) in space.items():
+            vals = [p[k] for p in c[1:]]
+            self.assertTrue(all(lo <= v <= hi for v in vals))
+            if kind == 'int':
+                self.assertTrue(all(isinstance(v, int) for v in vals))
+            else:
+                strata = sorted(min(int((v - lo) / (hi - lo) * n), n - 1) for v in vals)
+                self.assertEqual(strata, list(range(n)), k)
+        self.assertEqual(candidates('volatility_regime', 'lhs', samples=n, seed=3), c)
+        self.assertNotEqual(candidates('volatility_regime', 'lhs', samples=n, seed=4), c)
+
+    def test_duplicate_samples_dropped(self):
+        # 2 int params over 21 values each: 2000 samples must collide
+        with mock.patch.dict(bench_sweep.TARGETS['mean_reversion'],
+                             space={'rsi_oversold': (20, 40, 'int'),
+                                    'rsi_overbought': (60, 80, 'int')}):
+            c = candidates('mean_reversion', 'random', samples=2000)
+        self.assertLessEqual(len(c), 1 + 21 * 21)
+        self.assertEqual(len({_key(p) for p in c}), len(c))
+
+    def test_unknown_method(self):
+        with self.assertRaises(ValueError):
+            candidates('volume_vp', 'sobol')
+
+
+class TestResultsFile(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp = tempfile.mkdtemp()
+        self.path = os.path.join(self.tmp, 'sweep.jsonl')
+
+    def tearDown(self):
+        shutil.rmtree(self.tmp)
+
+    def _write(self, rows, tail=''):
+        with open(self.path, 'w') as f:
+            f.write(''.join(json.dumps(r) + '\n' for r in rows) + tail)
+
+    def test_missing_file(self):
+        self.assertEqual(_read_results(self.path, META), [])
+
+    def test_torn_last_line(self):
+        done = [_row(12, 1.5, rsi_oversold=30), _row(3, -2.0, rsi_oversold=25)]
+        self._write([{'meta': META}] + done, tail='{"params": {"rsi_overs')
+        self.assertEqual(_read_results(self.path, META), done)
+        self.assertFalse(bench_sweep._ends_with_newline(self.path))
+
+    def test_other_sweep_rejected(self):
+        self._write([{'meta': {**META, 'end': '2025-06-01T00:00:00+00:00'}}, _row(1, 1.0)])
+        with self.assertRaises(ValueError):
+            _read_results(self.path, META)
+        # method / seed may change between resumed runs
+        self._write([{'meta': {**META, 'method': 'grid', 'seed': 7}}, _row(1, 1.0)])
+        self.assertEqual(len(_read_results(self.path, META)), 1)
+
+    def test_run_resumes(self):
+        cands = candidates('mean_reversion', 'lhs', samples=3)
+        done = [{'params': p, 'metrics': {'trade_count': 1}} for p in cands]
+        self._write([{'meta': META}] + done)
+        with mock.patch.object(bench_sweep, 'SharedHistory') as shared, \
+                mock.patch.object(bench_sweep, '_log'):
+            out = bench_sweep.run('mean_reversion', None, cands, self.path, META)
+        shared.assert_not_called()
+        self.assertEqual(out, done)
+
+
+class TestRank(unittest.TestCase):
+
+    def setUp(self):
+        self.rows = [_row(20, 1.0, mdd=8.0), _row(5, 9.0, mdd=1.0), _row(30, 4.0, mdd=3.0),
+                     _row(None, 7.0), _row(15, None, mdd=None)]
+
+    def test_min_trades_and_order(self):
+        ranked = rank(self.rows, 'total_return_pct', min_trades=10)
+        self.assertEqual([r['metrics']['total_return_pct'] for r in ranked], [4.0, 1.0, None])
+        ranked = rank(self.rows)
+        self.assertEqual([r['metrics']['total_return_pct'] for r in ranked][:3], [9.0, 7.0, 4.0])
+
+    def test_lower_is_better(self):
+        ranked = rank(self.rows, 'max_drawdown_pct', min_trades=10)
+        self.assertEqual([r['metrics']['max_drawdown_pct'] for r in ranked], [None, 3.0, 8.0])
+
+
+class TestHistoryCache(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp = tempfile.mkdtemp()
+        self.path = os.path.join(self.tmp, 'h.npz')
+        self.start = datetime(2025, 1, 1, tzinfo=timezone.utc)
+        self.end = datetime(2025, 3, 1, tzinfo=timezone.utc)
+        self.h = {'ts': np.arange(5, dtype=np.float64), 'price': np.ones(5), 'first': 2}
+
+    def tearDown(self):
+        shutil.rmtree(self.tmp)
+
+    def test_range_recorded_and_checked(self):
+        vb.save_history(self.h, self.path, self.start, self.end, 'BTC/USDT:USDT')
+        h = vb.load_cached(self.path, self.start, self.end, 'BTC/USDT:USDT')
+        self.assertEqual(sorted(h), ['first', 'price', 'ts'])
+        self.assertEqual(h['first'], 2)
+        with self.assertRaises(ValueError):
+            vb.load_cached(self.path, self.start, datetime(2025, 2, 1, tzinfo=timezone.utc))
+        with self.assertRaises(ValueError):
+            vb.load_cached(self.path, self.start, self.end, 'ETH/USDT:USDT')
+        self.assertEqual(len(vb.load_cached(self.path)['ts']), 5)   # unchecked load
+
+    def test_cache_without_range_rejected(self):
+        vb.save_history(self.h, self.path)
+        with self.assertRaises(ValueError):
+            vb.load_cached(self.path, self.start, self.end)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,159 @@
+"""
+tests/test_vector_backtest.py — vectorized signals vs compute_signal, fill accounting.
+
+Covers:
+  1. check_parity: the four vectorized strategies agree with compute_signal on
+     every bar of a synthetic history (and each of them trades on it)
+  2. simulate(): slippage, taker fees on both legs, 8h funding with the latest
+     rate (max over the HOLD bars, none at entry), flip / flat / still-open
+  3. simulate() on a history without funding data charges nothing
+"""
+
+import sys
+import os
+import unittest
+from datetime import datetime, timezone
+
+import numpy as np
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+import bench_vector_backtest as vb
+from bench_backtest_engine import TAKER_FEE, SLIPPAGE_BPS, FIXED_NOTIONAL, INITIAL_EQUITY
+
+T0 = 1_735_689_600
+H8 = 8 * 60     # 1m bars per funding interval
+
+
+def _ma(x, w):
+    c = np.cumsum(np.concatenate(([0.0], x)))
+    out = x.copy()
+    out[w - 1:] = (c[w:] - c[:-w]) / w
+    return out
+
+
+def _ema(x, span):
+    a = 2 / (span + 1)
+    out = np.empty_like(x)
+    out[0] = x[0]
+    for i in range(1, len(x)):
+        out[i] = a * x[i] + (1 - a) * out[i - 1]
+    return out
+
+
+def _history(n=4000, seed=0):
+    """Random walk with alternating calm / volatile stretches and derived indicators."""
+    rng = np.random.default_rng(seed)
+    vol = 20 + 60 * (np.sin(np.arange(n) / 150) > 0.3)
+    c = 60000 + np.cumsum(rng.normal(0, 1, n) * vol)
+    mid = _ma(c, 20)
+    sd = np.array([c[max(0, i - 19):i + 1].std() for i in range(n)]) + 1
+    h = {'ts': (T0 + 60 * np.arange(n)).astype(np.float64), 'close': c.copy(), 'price': c}
+    h['bb_mid'], h['bb_up'], h['bb_dn'] = mid, mid + 2 * sd, mid - 2 * sd
+    h['ema_9'], h['ema_21'], h['ema_50'] = _ema(c, 9), _ema(c, 21), _ema(c, 50)
+    h['ich_tenkan'], h['ich_kijun'] = _ma(c, 9), _ma(c, 26)
+    h['ich_span_a'], h['ich_span_b'] = np.roll(_ma(c, 30), 26), np.roll(_ma(c, 52), 26)
+    h['vwap'], h['ma_50'], h['ma_200'] = _ma(c, 60), _ma(c, 50), _ma(c, 200)
+    h['vol'] = rng.uniform(1, 10, n)
+    h['vol_ma20'] = _ma(h['vol'], 20)
+    h['vol_spike'] = rng.random(n) < 0.3
+    h['rsi_14'] = np.clip(50 + (c - mid) / sd * 15, 1, 99)
+    h['atr_14'] = sd
+    poc = _ma(c, 240)
+    h['poc'], h['vah'], h['val'] = poc, poc + 3 * sd.mean(), poc - 3 * sd.mean()
+    h['funding'] = np.full(n, np.nan)
+    h['first'] = vb.WARMUP_BARS
+    h['close'][100:110] = 0          # missing candles
+    h['bb_up'][200:205] = 0          # incomplete indicators
+    return h
+
+
+class TestParity(unittest.TestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        cls.h = _history()
+
+    def test_all_strategies_match_compute_signal(self):
+        for name in vb.VECTOR_SIGNALS:
+            with self.subTest(strategy=name):
+                sig, _ = vb.signals(name, self.h)
+                self.assertGreater((sig == 1).sum(), 10)
+                self.assertGreater((sig == -1).sum(), 10)
+                self.assertEqual(vb.check_parity(name, self.h, sample=0), [])
+
+    def test_param_override_changes_signal(self):
+        base, _ = vb.signals('mean_reversion', self.h)
+        loose, _ = vb.signals('mean_reversion', self.h, {'rsi_oversold': 45})
+        self.assertGreater((loose == 1).sum(), (base == 1).sum())
+
+
+class TestSimulate(unittest.TestCase):
+
+    def _h(self, n, funding=None):
+        price = 60000 + 10.0 * np.arange(n)
+        rate = np.full(n, np.nan) if funding is None else funding
+        return {'ts': (T0 + 60 * np.arange(n)).astype(np.float64), 'price': price,
+                'funding': rate, 'first': 1}
+
+    def _slip(self, p, side):
+        return p * (1 + side * SLIPPAGE_BPS / 10000)
+
+    def test_fees_slippage_funding(self):
+        n = 3 * H8 + 100
+        rate = np.full(n, 0.0001)
+        rate[H8 + 5:] = -0.0003         # funding sign flips while held: cost stays positive
+        h = self._h(n, rate)
+        sig = np.zeros(n, dtype=np.int8)
+        a, b, c = 5, 5 + 2 * H8 + 3, 5 + 2 * H8 + 50
+        sig[a:b] = 1                    # long across two 8h marks
+        sig[b:c] = -1                   # flip, closed before the next mark
+        sig[c + 10:] = 1                # re-entry, still open at the end
+        sim = vb.simulate(h, sig)
+
+        fee = FIXED_NOTIONAL * TAKER_FEE
+        p = h['price']
+        e_long = self._slip(p[a], 1)
+        size_l = FIXED_NOTIONAL / e_long
+        x_long = self._slip(p[b], -1)
+        funding_l = FIXED_NOTIONAL * 0.0003 * 2          # latest rate x whole periods
+        pnl_l = size_l * (x_long - e_long) - 2 * fee - funding_l
+        e_short = self._slip(p[b], -1)
+        size_s = FIXED_NOTIONAL / e_short
+        x_short = self._slip(p[c], 1)
+        pnl_s = size_s * (e_short - x_short) - 2 * fee
+
+        ex = sim['executions']
+        self.assertEqual([e['side'] for e in ex], ['BUY', 'SELL', 'SELL', 'BUY', 'BUY'])
+        self.assertTrue(all(e['fee'] == fee for e in ex))
+        self.assertAlmostEqual(ex[0]['price'], e_long)
+        self.assertAlmostEqual(ex[1]['qty'], size_l)
+        self.assertAlmostEqual(ex[1]['price'], x_long)
+        self.assertEqual(ex[1]['ts'], ex[2]['ts'])       # flip: close + open on one bar
+        self.assertAlmostEqual(ex[3]['price'], x_short)
+        self.assertEqual(ex[4]['ts'], datetime.fromtimestamp(h['ts'][c + 10], timezone.utc))
+
+        eq = [e['equity'] for e in sim['equity_series']]
+        self.assertEqual(len(eq), 3)                     # start + one point per close
+        self.assertEqual(eq[0], INITIAL_EQUITY)
+        self.assertAlmostEqual(eq[1], INITIAL_EQUITY + pnl_l)
+        self.assertAlmostEqual(eq[2], INITIAL_EQUITY + pnl_l + pnl_s)
+        self.assertAlmostEqual(sim['funding'], funding_l, places=6)
+        self.assertEqual(sim['open_side'], 'LONG')
+
+    def test_no_funding_data(self):
+        n = 2 * H8 + 10
+        h = self._h(n)
+        sig = np.zeros(n, dtype=np.int8)
+        sig[3:n - 1] = -1
+        sim = vb.simulate(h, sig)
+        self.assertEqual(sim['funding'], 0)
+        self.assertIsNone(sim['open_side'])
+        fee = FIXED_NOTIONAL * TAKER_FEE
+        entry, exit_ = self._slip(h['price'][3], -1), self._slip(h['price'][n - 1], 1)
+        self.assertAlmostEqual(sim['equity_series'][-1]['equity'],
+                               INITIAL_EQUITY + FIXED_NOTIONAL / entry * (entry - exit_) - 2 * fee)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,244 @@
+"""
+tests/test_virtual_book.py — VirtualBook journal, batched flush and rebuild.
+
+_FakeConn emulates the three engine tables with their idempotency keys
+(bench_executions (source_id, exec_id), bench_equity_timeseries
+(source_id, ts), bench_virtual_positions upsert by strategy_name) and
+commit / rollback; _write_ops goes through a fake execute_values.
+
+Covers:
+  1. Crash between DB commit and journal truncate: reload replays the
+     journal without duplicating rows and rebuilds the same book
+  2. Failed flush rolls back, keeps its ops queued + journaled, retries
+  3. A book rebuilt from the DB matches bench_vector_backtest.simulate on
+     a synthetic run (executions, fees, funding, equity, open position)
+  4. A torn last journal line is skipped on replay
+"""
+
+import sys
+import os
+import copy
+import json
+import shutil
+import tempfile
+import unittest
+from datetime import datetime, timezone
+from unittest import mock
+
+import numpy as np
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+import bench_backtest_engine as engine
+from bench_backtest_engine import VirtualBook
+import bench_vector_backtest as vb
+
+SRC = 7
+NAME = 'trend_follow'
+T0 = 1_735_689_600
+
+
+class _Crash(BaseException):
+    """Process death: not caught by flush()'s except Exception."""
+
+
+class _FakeConn:
+    def __init__(self):
+        self.committed = {'exec': [], 'equity': [], 'position': {}}
+        self.tables = copy.deepcopy(self.committed)
+        self.fail = False
+        self.commits = 0
+        self.rollbacks = 0
+
+    def cursor(self):
+        return _FakeCursor(self)
+
+    def commit(self):
+        self.committed = copy.deepcopy(self.tables)
+        self.commits += 1
+
+    def rollback(self):
+        self.tables = copy.deepcopy(self.committed)
+        self.rollbacks += 1
+
+
+class _FakeCursor:
+    def __init__(self, conn):
+        self.conn = conn
+        self.rows = []
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+    def execute(self, sql, params=None):
+        t = self.conn.tables
+        if 'FROM bench_virtual_positions' in sql:
+            self.rows = [(r[0], name) + tuple(r[2:]) for name, r in t['position'].items()]
+        elif 'FROM bench_equity_timeseries' in sql:
+            latest = {}
+            for src, ts, equity in t['equity']:      # insertion order ~ id
+                if src not in latest or ts >= latest[src][0]:
+                    latest[src] = (ts, equity)
+            self.rows = [(src, v[1]) for src, v in latest.items()]
+        else:
+            raise AssertionError(sql)
+
+    def fetchall(self):
+        return self.rows
+
+
+def _execute_values(cur, sql, rows, template=None, page_size=100):
+    t = cur.conn.tables
+    if 'INSERT INTO bench_executions' in sql:
+        seen = {(r[0], r[6]) for r in t['exec']}
+        t['exec'].extend(r for r in rows if (r[0], r[6]) not in seen)
+        if cur.conn.fail:
+            raise RuntimeError('connection reset')
+    elif 'INSERT INTO bench_equity_timeseries' in sql:
+        seen = {(r[0], r[1]) for r in t['equity']}
+        t['equity'].extend(r for r in rows if (r[0], r[1]) not in seen)
+    elif 'INSERT INTO bench_virtual_positions' in sql:
+        for r in rows:
+            t['position'][r[1]] = r
+    else:
+        raise AssertionError(sql)
+
+
+class _BookTest(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp = tempfile.mkdtemp()
+        self.wal = os.path.join(self.tmp, 'wal.jsonl')
+        self.conn = _FakeConn()
+        patches = [mock.patch('psycopg2.extras.execute_values', _execute_values),
+                   mock.patch.object(engine, '_log')]
+        for p in patches:
+            p.start()
+            self.addCleanup(p.stop)
+
+    def tearDown(self):
+        shutil.rmtree(self.tmp)
+
+    def _book(self):
+        book = VirtualBook(wal_path=self.wal)
+        book.load(self.conn)
+        return book
+
+    def _wal_lines(self):
+        with open(self.wal) as f:
+            return sum(1 for _ in f)
+
+    def _trade(self, book):
+        book.initialize_equity(SRC, ts=T0)
+        book.process(SRC, NAME, 'LONG', 60000, ts=T0 + 60)
+        book.process(SRC, NAME, 'SHORT', 60300, ts=T0 + 120)      # flip
+        book.process(SRC, NAME, 'SHORT', 60100, funding_rate=0.0001,
+                     ts=T0 + 120 + engine.FUNDING_INTERVAL_SEC)
+
+
+class TestJournal(_BookTest):
+
+    def test_crash_after_commit_no_duplicates(self):
+        book = self._book()
+        self._trade(book)
+        n_ops = len(book.pending)
+        self.assertEqual(self._wal_lines(), n_ops)
+        with mock.patch.object(book, '_truncate_wal', side_effect=_Crash):
+            with self.assertRaises(_Crash):
+                book.flush(self.conn)
+        committed = copy.deepcopy(self.conn.committed)
+        self.assertEqual(len(committed['exec']), 3)
+        self.assertEqual(self._wal_lines(), n_ops)        # journal survived the crash
+
+        reloaded = self._book()
+        self.assertEqual(self.conn.committed, committed)  # replay wrote nothing new
+        self.assertEqual(self._wal_lines(), 0)
+        self.assertEqual(reloaded.equity, book.equity)
+        self.assertEqual(reloaded.positions[SRC]['side'], 'SHORT')
+        self.assertAlmostEqual(reloaded.positions[SRC]['accumulated_funding'],
+                               book.positions[SRC]['accumulated_funding'])
+
+    def test_failed_flush_retries(self):
+        book = self._book()
+        self._trade(book)
+        n_ops = len(book.pending)
+        self.conn.fail = True
+        self.assertEqual(book.flush(self.conn), 0)
+        self.assertEqual(self.conn.rollbacks, 1)
+        self.assertEqual(self.conn.committed['exec'], [])
+        self.assertEqual(len(book.pending), n_ops)
+        self.assertEqual(self._wal_lines(), n_ops)
+
+        book.process(SRC, NAME, 'FLAT', 60000, ts=T0 + 10 * engine.FUNDING_INTERVAL_SEC)
+        self.conn.fail = False
+        self.assertEqual(book.flush(self.conn), n_ops + 3)   # exec + equity + position
+        self.assertEqual(book.pending, [])
+        self.assertEqual(self._wal_lines(), 0)
+        self.assertEqual(len(self.conn.committed['exec']), 4)
+        self.assertEqual(len({r[6] for r in self.conn.committed['exec']}), 4)
+        self.assertIsNone(self.conn.committed['position'][NAME][2])
+
+    def test_torn_journal_line_skipped(self):
+        book = self._book()
+        self._trade(book)
+        with open(self.wal, 'a') as f:
+            f.write('{"op": "exec", "sou')
+        self.assertEqual(len(VirtualBook(wal_path=self.wal)._read_wal()), len(book.pending))
+
+
+class TestRebuildParity(_BookTest):
+
+    def _history(self, n=3000, seed=1):
+        rng = np.random.default_rng(seed)
+        price = 60000 + np.cumsum(rng.normal(0, 25, n))
+        funding = np.full(n, np.nan)
+        funding[600:] = rng.choice([0.0001, -0.00005, 0.0003], n - 600)
+        sig = np.zeros(n, dtype=np.int8)
+        # long holds across several 8h marks, then flips, flats and re-enters
+        for a, b, side in ((40, 1500, 1), (1500, 2100, -1), (2300, 2400, 1), (2600, n, -1)):
+            sig[a:b] = side
+        h = {'ts': (T0 + 60 * np.arange(n)).astype(np.float64),
+             'price': price, 'funding': funding, 'first': 19}
+        return h, sig
+
+    def test_rebuilt_book_matches_simulate(self):
+        h, sig = self._history()
+        sim = vb.simulate(h, sig)
+
+        book = self._book()
+        book.initialize_equity(SRC, ts=float(h['ts'][h['first']]))
+        for i in range(h['first'], len(sig)):
+            rate = h['funding'][i]
+            book.process(SRC, NAME, vb.SIDE[int(sig[i])], h['price'][i],
+                         funding_rate=None if np.isnan(rate) else rate, ts=float(h['ts'][i]))
+        self.assertGreater(book.flush(self.conn), 0)
+
+        rebuilt = VirtualBook(wal_path=self.wal)
+        rebuilt.load(self.conn)
+        execs = self.conn.committed['exec']
+        self.assertEqual(len(execs), len(sim['executions']))
+        for row, ref in zip(execs, sim['executions']):
+            self.assertEqual(row[1], ref['ts'])
+            self.assertEqual(row[2], ref['side'])
+            self.assertAlmostEqual(row[3], ref['qty'], places=12)
+            self.assertAlmostEqual(row[4], ref['price'], places=6)
+            self.assertAlmostEqual(row[5], ref['fee'], places=12)
+        equity = [e for _, _, e in self.conn.committed['equity']]
+        self.assertEqual(len(equity), len(sim['equity_series']))
+        for got, ref in zip(equity, sim['equity_series']):
+            self.assertAlmostEqual(got, ref['equity'], places=6)
+        self.assertAlmostEqual(rebuilt.equity[SRC], sim['equity_series'][-1]['equity'], places=6)
+        self.assertEqual(rebuilt.positions[SRC]['side'], sim['open_side'])
+        self.assertEqual(rebuilt.positions[SRC]['entry_ts'],
+                         datetime.fromtimestamp(h['ts'][2600], timezone.utc).timestamp())
+        metas = [json.loads(r[7]) for r in execs]
+        closed_funding = sum(m['funding_cost'] for m in metas if m['action'] == 'CLOSE')
+        self.assertGreater(closed_funding, 0)
+        self.assertAlmostEqual(closed_funding, sim['funding'], places=5)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,225 @@
+"""
+tests/test_walkforward.py — walk-forward windows, regime tagging, sliced metric merge.
+
+Covers:
+  1. windows(): train/test split, step (tiling / overlapping), short range
+  2. Trades are tagged with the regime active at entry (not at exit);
+     _regime_codes drops stale / unknown market_context rows to UNKNOWN
+  3. compute_sliced_metrics / merge_sliced_metrics: counts and PnL add up,
+     PF / WR / EV / hold recomputed from the summed components (not averaged)
+  4. _run_window + summarize on a synthetic history: test slice only trades
+     inside its window, summary totals match the windows
+"""
+
+import sys
+import os
+import unittest
+from datetime import datetime, timezone
+
+import numpy as np
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+import bench_metrics
+import bench_sweep
+import bench_vector_backtest as vb
+import bench_walkforward as wf
+from bench_walkforward import windows, DAY_SEC
+
+T0 = 1_735_689_600
+
+
+def _at(minutes):
+    return datetime.fromtimestamp(T0 + 60 * minutes, timezone.utc)
+
+
+def _trip(open_min, close_min, open_px, close_px, side='BUY', fee=0.0):
+    """Round trip of qty 1 as two executions."""
+    close_side = 'SELL' if side == 'BUY' else 'BUY'
+    return [{'ts': _at(open_min), 'side': side, 'qty': 1, 'price': open_px, 'fee': fee},
+            {'ts': _at(close_min), 'side': close_side, 'qty': 1, 'price': close_px, 'fee': fee}]
+
+
+def _history(days=12, seed=0):
+    """Random-walk 1m history with every column signals() reads; regime cycles every 10h."""
+    n = days * 1440
+    rng = np.random.default_rng(seed)
+    c = 60000 + np.cumsum(rng.normal(0, 15, n))
+    mid = np.convolve(c, np.ones(30) / 30, mode='same')
+    h = {'ts': (T0 + 60 * np.arange(n)).astype(np.float64), 'close': c, 'price': c}
+    for col in vb.IND_COLS:
+        h[col] = c.copy()
+    h['bb_mid'], h['bb_up'], h['bb_dn'] = mid, mid + 60, mid - 60
+    h['rsi_14'] = 50 + (c - mid) / 2
+    h['atr_14'] = np.full(n, 80.0)
+    h['vol_spike'] = rng.random(n) < 0.02
+    h['poc'], h['vah'], h['val'] = c, c + 300, c - 300
+    h['regime'] = ((np.arange(n) // 600) % 4).astype(np.int8)
+    h['funding'] = np.full(n, np.nan)
+    h['first'] = 0
+    return h
+
+
+class TestWindows(unittest.TestCase):
+
+    def test_tiling(self):
+        wins = windows(0, 60 * DAY_SEC, 30, 7)
+        self.assertEqual(len(wins), 4)                    # 30 + 4 * 7 <= 60 < 30 + 5 * 7
+        for k, (train_start, split, test_end) in enumerate(wins):
+            self.assertEqual(train_start, k * 7 * DAY_SEC)
+            self.assertEqual(split - train_start, 30 * DAY_SEC)
+            self.assertEqual(test_end - split, 7 * DAY_SEC)
+        # test periods tile: each starts where the previous one ended
+        self.assertEqual([w[1] for w in wins[1:]], [w[2] for w in wins[:-1]])
+
+    def test_step_and_bounds(self):
+        wins = windows(100, 100 + 12 * DAY_SEC, 5, 2, step_days=1)
+        self.assertEqual(len(wins), 6)
+        self.assertEqual(wins[-1][2], 100 + 12 * DAY_SEC)  # last window ends exactly at end
+        self.assertEqual(wins[1][0] - wins[0][0], DAY_SEC)
+        self.assertEqual(windows(0, 36 * DAY_SEC, 30, 7), [])
+
+
+class TestRegimeTagging(unittest.TestCase):
+
+    def setUp(self):
+        n = 3000
+        self.h = {'ts': (T0 + 60 * np.arange(n)).astype(np.float64),
+                  'regime': ((np.arange(n) // 600) % 3 + 1).astype(np.int8)}   # no UNKNOWN
+
+    def test_regime_at_entry(self):
+        execs = (_trip(10, 700, 100, 110)                 # RANGE → BREAKOUT: RANGE
+                 + _trip(650, 1250, 100, 90, side='SELL')  # BREAKOUT → SHOCK: BREAKOUT
+                 + _trip(1300, 1350, 100, 95))            # SHOCK
+        # overlapping trips: pair them one at a time, as separate runs would
+        sliced = bench_metrics.merge_sliced_metrics([
+            bench_metrics.compute_sliced_metrics(execs[i:i + 2],
+                                                 lambda t: vb.regime_at(self.h, t['open_ts']))
+            for i in range(0, len(execs), 2)])
+        self.assertEqual(sorted(sliced), ['BREAKOUT', 'RANGE', 'SHOCK'])
+        self.assertEqual(sliced['RANGE']['cumulative_pnl'], 10)
+        self.assertEqual(sliced['BREAKOUT']['cumulative_pnl'], 10)
+        self.assertEqual(sliced['SHOCK']['cumulative_pnl'], -5)
+
+    def test_regime_at_edges(self):
+        self.assertEqual(vb.regime_at(self.h, _at(599)), 'RANGE')
+        self.assertEqual(vb.regime_at(self.h, _at(600)), 'BREAKOUT')
+        self.assertEqual(vb.regime_at(self.h, _at(10 ** 6)),             # clamps to last bar
+                         vb.REGIMES[int(self.h['regime'][-1])])
+        self.assertEqual(vb.regime_at({'ts': self.h['ts']}, _at(5)), 'UNKNOWN')
+
+    def test_regime_codes_age_and_labels(self):
+        rows = [(T0, 'RANGE'), (T0 + 3600, 'SHOCK'), (T0 + 7200, 'SIDEWAYS')]
+        ts = np.array([T0 - 60, T0 + 60, T0 + vb.REGIME_MAX_AGE_SEC + 60,
+                       T0 + 3600, T0 + 7200], dtype=np.float64)
+        codes = vb._regime_codes(rows, ts)
+        self.assertEqual([vb.REGIMES[c] for c in codes],
+                         ['UNKNOWN', 'RANGE', 'UNKNOWN', 'SHOCK', 'UNKNOWN'])
+
+    def test_backtest_by_regime(self):
+        h = _history(days=3)
+        m = vb.backtest('mean_reversion', h)
+        self.assertGreater(m['trade_count'], 0)
+        self.assertEqual(sum(s['trade_count'] for s in m['by_regime'].values()),
+                         m['trade_count'])
+        sim = vb.simulate(h, vb.signals('mean_reversion', h)[0])
+        trades = bench_metrics._pair_trades(sim['executions'])
+        want = {}
+        for t in trades:
+            i = int(np.searchsorted(h['ts'], t['open_ts'].timestamp()))
+            label = vb.REGIMES[int(h['regime'][i])]
+            want[label] = want.get(label, 0) + 1
+        self.assertEqual({k: v['trade_count'] for k, v in m['by_regime'].items()}, want)
+
+
+class TestMerge(unittest.TestCase):
+
+    def test_ratios_from_summed_components(self):
+        label = lambda t: 'RANGE'
+        # run A: +30, -10 → PF 3.0, WR 50   run B: +2, +2, +2, -4 → PF 1.5, WR 75
+        a = bench_metrics.compute_sliced_metrics(
+            _trip(0, 10, 100, 130) + _trip(20, 30, 100, 90), label)
+        b = bench_metrics.compute_sliced_metrics(
+            _trip(0, 60, 100, 102) + _trip(70, 80, 100, 102) + _trip(90, 100, 100, 102)
+            + _trip(110, 120, 100, 96), label)
+        self.assertEqual((a['RANGE']['profit_factor'], a['RANGE']['win_rate']), (3.0, 50.0))
+        self.assertEqual((b['RANGE']['profit_factor'], b['RANGE']['win_rate']), (1.5, 75.0))
+
+        m = bench_metrics.merge_sliced_metrics([a, b])['RANGE']
+        self.assertEqual(m['trade_count'], 6)
+        self.assertEqual((m['winning_trades'], m['losing_trades']), (4, 2))
+        self.assertEqual((m['gross_profit'], m['gross_loss']), (36, 14))
+        self.assertEqual(m['profit_factor'], round(36 / 14, 2))     # not (3.0 + 1.5) / 2
+        self.assertEqual(m['win_rate'], round(4 / 6 * 100, 1))      # not (50 + 75) / 2
+        self.assertEqual(m['cumulative_pnl'], 22)
+        self.assertEqual(m['ev_per_trade'], round(22 / 6, 4))
+        self.assertEqual(m['avg_hold_time_min'], round((10 + 10 + 60 + 10 + 10 + 10) / 6, 1))
+
+    def test_merge_equals_one_pass(self):
+        runs = [_trip(0, 30, 100, 104, fee=0.1) + _trip(40, 45, 100, 97, side='SELL', fee=0.1),
+                _trip(2000, 2010, 100, 99, fee=0.1),
+                _trip(3000, 3200, 100, 111, side='SELL', fee=0.1)]
+        label = lambda t: 'UP' if t['pnl'] > 0 else 'DOWN'
+        merged = bench_metrics.merge_sliced_metrics(
+            [bench_metrics.compute_sliced_metrics(r, label) for r in runs])
+        whole = bench_metrics.compute_sliced_metrics(sum(runs, []), label)
+        self.assertEqual(sorted(merged), sorted(whole))
+        for k in whole:
+            for key in ('trade_count', 'cumulative_pnl', 'win_rate', 'profit_factor',
+                        'ev_per_trade', 'gross_profit', 'gross_loss'):
+                self.assertAlmostEqual(merged[k][key], whole[k][key], places=4, msg=(k, key))
+
+    def test_edge_cases(self):
+        only_wins = {'SHOCK': {'trade_count': 2, 'winning_trades': 2, 'losing_trades': 0,
+                               'cumulative_pnl': 5.0, 'gross_profit': 5.0, 'gross_loss': 0.0}}
+        m = bench_metrics.merge_sliced_metrics([only_wins, None, {}])
+        self.assertEqual(m['SHOCK']['profit_factor'], float('inf'))
+        self.assertEqual(bench_metrics.merge_sliced_metrics([]), {})
+
+
+class TestRunWindow(unittest.TestCase):
+
+    def setUp(self):
+        self.h = _history(days=12)
+        bench_sweep._worker['h'] = self.h
+
+    def tearDown(self):
+        bench_sweep._worker.clear()
+
+    def test_windows_and_summary(self):
+        start = self.h['ts'][0]
+        wins = windows(start, start + 12 * DAY_SEC, 5, 2)
+        self.assertEqual(len(wins), 3)
+        defaults = dict(vb.PARAMS['mean_reversion'])
+        rows = [wf._run_window('mean_reversion', k, w, [defaults], 'total_return_pct', 0)
+                for k, w in enumerate(wins)]
+        for r, (_, split, test_end) in zip(rows, wins):
+            self.assertIsNone(r['train'])
+            self.assertIsNone(r['baseline'])
+            test = vb.slice_history(self.h, split, test_end)
+            self.assertEqual(test['ts'][test['first']], split)
+            self.assertLess(test['ts'][-1], test_end)
+            self.assertEqual(r['test']['trade_count'],
+                             vb.backtest('mean_reversion', test)['trade_count'])
+        s = wf.summarize(rows)
+        self.assertEqual(s['windows'], 3)
+        self.assertEqual(s['chosen']['trades'], sum(r['test']['trade_count'] for r in rows))
+        self.assertEqual(sum(m['trade_count'] for m in s['chosen']['by_regime'].values()),
+                         s['chosen']['trades'])
+        self.assertEqual(s['chosen'], s['baseline'])
+
+    def test_train_selection(self):
+        start = self.h['ts'][0]
+        win = windows(start, start + 7 * DAY_SEC, 5, 2)[0]
+        cands = bench_sweep.candidates('mean_reversion', 'lhs', samples=4)
+        r = wf._run_window('mean_reversion', 0, win, cands, 'total_return_pct', 0)
+        train = vb.slice_history(self.h, win[0], win[1])
+        best = max(vb.backtest('mean_reversion', train, p)['total_return_pct'] for p in cands)
+        self.assertEqual(r['train']['total_return_pct'], best)
+        self.assertIn(r['params'], cands)
+        if r['params'] != cands[0]:
+            self.assertIsNotNone(r['baseline'])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -6,6 +6,11 @@ Type=notify, WatchdogSec=60, POLL_SEC=30.
 
 Reads candles/indicators/vol_profile/liquidity_snapshots from main DB (RO),
 classifies regime (RANGE/BREAKOUT/SHOCK), writes to market_context table (RW).
+
+Every symbol from app/market_symbols (SYMBOLS env) is classified each cycle
+on the same two connections, longest-waiting symbol first; all results go
+out in one upsert. Per-symbol lag (newest 1m candle behind the regime) is
+written to pipeline_lag (stage 'market_context').
 """
 import os
 import sys
@@ -13,11 +18,17 @@ import time
 import json
 
 sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, os.path.join(
+    os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'app'))
+
+from psycopg2.extras import execute_values
 
 import ctx_migrations
 from db_config_ctx import get_main_conn_ro, get_main_conn_rw
 from ctx_utils import _log, send_telegram, ExponentialBackoff, load_env
 import regime_classifier
+from db_migrations import ensure_pipeline_lag
+from market_symbols import get_symbols, FairScheduler, LagTracker
 
 POLL_SEC = 30
 
@@ -38,87 +49,114 @@ def _sdnotify(state):
         pass
 
 
-def _get_symbol():
-    return os.getenv('SYMBOL', 'BTC/USDT:USDT')
+def _get_symbols():
+    return get_symbols()
+
+
+_UPSERT_SQL = """
+    INSERT INTO market_context (
+        ts, symbol, timeframe,
+        regime, regime_confidence,
+        adx_14, plus_di, minus_di, bbw_ratio,
+        poc, vah, val, price_vs_va,
+        flow_bias, flow_shock,
+        shock_type, shock_direction,
+        breakout_confirmed, breakout_conditions,
+        raw_inputs
+    ) VALUES %s
+    ON CONFLICT (symbol, timeframe, ts) DO UPDATE SET
+        regime = EXCLUDED.regime,
+        regime_confidence = EXCLUDED.regime_confidence,
+        adx_14 = EXCLUDED.adx_14,
+        plus_di = EXCLUDED.plus_di,
+        minus_di = EXCLUDED.minus_di,
+        bbw_ratio = EXCLUDED.bbw_ratio,
+        poc = EXCLUDED.poc,
+        vah = EXCLUDED.vah,
+        val = EXCLUDED.val,
+        price_vs_va = EXCLUDED.price_vs_va,
+        flow_bias = EXCLUDED.flow_bias,
+        flow_shock = EXCLUDED.flow_shock,
+        shock_type = EXCLUDED.shock_type,
+        shock_direction = EXCLUDED.shock_direction,
+        breakout_confirmed = EXCLUDED.breakout_confirmed,
+        breakout_conditions = EXCLUDED.breakout_conditions,
+        raw_inputs = EXCLUDED.raw_inputs;
+"""
 
 
-def _cycle(ro_conn, rw_conn):
+def _row(symbol, result):
+    return (
+        symbol,
+        result['regime'], result['confidence'],
+        result.get('adx_14'), result.get('plus_di'), result.get('minus_di'),
+        result.get('bbw_ratio'),
+        result.get('poc'), result.get('vah'), result.get('val'),
+        result.get('price_vs_va'),
+        result.get('flow_bias'), result.get('flow_shock'),
+        result.get('shock_type'), result.get('shock_direction'),
+        result.get('breakout_confirmed'),
+        json.dumps(result.get('breakout_conditions', {}), default=str),
+        json.dumps(result.get('raw_inputs', {}), default=str),
+    )
+
+
+def _latest_candle_ts(cur, symbols):
+    cur.execute("""
+        SELECT symbol, max(ts) FROM candles
+        WHERE symbol = ANY(%s) AND tf = '1m'
+        GROUP BY symbol;
+    """, (list(symbols),))
+    return dict(cur.fetchall())
+
+
+def _cycle(ro_conn, rw_conn, sched=None, lag=None):
     """One classification cycle:
-    1. Read market data from main DB (RO)
+    1. Read market data from main DB (RO), per symbol
     2. Classify regime (RANGE/BREAKOUT/SHOCK)
-    3. Upsert to market_context table (RW)
+    3. Upsert all symbols to market_context table (RW, one statement)
     """
-    symbol = _get_symbol()
-
+    sched = sched or FairScheduler(_get_symbols())
+    results = []
     with ro_conn.cursor() as cur:
-        result = regime_classifier.classify(cur, symbol)
-
-    if not result:
-        _log('classify returned None, skipping')
+        for symbol in sched.order():
+            try:
+                result = regime_classifier.classify(cur, symbol)
+            except Exception as e:
+                # One symbol's bad data must not block the others
+                _log(f'{symbol}: classify error: {e}')
+                result = None
+            sched.served(symbol)
+            if not result:
+                _log(f'{symbol}: classify returned None, skipping')
+                continue
+            results.append((symbol, result))
+        if lag is not None and results:
+            for symbol, ts in _latest_candle_ts(cur, [r[0] for r in results]).items():
+                lag.observe(symbol, ts)
+
+    if not results:
         return
 
     # Upsert to market_context (with rollback on error)
     try:
         with rw_conn.cursor() as cur:
-            cur.execute("""
-                INSERT INTO market_context (
-                    ts, symbol, timeframe,
-                    regime, regime_confidence,
-                    adx_14, plus_di, minus_di, bbw_ratio,
-                    poc, vah, val, price_vs_va,
-                    flow_bias, flow_shock,
-                    shock_type, shock_direction,
-                    breakout_confirmed, breakout_conditions,
-                    raw_inputs
-                ) VALUES (
-                    now(), %s, '1m',
-                    %s, %s,
-                    %s, %s, %s, %s,
-                    %s, %s, %s, %s,
-                    %s, %s,
-                    %s, %s,
-                    %s, %s::jsonb,
-                    %s::jsonb
-                )
-                ON CONFLICT (symbol, timeframe, ts) DO UPDATE SET
-                    regime = EXCLUDED.regime,
-                    regime_confidence = EXCLUDED.regime_confidence,
-                    adx_14 = EXCLUDED.adx_14,
-                    plus_di = EXCLUDED.plus_di,
-                    minus_di = EXCLUDED.minus_di,
-                    bbw_ratio = EXCLUDED.bbw_ratio,
-                    poc = EXCLUDED.poc,
-                    vah = EXCLUDED.vah,
-                    val = EXCLUDED.val,
-                    price_vs_va = EXCLUDED.price_vs_va,
-                    flow_bias = EXCLUDED.flow_bias,
-                    flow_shock = EXCLUDED.flow_shock,
-                    shock_type = EXCLUDED.shock_type,
-                    shock_direction = EXCLUDED.shock_direction,
-                    breakout_confirmed = EXCLUDED.breakout_confirmed,
-                    breakout_conditions = EXCLUDED.breakout_conditions,
-                    raw_inputs = EXCLUDED.raw_inputs;
-            """, (
-                symbol,
-                result['regime'], result['confidence'],
-                result.get('adx_14'), result.get('plus_di'), result.get('minus_di'),
-                result.get('bbw_ratio'),
-                result.get('poc'), result.get('vah'), result.get('val'),
-                result.get('price_vs_va'),
-                result.get('flow_bias'), result.get('flow_shock'),
-                result.get('shock_type'), result.get('shock_direction'),
-                result.get('breakout_confirmed'),
-                json.dumps(result.get('breakout_conditions', {}), default=str),
-                json.dumps(result.get('raw_inputs', {}), default=str),
-            ))
+            execute_values(
+                cur, _UPSERT_SQL, [_row(sym, res) for sym, res in results],
+                template="(now(), %s, '1m', %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, "
+                         "%s, %s, %s, %s, %s, %s::jsonb, %s::jsonb)",
+                page_size=len(results))
         rw_conn.commit()
     except Exception:
         rw_conn.rollback()
         raise
+    if lag is not None:
+        lag.maybe_flush(rw_conn)
 
-    _log(f'regime={result["regime"]} conf={result["confidence"]} '
-         f'adx={result.get("adx_14")} flow={result.get("flow_bias")} '
-         f'shock_type={result.get("shock_type")}')
+    for symbol, result in results:
+        _log(f'{symbol}: regime={result["regime"]} conf={result["confidence"]} '
+             f'adx={result.get("adx_14")} flow={result.get("flow_bias")} '
+             f'shock_type={result.get("shock_type")}')
 
 
 def main():
@@ -127,6 +165,10 @@ def main():
 
     # Run migrations at startup
     ctx_migrations.run_all()
+    symbols = _get_symbols()
+    sched = FairScheduler(symbols)
+    lag = LagTracker('market_context', flush_sec=0)
+    _log(f'symbols={",".join(symbols)}')
 
     # Notify systemd ready
     _sdnotify('READY=1')
@@ -143,8 +185,11 @@ def main():
                 ro_conn = get_main_conn_ro()
             if rw_conn is None or rw_conn.closed:
                 rw_conn = get_main_conn_rw(autocommit=False)
+                with rw_conn.cursor() as cur:
+                    ensure_pipeline_lag(cur)
+                rw_conn.commit()
 
-            _cycle(ro_conn, rw_conn)
+            _cycle(ro_conn, rw_conn, sched, lag)
             backoff.success()
 
             # Watchdog ping
@@ -16,6 +16,8 @@ sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
 from db_config_ctx import get_main_conn_ro
 from ctx_utils import _log, send_telegram, load_env
 
+SYMBOL = os.getenv('SYMBOL', 'BTC/USDT:USDT')
+
 
 def generate_report(days=7):
     """Generate regime-mode performance report.
@@ -95,9 +97,9 @@ def generate_report(days=7):
                 SELECT regime, COUNT(*) as cnt,
                        ROUND(AVG(regime_confidence)::numeric, 1) as avg_conf
                 FROM market_context
-                WHERE ts >= now() - %s::interval
+                WHERE symbol = %s AND ts >= now() - %s::interval
                 GROUP BY regime ORDER BY cnt DESC;
-            """, (interval_str,))
+            """, (SYMBOL, interval_str))
             dist_rows = cur.fetchall()
 
         # Format report